@@ -371,6 +371,9 @@ def create_app(config_name=None):
     app = Flask(__name__)
     app.config["TEMPLATES_AUTO_RELOAD"] = True
     app.jinja_env.add_extension('jinja2.ext.do')  # Habilita {% do %} em templates
+    # {% cache key, deps %} — fragmentos de listagens pesadas (ver fragment_cache.py)
+    from app.utils.fragment_cache import init_fragment_cache
+    init_fragment_cache(app)
 
     if config_name == "testing":
         app.config.from_object(TestConfig)
@@ -558,8 +561,12 @@ def create_app(config_name=None):
 
             # 📦 Cache headers para arquivos estaticos
             if request.path.startswith('/static/'):
-                if request.args.get('v') or request.path.endswith(('.woff', '.woff2', '.ttf', '.eot')):
-                    # Assets versionados (?v=X) ou fontes -> cache de 1 ano
+                if (
+                    request.args.get('v')
+                    or request.path.startswith('/static/dist/')
+                    or request.path.endswith(('.woff', '.woff2', '.ttf', '.eot'))
+                ):
+                    # Assets versionados (?v=X / hash no nome em dist/) ou fontes -> cache de 1 ano
                     response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
                 else:
                     # Assets sem versioning -> cache curto com revalidacao
@@ -920,6 +927,7 @@ def create_app(config_name=None):
             diagnosticar_vinculos,
             corrigir_vinculos_grupo,
             importar_cidades_cli,
+            build_assets_cli,
         )
 
         app.cli.add_command(normalizar_dados)
@@ -929,6 +937,7 @@ def create_app(config_name=None):
         app.cli.add_command(diagnosticar_vinculos)
         app.cli.add_command(corrigir_vinculos_grupo)
         app.cli.add_command(importar_cidades_cli)
+        app.cli.add_command(build_assets_cli)
 
         # REMOVIDO: criar_vinculos_faltantes (função perigosa que criava vínculos automaticamente)
     except ImportError as e:
@@ -1513,7 +1522,7 @@ def create_app(config_name=None):
         )
 
     # Registrar modelo EventoSupplyChain para Flask-Migrate detectar a tabela
-    from app.supply_chain.models import EventoSupplyChain  # noqa: F401
+    from app.supply_chain.models import EventoSupplyChain, EventoSupplyChainArquivo  # noqa: F401
 
     from app.chat import models as _chat_models  # noqa: F401  # pyright: ignore[reportUnusedImport]  — registra modelos no metadata
 
@@ -238,6 +238,17 @@ USE_AUTO_MEMORY_INJECTION = _env_bool("AGENT_AUTO_MEMORY_INJECTION", "true")
 # (o 0.55 herdado matou o retrieval por semanas; nao repetir).
 MEMORY_INJECTION_MIN_SIMILARITY = _env_float("AGENT_MEMORY_MIN_SIMILARITY", "0.40")
 
+# Montagem concorrente do contexto do UserPromptSubmit (sdk/context_assembler.py)
+# Produtores independentes (user_rules, session window, briefing, directives,
+# routing, semantica, KG) rodam em paralelo: o turno espera o bloco mais
+# lento (com prazo), nao a soma. Bloco atrasado = turno segue sem ele.
+# Para desativar (execucao serial): AGENT_CONCURRENT_CONTEXT_ASSEMBLY=false
+AGENT_CONCURRENT_CONTEXT_ASSEMBLY = _env_bool("AGENT_CONCURRENT_CONTEXT_ASSEMBLY", "true")
+AGENT_CONTEXT_ASSEMBLY_WORKERS = _env_int("AGENT_CONTEXT_ASSEMBLY_WORKERS", "8")
+# Prazo dos blocos de banco e dos de retrieval (embedding Voyage + pgvector)
+AGENT_CONTEXT_BLOCK_DEADLINE_S = _env_float("AGENT_CONTEXT_BLOCK_DEADLINE_S", "2.0")
+AGENT_CONTEXT_RETRIEVAL_DEADLINE_S = _env_float("AGENT_CONTEXT_RETRIEVAL_DEADLINE_S", "5.0")
+
 # User.xml Pointer (v2.2, 2026-04-12) — Camada 2 da Mudanca 4
 # Quando user.xml > THRESHOLD e modelo tem budget finito (Sonnet/Haiku),
 # injetar apenas <resumo> + <contextualizacao> + ponteiro instruindo o
@@ -578,6 +589,18 @@ PERSISTENT_CLIENT_IDLE_TIMEOUT = _env_int("AGENT_CLIENT_IDLE_TIMEOUT", "900")  #
 # Intervalo em segundos entre limpezas de clients idle
 PERSISTENT_CLIENT_CLEANUP_INTERVAL = _env_int("AGENT_CLIENT_CLEANUP_INTERVAL", "60")  # 1 min
 
+# Spares pre-aquecidos: clients ja conectados (CLI + MCP servers de pe) por
+# chave de compatibilidade (usuario/perfil/papel/modelo/effort/plan_mode).
+# O 1o turno de sessao NOVA consome um spare em vez de pagar o spawn.
+# Reposicao em background no loop do daemon; PER_KEY=0 desliga.
+AGENT_SPARE_CLIENTS_PER_KEY = _env_int("AGENT_SPARE_CLIENTS_PER_KEY", "1")
+
+# Teto de spares ociosos no worker inteiro (memoria: cada CLI ~centenas de MB)
+AGENT_SPARE_CLIENTS_MAX = _env_int("AGENT_SPARE_CLIENTS_MAX", "4")
+
+# Chave sem sessao nova ha mais que isto para de ser reposta (spares aposentados)
+AGENT_SPARE_DEMAND_TTL = _env_int("AGENT_SPARE_DEMAND_TTL", "1800")  # 30 min
+
 # ====================================================================
 # AskUserQuestion cross-worker (Redis-backed)
 # ====================================================================
@@ -1055,6 +1078,10 @@ def is_fable5_allowed(user_id) -> bool:
 # Schema: scripts/migrations/2026_05_28_operacao_odoo_auditoria_session.{py,sql}
 # Ver app/odoo/CLAUDE.md secao P8.
 USE_ODOO_AUDIT_HOOK = _env_bool("AGENT_ODOO_AUDIT_HOOK", "false")
+# Gravacao em lote por thread de fundo (sem savepoint por RPC): kill-switch
+# AGENT_ODOO_AUDIT_ASYNC=false, lido direto da ENV por
+# app/utils/odoo_audit_writer.py:modo_async_ativo (como AGENT_ODOO_AUDIT_HOOK,
+# sem importar app.agente.config em workers/scheduler).
 
 
 # ====================================================================
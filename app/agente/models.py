@@ -1228,6 +1228,24 @@ class AgentMemoryEntityRelation(db.Model):
         )
 
 
+class AgentMemoryGraphRevision(db.Model):
+    """
+    Revisão do Knowledge Graph por usuário.
+
+    Incrementada por triggers (kg_revisao_trigger) a cada escrita em
+    entities/links/relations do usuário. knowledge_graph_snapshot.py compara
+    a revisão com a do snapshot em memória para decidir o rebuild.
+    """
+    __tablename__ = 'agent_memory_graph_revisions'
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    revision = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: agora_utc_naive())
+
+    def __repr__(self):
+        return f'<AgentMemoryGraphRevision user={self.user_id} rev={self.revision}>'
+
+
 class AgentIntelligenceReport(db.Model):
     """
     Relatorio de inteligencia do agente (D7 do cron semanal).
@@ -83,6 +83,13 @@ def api_health():
         if pool_status is not None:
             result['sdk_client_pool'] = pool_status
 
+        # Latencia por bloco da montagem de contexto do UserPromptSubmit
+        try:
+            from app.agente.sdk.context_assembler import get_context_latency_snapshot
+            result['context_assembly_latency'] = get_context_latency_snapshot()
+        except Exception:
+            pass
+
         # Atualizar cache
         _health_cache['result'] = result
         _health_cache['timestamp'] = now
@@ -16,7 +16,7 @@ import logging
 import queue
 import re
 import time
-from functools import lru_cache
+from functools import lru_cache, partial
 from typing import AsyncGenerator, Dict, Any, List, Optional, Callable, TYPE_CHECKING
 from app.utils.timezone import agora_utc_naive
 # Infra compartilhada do SDK (PURA, sem dominio) — tambem consumida pelo agente_lojas.
@@ -1536,6 +1536,37 @@ Nunca invente informações."""
         ):
             yield event
 
+    def _build_sdk_hooks(
+        self,
+        user_id: int = None,
+        user_name: str = "Usuário",
+        resume_state: Optional[Dict] = None,
+        our_session_id: Optional[str] = None,
+        session_holder: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """Hooks SDK do client (ver hooks.build_hooks).
+
+        Separado de _build_options para os spares do client_pool: cada spare
+        ganha hooks proprios presos ao seu `session_holder`.
+        """
+        from .hooks import build_hooks
+        return build_hooks(
+            user_id=user_id,
+            user_name=user_name,
+            tool_failure_counts=self._tool_failure_counts,
+            get_last_thinking=lambda: self._last_thinking_content,
+            get_model_name=lambda: str(self.settings.model),
+            set_injected_ids=lambda ids: setattr(self, '_last_injected_memory_ids', ids),
+            resume_state=resume_state,
+            # Fase B teams-melhorias: hooks resolvem o FALANTE do turno via
+            # turn_context_registry (client do pool reusado nao reaplica
+            # hooks — closure congelava user_name/user_id no 1o falante).
+            our_session_id=our_session_id,
+            session_holder=session_holder,
+            # E2.4: perfil do client -> isola memoria/skills/enforce por agente.
+            agente_id=self.agente_id,
+        )
+
     def _build_options(
         self,
         user_name: str = "Usuário",
@@ -1916,21 +1947,11 @@ Nunca invente informações."""
         # Hooks SDK formais para auditoria
         # =================================================================
         try:
-            from .hooks import build_hooks
-            options_dict["hooks"] = build_hooks(
+            options_dict["hooks"] = self._build_sdk_hooks(
                 user_id=user_id,
                 user_name=user_name,
-                tool_failure_counts=self._tool_failure_counts,
-                get_last_thinking=lambda: self._last_thinking_content,
-                get_model_name=lambda: str(self.settings.model),
-                set_injected_ids=lambda ids: setattr(self, '_last_injected_memory_ids', ids),
                 resume_state=resume_state,
-                # Fase B teams-melhorias: hooks resolvem o FALANTE do turno via
-                # turn_context_registry (client do pool reusado nao reaplica
-                # hooks — closure congelava user_name/user_id no 1o falante).
                 our_session_id=our_session_id,
-                # E2.4: perfil do client -> isola memoria/skills/enforce por agente.
-                agente_id=self.agente_id,
             )
             hooks_list = list(options_dict["hooks"].keys())
             logger.debug(
@@ -2385,6 +2406,69 @@ Nunca invente informações."""
                 f"session={resume_id[:12]}... — usando fallback XML via hook"
             )
 
+        # ─── Spare pre-aquecido (client_pool): so sessao NOVA ───
+        # O spare foi spawnado sem session_id/--resume e com hooks proprios, presos
+        # a um session_holder que o pool preenche ao consumi-lo (o CLI publica o
+        # proprio UUID no hook_input; canais SSE usam o nosso) — serve apenas ao 1o turno de sessao web (UUID) sem contexto a
+        # reinjetar (rotacao/resume falho) e sem structured output. O CLI gera o
+        # proprio UUID do JSONL, capturado da init/result message (como no retry
+        # sem resume). Template registrado 1x por chave de compatibilidade.
+        spare_key = None
+        if (
+            not existing
+            and not resume_id
+            and not resume_state.get('failed')
+            and not resume_messages_fallback
+            and not output_format
+            and getattr(options, 'session_id', None)
+        ):
+            from .client_pool import (
+                register_spare_template,
+                spare_key_for,
+                spare_template_needed,
+            )
+            spare_key = spare_key_for(
+                user_id=user_id or 0,
+                agente_id=self.agente_id,
+                role=agent_role,
+                model=getattr(options, 'model', None),
+                effort=effort_level,
+                plan_mode=bool(plan_mode),
+                thinking=thinking_display,
+                admin=bool(debug_mode),
+            )
+            if spare_template_needed(spare_key):
+                try:
+                    from dataclasses import replace as _dc_replace
+                    _template = self._build_options(
+                        user_name=user_name,
+                        user_id=user_id,
+                        model=model,
+                        effort_level=effort_level,
+                        plan_mode=plan_mode,
+                        can_use_tool=can_use_tool,
+                        thinking_display=thinking_display,
+                        specialist_profile=_specialist_profile,
+                        is_admin=bool(debug_mode),
+                    )
+                    # Mesmo SessionStore/flush injetados nas options do turno
+                    _store_fields = {
+                        f: getattr(options, f)
+                        for f in ('session_store', 'load_timeout_ms', 'session_store_flush')
+                        if hasattr(options, f)
+                    }
+                    register_spare_template(
+                        spare_key,
+                        _dc_replace(_template, **_store_fields),
+                        user_id=user_id or 0,
+                        role=agent_role,
+                        hooks_factory=partial(
+                            self._build_sdk_hooks, user_id=user_id, user_name=user_name,
+                        ),
+                    )
+                except Exception as _spare_err:
+                    logger.debug(f"[AGENT_SDK_PERSISTENT] template de spare ignorado: {_spare_err}")
+
         # ─── Emitir init sintético ───
         state.result_session_id = sdk_session_id or our_session_id
         yield StreamEvent(
@@ -2408,6 +2492,7 @@ Nunca invente informações."""
                     options=options,
                     user_id=user_id or 0,
                     role=agent_role,
+                    spare_key=spare_key,
                 )
             except ProcessError as pe:
                 exit_code = getattr(pe, 'exit_code', None)
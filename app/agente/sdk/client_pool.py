@@ -6,6 +6,8 @@ Arquitetura:
 - Registry: session_id → PooledClient (1:1 — ClaudeSDKClient é stateful)
 - submit_coroutine(): bridge Flask thread → daemon (run_coroutine_threadsafe)
 - Cleanup automático de clients idle (PERSISTENT_CLIENT_IDLE_TIMEOUT)
+- Spares pre-aquecidos por chave de compatibilidade para sessões novas
+  (AGENT_SPARE_CLIENTS_PER_KEY / AGENT_SPARE_CLIENTS_MAX)
 
 CAVEAT SDK: "you cannot use a ClaudeSDKClient instance across different
 async runtime contexts". Por isso TODAS as operações rodam no MESMO
@@ -24,8 +26,8 @@ import signal
 import threading
 import time
 from concurrent.futures import Future
-from dataclasses import dataclass, field
-from typing import Any, Coroutine, Dict, Optional
+from dataclasses import dataclass, field, replace as _dc_replace
+from typing import Any, Callable, Coroutine, Dict, List, Optional
 
 logger = logging.getLogger('sistema_fretes')
 
@@ -139,6 +141,8 @@ class PooledClient:
         model: Modelo com que a sessao foi CRIADA. Fonte do "modelo decidido 1x
             por sessao" — o client.py fixa o turno neste valor e NUNCA troca
             mid-sessao (cache MODEL-SCOPED; bug 2026-06-15). None = pooled legado.
+        session_holder: So spares — dict mutavel lido pelos hooks do spare;
+            _claim_spare grava 'our_session_id' ao vincular a sessao.
     """
     client: Any  # ClaudeSDKClient — tipado como Any para evitar import circular
     session_id: str
@@ -150,6 +154,7 @@ class PooledClient:
     sdk_session_id: Optional[str] = None
     model: Optional[str] = None
     role: str = "principal"
+    session_holder: Optional[Dict[str, str]] = None
 
 
 # =============================================================================
@@ -313,11 +318,55 @@ def _get_creation_lock(session_id: str, role: str = "principal") -> "asyncio.Loc
         return lock
 
 
+async def _connect_sdk_client(options: Any, label: str) -> Any:
+    """Cria ClaudeSDKClient, conecta (spawn do CLI) e checa os MCP servers.
+
+    Compartilhado pelo slow path de get_or_create_client e pelo spawn de spares.
+
+    Args:
+        options: ClaudeAgentOptions para connect()
+        label: Identificacao para logs (session_id ou 'spare:<chave>')
+    """
+    from claude_agent_sdk import ClaudeSDKClient
+
+    client = ClaudeSDKClient(options)
+
+    # Connect com streaming mode (None = interactive, sem prompt inicial)
+    await client.connect()
+
+    # Health-check dos MCP servers. SDK 0.2.82+ tornou a conexao MCP NON-BLOCKING
+    # por default: um server que falha ao subir nao aborta o connect() — fica
+    # silencioso. get_mcp_status() (async no SDK 0.2.x) expoe o estado real.
+    # Best-effort: nunca quebra a criacao do client (try/except + log).
+    try:
+        mcp_status = await client.get_mcp_status()
+        mcp_servers = list((mcp_status or {}).get('mcpServers') or [])
+        # 'failed'/'needs-auth' nao sao transitorios (um server nesse estado nao
+        # vira 'connected' sozinho); 'pending' e transitorio pos-connect — nao alarmar.
+        mcp_broken = [s for s in mcp_servers if s.get('status') in ('failed', 'needs-auth')]
+        for s in mcp_broken:
+            logger.warning(
+                f"[SDK_POOL] MCP server NAO conectado: name={s.get('name')!r} "
+                f"status={s.get('status')} error={s.get('error')!r} "
+                f"session={label[:8]}..."
+            )
+        if not mcp_broken:
+            logger.debug(
+                f"[SDK_POOL] MCP health OK: {len(mcp_servers)} servers "
+                f"session={label[:8]}..."
+            )
+    except Exception as mcp_err:
+        logger.debug(f"[SDK_POOL] get_mcp_status falhou (ignorado): {mcp_err}")
+
+    return client
+
+
 async def get_or_create_client(
     session_id: str,
     options: Any,  # ClaudeAgentOptions
     user_id: int = 0,
     role: str = "principal",
+    spare_key: Optional[str] = None,
 ) -> PooledClient:
     """Obtém client existente ou cria novo para a sessão+papel.
 
@@ -328,6 +377,9 @@ async def get_or_create_client(
         options: ClaudeAgentOptions para connect()
         user_id: ID do usuário
         role: Papel do client no pool (default 'principal', retrocompat)
+        spare_key: Chave de compatibilidade (spare_key_for) — so para sessao
+            NOVA sem --resume. Quando setada, o slow path tenta um spare
+            pre-aquecido antes de spawnar o CLI (ver register_spare_template).
 
     Returns:
         PooledClient conectado e pronto para query()
@@ -375,47 +427,20 @@ async def get_or_create_client(
             )
             return pooled
 
-        # Slow path: criar novo client (exclusivo p/ esta sessão+papel sob o lock)
-        from claude_agent_sdk import ClaudeSDKClient
-
-        client = ClaudeSDKClient(options)
-
-        # Connect com streaming mode (None = interactive, sem prompt inicial)
-        await client.connect()
-
-        # Health-check dos MCP servers. SDK 0.2.82+ tornou a conexao MCP NON-BLOCKING
-        # por default: um server que falha ao subir nao aborta o connect() — fica
-        # silencioso. get_mcp_status() (async no SDK 0.2.x) expoe o estado real.
-        # Best-effort: nunca quebra a criacao do client (try/except + log).
-        try:
-            mcp_status = await client.get_mcp_status()
-            mcp_servers = list((mcp_status or {}).get('mcpServers') or [])
-            # 'failed'/'needs-auth' nao sao transitorios (um server nesse estado nao
-            # vira 'connected' sozinho); 'pending' e transitorio pos-connect — nao alarmar.
-            mcp_broken = [s for s in mcp_servers if s.get('status') in ('failed', 'needs-auth')]
-            for s in mcp_broken:
-                logger.warning(
-                    f"[SDK_POOL] MCP server NAO conectado: name={s.get('name')!r} "
-                    f"status={s.get('status')} error={s.get('error')!r} "
-                    f"session={session_id[:8]}..."
-                )
-            if not mcp_broken:
-                logger.debug(
-                    f"[SDK_POOL] MCP health OK: {len(mcp_servers)} servers "
-                    f"session={session_id[:8]}..."
-                )
-        except Exception as mcp_err:
-            logger.debug(f"[SDK_POOL] get_mcp_status falhou (ignorado): {mcp_err}")
-
-        pooled = PooledClient(
-            client=client,
-            session_id=session_id,
-            user_id=user_id,
-            connected=True,
-            # Modelo de criacao = modelo da sessao (stickiness, bug 2026-06-15).
-            model=getattr(options, 'model', None),
-            role=role,
-        )
+        # Slow path: spare pre-aquecido compativel (sessao nova) ou connect()
+        # proprio (exclusivo p/ esta sessão+papel sob o lock)
+        pooled = _claim_spare(spare_key, session_id, user_id, role) if spare_key else None
+        if pooled is None:
+            client = await _connect_sdk_client(options, label=session_id)
+            pooled = PooledClient(
+                client=client,
+                session_id=session_id,
+                user_id=user_id,
+                connected=True,
+                # Modelo de criacao = modelo da sessao (stickiness, bug 2026-06-15).
+                model=getattr(options, 'model', None),
+                role=role,
+            )
 
         with _registry_lock:
             # Se havia um client antigo desconectado, limpar
@@ -456,6 +481,10 @@ async def get_or_create_client(
         except Exception as _sticky_err:
             logger.debug(f"[SDK_POOL] sticky claim ignorado: {_sticky_err}")
 
+        if spare_key:
+            # Repoe o spare consumido (ou cria o 1o desta chave) em background
+            _schedule_spare_replenish()
+
         return pooled
 
 
@@ -614,12 +643,316 @@ def get_any_connected_client(session_id: str) -> Optional[PooledClient]:
     return None
 
 
+# =============================================================================
+# Spares pre-aquecidos (sessao nova sem esperar spawn do CLI)
+# =============================================================================
+#
+# O 1o turno de uma sessao nova paga o spawn do CLI + connect() + subida dos
+# MCP servers (segundos) antes do primeiro token. Spares sao clients ja
+# conectados, sem sessao, mantidos por CHAVE DE COMPATIBILIDADE — as options
+# de um ClaudeSDKClient sao fixadas no spawn (system prompt do usuario, hooks,
+# modelo, effort, plan mode, perfil), entao um spare so serve a turnos com a
+# mesma chave (spare_key_for).
+#
+# Ciclo:
+# - client.py registra o template de options da chave (register_spare_template)
+#   SEM session_id/resume/stderr do turno — o CLI gera o proprio UUID do JSONL
+#   (capturado da init/result message, como no retry sem resume);
+# - cada spare recebe hooks PROPRIOS (hooks_factory) presos a um session_holder;
+#   _claim_spare grava nele o nosso session_id, que os hooks usam nos canais
+#   agent_sse:* e nas linhas de agent_sessions (o hook_input traz o UUID do CLI);
+# - get_or_create_client(spare_key=...) consome um spare no slow path (hit) ou
+#   spawna normal (miss) e agenda _replenish_spares no loop do daemon;
+# - _periodic_cleanup aposenta spares velhos (PERSISTENT_CLIENT_IDLE_TIMEOUT) e
+#   chaves sem demanda ha AGENT_SPARE_DEMAND_TTL, e repoe os demais.
+#
+# Teto de memoria: AGENT_SPARE_CLIENTS_MAX subprocessos ociosos no worker
+# inteiro (cada CLI + MCP servers ocupa centenas de MB de RSS).
+# Resume (pos-idle/reciclagem) NAO usa spare: --resume so existe no spawn.
+
+@dataclass
+class _SpareTemplate:
+    """Options de spawn de uma chave de spares + demanda recente."""
+    options: Any
+    user_id: int = 0
+    role: str = "principal"
+    hooks_factory: Optional[Callable[..., Dict[str, Any]]] = None
+    created_at: float = field(default_factory=time.time)
+    last_demand: float = field(default_factory=time.time)
+
+
+# spare_key → spares conectados (FIFO: o mais antigo sai primeiro)
+_spares: Dict[str, List[PooledClient]] = {}
+_spare_templates: Dict[str, _SpareTemplate] = {}
+_spares_spawning: Dict[str, int] = {}
+_spare_stats: Dict[str, int] = {
+    'hits': 0, 'misses': 0, 'spawned': 0, 'failed': 0, 'retired': 0,
+}
+_spare_replenish_task: Optional["asyncio.Task"] = None
+
+
+def _spares_enabled() -> bool:
+    from ..config.feature_flags import AGENT_SPARE_CLIENTS_PER_KEY, AGENT_SPARE_CLIENTS_MAX
+    return AGENT_SPARE_CLIENTS_PER_KEY > 0 and AGENT_SPARE_CLIENTS_MAX > 0
+
+
+def spare_key_for(**parts: Any) -> str:
+    """Chave de compatibilidade de spares a partir dos campos que fixam as options.
+
+    Ex.: spare_key_for(user_id=7, agente_id='logistico', role='principal',
+    model='claude-...', effort='high', plan_mode=False).
+    """
+    return '|'.join(f"{k}={parts[k]}" for k in sorted(parts))
+
+
+def spare_template_needed(spare_key: str) -> bool:
+    """True se o caller deve (re)registrar o template desta chave.
+
+    Templates expiram junto com os spares (PERSISTENT_CLIENT_IDLE_TIMEOUT):
+    o system prompt carrega contexto datado do usuario.
+    """
+    if not _spares_enabled():
+        return False
+    from ..config.feature_flags import PERSISTENT_CLIENT_IDLE_TIMEOUT
+    with _registry_lock:
+        template = _spare_templates.get(spare_key)
+    return template is None or time.time() - template.created_at > PERSISTENT_CLIENT_IDLE_TIMEOUT
+
+
+def register_spare_template(
+    spare_key: str,
+    options: Any,
+    user_id: int = 0,
+    role: str = "principal",
+    hooks_factory: Optional[Callable[..., Dict[str, Any]]] = None,
+) -> None:
+    """Registra as options de spawn dos spares da chave (thread-safe).
+
+    `options` NAO pode carregar nada do turno corrente: session_id, resume,
+    stderr callback da fila do stream ou hooks com closure da sessao.
+    `hooks_factory(session_holder=...)` monta os hooks de CADA spare, presos ao
+    holder que _claim_spare preenche com o nosso session_id.
+    """
+    if not _spares_enabled():
+        return
+    with _registry_lock:
+        anterior = _spare_templates.get(spare_key)
+        _spare_templates[spare_key] = _SpareTemplate(
+            options=options,
+            user_id=user_id,
+            role=role,
+            hooks_factory=hooks_factory,
+            last_demand=anterior.last_demand if anterior else time.time(),
+        )
+
+
+def _claim_spare(
+    spare_key: str,
+    session_id: str,
+    user_id: int,
+    role: str,
+) -> Optional[PooledClient]:
+    """Consome um spare conectado da chave e o vincula a sessao (hit/miss)."""
+    if not _spares_enabled():
+        return None
+    now = time.time()
+    with _registry_lock:
+        template = _spare_templates.get(spare_key)
+        if template is not None:
+            template.last_demand = now
+        fila = _spares.get(spare_key) or []
+        spare = None
+        while fila:
+            candidato = fila.pop(0)
+            if candidato.connected:
+                spare = candidato
+                break
+        if not fila:
+            _spares.pop(spare_key, None)
+        _spare_stats['hits' if spare else 'misses'] += 1
+
+    if spare is None:
+        return None
+
+    spare.session_id = session_id
+    if spare.session_holder is not None:
+        spare.session_holder['our_session_id'] = session_id
+    spare.user_id = user_id
+    spare.role = role
+    spare.last_used = now
+    logger.info(
+        f"[SDK_POOL] Spare consumido: session={session_id[:8]}... "
+        f"role={role} warm_age={now - spare.created_at:.0f}s"
+    )
+    return spare
+
+
+def _next_spare_to_spawn() -> Optional[tuple]:
+    """(chave, template) do proximo spare a spawnar — chamar sob _registry_lock.
+
+    Prioriza chaves com demanda mais recente; respeita o alvo por chave e o
+    teto global (spares prontos + em spawn).
+    """
+    from ..config.feature_flags import (
+        AGENT_SPARE_CLIENTS_PER_KEY,
+        AGENT_SPARE_CLIENTS_MAX,
+        AGENT_SPARE_DEMAND_TTL,
+    )
+    total = sum(len(v) for v in _spares.values()) + sum(_spares_spawning.values())
+    if total >= AGENT_SPARE_CLIENTS_MAX:
+        return None
+    now = time.time()
+    for key, template in sorted(
+        _spare_templates.items(), key=lambda kv: kv[1].last_demand, reverse=True,
+    ):
+        if now - template.last_demand > AGENT_SPARE_DEMAND_TTL:
+            continue
+        if len(_spares.get(key, ())) + _spares_spawning.get(key, 0) < AGENT_SPARE_CLIENTS_PER_KEY:
+            return key, template
+    return None
+
+
+async def _replenish_spares() -> None:
+    """Spawna spares ate o alvo (um por vez — nao disputa CPU com turnos)."""
+    while not _shutdown_requested:
+        with _registry_lock:
+            plano = _next_spare_to_spawn()
+            if plano is None:
+                return
+            key, template = plano
+            _spares_spawning[key] = _spares_spawning.get(key, 0) + 1
+
+        session_holder: Optional[Dict[str, str]] = None
+        options = template.options
+        try:
+            if template.hooks_factory is not None:
+                session_holder = {}
+                options = _dc_replace(
+                    options, hooks=template.hooks_factory(session_holder=session_holder),
+                )
+            client = await _connect_sdk_client(options, label=f"spare:{key}")
+        except Exception as e:
+            with _registry_lock:
+                _spare_stats['failed'] += 1
+            # Sem retry imediato: proxima tentativa no cleanup periodico
+            logger.warning(f"[SDK_POOL] Spawn de spare falhou ({key[:40]}): {e}")
+            return
+        finally:
+            with _registry_lock:
+                _spares_spawning[key] -= 1
+                if _spares_spawning[key] <= 0:
+                    _spares_spawning.pop(key, None)
+
+        spare = PooledClient(
+            client=client,
+            session_id='',
+            user_id=template.user_id,
+            connected=True,
+            model=getattr(template.options, 'model', None),
+            role=template.role,
+            session_holder=session_holder,
+        )
+        with _registry_lock:
+            valido = not _shutdown_requested and key in _spare_templates
+            if valido:
+                _spares.setdefault(key, []).append(spare)
+                _spare_stats['spawned'] += 1
+        if not valido:
+            await _disconnect_spare(spare)
+            return
+        logger.debug(f"[SDK_POOL] Spare pronto: key={key[:40]} total={_count_spares()}")
+
+
+def _schedule_spare_replenish() -> None:
+    """Agenda _replenish_spares no loop corrente (no-op se ja rodando)."""
+    global _spare_replenish_task
+    if not _spares_enabled():
+        return
+    if _spare_replenish_task is not None and not _spare_replenish_task.done():
+        return
+    try:
+        _spare_replenish_task = asyncio.get_running_loop().create_task(_replenish_spares())
+    except RuntimeError:
+        pass  # fora de event loop — o cleanup periodico repoe
+
+
+def _count_spares() -> int:
+    with _registry_lock:
+        return sum(len(v) for v in _spares.values())
+
+
+async def _disconnect_spare(spare: PooledClient) -> None:
+    """Desconecta spare (sem sessao: sem sticky/JSONL a liberar)."""
+    spare.connected = False
+    try:
+        await spare.client.disconnect()
+    except Exception:
+        # Mesmo caso do disconnect_client: connect() foi de outra task
+        await _force_kill_subprocess(spare.client)
+
+
+async def _retire_spares(max_age: float) -> None:
+    """Aposenta spares velhos/mortos e chaves sem demanda recente."""
+    from ..config.feature_flags import AGENT_SPARE_DEMAND_TTL
+
+    now = time.time()
+    aposentar: List[PooledClient] = []
+    with _registry_lock:
+        for key in list(_spare_templates):
+            if now - _spare_templates[key].last_demand > AGENT_SPARE_DEMAND_TTL:
+                _spare_templates.pop(key)
+        for key in list(_spares):
+            manter = []
+            for spare in _spares[key]:
+                if (
+                    key in _spare_templates
+                    and spare.connected
+                    and now - spare.created_at <= max_age
+                ):
+                    manter.append(spare)
+                else:
+                    aposentar.append(spare)
+            if manter:
+                _spares[key] = manter
+            else:
+                _spares.pop(key)
+        _spare_stats['retired'] += len(aposentar)
+
+    for spare in aposentar:
+        await _disconnect_spare(spare)
+    if aposentar:
+        logger.info(f"[SDK_POOL] Spares aposentados: {len(aposentar)}")
+
+
+def get_spare_status() -> Dict[str, Any]:
+    """Contadores dos spares (hit/miss, prontos por chave, teto)."""
+    from ..config.feature_flags import AGENT_SPARE_CLIENTS_PER_KEY, AGENT_SPARE_CLIENTS_MAX
+
+    with _registry_lock:
+        stats = dict(_spare_stats)
+        por_chave = {key: len(v) for key, v in _spares.items()}
+        spawning = sum(_spares_spawning.values())
+        chaves = len(_spare_templates)
+    consultas = stats['hits'] + stats['misses']
+    return {
+        'enabled': _spares_enabled(),
+        'per_key': AGENT_SPARE_CLIENTS_PER_KEY,
+        'max': AGENT_SPARE_CLIENTS_MAX,
+        'available': sum(por_chave.values()),
+        'spawning': spawning,
+        'keys': chaves,
+        'by_key': {key[:60]: n for key, n in por_chave.items()},
+        'hit_rate': round(stats['hits'] / consultas, 3) if consultas else None,
+        **stats,
+    }
+
+
 # =============================================================================
 # Cleanup periódico
 # =============================================================================
 
 async def _periodic_cleanup():
-    """Task periódica que desconecta clients idle.
+    """Task periódica que desconecta clients idle e recicla os spares.
 
     Roda no daemon thread. Executa a cada PERSISTENT_CLIENT_CLEANUP_INTERVAL.
     """
@@ -632,6 +965,8 @@ async def _periodic_cleanup():
         try:
             await asyncio.sleep(PERSISTENT_CLIENT_CLEANUP_INTERVAL)
             await _cleanup_idle_clients(PERSISTENT_CLIENT_IDLE_TIMEOUT)
+            await _retire_spares(PERSISTENT_CLIENT_IDLE_TIMEOUT)
+            _schedule_spare_replenish()
         except asyncio.CancelledError:
             break
         except Exception as e:
@@ -748,6 +1083,7 @@ def get_pool_status() -> Dict[str, Any]:
         'event_loop_running': loop_running,
         'total_clients': len(clients_info),
         'clients': clients_info,
+        'spares': get_spare_status(),
     }
 
 
@@ -793,6 +1129,19 @@ def shutdown_pool():
                 f"session={session_id[:8]}... role={role} error={e}"
             )
 
+    # Spares ociosos: mesmos subprocessos, sem sessao/sticky
+    with _registry_lock:
+        spares = [s for fila in _spares.values() for s in fila]
+        _spares.clear()
+        _spare_templates.clear()
+    for spare in spares:
+        try:
+            asyncio.run_coroutine_threadsafe(
+                _disconnect_spare(spare), _sdk_loop,
+            ).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"[SDK_POOL] Shutdown spare disconnect failed: {e}")
+
     # Parar event loop
     if _sdk_loop and _sdk_loop.is_running():
         _sdk_loop.call_soon_threadsafe(_sdk_loop.stop)
@@ -0,0 +1,234 @@
+"""
+Montagem concorrente dos blocos de contexto do UserPromptSubmit.
+
+_load_user_memories_for_context montava session window, directives, routing,
+briefing, user_rules, busca semantica e KG em SERIE — cada um com seus
+round trips de banco/embedding. O tempo ate o primeiro token era a SOMA.
+
+Aqui cada bloco e um produtor independente executado num pool compartilhado:
+- prazo por bloco (contado do inicio da montagem): bloco atrasado entra como
+  `default` (degradacao — o turno segue sem ele) e o produtor termina em
+  background sem bloquear o hook;
+- cada thread roda com copia dos ContextVars do chamador (session_id,
+  escopo de loja, debug) e app context proprio (sessao SQLAlchemy propria);
+- histograma de latencia por bloco (ok/erro/atrasado) em memoria, exposto
+  por get_context_latency_snapshot().
+
+A ordem/orcamento final (_fit_hook_budget) continua no chamador: o montador
+so devolve os valores dos blocos.
+
+Flag: AGENT_CONCURRENT_CONTEXT_ASSEMBLY (false = execucao serial inline,
+com o mesmo histograma).
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Buckets (ms) do histograma — ultimo bucket implicito = +inf
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+@dataclass
+class ContextBlock:
+    """Produtor de um bloco do contexto do hook."""
+    name: str
+    producer: Callable[[], Any]
+    deadline_s: float
+    default: Any = None
+
+
+class BlockLatencyHistogram:
+    """Histograma de latencia por bloco (thread-safe, em memoria do processo)."""
+
+    def __init__(self, buckets_ms: Tuple[int, ...] = LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, block: str, elapsed_ms: float, outcome: str) -> None:
+        idx = next((i for i, b in enumerate(self.buckets_ms) if elapsed_ms <= b), len(self.buckets_ms))
+        with self._lock:
+            stats = self._stats.setdefault(block, {
+                'count': 0, 'sum_ms': 0.0, 'max_ms': 0.0,
+                'buckets': [0] * (len(self.buckets_ms) + 1),
+                'ok': 0, 'error': 0, 'late': 0,
+            })
+            stats['count'] += 1
+            stats['sum_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['buckets'][idx] += 1
+            stats[outcome] = stats.get(outcome, 0) + 1
+
+    def mark_late(self, block: str) -> None:
+        """Bloco perdeu o prazo (latencia real e registrada quando terminar)."""
+        with self._lock:
+            stats = self._stats.get(block)
+            if stats is not None:
+                stats['late'] += 1
+            else:
+                self._stats[block] = {
+                    'count': 0, 'sum_ms': 0.0, 'max_ms': 0.0,
+                    'buckets': [0] * (len(self.buckets_ms) + 1),
+                    'ok': 0, 'error': 0, 'late': 1,
+                }
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        labels = [f'<={b}ms' for b in self.buckets_ms] + [f'>{self.buckets_ms[-1]}ms']
+        with self._lock:
+            return {
+                block: {
+                    'count': s['count'],
+                    'avg_ms': round(s['sum_ms'] / s['count'], 1) if s['count'] else 0.0,
+                    'max_ms': round(s['max_ms'], 1),
+                    'ok': s['ok'], 'error': s['error'], 'late': s['late'],
+                    'buckets': dict(zip(labels, s['buckets'])),
+                }
+                for block, s in self._stats.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+_HISTOGRAM = BlockLatencyHistogram()
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                from ..config.feature_flags import AGENT_CONTEXT_ASSEMBLY_WORKERS
+                _EXECUTOR = ThreadPoolExecutor(
+                    max_workers=AGENT_CONTEXT_ASSEMBLY_WORKERS,
+                    thread_name_prefix='ctx-assembly',
+                )
+    return _EXECUTOR
+
+
+def _reset_after_fork():
+    # Threads do pool nao sobrevivem ao fork (gunicorn/RQ) — recria no filho
+    global _EXECUTOR, _EXECUTOR_LOCK
+    _EXECUTOR = None
+    _EXECUTOR_LOCK = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_context_latency_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Histograma de latencia por bloco desde o boot do processo."""
+    return _HISTOGRAM.snapshot()
+
+
+def reset_context_latency_histogram() -> None:
+    _HISTOGRAM.reset()
+
+
+def _run_block(block: ContextBlock, app) -> Any:
+    """Executa o produtor medindo latencia (app context proprio se houver app)."""
+    t0 = time.perf_counter()
+    outcome = 'ok'
+    try:
+        if app is not None:
+            with app.app_context():
+                return block.producer()
+        return block.producer()
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        _HISTOGRAM.record(block.name, (time.perf_counter() - t0) * 1000, outcome)
+
+
+class PendingContextBlocks:
+    """Blocos disparados — collect() aguarda cada um ate o seu prazo."""
+
+    def __init__(self, futures, start: float, results=None, degraded=None):
+        self._futures = futures
+        self._start = start
+        self._results: Dict[str, Any] = results or {}
+        self._degraded: List[str] = degraded or []
+
+    def collect(self) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Returns:
+            (valores por nome, nomes degradados — atrasados ou com erro)
+        """
+        for block, future in sorted(self._futures, key=lambda bf: bf[0].deadline_s):
+            remaining = block.deadline_s - (time.monotonic() - self._start)
+            try:
+                self._results[block.name] = future.result(timeout=max(0.0, remaining))
+            except FutureTimeoutError:
+                future.cancel()
+                _HISTOGRAM.mark_late(block.name)
+                self._results[block.name] = block.default
+                self._degraded.append(block.name)
+                logger.warning(
+                    f"[CTX_ASSEMBLY] bloco {block.name} atrasado "
+                    f"(prazo {block.deadline_s:.1f}s) — turno segue sem ele"
+                )
+            except Exception as e:
+                self._results[block.name] = block.default
+                self._degraded.append(block.name)
+                logger.debug(f"[CTX_ASSEMBLY] bloco {block.name} falhou (ignorado): {e}")
+        self._futures = []
+
+        logger.debug(
+            f"[CTX_ASSEMBLY] {len(self._results)} blocos em "
+            f"{(time.monotonic() - self._start) * 1000:.0f}ms degradados={self._degraded or '[]'}"
+        )
+        return self._results, self._degraded
+
+
+def start_context_blocks(blocks: List[ContextBlock], app=None) -> PendingContextBlocks:
+    """
+    Dispara os produtores concorrentemente (prazos contados a partir daqui).
+
+    Args:
+        blocks: produtores (nome unico por bloco)
+        app: Flask app para abrir app context nas threads (None = sem contexto)
+    """
+    from ..config.feature_flags import AGENT_CONCURRENT_CONTEXT_ASSEMBLY
+
+    start = time.monotonic()
+    if not AGENT_CONCURRENT_CONTEXT_ASSEMBLY:
+        results: Dict[str, Any] = {}
+        degraded: List[str] = []
+        for block in blocks:
+            try:
+                # Serial: ja estamos no app context do chamador
+                results[block.name] = _run_block(block, None)
+            except Exception as e:
+                logger.debug(f"[CTX_ASSEMBLY] bloco {block.name} falhou (ignorado): {e}")
+                results[block.name] = block.default
+                degraded.append(block.name)
+        return PendingContextBlocks([], start, results, degraded)
+
+    executor = _get_executor()
+    futures = []
+    for block in blocks:
+        # Copia dos ContextVars POR bloco: Context.run nao e reentrante
+        ctx = contextvars.copy_context()
+        futures.append((block, executor.submit(ctx.run, _run_block, block, app)))
+    return PendingContextBlocks(futures, start)
+
+
+def assemble_context_blocks(
+    blocks: List[ContextBlock], app=None,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Atalho: start_context_blocks(...).collect()."""
+    return start_context_blocks(blocks, app=app).collect()
@@ -225,6 +225,7 @@ def build_hooks(
     resume_state: dict = None,
     our_session_id: str = None,
     agente_id: str = 'web',
+    session_holder: dict = None,
 ) -> dict:
     """Factory que cria hooks para ClaudeAgentOptions.
 
@@ -248,6 +249,11 @@ def build_hooks(
             (_load_user_memories_for_context), PreToolUse Skill (skill reminders)
             e PreToolUse enforce (_load_enforce_directives). Default 'web' =
             byte-identico (web/Teams/WhatsApp).
+        session_holder: Dict mutavel dos spares do client_pool (spawnados SEM
+            sessao). O pool grava 'our_session_id' ao consumir o spare; os
+            hooks passam a usar esse UUID nos canais agent_sse:* e nas linhas
+            de agent_sessions — o hook_input traz o UUID gerado pelo CLI, que
+            so serve para achar os JSONLs em disco.
 
     Returns:
         Dict formatado para options_dict["hooks"]
@@ -266,9 +272,21 @@ def build_hooks(
     from ._sanitization import xml_escape
     from .turn_context_registry import resolve_turn_user
 
+    def _sessao_vinculada():
+        """Nosso session_id: o gravado no holder (spare) ou o da closure."""
+        if session_holder and session_holder.get('our_session_id'):
+            return session_holder['our_session_id']
+        return our_session_id
+
+    def _sessao_publicacao(hook_input) -> str:
+        """Sessao dos canais SSE/linhas do banco: a do holder (spare) ou a do CLI."""
+        if session_holder and session_holder.get('our_session_id'):
+            return session_holder['our_session_id']
+        return hook_input.get('session_id', '')
+
     def _turn_user():
         """Falante do turno ATUAL (registry) com fallback para a closure."""
-        return resolve_turn_user(our_session_id, user_id, user_name)
+        return resolve_turn_user(_sessao_vinculada(), user_id, user_name)
 
     async def _keep_stream_open(hook_input: PreToolUseHookInput, signal, context: HookContext):
         """Hook OBRIGATÓRIO: mantém stream aberto para can_use_tool funcionar.
@@ -739,7 +757,10 @@ def build_hooks(
                             from app import create_app as _create_app
                             _ctx = _create_app().app_context()
                         with _ctx:
-                            archive_session_to_s3(session_id_stop)
+                            archive_session_to_s3(
+                                session_id_stop,
+                                our_session_id=_sessao_publicacao(hook_input),
+                            )
             except Exception as arch_err:
                 logger.warning(
                     f"[HOOK:Stop] archive S3 falhou: "
@@ -775,7 +796,7 @@ def build_hooks(
         try:
             agent_id = hook_input.get('agent_id', '')
             agent_type = hook_input.get('agent_type', '')
-            session_id_local = hook_input.get('session_id', '')
+            session_id_local = _sessao_publicacao(hook_input)
 
             # SDK 0.1.52+: Registrar mapa agent_id → agent_type
             # para politicas de seguranca em can_use_tool()
@@ -871,7 +892,10 @@ def build_hooks(
             agent_id = hook_input.get('agent_id', '')
             agent_type = hook_input.get('agent_type', '')
             transcript_path = hook_input.get('agent_transcript_path', '')
-            session_id = hook_input.get('session_id', '')
+            # session_id: canais SSE e agent_sessions; sdk_session_id: JSONLs em
+            # disco (diretorio do CLI). Iguais fora dos spares do client_pool.
+            session_id = _sessao_publicacao(hook_input)
+            sdk_session_id = hook_input.get('session_id', '') or session_id
 
             # SDK 0.1.52+: Limpar mapa agent_id → agent_type
             if agent_id:
@@ -950,7 +974,7 @@ def build_hooks(
                         message_id=f"subagent_{agent_id[:12] if agent_id else 'unknown'}",
                         input_tokens=0,  # Detalhes no log, aqui o total
                         output_tokens=0,
-                        session_id=hook_input.get('session_id', ''),
+                        session_id=session_id,
                         user_id=user_id or 0,
                         tool_name=f"subagent:{agent_type}",
                     )
@@ -1191,8 +1215,8 @@ def build_hooks(
             # especialista quente. Best-effort: nunca quebra o hook.
             try:
                 from .subagent_reader import get_subagent_findings
-                if session_id and agent_type:
-                    _rb = get_subagent_findings(session_id, agent_type)
+                if sdk_session_id and agent_type:
+                    _rb = get_subagent_findings(sdk_session_id, agent_type)
                     if _rb:
                         _rb_preview = _rb[:300].replace('\n', ' ')
                         logger.info(
@@ -1214,7 +1238,7 @@ def build_hooks(
                     from .subagent_reader import get_subagent_summary
                     from .client import _emit_subagent_summary
                     summary = get_subagent_summary(
-                        session_id=session_id,
+                        session_id=sdk_session_id,
                         agent_id=agent_id,
                         agent_type=agent_type,
                         include_pii=True,  # sanitizacao na camada 2 (routes/chat.py)
@@ -1255,7 +1279,7 @@ def build_hooks(
                     try:
                         from .subagent_reader import get_subagent_summary as _gss
                         _val_summary = _gss(
-                            session_id=session_id,
+                            session_id=sdk_session_id,
                             agent_id=agent_id,
                             agent_type=agent_type,
                             include_pii=True,
@@ -75,6 +75,12 @@ FEWSHOT_MIN_SIMILARITY = float(
 )
 FEWSHOT_CONTENT_CAP = 1_200         # exemplo entra (quase) completo, com teto
 
+# Tier 2b (KG) roda em paralelo com a semantica (context_assembler): sem os
+# IDs da semantica para excluir na query, busca hop 1 maior e corta depois.
+# KG_MAX_RESULTS = 5 hop 1 + ate 5 hop 2 (mesmo teto da chamada serial).
+KG_OVERFETCH_LIMIT = 15
+KG_MAX_RESULTS = 10
+
 
 # ======================================================================
 # Fase 5 (2026-04-21): Cache de injecao de memoria por sessao
@@ -1225,15 +1231,112 @@ def _load_user_memories_for_context(
             from flask import current_app
             _ = current_app.name
             ctx = None
+            flask_app = current_app._get_current_object()
         except RuntimeError:
             from app import create_app
-            app = create_app()
-            ctx = app.app_context()
+            flask_app = create_app()
+            ctx = flask_app.app_context()
+
+        # Blocos degradados (atrasados/erro) na montagem concorrente — resultado
+        # parcial NAO vai para o cache de sessao (proximo turno tenta de novo)
+        assembly_degraded: list = []
+
+        def _start_context_blocks():
+            """Dispara os produtores independentes do contexto em paralelo.
+
+            Cada bloco fazia seus round trips (DB/embedding/Voyage) em serie;
+            agora o turno espera o MAIS LENTO (com prazo), nao a soma. A
+            selecao/ordem/orcamento abaixo (_fit_hook_budget) nao muda.
+            """
+            from ..config.feature_flags import (
+                AGENT_CONTEXT_BLOCK_DEADLINE_S,
+                AGENT_CONTEXT_RETRIEVAL_DEADLINE_S,
+            )
+            from .context_assembler import ContextBlock, start_context_blocks
+
+            def _produce_user_rules():
+                from ..config.feature_flags import USE_USER_RULES_CHANNEL
+                if not USE_USER_RULES_CHANNEL:
+                    return None, set()
+                from .memory_injection_rules import _build_user_rules, _get_user_rule_ids
+                rules_block = _build_user_rules(user_id, agente_id)
+                if not rules_block:
+                    return None, set()
+                return rules_block, _get_user_rule_ids(user_id, agente_id)
+
+            def _produce_briefing():
+                from ..config.feature_flags import USE_INTERSESSION_BRIEFING
+                if not USE_INTERSESSION_BRIEFING:
+                    return None
+                from ..services.intersession_briefing import build_intersession_briefing
+                return build_intersession_briefing(user_id, agente_id)
+
+            def _produce_directives():
+                # F6 intent-only: organicas chegam via Tier 2 RAG; bloco fixo
+                # fica so com a(s) constitucional(is).
+                from ..config.feature_flags import AGENT_DIRECTIVES_INTENT_ONLY
+                return _build_operational_directives_parts(
+                    user_id, agente_id=agente_id,
+                    include_organicas=not AGENT_DIRECTIVES_INTENT_ONLY,
+                )
+
+            def _produce_semantic():
+                from app.embeddings.config import MEMORY_SEMANTIC_SEARCH
+                from ..config.feature_flags import MEMORY_INJECTION_MIN_SIMILARITY
+                if not (MEMORY_SEMANTIC_SEARCH and prompt and user_id):
+                    return None
+                from app.embeddings.memory_search import buscar_memorias_semantica
+                # Over-fetch: buscar 20 candidatos para re-ranking por composite score
+                return buscar_memorias_semantica(
+                    prompt, user_id,
+                    limite=20,
+                    min_similarity=MEMORY_INJECTION_MIN_SIMILARITY,
+                    agente_id=agente_id,  # M3/E01: 2a camada (materializacao ja filtra)
+                )
+
+            def _produce_graph():
+                from app.embeddings.config import MEMORY_KNOWLEDGE_GRAPH
+                if not (MEMORY_KNOWLEDGE_GRAPH and prompt and user_id):
+                    return None
+                from app.agente.services.knowledge_graph_service import query_graph_memories
+                # Roda em paralelo com a semantica: os IDs a excluir ainda nao
+                # existem — over-fetch e exclusao/corte no consumo (Tier 2b)
+                return query_graph_memories(
+                    user_id=user_id,
+                    prompt=prompt,
+                    limit=KG_OVERFETCH_LIMIT,
+                )
+
+            blocks = [
+                ContextBlock('user_rules', _produce_user_rules,
+                             AGENT_CONTEXT_BLOCK_DEADLINE_S, default=(None, set())),
+                ContextBlock('session_window', lambda: _build_session_window(user_id, agente_id),
+                             AGENT_CONTEXT_BLOCK_DEADLINE_S, default=(None, None)),
+                ContextBlock('briefing', _produce_briefing, AGENT_CONTEXT_BLOCK_DEADLINE_S),
+                ContextBlock('directives', _produce_directives,
+                             AGENT_CONTEXT_BLOCK_DEADLINE_S, default=([], [])),
+                ContextBlock('routing', lambda: _build_routing_context(user_id, agente_id),
+                             AGENT_CONTEXT_BLOCK_DEADLINE_S),
+                ContextBlock('semantic', _produce_semantic, AGENT_CONTEXT_RETRIEVAL_DEADLINE_S),
+                ContextBlock('graph', _produce_graph, AGENT_CONTEXT_RETRIEVAL_DEADLINE_S),
+            ]
+            if _cached_session_id:
+                # Aquece o cache de lembretes de skill do PreToolUse (mesma sessao)
+                blocks.append(ContextBlock(
+                    'skill_reminders',
+                    lambda: get_skill_reminders_for_session(user_id, _cached_session_id, agente_id),
+                    AGENT_CONTEXT_BLOCK_DEADLINE_S, default={},
+                ))
+            return start_context_blocks(blocks, app=flask_app)
 
         def _load():
             from ..models import AgentMemory
             from ..config.feature_flags import MEMORY_INJECTION_MIN_SIMILARITY
 
+            pending_blocks = _start_context_blocks()
+            assembled, degraded = pending_blocks.collect()
+            assembly_degraded.extend(degraded)
+
             # ── L1: User Rules (SEMPRE, priority=mandatory) — NOVO CANAL ──
             # Fase 3.4A: regras duras vao para o TOPO ABSOLUTO do contexto (antes de
             # <user_memories>). A Fase 0 (AgingBench) mostrou que a regra no topo rende
@@ -1246,47 +1349,32 @@ def _load_user_memories_for_context(
             # memoria (dupla injecao user_rules + user_memories no mesmo payload).
             l1_rule_ids: set = set()
             try:
-                from ..config.feature_flags import USE_USER_RULES_CHANNEL, USE_USER_RULES_TOP
-                if USE_USER_RULES_CHANNEL:
-                    from .memory_injection_rules import _build_user_rules, _get_user_rule_ids
-                    rules_block = _build_user_rules(user_id, agente_id)
-                    if rules_block:
-                        l1_rule_ids = _get_user_rule_ids(user_id, agente_id)
-                        if USE_USER_RULES_TOP:
-                            rules_block_top = rules_block  # TOPO (maior atencao) na montagem final
-                        else:
-                            rules_block_tail_legacy = rules_block  # legado: cauda do main
-                        logger.info(
-                            f"[MEMORY_INJECT] L1 user_rules injected "
-                            f"({'top' if USE_USER_RULES_TOP else 'tail'}): {len(rules_block)} chars"
-                        )
+                from ..config.feature_flags import USE_USER_RULES_TOP
+                rules_block, rule_ids = assembled['user_rules']
+                if rules_block:
+                    l1_rule_ids = set(rule_ids)
+                    if USE_USER_RULES_TOP:
+                        rules_block_top = rules_block  # TOPO (maior atencao) na montagem final
+                    else:
+                        rules_block_tail_legacy = rules_block  # legado: cauda do main
+                    logger.info(
+                        f"[MEMORY_INJECT] L1 user_rules injected "
+                        f"({'top' if USE_USER_RULES_TOP else 'tail'}): {len(rules_block)} chars"
+                    )
             except Exception as l1_err:
                 logger.debug(f"[MEMORY_INJECT] L1 rules falhou (ignorado): {l1_err}")
 
             # ── Itens 12-13 (TAIL): rolling window + pendencias (F4.4a) ──
-            session_window, pendencias_block = _build_session_window(user_id, agente_id)
+            session_window, pendencias_block = assembled['session_window']
 
             # ── Item 8: Briefing inter-sessão (Memory v2 — 3A) ──
-            briefing = None
-            try:
-                from ..config.feature_flags import USE_INTERSESSION_BRIEFING
-                if USE_INTERSESSION_BRIEFING:
-                    from ..services.intersession_briefing import build_intersession_briefing
-                    briefing = build_intersession_briefing(user_id, agente_id)
-            except Exception as brief_err:
-                logger.debug(f"[MEMORY_INJECT] Briefing inter-sessão falhou (ignorado): {brief_err}")
+            briefing = assembled['briefing']
 
             # ── Item 7: Operational directives (const + organicas — F4.3) ──
-            # F6 intent-only: organicas chegam via Tier 2 RAG; bloco fixo
-            # fica so com a(s) constitucional(is).
             directives_full = None
             directives_const = None
             try:
-                from ..config.feature_flags import AGENT_DIRECTIVES_INTENT_ONLY
-                const_items, org_items = _build_operational_directives_parts(
-                    user_id, agente_id=agente_id,
-                    include_organicas=not AGENT_DIRECTIVES_INTENT_ONLY,
-                )
+                const_items, org_items = assembled['directives']
                 directives_full = _render_operational_directives(const_items + org_items)
                 directives_const = _render_operational_directives(const_items)
                 if directives_full:
@@ -1299,11 +1387,7 @@ def _load_user_memories_for_context(
                 logger.debug(f"[MEMORY_INJECT] Directives falhou (ignorado): {dir_err}")
 
             # ── Item 9: Routing context (domínio + armadilhas) ──
-            routing_ctx = None
-            try:
-                routing_ctx = _build_routing_context(user_id, agente_id)
-            except Exception as route_err:
-                logger.debug(f"[MEMORY_INJECT] Routing context falhou (ignorado): {route_err}")
+            routing_ctx = assembled['routing']
 
             # ── Tier 1: SEMPRE injetar memórias protegidas ──
             # user_expertise.xml (2026-05-11): consolida expertise do usuario
@@ -1398,87 +1482,77 @@ def _load_user_memories_for_context(
             used_fallback = False
 
             try:
-                from app.embeddings.config import MEMORY_SEMANTIC_SEARCH
+                # Busca (embedding) ja disparada em paralelo — _produce_semantic
+                resultados = assembled['semantic']
+                if resultados:
+                    # Filtrar memórias protegidas (já no Tier 1)
+                    filtered = [
+                        r for r in resultados
+                        if r['memory_id'] not in protected_ids
+                    ]
+                    semantic_count = len(filtered)
+
+                    if filtered:
+                        avg_similarity = sum(
+                            r.get('similarity', 0) for r in filtered
+                        ) / len(filtered)
+
+                        memory_ids = [r['memory_id'] for r in filtered]
+                        from sqlalchemy import or_ as sql_or
+                        mem_objects = AgentMemory.query.filter(
+                            AgentMemory.id.in_(memory_ids),
+                            AgentMemory.agente == agente_id,  # M3: defesa — IDs cross-agente nao materializam
+                            AgentMemory.is_directory == False,  # noqa: E712
+                            AgentMemory.is_cold == False,  # noqa: E712 — v2: excluir cold
+                            # Nao injetar diretiva nao-promovida (shadow/candidata/
+                            # despromovida) — so NULL/ativa (mesmo criterio do
+                            # _build_operational_directives, linha 504-505). Filtro
+                            # na FONTE preserva o slot do top-10 para memoria legitima.
+                            sql_or(
+                                AgentMemory.directive_status.is_(None),
+                                AgentMemory.directive_status == 'ativa',
+                            ),
+                        ).all()
 
-                if MEMORY_SEMANTIC_SEARCH and prompt and user_id:
-                    from app.embeddings.memory_search import buscar_memorias_semantica
-                    # Over-fetch: buscar 20 candidatos para re-ranking por composite score
-                    resultados = buscar_memorias_semantica(
-                        prompt, user_id,
-                        limite=20,
-                        min_similarity=MEMORY_INJECTION_MIN_SIMILARITY,
-                        agente_id=agente_id,  # M3/E01: 2a camada (materializacao ja filtra)
-                    )
+                        # Duas escalas: sim_map (rerank, ordenacao) e
+                        # cosine_map (gates calibrados em cosine) — ver
+                        # docstring de _build_similarity_maps.
+                        sim_map, cosine_map = _build_similarity_maps(filtered)
+
+                        # v2: Composite score com category-aware decay
+                        now = agora_utc_naive()
+                        scored = []
+                        for mem in mem_objects:
+                            similarity = sim_map.get(mem.id, 0)
+                            importance = mem.importance_score if mem.importance_score is not None else 0.5
+
+                            # v2: Decay por categoria
+                            last_access = mem.last_accessed_at or mem.updated_at or mem.created_at
+                            if last_access:
+                                hours_since = max(0, (now - last_access).total_seconds() / 3600)
+                                category = getattr(mem, 'category', 'operational') or 'operational'
+                                decay = _calculate_category_decay(category, hours_since)
+                            else:
+                                decay = 0.5
 
-                    if resultados:
-                        # Filtrar memórias protegidas (já no Tier 1)
-                        filtered = [
-                            r for r in resultados
-                            if r['memory_id'] not in protected_ids
-                        ]
-                        semantic_count = len(filtered)
-
-                        if filtered:
-                            avg_similarity = sum(
-                                r.get('similarity', 0) for r in filtered
-                            ) / len(filtered)
-
-                            memory_ids = [r['memory_id'] for r in filtered]
-                            from sqlalchemy import or_ as sql_or
-                            mem_objects = AgentMemory.query.filter(
-                                AgentMemory.id.in_(memory_ids),
-                                AgentMemory.agente == agente_id,  # M3: defesa — IDs cross-agente nao materializam
-                                AgentMemory.is_directory == False,  # noqa: E712
-                                AgentMemory.is_cold == False,  # noqa: E712 — v2: excluir cold
-                                # Nao injetar diretiva nao-promovida (shadow/candidata/
-                                # despromovida) — so NULL/ativa (mesmo criterio do
-                                # _build_operational_directives, linha 504-505). Filtro
-                                # na FONTE preserva o slot do top-10 para memoria legitima.
-                                sql_or(
-                                    AgentMemory.directive_status.is_(None),
-                                    AgentMemory.directive_status == 'ativa',
-                                ),
-                            ).all()
-
-                            # Duas escalas: sim_map (rerank, ordenacao) e
-                            # cosine_map (gates calibrados em cosine) — ver
-                            # docstring de _build_similarity_maps.
-                            sim_map, cosine_map = _build_similarity_maps(filtered)
-
-                            # v2: Composite score com category-aware decay
-                            now = agora_utc_naive()
-                            scored = []
-                            for mem in mem_objects:
-                                similarity = sim_map.get(mem.id, 0)
-                                importance = mem.importance_score if mem.importance_score is not None else 0.5
-
-                                # v2: Decay por categoria
-                                last_access = mem.last_accessed_at or mem.updated_at or mem.created_at
-                                if last_access:
-                                    hours_since = max(0, (now - last_access).total_seconds() / 3600)
-                                    category = getattr(mem, 'category', 'operational') or 'operational'
-                                    decay = _calculate_category_decay(category, hours_since)
-                                else:
-                                    decay = 0.5
-
-                                composite = _composite_score(decay, importance, similarity, mem.correction_count)
-                                scored.append((mem, composite, similarity))
-
-                            # Ordenar por composite score (desc), pegar top 10
-                            scored.sort(key=lambda x: x[1], reverse=True)
-                            scored = scored[:10]
-
-                            # Preservar composite scores originais (com similarity) para PASS 2
-                            _pass1_scores = {s[0].id: s[1] for s in scored}
-                            # F5.5: similarity COSINE crua para o gate de few-shot
-                            # (NUNCA rerank_score — escala diferente, ver
-                            # _build_similarity_maps)
-                            _pass1_similarity = {
-                                s[0].id: cosine_map.get(s[0].id, 0.0) for s in scored
-                            }
-                            additional_memories = [s[0] for s in scored]
-                            if scored:
-                                avg_composite = sum(s[1] for s in scored) / len(scored)
+                            composite = _composite_score(decay, importance, similarity, mem.correction_count)
+                            scored.append((mem, composite, similarity))
+
+                        # Ordenar por composite score (desc), pegar top 10
+                        scored.sort(key=lambda x: x[1], reverse=True)
+                        scored = scored[:10]
+
+                        # Preservar composite scores originais (com similarity) para PASS 2
+                        _pass1_scores = {s[0].id: s[1] for s in scored}
+                        # F5.5: similarity COSINE crua para o gate de few-shot
+                        # (NUNCA rerank_score — escala diferente, ver
+                        # _build_similarity_maps)
+                        _pass1_similarity = {
+                            s[0].id: cosine_map.get(s[0].id, 0.0) for s in scored
+                        }
+                        additional_memories = [s[0] for s in scored]
+                        if scored:
+                            avg_composite = sum(s[1] for s in scored) / len(scored)
 
             except Exception as sem_err:
                 logger.warning(
@@ -1488,19 +1562,14 @@ def _load_user_memories_for_context(
             # ── Tier 2b: Knowledge Graph retrieval (T3-3) ──
             graph_count = 0
             try:
-                from app.embeddings.config import MEMORY_KNOWLEDGE_GRAPH
-                if MEMORY_KNOWLEDGE_GRAPH and prompt and user_id:
-                    from app.agente.services.knowledge_graph_service import query_graph_memories
-
+                # KG ja consultado em paralelo (_produce_graph, over-fetch)
+                graph_results = assembled['graph']
+                if graph_results:
                     # IDs já encontrados pela semântica
                     semantic_ids = {m.id for m in additional_memories} | protected_ids
-
-                    graph_results = query_graph_memories(
-                        user_id=user_id,
-                        prompt=prompt,
-                        exclude_memory_ids=semantic_ids,
-                        limit=5,  # Complementar, não substituir
-                    )
+                    graph_results = [
+                        r for r in graph_results if r['memory_id'] not in semantic_ids
+                    ][:KG_MAX_RESULTS]  # Complementar, não substituir
 
                     if graph_results:
                         graph_memory_ids = [r['memory_id'] for r in graph_results]
@@ -1920,7 +1989,12 @@ def _load_user_memories_for_context(
         # Persistir resultado para proximas consultas da mesma sessao.
         # Invalidado automaticamente em save/update/delete_memory (user marcado).
         try:
-            if _cached_session_id and result is not None:
+            if assembly_degraded:
+                logger.info(
+                    f"[memory_injection] blocos degradados {assembly_degraded} — "
+                    f"resultado parcial fora do cache"
+                )
+            elif _cached_session_id and result is not None:
                 main_c, tail_c, mem_ids = result
                 _cache_put(_cached_session_id, user_id, main_c, tail_c, mem_ids or [])
                 logger.info(
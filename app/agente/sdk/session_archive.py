@@ -130,12 +130,17 @@ def _resolve_our_session_uuid(session_id_or_sdk_id: str) -> Optional[str]:
     return None
 
 
-def archive_session_to_s3(session_id: str) -> Optional[str]:
+def archive_session_to_s3(
+    session_id: str,
+    our_session_id: Optional[str] = None,
+) -> Optional[str]:
     """
     Arquiva subagent transcripts + findings da sessao para S3.
 
     Aceita session_id OU sdk_session_id — resolve nosso UUID internamente
-    antes de gravar ponteiro em AgentSession.data['s3_archive'].
+    antes de gravar ponteiro em AgentSession.data['s3_archive']. Quem ja sabe
+    o nosso UUID (spare do client_pool: o sdk_session_id ainda nao foi salvo
+    no fim do 1o turno) passa `our_session_id` e pula a resolucao.
 
     Retorna S3 path (ex: 'agent-archive/2026-04/sess-abc.tar.gz') ou None.
     Idempotente — chamar multiplas vezes gera upload novo (last-write-wins).
@@ -208,7 +213,7 @@ def archive_session_to_s3(session_id: str) -> Optional[str]:
                 from app.utils.timezone import agora_utc_naive
                 import json as _json_ptr
 
-                our_uuid = _resolve_our_session_uuid(session_id)
+                our_uuid = our_session_id or _resolve_our_session_uuid(session_id)
                 if our_uuid:
                     archive_at = agora_utc_naive().isoformat()
                     ptr_updates = {
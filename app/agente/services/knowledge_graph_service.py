@@ -829,6 +829,9 @@ def query_graph_memories(
 
     Hop 2 usa queries separadas com try/except próprio — se falhar, hop 1 é preservado.
 
+    Passos 2-5 rodam no snapshot em memória (knowledge_graph_snapshot) quando
+    MEMORY_KG_SNAPSHOT=true; sem snapshot, caem no caminho SQL original.
+
     Args:
         user_id: ID do usuário
         prompt: Prompt do usuário (texto de busca)
@@ -847,7 +850,6 @@ def query_graph_memories(
 
     try:
         from app import db
-        from sqlalchemy import text
 
         # Extrair entidades do prompt
         prompt_entities = _extract_entities_regex(prompt)
@@ -871,157 +873,186 @@ def query_graph_memories(
         if not entity_names:
             return []
 
-        # Buscar entity_ids para o user (PRD v2.1: incluir user_id=0 para empresa)
+        exclude = exclude_memory_ids or set()
+        # PRD v2.1: incluir user_id=0 para empresa
         user_ids = [user_id, 0] if user_id != 0 else [0]
+
+        # Snapshot em memória (1 query de revisão por turno); None => caminho SQL
+        from app.embeddings.config import MEMORY_KG_SNAPSHOT
+        if MEMORY_KG_SNAPSHOT:
+            from app.agente.services.knowledge_graph_snapshot import consultar_snapshot
+            via_snapshot = consultar_snapshot(user_id, entity_names, exclude, limit)
+            if via_snapshot is not None:
+                return via_snapshot
+
         with db.engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT id, entity_name
-                FROM agent_memory_entities
-                WHERE user_id = ANY(:user_ids)
-                  AND entity_name = ANY(:names)
-            """), {"user_ids": user_ids, "names": entity_names})
+            return _query_graph_memories_sql(conn, user_ids, entity_names, exclude, limit)
+
+    except Exception as e:
+        logger.debug(f"[KG] query_graph_memories falhou: {e}")
+        return []
 
-            entity_rows = result.fetchall()
-            if not entity_rows:
-                return []
 
-            entity_ids = [row[0] for row in entity_rows]
+def _query_graph_memories_sql(
+    conn,
+    user_ids: List[int],
+    entity_names: List[str],
+    exclude: Set[int],
+    limit: int,
+) -> List[Dict]:
+    """
+    Traversal 2-hop direto no banco (até 5 round-trips).
+
+    Caminho original de query_graph_memories — usado quando o snapshot em
+    memória está desligado ou indisponível, e como referência de paridade
+    do knowledge_graph_snapshot.
+    """
+    from sqlalchemy import text
+
+    # Buscar entity_ids para o escopo (usuário + empresa)
+    result = conn.execute(text("""
+        SELECT id, entity_name
+        FROM agent_memory_entities
+        WHERE user_id = ANY(:user_ids)
+          AND entity_name = ANY(:names)
+    """), {"user_ids": user_ids, "names": entity_names})
+
+    entity_rows = result.fetchall()
+    if not entity_rows:
+        return []
+
+    entity_ids = [row[0] for row in entity_rows]
+
+    # ── HOP 1: memory_ids via entity_links (match direto) ──
+    result = conn.execute(text("""
+        SELECT DISTINCT memory_id
+        FROM agent_memory_entity_links
+        WHERE entity_id = ANY(:entity_ids)
+        ORDER BY memory_id DESC
+        LIMIT :limit
+    """), {"entity_ids": entity_ids, "limit": limit * 2})
+
+    hop1_memory_ids = {row[0] for row in result.fetchall()}
+
+    # Construir resultados hop 1
+    graph_results = []
+    for mid in sorted(hop1_memory_ids, reverse=True):
+        if mid not in exclude:
+            graph_results.append({
+                'memory_id': mid,
+                # Design decision (GAP 11): 0.5 = proxy neutro para graph results.
+                # Graph results são link-based (não vetoriais), sem cosine similarity real.
+                # No composite scoring (0.3*decay + 0.3*importance + 0.4*similarity),
+                # 0.5 garante que graph results competem de forma justa com resultados semânticos.
+                'similarity': 0.5,
+                'source': 'graph',
+            })
+            if len(graph_results) >= limit:
+                break
+
+    # ── HOP 2: related entities via relations ──
+    # try/except independente — falha não afeta hop 1
+    hop2_count = 0
+    try:
+        # Query 1: Buscar related_entity_ids (bidirecional, excluindo entity_ids originais)
+        # ORDER BY max_weight DESC para priorizar relações mais fortes
+        result = conn.execute(text("""
+            SELECT entity_id, MAX(weight) as max_weight
+            FROM (
+                SELECT target_entity_id AS entity_id, weight
+                FROM agent_memory_entity_relations
+                WHERE source_entity_id = ANY(:entity_ids)
+                UNION ALL
+                SELECT source_entity_id AS entity_id, weight
+                FROM agent_memory_entity_relations
+                WHERE target_entity_id = ANY(:entity_ids)
+            ) sub
+            WHERE NOT (entity_id = ANY(:entity_ids))
+            GROUP BY entity_id
+            ORDER BY max_weight DESC
+            LIMIT :max_entities
+        """), {
+            "entity_ids": entity_ids,
+            "max_entities": _HOP2_MAX_RELATED_ENTITIES,
+        })
+
+        related_rows = result.fetchall()
+
+        if related_rows:
+            # Mapa: related_entity_id → max_weight
+            related_entity_weights: Dict[int, float] = {
+                row[0]: row[1] for row in related_rows
+            }
+            related_entity_ids = list(related_entity_weights.keys())
 
-            # ── HOP 1: memory_ids via entity_links (match direto) ──
+            # Query 2: Buscar memory_ids candidatos linkados aos related_entity_ids
+            # Busca 3x o limite para ter margem após filtrar excluídos
             result = conn.execute(text("""
                 SELECT DISTINCT memory_id
                 FROM agent_memory_entity_links
-                WHERE entity_id = ANY(:entity_ids)
+                WHERE entity_id = ANY(:related_entity_ids)
                 ORDER BY memory_id DESC
-                LIMIT :limit
-            """), {"entity_ids": entity_ids, "limit": limit * 2})
+                LIMIT :max_memories
+            """), {
+                "related_entity_ids": related_entity_ids,
+                "max_memories": _HOP2_MAX_MEMORIES * 3,
+            })
 
-            hop1_memory_ids = {row[0] for row in result.fetchall()}
+            hop2_candidate_mids = [row[0] for row in result.fetchall()]
 
-            # Construir resultados hop 1
-            exclude = exclude_memory_ids or set()
-            graph_results = []
-            for mid in sorted(hop1_memory_ids, reverse=True):
-                if mid not in exclude:
-                    graph_results.append({
-                        'memory_id': mid,
-                        # Design decision (GAP 11): 0.5 = proxy neutro para graph results.
-                        # Graph results são link-based (não vetoriais), sem cosine similarity real.
-                        # No composite scoring (0.3*decay + 0.3*importance + 0.4*similarity),
-                        # 0.5 garante que graph results competem de forma justa com resultados semânticos.
-                        'similarity': 0.5,
-                        'source': 'graph',
-                    })
-                    if len(graph_results) >= limit:
-                        break
-
-            # ── HOP 2: related entities via relations ──
-            # try/except independente — falha não afeta hop 1
-            hop2_count = 0
-            try:
-                # Query 1: Buscar related_entity_ids (bidirecional, excluindo entity_ids originais)
-                # ORDER BY max_weight DESC para priorizar relações mais fortes
+            if hop2_candidate_mids:
+                # Query 3: Mapear entity_id → memory_id para calcular weight por memória
                 result = conn.execute(text("""
-                    SELECT entity_id, MAX(weight) as max_weight
-                    FROM (
-                        SELECT target_entity_id AS entity_id, weight
-                        FROM agent_memory_entity_relations
-                        WHERE source_entity_id = ANY(:entity_ids)
-                        UNION ALL
-                        SELECT source_entity_id AS entity_id, weight
-                        FROM agent_memory_entity_relations
-                        WHERE target_entity_id = ANY(:entity_ids)
-                    ) sub
-                    WHERE NOT (entity_id = ANY(:entity_ids))
-                    GROUP BY entity_id
-                    ORDER BY max_weight DESC
-                    LIMIT :max_entities
+                    SELECT entity_id, memory_id
+                    FROM agent_memory_entity_links
+                    WHERE entity_id = ANY(:related_entity_ids)
+                      AND memory_id = ANY(:memory_ids)
                 """), {
-                    "entity_ids": entity_ids,
-                    "max_entities": _HOP2_MAX_RELATED_ENTITIES,
+                    "related_entity_ids": related_entity_ids,
+                    "memory_ids": hop2_candidate_mids,
                 })
 
-                related_rows = result.fetchall()
-
-                if related_rows:
-                    # Mapa: related_entity_id → max_weight
-                    related_entity_weights: Dict[int, float] = {
-                        row[0]: row[1] for row in related_rows
-                    }
-                    related_entity_ids = list(related_entity_weights.keys())
-
-                    # Query 2: Buscar memory_ids candidatos linkados aos related_entity_ids
-                    # Busca 3x o limite para ter margem após filtrar excluídos
-                    result = conn.execute(text("""
-                        SELECT DISTINCT memory_id
-                        FROM agent_memory_entity_links
-                        WHERE entity_id = ANY(:related_entity_ids)
-                        ORDER BY memory_id DESC
-                        LIMIT :max_memories
-                    """), {
-                        "related_entity_ids": related_entity_ids,
-                        "max_memories": _HOP2_MAX_MEMORIES * 3,
-                    })
+                # Calcular max weight por memória (a memória pode linkar a
+                # múltiplas entidades relacionadas — usamos o maior peso)
+                memory_max_weight: Dict[int, float] = {}
+                for eid, mid in result.fetchall():
+                    w = related_entity_weights.get(eid, 0.0)
+                    if mid not in memory_max_weight or w > memory_max_weight[mid]:
+                        memory_max_weight[mid] = w
 
-                    hop2_candidate_mids = [row[0] for row in result.fetchall()]
-
-                    if hop2_candidate_mids:
-                        # Query 3: Mapear entity_id → memory_id para calcular weight por memória
-                        result = conn.execute(text("""
-                            SELECT entity_id, memory_id
-                            FROM agent_memory_entity_links
-                            WHERE entity_id = ANY(:related_entity_ids)
-                              AND memory_id = ANY(:memory_ids)
-                        """), {
-                            "related_entity_ids": related_entity_ids,
-                            "memory_ids": hop2_candidate_mids,
-                        })
-
-                        # Calcular max weight por memória (a memória pode linkar a
-                        # múltiplas entidades relacionadas — usamos o maior peso)
-                        memory_max_weight: Dict[int, float] = {}
-                        for eid, mid in result.fetchall():
-                            w = related_entity_weights.get(eid, 0.0)
-                            if mid not in memory_max_weight or w > memory_max_weight[mid]:
-                                memory_max_weight[mid] = w
-
-                        # IDs a excluir do hop 2: já em hop 1 + exclude_memory_ids
-                        hop2_exclude = hop1_memory_ids | exclude
-
-                        for mid in hop2_candidate_mids:
-                            if mid in hop2_exclude:
-                                continue
-                            if hop2_count >= _HOP2_MAX_MEMORIES:
-                                break
-
-                            max_w = memory_max_weight.get(mid, 0.5)
-                            similarity = min(
-                                _HOP2_SIMILARITY_CAP,
-                                _HOP2_SIMILARITY_FACTOR * max_w,
-                            )
+                # IDs a excluir do hop 2: já em hop 1 + exclude_memory_ids
+                hop2_exclude = hop1_memory_ids | exclude
 
-                            graph_results.append({
-                                'memory_id': mid,
-                                'similarity': round(similarity, 4),
-                                'source': 'graph',
-                            })
-                            hop2_count += 1
-
-            except Exception as e:
-                logger.debug(f"[KG_QUERY] Hop 2 falhou (hop 1 preservado): {e}")
-
-            logger.debug(
-                f"[KG_QUERY] user_id={user_id}: "
-                f"entities_found={len(entity_ids)}, "
-                f"hop1_memories={len(hop1_memory_ids)}, "
-                f"hop2_memories={hop2_count}"
-            )
+                for mid in hop2_candidate_mids:
+                    if mid in hop2_exclude:
+                        continue
+                    if hop2_count >= _HOP2_MAX_MEMORIES:
+                        break
 
-            return graph_results
+                    max_w = memory_max_weight.get(mid, 0.5)
+                    similarity = min(
+                        _HOP2_SIMILARITY_CAP,
+                        _HOP2_SIMILARITY_FACTOR * max_w,
+                    )
+
+                    graph_results.append({
+                        'memory_id': mid,
+                        'similarity': round(similarity, 4),
+                        'source': 'graph',
+                    })
+                    hop2_count += 1
 
     except Exception as e:
-        logger.debug(f"[KG] query_graph_memories falhou: {e}")
-        return []
+        logger.debug(f"[KG_QUERY] Hop 2 falhou (hop 1 preservado): {e}")
+
+    logger.debug(
+        f"[KG_QUERY] user_ids={user_ids}: "
+        f"entities_found={len(entity_ids)}, "
+        f"hop1_memories={len(hop1_memory_ids)}, "
+        f"hop2_memories={hop2_count}"
+    )
+
+    return graph_results
 
 
 # =====================================================================
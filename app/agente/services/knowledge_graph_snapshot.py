@@ -0,0 +1,459 @@
+"""
+Knowledge Graph Snapshot — adjacência em memória para o READ PATH do KG.
+
+query_graph_memories roda a cada turno do agente e, no caminho SQL, faz até
+5 round-trips (entidades, hop 1, relações, candidatos hop 2, mapa
+entidade→memória). O grafo de um usuário muda pouco entre turnos.
+
+Snapshot por usuário (entidades do usuário + empresa user_id=0):
+  - nomes:     entity_name → índices das entidades
+  - links:     CSR entidade → memórias (memory_id decrescente, sem repetição)
+  - adj:       CSR entidade → vizinhas (bidirecional, peso = MAX(weight) do par)
+  - mem_ent:   CSR memória → entidades (peso da memória no hop 2 e PPR)
+
+Versão = (revisão do usuário, revisão da empresa) em agent_memory_graph_revisions,
+incrementada por triggers em entities/links/relations (inclusive CASCADE e
+escritas fora deste serviço — consolidator, scripts de manutenção).
+Por turno: 1 query (revisões). Rebuild (3 queries) só quando a revisão muda.
+
+Modos de ranking (MEMORY_KG_RANKING):
+  hops (default) — mesmo resultado do caminho SQL (hop 1 + hop 2). Empates de
+                   peso no hop 2 são desempatados por entity_id (no SQL a
+                   ordem entre empatados é indefinida).
+  ppr            — PageRank personalizado ponderado (push local a partir das
+                   entidades do prompt; custo limitado por 1/(alpha*eps),
+                   independe do tamanho do grafo).
+
+Best-effort: qualquer falha (migration não aplicada, banco fora) retorna None
+e o caller usa o caminho SQL.
+
+Uso:
+    from app.agente.services.knowledge_graph_snapshot import consultar_snapshot
+    resultados = consultar_snapshot(user_id, entity_names, exclude, limit)
+"""
+
+import heapq
+import logging
+import os
+import threading
+from array import array
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.agente.services.knowledge_graph_service import (
+    _HOP2_MAX_MEMORIES,
+    _HOP2_MAX_RELATED_ENTITIES,
+    _HOP2_SIMILARITY_CAP,
+    _HOP2_SIMILARITY_FACTOR,
+)
+
+logger = logging.getLogger(__name__)
+
+# Snapshots mantidos por processo (LRU por user_id)
+_MAX_SNAPSHOTS = int(os.environ.get("MEMORY_KG_SNAPSHOT_MAX_USUARIOS", "32"))
+
+# PPR: probabilidade de reinício, tolerância do push e peso da aresta entidade↔memória
+_PPR_ALPHA = 0.15
+_PPR_EPS = 1e-4
+_PPR_PESO_LINK = 1.0
+
+# Mesmo proxy neutro do hop 1 no caminho SQL (GAP 11)
+_SIMILARIDADE_GRAFO = 0.5
+
+
+def _csr(n: int, pares: Iterable[Tuple[int, int]], pesos: Optional[Iterable[float]] = None):
+    """Monta (ptr, idx[, peso]) a partir de pares (origem, destino) já ordenados por origem."""
+    ptr = array('l', [0]) * (n + 1)
+    idx = array('l')
+    peso = array('d') if pesos is not None else None
+    iter_pesos = iter(pesos) if pesos is not None else None
+    for origem, destino in pares:
+        ptr[origem + 1] += 1
+        idx.append(destino)
+        if peso is not None:
+            peso.append(next(iter_pesos))
+    for i in range(n):
+        ptr[i + 1] += ptr[i]
+    return ptr, idx, peso
+
+
+class GraphSnapshot:
+    """Grafo imutável de um usuário em arrays compactos (CSR)."""
+
+    __slots__ = (
+        'versao', 'entity_ids', 'nomes',
+        'link_ptr', 'link_mem', 'adj_ptr', 'adj_idx', 'adj_peso',
+        'mem_ids', 'mem_ptr', 'mem_ent', 'grau', '_views',
+    )
+
+    @classmethod
+    def construir(
+        cls,
+        versao: tuple,
+        entidades: Iterable[Tuple[int, str]],
+        relacoes: Iterable[Tuple[int, int, float]],
+        links: Iterable[Tuple[int, int]],
+    ) -> 'GraphSnapshot':
+        """
+        Args:
+            versao: Revisões (usuário, empresa) lidas antes da carga
+            entidades: (entity_id, entity_name) do escopo do usuário
+            relacoes: (source_entity_id, target_entity_id, weight)
+            links: (entity_id, memory_id)
+        """
+        snap = cls()
+        snap.versao = versao
+        indice: Dict[int, int] = {}
+        entity_ids: List[int] = []
+
+        def _idx(eid: int) -> int:
+            i = indice.get(eid)
+            if i is None:
+                i = indice[eid] = len(entity_ids)
+                entity_ids.append(eid)
+            return i
+
+        nomes: Dict[str, List[int]] = {}
+        for eid, nome in entidades:
+            nomes.setdefault(nome, []).append(_idx(eid))
+
+        # Peso por par não-ordenado = MAX(weight) entre todas as relações do par
+        pares: Dict[Tuple[int, int], float] = {}
+        for origem, destino, peso in relacoes:
+            if origem == destino:
+                continue
+            a, b = _idx(origem), _idx(destino)
+            chave = (a, b) if a < b else (b, a)
+            peso = float(peso or 0.0)
+            if peso > pares.get(chave, float('-inf')):
+                pares[chave] = peso
+
+        links_por_entidade: Dict[int, Set[int]] = {}
+        for eid, mid in links:
+            i = indice.get(eid)
+            if i is not None:
+                links_por_entidade.setdefault(i, set()).add(mid)
+
+        n = len(entity_ids)
+        # Vizinhas de cada entidade em ordem (peso desc, entity_id): o hop 2 faz
+        # merge preguiçoso e para nas _HOP2_MAX_RELATED_ENTITIES primeiras
+        arestas = sorted(
+            [(a, b, w) for (a, b), w in pares.items()] + [(b, a, w) for (a, b), w in pares.items()],
+            key=lambda t: (t[0], -t[2], entity_ids[t[1]]),
+        )
+        snap.adj_ptr, snap.adj_idx, snap.adj_peso = _csr(
+            n, ((a, b) for a, b, _ in arestas), (w for _, _, w in arestas),
+        )
+
+        mem_ids = sorted({m for mids in links_por_entidade.values() for m in mids}, reverse=True)
+        mem_indice = {mid: k for k, mid in enumerate(mem_ids)}
+        # mem_ids decrescente => índice crescente = memory_id decrescente
+        ent_mem = sorted(
+            (i, mem_indice[m]) for i, mids in links_por_entidade.items() for m in mids
+        )
+        snap.link_ptr, snap.link_mem, _ = _csr(n, ent_mem)
+        snap.mem_ptr, snap.mem_ent, _ = _csr(len(mem_ids), sorted((m, i) for i, m in ent_mem))
+
+        # Grau ponderado por nó (entidades 0..n-1, memórias n..n+M-1) para o PPR
+        grau = array('d', [0.0]) * (n + len(mem_ids))
+        for i in range(n):
+            grau[i] = (
+                sum(snap.adj_peso[snap.adj_ptr[i]:snap.adj_ptr[i + 1]])
+                + _PPR_PESO_LINK * (snap.link_ptr[i + 1] - snap.link_ptr[i])
+            )
+        for m in range(len(mem_ids)):
+            grau[n + m] = _PPR_PESO_LINK * (snap.mem_ptr[m + 1] - snap.mem_ptr[m])
+
+        snap.entity_ids = array('l', entity_ids)
+        snap.nomes = nomes
+        snap.mem_ids = array('l', mem_ids)
+        snap.grau = grau
+        snap._views = tuple(memoryview(a) for a in (snap.link_mem, snap.adj_idx, snap.adj_peso))
+        return snap
+
+    # -----------------------------------------------------------------
+    # Consultas
+    # -----------------------------------------------------------------
+
+    def sementes(self, entity_names: Iterable[str]) -> List[int]:
+        return sorted({i for nome in entity_names for i in self.nomes.get(nome, ())})
+
+    def _memorias(self, i: int) -> memoryview:
+        """Índices de memória da entidade (crescente = memory_id decrescente), sem cópia."""
+        return self._views[0][self.link_ptr[i]:self.link_ptr[i + 1]]
+
+    def _top_memorias(self, entidades: Iterable[int], quantidade: int) -> List[int]:
+        """DISTINCT memory_id das entidades, decrescente, LIMIT quantidade."""
+        top: List[int] = []
+        ultimo = -1
+        for k in heapq.merge(*(self._memorias(i) for i in entidades)):
+            if k != ultimo:
+                top.append(self.mem_ids[k])
+                ultimo = k
+                if len(top) >= quantidade:
+                    break
+        return top
+
+    def _vizinhas_ordenadas(self, s: int):
+        """(-peso, entity_id, índice) das vizinhas de s, já na ordem do CSR."""
+        _, adj_idx, adj_peso = self._views
+        entity_ids = self.entity_ids
+        for k in range(self.adj_ptr[s], self.adj_ptr[s + 1]):
+            v = adj_idx[k]
+            yield -adj_peso[k], entity_ids[v], v
+
+    def _relacionadas(self, seeds: List[int]) -> Dict[int, float]:
+        """Top vizinhas das sementes por MAX(weight) (1ª aparição no merge = peso máximo)."""
+        seed_set = set(seeds)
+        relacionadas: Dict[int, float] = {}
+        for neg_peso, _, v in heapq.merge(*(self._vizinhas_ordenadas(s) for s in seeds)):
+            if v in seed_set or v in relacionadas:
+                continue
+            relacionadas[v] = -neg_peso
+            if len(relacionadas) >= _HOP2_MAX_RELATED_ENTITIES:
+                break
+        return relacionadas
+
+    def consultar_hops(self, entity_names: Iterable[str], exclude: Set[int], limit: int) -> List[Dict]:
+        """Hop 1 + hop 2 com a mesma semântica de _query_graph_memories_sql."""
+        seeds = self.sementes(entity_names)
+        if not seeds:
+            return []
+
+        # ── HOP 1 ──
+        hop1_memory_ids = set(self._top_memorias(seeds, limit * 2))
+        graph_results = []
+        for mid in sorted(hop1_memory_ids, reverse=True):
+            if mid not in exclude:
+                graph_results.append({'memory_id': mid, 'similarity': _SIMILARIDADE_GRAFO, 'source': 'graph'})
+                if len(graph_results) >= limit:
+                    break
+
+        # ── HOP 2 ──
+        relacionadas = self._relacionadas(seeds)
+        if not relacionadas:
+            return graph_results
+        candidatos = self._top_memorias(relacionadas, _HOP2_MAX_MEMORIES * 3)
+
+        hop2_exclude = hop1_memory_ids | exclude
+        hop2_count = 0
+        for mid in candidatos:
+            if mid in hop2_exclude:
+                continue
+            if hop2_count >= _HOP2_MAX_MEMORIES:
+                break
+            # Maior peso entre as relacionadas que linkam a memória (lado memória do CSR: poucas entidades)
+            m = self._indice_memoria(mid)
+            max_w = max(
+                (relacionadas[e] for e in self.mem_ent[self.mem_ptr[m]:self.mem_ptr[m + 1]] if e in relacionadas),
+                default=0.5,
+            )
+            similarity = min(_HOP2_SIMILARITY_CAP, _HOP2_SIMILARITY_FACTOR * max_w)
+            graph_results.append({'memory_id': mid, 'similarity': round(similarity, 4), 'source': 'graph'})
+            hop2_count += 1
+        return graph_results
+
+    def _indice_memoria(self, mid: int) -> int:
+        """Busca binária em mem_ids (decrescente)."""
+        lo, hi = 0, len(self.mem_ids)
+        while lo < hi:
+            meio = (lo + hi) // 2
+            if self.mem_ids[meio] > mid:
+                lo = meio + 1
+            else:
+                hi = meio
+        return lo
+
+    def _vizinhos(self, u: int):
+        """(vizinho, peso) no grafo bipartido entidade↔entidade / entidade↔memória."""
+        n = len(self.entity_ids)
+        if u < n:
+            for k in range(self.adj_ptr[u], self.adj_ptr[u + 1]):
+                yield self.adj_idx[k], self.adj_peso[k]
+            for k in range(self.link_ptr[u], self.link_ptr[u + 1]):
+                yield n + self.link_mem[k], _PPR_PESO_LINK
+        else:
+            m = u - n
+            for k in range(self.mem_ptr[m], self.mem_ptr[m + 1]):
+                yield self.mem_ent[k], _PPR_PESO_LINK
+
+    def pagerank_personalizado(
+        self,
+        seeds: List[int],
+        alpha: float = _PPR_ALPHA,
+        eps: float = _PPR_EPS,
+    ) -> Dict[int, float]:
+        """
+        PPR aproximado por push local (Andersen-Chung-Lang), reinício nas sementes.
+
+        Returns:
+            nó → score (entidades 0..n-1, memórias n..n+M-1)
+        """
+        grau = self.grau
+        residuo: Dict[int, float] = {s: 1.0 / len(seeds) for s in seeds}
+        score: Dict[int, float] = {}
+        fila = deque(seeds)
+        while fila:
+            u = fila.popleft()
+            r_u = residuo.get(u, 0.0)
+            if r_u <= 0.0:
+                continue
+            if grau[u] <= 0.0:
+                score[u] = score.get(u, 0.0) + r_u
+                residuo[u] = 0.0
+                continue
+            if r_u < eps * grau[u]:
+                continue
+            score[u] = score.get(u, 0.0) + alpha * r_u
+            residuo[u] = 0.0
+            massa = (1.0 - alpha) * r_u / grau[u]
+            for v, w in self._vizinhos(u):
+                antes = residuo.get(v, 0.0)
+                depois = antes + massa * w
+                residuo[v] = depois
+                if antes < eps * grau[v] <= depois:
+                    fila.append(v)
+        return score
+
+    def consultar_ppr(self, entity_names: Iterable[str], exclude: Set[int], limit: int) -> List[Dict]:
+        """Memórias ranqueadas por PPR; a melhor recebe o proxy neutro 0.5."""
+        seeds = self.sementes(entity_names)
+        if not seeds:
+            return []
+        n = len(self.entity_ids)
+        scores = [
+            (s, self.mem_ids[u - n]) for u, s in self.pagerank_personalizado(seeds).items()
+            if u >= n and s > 0.0 and self.mem_ids[u - n] not in exclude
+        ]
+        top = heapq.nlargest(limit + _HOP2_MAX_MEMORIES, scores)
+        if not top:
+            return []
+        maior = top[0][0]
+        return [
+            {'memory_id': mid, 'similarity': round(_SIMILARIDADE_GRAFO * s / maior, 4), 'source': 'graph'}
+            for s, mid in top
+        ]
+
+
+# =====================================================================
+# Cache por usuário
+# =====================================================================
+
+_lock = threading.Lock()
+_snapshots: 'OrderedDict[int, GraphSnapshot]' = OrderedDict()
+
+
+def _escopo(user_id: int) -> List[int]:
+    return [user_id, 0] if user_id != 0 else [0]
+
+
+def ler_revisoes(conn, user_ids: List[int]) -> tuple:
+    """Revisão atual do grafo de cada user_id (0 se nunca escrito)."""
+    from sqlalchemy import text
+
+    rows = conn.execute(text("""
+        SELECT user_id, revision
+        FROM agent_memory_graph_revisions
+        WHERE user_id = ANY(:user_ids)
+    """), {"user_ids": user_ids}).fetchall()
+    revisoes = {uid: rev for uid, rev in rows}
+    return tuple(revisoes.get(uid, 0) for uid in user_ids)
+
+
+def carregar_snapshot(conn, user_id: int, versao: tuple) -> GraphSnapshot:
+    """Carrega o grafo do escopo do usuário (3 queries) e monta os arrays."""
+    from sqlalchemy import text
+
+    user_ids = _escopo(user_id)
+    entidades = conn.execute(text("""
+        SELECT id, entity_name
+        FROM agent_memory_entities
+        WHERE user_id = ANY(:user_ids)
+    """), {"user_ids": user_ids}).fetchall()
+
+    relacoes = conn.execute(text("""
+        SELECT r.source_entity_id, r.target_entity_id, r.weight
+        FROM agent_memory_entity_relations r
+        WHERE r.source_entity_id IN (SELECT id FROM agent_memory_entities WHERE user_id = ANY(:user_ids))
+           OR r.target_entity_id IN (SELECT id FROM agent_memory_entities WHERE user_id = ANY(:user_ids))
+    """), {"user_ids": user_ids}).fetchall()
+
+    # Vizinhas de outro escopo também entram no hop 2 (igual ao caminho SQL)
+    ids = {row[0] for row in entidades}
+    ids.update(row[0] for row in relacoes)
+    ids.update(row[1] for row in relacoes)
+    links = conn.execute(text("""
+        SELECT entity_id, memory_id
+        FROM agent_memory_entity_links
+        WHERE entity_id = ANY(:entity_ids)
+    """), {"entity_ids": list(ids)}).fetchall()
+
+    return GraphSnapshot.construir(versao, entidades, relacoes, links)
+
+
+def obter_snapshot(conn, user_id: int) -> GraphSnapshot:
+    """Snapshot vigente do usuário; reconstrói se a revisão mudou."""
+    versao = ler_revisoes(conn, _escopo(user_id))
+    with _lock:
+        snap = _snapshots.get(user_id)
+        if snap is not None and snap.versao == versao:
+            _snapshots.move_to_end(user_id)
+            return snap
+
+    # Revisão lida ANTES da carga: escrita concorrente só causa rebuild extra
+    snap = carregar_snapshot(conn, user_id, versao)
+    with _lock:
+        _snapshots[user_id] = snap
+        _snapshots.move_to_end(user_id)
+        while len(_snapshots) > _MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    logger.debug(
+        f"[KG_SNAPSHOT] rebuild user_id={user_id} versao={versao}: "
+        f"{len(snap.entity_ids)} entidades, {len(snap.adj_idx) // 2} relações, "
+        f"{len(snap.link_mem)} links"
+    )
+    return snap
+
+
+def invalidar(user_id: Optional[int] = None) -> None:
+    """Descarta snapshots em cache (None = todos)."""
+    with _lock:
+        if user_id is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(user_id, None)
+
+
+def consultar_snapshot(
+    user_id: int,
+    entity_names: List[str],
+    exclude: Set[int],
+    limit: int,
+    modo: Optional[str] = None,
+) -> Optional[List[Dict]]:
+    """
+    Resolve o READ PATH do KG pelo snapshot em memória.
+
+    Args:
+        user_id: ID do usuário
+        entity_names: Nomes normalizados extraídos do prompt
+        exclude: memory_ids a excluir
+        limit: Máximo de resultados hop 1
+        modo: "hops" | "ppr" (default: MEMORY_KG_RANKING)
+
+    Returns:
+        Lista [{memory_id, similarity, source}] ou None se o snapshot
+        não estiver disponível (caller usa o caminho SQL).
+    """
+    try:
+        from app import db
+        from app.embeddings.config import MEMORY_KG_RANKING
+
+        with db.engine.connect() as conn:
+            snap = obter_snapshot(conn, user_id)
+        if (modo or MEMORY_KG_RANKING) == 'ppr':
+            return snap.consultar_ppr(entity_names, exclude, limit)
+        return snap.consultar_hops(entity_names, exclude, limit)
+    except Exception as e:
+        logger.debug(f"[KG_SNAPSHOT] indisponível, usando SQL: {e}")
+        return None
@@ -0,0 +1,418 @@
+"""Cache de plano e de resultado do consultar_sql (text-to-SQL).
+
+Motivacao: cada chamada de consultar_sql roda a pipeline inteira (selecao de
+schema, Generator, Evaluator, Safety e execucao read-only com timeout de 5s),
+mesmo quando o usuario repete a mesma pergunta minutos depois ("e agora?",
+"atualiza aquele ranking"). O custo dominante e' o Generator (LLM) + a query.
+
+Dois niveis, em memoria do processo (LRU + TTL, thread-safe):
+  L1 plano:     (pergunta normalizada, escopo) -> SQL validada pela pipeline.
+                Hit => pipeline roda com sql_literal (pula Generator/Evaluator;
+                Safety e execucao read-only continuam valendo).
+  L2 resultado: (sha256 do SQL normalizado, escopo) -> resultado + watermarks
+                das tabelas referenciadas. Hit => nem a pipeline roda.
+
+Invalidacao do L2:
+  - TTL (TEXT_TO_SQL_CACHE_RESULTADO_TTL, default 300s) — cobre funcoes de
+    tempo (CURRENT_DATE, now()) e tabelas sem estatistica.
+  - Watermark por tabela: n_tup_ins + n_tup_upd + n_tup_del de
+    pg_stat_user_tables. Escrita numa tabela referenciada muda o watermark e o
+    resultado e' descartado no proximo acesso. O coletor de estatisticas do
+    PostgreSQL publica os contadores no commit com atraso de ~1s.
+  - DML executado pela propria tool (MODO ADMIN) invalida na hora
+    (invalidar_tabelas), sem esperar o coletor.
+
+Escopo = perfil de permissao (admin, debug, tabelas bloqueadas): o mesmo SQL
+pode ser permitido para um perfil e bloqueado para outro, entao planos e
+resultados nunca cruzam perfis.
+
+Nao entram no cache: SQL com DML/DDL, SELECT ... FOR UPDATE, funcoes volateis
+(random, nextval, clock_timestamp), resultados com erro ou acima de
+TEXT_TO_SQL_CACHE_MAX_LINHAS linhas.
+
+Best-effort: falha ao ler watermarks => executa sem cache (nunca quebra a
+tool). Fora de app context (handler MCP) a leitura abre o proprio contexto.
+Feature flag: TEXT_TO_SQL_CACHE=false -> desativa.
+
+API publica:
+    escopo_usuario(admin_mode, extra_blocked, debug) -> str
+    executar_com_cache(pergunta, sql_literal, escopo, executar) -> dict
+    invalidar_tabelas(tabelas) -> int
+    estatisticas() -> dict
+    limpar() -> None
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(nome: str, default: str) -> int:
+    try:
+        return int(os.getenv(nome, default))
+    except ValueError:
+        return int(default)
+
+
+PLANO_TTL_SECONDS = _env_int("TEXT_TO_SQL_CACHE_PLANO_TTL", "3600")
+RESULTADO_TTL_SECONDS = _env_int("TEXT_TO_SQL_CACHE_RESULTADO_TTL", "300")
+MAX_PLANOS = _env_int("TEXT_TO_SQL_CACHE_MAX_PLANOS", "500")
+MAX_RESULTADOS = _env_int("TEXT_TO_SQL_CACHE_MAX_RESULTADOS", "200")
+MAX_LINHAS = _env_int("TEXT_TO_SQL_CACHE_MAX_LINHAS", "5000")
+
+# Qualquer um destes no SQL => nao cacheia (escrita, DDL, locks ou volatil)
+_NAO_CACHEAVEL = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|UPSERT|TRUNCATE|ALTER|DROP|CREATE|GRANT|REVOKE|"
+    r"COPY|CALL|DO|VACUUM|ANALYZE|REINDEX|CLUSTER|LOCK|SET|RESET|NOTIFY|"
+    r"NEXTVAL|SETVAL|RANDOM|CLOCK_TIMESTAMP|TIMEOFDAY|GEN_RANDOM_UUID|PG_SLEEP)\b",
+    re.IGNORECASE,
+)
+_CERCA_MARKDOWN = re.compile(r"^```(?:sql)?\s*|\s*```$", re.IGNORECASE)
+
+_lock = threading.Lock()
+_planos: "OrderedDict[tuple, tuple]" = OrderedDict()       # chave -> (sql, expira_em)
+_resultados: "OrderedDict[tuple, dict]" = OrderedDict()    # chave -> entrada
+_geracoes: dict = {}                                        # tabela -> invalidacoes locais
+_metricas = {
+    "plano_hit": 0,
+    "plano_miss": 0,
+    "resultado_hit": 0,
+    "resultado_miss": 0,
+    "resultado_expirado": 0,
+    "resultado_invalidado": 0,
+    "plano_descartado": 0,
+}
+
+
+def _is_enabled() -> bool:
+    return os.getenv("TEXT_TO_SQL_CACHE", "true").lower() == "true"
+
+
+# =====================================================================
+# Normalizacao e chaves
+# =====================================================================
+
+def normalizar_pergunta(pergunta: str) -> str:
+    """Minusculas, sem acentos, espacos colapsados e sem pontuacao final."""
+    texto = unicodedata.normalize("NFKD", pergunta or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    texto = " ".join(texto.split())
+    return texto.rstrip(" ?!.;")
+
+
+def normalizar_sql(sql: str) -> str:
+    """Remove cercas markdown, ';' final e colapsa espacos (literais preservados)."""
+    texto = _CERCA_MARKDOWN.sub("", (sql or "").strip())
+    return " ".join(texto.split()).rstrip(";").strip()
+
+
+def _hash_sql(sql: str) -> str:
+    return hashlib.sha256(normalizar_sql(sql).encode("utf-8")).hexdigest()
+
+
+def _normalizar_tabela(tabela: str) -> str:
+    tabela = (tabela or "").strip().strip('"').lower()
+    return tabela.split(".", 1)[1] if tabela.startswith("public.") else tabela
+
+
+def escopo_usuario(admin_mode: bool, extra_blocked: Optional[Iterable[str]], debug: bool = False) -> str:
+    """Perfil de permissao do usuario (chave de isolamento do cache)."""
+    bloqueadas = ",".join(sorted(extra_blocked or ()))
+    return f"admin={int(bool(admin_mode))}|debug={int(bool(debug))}|bloq={bloqueadas}"
+
+
+def sql_cacheavel(sql: str) -> bool:
+    """Somente leitura pura: SELECT/WITH sem escrita, lock ou funcao volatil."""
+    texto = normalizar_sql(sql)
+    if not re.match(r"^(SELECT|WITH)\b", texto, re.IGNORECASE):
+        return False
+    if re.search(r"\bFOR\s+(UPDATE|SHARE|NO\s+KEY\s+UPDATE|KEY\s+SHARE)\b", texto, re.IGNORECASE):
+        return False
+    return _NAO_CACHEAVEL.search(texto) is None
+
+
+# =====================================================================
+# Watermarks
+# =====================================================================
+
+_app_proprio = None
+
+
+def _get_app_context():
+    """Retorna context manager Flask app, ou None se ja estamos em contexto.
+
+    executar_com_cache roda no handler MCP (fora de app context); so a
+    lambda de execucao entra no contexto dela. O app criado aqui e' reusado
+    — a leitura de watermarks acontece 2x por consulta.
+    """
+    global _app_proprio
+    try:
+        from flask import current_app
+        _ = current_app.name  # raise se sem contexto
+        return None
+    except RuntimeError:
+        if _app_proprio is None:
+            from app import create_app
+            _app_proprio = create_app()
+        return _app_proprio.app_context()
+
+
+def _consultar_watermarks(tabelas: list) -> dict:
+    from sqlalchemy import text
+    from app import db
+
+    linhas = db.session.execute(
+        text(
+            "SELECT relname, n_tup_ins + n_tup_upd + n_tup_del AS escritas "
+            "FROM pg_stat_user_tables "
+            "WHERE schemaname = 'public' AND relname = ANY(:tabelas)"
+        ),
+        {"tabelas": list(tabelas)},
+    ).all()
+    return {r.relname: int(r.escritas) for r in linhas}
+
+
+def _ler_watermarks(tabelas: list) -> Optional[dict]:
+    """Escritas acumuladas por tabela (pg_stat_user_tables). None se indisponivel."""
+    try:
+        ctx = _get_app_context()
+        if ctx is None:
+            return _consultar_watermarks(tabelas)
+        with ctx:
+            return _consultar_watermarks(tabelas)
+    except Exception as e:
+        logger.debug(f"[SQL_CACHE] watermarks indisponiveis: {e}")
+        return None
+
+
+def _watermarks(tabelas: list) -> Optional[tuple]:
+    """Watermark composto (escritas do PG, invalidacoes locais) por tabela."""
+    lidos = _ler_watermarks(tabelas)
+    if lidos is None:
+        return None
+    with _lock:
+        return tuple(
+            (t, lidos.get(t, -1), _geracoes.get(t, 0)) for t in tabelas
+        )
+
+
+# =====================================================================
+# L1 — plano
+# =====================================================================
+
+def _chave_plano(pergunta: str, escopo: str) -> tuple:
+    return (normalizar_pergunta(pergunta), escopo)
+
+
+def _obter_plano(pergunta: str, escopo: str) -> Optional[str]:
+    chave = _chave_plano(pergunta, escopo)
+    agora = time.monotonic()
+    with _lock:
+        entrada = _planos.get(chave)
+        if entrada is None or entrada[1] <= agora:
+            _planos.pop(chave, None)
+            _metricas["plano_miss"] += 1
+            return None
+        _planos.move_to_end(chave)
+        _metricas["plano_hit"] += 1
+        return entrada[0]
+
+
+def _gravar_plano(pergunta: str, escopo: str, sql: str) -> None:
+    chave = _chave_plano(pergunta, escopo)
+    with _lock:
+        _planos[chave] = (sql, time.monotonic() + PLANO_TTL_SECONDS)
+        _planos.move_to_end(chave)
+        while len(_planos) > MAX_PLANOS:
+            _planos.popitem(last=False)
+
+
+def _descartar_plano(pergunta: str, escopo: str) -> None:
+    with _lock:
+        if _planos.pop(_chave_plano(pergunta, escopo), None) is not None:
+            _metricas["plano_descartado"] += 1
+
+
+# =====================================================================
+# L2 — resultado
+# =====================================================================
+
+def _obter_resultado(sql: str, escopo: str) -> Optional[dict]:
+    chave = (_hash_sql(sql), escopo)
+    with _lock:
+        entrada = _resultados.get(chave)
+        if entrada is None:
+            _metricas["resultado_miss"] += 1
+            return None
+        if entrada["expira_em"] <= time.monotonic():
+            _resultados.pop(chave, None)
+            _metricas["resultado_expirado"] += 1
+            _metricas["resultado_miss"] += 1
+            return None
+
+    # Watermarks fora do lock (query no banco)
+    atuais = _watermarks(entrada["tabelas"])
+    with _lock:
+        if atuais is None or atuais != entrada["watermarks"]:
+            _resultados.pop(chave, None)
+            _metricas["resultado_invalidado"] += 1
+            _metricas["resultado_miss"] += 1
+            return None
+        _resultados.move_to_end(chave)
+        _metricas["resultado_hit"] += 1
+
+    resultado = dict(entrada["resultado"])
+    resultado["cache"] = "resultado"
+    resultado["tempo_total_ms"] = 0
+    return resultado
+
+
+def _gravar_resultado(sql: str, escopo: str, resultado: dict) -> bool:
+    tabelas = sorted({_normalizar_tabela(t) for t in resultado.get("tabelas_usadas") or [] if t})
+    if not tabelas or len(resultado.get("dados") or []) > MAX_LINHAS:
+        return False
+    watermarks = _watermarks(tabelas)
+    if watermarks is None:
+        return False
+
+    chave = (_hash_sql(sql), escopo)
+    with _lock:
+        _resultados[chave] = {
+            "resultado": resultado,
+            "tabelas": tabelas,
+            "watermarks": watermarks,
+            "expira_em": time.monotonic() + RESULTADO_TTL_SECONDS,
+        }
+        _resultados.move_to_end(chave)
+        while len(_resultados) > MAX_RESULTADOS:
+            _resultados.popitem(last=False)
+    return True
+
+
+def invalidar_tabelas(tabelas: Iterable[str]) -> int:
+    """Invalida resultados que leem estas tabelas (DML feito pela propria tool).
+
+    Returns:
+        Quantidade de resultados descartados.
+    """
+    alvo = {_normalizar_tabela(t) for t in tabelas or () if t}
+    if not alvo:
+        return 0
+    with _lock:
+        for tabela in alvo:
+            _geracoes[tabela] = _geracoes.get(tabela, 0) + 1
+        chaves = [c for c, e in _resultados.items() if alvo.intersection(e["tabelas"])]
+        for chave in chaves:
+            del _resultados[chave]
+        _metricas["resultado_invalidado"] += len(chaves)
+    return len(chaves)
+
+
+# =====================================================================
+# Orquestracao
+# =====================================================================
+
+def executar_com_cache(
+    pergunta: str,
+    sql_literal: Optional[str],
+    escopo: str,
+    executar: Callable[[Optional[str]], dict],
+) -> dict:
+    """Resolve a consulta passando pelos dois niveis de cache.
+
+    Args:
+        pergunta: Pergunta NL (ou o proprio SQL quando sql_literal veio).
+        sql_literal: SQL literal do agente (sql=) ou None para NL.
+        escopo: escopo_usuario(...) do chamador.
+        executar: executar(sql_literal) -> resultado da pipeline. Recebe o SQL
+            do plano em cache no hit de L1 (pipeline pula o Generator).
+
+    Returns:
+        Resultado no formato de TextToSQLPipeline.run(); chave 'cache' indica
+        'resultado' (L2) ou 'plano' (L1) quando houve hit.
+    """
+    if not _is_enabled():
+        return executar(sql_literal)
+
+    sql = sql_literal
+    via_plano = False
+    if sql is None:
+        sql = _obter_plano(pergunta, escopo)
+        via_plano = sql is not None
+
+    if sql is not None and sql_cacheavel(sql):
+        cacheado = _obter_resultado(sql, escopo)
+        if cacheado is not None:
+            logger.info(f"[SQL_CACHE] hit resultado ({'plano' if via_plano else 'sql'}) escopo={escopo}")
+            return cacheado
+
+    resultado = executar(sql)
+
+    if via_plano:
+        if not resultado.get("sucesso"):
+            # Plano ficou invalido (schema mudou, tabela bloqueada): refaz do zero
+            logger.info("[SQL_CACHE] plano em cache falhou; descartando e gerando de novo")
+            _descartar_plano(pergunta, escopo)
+            resultado = executar(None)
+            via_plano = False
+        else:
+            resultado["cache"] = "plano"
+            logger.info(f"[SQL_CACHE] hit plano escopo={escopo}")
+
+    try:
+        _registrar(pergunta, sql_literal, escopo, resultado)
+    except Exception as e:
+        logger.warning(f"[SQL_CACHE] falha ao registrar no cache: {e}")
+    return resultado
+
+
+def _registrar(pergunta: str, sql_literal: Optional[str], escopo: str, resultado: dict) -> None:
+    sql_executado = resultado.get("sql")
+    if not resultado.get("sucesso") or not sql_executado:
+        return
+
+    if not sql_cacheavel(sql_executado):
+        # DML (MODO ADMIN): resultados em cache dessas tabelas ficaram velhos
+        if re.match(r"^\s*(INSERT|UPDATE|DELETE|MERGE|WITH)\b", normalizar_sql(sql_executado), re.IGNORECASE):
+            invalidar_tabelas(resultado.get("tabelas_usadas") or [])
+        return
+
+    if sql_literal is None:
+        _gravar_plano(pergunta, escopo, sql_executado)
+    _gravar_resultado(sql_executado, escopo, resultado)
+
+
+# =====================================================================
+# Metricas
+# =====================================================================
+
+def estatisticas() -> dict:
+    """Contadores de hit/miss por nivel, taxas e tamanho atual dos caches."""
+    with _lock:
+        metricas = dict(_metricas)
+        metricas["planos"] = len(_planos)
+        metricas["resultados"] = len(_resultados)
+    consultas_plano = metricas["plano_hit"] + metricas["plano_miss"]
+    consultas_resultado = metricas["resultado_hit"] + metricas["resultado_miss"]
+    metricas["taxa_hit_plano"] = round(metricas["plano_hit"] / consultas_plano, 4) if consultas_plano else 0.0
+    metricas["taxa_hit_resultado"] = (
+        round(metricas["resultado_hit"] / consultas_resultado, 4) if consultas_resultado else 0.0
+    )
+    return metricas
+
+
+def limpar() -> None:
+    """Esvazia os dois niveis e zera as metricas (testes / deploy de schema)."""
+    with _lock:
+        _planos.clear()
+        _resultados.clear()
+        _geracoes.clear()
+        for chave in _metricas:
+            _metricas[chave] = 0
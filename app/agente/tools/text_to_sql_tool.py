@@ -558,16 +558,24 @@ try:
             except Exception:
                 sql_first_mode = "off"
 
-            # Executar com app context garantido
-            result = _execute_in_app_context(
-                pipeline, pergunta,
-                extra_blocked_tables=extra_blocked,
-                debug_unblock_tables=debug_unblock,
-                debug_schemas=debug_schemas,
-                admin_mode=admin_mode or debug_active,
-                session_id=session_id,
-                sql_first_mode=sql_first_mode,
-                sql_literal=sql_literal,
+            # Executar com app context garantido, passando pelo cache de
+            # plano/resultado (escopo = perfil de permissao do usuario)
+            from . import sql_result_cache
+            escopo = sql_result_cache.escopo_usuario(
+                admin_mode, extra_blocked, debug=debug_active,
+            )
+            result = sql_result_cache.executar_com_cache(
+                pergunta, sql_literal, escopo,
+                lambda sql: _execute_in_app_context(
+                    pipeline, pergunta,
+                    extra_blocked_tables=extra_blocked,
+                    debug_unblock_tables=debug_unblock,
+                    debug_schemas=debug_schemas,
+                    admin_mode=admin_mode or debug_active,
+                    session_id=session_id,
+                    sql_first_mode=sql_first_mode,
+                    sql_literal=sql,
+                ),
             )
 
             # Formatar resultado legível (TextContent — backward compat)
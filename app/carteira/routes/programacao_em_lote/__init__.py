@@ -19,6 +19,7 @@ from .routes import (
     sugerir_datas,
     analisar_ruptura_cnpj,  # ✅ Nova função que analisa TODO o CNPJ
     analisar_ruptura_lote,
+    exportar,
 )
 
 # Importar rota de importação de agendamentos Assai
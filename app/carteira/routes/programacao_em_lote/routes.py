@@ -1,28 +1,33 @@
 """
 Rotas para programação em lote de Redes SP (Atacadão e Sendas)
+
+Dados da rede (tela, APIs de estoque/ruptura/sugestão e export) vêm do motor
+set-based em app/carteira/services/analise_rede.py: número fixo de queries por página.
 """
 
 from flask import render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
-from sqlalchemy import func, and_, distinct, exists
-from decimal import Decimal
-from datetime import date, timedelta, datetime
+from sqlalchemy import and_
+from datetime import timedelta, datetime
 import logging
 import traceback
 
 from app import db
-from app.carteira.models import CarteiraPrincipal, SaldoStandby
+from app.carteira.models import CarteiraPrincipal
 from app.separacao.models import Separacao
-from app.faturamento.models import FaturamentoProduto
-from app.producao.models import CadastroPalletizacao
 from app.localidades.models import CadastroSubRota
-from app.portal.utils.grupo_empresarial import GrupoEmpresarial
-from app.estoque.models import MovimentacaoEstoque
-from app.estoque.services.estoque_simples import ServicoEstoqueSimples
 from app.producao.models import ProgramacaoProducao
 from app.utils.lote_utils import gerar_lote_id
 from app.utils.timezone import agora_utc_naive
 from app.portal.sendas.utils_protocolo import gerar_protocolo_sendas
+from app.utils.streaming_export import resposta_export
+from app.carteira.services.analise_rede import (
+    abas_export_rede,
+    analisar_rede,
+    analisar_ruptura_sequencial,
+    projetar_estoques_rede,
+    sugerir_datas_cnpjs,
+)
 from .busca_dados import buscar_dados_completos_cnpj
 
 from . import programacao_em_lote_bp
@@ -78,6 +83,34 @@ def listar(rede):
         return redirect(url_for('carteira.index'))
 
 
+@programacao_em_lote_bp.route('/exportar/<rede>')
+@login_required
+def exportar(rede):
+    """
+    Exporta a rede para Excel (abas Lojas e Pedidos) com status da tela,
+    viabilidade de estoque e datas sugeridas. ?formato=csv exporta só Lojas.
+    """
+    try:
+        portal_map = {'atacadao': 'atacadao', 'sendas': 'sendas'}
+        portal = portal_map.get(rede.lower())
+        if not portal:
+            flash('Rede inválida selecionada', 'error')
+            return redirect(url_for('carteira.index'))
+
+        lojas = analisar_rede(portal, com_viabilidade=True)
+        return resposta_export(
+            abas_export_rede(lojas),
+            request.args.get('formato', 'xlsx'),
+            f"programacao_lote_{rede}_{agora_utc_naive().strftime('%Y%m%d_%H%M')}",
+        )
+
+    except Exception as e:
+        logger.error(f"Erro ao exportar programação em lote: {str(e)}")
+        logger.error(traceback.format_exc())
+        flash(f'Erro ao exportar: {str(e)}', 'error')
+        return redirect(url_for('programacao_em_lote.listar', rede=rede))
+
+
 def _buscar_sub_rota(nome_cidade, cod_uf):
     """
     Busca a sub-rota de uma cidade no CadastroSubRota
@@ -110,791 +143,9 @@ def _buscar_sub_rota(nome_cidade, cod_uf):
 def _buscar_dados_por_rede(portal):
     """
     Busca e organiza dados de pedidos/separações/NFs por CNPJ para um portal específico
+    (número fixo de queries — ver analise_rede)
     """
-    dados_por_cnpj = {}
-    
-    # 1. Buscar CNPJs na CarteiraPrincipal (pedidos pendentes) com cod_uf='SP' e qtd_saldo > 0
-    # M4: Subquery para excluir pedidos em standby ativo
-    standby_listagem = exists().where(
-        and_(
-            SaldoStandby.num_pedido == CarteiraPrincipal.num_pedido,
-            SaldoStandby.status_standby.in_(['ATIVO', 'BLOQ. COML.', 'SALDO'])
-        )
-    )
-
-    pedidos_carteira = db.session.query(
-        CarteiraPrincipal.cnpj_cpf,
-        CarteiraPrincipal.raz_social_red,
-        CarteiraPrincipal.nome_cidade,
-        CarteiraPrincipal.cod_uf,
-        CarteiraPrincipal.vendedor,
-        CarteiraPrincipal.equipe_vendas,
-        func.count(distinct(CarteiraPrincipal.num_pedido)).label('qtd_pedidos')
-    ).filter(
-        and_(
-            CarteiraPrincipal.cod_uf == 'SP',
-            CarteiraPrincipal.ativo == True,  # Filtrar apenas pedidos ativos
-            CarteiraPrincipal.qtd_saldo_produto_pedido > 0,  # ✅ FILTRAR APENAS COM SALDO > 0
-            ~standby_listagem  # M4: Excluir pedidos em standby
-        )
-    ).group_by(
-        CarteiraPrincipal.cnpj_cpf,
-        CarteiraPrincipal.raz_social_red,
-        CarteiraPrincipal.nome_cidade,
-        CarteiraPrincipal.cod_uf,
-        CarteiraPrincipal.vendedor,
-        CarteiraPrincipal.equipe_vendas
-    ).all()
-    
-    # Filtrar por portal usando GrupoEmpresarial
-    for pedido in pedidos_carteira:
-        if pedido.cnpj_cpf and GrupoEmpresarial.identificar_portal(pedido.cnpj_cpf) == portal:
-            cnpj_key = pedido.cnpj_cpf
-            
-            if cnpj_key not in dados_por_cnpj:
-                # Buscar sub-rota no CadastroSubRota
-                sub_rota = _buscar_sub_rota(pedido.nome_cidade, pedido.cod_uf)
-                
-                dados_por_cnpj[cnpj_key] = {
-                    'cnpj': cnpj_key,
-                    'cnpj_formatado': GrupoEmpresarial.formatar_cnpj(cnpj_key),
-                    'raz_social': pedido.raz_social_red,
-                    'cidade': pedido.nome_cidade,
-                    'uf': pedido.cod_uf,
-                    'vendedor': pedido.vendedor,
-                    'equipe_vendas': pedido.equipe_vendas,
-                    'sub_rota': sub_rota,
-                    'pedidos': [],
-                    'total_valor': Decimal('0'),
-                    'total_peso': Decimal('0'),
-                    'total_pallets': Decimal('0'),
-                    'qtd_pedidos': 0,
-                    'qtd_separacoes': 0,
-                    'qtd_nf_cd': 0,
-                    # Campos para cores condicionais
-                    'tem_protocolo': False,
-                    'agendamento_confirmado': False,
-                    'tem_pendencias': False,
-                    'expedicao_sugerida': '',
-                    'agendamento_sugerido': '',
-                    'protocolo': ''
-                }
-            
-            # Buscar detalhes dos pedidos deste CNPJ
-            _adicionar_pedidos_cnpj(dados_por_cnpj[cnpj_key], cnpj_key)
-            
-            # Analisar status para cores condicionais
-            _analisar_status_cnpj(dados_por_cnpj[cnpj_key])
-    
-    # 2. Buscar CNPJs em Separacao com nf_cd=True (NFs no CD sem pedido na carteira) e cod_uf='SP'
-    nfs_cd = db.session.query(
-        Separacao.cnpj_cpf,
-        Separacao.raz_social_red,
-        Separacao.nome_cidade,
-        Separacao.cod_uf,
-        func.count(distinct(Separacao.numero_nf)).label('qtd_nfs')
-    ).filter(
-        and_(
-            Separacao.sincronizado_nf == True,
-            Separacao.nf_cd == True,
-            Separacao.cod_uf == 'SP'
-        )
-    ).group_by(
-        Separacao.cnpj_cpf,
-        Separacao.raz_social_red,
-        Separacao.nome_cidade,
-        Separacao.cod_uf
-    ).all()
-    
-    for nf in nfs_cd:
-        if nf.cnpj_cpf and GrupoEmpresarial.identificar_portal(nf.cnpj_cpf) == portal:
-            cnpj_key = nf.cnpj_cpf
-            
-            # Verificar se este CNPJ já tem pedidos na carteira COM SALDO > 0
-            pedidos_na_carteira = db.session.query(
-                distinct(CarteiraPrincipal.num_pedido)
-            ).filter(
-                and_(
-                    CarteiraPrincipal.cnpj_cpf == cnpj_key,
-                    CarteiraPrincipal.qtd_saldo_produto_pedido > 0  # ✅ APENAS PEDIDOS COM SALDO > 0
-                )
-            ).all()
-            
-            pedidos_na_carteira_set = {p[0] for p in pedidos_na_carteira}
-            
-            # Buscar NFs que não têm pedido correspondente na carteira
-            nfs_sem_carteira = db.session.query(Separacao).filter(
-                and_(
-                    Separacao.cnpj_cpf == cnpj_key,
-                    Separacao.sincronizado_nf == True,
-                    Separacao.nf_cd == True,
-                    ~Separacao.num_pedido.in_(pedidos_na_carteira_set) if pedidos_na_carteira_set else True
-                )
-            ).all()
-            
-            if nfs_sem_carteira:
-                if cnpj_key not in dados_por_cnpj:
-                    # Buscar sub-rota no CadastroSubRota
-                    sub_rota = _buscar_sub_rota(nf.nome_cidade, nf.cod_uf)
-                    
-                    dados_por_cnpj[cnpj_key] = {
-                        'cnpj': cnpj_key,
-                        'cnpj_formatado': GrupoEmpresarial.formatar_cnpj(cnpj_key),
-                        'raz_social': nf.raz_social_red,
-                        'cidade': nf.nome_cidade,
-                        'uf': nf.cod_uf,
-                        'vendedor': None,
-                        'equipe_vendas': None,
-                        'sub_rota': sub_rota,
-                        'pedidos': [],
-                        'total_valor': Decimal('0'),
-                        'total_peso': Decimal('0'),
-                        'total_pallets': Decimal('0'),
-                        'qtd_pedidos': 0,
-                        'qtd_separacoes': 0,
-                        'qtd_nf_cd': 0,
-                        # Campos para cores condicionais
-                        'tem_protocolo': False,
-                        'agendamento_confirmado': False,
-                        'tem_pendencias': False,
-                        'expedicao_sugerida': '',
-                        'agendamento_sugerido': '',
-                        'protocolo': ''
-                    }
-                
-                # Adicionar NFs sem carteira
-                _adicionar_nfs_sem_carteira(dados_por_cnpj[cnpj_key], nfs_sem_carteira)
-                
-                # Analisar status para cores condicionais
-                _analisar_status_cnpj(dados_por_cnpj[cnpj_key])
-    
-    # Converter para lista e ordenar por sub_rota
-    # Sub-rota "D" deve ficar por último
-    dados_lista = list(dados_por_cnpj.values())
-    
-    def ordem_subrota(item):
-        """
-        Função de ordenação customizada:
-        - None (sem sub-rota) vai para o início (0)
-        - Sub-rota "D" vai para o final (999)
-        - Outras sub-rotas ordenadas alfabeticamente
-        """
-        sub_rota = item.get('sub_rota')
-        if sub_rota is None:
-            return (0, '')  # Sem sub-rota vai primeiro
-        elif sub_rota.upper() == 'D':
-            return (999, '')  # Sub-rota D vai por último
-        else:
-            return (1, sub_rota.upper())  # Outras ordenadas alfabeticamente
-    
-    dados_lista.sort(key=ordem_subrota)
-    
-    return dados_lista
-
-
-def _analisar_status_cnpj(dados_cnpj):
-    """
-    Analisa os pedidos e separações para determinar status e cores
-    Hierarquia de prioridade: Reagendar > Consolidar > Ag. Aprovação > Pronto > Pendente
-    
-    Status 1 - "Ag. Aprovação": protocolo em todas, agendamento futuro, não confirmado, sem saldo pendente
-    Status 2 - "Pronto": protocolo em todas, agendamento futuro, confirmado, sem saldo pendente
-    Status 3 - "Reagendar": agendamento passado
-    Status 4 - "Consolidar": agendamento futuro + (protocolo parcial OU protocolos diferentes OU saldo parcial)
-    Status 5 - "Pendente": sem separação/NF ou sem protocolo algum
-    """
-    # date já está importado no topo do arquivo
-
-    hoje = agora_utc_naive().date()
-    
-    # Variáveis de análise
-    tem_separacao_ou_nf = False
-    tem_agendamento_passado = False
-    tem_agendamento_futuro = False
-    todos_tem_protocolo = False  # Só True se HOUVER separações E todas tiverem protocolo
-    algum_tem_protocolo = False
-    protocolos_iguais = True
-    algum_confirmado = False
-    todos_confirmados = False  # Só True se HOUVER separações E todas estiverem confirmadas
-    tem_saldo_pendente_sem_separacao = False  # Saldo que não está em Separação
-    tem_saldo_pendente_parcial = False  # Saldo pendente mas não é o total do CNPJ
-    primeiro_protocolo = None
-    
-    # Variáveis para capturar datas sugeridas
-    data_expedicao_sugerida = None
-    data_agendamento_sugerida = None
-    
-    # Contadores para validação
-    total_separacoes_nfs = 0
-    separacoes_com_protocolo = 0
-    separacoes_confirmadas = 0
-    
-    # Variáveis para análise de saldo
-    total_pedidos_cnpj = 0
-    pedidos_com_saldo_pendente = 0
-    
-    # Analisar todos os pedidos
-    for pedido in dados_cnpj['pedidos']:
-        total_pedidos_cnpj += 1
-        
-        # Verificar saldo pendente do pedido
-        qtd_pendente = pedido.get('qtd_pendente', 0)
-        if qtd_pendente > 0:
-            pedidos_com_saldo_pendente += 1
-            
-            # Verificar se há separações para este pedido
-            pedido_tem_separacao = len(pedido.get('separacoes', [])) > 0 or len(pedido.get('nfs_cd', [])) > 0
-            
-            if not pedido_tem_separacao:
-                # Há saldo sem nenhuma separação
-                tem_saldo_pendente_sem_separacao = True
-            else:
-                # Há saldo mas tem algumas separações (parcial)
-                tem_saldo_pendente_parcial = True
-        
-        # Verificar separações
-        for sep in pedido.get('separacoes', []):
-            tem_separacao_ou_nf = True
-            total_separacoes_nfs += 1
-            
-            # Verificar protocolo
-            if sep.get('protocolo'):
-                algum_tem_protocolo = True
-                separacoes_com_protocolo += 1
-                if primeiro_protocolo is None:
-                    primeiro_protocolo = sep.get('protocolo')
-                elif primeiro_protocolo != sep.get('protocolo'):
-                    protocolos_iguais = False
-            
-            # Verificar confirmação
-            if sep.get('agendamento_confirmado'):
-                algum_confirmado = True
-                separacoes_confirmadas += 1
-            
-            # Verificar datas de agendamento
-            if sep.get('agendamento'):
-                data_agenda = sep.get('agendamento')
-                if isinstance(data_agenda, str):
-                    data_agenda = date.fromisoformat(data_agenda)
-                if data_agenda:
-                    if data_agenda < hoje:
-                        tem_agendamento_passado = True
-                    else:
-                        tem_agendamento_futuro = True
-                        # Capturar primeira data de agendamento futura para sugestão
-                        if data_agendamento_sugerida is None:
-                            data_agendamento_sugerida = data_agenda
-                            # Capturar expedição se disponível
-                            if sep.get('expedicao'):
-                                data_exp = sep.get('expedicao')
-                                if isinstance(data_exp, str):
-                                    data_exp = date.fromisoformat(data_exp)
-                                data_expedicao_sugerida = data_exp
-        
-        # Verificar NFs no CD
-        for nf in pedido.get('nfs_cd', []):
-            tem_separacao_ou_nf = True
-            total_separacoes_nfs += 1
-            
-            # Verificar protocolo
-            if nf.get('protocolo'):
-                algum_tem_protocolo = True
-                separacoes_com_protocolo += 1
-                if primeiro_protocolo is None:
-                    primeiro_protocolo = nf.get('protocolo')
-                elif primeiro_protocolo != nf.get('protocolo'):
-                    protocolos_iguais = False
-            
-            # Verificar confirmação
-            if nf.get('agendamento_confirmado'):
-                algum_confirmado = True
-                separacoes_confirmadas += 1
-            
-            # Verificar datas de agendamento
-            if nf.get('agendamento'):
-                data_agenda = nf.get('agendamento')
-                if isinstance(data_agenda, str):
-                    data_agenda = date.fromisoformat(data_agenda)
-                if data_agenda:
-                    if data_agenda < hoje:
-                        tem_agendamento_passado = True
-                    else:
-                        tem_agendamento_futuro = True
-                        # Capturar primeira data de agendamento futura para sugestão
-                        if data_agendamento_sugerida is None:
-                            data_agendamento_sugerida = data_agenda
-                            # Capturar expedição se disponível
-                            if nf.get('expedicao'):
-                                data_exp = nf.get('expedicao')
-                                if isinstance(data_exp, str):
-                                    data_exp = date.fromisoformat(data_exp)
-                                data_expedicao_sugerida = data_exp
-    
-    # Recalcular variáveis booleanas baseado nos contadores
-    if total_separacoes_nfs > 0:
-        # Só pode ser "todos têm protocolo" se houver separações E todas tiverem
-        todos_tem_protocolo = (separacoes_com_protocolo == total_separacoes_nfs)
-        # Só pode ser "todos confirmados" se houver separações E todas estiverem confirmadas
-        todos_confirmados = (separacoes_confirmadas == total_separacoes_nfs)
-    else:
-        # Se não há separações, não pode dizer que "todos têm" algo
-        todos_tem_protocolo = False
-        todos_confirmados = False
-    
-    # Verificar se é saldo pendente parcial (não é o total do CNPJ)
-    # Se todos os pedidos têm saldo pendente, então é total, não parcial
-    if pedidos_com_saldo_pendente == total_pedidos_cnpj and pedidos_com_saldo_pendente > 0:
-        # Todos os pedidos têm saldo pendente - é total, não parcial
-        tem_saldo_pendente_parcial = False
-    
-    # CORREÇÃO IMPORTANTE: Se não há agendamento passado e há separações/NFs, considerar como "potencial futuro"
-    # Isso é necessário para casos onde o agendamento ainda não foi preenchido
-    tem_potencial_agendamento_futuro = (not tem_agendamento_passado and tem_separacao_ou_nf)
-    
-    # Log para debug
-    logger.debug(f"CNPJ {dados_cnpj.get('cnpj')} - Análise de status:")
-    logger.debug(f"  - tem_separacao_ou_nf: {tem_separacao_ou_nf}")
-    logger.debug(f"  - total_separacoes_nfs: {total_separacoes_nfs}")
-    logger.debug(f"  - separacoes_com_protocolo: {separacoes_com_protocolo}")
-    logger.debug(f"  - todos_tem_protocolo: {todos_tem_protocolo}")
-    logger.debug(f"  - algum_tem_protocolo: {algum_tem_protocolo}")
-    logger.debug(f"  - todos_confirmados: {todos_confirmados}")
-    logger.debug(f"  - tem_saldo_pendente_sem_separacao: {tem_saldo_pendente_sem_separacao}")
-    logger.debug(f"  - tem_saldo_pendente_parcial: {tem_saldo_pendente_parcial}")
-    logger.debug(f"  - tem_agendamento_passado: {tem_agendamento_passado}")
-    logger.debug(f"  - tem_agendamento_futuro: {tem_agendamento_futuro}")
-    logger.debug(f"  - tem_potencial_agendamento_futuro: {tem_potencial_agendamento_futuro}")
-    
-    # Determinar status baseado na hierarquia
-    # IMPORTANTE: A ordem de verificação IMPORTA devido à prioridade
-    status = 'Pendente'
-    cor_linha = ''  # sem cor especial
-    icone = 'fa-hourglass-half'  # ícone padrão
-    
-    # 1. STATUS 3 - REAGENDAR (prioridade máxima)
-    # Condição: Caso tenha algum agendamento preenchido < hoje
-    if tem_agendamento_passado:
-        status = 'Reagendar'
-        cor_linha = 'table-danger'  # vermelho
-        icone = 'fa-redo'
-        logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Status REAGENDAR (agendamento passado)")
-    
-    # 2. STATUS 4 - CONSOLIDAR 
-    # Condição obrigatória: As datas de agendamento que estiverem preenchidas sejam futuras (ou não haver passado)
-    # Condições opcionais (qualquer uma dispara): protocolo parcial, protocolos diferentes, saldo pendente parcial
-    elif tem_agendamento_futuro or tem_potencial_agendamento_futuro:
-        precisa_consolidar = False
-        motivo_consolidar = []
-        
-        # Condição opcional 1: Haja protocolo porém não em todas as Separações/NF no CD
-        if algum_tem_protocolo and not todos_tem_protocolo:
-            precisa_consolidar = True
-            motivo_consolidar.append("protocolo parcial")
-        
-        # Condição opcional 2: Haja protocolo em todas as separações porém não são iguais
-        if todos_tem_protocolo and not protocolos_iguais:
-            precisa_consolidar = True
-            motivo_consolidar.append("protocolos diferentes")
-        
-        # Condição opcional 3: Haja saldo pendente sem separação porém que não seja o total do CNPJ
-        if tem_saldo_pendente_parcial:
-            precisa_consolidar = True
-            motivo_consolidar.append("saldo pendente parcial")
-        
-        if precisa_consolidar:
-            status = 'Consolidar'
-            cor_linha = 'table-warning'  # amarelo
-            icone = 'fa-exclamation-triangle'
-            logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Status CONSOLIDAR (motivos: {', '.join(motivo_consolidar)})")
-        # Para Ag. Aprovação e Pronto, EXIGIR que tenha agendamento futuro preenchido
-        elif tem_agendamento_futuro:
-            # Tem agendamento futuro mas não precisa consolidar, vamos verificar os próximos status
-            logger.debug(f"  => CNPJ {dados_cnpj.get('cnpj')}: Tem agendamento futuro, verificando Ag. Aprovação/Pronto...")
-            
-            # 3. STATUS 1 - AG. APROVAÇÃO
-            # Condições: protocolo em todas, agendamento futuro, não confirmado, sem saldo pendente sem separação
-            if (todos_tem_protocolo and not todos_confirmados and not tem_saldo_pendente_sem_separacao):
-                status = 'Ag. Aprovação'
-                cor_linha = 'table-info'  # azul
-                icone = 'fa-clock'
-                logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Status AG. APROVAÇÃO")
-            
-            # 4. STATUS 2 - PRONTO
-            # Condições: protocolo em todas, agendamento futuro, confirmado, sem saldo pendente sem separação
-            elif (todos_tem_protocolo and todos_confirmados and not tem_saldo_pendente_sem_separacao):
-                status = 'Pronto'
-                cor_linha = 'table-success'  # azul (mantendo success para verde/azul)
-                icone = 'fa-check-circle'
-                logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Status PRONTO")
-            else:
-                logger.debug(f"  => CNPJ {dados_cnpj.get('cnpj')}: Não atende Ag. Aprovação/Pronto. todos_tem_protocolo={todos_tem_protocolo}, todos_confirmados={todos_confirmados}, tem_saldo_pendente_sem_separacao={tem_saldo_pendente_sem_separacao}")
-        else:
-            # Tem potencial futuro mas sem agendamento preenchido, fica como pendente
-            logger.debug(f"  => CNPJ {dados_cnpj.get('cnpj')}: Sem agendamento preenchido, mantendo como Pendente")
-    
-    # 5. STATUS 5 - PENDENTE (default)
-    # Condições: Não haja Separação e nem NF no CD OU Não haja protocolo em nenhuma Separação ou NF no CD
-    else:
-        status = 'Pendente'
-        cor_linha = ''  # sem cor (linha na cor original)
-        icone = 'fa-hourglass-half'
-        logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Status PENDENTE (não tem agendamento ou não tem separação/protocolo)")
-    
-    # Log do status final determinado
-    logger.debug(f"  => Status final: {status} (cor: {cor_linha})")
-    
-    # Atualizar dados do CNPJ com status e indicadores visuais
-    dados_cnpj['status'] = status
-    dados_cnpj['cor_linha'] = cor_linha
-    dados_cnpj['icone_status'] = icone
-    dados_cnpj['tem_protocolo'] = algum_tem_protocolo
-    dados_cnpj['agendamento_confirmado'] = algum_confirmado
-    
-    # Preencher datas sugeridas quando status for "Ag. Aprovação" ou "Pronto"
-    if status in ['Ag. Aprovação', 'Pronto'] and data_agendamento_sugerida:
-        # Formatar as datas para input date HTML (YYYY-MM-DD)
-        dados_cnpj['agendamento_sugerido'] = data_agendamento_sugerida.strftime('%Y-%m-%d') if data_agendamento_sugerida else ''
-        dados_cnpj['expedicao_sugerida'] = data_expedicao_sugerida.strftime('%Y-%m-%d') if data_expedicao_sugerida else ''
-        logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Datas preenchidas - Expedição: {dados_cnpj['expedicao_sugerida']}, Agendamento: {dados_cnpj['agendamento_sugerido']}")
-    else:
-        dados_cnpj['agendamento_sugerido'] = ''
-        dados_cnpj['expedicao_sugerida'] = ''
-    
-    # Indicador de pendências: reagendamento necessário ou consolidação necessária
-    dados_cnpj['tem_pendencias'] = status in ['Reagendar', 'Consolidar']
-
-
-def _adicionar_pedidos_cnpj(dados_cnpj, cnpj):
-    """
-    Adiciona informações detalhadas dos pedidos de um CNPJ
-    """
-    # M5: Subquery para excluir pedidos em standby ativo
-    standby_detalhe = exists().where(
-        and_(
-            SaldoStandby.num_pedido == CarteiraPrincipal.num_pedido,
-            SaldoStandby.status_standby.in_(['ATIVO', 'BLOQ. COML.', 'SALDO'])
-        )
-    )
-
-    # Buscar pedidos na CarteiraPrincipal - APENAS COM SALDO > 0
-    pedidos = db.session.query(
-        CarteiraPrincipal.num_pedido,
-        CarteiraPrincipal.data_pedido,
-        CarteiraPrincipal.pedido_cliente,
-        CarteiraPrincipal.observ_ped_1,
-        func.sum(CarteiraPrincipal.qtd_saldo_produto_pedido).label('qtd_total'),
-        func.sum(CarteiraPrincipal.qtd_saldo_produto_pedido * CarteiraPrincipal.preco_produto_pedido).label('valor_total')
-    ).filter(
-        and_(
-            CarteiraPrincipal.cnpj_cpf == cnpj,
-            CarteiraPrincipal.ativo == True,  # Filtrar apenas pedidos ativos
-            CarteiraPrincipal.qtd_saldo_produto_pedido > 0,  # ✅ FILTRAR APENAS COM SALDO > 0
-            ~standby_detalhe  # M5: Excluir pedidos em standby
-        )
-    ).group_by(
-        CarteiraPrincipal.num_pedido,
-        CarteiraPrincipal.data_pedido,
-        CarteiraPrincipal.pedido_cliente,
-        CarteiraPrincipal.observ_ped_1
-    ).having(
-        func.sum(CarteiraPrincipal.qtd_saldo_produto_pedido) > 0  # ✅ GARANTIR QUE A SOMA DO GRUPO TAMBÉM É > 0
-    ).all()
-    
-    for pedido in pedidos:
-        pedido_info = {
-            'num_pedido': pedido.num_pedido,
-            'data_pedido': pedido.data_pedido,
-            'pedido_cliente': pedido.pedido_cliente,
-            'observacoes': pedido.observ_ped_1,
-            'status': 'PENDENTE',
-            'separacoes': [],
-            'nfs_cd': [],
-            'qtd_pendente': Decimal('0'),
-            'valor_pendente': Decimal('0'),
-            'peso_pendente': Decimal('0'),
-            'pallets_pendente': Decimal('0'),
-            'valor_original': Decimal(str(pedido.valor_total)) if pedido.valor_total else Decimal('0')
-        }
-        
-        # Calcular quantidades pendentes (CarteiraPrincipal - Separacao)
-        _calcular_pendencias_pedido(pedido_info, pedido.num_pedido)
-        
-        # Buscar separações do pedido
-        _adicionar_separacoes_pedido(pedido_info, pedido.num_pedido)
-        
-        # Buscar NFs no CD do pedido
-        _adicionar_nfs_cd_pedido(pedido_info, pedido.num_pedido)
-        
-        dados_cnpj['pedidos'].append(pedido_info)
-        dados_cnpj['qtd_pedidos'] += 1
-        
-        # Atualizar totais (agora usando valores originais, sem abater)
-        dados_cnpj['total_valor'] += pedido_info.get('valor_original', Decimal('0'))
-        dados_cnpj['total_peso'] += pedido_info.get('peso_original', Decimal('0'))
-        dados_cnpj['total_pallets'] += pedido_info.get('pallets_original', Decimal('0'))
-
-
-def _calcular_pendencias_pedido(pedido_info, num_pedido):
-    """
-    Calcula valores pendentes de um pedido (CarteiraPrincipal - Separacao não sincronizada)
-    E também calcula os valores totais originais
-    """
-    # M6: Subquery para excluir pedidos em standby ativo
-    standby_pend = exists().where(
-        and_(
-            SaldoStandby.num_pedido == CarteiraPrincipal.num_pedido,
-            SaldoStandby.status_standby.in_(['ATIVO', 'BLOQ. COML.', 'SALDO'])
-        )
-    )
-
-    # Buscar itens da carteira - APENAS COM SALDO > 0
-    itens_carteira = db.session.query(
-        CarteiraPrincipal.cod_produto,
-        CarteiraPrincipal.qtd_saldo_produto_pedido,
-        CarteiraPrincipal.preco_produto_pedido
-    ).filter(
-        and_(
-            CarteiraPrincipal.num_pedido == num_pedido,
-            CarteiraPrincipal.ativo == True,  # Filtrar apenas itens ativos
-            CarteiraPrincipal.qtd_saldo_produto_pedido > 0,  # ✅ APENAS ITENS COM SALDO > 0
-            ~standby_pend  # M6: Excluir pedidos em standby
-        )
-    ).all()
-    
-    # Inicializar totais originais
-    peso_total_original = Decimal('0')
-    pallets_total_original = Decimal('0')
-    
-    for item in itens_carteira:
-        # Buscar informações de palletização
-        pallet_info = db.session.query(
-            CadastroPalletizacao.peso_bruto,
-            CadastroPalletizacao.palletizacao
-        ).filter(
-            CadastroPalletizacao.cod_produto == item.cod_produto
-        ).first()
-        
-        if pallet_info:
-            # Calcular totais originais (sem abater separações)
-            peso_total_original += Decimal(str(item.qtd_saldo_produto_pedido)) * Decimal(str(pallet_info.peso_bruto or 0))
-            if pallet_info.palletizacao and pallet_info.palletizacao > 0:
-                pallets_total_original += Decimal(str(item.qtd_saldo_produto_pedido)) / Decimal(str(pallet_info.palletizacao))
-        
-        # Buscar quantidade já separada (não sincronizada)
-        qtd_separada = db.session.query(
-            func.sum(Separacao.qtd_saldo)
-        ).filter(
-            and_(
-                Separacao.num_pedido == num_pedido,
-                Separacao.cod_produto == item.cod_produto,
-                Separacao.sincronizado_nf == False
-            )
-        ).scalar() or Decimal('0')
-        
-        qtd_pendente = Decimal(str(item.qtd_saldo_produto_pedido)) - Decimal(str(qtd_separada))
-        
-        if qtd_pendente > 0:
-            # Buscar dados de palletização
-            palletizacao = db.session.query(CadastroPalletizacao).filter_by(
-                cod_produto=item.cod_produto
-            ).first()
-            
-            valor_pendente = qtd_pendente * Decimal(str(item.preco_produto_pedido or 0))
-            peso_pendente = Decimal('0')
-            pallets_pendente = Decimal('0')
-            
-            if palletizacao:
-                peso_pendente = qtd_pendente * Decimal(str(palletizacao.peso_bruto))
-                if palletizacao.palletizacao > 0:
-                    pallets_pendente = qtd_pendente / Decimal(str(palletizacao.palletizacao))
-            
-            pedido_info['qtd_pendente'] += qtd_pendente
-            pedido_info['valor_pendente'] += valor_pendente
-            pedido_info['peso_pendente'] += peso_pendente
-            pedido_info['pallets_pendente'] += pallets_pendente
-    
-    # Adicionar totais originais ao pedido_info
-    pedido_info['peso_original'] = peso_total_original
-    pedido_info['pallets_original'] = pallets_total_original
-
-
-def _adicionar_separacoes_pedido(pedido_info, num_pedido):
-    """
-    Adiciona informações das separações de um pedido
-    """
-    separacoes = db.session.query(
-        Separacao.separacao_lote_id,
-        Separacao.status,
-        Separacao.expedicao,
-        Separacao.agendamento,
-        Separacao.agendamento_confirmado,
-        Separacao.protocolo,
-        func.sum(Separacao.valor_saldo).label('valor_total'),
-        func.sum(Separacao.peso).label('peso_total'),
-        func.sum(Separacao.pallet).label('pallet_total')
-    ).filter(
-        and_(
-            Separacao.num_pedido == num_pedido,
-            Separacao.sincronizado_nf == False,
-            Separacao.qtd_saldo > 0
-        )
-    ).group_by(
-        Separacao.separacao_lote_id,
-        Separacao.status,
-        Separacao.expedicao,
-        Separacao.agendamento,
-        Separacao.agendamento_confirmado,
-        Separacao.protocolo
-    ).all()
-    
-    for sep in separacoes:
-        pedido_info['separacoes'].append({
-            'separacao_lote_id': sep.separacao_lote_id,
-            'status': sep.status,
-            'expedicao': sep.expedicao,
-            'agendamento': sep.agendamento,
-            'agendamento_confirmado': sep.agendamento_confirmado,
-            'protocolo': sep.protocolo,
-            'valor_total': sep.valor_total or Decimal('0'),
-            'peso_total': sep.peso_total or Decimal('0'),
-            'pallet_total': sep.pallet_total or Decimal('0')
-        })
-
-
-def _adicionar_nfs_cd_pedido(pedido_info, num_pedido):
-    """
-    Adiciona informações das NFs no CD de um pedido
-    """
-    nfs = db.session.query(
-        Separacao.numero_nf,
-        Separacao.status,
-        Separacao.expedicao,
-        Separacao.agendamento,
-        Separacao.agendamento_confirmado,
-        Separacao.protocolo,
-        func.sum(Separacao.valor_saldo).label('valor_total'),
-        func.sum(Separacao.peso).label('peso_total'),
-        func.sum(Separacao.pallet).label('pallet_total')
-    ).filter(
-        and_(
-            Separacao.num_pedido == num_pedido,
-            Separacao.sincronizado_nf == True,
-            Separacao.nf_cd == True,
-            Separacao.qtd_saldo > 0
-        )
-    ).group_by(
-        Separacao.numero_nf,
-        Separacao.status,
-        Separacao.expedicao,
-        Separacao.agendamento,
-        Separacao.agendamento_confirmado,
-        Separacao.protocolo
-    ).all()
-    
-    for nf in nfs:
-        pedido_info['nfs_cd'].append({
-            'numero_nf': nf.numero_nf,
-            'status': nf.status,
-            'expedicao': nf.expedicao,
-            'agendamento': nf.agendamento,
-            'agendamento_confirmado': nf.agendamento_confirmado,
-            'protocolo': nf.protocolo,
-            'valor': nf.valor_total or Decimal('0'),
-            'peso': nf.peso_total or Decimal('0'),
-            'pallet': nf.pallet_total or Decimal('0')
-        })
-
-
-def _adicionar_nfs_sem_carteira(dados_cnpj, nfs_sem_carteira):
-    """
-    Adiciona NFs que estão no CD mas não têm pedido na carteira
-    """
-    # Agrupar por número de NF
-    nfs_agrupadas = {}
-    
-    for item in nfs_sem_carteira:
-        if item.numero_nf not in nfs_agrupadas:
-            nfs_agrupadas[item.numero_nf] = {
-                'numero_nf': item.numero_nf,
-                'num_pedido': item.num_pedido,
-                'status': item.status,
-                'expedicao': item.expedicao,
-                'agendamento': item.agendamento,
-                'agendamento_confirmado': item.agendamento_confirmado,
-                'protocolo': item.protocolo,
-                'valor': Decimal('0'),
-                'peso': Decimal('0'),
-                'pallets': Decimal('0')
-            }
-    
-    # Para cada NF agrupada, buscar TODOS os produtos do faturamento
-    for nf_num in nfs_agrupadas.keys():
-        # Buscar todos os produtos faturados desta NF
-        produtos_faturados = db.session.query(
-            FaturamentoProduto.cod_produto,
-            FaturamentoProduto.valor_produto_faturado,
-            FaturamentoProduto.qtd_produto_faturado,
-            FaturamentoProduto.peso_total
-        ).filter(
-            FaturamentoProduto.numero_nf == nf_num
-        ).all()
-        
-        valor_total_nf = Decimal('0')
-        peso_total_nf = Decimal('0')
-        pallets_total_nf = Decimal('0')
-        
-        for prod_fat in produtos_faturados:
-            # Somar valor
-            valor_total_nf += Decimal(str(prod_fat.valor_produto_faturado or 0))
-            
-            # Usar peso_total se disponível, senão calcular
-            if prod_fat.peso_total:
-                peso_total_nf += Decimal(str(prod_fat.peso_total))
-            else:
-                # Buscar dados de palletização para calcular peso
-                palletizacao = db.session.query(CadastroPalletizacao).filter_by(
-                    cod_produto=prod_fat.cod_produto
-                ).first()
-                
-                if palletizacao and prod_fat.qtd_produto_faturado:
-                    peso_total_nf += Decimal(str(prod_fat.qtd_produto_faturado)) * Decimal(str(palletizacao.peso_bruto))
-            
-            # Calcular pallets
-            palletizacao = db.session.query(CadastroPalletizacao).filter_by(
-                cod_produto=prod_fat.cod_produto
-            ).first()
-            
-            if palletizacao and palletizacao.palletizacao > 0 and prod_fat.qtd_produto_faturado:
-                pallets_total_nf += Decimal(str(prod_fat.qtd_produto_faturado)) / Decimal(str(palletizacao.palletizacao))
-        
-        # Atualizar valores da NF
-        nfs_agrupadas[nf_num]['valor'] = valor_total_nf
-        nfs_agrupadas[nf_num]['peso'] = peso_total_nf
-        nfs_agrupadas[nf_num]['pallets'] = pallets_total_nf
-    
-    # Adicionar como pedido especial "NF no CD s/ Cart."
-    for nf_data in nfs_agrupadas.values():
-        pedido_info = {
-            'num_pedido': nf_data['num_pedido'],
-            'data_pedido': None,
-            'pedido_cliente': None,
-            'observacoes': 'NF no CD sem pedido na carteira',
-            'status': 'NF_CD_SEM_CARTEIRA',
-            'separacoes': [],
-            'nfs_cd': [nf_data],
-            'qtd_pendente': Decimal('0'),
-            'valor_pendente': Decimal('0'),
-            'peso_pendente': Decimal('0'),
-            'pallets_pendente': Decimal('0')
-        }
-        
-        dados_cnpj['pedidos'].append(pedido_info)
-        dados_cnpj['qtd_nf_cd'] += 1
-        
-        # Atualizar totais
-        dados_cnpj['total_valor'] += nf_data['valor']
-        dados_cnpj['total_peso'] += nf_data['peso']
-        dados_cnpj['total_pallets'] += nf_data['pallets']
+    return analisar_rede(portal)
 
 
 @programacao_em_lote_bp.route('/api/analisar-estoques/<rede>', methods=['GET'])
@@ -914,75 +165,11 @@ def analisar_estoques(rede):
             return jsonify({'success': False, 'error': 'Rede inválida'}), 400
         
         # Buscar CNPJs da rede
-        dados_rede = _buscar_dados_por_rede(portal)
-        cnpjs_rede = [d['cnpj'] for d in dados_rede]
-        
-        # Buscar todos os produtos dos pedidos dessa rede
-        produtos_rede = db.session.query(
-            CarteiraPrincipal.cod_produto,
-            CarteiraPrincipal.nome_produto,
-            func.sum(CarteiraPrincipal.qtd_saldo_produto_pedido).label('qtd_total'),
-            func.sum(CarteiraPrincipal.qtd_saldo_produto_pedido * CarteiraPrincipal.preco_produto_pedido).label('valor_total')
-        ).filter(
-            CarteiraPrincipal.cnpj_cpf.in_(cnpjs_rede)
-        ).group_by(
-            CarteiraPrincipal.cod_produto,
-            CarteiraPrincipal.nome_produto
-        ).all()
-        
-        resultado = []
-        data_hoje = agora_utc_naive().date()
-        
-        for produto in produtos_rede:
-            # Buscar estoque atual
-            estoque_atual = db.session.query(
-                func.sum(MovimentacaoEstoque.qtd_movimentacao)
-            ).filter(
-                MovimentacaoEstoque.cod_produto == produto.cod_produto,
-                MovimentacaoEstoque.ativo == True
-            ).scalar() or 0
-            
-            # Calcular data disponível (simplificado)
-            data_disponivel = data_hoje
-            saldo_projetado = float(estoque_atual)
-            
-            # Buscar saídas futuras (excluindo pedidos dessa rede)
-            for i in range(15):
-                data_projecao = data_hoje + timedelta(days=i)
-                
-                # Saídas do dia (excluindo CNPJs da rede)
-                saidas_dia = db.session.query(
-                    func.sum(Separacao.qtd_saldo)
-                ).filter(
-                    Separacao.cod_produto == produto.cod_produto,
-                    Separacao.expedicao == data_projecao,
-                    Separacao.sincronizado_nf == False,
-                    ~Separacao.cnpj_cpf.in_(cnpjs_rede)
-                ).scalar() or 0
-                
-                # Produções do dia
-                producoes_dia = db.session.query(
-                    func.sum(ProgramacaoProducao.qtd_programada)
-                ).filter(
-                    ProgramacaoProducao.cod_produto == produto.cod_produto,
-                    ProgramacaoProducao.data_programacao == data_projecao
-                ).scalar() or 0
-                
-                saldo_projetado = saldo_projetado - float(saidas_dia) + float(producoes_dia)
-                
-                if saldo_projetado >= float(produto.qtd_total) and data_disponivel == data_hoje:
-                    data_disponivel = data_projecao
-            
-            resultado.append({
-                'cod_produto': produto.cod_produto,
-                'nome_produto': produto.nome_produto,
-                'qtd_total': float(produto.qtd_total),
-                'valor_total': float(produto.valor_total or 0),
-                'estoque_atual': float(estoque_atual),
-                'data_disponivel': data_disponivel.strftime('%d/%m/%Y'),
-                'projecao_15_dias': saldo_projetado
-            })
-        
+        cnpjs_rede = [d['cnpj'] for d in analisar_rede(portal)]
+
+        # Somatória dos itens + projeção de estoque (queries agrupadas)
+        resultado = projetar_estoques_rede(cnpjs_rede)
+
         return jsonify({
             'success': True,
             'data': resultado
@@ -993,243 +180,6 @@ def analisar_estoques(rede):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-# ─────────────────────────────────────────────────────────────
-# Funções auxiliares para sugerir_datas (Projeção Batch + Greedy)
-# ─────────────────────────────────────────────────────────────
-
-
-def _coletar_demanda_cnpjs(cnpjs):
-    """
-    Coleta demanda de CarteiraPrincipal para os CNPJs selecionados.
-    1 query: GROUP BY cnpj_cpf, cod_produto -> SUM(qtd_saldo_produto_pedido)
-
-    Returns: {
-        'por_cnpj': {cnpj: {cod_produto: qtd}},
-        'total_por_produto': {cod_produto: sum_qtd_todos_cnpjs}
-    }
-    """
-    pedidos = db.session.query(
-        CarteiraPrincipal.cnpj_cpf,
-        CarteiraPrincipal.cod_produto,
-        func.sum(CarteiraPrincipal.qtd_saldo_produto_pedido).label('qtd_total')
-    ).filter(
-        CarteiraPrincipal.cnpj_cpf.in_(cnpjs),
-        CarteiraPrincipal.ativo == True,
-        CarteiraPrincipal.qtd_saldo_produto_pedido > 0
-    ).group_by(
-        CarteiraPrincipal.cnpj_cpf,
-        CarteiraPrincipal.cod_produto
-    ).all()
-
-    por_cnpj = {}
-    total_por_produto = {}
-
-    for p in pedidos:
-        cnpj = p.cnpj_cpf
-        cod = p.cod_produto
-        qtd = float(p.qtd_total or 0)
-
-        if qtd <= 0:
-            continue
-
-        if cnpj not in por_cnpj:
-            por_cnpj[cnpj] = {}
-        por_cnpj[cnpj][cod] = por_cnpj[cnpj].get(cod, 0) + qtd
-        total_por_produto[cod] = total_por_produto.get(cod, 0) + qtd
-
-    return {
-        'por_cnpj': por_cnpj,
-        'total_por_produto': total_por_produto
-    }
-
-
-def _classificar_produtos(projecoes, total_por_produto):
-    """
-    Passos 4-5: Produto OK se menor_estoque_d7 >= demanda_total de todos os CNPJs.
-    Returns: (set(produtos_ok), set(produtos_ruptura))
-    """
-    produtos_ok = set()
-    produtos_ruptura = set()
-
-    for cod, qtd_total in total_por_produto.items():
-        proj = projecoes.get(cod, {})
-        menor_d7 = proj.get('menor_estoque_d7', 0)
-        if menor_d7 >= qtd_total:
-            produtos_ok.add(cod)
-        else:
-            produtos_ruptura.add(cod)
-
-    return produtos_ok, produtos_ruptura
-
-
-def _classificar_cnpjs(cnpjs, demanda_por_cnpj, produtos_ruptura):
-    """
-    Passo 6: CNPJ OK se NENHUM de seus produtos esta em ruptura.
-    Returns: (list_ok, list_ruptura)
-    """
-    cnpjs_ok = []
-    cnpjs_ruptura = []
-
-    for cnpj in cnpjs:
-        produtos_cnpj = set(demanda_por_cnpj.get(cnpj, {}).keys())
-        if produtos_cnpj.isdisjoint(produtos_ruptura):
-            cnpjs_ok.append(cnpj)
-        else:
-            cnpjs_ruptura.append(cnpj)
-
-    return cnpjs_ok, cnpjs_ruptura
-
-
-def _calcular_data_minima_expedicao(dias_uteis_expedicao):
-    """
-    Calcula D+2 uteis, ajustado para dias de expedicao permitidos (seg-qui).
-    """
-    data = agora_utc_naive().date()
-    dias_adicionados = 0
-
-    while dias_adicionados < 2:
-        data += timedelta(days=1)
-        if data.weekday() < 5:  # seg-sex = util
-            dias_adicionados += 1
-
-    # Ajustar para dia de expedicao permitido (seg-qui)
-    while data.weekday() not in dias_uteis_expedicao:
-        data += timedelta(days=1)
-
-    return data
-
-
-def _proxima_data_disponivel(data_minima, dias_uteis, cnpjs_por_dia, max_por_dia):
-    """
-    Encontra a proxima data com slot disponivel (dia de expedicao + < max_por_dia).
-    """
-    data = data_minima
-    for _ in range(365):  # safety limit
-        if data.weekday() in dias_uteis:
-            data_str = data.strftime('%Y-%m-%d')
-            if cnpjs_por_dia.get(data_str, 0) < max_por_dia:
-                return data
-        data += timedelta(days=1)
-    return data  # fallback
-
-
-def _montar_sugestao(data_expedicao, tem_ruptura):
-    """
-    Monta dicionario de sugestao para um CNPJ.
-    Agendamento = expedicao + 1 dia calendario.
-    """
-    data_agendamento = data_expedicao + timedelta(days=1)
-    return {
-        'expedicao': data_expedicao.strftime('%Y-%m-%d'),
-        'agendamento': data_agendamento.strftime('%Y-%m-%d'),
-        'disponibilidade_estoque': data_expedicao.strftime('%Y-%m-%d'),
-        'tem_ruptura': tem_ruptura
-    }
-
-
-def _otimizar_cnpjs_ruptura(
-    cnpjs_ruptura, demanda, projecoes, produtos_ruptura,
-    data_minima, dias_uteis, cnpjs_por_dia, max_por_dia
-):
-    """
-    Passo 7: Otimizacao greedy para CNPJs com produtos em ruptura.
-
-    Ordenar CNPJs por demanda de produtos em ruptura (ascendente).
-    Para cada CNPJ, encontrar primeira data onde estoque projetado >= demanda.
-    Ao atribuir, deduzir demanda de todos os produtos do estoque futuro.
-
-    Complexidade: O(CNPJs x datas x produtos_ruptura) — trivial em memoria.
-    """
-    hoje = agora_utc_naive().date()
-    dias_projecao = 28
-
-    # Montar timeline de estoque para produtos em ruptura
-    # {cod_produto: [saldo_final_d0, saldo_final_d1, ..., saldo_final_d27]}
-    estoque_timeline = {}
-    for cod in produtos_ruptura:
-        proj = projecoes.get(cod, {}).get('projecao', [])
-        estoque_timeline[cod] = [dia.get('saldo_final', 0) for dia in proj]
-
-    # Demanda de produtos em ruptura por CNPJ
-    cnpj_demanda_ruptura = {}
-    for cnpj in cnpjs_ruptura:
-        dem = {}
-        for cod, qtd in demanda['por_cnpj'].get(cnpj, {}).items():
-            if cod in produtos_ruptura:
-                dem[cod] = qtd
-        cnpj_demanda_ruptura[cnpj] = dem
-
-    # Ordenar: menor demanda total de produtos em ruptura primeiro
-    cnpjs_sorted = sorted(
-        cnpjs_ruptura,
-        key=lambda c: sum(cnpj_demanda_ruptura.get(c, {}).values())
-    )
-
-    # Stock consumido por atribuicoes anteriores
-    # {cod_produto: {day_idx: qty_consumida}}
-    consumido = {}
-
-    sugestoes = {}
-
-    for cnpj in cnpjs_sorted:
-        atribuido = False
-
-        for day_offset in range(dias_projecao):
-            data_candidata = hoje + timedelta(days=day_offset)
-
-            # Verificar restricoes de calendario
-            if data_candidata < data_minima:
-                continue
-            if data_candidata.weekday() not in dias_uteis:
-                continue
-
-            # Verificar limite diario
-            data_str = data_candidata.strftime('%Y-%m-%d')
-            if cnpjs_por_dia.get(data_str, 0) >= max_por_dia:
-                continue
-
-            # Verificar estoque para TODOS os produtos em ruptura do CNPJ
-            pode_embarcar = True
-            for cod, qtd_necessaria in cnpj_demanda_ruptura.get(cnpj, {}).items():
-                timeline = estoque_timeline.get(cod, [])
-                if day_offset >= len(timeline):
-                    pode_embarcar = False
-                    break
-                disponivel = timeline[day_offset] - consumido.get(cod, {}).get(day_offset, 0)
-                if disponivel < qtd_necessaria:
-                    pode_embarcar = False
-                    break
-
-            if pode_embarcar:
-                # Atribuir CNPJ a esta data
-                cnpjs_por_dia[data_str] = cnpjs_por_dia.get(data_str, 0) + 1
-                sugestoes[cnpj] = _montar_sugestao(data_candidata, tem_ruptura=True)
-
-                # Deduzir demanda de TODOS os produtos do CNPJ (OK + ruptura)
-                # para que o estoque futuro reflita a alocacao
-                for cod, qtd in demanda['por_cnpj'].get(cnpj, {}).items():
-                    if cod not in consumido:
-                        consumido[cod] = {}
-                    for future_idx in range(day_offset, dias_projecao):
-                        consumido[cod][future_idx] = (
-                            consumido[cod].get(future_idx, 0) + qtd
-                        )
-
-                atribuido = True
-                break
-
-        if not atribuido:
-            # Sem data viavel em 28 dias
-            sugestoes[cnpj] = {
-                'expedicao': '',
-                'agendamento': '',
-                'disponibilidade_estoque': '',
-                'tem_ruptura': True
-            }
-
-    return sugestoes
-
-
 @programacao_em_lote_bp.route('/api/sugerir-datas/<rede>', methods=['POST'])
 @login_required
 def sugerir_datas(rede):
@@ -1257,80 +207,19 @@ def sugerir_datas(rede):
         if not cnpjs_selecionados:
             return jsonify({'success': False, 'error': 'Nenhum CNPJ selecionado'}), 400
 
-        MAX_POR_DIA = 30
-        DIAS_UTEIS_EXPEDICAO = [0, 1, 2, 3]  # seg-qui
-
-        # ─── PASSO 3: Coletar demanda dos CNPJs ───
-        demanda = _coletar_demanda_cnpjs(cnpjs_selecionados)
-        cod_produtos_unicos = list(demanda['total_por_produto'].keys())
-
-        if not cod_produtos_unicos:
-            logger.info("Nenhum produto com saldo pendente para os CNPJs selecionados")
-            return jsonify({
-                'success': True,
-                'sugestoes': {},
-                'data_minima': agora_utc_naive().date().strftime('%Y-%m-%d'),
-                'distribuicao_dias': {}
-            })
-
-        # ─── PASSO 2: Projecao base excluindo CNPJs avaliados ───
-        projecoes = ServicoEstoqueSimples.calcular_projecao_batch_sem_cnpjs(
-            cod_produtos_unicos, dias=28, cnpjs_excluir=cnpjs_selecionados
-        )
-
-        # ─── PASSOS 4-5: Separar produtos OK vs ruptura ───
-        produtos_ok, produtos_ruptura = _classificar_produtos(
-            projecoes, demanda['total_por_produto']
-        )
-        logger.info(
-            f"Classificacao: {len(produtos_ok)} produtos OK, "
-            f"{len(produtos_ruptura)} produtos em ruptura"
-        )
-
-        # ─── PASSO 6: Classificar CNPJs (OK vs ruptura) ───
-        cnpjs_ok, cnpjs_ruptura = _classificar_cnpjs(
-            cnpjs_selecionados, demanda['por_cnpj'], produtos_ruptura
-        )
-        logger.info(
-            f"CNPJs: {len(cnpjs_ok)} OK (fast-path), "
-            f"{len(cnpjs_ruptura)} com ruptura (greedy)"
-        )
-
-        # ─── Calcular data minima (D+2 uteis, seg-qui) ───
-        data_minima = _calcular_data_minima_expedicao(DIAS_UTEIS_EXPEDICAO)
-
-        # ─── Distribuir CNPJs OK (ordenados por prioridade) ───
-        sugestoes = {}
-        cnpjs_por_dia = {}
-
-        cnpjs_ok_ordenados = sorted(cnpjs_ok, key=lambda x: ordem.get(x, 999))
-        for cnpj in cnpjs_ok_ordenados:
-            data_exp = _proxima_data_disponivel(
-                data_minima, DIAS_UTEIS_EXPEDICAO, cnpjs_por_dia, MAX_POR_DIA
-            )
-            data_str = data_exp.strftime('%Y-%m-%d')
-            cnpjs_por_dia[data_str] = cnpjs_por_dia.get(data_str, 0) + 1
-            sugestoes[cnpj] = _montar_sugestao(data_exp, tem_ruptura=False)
-
-        # ─── PASSO 7: Otimizacao greedy para CNPJs com ruptura ───
-        if cnpjs_ruptura:
-            sugestoes_ruptura = _otimizar_cnpjs_ruptura(
-                cnpjs_ruptura, demanda, projecoes, produtos_ruptura,
-                data_minima, DIAS_UTEIS_EXPEDICAO, cnpjs_por_dia, MAX_POR_DIA
-            )
-            sugestoes.update(sugestoes_ruptura)
+        resultado = sugerir_datas_cnpjs(cnpjs_selecionados, ordem)
 
         duracao = _time.monotonic() - inicio
         logger.info(
-            f"sugerir_datas: {len(sugestoes)} sugestoes em {duracao:.2f}s "
-            f"({len(cnpjs_selecionados)} CNPJs, {len(cod_produtos_unicos)} produtos)"
+            f"sugerir_datas: {len(resultado['sugestoes'])} sugestoes em {duracao:.2f}s "
+            f"({len(cnpjs_selecionados)} CNPJs, {len(resultado['demanda']['total_por_produto'])} produtos)"
         )
 
         return jsonify({
             'success': True,
-            'sugestoes': sugestoes,
-            'data_minima': data_minima.strftime('%Y-%m-%d'),
-            'distribuicao_dias': cnpjs_por_dia
+            'sugestoes': resultado['sugestoes'],
+            'data_minima': resultado['data_minima'].strftime('%Y-%m-%d'),
+            'distribuicao_dias': resultado['distribuicao_dias']
         })
 
     except Exception as e:
@@ -1783,80 +672,9 @@ def analisar_ruptura_lote():
         if not cnpjs:
             return jsonify({'success': False, 'error': 'Nenhum CNPJ fornecido'}), 400
         
-        resultado = {}
-        saidas_acumuladas = {}  # Acumula saídas dos pedidos anteriores
-        
-        # Processar na ordem definida
+        # Processar na ordem definida (saídas dos anteriores consomem o estoque)
         cnpjs_ordenados = sorted(cnpjs, key=lambda x: ordem.get(x, 999))
-        
-        for idx, cnpj in enumerate(cnpjs_ordenados):
-            # Buscar pedidos do CNPJ
-            pedidos = db.session.query(CarteiraPrincipal).filter_by(
-                cnpj_cpf=cnpj
-            ).all()
-            
-            disponibilidade = {}
-            data_completa = agora_utc_naive().date()
-            percentual_disponivel = 100.0
-            
-            for pedido in pedidos:
-                cod_produto = pedido.cod_produto
-                qtd_necessaria = float(pedido.qtd_saldo_produto_pedido)
-                
-                # Incluir saídas acumuladas dos pedidos anteriores
-                saida_acumulada = saidas_acumuladas.get(cod_produto, 0)
-                qtd_necessaria_total = qtd_necessaria + saida_acumulada
-                
-                # Buscar estoque atual
-                estoque_atual = db.session.query(
-                    func.sum(MovimentacaoEstoque.qtd_movimentacao)
-                ).filter(
-                    MovimentacaoEstoque.cod_produto == cod_produto,
-                    MovimentacaoEstoque.ativo == True
-                ).scalar() or 0
-                
-                # Verificar disponibilidade
-                if float(estoque_atual) >= qtd_necessaria_total:
-                    disponibilidade[cod_produto] = {
-                        'disponivel': True,
-                        'percentual': 100.0
-                    }
-                else:
-                    disponibilidade[cod_produto] = {
-                        'disponivel': False,
-                        'percentual': (float(estoque_atual) / qtd_necessaria_total * 100) if qtd_necessaria_total > 0 else 0
-                    }
-                    
-                    # Calcular data quando estará disponível
-                    for dias in range(1, 30):
-                        data_futura = agora_utc_naive().date() + timedelta(days=dias)
-                        
-                        # Projetar estoque futuro
-                        producoes = db.session.query(
-                            func.sum(ProgramacaoProducao.qtd_programada)
-                        ).filter(
-                            ProgramacaoProducao.cod_produto == cod_produto,
-                            ProgramacaoProducao.data_programacao <= data_futura
-                        ).scalar() or 0
-                        
-                        if float(estoque_atual) + float(producoes) >= qtd_necessaria_total:
-                            if data_futura > data_completa:
-                                data_completa = data_futura
-                            break
-                
-                # Acumular saída para próximos pedidos
-                saidas_acumuladas[cod_produto] = saidas_acumuladas.get(cod_produto, 0) + qtd_necessaria
-            
-            # Calcular percentual geral
-            total_itens = len(disponibilidade)
-            itens_disponiveis = sum(1 for d in disponibilidade.values() if d['disponivel'])
-            percentual_disponivel = (itens_disponiveis / total_itens * 100) if total_itens > 0 else 0
-            
-            resultado[cnpj] = {
-                'data_completa': data_completa.strftime('%Y-%m-%d'),
-                'percentual_disponivel': percentual_disponivel,
-                'detalhes': disponibilidade
-            }
+        resultado = analisar_ruptura_sequencial(cnpjs_ordenados)
         
         return jsonify({
             'success': True,
@@ -0,0 +1,1478 @@
+"""
+Motor de análise da programação em lote (rede inteira em queries set-based)
+
+Antes, a tela montava cada CNPJ com queries por CNPJ, por pedido e por item
+(pedidos, pendências, palletização 2x por item, separações, NFs no CD,
+faturamento por NF, sub-rota por cidade) e as APIs de estoque/ruptura faziam
+queries por produto x dia. Redes com centenas de lojas passavam de milhares
+de queries por página.
+
+Aqui TODOS os fatos da rede são carregados em um número FIXO de queries
+(independente de quantas lojas/pedidos/produtos) e o resto é montado em
+memória:
+
+- carregar_fatos_rede(portal): carteira, Separacao (saldo separado,
+  separações, NFs no CD), pedidos com saldo, faturamento das NFs sem
+  carteira, palletização e sub-rotas — até 9 queries
+- montar_lojas(fatos): lista de CNPJs no formato da tela (status/cores)
+- analisar_rede(portal): os dois acima; com_viabilidade=True anexa a
+  viabilidade por loja (ruptura x estoque projetado) e as datas sugeridas
+- sugerir_datas_cnpjs / projetar_estoques_rede / analisar_ruptura_sequencial:
+  projeções de estoque agrupadas por produto/data (sem loop de queries)
+
+Alimenta a tela (listar e APIs) e o export Excel da rede.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import and_, exists, func, or_
+
+from app import db
+from app.carteira.models import CarteiraPrincipal, SaldoStandby
+from app.estoque.models import MovimentacaoEstoque
+from app.estoque.services.estoque_simples import ServicoEstoqueSimples
+from app.faturamento.models import FaturamentoProduto
+from app.localidades.models import CadastroSubRota
+from app.portal.utils.grupo_empresarial import GrupoEmpresarial
+from app.producao.models import CadastroPalletizacao, ProgramacaoProducao
+from app.separacao.models import Separacao
+from app.utils.string_utils import remover_acentos
+from app.utils.timezone import agora_utc_naive
+
+logger = logging.getLogger(__name__)
+
+# Status de standby que tiram o pedido da programação em lote
+STATUS_STANDBY_BLOQUEIO = ['ATIVO', 'BLOQ. COML.', 'SALDO']
+
+# Parâmetros da sugestão de datas
+MAX_CNPJS_POR_DIA = 30
+DIAS_UTEIS_EXPEDICAO = [0, 1, 2, 3]  # seg-qui
+DIAS_PROJECAO_ESTOQUE = 15
+
+
+def _dec(valor):
+    return Decimal(str(valor)) if valor is not None else Decimal('0')
+
+
+def _pertence_portal(cnpj, portal):
+    return bool(cnpj) and GrupoEmpresarial.identificar_portal(cnpj) == portal
+
+
+def _standby_bloqueio():
+    return exists().where(
+        and_(
+            SaldoStandby.num_pedido == CarteiraPrincipal.num_pedido,
+            SaldoStandby.status_standby.in_(STATUS_STANDBY_BLOQUEIO)
+        )
+    )
+
+
+# ─────────────────────────────────────────────────────────────
+# Carga dos fatos da rede (número fixo de queries)
+# ─────────────────────────────────────────────────────────────
+
+def carregar_fatos_rede(portal, cod_uf='SP'):
+    """
+    Carrega todos os fatos de uma rede (portal) para montar a tela.
+
+    Queries (cada uma no máximo uma vez, independente do tamanho da rede):
+    1. Clientes da carteira (GROUP BY CNPJ) — filtro de portal em Python
+    2. Itens da carteira dos CNPJs da rede
+    3. SUM(Separacao.qtd_saldo) não sincronizada por pedido/produto
+    4. Separações e NFs no CD agrupadas por pedido
+    5. NFs no CD (sincronizado_nf + nf_cd) da UF — filtro de portal em Python
+    6. Pedidos com saldo na carteira dos CNPJs com NF no CD
+    7. FaturamentoProduto das NFs no CD sem pedido na carteira
+    8. CadastroPalletizacao de todos os produtos envolvidos
+    9. CadastroSubRota ativas das UFs envolvidas
+    """
+    standby = _standby_bloqueio()
+
+    # 1. Clientes com saldo ativo fora de standby
+    clientes = db.session.query(
+        CarteiraPrincipal.cnpj_cpf,
+        CarteiraPrincipal.raz_social_red,
+        CarteiraPrincipal.nome_cidade,
+        CarteiraPrincipal.cod_uf,
+        CarteiraPrincipal.vendedor,
+        CarteiraPrincipal.equipe_vendas
+    ).filter(
+        CarteiraPrincipal.cod_uf == cod_uf,
+        CarteiraPrincipal.ativo == True,
+        CarteiraPrincipal.qtd_saldo_produto_pedido > 0,
+        ~standby
+    ).group_by(
+        CarteiraPrincipal.cnpj_cpf,
+        CarteiraPrincipal.raz_social_red,
+        CarteiraPrincipal.nome_cidade,
+        CarteiraPrincipal.cod_uf,
+        CarteiraPrincipal.vendedor,
+        CarteiraPrincipal.equipe_vendas
+    ).all()
+    clientes = [c for c in clientes if _pertence_portal(c.cnpj_cpf, portal)]
+    cnpjs = sorted({c.cnpj_cpf for c in clientes})
+
+    itens = []
+    saldo_separado = {}
+    grupos_separacao = []
+    if cnpjs:
+        # 2. Itens da carteira (linha a linha, ordem estável)
+        itens = db.session.query(
+            CarteiraPrincipal.cnpj_cpf,
+            CarteiraPrincipal.num_pedido,
+            CarteiraPrincipal.data_pedido,
+            CarteiraPrincipal.pedido_cliente,
+            CarteiraPrincipal.observ_ped_1,
+            CarteiraPrincipal.cod_produto,
+            CarteiraPrincipal.qtd_saldo_produto_pedido,
+            CarteiraPrincipal.preco_produto_pedido
+        ).filter(
+            CarteiraPrincipal.cnpj_cpf.in_(cnpjs),
+            CarteiraPrincipal.ativo == True,
+            CarteiraPrincipal.qtd_saldo_produto_pedido > 0,
+            ~standby
+        ).order_by(CarteiraPrincipal.id).all()
+
+        pedidos = sorted({i.num_pedido for i in itens})
+        if pedidos:
+            # 3. Quantidade já separada (não sincronizada) por pedido/produto
+            saldo_separado = {
+                (r.num_pedido, r.cod_produto): _dec(r.qtd)
+                for r in db.session.query(
+                    Separacao.num_pedido,
+                    Separacao.cod_produto,
+                    func.sum(Separacao.qtd_saldo).label('qtd')
+                ).filter(
+                    Separacao.num_pedido.in_(pedidos),
+                    Separacao.sincronizado_nf == False
+                ).group_by(
+                    Separacao.num_pedido,
+                    Separacao.cod_produto
+                )
+            }
+
+            # 4. Separações (lote) e NFs no CD (numero_nf) dos pedidos
+            grupos_separacao = db.session.query(
+                Separacao.num_pedido,
+                Separacao.sincronizado_nf,
+                Separacao.separacao_lote_id,
+                Separacao.numero_nf,
+                Separacao.status,
+                Separacao.expedicao,
+                Separacao.agendamento,
+                Separacao.agendamento_confirmado,
+                Separacao.protocolo,
+                func.sum(Separacao.valor_saldo).label('valor_total'),
+                func.sum(Separacao.peso).label('peso_total'),
+                func.sum(Separacao.pallet).label('pallet_total')
+            ).filter(
+                Separacao.num_pedido.in_(pedidos),
+                Separacao.qtd_saldo > 0,
+                or_(
+                    Separacao.sincronizado_nf == False,
+                    and_(Separacao.sincronizado_nf == True, Separacao.nf_cd == True)
+                )
+            ).group_by(
+                Separacao.num_pedido,
+                Separacao.sincronizado_nf,
+                Separacao.separacao_lote_id,
+                Separacao.numero_nf,
+                Separacao.status,
+                Separacao.expedicao,
+                Separacao.agendamento,
+                Separacao.agendamento_confirmado,
+                Separacao.protocolo
+            ).order_by(
+                Separacao.num_pedido,
+                Separacao.expedicao,
+                Separacao.separacao_lote_id,
+                Separacao.numero_nf
+            ).all()
+
+    # 5. NFs no CD da UF (pertencentes à rede)
+    nfs_cd = db.session.query(
+        Separacao.cnpj_cpf,
+        Separacao.raz_social_red,
+        Separacao.nome_cidade,
+        Separacao.cod_uf,
+        Separacao.numero_nf,
+        Separacao.num_pedido,
+        Separacao.status,
+        Separacao.expedicao,
+        Separacao.agendamento,
+        Separacao.agendamento_confirmado,
+        Separacao.protocolo
+    ).filter(
+        Separacao.sincronizado_nf == True,
+        Separacao.nf_cd == True,
+        Separacao.cod_uf == cod_uf
+    ).order_by(Separacao.id).all()
+    nfs_cd = [n for n in nfs_cd if _pertence_portal(n.cnpj_cpf, portal)]
+
+    nfs_sem_carteira = []
+    faturamento = {}
+    if nfs_cd:
+        # 6. Pedidos com saldo na carteira (qualquer status) desses CNPJs
+        cnpjs_nf = sorted({n.cnpj_cpf for n in nfs_cd})
+        pedidos_com_saldo = {}
+        for r in db.session.query(
+            CarteiraPrincipal.cnpj_cpf,
+            CarteiraPrincipal.num_pedido
+        ).filter(
+            CarteiraPrincipal.cnpj_cpf.in_(cnpjs_nf),
+            CarteiraPrincipal.qtd_saldo_produto_pedido > 0
+        ).distinct():
+            pedidos_com_saldo.setdefault(r.cnpj_cpf, set()).add(r.num_pedido)
+
+        # NFs sem pedido correspondente na carteira (NOT IN do SQL: NULL não entra)
+        for nf in nfs_cd:
+            pedidos_cnpj = pedidos_com_saldo.get(nf.cnpj_cpf)
+            if not pedidos_cnpj or (nf.num_pedido is not None and nf.num_pedido not in pedidos_cnpj):
+                nfs_sem_carteira.append(nf)
+
+        # 7. Produtos faturados dessas NFs
+        numeros_nf = sorted({n.numero_nf for n in nfs_sem_carteira if n.numero_nf})
+        if numeros_nf:
+            for r in db.session.query(
+                FaturamentoProduto.numero_nf,
+                FaturamentoProduto.cod_produto,
+                FaturamentoProduto.valor_produto_faturado,
+                FaturamentoProduto.qtd_produto_faturado,
+                FaturamentoProduto.peso_total
+            ).filter(
+                FaturamentoProduto.numero_nf.in_(numeros_nf)
+            ).order_by(FaturamentoProduto.id):
+                faturamento.setdefault(r.numero_nf, []).append(r)
+
+    # 8. Palletização de todos os produtos (carteira + faturamento)
+    produtos = {i.cod_produto for i in itens}
+    produtos.update(r.cod_produto for linhas in faturamento.values() for r in linhas)
+    palletizacao = {}
+    if produtos:
+        palletizacao = {
+            r.cod_produto: (_dec(r.peso_bruto), _dec(r.palletizacao))
+            for r in db.session.query(
+                CadastroPalletizacao.cod_produto,
+                CadastroPalletizacao.peso_bruto,
+                CadastroPalletizacao.palletizacao
+            ).filter(CadastroPalletizacao.cod_produto.in_(sorted(produtos)))
+        }
+
+    # 9. Sub-rotas ativas das UFs (cidade comparada sem acentos)
+    ufs = {c.cod_uf for c in clientes if c.cod_uf} | {n.cod_uf for n in nfs_sem_carteira if n.cod_uf}
+    sub_rotas = {}
+    if ufs:
+        for r in db.session.query(
+            CadastroSubRota.cod_uf,
+            CadastroSubRota.nome_cidade,
+            CadastroSubRota.sub_rota
+        ).filter(
+            CadastroSubRota.cod_uf.in_(sorted(ufs)),
+            CadastroSubRota.ativa == True
+        ).order_by(CadastroSubRota.id):
+            if r.nome_cidade:
+                sub_rotas.setdefault((r.cod_uf, remover_acentos(r.nome_cidade)), r.sub_rota)
+
+    return {
+        'clientes': clientes,
+        'itens': itens,
+        'saldo_separado': saldo_separado,
+        'grupos_separacao': grupos_separacao,
+        'nfs_sem_carteira': nfs_sem_carteira,
+        'faturamento': faturamento,
+        'palletizacao': palletizacao,
+        'sub_rotas': sub_rotas,
+    }
+
+
+# ─────────────────────────────────────────────────────────────
+# Montagem em memória
+# ─────────────────────────────────────────────────────────────
+
+def _sub_rota(sub_rotas, nome_cidade, cod_uf):
+    if not nome_cidade or not cod_uf:
+        return None
+    return sub_rotas.get((cod_uf, remover_acentos(nome_cidade)))
+
+
+def _nova_loja(cnpj, raz_social, cidade, uf, vendedor, equipe_vendas, sub_rota):
+    return {
+        'cnpj': cnpj,
+        'cnpj_formatado': GrupoEmpresarial.formatar_cnpj(cnpj),
+        'raz_social': raz_social,
+        'cidade': cidade,
+        'uf': uf,
+        'vendedor': vendedor,
+        'equipe_vendas': equipe_vendas,
+        'sub_rota': sub_rota,
+        'pedidos': [],
+        'total_valor': Decimal('0'),
+        'total_peso': Decimal('0'),
+        'total_pallets': Decimal('0'),
+        'qtd_pedidos': 0,
+        'qtd_separacoes': 0,
+        'qtd_nf_cd': 0,
+        # Campos para cores condicionais
+        'tem_protocolo': False,
+        'agendamento_confirmado': False,
+        'tem_pendencias': False,
+        'expedicao_sugerida': '',
+        'agendamento_sugerido': '',
+        'protocolo': ''
+    }
+
+
+def _novo_pedido(item):
+    return {
+        'num_pedido': item.num_pedido,
+        'data_pedido': item.data_pedido,
+        'pedido_cliente': item.pedido_cliente,
+        'observacoes': item.observ_ped_1,
+        'status': 'PENDENTE',
+        'separacoes': [],
+        'nfs_cd': [],
+        'qtd_pendente': Decimal('0'),
+        'valor_pendente': Decimal('0'),
+        'peso_pendente': Decimal('0'),
+        'pallets_pendente': Decimal('0'),
+        'valor_original': Decimal('0'),
+        'peso_original': Decimal('0'),
+        'pallets_original': Decimal('0')
+    }
+
+
+def _somar_item_pedido(pedido, item, palletizacao, separado_restante):
+    """Totais originais e pendentes (carteira - separado não sincronizado) de um item."""
+    qtd = _dec(item.qtd_saldo_produto_pedido)
+    preco = _dec(item.preco_produto_pedido)
+    peso_bruto, fator_pallet = palletizacao.get(item.cod_produto, (None, None))
+
+    pedido['valor_original'] += qtd * preco
+    if peso_bruto is not None:
+        pedido['peso_original'] += qtd * peso_bruto
+        if fator_pallet > 0:
+            pedido['pallets_original'] += qtd / fator_pallet
+
+    # O separado do produto é abatido uma vez só, mesmo com várias linhas do produto
+    chave = (item.num_pedido, item.cod_produto)
+    separado = separado_restante.get(chave, Decimal('0'))
+    abatido = max(Decimal('0'), min(separado, qtd))
+    separado_restante[chave] = separado - abatido
+
+    qtd_pendente = qtd - abatido
+    if qtd_pendente > 0:
+        pedido['qtd_pendente'] += qtd_pendente
+        pedido['valor_pendente'] += qtd_pendente * preco
+        if peso_bruto is not None:
+            pedido['peso_pendente'] += qtd_pendente * peso_bruto
+            if fator_pallet > 0:
+                pedido['pallets_pendente'] += qtd_pendente / fator_pallet
+
+
+def _adicionar_grupos_separacao(pedidos, grupos_separacao):
+    """Separações (por lote) e NFs no CD (por número) de cada pedido."""
+    agregados = {}
+    for g in grupos_separacao:
+        pedido = pedidos.get(g.num_pedido)
+        if pedido is None:
+            continue
+        base = (g.status, g.expedicao, g.agendamento, g.agendamento_confirmado, g.protocolo)
+        if not g.sincronizado_nf:
+            chave = (g.num_pedido, 'sep', g.separacao_lote_id) + base
+            registro = agregados.get(chave)
+            if registro is None:
+                registro = {
+                    'separacao_lote_id': g.separacao_lote_id,
+                    'status': g.status,
+                    'expedicao': g.expedicao,
+                    'agendamento': g.agendamento,
+                    'agendamento_confirmado': g.agendamento_confirmado,
+                    'protocolo': g.protocolo,
+                    'valor_total': Decimal('0'),
+                    'peso_total': Decimal('0'),
+                    'pallet_total': Decimal('0')
+                }
+                agregados[chave] = registro
+                pedido['separacoes'].append(registro)
+            registro['valor_total'] += _dec(g.valor_total)
+            registro['peso_total'] += _dec(g.peso_total)
+            registro['pallet_total'] += _dec(g.pallet_total)
+        else:
+            chave = (g.num_pedido, 'nf', g.numero_nf) + base
+            registro = agregados.get(chave)
+            if registro is None:
+                registro = {
+                    'numero_nf': g.numero_nf,
+                    'status': g.status,
+                    'expedicao': g.expedicao,
+                    'agendamento': g.agendamento,
+                    'agendamento_confirmado': g.agendamento_confirmado,
+                    'protocolo': g.protocolo,
+                    'valor': Decimal('0'),
+                    'peso': Decimal('0'),
+                    'pallet': Decimal('0')
+                }
+                agregados[chave] = registro
+                pedido['nfs_cd'].append(registro)
+            registro['valor'] += _dec(g.valor_total)
+            registro['peso'] += _dec(g.peso_total)
+            registro['pallet'] += _dec(g.pallet_total)
+
+
+def _totais_nf(produtos_faturados, palletizacao):
+    """Valor, peso e pallets de uma NF a partir dos produtos faturados."""
+    valor = peso = pallets = Decimal('0')
+    for prod in produtos_faturados:
+        valor += _dec(prod.valor_produto_faturado)
+        peso_bruto, fator_pallet = palletizacao.get(prod.cod_produto, (None, None))
+
+        # Usar peso_total se disponível, senão calcular
+        if prod.peso_total:
+            peso += _dec(prod.peso_total)
+        elif peso_bruto is not None and prod.qtd_produto_faturado:
+            peso += _dec(prod.qtd_produto_faturado) * peso_bruto
+
+        if fator_pallet and fator_pallet > 0 and prod.qtd_produto_faturado:
+            pallets += _dec(prod.qtd_produto_faturado) / fator_pallet
+    return valor, peso, pallets
+
+
+def _adicionar_nfs_sem_carteira(lojas, fatos):
+    """NFs no CD sem pedido na carteira viram pedido especial "NF no CD s/ Cart."."""
+    nfs_por_cnpj = {}
+    for nf in fatos['nfs_sem_carteira']:
+        nfs = nfs_por_cnpj.setdefault(nf.cnpj_cpf, {})
+        if nf.numero_nf in nfs:
+            continue
+        nfs[nf.numero_nf] = nf
+
+        if nf.cnpj_cpf not in lojas:
+            lojas[nf.cnpj_cpf] = _nova_loja(
+                nf.cnpj_cpf, nf.raz_social_red, nf.nome_cidade, nf.cod_uf, None, None,
+                _sub_rota(fatos['sub_rotas'], nf.nome_cidade, nf.cod_uf)
+            )
+        loja = lojas[nf.cnpj_cpf]
+
+        valor, peso, pallets = _totais_nf(fatos['faturamento'].get(nf.numero_nf, []), fatos['palletizacao'])
+        nf_data = {
+            'numero_nf': nf.numero_nf,
+            'num_pedido': nf.num_pedido,
+            'status': nf.status,
+            'expedicao': nf.expedicao,
+            'agendamento': nf.agendamento,
+            'agendamento_confirmado': nf.agendamento_confirmado,
+            'protocolo': nf.protocolo,
+            'valor': valor,
+            'peso': peso,
+            'pallets': pallets
+        }
+        loja['pedidos'].append({
+            'num_pedido': nf.num_pedido,
+            'data_pedido': None,
+            'pedido_cliente': None,
+            'observacoes': 'NF no CD sem pedido na carteira',
+            'status': 'NF_CD_SEM_CARTEIRA',
+            'separacoes': [],
+            'nfs_cd': [nf_data],
+            'qtd_pendente': Decimal('0'),
+            'valor_pendente': Decimal('0'),
+            'peso_pendente': Decimal('0'),
+            'pallets_pendente': Decimal('0')
+        })
+        loja['qtd_nf_cd'] += 1
+        loja['total_valor'] += valor
+        loja['total_peso'] += peso
+        loja['total_pallets'] += pallets
+
+
+def ordem_subrota(loja):
+    """
+    Ordenação da tela:
+    - None (sem sub-rota) vai para o início (0)
+    - Sub-rota "D" vai para o final (999)
+    - Outras sub-rotas ordenadas alfabeticamente
+    """
+    sub_rota = loja.get('sub_rota')
+    if sub_rota is None:
+        return (0, '')
+    elif sub_rota.upper() == 'D':
+        return (999, '')
+    else:
+        return (1, sub_rota.upper())
+
+
+def montar_lojas(fatos, hoje=None):
+    """
+    Monta os CNPJs da rede (formato da tela) a partir dos fatos carregados.
+    Puro: nenhuma query.
+    """
+    lojas = {}
+    for cliente in fatos['clientes']:
+        if cliente.cnpj_cpf not in lojas:
+            lojas[cliente.cnpj_cpf] = _nova_loja(
+                cliente.cnpj_cpf, cliente.raz_social_red, cliente.nome_cidade, cliente.cod_uf,
+                cliente.vendedor, cliente.equipe_vendas,
+                _sub_rota(fatos['sub_rotas'], cliente.nome_cidade, cliente.cod_uf)
+            )
+
+    # Pedidos da carteira: um por num_pedido (mesmo com variações de cadastro do cliente)
+    pedidos = {}
+    separado_restante = dict(fatos['saldo_separado'])
+    for item in fatos['itens']:
+        pedido = pedidos.get(item.num_pedido)
+        if pedido is None:
+            pedido = _novo_pedido(item)
+            pedidos[item.num_pedido] = pedido
+            lojas[item.cnpj_cpf]['pedidos'].append(pedido)
+        _somar_item_pedido(pedido, item, fatos['palletizacao'], separado_restante)
+
+    _adicionar_grupos_separacao(pedidos, fatos['grupos_separacao'])
+
+    for loja in lojas.values():
+        loja['qtd_pedidos'] = len(loja['pedidos'])
+        for pedido in loja['pedidos']:
+            loja['total_valor'] += pedido['valor_original']
+            loja['total_peso'] += pedido['peso_original']
+            loja['total_pallets'] += pedido['pallets_original']
+
+    _adicionar_nfs_sem_carteira(lojas, fatos)
+
+    for loja in lojas.values():
+        analisar_status_cnpj(loja, hoje)
+
+    return sorted(lojas.values(), key=ordem_subrota)
+
+
+def analisar_rede(portal, com_viabilidade=False):
+    """
+    CNPJs da rede prontos para a tela/export.
+
+    com_viabilidade=True: cada loja recebe 'viabilidade' (ruptura x estoque
+    projetado e datas sugeridas de expedição/agendamento) calculada para a
+    rede inteira de uma vez (mesmo algoritmo do botão "Sugerir Datas").
+    """
+    lojas = montar_lojas(carregar_fatos_rede(portal))
+
+    if com_viabilidade and lojas:
+        cnpjs = [loja['cnpj'] for loja in lojas]
+        resultado = sugerir_datas_cnpjs(cnpjs, {cnpj: i for i, cnpj in enumerate(cnpjs)})
+        demanda = resultado['demanda']['por_cnpj']
+        for loja in lojas:
+            sugestao = resultado['sugestoes'].get(loja['cnpj'])
+            produtos = demanda.get(loja['cnpj'], {})
+            loja['viabilidade'] = {
+                'tem_ruptura': bool(sugestao and sugestao['tem_ruptura']),
+                'produtos': len(produtos),
+                'produtos_ruptura': len(set(produtos) & resultado['produtos_ruptura']),
+                'expedicao': sugestao['expedicao'] if sugestao else '',
+                'agendamento': sugestao['agendamento'] if sugestao else '',
+            }
+
+    return lojas
+
+
+def analisar_status_cnpj(dados_cnpj, hoje=None):
+    """
+    Analisa os pedidos e separações para determinar status e cores
+    Hierarquia de prioridade: Reagendar > Consolidar > Ag. Aprovação > Pronto > Pendente
+    
+    Status 1 - "Ag. Aprovação": protocolo em todas, agendamento futuro, não confirmado, sem saldo pendente
+    Status 2 - "Pronto": protocolo em todas, agendamento futuro, confirmado, sem saldo pendente
+    Status 3 - "Reagendar": agendamento passado
+    Status 4 - "Consolidar": agendamento futuro + (protocolo parcial OU protocolos diferentes OU saldo parcial)
+    Status 5 - "Pendente": sem separação/NF ou sem protocolo algum
+    """
+    hoje = hoje or agora_utc_naive().date()
+    
+    # Variáveis de análise
+    tem_separacao_ou_nf = False
+    tem_agendamento_passado = False
+    tem_agendamento_futuro = False
+    todos_tem_protocolo = False  # Só True se HOUVER separações E todas tiverem protocolo
+    algum_tem_protocolo = False
+    protocolos_iguais = True
+    algum_confirmado = False
+    todos_confirmados = False  # Só True se HOUVER separações E todas estiverem confirmadas
+    tem_saldo_pendente_sem_separacao = False  # Saldo que não está em Separação
+    tem_saldo_pendente_parcial = False  # Saldo pendente mas não é o total do CNPJ
+    primeiro_protocolo = None
+    
+    # Variáveis para capturar datas sugeridas
+    data_expedicao_sugerida = None
+    data_agendamento_sugerida = None
+    
+    # Contadores para validação
+    total_separacoes_nfs = 0
+    separacoes_com_protocolo = 0
+    separacoes_confirmadas = 0
+    
+    # Variáveis para análise de saldo
+    total_pedidos_cnpj = 0
+    pedidos_com_saldo_pendente = 0
+    
+    # Analisar todos os pedidos
+    for pedido in dados_cnpj['pedidos']:
+        total_pedidos_cnpj += 1
+        
+        # Verificar saldo pendente do pedido
+        qtd_pendente = pedido.get('qtd_pendente', 0)
+        if qtd_pendente > 0:
+            pedidos_com_saldo_pendente += 1
+            
+            # Verificar se há separações para este pedido
+            pedido_tem_separacao = len(pedido.get('separacoes', [])) > 0 or len(pedido.get('nfs_cd', [])) > 0
+            
+            if not pedido_tem_separacao:
+                # Há saldo sem nenhuma separação
+                tem_saldo_pendente_sem_separacao = True
+            else:
+                # Há saldo mas tem algumas separações (parcial)
+                tem_saldo_pendente_parcial = True
+        
+        # Verificar separações
+        for sep in pedido.get('separacoes', []):
+            tem_separacao_ou_nf = True
+            total_separacoes_nfs += 1
+            
+            # Verificar protocolo
+            if sep.get('protocolo'):
+                algum_tem_protocolo = True
+                separacoes_com_protocolo += 1
+                if primeiro_protocolo is None:
+                    primeiro_protocolo = sep.get('protocolo')
+                elif primeiro_protocolo != sep.get('protocolo'):
+                    protocolos_iguais = False
+            
+            # Verificar confirmação
+            if sep.get('agendamento_confirmado'):
+                algum_confirmado = True
+                separacoes_confirmadas += 1
+            
+            # Verificar datas de agendamento
+            if sep.get('agendamento'):
+                data_agenda = sep.get('agendamento')
+                if isinstance(data_agenda, str):
+                    data_agenda = date.fromisoformat(data_agenda)
+                if data_agenda:
+                    if data_agenda < hoje:
+                        tem_agendamento_passado = True
+                    else:
+                        tem_agendamento_futuro = True
+                        # Capturar primeira data de agendamento futura para sugestão
+                        if data_agendamento_sugerida is None:
+                            data_agendamento_sugerida = data_agenda
+                            # Capturar expedição se disponível
+                            if sep.get('expedicao'):
+                                data_exp = sep.get('expedicao')
+                                if isinstance(data_exp, str):
+                                    data_exp = date.fromisoformat(data_exp)
+                                data_expedicao_sugerida = data_exp
+        
+        # Verificar NFs no CD
+        for nf in pedido.get('nfs_cd', []):
+            tem_separacao_ou_nf = True
+            total_separacoes_nfs += 1
+            
+            # Verificar protocolo
+            if nf.get('protocolo'):
+                algum_tem_protocolo = True
+                separacoes_com_protocolo += 1
+                if primeiro_protocolo is None:
+                    primeiro_protocolo = nf.get('protocolo')
+                elif primeiro_protocolo != nf.get('protocolo'):
+                    protocolos_iguais = False
+            
+            # Verificar confirmação
+            if nf.get('agendamento_confirmado'):
+                algum_confirmado = True
+                separacoes_confirmadas += 1
+            
+            # Verificar datas de agendamento
+            if nf.get('agendamento'):
+                data_agenda = nf.get('agendamento')
+                if isinstance(data_agenda, str):
+                    data_agenda = date.fromisoformat(data_agenda)
+                if data_agenda:
+                    if data_agenda < hoje:
+                        tem_agendamento_passado = True
+                    else:
+                        tem_agendamento_futuro = True
+                        # Capturar primeira data de agendamento futura para sugestão
+                        if data_agendamento_sugerida is None:
+                            data_agendamento_sugerida = data_agenda
+                            # Capturar expedição se disponível
+                            if nf.get('expedicao'):
+                                data_exp = nf.get('expedicao')
+                                if isinstance(data_exp, str):
+                                    data_exp = date.fromisoformat(data_exp)
+                                data_expedicao_sugerida = data_exp
+    
+    # Recalcular variáveis booleanas baseado nos contadores
+    if total_separacoes_nfs > 0:
+        # Só pode ser "todos têm protocolo" se houver separações E todas tiverem
+        todos_tem_protocolo = (separacoes_com_protocolo == total_separacoes_nfs)
+        # Só pode ser "todos confirmados" se houver separações E todas estiverem confirmadas
+        todos_confirmados = (separacoes_confirmadas == total_separacoes_nfs)
+    else:
+        # Se não há separações, não pode dizer que "todos têm" algo
+        todos_tem_protocolo = False
+        todos_confirmados = False
+    
+    # Verificar se é saldo pendente parcial (não é o total do CNPJ)
+    # Se todos os pedidos têm saldo pendente, então é total, não parcial
+    if pedidos_com_saldo_pendente == total_pedidos_cnpj and pedidos_com_saldo_pendente > 0:
+        # Todos os pedidos têm saldo pendente - é total, não parcial
+        tem_saldo_pendente_parcial = False
+    
+    # CORREÇÃO IMPORTANTE: Se não há agendamento passado e há separações/NFs, considerar como "potencial futuro"
+    # Isso é necessário para casos onde o agendamento ainda não foi preenchido
+    tem_potencial_agendamento_futuro = (not tem_agendamento_passado and tem_separacao_ou_nf)
+    
+    # Log para debug
+    logger.debug(f"CNPJ {dados_cnpj.get('cnpj')} - Análise de status:")
+    logger.debug(f"  - tem_separacao_ou_nf: {tem_separacao_ou_nf}")
+    logger.debug(f"  - total_separacoes_nfs: {total_separacoes_nfs}")
+    logger.debug(f"  - separacoes_com_protocolo: {separacoes_com_protocolo}")
+    logger.debug(f"  - todos_tem_protocolo: {todos_tem_protocolo}")
+    logger.debug(f"  - algum_tem_protocolo: {algum_tem_protocolo}")
+    logger.debug(f"  - todos_confirmados: {todos_confirmados}")
+    logger.debug(f"  - tem_saldo_pendente_sem_separacao: {tem_saldo_pendente_sem_separacao}")
+    logger.debug(f"  - tem_saldo_pendente_parcial: {tem_saldo_pendente_parcial}")
+    logger.debug(f"  - tem_agendamento_passado: {tem_agendamento_passado}")
+    logger.debug(f"  - tem_agendamento_futuro: {tem_agendamento_futuro}")
+    logger.debug(f"  - tem_potencial_agendamento_futuro: {tem_potencial_agendamento_futuro}")
+    
+    # Determinar status baseado na hierarquia
+    # IMPORTANTE: A ordem de verificação IMPORTA devido à prioridade
+    status = 'Pendente'
+    cor_linha = ''  # sem cor especial
+    icone = 'fa-hourglass-half'  # ícone padrão
+    
+    # 1. STATUS 3 - REAGENDAR (prioridade máxima)
+    # Condição: Caso tenha algum agendamento preenchido < hoje
+    if tem_agendamento_passado:
+        status = 'Reagendar'
+        cor_linha = 'table-danger'  # vermelho
+        icone = 'fa-redo'
+        logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Status REAGENDAR (agendamento passado)")
+    
+    # 2. STATUS 4 - CONSOLIDAR 
+    # Condição obrigatória: As datas de agendamento que estiverem preenchidas sejam futuras (ou não haver passado)
+    # Condições opcionais (qualquer uma dispara): protocolo parcial, protocolos diferentes, saldo pendente parcial
+    elif tem_agendamento_futuro or tem_potencial_agendamento_futuro:
+        precisa_consolidar = False
+        motivo_consolidar = []
+        
+        # Condição opcional 1: Haja protocolo porém não em todas as Separações/NF no CD
+        if algum_tem_protocolo and not todos_tem_protocolo:
+            precisa_consolidar = True
+            motivo_consolidar.append("protocolo parcial")
+        
+        # Condição opcional 2: Haja protocolo em todas as separações porém não são iguais
+        if todos_tem_protocolo and not protocolos_iguais:
+            precisa_consolidar = True
+            motivo_consolidar.append("protocolos diferentes")
+        
+        # Condição opcional 3: Haja saldo pendente sem separação porém que não seja o total do CNPJ
+        if tem_saldo_pendente_parcial:
+            precisa_consolidar = True
+            motivo_consolidar.append("saldo pendente parcial")
+        
+        if precisa_consolidar:
+            status = 'Consolidar'
+            cor_linha = 'table-warning'  # amarelo
+            icone = 'fa-exclamation-triangle'
+            logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Status CONSOLIDAR (motivos: {', '.join(motivo_consolidar)})")
+        # Para Ag. Aprovação e Pronto, EXIGIR que tenha agendamento futuro preenchido
+        elif tem_agendamento_futuro:
+            # Tem agendamento futuro mas não precisa consolidar, vamos verificar os próximos status
+            logger.debug(f"  => CNPJ {dados_cnpj.get('cnpj')}: Tem agendamento futuro, verificando Ag. Aprovação/Pronto...")
+            
+            # 3. STATUS 1 - AG. APROVAÇÃO
+            # Condições: protocolo em todas, agendamento futuro, não confirmado, sem saldo pendente sem separação
+            if (todos_tem_protocolo and not todos_confirmados and not tem_saldo_pendente_sem_separacao):
+                status = 'Ag. Aprovação'
+                cor_linha = 'table-info'  # azul
+                icone = 'fa-clock'
+                logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Status AG. APROVAÇÃO")
+            
+            # 4. STATUS 2 - PRONTO
+            # Condições: protocolo em todas, agendamento futuro, confirmado, sem saldo pendente sem separação
+            elif (todos_tem_protocolo and todos_confirmados and not tem_saldo_pendente_sem_separacao):
+                status = 'Pronto'
+                cor_linha = 'table-success'  # azul (mantendo success para verde/azul)
+                icone = 'fa-check-circle'
+                logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Status PRONTO")
+            else:
+                logger.debug(f"  => CNPJ {dados_cnpj.get('cnpj')}: Não atende Ag. Aprovação/Pronto. todos_tem_protocolo={todos_tem_protocolo}, todos_confirmados={todos_confirmados}, tem_saldo_pendente_sem_separacao={tem_saldo_pendente_sem_separacao}")
+        else:
+            # Tem potencial futuro mas sem agendamento preenchido, fica como pendente
+            logger.debug(f"  => CNPJ {dados_cnpj.get('cnpj')}: Sem agendamento preenchido, mantendo como Pendente")
+    
+    # 5. STATUS 5 - PENDENTE (default)
+    # Condições: Não haja Separação e nem NF no CD OU Não haja protocolo em nenhuma Separação ou NF no CD
+    else:
+        status = 'Pendente'
+        cor_linha = ''  # sem cor (linha na cor original)
+        icone = 'fa-hourglass-half'
+        logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Status PENDENTE (não tem agendamento ou não tem separação/protocolo)")
+    
+    # Log do status final determinado
+    logger.debug(f"  => Status final: {status} (cor: {cor_linha})")
+    
+    # Atualizar dados do CNPJ com status e indicadores visuais
+    dados_cnpj['status'] = status
+    dados_cnpj['cor_linha'] = cor_linha
+    dados_cnpj['icone_status'] = icone
+    dados_cnpj['tem_protocolo'] = algum_tem_protocolo
+    dados_cnpj['agendamento_confirmado'] = algum_confirmado
+    
+    # Preencher datas sugeridas quando status for "Ag. Aprovação" ou "Pronto"
+    if status in ['Ag. Aprovação', 'Pronto'] and data_agendamento_sugerida:
+        # Formatar as datas para input date HTML (YYYY-MM-DD)
+        dados_cnpj['agendamento_sugerido'] = data_agendamento_sugerida.strftime('%Y-%m-%d') if data_agendamento_sugerida else ''
+        dados_cnpj['expedicao_sugerida'] = data_expedicao_sugerida.strftime('%Y-%m-%d') if data_expedicao_sugerida else ''
+        logger.info(f"  => CNPJ {dados_cnpj.get('cnpj')}: Datas preenchidas - Expedição: {dados_cnpj['expedicao_sugerida']}, Agendamento: {dados_cnpj['agendamento_sugerido']}")
+    else:
+        dados_cnpj['agendamento_sugerido'] = ''
+        dados_cnpj['expedicao_sugerida'] = ''
+    
+    # Indicador de pendências: reagendamento necessário ou consolidação necessária
+    dados_cnpj['tem_pendencias'] = status in ['Reagendar', 'Consolidar']
+
+
+# ─────────────────────────────────────────────────────────────
+# Estoques da rede (analisar_estoques)
+# ─────────────────────────────────────────────────────────────
+
+def projetar_estoques_rede(cnpjs_rede, dias=DIAS_PROJECAO_ESTOQUE):
+    """
+    Somatória dos itens da rede com estoque atual e data disponível.
+
+    4 queries agrupadas (produtos da rede, estoque, saídas de outros clientes
+    por dia, produções por dia) no lugar de 1 + produtos x (1 + 2 x dias).
+    """
+    hoje = agora_utc_naive().date()
+    data_fim = hoje + timedelta(days=dias - 1)
+
+    produtos_rede = db.session.query(
+        CarteiraPrincipal.cod_produto,
+        CarteiraPrincipal.nome_produto,
+        func.sum(CarteiraPrincipal.qtd_saldo_produto_pedido).label('qtd_total'),
+        func.sum(CarteiraPrincipal.qtd_saldo_produto_pedido * CarteiraPrincipal.preco_produto_pedido).label('valor_total')
+    ).filter(
+        CarteiraPrincipal.cnpj_cpf.in_(cnpjs_rede)
+    ).group_by(
+        CarteiraPrincipal.cod_produto,
+        CarteiraPrincipal.nome_produto
+    ).all()
+    if not produtos_rede:
+        return []
+
+    codigos = sorted({p.cod_produto for p in produtos_rede})
+
+    estoques = dict(db.session.query(
+        MovimentacaoEstoque.cod_produto,
+        func.sum(MovimentacaoEstoque.qtd_movimentacao)
+    ).filter(
+        MovimentacaoEstoque.cod_produto.in_(codigos),
+        MovimentacaoEstoque.ativo == True
+    ).group_by(MovimentacaoEstoque.cod_produto).all())
+
+    # Saídas de OUTROS clientes (a rede é o que está sendo programado)
+    saidas = {
+        (r.cod_produto, r.data): float(r.qtd or 0)
+        for r in db.session.query(
+            Separacao.cod_produto,
+            Separacao.expedicao.label('data'),
+            func.sum(Separacao.qtd_saldo).label('qtd')
+        ).filter(
+            Separacao.cod_produto.in_(codigos),
+            Separacao.expedicao.between(hoje, data_fim),
+            Separacao.sincronizado_nf == False,
+            ~Separacao.cnpj_cpf.in_(cnpjs_rede)
+        ).group_by(Separacao.cod_produto, Separacao.expedicao)
+    }
+
+    producoes = {
+        (r.cod_produto, r.data): float(r.qtd or 0)
+        for r in db.session.query(
+            ProgramacaoProducao.cod_produto,
+            ProgramacaoProducao.data_programacao.label('data'),
+            func.sum(ProgramacaoProducao.qtd_programada).label('qtd')
+        ).filter(
+            ProgramacaoProducao.cod_produto.in_(codigos),
+            ProgramacaoProducao.data_programacao.between(hoje, data_fim)
+        ).group_by(ProgramacaoProducao.cod_produto, ProgramacaoProducao.data_programacao)
+    }
+
+    resultado = []
+    for produto in produtos_rede:
+        estoque_atual = float(estoques.get(produto.cod_produto) or 0)
+        data_disponivel, saldo_projetado = projetar_saldo(
+            estoque_atual, float(produto.qtd_total), produto.cod_produto, saidas, producoes, hoje, dias
+        )
+        resultado.append({
+            'cod_produto': produto.cod_produto,
+            'nome_produto': produto.nome_produto,
+            'qtd_total': float(produto.qtd_total),
+            'valor_total': float(produto.valor_total or 0),
+            'estoque_atual': estoque_atual,
+            'data_disponivel': data_disponivel.strftime('%d/%m/%Y'),
+            'projecao_15_dias': saldo_projetado
+        })
+    return resultado
+
+
+def projetar_saldo(estoque_atual, qtd_necessaria, cod_produto, saidas, producoes, hoje, dias):
+    """
+    Saldo dia a dia (estoque - saídas + produções) e primeira data em que o
+    saldo cobre a quantidade necessária (hoje se nunca cobrir no horizonte).
+    Returns: (data_disponivel, saldo_final)
+    """
+    data_disponivel = hoje
+    saldo = estoque_atual
+    for i in range(dias):
+        data_projecao = hoje + timedelta(days=i)
+        saldo = saldo - saidas.get((cod_produto, data_projecao), 0) + producoes.get((cod_produto, data_projecao), 0)
+        if saldo >= qtd_necessaria and data_disponivel == hoje:
+            data_disponivel = data_projecao
+    return data_disponivel, saldo
+
+
+# ─────────────────────────────────────────────────────────────
+# Ruptura em lote (pedidos anteriores consomem o estoque)
+# ─────────────────────────────────────────────────────────────
+
+def analisar_ruptura_sequencial(cnpjs_ordenados, dias=30):
+    """
+    Disponibilidade por CNPJ na ordem de prioridade: cada CNPJ considera as
+    saídas acumuladas dos anteriores.
+
+    3 queries (itens dos CNPJs, estoque por produto, produções por
+    produto/data) no lugar de CNPJs x itens x (1 + dias).
+    """
+    hoje = agora_utc_naive().date()
+    if not cnpjs_ordenados:
+        return {}
+
+    itens = db.session.query(
+        CarteiraPrincipal.cnpj_cpf,
+        CarteiraPrincipal.cod_produto,
+        CarteiraPrincipal.qtd_saldo_produto_pedido
+    ).filter(
+        CarteiraPrincipal.cnpj_cpf.in_(cnpjs_ordenados)
+    ).order_by(CarteiraPrincipal.id).all()
+
+    itens_por_cnpj = {}
+    for item in itens:
+        itens_por_cnpj.setdefault(item.cnpj_cpf, []).append(
+            (item.cod_produto, float(item.qtd_saldo_produto_pedido))
+        )
+
+    codigos = sorted({item.cod_produto for item in itens})
+    estoques = {}
+    producoes = {}
+    if codigos:
+        estoques = {
+            cod: float(qtd or 0)
+            for cod, qtd in db.session.query(
+                MovimentacaoEstoque.cod_produto,
+                func.sum(MovimentacaoEstoque.qtd_movimentacao)
+            ).filter(
+                MovimentacaoEstoque.cod_produto.in_(codigos),
+                MovimentacaoEstoque.ativo == True
+            ).group_by(MovimentacaoEstoque.cod_produto)
+        }
+        for r in db.session.query(
+            ProgramacaoProducao.cod_produto,
+            ProgramacaoProducao.data_programacao,
+            func.sum(ProgramacaoProducao.qtd_programada).label('qtd')
+        ).filter(
+            ProgramacaoProducao.cod_produto.in_(codigos),
+            ProgramacaoProducao.data_programacao <= hoje + timedelta(days=dias - 1)
+        ).group_by(
+            ProgramacaoProducao.cod_produto,
+            ProgramacaoProducao.data_programacao
+        ):
+            producoes.setdefault(r.cod_produto, []).append((r.data_programacao, float(r.qtd or 0)))
+
+    return calcular_ruptura_sequencial(cnpjs_ordenados, itens_por_cnpj, estoques, producoes, hoje, dias)
+
+
+def _producao_acumulada(producoes_produto, hoje, dias):
+    """Produção programada acumulada até cada D+1..D+(dias-1) (sem limite inferior)."""
+    acumulada = []
+    for d in range(1, dias):
+        data_futura = hoje + timedelta(days=d)
+        acumulada.append((data_futura, sum(qtd for data, qtd in producoes_produto if data <= data_futura)))
+    return acumulada
+
+
+def calcular_ruptura_sequencial(cnpjs_ordenados, itens_por_cnpj, estoques, producoes, hoje, dias=30):
+    """Parte pura de analisar_ruptura_sequencial (mesmo formato da API)."""
+    resultado = {}
+    saidas_acumuladas = {}
+    acumuladas_cache = {}
+
+    for cnpj in cnpjs_ordenados:
+        disponibilidade = {}
+        data_completa = hoje
+
+        for cod_produto, qtd_necessaria in itens_por_cnpj.get(cnpj, []):
+            qtd_necessaria_total = qtd_necessaria + saidas_acumuladas.get(cod_produto, 0)
+            estoque_atual = estoques.get(cod_produto, 0)
+
+            if estoque_atual >= qtd_necessaria_total:
+                disponibilidade[cod_produto] = {'disponivel': True, 'percentual': 100.0}
+            else:
+                disponibilidade[cod_produto] = {
+                    'disponivel': False,
+                    'percentual': (estoque_atual / qtd_necessaria_total * 100) if qtd_necessaria_total > 0 else 0
+                }
+                if cod_produto not in acumuladas_cache:
+                    acumuladas_cache[cod_produto] = _producao_acumulada(producoes.get(cod_produto, []), hoje, dias)
+                for data_futura, producao in acumuladas_cache[cod_produto]:
+                    if estoque_atual + producao >= qtd_necessaria_total:
+                        if data_futura > data_completa:
+                            data_completa = data_futura
+                        break
+
+            saidas_acumuladas[cod_produto] = saidas_acumuladas.get(cod_produto, 0) + qtd_necessaria
+
+        total_itens = len(disponibilidade)
+        itens_disponiveis = sum(1 for d in disponibilidade.values() if d['disponivel'])
+        resultado[cnpj] = {
+            'data_completa': data_completa.strftime('%Y-%m-%d'),
+            'percentual_disponivel': (itens_disponiveis / total_itens * 100) if total_itens > 0 else 0,
+            'detalhes': disponibilidade
+        }
+
+    return resultado
+
+
+# ─────────────────────────────────────────────────────────────
+# Sugestão de datas (Projeção Batch + Greedy)
+# ─────────────────────────────────────────────────────────────
+
+def sugerir_datas_cnpjs(cnpjs, ordem=None):
+    """
+    Sugere expedição/agendamento para os CNPJs (algoritmo do "Sugerir Datas").
+
+    1. Expedicao D+2 uteis (seg-qui), agendamento D+1 calendario, max 30/dia
+    2. Projecao base excluindo CNPJs avaliados (4 queries batch)
+    3. Demanda por CNPJ via CarteiraPrincipal (1 query)
+    4-5. Classificar produtos: OK (menor_estoque_d7 >= demanda) vs ruptura
+    6. CNPJs com todos produtos OK -> data minima (fast-path)
+    7. CNPJs com ruptura -> otimizacao greedy (menor demanda primeiro)
+
+    Returns: {sugestoes, data_minima, distribuicao_dias, demanda, produtos_ruptura}
+    """
+    ordem = ordem or {}
+
+    # ─── PASSO 3: Coletar demanda dos CNPJs ───
+    demanda = _coletar_demanda_cnpjs(cnpjs)
+    cod_produtos_unicos = list(demanda['total_por_produto'].keys())
+
+    if not cod_produtos_unicos:
+        logger.info("Nenhum produto com saldo pendente para os CNPJs selecionados")
+        return {
+            'sugestoes': {},
+            'data_minima': agora_utc_naive().date(),
+            'distribuicao_dias': {},
+            'demanda': demanda,
+            'produtos_ruptura': set()
+        }
+
+    # ─── PASSO 2: Projecao base excluindo CNPJs avaliados ───
+    projecoes = ServicoEstoqueSimples.calcular_projecao_batch_sem_cnpjs(
+        cod_produtos_unicos, dias=28, cnpjs_excluir=cnpjs
+    )
+
+    # ─── PASSOS 4-5: Separar produtos OK vs ruptura ───
+    produtos_ok, produtos_ruptura = _classificar_produtos(
+        projecoes, demanda['total_por_produto']
+    )
+    logger.info(
+        f"Classificacao: {len(produtos_ok)} produtos OK, "
+        f"{len(produtos_ruptura)} produtos em ruptura"
+    )
+
+    # ─── PASSO 6: Classificar CNPJs (OK vs ruptura) ───
+    cnpjs_ok, cnpjs_ruptura = _classificar_cnpjs(
+        cnpjs, demanda['por_cnpj'], produtos_ruptura
+    )
+    logger.info(
+        f"CNPJs: {len(cnpjs_ok)} OK (fast-path), "
+        f"{len(cnpjs_ruptura)} com ruptura (greedy)"
+    )
+
+    # ─── Calcular data minima (D+2 uteis, seg-qui) ───
+    data_minima = _calcular_data_minima_expedicao(DIAS_UTEIS_EXPEDICAO)
+
+    # ─── Distribuir CNPJs OK (ordenados por prioridade) ───
+    sugestoes = {}
+    cnpjs_por_dia = {}
+
+    cnpjs_ok_ordenados = sorted(cnpjs_ok, key=lambda x: ordem.get(x, 999))
+    for cnpj in cnpjs_ok_ordenados:
+        data_exp = _proxima_data_disponivel(
+            data_minima, DIAS_UTEIS_EXPEDICAO, cnpjs_por_dia, MAX_CNPJS_POR_DIA
+        )
+        data_str = data_exp.strftime('%Y-%m-%d')
+        cnpjs_por_dia[data_str] = cnpjs_por_dia.get(data_str, 0) + 1
+        sugestoes[cnpj] = _montar_sugestao(data_exp, tem_ruptura=False)
+
+    # ─── PASSO 7: Otimizacao greedy para CNPJs com ruptura ───
+    if cnpjs_ruptura:
+        sugestoes_ruptura = _otimizar_cnpjs_ruptura(
+            cnpjs_ruptura, demanda, projecoes, produtos_ruptura,
+            data_minima, DIAS_UTEIS_EXPEDICAO, cnpjs_por_dia, MAX_CNPJS_POR_DIA
+        )
+        sugestoes.update(sugestoes_ruptura)
+
+    return {
+        'sugestoes': sugestoes,
+        'data_minima': data_minima,
+        'distribuicao_dias': cnpjs_por_dia,
+        'demanda': demanda,
+        'produtos_ruptura': produtos_ruptura
+    }
+
+
+def _coletar_demanda_cnpjs(cnpjs):
+    """
+    Coleta demanda de CarteiraPrincipal para os CNPJs selecionados.
+    1 query: GROUP BY cnpj_cpf, cod_produto -> SUM(qtd_saldo_produto_pedido)
+
+    Returns: {
+        'por_cnpj': {cnpj: {cod_produto: qtd}},
+        'total_por_produto': {cod_produto: sum_qtd_todos_cnpjs}
+    }
+    """
+    pedidos = db.session.query(
+        CarteiraPrincipal.cnpj_cpf,
+        CarteiraPrincipal.cod_produto,
+        func.sum(CarteiraPrincipal.qtd_saldo_produto_pedido).label('qtd_total')
+    ).filter(
+        CarteiraPrincipal.cnpj_cpf.in_(cnpjs),
+        CarteiraPrincipal.ativo == True,
+        CarteiraPrincipal.qtd_saldo_produto_pedido > 0
+    ).group_by(
+        CarteiraPrincipal.cnpj_cpf,
+        CarteiraPrincipal.cod_produto
+    ).all()
+
+    por_cnpj = {}
+    total_por_produto = {}
+
+    for p in pedidos:
+        cnpj = p.cnpj_cpf
+        cod = p.cod_produto
+        qtd = float(p.qtd_total or 0)
+
+        if qtd <= 0:
+            continue
+
+        if cnpj not in por_cnpj:
+            por_cnpj[cnpj] = {}
+        por_cnpj[cnpj][cod] = por_cnpj[cnpj].get(cod, 0) + qtd
+        total_por_produto[cod] = total_por_produto.get(cod, 0) + qtd
+
+    return {
+        'por_cnpj': por_cnpj,
+        'total_por_produto': total_por_produto
+    }
+
+
+def _classificar_produtos(projecoes, total_por_produto):
+    """
+    Passos 4-5: Produto OK se menor_estoque_d7 >= demanda_total de todos os CNPJs.
+    Returns: (set(produtos_ok), set(produtos_ruptura))
+    """
+    produtos_ok = set()
+    produtos_ruptura = set()
+
+    for cod, qtd_total in total_por_produto.items():
+        proj = projecoes.get(cod, {})
+        menor_d7 = proj.get('menor_estoque_d7', 0)
+        if menor_d7 >= qtd_total:
+            produtos_ok.add(cod)
+        else:
+            produtos_ruptura.add(cod)
+
+    return produtos_ok, produtos_ruptura
+
+
+def _classificar_cnpjs(cnpjs, demanda_por_cnpj, produtos_ruptura):
+    """
+    Passo 6: CNPJ OK se NENHUM de seus produtos esta em ruptura.
+    Returns: (list_ok, list_ruptura)
+    """
+    cnpjs_ok = []
+    cnpjs_ruptura = []
+
+    for cnpj in cnpjs:
+        produtos_cnpj = set(demanda_por_cnpj.get(cnpj, {}).keys())
+        if produtos_cnpj.isdisjoint(produtos_ruptura):
+            cnpjs_ok.append(cnpj)
+        else:
+            cnpjs_ruptura.append(cnpj)
+
+    return cnpjs_ok, cnpjs_ruptura
+
+
+def _calcular_data_minima_expedicao(dias_uteis_expedicao):
+    """
+    Calcula D+2 uteis, ajustado para dias de expedicao permitidos (seg-qui).
+    """
+    data = agora_utc_naive().date()
+    dias_adicionados = 0
+
+    while dias_adicionados < 2:
+        data += timedelta(days=1)
+        if data.weekday() < 5:  # seg-sex = util
+            dias_adicionados += 1
+
+    # Ajustar para dia de expedicao permitido (seg-qui)
+    while data.weekday() not in dias_uteis_expedicao:
+        data += timedelta(days=1)
+
+    return data
+
+
+def _proxima_data_disponivel(data_minima, dias_uteis, cnpjs_por_dia, max_por_dia):
+    """
+    Encontra a proxima data com slot disponivel (dia de expedicao + < max_por_dia).
+    """
+    data = data_minima
+    for _ in range(365):  # safety limit
+        if data.weekday() in dias_uteis:
+            data_str = data.strftime('%Y-%m-%d')
+            if cnpjs_por_dia.get(data_str, 0) < max_por_dia:
+                return data
+        data += timedelta(days=1)
+    return data  # fallback
+
+
+def _montar_sugestao(data_expedicao, tem_ruptura):
+    """
+    Monta dicionario de sugestao para um CNPJ.
+    Agendamento = expedicao + 1 dia calendario.
+    """
+    data_agendamento = data_expedicao + timedelta(days=1)
+    return {
+        'expedicao': data_expedicao.strftime('%Y-%m-%d'),
+        'agendamento': data_agendamento.strftime('%Y-%m-%d'),
+        'disponibilidade_estoque': data_expedicao.strftime('%Y-%m-%d'),
+        'tem_ruptura': tem_ruptura
+    }
+
+
+def _otimizar_cnpjs_ruptura(
+    cnpjs_ruptura, demanda, projecoes, produtos_ruptura,
+    data_minima, dias_uteis, cnpjs_por_dia, max_por_dia
+):
+    """
+    Passo 7: Otimizacao greedy para CNPJs com produtos em ruptura.
+
+    Ordenar CNPJs por demanda de produtos em ruptura (ascendente).
+    Para cada CNPJ, encontrar primeira data onde estoque projetado >= demanda.
+    Ao atribuir, deduzir demanda de todos os produtos do estoque futuro.
+
+    Complexidade: O(CNPJs x datas x produtos_ruptura) — trivial em memoria.
+    """
+    hoje = agora_utc_naive().date()
+    dias_projecao = 28
+
+    # Montar timeline de estoque para produtos em ruptura
+    # {cod_produto: [saldo_final_d0, saldo_final_d1, ..., saldo_final_d27]}
+    estoque_timeline = {}
+    for cod in produtos_ruptura:
+        proj = projecoes.get(cod, {}).get('projecao', [])
+        estoque_timeline[cod] = [dia.get('saldo_final', 0) for dia in proj]
+
+    # Demanda de produtos em ruptura por CNPJ
+    cnpj_demanda_ruptura = {}
+    for cnpj in cnpjs_ruptura:
+        dem = {}
+        for cod, qtd in demanda['por_cnpj'].get(cnpj, {}).items():
+            if cod in produtos_ruptura:
+                dem[cod] = qtd
+        cnpj_demanda_ruptura[cnpj] = dem
+
+    # Ordenar: menor demanda total de produtos em ruptura primeiro
+    cnpjs_sorted = sorted(
+        cnpjs_ruptura,
+        key=lambda c: sum(cnpj_demanda_ruptura.get(c, {}).values())
+    )
+
+    # Stock consumido por atribuicoes anteriores
+    # {cod_produto: {day_idx: qty_consumida}}
+    consumido = {}
+
+    sugestoes = {}
+
+    for cnpj in cnpjs_sorted:
+        atribuido = False
+
+        for day_offset in range(dias_projecao):
+            data_candidata = hoje + timedelta(days=day_offset)
+
+            # Verificar restricoes de calendario
+            if data_candidata < data_minima:
+                continue
+            if data_candidata.weekday() not in dias_uteis:
+                continue
+
+            # Verificar limite diario
+            data_str = data_candidata.strftime('%Y-%m-%d')
+            if cnpjs_por_dia.get(data_str, 0) >= max_por_dia:
+                continue
+
+            # Verificar estoque para TODOS os produtos em ruptura do CNPJ
+            pode_embarcar = True
+            for cod, qtd_necessaria in cnpj_demanda_ruptura.get(cnpj, {}).items():
+                timeline = estoque_timeline.get(cod, [])
+                if day_offset >= len(timeline):
+                    pode_embarcar = False
+                    break
+                disponivel = timeline[day_offset] - consumido.get(cod, {}).get(day_offset, 0)
+                if disponivel < qtd_necessaria:
+                    pode_embarcar = False
+                    break
+
+            if pode_embarcar:
+                # Atribuir CNPJ a esta data
+                cnpjs_por_dia[data_str] = cnpjs_por_dia.get(data_str, 0) + 1
+                sugestoes[cnpj] = _montar_sugestao(data_candidata, tem_ruptura=True)
+
+                # Deduzir demanda de TODOS os produtos do CNPJ (OK + ruptura)
+                # para que o estoque futuro reflita a alocacao
+                for cod, qtd in demanda['por_cnpj'].get(cnpj, {}).items():
+                    if cod not in consumido:
+                        consumido[cod] = {}
+                    for future_idx in range(day_offset, dias_projecao):
+                        consumido[cod][future_idx] = (
+                            consumido[cod].get(future_idx, 0) + qtd
+                        )
+
+                atribuido = True
+                break
+
+        if not atribuido:
+            # Sem data viavel em 28 dias
+            sugestoes[cnpj] = {
+                'expedicao': '',
+                'agendamento': '',
+                'disponibilidade_estoque': '',
+                'tem_ruptura': True
+            }
+
+    return sugestoes
+
+
+# ─────────────────────────────────────────────────────────────
+# Export Excel da rede
+# ─────────────────────────────────────────────────────────────
+
+def _data_iso(valor):
+    """'YYYY-MM-DD' (inputs da tela) -> date; vazio -> None."""
+    if not valor:
+        return None
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def _linhas_lojas(lojas):
+    for loja in lojas:
+        viabilidade = loja.get('viabilidade') or {}
+        yield {
+            'sub_rota': loja['sub_rota'],
+            'cnpj': loja['cnpj_formatado'],
+            'raz_social': loja['raz_social'],
+            'cidade': loja['cidade'],
+            'status': loja.get('status'),
+            'qtd_pedidos': loja['qtd_pedidos'],
+            'qtd_nf_cd': loja['qtd_nf_cd'],
+            'total_valor': loja['total_valor'],
+            'total_peso': loja['total_peso'],
+            'total_pallets': loja['total_pallets'],
+            'expedicao_agendada': _data_iso(loja['expedicao_sugerida']),
+            'agendamento_agendado': _data_iso(loja['agendamento_sugerido']),
+            'ruptura': ('Sim' if viabilidade.get('tem_ruptura') else 'Não') if viabilidade else None,
+            'produtos_ruptura': viabilidade.get('produtos_ruptura'),
+            'expedicao_viavel': _data_iso(viabilidade.get('expedicao')),
+            'agendamento_viavel': _data_iso(viabilidade.get('agendamento')),
+        }
+
+
+def _linhas_pedidos(lojas):
+    for loja in lojas:
+        for pedido in loja['pedidos']:
+            grupos = pedido['separacoes'] + pedido['nfs_cd']
+            yield {
+                'cnpj': loja['cnpj_formatado'],
+                'raz_social': loja['raz_social'],
+                'num_pedido': pedido['num_pedido'],
+                'pedido_cliente': pedido['pedido_cliente'],
+                'data_pedido': pedido['data_pedido'],
+                'situacao': pedido['status'],
+                'valor_original': pedido.get('valor_original', sum(nf['valor'] for nf in pedido['nfs_cd'])),
+                'qtd_pendente': pedido['qtd_pendente'],
+                'valor_pendente': pedido['valor_pendente'],
+                'pallets_pendente': pedido['pallets_pendente'],
+                'separacoes': len(pedido['separacoes']),
+                'nfs_cd': ', '.join(str(nf['numero_nf']) for nf in pedido['nfs_cd'] if nf['numero_nf']),
+                'expedicao': min((g['expedicao'] for g in grupos if g['expedicao']), default=None),
+                'agendamento': min((g['agendamento'] for g in grupos if g['agendamento']), default=None),
+                'protocolos': ', '.join(sorted({g['protocolo'] for g in grupos if g['protocolo']})),
+            }
+
+
+def abas_export_rede(lojas):
+    """Abas do Excel da rede: Lojas (status + viabilidade) e Pedidos."""
+    from app.utils.streaming_export import Aba, Coluna
+
+    colunas_lojas = [
+        Coluna('sub_rota', 'Sub-rota'),
+        Coluna('cnpj', 'CNPJ'),
+        Coluna('raz_social', 'Razão Social'),
+        Coluna('cidade', 'Cidade'),
+        Coluna('status', 'Status'),
+        Coluna('qtd_pedidos', 'Pedidos', 'int'),
+        Coluna('qtd_nf_cd', 'NFs no CD', 'int'),
+        Coluna('total_valor', 'Valor', 'money'),
+        Coluna('total_peso', 'Peso (kg)', 'decimal'),
+        Coluna('total_pallets', 'Pallets', 'decimal'),
+        Coluna('expedicao_agendada', 'Expedição Agendada', 'date'),
+        Coluna('agendamento_agendado', 'Agendamento', 'date'),
+        Coluna('ruptura', 'Ruptura'),
+        Coluna('produtos_ruptura', 'Produtos em Ruptura', 'int'),
+        Coluna('expedicao_viavel', 'Expedição Sugerida', 'date'),
+        Coluna('agendamento_viavel', 'Agendamento Sugerido', 'date'),
+    ]
+    colunas_pedidos = [
+        Coluna('cnpj', 'CNPJ'),
+        Coluna('raz_social', 'Razão Social'),
+        Coluna('num_pedido', 'Pedido'),
+        Coluna('pedido_cliente', 'Pedido Cliente'),
+        Coluna('data_pedido', 'Data Pedido', 'date'),
+        Coluna('situacao', 'Situação'),
+        Coluna('valor_original', 'Valor', 'money'),
+        Coluna('qtd_pendente', 'Qtd Pendente', 'decimal3'),
+        Coluna('valor_pendente', 'Valor Pendente', 'money'),
+        Coluna('pallets_pendente', 'Pallets Pendentes', 'decimal'),
+        Coluna('separacoes', 'Separações', 'int'),
+        Coluna('nfs_cd', 'NFs no CD'),
+        Coluna('expedicao', 'Expedição', 'date'),
+        Coluna('agendamento', 'Agendamento', 'date'),
+        Coluna('protocolos', 'Protocolos'),
+    ]
+    return [
+        Aba('Lojas', colunas_lojas, _linhas_lojas(lojas), autofiltro=True),
+        Aba('Pedidos', colunas_pedidos, _linhas_pedidos(lojas), autofiltro=True),
+    ]
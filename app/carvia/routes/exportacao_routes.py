@@ -8,7 +8,7 @@ from datetime import datetime
 from io import BytesIO
 
 import pandas as pd
-from flask import request, flash, redirect, url_for, send_file
+from flask import request, flash, redirect, url_for, send_file, jsonify
 from flask_login import login_required, current_user
 from sqlalchemy import func
 
@@ -26,10 +26,13 @@ from app.carvia.models import (
     CarviaConciliacao, CarviaExtratoLinha,
 )
 from app.carvia.utils.excel_export_helper import (
-    Campo, ColunaGrupo, aplicar_formato_datas,
-    gerar_excel_duplo_cabecalho, grupo_dinamico,
+    Campo, ColunaGrupo, abas_duplo_cabecalho, aplicar_formato_datas,
+    gerar_excel_duplo_cabecalho, grupo_dinamico, nome_arquivo_export,
 )
 from app.carvia.utils.tomador import tomador_label_para_export
+from app.utils.streaming_export import (
+    enfileirar_export, iter_lotes, resposta_export, status_export,
+)
 from app.utils.timezone import agora_utc_naive
 
 logger = logging.getLogger(__name__)
@@ -158,172 +161,121 @@ def _check_access():
     return not getattr(current_user, 'sistema_carvia', False)
 
 
-def register_exportacao_routes(bp):
-
-    # =====================================================================
-    # 0. Coleta ("papel de pao") — granularidade: 1 linha por (NF x MODELO de moto)
-    # Inclui chave de acesso da NF + medida (C/L/A) e qtd por modelo. NF sem modelo
-    # reconhecido (rascunho ou itens sem moto) vira 1 linha com a qtd manual.
-    # =====================================================================
-    @bp.route('/api/exportar/coletas/<int:coleta_id>')
-    @login_required
-    def exportar_coleta(coleta_id):  # type: ignore
-        """Exporta as NFs de UMA coleta para Excel (1 linha por NF x modelo)."""
-        if _check_access():
-            return redirect(url_for('main.dashboard'))
-        from app.carvia.models.coleta import CarviaColeta, CarviaColetaNf
-        from app.carvia.models.config_moto import CarviaModeloMoto
-        from app.carvia.routes.simulador_routes import _contar_modelos_por_nf
-
-        coleta = db.session.get(CarviaColeta, coleta_id)
-        if coleta is None:
-            flash('Coleta nao encontrada.', 'warning')
-            return redirect(url_for('carvia.listar_coletas'))
-
-        # Mesma ordem da tela: mais recente "por cima".
-        linhas = coleta.nfs.order_by(None).order_by(CarviaColetaNf.id.desc()).all()
-        if not linhas:
-            flash('Coleta sem NFs para exportar.', 'info')
-            return redirect(url_for('carvia.detalhe_coleta', coleta_id=coleta_id))
-
-        # TODOS os modelos (incl. inativos) p/ nao perder a medida na exibicao.
-        modelos_dict = {m.id: m for m in CarviaModeloMoto.query.all()}
-        nf_ids = [ln.carvia_nf_id for ln in linhas if ln.carvia_nf_id]
-        # Fonte CANONICA de contagem por modelo (carvia_nf_itens.modelo_moto_id + quantidade).
-        por_nf = _contar_modelos_por_nf(nf_ids, modelos_dict)
-
-        rows = []
-        for ln in linhas:
-            base = {
-                'NF': ln.numero_nf or '',
-                'Chave da NF': (ln.carvia_nf.chave_acesso_nf if ln.carvia_nf else '') or '',
-                'Cliente': ln.nome_cliente_efetivo or '',
-                'Cidade': ln.cidade_destino or '',
-                'UF': ln.uf or '',
-                'Valor frete': float(ln.valor_frete) if ln.valor_frete is not None else None,
-                'Vendedor': ln.vendedor or '',
-                'Transp. embarque': ln.transportadora_embarque or '',
-                'Vinculo': f'NF #{ln.carvia_nf_id}' if ln.carvia_nf_id else 'rascunho',
-            }
-            modelos = (por_nf.get(ln.carvia_nf_id) or {}).get('modelos') if ln.carvia_nf_id else None
-            if modelos:
-                for modelo_id, qtd in modelos.items():
-                    m = modelos_dict.get(modelo_id)
-                    rows.append({**base,
-                                 'Modelo': m.nome if m else f'#{modelo_id}',
-                                 'Comprimento (m)': float(m.comprimento) if m else None,
-                                 'Largura (m)': float(m.largura) if m else None,
-                                 'Altura (m)': float(m.altura) if m else None,
-                                 'Qtd': qtd})
-            else:
-                # Rascunho ou NF sem item com modelo: 1 linha com a qtd_motos manual.
-                rows.append({**base,
-                             'Modelo': '', 'Comprimento (m)': None, 'Largura (m)': None,
-                             'Altura (m)': None,
-                             'Qtd': ln.qtd_motos if ln.qtd_motos is not None else None})
-
-        cols = ['NF', 'Chave da NF', 'Cliente', 'Cidade', 'UF',
-                'Modelo', 'Comprimento (m)', 'Largura (m)', 'Altura (m)', 'Qtd',
-                'Valor frete', 'Vendedor', 'Transp. embarque', 'Vinculo']
-        df = pd.DataFrame(rows, columns=cols)
-        return _gerar_excel(df, 'Coleta', f'coleta_{coleta.numero_coleta}')
-
-    # =====================================================================
-    # 1. NFs — granularidade: 1 linha por ITEM DE PRODUTO
-    # Agrupamentos superiores: NF -> CTe -> CTe Comp (N x 3) -> Fatura -> Conciliacao (N x 3)
-    # =====================================================================
-    @bp.route('/api/exportar/nfs')
-    @login_required
-    def exportar_nfs():
-        """Exporta NFs com duplo cabecalho hierarquico (1 linha por item).
-
-        Regra: campos da propria entidade (produto + NF) + agrupamentos SUPERIORES
-        (CTe, CTe Complementares, Fatura, Conciliacoes). Nenhuma NF faz agregacao
-        de produtos — a granularidade da linha JA e o produto.
-        """
-        if _check_access():
-            return redirect(url_for('main.dashboard'))
-
-        busca = request.args.get('busca', '')
-        tipo_filtro = request.args.get('tipo_fonte', '')
-        status_filtro = request.args.get('status', '')
-        uf_filtro = request.args.get('uf_destino', '')
-        data_emissao_de = request.args.get('data_emissao_de', '')
-        data_emissao_ate = request.args.get('data_emissao_ate', '')
-        sort = request.args.get('sort', 'data_emissao')
-        direction = request.args.get('direction', 'desc')
-
-        query = db.session.query(CarviaNf)
-
-        if status_filtro == 'CANCELADA':
-            query = query.filter(CarviaNf.status == 'CANCELADA')
-        elif status_filtro == 'TODAS':
+# =========================================================================
+# NFs — builder do motor de streaming (app/utils/streaming_export.py)
+# Roda no request (xlsx/csv em streaming) e no job RQ (?background=1).
+# =========================================================================
+
+def _query_export_nfs(params):
+    """Query de NFs com os mesmos filtros/ordem da listagem."""
+    busca = params.get('busca', '')
+    tipo_filtro = params.get('tipo_fonte', '')
+    status_filtro = params.get('status', '')
+    uf_filtro = params.get('uf_destino', '')
+    data_emissao_de = params.get('data_emissao_de', '')
+    data_emissao_ate = params.get('data_emissao_ate', '')
+    sort = params.get('sort', 'data_emissao')
+    direction = params.get('direction', 'desc')
+
+    query = db.session.query(CarviaNf)
+
+    if status_filtro == 'CANCELADA':
+        query = query.filter(CarviaNf.status == 'CANCELADA')
+    elif status_filtro == 'TODAS':
+        pass
+    else:
+        query = query.filter(CarviaNf.status != 'CANCELADA')
+
+    if tipo_filtro:
+        query = query.filter(CarviaNf.tipo_fonte == tipo_filtro)
+
+    if data_emissao_de:
+        try:
+            query = query.filter(CarviaNf.data_emissao >= datetime.strptime(data_emissao_de, '%Y-%m-%d').date())
+        except ValueError:
+            pass
+    if data_emissao_ate:
+        try:
+            query = query.filter(CarviaNf.data_emissao <= datetime.strptime(data_emissao_ate, '%Y-%m-%d').date())
+        except ValueError:
             pass
-        else:
-            query = query.filter(CarviaNf.status != 'CANCELADA')
 
-        if tipo_filtro:
-            query = query.filter(CarviaNf.tipo_fonte == tipo_filtro)
+    if busca:
+        busca_like = f'%{busca}%'
+        cte_match_subq = db.session.query(
+            CarviaOperacaoNf.nf_id
+        ).join(
+            CarviaOperacao,
+            CarviaOperacaoNf.operacao_id == CarviaOperacao.id
+        ).filter(
+            db.or_(
+                CarviaOperacao.cte_numero.ilike(busca_like),
+                CarviaOperacao.ctrc_numero.ilike(busca_like),
+            )
+        ).subquery()
 
-        if data_emissao_de:
-            try:
-                query = query.filter(CarviaNf.data_emissao >= datetime.strptime(data_emissao_de, '%Y-%m-%d').date())
-            except ValueError:
-                pass
-        if data_emissao_ate:
-            try:
-                query = query.filter(CarviaNf.data_emissao <= datetime.strptime(data_emissao_ate, '%Y-%m-%d').date())
-            except ValueError:
-                pass
+        query = query.filter(
+            db.or_(
+                CarviaNf.numero_nf.ilike(busca_like),
+                CarviaNf.nome_emitente.ilike(busca_like),
+                CarviaNf.cnpj_emitente.ilike(busca_like),
+                CarviaNf.nome_destinatario.ilike(busca_like),
+                CarviaNf.chave_acesso_nf.ilike(busca_like),
+                CarviaNf.cidade_destinatario.ilike(busca_like),
+                CarviaNf.cnpj_destinatario.ilike(busca_like),
+                CarviaNf.id.in_(cte_match_subq),
+            )
+        )
 
-        if busca:
-            busca_like = f'%{busca}%'
-            cte_match_subq = db.session.query(
-                CarviaOperacaoNf.nf_id
-            ).join(
-                CarviaOperacao,
-                CarviaOperacaoNf.operacao_id == CarviaOperacao.id
-            ).filter(
-                db.or_(
-                    CarviaOperacao.cte_numero.ilike(busca_like),
-                    CarviaOperacao.ctrc_numero.ilike(busca_like),
-                )
-            ).subquery()
+    if uf_filtro:
+        query = query.filter(CarviaNf.uf_destinatario == uf_filtro.upper())
 
-            query = query.filter(
-                db.or_(
-                    CarviaNf.numero_nf.ilike(busca_like),
-                    CarviaNf.nome_emitente.ilike(busca_like),
-                    CarviaNf.cnpj_emitente.ilike(busca_like),
-                    CarviaNf.nome_destinatario.ilike(busca_like),
-                    CarviaNf.chave_acesso_nf.ilike(busca_like),
-                    CarviaNf.cidade_destinatario.ilike(busca_like),
-                    CarviaNf.cnpj_destinatario.ilike(busca_like),
-                    CarviaNf.id.in_(cte_match_subq),
-                )
-            )
+    sortable_columns = {
+        'numero_nf': func.lpad(func.coalesce(CarviaNf.numero_nf, ''), 20, '0'),
+        'emitente': CarviaNf.nome_emitente,
+        'valor_total': CarviaNf.valor_total,
+        'data_emissao': CarviaNf.data_emissao,
+        'criado_em': CarviaNf.criado_em,
+    }
+    sort_col = sortable_columns.get(sort, CarviaNf.data_emissao)
+    if direction == 'asc':
+        query = query.order_by(sort_col.asc().nullslast())
+    else:
+        query = query.order_by(sort_col.desc().nullslast())
 
-        if uf_filtro:
-            query = query.filter(CarviaNf.uf_destinatario == uf_filtro.upper())
+    return query
 
-        sortable_columns = {
-            'numero_nf': func.lpad(func.coalesce(CarviaNf.numero_nf, ''), 20, '0'),
-            'emitente': CarviaNf.nome_emitente,
-            'valor_total': CarviaNf.valor_total,
-            'data_emissao': CarviaNf.data_emissao,
-            'criado_em': CarviaNf.criado_em,
-        }
-        sort_col = sortable_columns.get(sort, CarviaNf.data_emissao)
-        if direction == 'asc':
-            query = query.order_by(sort_col.asc().nullslast())
-        else:
-            query = query.order_by(sort_col.desc().nullslast())
 
-        nfs = query.all()
-        if not nfs:
-            flash('Nenhum dado para exportar.', 'warning')
-            return redirect(url_for('carvia.listar_nfs'))
+def _max_slots_export_nfs(query):
+    """(max CTe Comp por operacao, max conciliacoes por fatura) do recorte.
 
+    Calculado no banco ANTES das linhas: as colunas dinamicas precisam existir
+    no cabecalho, e as linhas sao geradas em lotes depois.
+    """
+    nf_ids = query.with_entities(CarviaNf.id).order_by(None).subquery()
+    op_ids = db.session.query(CarviaOperacaoNf.operacao_id).filter(
+        CarviaOperacaoNf.nf_id.in_(db.select(nf_ids.c.id))
+    )
+    comps = db.session.query(func.count(CarviaCteComplementar.id).label('n')).filter(
+        CarviaCteComplementar.operacao_id.in_(op_ids)
+    ).group_by(CarviaCteComplementar.operacao_id).subquery()
+    fat_ids = db.session.query(CarviaOperacao.fatura_cliente_id).filter(
+        CarviaOperacao.id.in_(op_ids),
+        CarviaOperacao.fatura_cliente_id.isnot(None),
+    )
+    concils = db.session.query(func.count(CarviaConciliacao.id).label('n')).filter(
+        CarviaConciliacao.tipo_documento == 'fatura_cliente',
+        CarviaConciliacao.documento_id.in_(fat_ids),
+    ).group_by(CarviaConciliacao.documento_id).subquery()
+    max_comps = db.session.query(func.max(comps.c.n)).scalar() or 0
+    max_concil = db.session.query(func.max(concils.c.n)).scalar() or 0
+    return max_comps, max_concil
+
+
+def _linhas_export_nfs(query, max_comps, max_concil, progresso=None, total=None):
+    """Gera as linhas (1 por item) lote a lote — enriquecimento com IN por lote."""
+    processados = 0
+    for nfs in iter_lotes(query):
         nf_ids = [nf.id for nf in nfs]
 
         # ---- Peso cubado por NF (volume x qtd x cubagem_minima==300) ----
@@ -363,8 +315,6 @@ def register_exportacao_routes(bp):
             ).order_by(CarviaCteComplementar.id).all():
                 comps_por_op[c.operacao_id].append(c)
 
-        max_comps = _max_len(comps_por_op.values())
-
         # ---- Fatura cliente pelos CTes pai ----
         fat_ids = list({op.fatura_cliente_id for op in operacoes.values() if op.fatura_cliente_id})
         faturas = {
@@ -375,10 +325,8 @@ def register_exportacao_routes(bp):
 
         # ---- Conciliacoes da fatura (tipo_documento = 'FATURA_CLIENTE') ----
         concil_por_fat = _coletar_conciliacoes('fatura_cliente', fat_ids)
-        max_concil = _max_len(concil_por_fat.values())
 
         # ---- Montar dados ----
-        linhas = []
         for nf in nfs:
             op = operacoes.get(nf_to_op.get(nf.id))
             fatura = faturas.get(op.fatura_cliente_id) if op else None
@@ -441,67 +389,206 @@ def register_exportacao_routes(bp):
                     linha[f'concil_data_{i}'] = k[0] if k else None
                     linha[f'concil_valor_{i}'] = k[1] if k else ''
                     linha[f'concil_desc_{i}'] = k[2] if k else ''
-                linhas.append(linha)
+                yield linha
+        processados += len(nfs)
+        if progresso:
+            progresso(processados, total)
+
+
+def _colunas_export_nfs(max_comps, max_concil):
+    """Colunas com duplo cabecalho (slots dinamicos de CTe Comp/Conciliacao)."""
+    colunas = [
+        ColunaGrupo('PRODUTO', [
+            Campo('produto_codigo', 'Codigo'),
+            Campo('produto_desc', 'Descricao'),
+            Campo('produto_ncm', 'NCM'),
+            Campo('produto_cfop', 'CFOP'),
+            Campo('produto_un', 'Un'),
+            Campo('produto_qtd', 'Qtd', fmt='money'),
+            Campo('produto_vunit', 'V.Unit', fmt='money'),
+            Campo('produto_vtotal', 'V.Total', fmt='money'),
+        ]),
+        ColunaGrupo('NF', [
+            Campo('nf_numero', 'Numero'),
+            Campo('nf_serie', 'Serie'),
+            Campo('nf_chave', 'Chave'),
+            Campo('nf_data', 'Data', fmt='date'),
+            Campo('nf_emitente', 'Emitente'),
+            Campo('nf_cnpj_emit', 'CNPJ Emit'),
+            Campo('nf_dest', 'Destinatario'),
+            Campo('nf_cnpj_dest', 'CNPJ Dest'),
+            Campo('nf_cidade_dest', 'Cidade Dest'),
+            Campo('nf_uf_dest', 'UF'),
+            Campo('nf_valor', 'Valor', fmt='money'),
+            Campo('nf_peso', 'Peso', fmt='money'),
+            Campo('nf_peso_cubado', 'Peso Cubado', fmt='money'),
+            Campo('nf_vol', 'Vol', fmt='int'),
+            Campo('nf_modfrete', 'modFrete'),
+            Campo('nf_status', 'Status'),
+        ]),
+        ColunaGrupo('CTe', [
+            Campo('cte_numero', 'Numero'),
+            Campo('cte_ctrc', 'CTRC'),
+            Campo('cte_valor', 'Valor', fmt='money'),
+            Campo('cte_tomador', 'Tomador'),
+            Campo('cte_data', 'Data', fmt='date'),
+        ]),
+    ]
+    colunas += grupo_dinamico('CTE COMP', max_comps, [
+        Campo('comp_numero_{i}', 'Numero'),
+        Campo('comp_valor_{i}', 'Valor', fmt='money'),
+        Campo('comp_motivo_{i}', 'Motivo'),
+    ])
+    colunas.append(ColunaGrupo('FATURA', [
+        Campo('fat_numero', 'Numero'),
+        Campo('fat_cnpj_pagador', 'CNPJ Pagador'),
+        Campo('fat_pagador', 'Pagador'),
+        Campo('fat_destino', 'End. Pagador'),
+        Campo('fat_data', 'Data', fmt='date'),
+        Campo('fat_valor', 'Valor', fmt='money'),
+        Campo('fat_status', 'Status'),
+    ]))
+    colunas += grupo_dinamico('CONCILIACAO', max_concil, [
+        Campo('concil_data_{i}', 'Data', fmt='date'),
+        Campo('concil_valor_{i}', 'Valor', fmt='money'),
+        Campo('concil_desc_{i}', 'Descricao'),
+    ])
+    return colunas
+
+
+def montar_export_nfs(params, progresso=None):
+    """Builder do export de NFs: lista de Aba ou None se nao ha NFs."""
+    query = _query_export_nfs(params)
+    total = query.order_by(None).count()
+    if not total:
+        return None
+    max_comps, max_concil = _max_slots_export_nfs(query)
+    if progresso:
+        progresso(0, total)
+    return abas_duplo_cabecalho(
+        _colunas_export_nfs(max_comps, max_concil),
+        _linhas_export_nfs(query, max_comps, max_concil, progresso, total),
+        'NFs',
+    )
 
-        # ---- Colunas com duplo cabecalho ----
-        colunas = [
-            ColunaGrupo('PRODUTO', [
-                Campo('produto_codigo', 'Codigo'),
-                Campo('produto_desc', 'Descricao'),
-                Campo('produto_ncm', 'NCM'),
-                Campo('produto_cfop', 'CFOP'),
-                Campo('produto_un', 'Un'),
-                Campo('produto_qtd', 'Qtd', fmt='money'),
-                Campo('produto_vunit', 'V.Unit', fmt='money'),
-                Campo('produto_vtotal', 'V.Total', fmt='money'),
-            ]),
-            ColunaGrupo('NF', [
-                Campo('nf_numero', 'Numero'),
-                Campo('nf_serie', 'Serie'),
-                Campo('nf_chave', 'Chave'),
-                Campo('nf_data', 'Data', fmt='date'),
-                Campo('nf_emitente', 'Emitente'),
-                Campo('nf_cnpj_emit', 'CNPJ Emit'),
-                Campo('nf_dest', 'Destinatario'),
-                Campo('nf_cnpj_dest', 'CNPJ Dest'),
-                Campo('nf_cidade_dest', 'Cidade Dest'),
-                Campo('nf_uf_dest', 'UF'),
-                Campo('nf_valor', 'Valor', fmt='money'),
-                Campo('nf_peso', 'Peso', fmt='money'),
-                Campo('nf_peso_cubado', 'Peso Cubado', fmt='money'),
-                Campo('nf_vol', 'Vol', fmt='int'),
-                Campo('nf_modfrete', 'modFrete'),
-                Campo('nf_status', 'Status'),
-            ]),
-            ColunaGrupo('CTe', [
-                Campo('cte_numero', 'Numero'),
-                Campo('cte_ctrc', 'CTRC'),
-                Campo('cte_valor', 'Valor', fmt='money'),
-                Campo('cte_tomador', 'Tomador'),
-                Campo('cte_data', 'Data', fmt='date'),
-            ]),
-        ]
-        colunas += grupo_dinamico('CTE COMP', max_comps, [
-            Campo('comp_numero_{i}', 'Numero'),
-            Campo('comp_valor_{i}', 'Valor', fmt='money'),
-            Campo('comp_motivo_{i}', 'Motivo'),
-        ])
-        colunas.append(ColunaGrupo('FATURA', [
-            Campo('fat_numero', 'Numero'),
-            Campo('fat_cnpj_pagador', 'CNPJ Pagador'),
-            Campo('fat_pagador', 'Pagador'),
-            Campo('fat_destino', 'End. Pagador'),
-            Campo('fat_data', 'Data', fmt='date'),
-            Campo('fat_valor', 'Valor', fmt='money'),
-            Campo('fat_status', 'Status'),
-        ]))
-        colunas += grupo_dinamico('CONCILIACAO', max_concil, [
-            Campo('concil_data_{i}', 'Data', fmt='date'),
-            Campo('concil_valor_{i}', 'Valor', fmt='money'),
-            Campo('concil_desc_{i}', 'Descricao'),
-        ])
 
-        return gerar_excel_duplo_cabecalho(colunas, linhas, 'NFs', 'nfs')
+def register_exportacao_routes(bp):
+
+    # =====================================================================
+    # 0. Coleta ("papel de pao") — granularidade: 1 linha por (NF x MODELO de moto)
+    # Inclui chave de acesso da NF + medida (C/L/A) e qtd por modelo. NF sem modelo
+    # reconhecido (rascunho ou itens sem moto) vira 1 linha com a qtd manual.
+    # =====================================================================
+    @bp.route('/api/exportar/coletas/<int:coleta_id>')
+    @login_required
+    def exportar_coleta(coleta_id):  # type: ignore
+        """Exporta as NFs de UMA coleta para Excel (1 linha por NF x modelo)."""
+        if _check_access():
+            return redirect(url_for('main.dashboard'))
+        from app.carvia.models.coleta import CarviaColeta, CarviaColetaNf
+        from app.carvia.models.config_moto import CarviaModeloMoto
+        from app.carvia.routes.simulador_routes import _contar_modelos_por_nf
+
+        coleta = db.session.get(CarviaColeta, coleta_id)
+        if coleta is None:
+            flash('Coleta nao encontrada.', 'warning')
+            return redirect(url_for('carvia.listar_coletas'))
+
+        # Mesma ordem da tela: mais recente "por cima".
+        linhas = coleta.nfs.order_by(None).order_by(CarviaColetaNf.id.desc()).all()
+        if not linhas:
+            flash('Coleta sem NFs para exportar.', 'info')
+            return redirect(url_for('carvia.detalhe_coleta', coleta_id=coleta_id))
+
+        # TODOS os modelos (incl. inativos) p/ nao perder a medida na exibicao.
+        modelos_dict = {m.id: m for m in CarviaModeloMoto.query.all()}
+        nf_ids = [ln.carvia_nf_id for ln in linhas if ln.carvia_nf_id]
+        # Fonte CANONICA de contagem por modelo (carvia_nf_itens.modelo_moto_id + quantidade).
+        por_nf = _contar_modelos_por_nf(nf_ids, modelos_dict)
+
+        rows = []
+        for ln in linhas:
+            base = {
+                'NF': ln.numero_nf or '',
+                'Chave da NF': (ln.carvia_nf.chave_acesso_nf if ln.carvia_nf else '') or '',
+                'Cliente': ln.nome_cliente_efetivo or '',
+                'Cidade': ln.cidade_destino or '',
+                'UF': ln.uf or '',
+                'Valor frete': float(ln.valor_frete) if ln.valor_frete is not None else None,
+                'Vendedor': ln.vendedor or '',
+                'Transp. embarque': ln.transportadora_embarque or '',
+                'Vinculo': f'NF #{ln.carvia_nf_id}' if ln.carvia_nf_id else 'rascunho',
+            }
+            modelos = (por_nf.get(ln.carvia_nf_id) or {}).get('modelos') if ln.carvia_nf_id else None
+            if modelos:
+                for modelo_id, qtd in modelos.items():
+                    m = modelos_dict.get(modelo_id)
+                    rows.append({**base,
+                                 'Modelo': m.nome if m else f'#{modelo_id}',
+                                 'Comprimento (m)': float(m.comprimento) if m else None,
+                                 'Largura (m)': float(m.largura) if m else None,
+                                 'Altura (m)': float(m.altura) if m else None,
+                                 'Qtd': qtd})
+            else:
+                # Rascunho ou NF sem item com modelo: 1 linha com a qtd_motos manual.
+                rows.append({**base,
+                             'Modelo': '', 'Comprimento (m)': None, 'Largura (m)': None,
+                             'Altura (m)': None,
+                             'Qtd': ln.qtd_motos if ln.qtd_motos is not None else None})
+
+        cols = ['NF', 'Chave da NF', 'Cliente', 'Cidade', 'UF',
+                'Modelo', 'Comprimento (m)', 'Largura (m)', 'Altura (m)', 'Qtd',
+                'Valor frete', 'Vendedor', 'Transp. embarque', 'Vinculo']
+        df = pd.DataFrame(rows, columns=cols)
+        return _gerar_excel(df, 'Coleta', f'coleta_{coleta.numero_coleta}')
+
+    # =====================================================================
+    # 1. NFs — granularidade: 1 linha por ITEM DE PRODUTO
+    # Agrupamentos superiores: NF -> CTe -> CTe Comp (N x 3) -> Fatura -> Conciliacao (N x 3)
+    # =====================================================================
+    @bp.route('/api/exportar/nfs')
+    @login_required
+    def exportar_nfs():
+        """Exporta NFs com duplo cabecalho hierarquico (1 linha por item).
+
+        Regra: campos da propria entidade (produto + NF) + agrupamentos SUPERIORES
+        (CTe, CTe Complementares, Fatura, Conciliacoes). Nenhuma NF faz agregacao
+        de produtos — a granularidade da linha JA e o produto.
+
+        Streaming em lotes (memoria constante). `formato=csv` gera CSV;
+        `background=1` enfileira job RQ e devolve o job_id (polling em
+        /api/exportar/status/<job_id>).
+        """
+        if _check_access():
+            return redirect(url_for('main.dashboard'))
+
+        params = request.args.to_dict()
+        formato = 'csv' if params.get('formato') == 'csv' else 'xlsx'
+        nome_base = nome_arquivo_export('nfs')
+
+        if params.get('background'):
+            job = enfileirar_export(
+                'app.carvia.routes.exportacao_routes:montar_export_nfs',
+                params, formato, nome_base, current_user.id,
+            )
+            return jsonify({'sucesso': True, 'job_id': job.id}), 202
+
+        abas = montar_export_nfs(params)
+        if not abas:
+            flash('Nenhum dado para exportar.', 'warning')
+            return redirect(url_for('carvia.listar_nfs'))
+        return resposta_export(abas, formato, nome_base)
+
+    @bp.route('/api/exportar/status/<job_id>')
+    @login_required
+    def exportar_status(job_id):
+        """Progresso de export em background (dono = usuario do job)."""
+        if _check_access():
+            return jsonify({'sucesso': False, 'erro': 'Acesso negado.'}), 403
+        status = status_export(job_id, current_user.id)
+        if status is None:
+            return jsonify({'sucesso': False, 'erro': 'Job nao encontrado.'}), 404
+        return jsonify({'sucesso': True, **status})
 
     # =====================================================================
     # 2. Operacoes
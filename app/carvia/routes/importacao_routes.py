@@ -13,6 +13,9 @@ logger = logging.getLogger(__name__)
 # GAP-11: TTL de 1 hora para dados de importacao no Redis
 _IMPORTACAO_TTL = 3600
 
+# Uploads com N+ arquivos sao processados em job RQ (parsing em pool de processos)
+_IMPORTACAO_ASYNC_MIN_ARQUIVOS = int(os.environ.get('CARVIA_IMPORT_ASYNC_MIN_ARQUIVOS', '20'))
+
 
 def _importacao_redis_key(user_id, chave_uuid):
     """Gera chave Redis para dados de importacao."""
@@ -75,6 +78,33 @@ def _limpar_importacao_temp(user_id, chave_uuid):
     session.pop('carvia_importacao_arquivos', None)
 
 
+def _enfileirar_importacao(arquivos_bytes):
+    """Grava o upload no Redis e enfileira o job de parsing.
+
+    Returns:
+        (job_id, chave_uuid) ou (None, None) se Redis/RQ indisponivel —
+        caller cai no processamento sincrono.
+    """
+    chave_uuid = str(uuid_mod.uuid4())
+    try:
+        from app.carvia.workers.importacao_jobs import (
+            armazenar_arquivos_upload, processar_importacao_job,
+        )
+        from app.portal.workers import enqueue_job
+
+        refs = armazenar_arquivos_upload(chave_uuid, arquivos_bytes)
+        job = enqueue_job(
+            processar_importacao_job,
+            current_user.id, current_user.email, chave_uuid, refs,
+            queue_name='default', timeout='30m',
+            meta={'user_id': current_user.id, 'total': len(arquivos_bytes), 'progress': 0},
+        )
+        return job.id, chave_uuid
+    except Exception as e:
+        logger.warning(f"Importacao async indisponivel, processando no request: {e}")
+        return None, None
+
+
 def register_importacao_routes(bp):
 
     # ------------------------------------------------------------------ #
@@ -687,6 +717,18 @@ def register_importacao_routes(bp):
                 flash('Nenhum arquivo valido.', 'warning')
                 return redirect(url_for('carvia.importar'))
 
+            # Uploads grandes: parsing em job RQ (pool de processos + cache por
+            # hash), com progresso por arquivo via polling. Nao segura o worker web.
+            if len(arquivos_bytes) >= _IMPORTACAO_ASYNC_MIN_ARQUIVOS:
+                job_id, chave_uuid = _enfileirar_importacao(arquivos_bytes)
+                if job_id:
+                    return render_template(
+                        'carvia/importar.html',
+                        importacao_job_id=job_id,
+                        importacao_chave=chave_uuid,
+                        importacao_total=len(arquivos_bytes),
+                    )
+
             # Processar com ImportacaoService
             from app.carvia.services.parsers.importacao_service import ImportacaoService
             service = ImportacaoService()
@@ -706,6 +748,62 @@ def register_importacao_routes(bp):
 
         return render_template('carvia/importar.html')
 
+    @bp.route('/importar/status/<job_id>')
+    @login_required
+    def importar_status(job_id):
+        """Progresso do job de importacao (polling da tela de upload)."""
+        if not getattr(current_user, 'sistema_carvia', False):
+            return {'sucesso': False, 'erro': 'Acesso negado.'}, 403
+
+        from rq.job import Job
+        from app.portal.workers import get_redis_connection
+        try:
+            job = Job.fetch(job_id, connection=get_redis_connection())
+        except Exception:
+            return {'sucesso': False, 'erro': 'Job nao encontrado.'}, 404
+
+        meta = job.meta or {}
+        if meta.get('user_id') != current_user.id:
+            return {'sucesso': False, 'erro': 'Job nao encontrado.'}, 404
+
+        status = job.get_status()
+        status = str(getattr(status, 'value', status))
+        erro = str(job.exc_info).strip().splitlines()[-1] if job.is_failed and job.exc_info else None
+        retorno = job.result if status == 'finished' else None
+        if isinstance(retorno, dict) and not retorno.get('sucesso', True):
+            # Job terminou sem gravar o preview: para a tela e falha, nao "expirada"
+            status = 'failed'
+            erro = retorno.get('erro') or 'Resultado da importacao nao foi salvo.'
+        return {
+            'sucesso': True,
+            'status': status,
+            'progress': meta.get('progress', 0),
+            'msg': meta.get('msg'),
+            'concluidos': meta.get('concluidos', 0),
+            'total': meta.get('total'),
+            'ultimo_arquivo': meta.get('ultimo_arquivo'),
+            'erro': erro,
+        }
+
+    @bp.route('/importar/resultado/<chave>')
+    @login_required
+    def importar_resultado(chave):
+        """Preview de uma importacao processada em background."""
+        if not getattr(current_user, 'sistema_carvia', False):
+            flash('Acesso negado.', 'danger')
+            return redirect(url_for('main.dashboard'))
+
+        resultado = _obter_importacao_temp(current_user.id, chave)
+        if not resultado:
+            flash('Importacao nao encontrada ou expirada. Faca o upload novamente.', 'warning')
+            return redirect(url_for('carvia.importar'))
+
+        return render_template(
+            'carvia/importar_resultado.html',
+            resultado=resultado,
+            importacao_chave=chave,
+        )
+
     @bp.route('/importar/confirmar', methods=['POST'])
     @login_required
     def importar_confirmar():
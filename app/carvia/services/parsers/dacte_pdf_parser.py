@@ -91,25 +91,15 @@ class DactePDFParser:
         self.texto_completo = texto or ''
 
     def _extrair_com_pdfplumber(self) -> str:
-        """Extrai texto usando pdfplumber"""
+        """Extrai texto usando pdfplumber (documento compartilhado por hash)"""
         try:
-            import pdfplumber
+            from app.utils.pdf_extracao import documento_pdf
 
-            if self.pdf_path:
-                pdf = pdfplumber.open(self.pdf_path)
-            elif self.pdf_bytes:
-                import io
-                pdf = pdfplumber.open(io.BytesIO(self.pdf_bytes))
-            else:
+            doc = documento_pdf(pdf_bytes=self.pdf_bytes, pdf_path=self.pdf_path)
+            if doc is None:
                 return ''
-
-            textos = []
-            for page in pdf.pages:
-                texto = page.extract_text()
-                if texto:
-                    textos.append(texto)
-                    self.paginas.append(texto)
-            pdf.close()
+            textos = [t for t in doc.textos_paginas() if t]
+            self.paginas.extend(textos)
             return '\n'.join(textos)
         except Exception as e:
             logger.warning(f"pdfplumber falhou (DACTE): {e}")
@@ -118,22 +108,12 @@ class DactePDFParser:
     def _extrair_com_pypdf(self) -> str:
         """Extrai texto usando pypdf (fallback)"""
         try:
-            import pypdf
+            from app.utils.pdf_extracao import documento_pdf
 
-            if self.pdf_path:
-                reader = pypdf.PdfReader(self.pdf_path)
-            elif self.pdf_bytes:
-                import io
-                reader = pypdf.PdfReader(io.BytesIO(self.pdf_bytes))
-            else:
+            doc = documento_pdf(pdf_bytes=self.pdf_bytes, pdf_path=self.pdf_path)
+            if doc is None:
                 return ''
-
-            textos = []
-            for page in reader.pages:
-                texto = page.extract_text()
-                if texto:
-                    textos.append(texto)
-            return '\n'.join(textos)
+            return '\n'.join(t for t in doc.textos_pypdf() if t)
         except Exception as e:
             logger.warning(f"pypdf falhou (DACTE): {e}")
             return ''
@@ -1232,19 +1212,13 @@ class DactePDFParser:
         Os digitos sao exibidos individualmente espacados (ex: "3 5 2 6 0 2 ...")
         seguidos de bloco compacto, totalizando 44+ digitos por chave.
         """
-        try:
-            import pdfplumber
-        except ImportError:
-            return []
+        from app.utils.pdf_extracao import documento_pdf
 
         try:
-            if self.pdf_path:
-                pdf = pdfplumber.open(self.pdf_path)
-            elif self.pdf_bytes:
-                import io
-                pdf = pdfplumber.open(io.BytesIO(self.pdf_bytes))
-            else:
+            doc = documento_pdf(pdf_bytes=self.pdf_bytes, pdf_path=self.pdf_path)
+            if doc is None:
                 return []
+            num_paginas = doc.num_paginas
         except Exception:
             return []
 
@@ -1252,56 +1226,56 @@ class DactePDFParser:
         seen = set()
 
         try:
-            for page in pdf.pages:
-                # Encontrar header "CHAVES" para referencia de posicao
-                words = page.extract_words()
-                chaves_word = None
-                for w in words:
-                    if 'CHAVES' in w['text'].upper():
-                        chaves_word = w
-                        break
+            # Um open do pdfplumber para todas as paginas (palavras/chars nao sao memoizados)
+            with doc.aberto():
+                for indice in range(num_paginas):
+                    # Encontrar header "CHAVES" para referencia de posicao
+                    words = doc.palavras(indice)
+                    chaves_word = None
+                    for w in words:
+                        if 'CHAVES' in w['text'].upper():
+                            chaves_word = w
+                            break
 
-                if chaves_word is None:
-                    continue
+                    if chaves_word is None:
+                        continue
 
-                # Coluna direita: chars com x >= (largura_pagina/2 - 40)
-                # Coluna esquerda tipicamente ocupa x=17-251, direita x=261+
-                x_threshold = page.width / 2 - 40
-                y_start = chaves_word['top'] - 5
+                    # Coluna direita: chars com x >= (largura_pagina/2 - 40)
+                    # Coluna esquerda tipicamente ocupa x=17-251, direita x=261+
+                    x_threshold = doc.dimensoes(indice)[0] / 2 - 40
+                    y_start = chaves_word['top'] - 5
 
-                right_chars = [
-                    c for c in page.chars
-                    if c['x0'] >= x_threshold and c['top'] > y_start
-                ]
+                    right_chars = [
+                        c for c in doc.caracteres(indice)
+                        if c['x0'] >= x_threshold and c['top'] > y_start
+                    ]
 
-                if not right_chars:
-                    continue
+                    if not right_chars:
+                        continue
 
-                # Agrupar por Y com tolerancia de 3pt (separa linhas visuais)
-                y_groups: Dict[int, list] = {}
-                for c in right_chars:
-                    y_key = round(c['top'] / 3) * 3
-                    y_groups.setdefault(y_key, []).append(c)
-
-                for y_key in sorted(y_groups.keys()):
-                    chars_in_line = sorted(y_groups[y_key], key=lambda c: c['x0'])
-                    line_text = ''.join(c['text'] for c in chars_in_line)
-
-                    for m in self._NF_MARKER_RE.finditer(line_text):
-                        after = line_text[m.end():]
-                        digits = re.sub(r'[^0-9]', '', after)
-                        if len(digits) >= 44:
-                            # Buscar janela de 44 digitos com CDV valido
-                            for start in range(len(digits) - 43):
-                                sub = digits[start:start + 44]
-                                if self._validar_chave_nfe(sub) and sub not in seen:
-                                    seen.add(sub)
-                                    self._adicionar_nf(nfs, sub)
-                                    break  # Uma chave por marcador NF-E
+                    # Agrupar por Y com tolerancia de 3pt (separa linhas visuais)
+                    y_groups: Dict[int, list] = {}
+                    for c in right_chars:
+                        y_key = round(c['top'] / 3) * 3
+                        y_groups.setdefault(y_key, []).append(c)
+
+                    for y_key in sorted(y_groups.keys()):
+                        chars_in_line = sorted(y_groups[y_key], key=lambda c: c['x0'])
+                        line_text = ''.join(c['text'] for c in chars_in_line)
+
+                        for m in self._NF_MARKER_RE.finditer(line_text):
+                            after = line_text[m.end():]
+                            digits = re.sub(r'[^0-9]', '', after)
+                            if len(digits) >= 44:
+                                # Buscar janela de 44 digitos com CDV valido
+                                for start in range(len(digits) - 43):
+                                    sub = digits[start:start + 44]
+                                    if self._validar_chave_nfe(sub) and sub not in seen:
+                                        seen.add(sub)
+                                        self._adicionar_nf(nfs, sub)
+                                        break  # Uma chave por marcador NF-E
         except Exception as e:
             logger.warning(f"SSW char-level NF extraction failed: {e}")
-        finally:
-            pdf.close()
 
         return nfs
 
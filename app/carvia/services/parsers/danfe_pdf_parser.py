@@ -98,28 +98,19 @@ class DanfePDFParser:
         self.texto_completo = texto or ''
 
     def _extrair_com_pdfplumber(self) -> str:
-        """Extrai texto usando pdfplumber"""
+        """Extrai texto usando pdfplumber (documento compartilhado por hash).
+
+        O ciclo de vida do handle fica em app.utils.pdf_extracao (fechado apos
+        cada leitura) — classificacao e parse reutilizam o mesmo texto.
+        """
         try:
-            import pdfplumber
+            from app.utils.pdf_extracao import documento_pdf
 
-            if self.pdf_path:
-                ctx = pdfplumber.open(self.pdf_path)
-            elif self.pdf_bytes:
-                import io
-                ctx = pdfplumber.open(io.BytesIO(self.pdf_bytes))
-            else:
+            doc = documento_pdf(pdf_bytes=self.pdf_bytes, pdf_path=self.pdf_path)
+            if doc is None:
                 return ''
-
-            # context manager: libera o handle mesmo se extract_text() falhar
-            # numa pagina (antes pdf.close() ficava fora de finally e vazava em
-            # lote — IMP-2026-06-23-002).
-            textos = []
-            with ctx as pdf:
-                for page in pdf.pages:
-                    texto = page.extract_text()
-                    if texto:
-                        textos.append(texto)
-                        self.paginas.append(texto)
+            textos = [t for t in doc.textos_paginas() if t]
+            self.paginas.extend(textos)
             return '\n'.join(textos)
         except Exception as e:
             logger.warning(f"pdfplumber falhou: {e}")
@@ -128,22 +119,12 @@ class DanfePDFParser:
     def _extrair_com_pypdf(self) -> str:
         """Extrai texto usando pypdf (fallback)"""
         try:
-            import pypdf
+            from app.utils.pdf_extracao import documento_pdf
 
-            if self.pdf_path:
-                reader = pypdf.PdfReader(self.pdf_path)
-            elif self.pdf_bytes:
-                import io
-                reader = pypdf.PdfReader(io.BytesIO(self.pdf_bytes))
-            else:
+            doc = documento_pdf(pdf_bytes=self.pdf_bytes, pdf_path=self.pdf_path)
+            if doc is None:
                 return ''
-
-            textos = []
-            for page in reader.pages:
-                texto = page.extract_text()
-                if texto:
-                    textos.append(texto)
-            return '\n'.join(textos)
+            return '\n'.join(t for t in doc.textos_pypdf() if t)
         except Exception as e:
             logger.warning(f"pypdf falhou: {e}")
             return ''
@@ -84,19 +84,15 @@ class FaturaPDFParser:
         self.texto_completo = texto or ''
 
     def _extrair_com_pdfplumber(self) -> str:
-        """Extrai texto usando pdfplumber"""
+        """Extrai texto usando pdfplumber (documento compartilhado por hash)"""
         try:
-            import pdfplumber
-            import io
-
-            pdf = pdfplumber.open(io.BytesIO(self.pdf_bytes))
-            textos = []
-            for page in pdf.pages:
-                texto = page.extract_text()
-                if texto:
-                    textos.append(texto)
-                    self.paginas.append(texto)
-            pdf.close()
+            from app.utils.pdf_extracao import documento_pdf
+
+            doc = documento_pdf(pdf_bytes=self.pdf_bytes)
+            if doc is None:
+                return ''
+            textos = [t for t in doc.textos_paginas() if t]
+            self.paginas.extend(textos)
             return '\n'.join(textos)
         except Exception as e:
             logger.warning(f"pdfplumber falhou na fatura: {e}")
@@ -105,16 +101,12 @@ class FaturaPDFParser:
     def _extrair_com_pypdf(self) -> str:
         """Extrai texto usando pypdf (fallback)"""
         try:
-            import pypdf
-            import io
-
-            reader = pypdf.PdfReader(io.BytesIO(self.pdf_bytes))
-            textos = []
-            for page in reader.pages:
-                texto = page.extract_text()
-                if texto:
-                    textos.append(texto)
-            return '\n'.join(textos)
+            from app.utils.pdf_extracao import documento_pdf
+
+            doc = documento_pdf(pdf_bytes=self.pdf_bytes)
+            if doc is None:
+                return ''
+            return '\n'.join(t for t in doc.textos_pypdf() if t)
         except Exception as e:
             logger.warning(f"pypdf falhou na fatura: {e}")
             return ''
@@ -21,7 +21,7 @@ import os
 import re
 from io import BytesIO
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 from app import db
 from sqlalchemy.exc import IntegrityError
@@ -105,14 +105,16 @@ class ImportacaoService:
 
         return 'DESCONHECIDO'
 
-    def _is_dacte_pdf(self, conteudo: bytes) -> bool:
+    def _is_dacte_pdf(self, conteudo: bytes, danfe: Optional[DanfePDFParser] = None) -> bool:
         """Verifica se um PDF e DACTE (CTe) e nao DANFE (NF-e).
 
         Usa DanfePDFParser apenas para extrair texto, depois verifica
         marcadores DACTE: texto "DACTE"/"Conhecimento de Transporte"
-        ou modelo 57 na chave de 44 digitos.
+        ou modelo 57 na chave de 44 digitos. `danfe` ja instanciado pelo
+        chamador evita repetir a extracao.
         """
-        danfe = DanfePDFParser(pdf_bytes=conteudo)
+        if danfe is None:
+            danfe = DanfePDFParser(pdf_bytes=conteudo)
         if not danfe.is_valid():
             return False
 
@@ -143,13 +145,17 @@ class ImportacaoService:
            — protege contra falha na extracao de chave (ex: PDFs de 2+ paginas
            onde pdfplumber quebra a chave em linhas diferentes)
         4. Fatura: fallback final
+
+        Texto extraido uma vez (app.utils.pdf_extracao): o parser escolhido
+        depois reaproveita o mesmo documento em cache.
         """
+        danfe = DanfePDFParser(pdf_bytes=conteudo)
+
         # 1. DACTE primeiro — DACTEs tambem tem chaves de 44 digitos
-        if self._is_dacte_pdf(conteudo):
+        if self._is_dacte_pdf(conteudo, danfe=danfe):
             return 'PDF_DACTE'
 
         # 2. DANFE: chave 44 digitos (modelo 55)
-        danfe = DanfePDFParser(pdf_bytes=conteudo)
         if danfe.is_valid():
             chave = danfe.get_chave_acesso()
             if chave and len(chave) == 44:
@@ -195,13 +201,22 @@ class ImportacaoService:
             return 'DESCONHECIDO'
 
     def processar_arquivos(self, arquivos: List[Tuple[str, bytes]],
-                           criado_por: str) -> Dict:
+                           criado_por: str,
+                           progresso: Optional[Callable[[int, int, str, str], None]] = None,
+                           paralelo: bool = False) -> Dict:
         """
         Processa lista de arquivos (nome, conteudo bytes).
 
+        Parsing (classificar + parsear) e delegado ao ParsingPipeline: cache
+        por hash de conteudo e, com `paralelo=True` (job RQ), pool de
+        processos para os PDFs. Storage e pos-processamento seguem aqui, na
+        ordem original dos arquivos.
+
         Args:
             arquivos: Lista de tuplas (nome_arquivo, conteudo_bytes)
             criado_por: Email do usuario
+            progresso: callback(concluidos, total, nome, tipo) por arquivo parseado
+            paralelo: usar pool de processos (NAO usar em request web)
 
         Returns:
             Dict com resultado do processamento:
@@ -211,17 +226,27 @@ class ImportacaoService:
             - matches: resultado do matching
             - erros: lista de erros
         """
+        from app.carvia.services.parsers.parsing_pipeline import ParsingPipeline
+
         nfs_parseadas = []
         ctes_parseados = []
         faturas_parseadas = []
         erros = []
 
-        for nome, conteudo in arquivos:
-            tipo = self.classificar_arquivo(nome, conteudo)
+        parseados = ParsingPipeline().parsear_lote(
+            arquivos, progresso=progresso, paralelo=paralelo,
+        )
+
+        for (nome, conteudo), parse in zip(arquivos, parseados):
+            tipo = parse['tipo']
+            dados = parse['dados']
+
+            if parse['erro'] is not None:
+                erros.append(f'{nome}: Erro ao processar - {parse["erro"]}')
+                continue
 
             try:
                 if tipo == 'XML_NFE':
-                    dados = self._parsear_nfe_xml(conteudo, nome)
                     if dados:
                         dados['arquivo_xml_path'] = self._salvar_arquivo_storage(
                             conteudo, nome, 'carvia/nfs_xml'
@@ -231,7 +256,6 @@ class ImportacaoService:
                         erros.append(f'{nome}: Nao foi possivel extrair dados da NF-e XML')
 
                 elif tipo == 'XML_CTE':
-                    dados = self._parsear_cte_xml(conteudo, nome)
                     if dados:
                         dados['cte_xml_path'] = self._salvar_arquivo_storage(
                             conteudo, nome, 'carvia/ctes_xml'
@@ -241,7 +265,6 @@ class ImportacaoService:
                         erros.append(f'{nome}: Nao foi possivel extrair dados do CTe XML')
 
                 elif tipo == 'PDF_DACTE':
-                    dados = self._parsear_dacte_pdf(conteudo, nome)
                     if dados:
                         pdf_path = self._salvar_arquivo_storage(
                             conteudo, nome, 'carvia/ctes_pdf'
@@ -252,7 +275,6 @@ class ImportacaoService:
                         erros.append(f'{nome}: Nao foi possivel extrair dados do DACTE PDF')
 
                 elif tipo == 'PDF_DANFE':
-                    dados = self._parsear_danfe_pdf(conteudo, nome)
                     if dados:
                         dados['arquivo_pdf_path'] = self._salvar_arquivo_storage(
                             conteudo, nome, 'carvia/nfs_pdf'
@@ -262,7 +284,7 @@ class ImportacaoService:
                         erros.append(f'{nome}: Nao foi possivel extrair dados do DANFE PDF')
 
                 elif tipo == 'PDF_FATURA':
-                    dados_lista = self._parsear_fatura_pdf(conteudo, nome)
+                    dados_lista = dados
                     if dados_lista:
                         # PDF multi-pagina: salvar UMA vez, atribuir MESMO path a TODAS as faturas
                         pdf_path = self._salvar_arquivo_storage(
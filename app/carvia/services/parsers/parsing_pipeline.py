@@ -0,0 +1,318 @@
+"""
+Parsing Pipeline — Estagio de parsing paralelo com cache por hash
+==================================================================
+
+Separa o estagio CPU-bound da importacao (classificar + parsear PDFs/XMLs)
+do restante do fluxo (storage S3, classificacao CNPJ, matching, pre-checks
+no banco), que continua em ImportacaoService.processar_arquivos.
+
+- Cache por conteudo (sha256): LRU local + Redis (TTL 7 dias). Re-upload do
+  mesmo arquivo nao reparseia (nem repete chamadas LLM da FaturaPDFParser).
+  No Redis o resultado vai em JSON com tipos marcados (date/datetime/Decimal/
+  bytes) — nunca pickle: quem escreve no Redis nao executa codigo em quem le.
+- Pool de processos (fork) para lotes grandes de PDF — pdfplumber e puro
+  CPU e segura o GIL. XMLs sao rapidos e parseiam inline.
+- Callback de progresso por arquivo (job RQ grava em job.meta).
+
+Cada worker do pool roda `parsear_documento`, funcao pura: SEM banco, SEM
+storage, SEM app context — so bytes -> dict.
+
+ENV vars:
+    CARVIA_PARSE_WORKERS          (default min(4, cpus))
+    CARVIA_PARSE_POOL_MIN_PDFS    (default 4)  abaixo disso, parse inline
+    CARVIA_PARSE_CACHE_TTL        (default 604800)
+"""
+
+import base64
+import copy
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Versao do formato cacheado — incrementar quando um parser mudar o dict de saida
+CACHE_VERSAO = 'v2'
+_CACHE_PREFIXO = f'carvia:parse:{CACHE_VERSAO}'
+_CACHE_TTL = int(os.environ.get('CARVIA_PARSE_CACHE_TTL', str(7 * 24 * 3600)))
+_LRU_MAX = 256
+
+
+def hash_conteudo(conteudo: bytes) -> str:
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Funcao executada no worker do pool
+# ---------------------------------------------------------------------------
+_servico_processo = None
+
+
+def _servico():
+    """ImportacaoService por processo (classificacao + parsers; sem banco)."""
+    global _servico_processo
+    if _servico_processo is None:
+        from app.carvia.services.parsers.importacao_service import ImportacaoService
+        _servico_processo = ImportacaoService()
+    return _servico_processo
+
+
+def parsear_documento(nome: str, conteudo: bytes) -> Dict:
+    """Classifica e parseia UM arquivo. Roda no pool — deve ser picklavel.
+
+    Returns:
+        {'tipo': str, 'dados': dict | list | None, 'erro': str | None}
+        `dados` e lista apenas para PDF_FATURA (1 fatura por pagina).
+    """
+    servico = _servico()
+    tipo = 'DESCONHECIDO'
+    try:
+        tipo = servico.classificar_arquivo(nome, conteudo)
+        if tipo == 'XML_NFE':
+            dados = servico._parsear_nfe_xml(conteudo, nome)
+        elif tipo == 'XML_CTE':
+            dados = servico._parsear_cte_xml(conteudo, nome)
+        elif tipo == 'PDF_DACTE':
+            dados = servico._parsear_dacte_pdf(conteudo, nome)
+        elif tipo == 'PDF_DANFE':
+            dados = servico._parsear_danfe_pdf(conteudo, nome)
+        elif tipo == 'PDF_FATURA':
+            dados = servico._parsear_fatura_pdf(conteudo, nome)
+        else:
+            dados = None
+    except Exception as e:
+        logger.error(f"Erro ao parsear {nome}: {e}")
+        return {'tipo': tipo, 'dados': None, 'erro': str(e)}
+    return {'tipo': tipo, 'dados': dados, 'erro': None}
+
+
+# ---------------------------------------------------------------------------
+# Serializacao do cache (JSON com tipos marcados)
+# ---------------------------------------------------------------------------
+_TIPO = '__tipo__'
+
+
+def _json_default(valor):
+    """Marca os tipos que matching e salvar_importacao esperam de volta."""
+    if isinstance(valor, datetime):
+        return {_TIPO: 'datetime', 'v': valor.isoformat()}
+    if isinstance(valor, date):
+        return {_TIPO: 'date', 'v': valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {_TIPO: 'decimal', 'v': str(valor)}
+    if isinstance(valor, (bytes, bytearray)):
+        return {_TIPO: 'bytes', 'v': base64.b64encode(valor).decode('ascii')}
+    raise TypeError(f'tipo nao serializavel no cache de parse: {type(valor).__name__}')
+
+
+_DESSERIALIZADORES = {
+    'datetime': datetime.fromisoformat,
+    'date': date.fromisoformat,
+    'decimal': Decimal,
+    'bytes': base64.b64decode,
+}
+
+
+def _json_objeto(obj: Dict):
+    tipo = obj.get(_TIPO)
+    if tipo is None or len(obj) != 2:
+        return obj
+    return _DESSERIALIZADORES[tipo](obj['v'])
+
+
+def serializar_resultado(resultado: Dict) -> str:
+    return json.dumps(resultado, default=_json_default, ensure_ascii=False)
+
+
+def desserializar_resultado(bruto) -> Dict:
+    return json.loads(bruto, object_hook=_json_objeto)
+
+
+# ---------------------------------------------------------------------------
+# Cache por hash de conteudo
+# ---------------------------------------------------------------------------
+class CacheParse:
+    """LRU local + Redis. Valores sao copiados na leitura (callers mutam os dicts)."""
+
+    def __init__(self, max_local: int = _LRU_MAX, usar_redis: bool = True):
+        self.max_local = max_local
+        self.usar_redis = usar_redis
+        self._local: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _redis(self):
+        if not self.usar_redis:
+            return None
+        try:
+            from app.utils.redis_cache import redis_cache
+            return redis_cache.client if redis_cache.disponivel else None
+        except Exception:
+            return None
+
+    def get(self, sha: str) -> Optional[Dict]:
+        with self._lock:
+            if sha in self._local:
+                self._local.move_to_end(sha)
+                return copy.deepcopy(self._local[sha])
+        cliente = self._redis()
+        if cliente is None:
+            return None
+        try:
+            bruto = cliente.get(f'{_CACHE_PREFIXO}:{sha}')
+            if not bruto:
+                return None
+            resultado = desserializar_resultado(bruto)
+        except Exception as e:
+            logger.debug(f"Cache parse Redis ilegivel ({sha[:12]}): {e}")
+            return None
+        self._guardar_local(sha, resultado)
+        return copy.deepcopy(resultado)
+
+    def set(self, sha: str, resultado: Dict) -> None:
+        self._guardar_local(sha, copy.deepcopy(resultado))
+        cliente = self._redis()
+        if cliente is None:
+            return
+        try:
+            cliente.setex(f'{_CACHE_PREFIXO}:{sha}', _CACHE_TTL, serializar_resultado(resultado))
+        except Exception as e:
+            logger.debug(f"Falha ao gravar cache parse ({sha[:12]}): {e}")
+
+    def _guardar_local(self, sha: str, resultado: Dict) -> None:
+        with self._lock:
+            self._local[sha] = resultado
+            self._local.move_to_end(sha)
+            while len(self._local) > self.max_local:
+                self._local.popitem(last=False)
+
+
+cache_parse = CacheParse()
+
+
+def _cacheavel(resultado: Dict) -> bool:
+    """So cacheia parse bem-sucedido — falha pode ser transiente (LLM da fatura)."""
+    return resultado.get('erro') is None and bool(resultado.get('dados'))
+
+
+def _renomear(resultado: Dict, nome: str) -> Dict:
+    """Resultado cacheado veio de outro upload: ajusta arquivo_nome_original."""
+    dados = resultado.get('dados')
+    for item in (dados if isinstance(dados, list) else [dados] if dados else []):
+        item['arquivo_nome_original'] = nome
+    return resultado
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+def _workers_padrao() -> int:
+    try:
+        return max(1, int(os.environ.get('CARVIA_PARSE_WORKERS', '0')) or min(4, os.cpu_count() or 1))
+    except ValueError:
+        return min(4, os.cpu_count() or 1)
+
+
+class ParsingPipeline:
+    """Parseia um lote de arquivos mantendo a ordem de entrada."""
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 pool_min_pdfs: Optional[int] = None,
+                 cache: Optional[CacheParse] = None):
+        self.max_workers = max_workers or _workers_padrao()
+        self.pool_min_pdfs = pool_min_pdfs or int(
+            os.environ.get('CARVIA_PARSE_POOL_MIN_PDFS', '4')
+        )
+        self.cache = cache if cache is not None else cache_parse
+
+    def parsear_lote(
+        self,
+        arquivos: List[Tuple[str, bytes]],
+        progresso: Optional[Callable[[int, int, str, str], None]] = None,
+        paralelo: bool = False,
+    ) -> List[Dict]:
+        """
+        Args:
+            arquivos: [(nome, conteudo)]
+            progresso: callback(concluidos, total, nome, tipo) por arquivo
+            paralelo: usa pool de processos para os PDFs (jobs RQ). Em request
+                web fica False — fork de worker gunicorn nao e seguro.
+
+        Returns:
+            Lista na MESMA ordem de `arquivos`:
+            {'nome', 'hash', 'tipo', 'dados', 'erro', 'cache'}
+        """
+        total = len(arquivos)
+        resultados: List[Optional[Dict]] = [None] * total
+        concluidos = 0
+
+        def _concluir(idx: int, resultado: Dict):
+            nonlocal concluidos
+            resultados[idx] = resultado
+            concluidos += 1
+            if progresso is not None:
+                try:
+                    progresso(concluidos, total, resultado['nome'], resultado['tipo'])
+                except Exception as e:
+                    logger.debug(f"Callback de progresso falhou: {e}")
+
+        pendentes_pdf = []
+        for idx, (nome, conteudo) in enumerate(arquivos):
+            sha = hash_conteudo(conteudo)
+            cacheado = self.cache.get(sha)
+            if cacheado is not None:
+                _concluir(idx, {**_renomear(cacheado, nome), 'nome': nome, 'hash': sha, 'cache': True})
+                continue
+            if os.path.splitext(nome)[1].lower() == '.pdf':
+                pendentes_pdf.append((idx, nome, conteudo, sha))
+                continue
+            _concluir(idx, self._registrar(nome, sha, parsear_documento(nome, conteudo)))
+
+        if paralelo and len(pendentes_pdf) >= self.pool_min_pdfs and self.max_workers > 1:
+            pendentes_pdf = self._parsear_em_pool(pendentes_pdf, _concluir)
+
+        for idx, nome, conteudo, sha in pendentes_pdf:
+            _concluir(idx, self._registrar(nome, sha, parsear_documento(nome, conteudo)))
+
+        return resultados
+
+    def _registrar(self, nome: str, sha: str, resultado: Dict) -> Dict:
+        if _cacheavel(resultado):
+            self.cache.set(sha, resultado)
+        return {**resultado, 'nome': nome, 'hash': sha, 'cache': False}
+
+    def _parsear_em_pool(self, pendentes: list, concluir: Callable) -> list:
+        """Distribui PDFs no pool. Retorna os que sobraram (pool quebrado -> inline)."""
+        restantes = {idx: (idx, nome, conteudo, sha) for idx, nome, conteudo, sha in pendentes}
+        workers = min(self.max_workers, len(pendentes))
+        logger.info(f"Parsing paralelo: {len(pendentes)} PDFs em {workers} processos")
+        try:
+            contexto = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as pool:
+                futuros = {
+                    pool.submit(parsear_documento, nome, conteudo): (idx, nome, sha)
+                    for idx, nome, conteudo, sha in pendentes
+                }
+                for futuro in as_completed(futuros):
+                    idx, nome, sha = futuros[futuro]
+                    try:
+                        resultado = futuro.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        resultado = {'tipo': 'DESCONHECIDO', 'dados': None, 'erro': str(e)}
+                    concluir(idx, self._registrar(nome, sha, resultado))
+                    restantes.pop(idx, None)
+        except (BrokenProcessPool, OSError, ValueError) as e:
+            logger.warning(
+                f"Pool de parsing indisponivel ({e}) — {len(restantes)} PDFs seguem inline"
+            )
+        return list(restantes.values())
@@ -23,21 +23,20 @@ API:
     ]
     gerar_excel_duplo_cabecalho(colunas, linhas_dict, sheet_name, entity_name)
 
+Escrita em streaming (xlsxwriter constant_memory) via app/utils/streaming_export.py:
+`linhas` pode ser gerador. Estilos de cabecalho (azul 1F4E78/2E75B6) vem do motor.
+
 Formato numerico segue padrao pt-BR. DATAS (fmt='date'/'datetime') sao
 gravadas como objeto date/datetime NATIVO do Excel (ordenavel
 cronologicamente — 05/01/26 antes de 01/02/26), com a mascara visivel
-DD/MM/YYYY vinda de _numberformat. Para worksheets montados fora deste helper
+DD/MM/YYYY (mesmas mascaras de _numberformat). Para worksheets montados fora deste helper
 (df-based / openpyxl direto), usar `aplicar_formato_datas(ws, min_row=...)`.
 """
 from dataclasses import dataclass, field
 from datetime import date, datetime
-from io import BytesIO
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
-from flask import send_file
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from openpyxl.utils import get_column_letter
+from app.utils.streaming_export import Aba, resposta_export
 
 
 @dataclass
@@ -56,20 +55,6 @@ class ColunaGrupo:
     campos: List[Campo] = field(default_factory=list)
 
 
-# Estilos
-_HDR_FILL_GRUPO = PatternFill(start_color='1F4E78', end_color='1F4E78', fill_type='solid')
-_HDR_FILL_CAMPO = PatternFill(start_color='2E75B6', end_color='2E75B6', fill_type='solid')
-_HDR_FONT = Font(bold=True, color='FFFFFF', size=11)
-_HDR_FONT_CAMPO = Font(bold=True, color='FFFFFF', size=10)
-_HDR_ALIGN = Alignment(horizontal='center', vertical='center', wrap_text=True)
-_BORDER = Border(
-    left=Side(style='thin', color='CCCCCC'),
-    right=Side(style='thin', color='CCCCCC'),
-    top=Side(style='thin', color='CCCCCC'),
-    bottom=Side(style='thin', color='CCCCCC'),
-)
-
-
 def _fmt_value(value: Any, fmt: Optional[str]) -> Any:
     """Converte value para tipo nativo openpyxl + numformat por fmt."""
     if value is None or value == '':
@@ -131,122 +116,61 @@ def _numberformat(fmt: Optional[str]) -> Optional[str]:
     return None
 
 
+def abas_duplo_cabecalho(
+    colunas: List[ColunaGrupo],
+    linhas: Iterable[Dict[str, Any]],
+    sheet_name: str,
+) -> List[Aba]:
+    """Aba do motor de streaming (app/utils/streaming_export.py) com os grupos
+    na linha 1 (mesclados) e os campos na linha 2."""
+    grupos = [g for g in colunas if g.campos]
+    return [Aba(
+        nome=sheet_name,
+        colunas=[campo for g in grupos for campo in g.campos],
+        linhas=linhas,
+        grupos=[(g.grupo, len(g.campos)) for g in grupos],
+    )]
+
+
+def nome_arquivo_export(entity_name: str, timestamp_fn: Optional[Callable[[], str]] = None) -> str:
+    """`carvia_{entity_name}_YYYYMMDD_HHMM` (sem extensao)."""
+    if timestamp_fn is None:
+        from app.utils.timezone import agora_utc_naive
+        timestamp = agora_utc_naive().strftime('%Y%m%d_%H%M')
+    else:
+        timestamp = timestamp_fn()
+    return f'carvia_{entity_name}_{timestamp}'
+
+
 def gerar_excel_duplo_cabecalho(
     colunas: List[ColunaGrupo],
-    linhas: List[Dict[str, Any]],
+    linhas: Iterable[Dict[str, Any]],
     sheet_name: str,
     entity_name: str,
     timestamp_fn: Optional[Callable[[], str]] = None,
+    formato: str = 'xlsx',
 ):
     """Gera Excel com linha 1 (grupos merged) + linha 2 (campos) + dados.
 
+    Escrita via xlsxwriter constant_memory em arquivo temporario: `linhas`
+    pode ser um gerador (lotes de cursor server-side) — so as primeiras 200
+    linhas ficam em memoria (largura automatica das colunas).
+
     Args:
         colunas: lista ordenada de ColunaGrupo (cada grupo com N campos)
-        linhas:  lista de dicts {key_do_campo: valor}
+        linhas:  iteravel de dicts {key_do_campo: valor}
         sheet_name: nome da aba
         entity_name: usado no nome do arquivo `carvia_{entity_name}_YYYYMMDD_HHMM.xlsx`
         timestamp_fn: funcao que retorna timestamp string (default: agora_utc_naive)
+        formato: 'xlsx' ou 'csv' (cabecalho simples, streaming)
 
     Returns:
-        flask send_file response.
+        flask response.
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = sheet_name[:31]  # limite openpyxl
-
-    # ---- Linha 1: grupos merged ----
-    col_idx = 1
-    for grupo in colunas:
-        n_cols = len(grupo.campos)
-        if n_cols == 0:
-            continue
-        start = col_idx
-        end = col_idx + n_cols - 1
-
-        cell = ws.cell(row=1, column=start, value=grupo.grupo)
-        cell.fill = _HDR_FILL_GRUPO
-        cell.font = _HDR_FONT
-        cell.alignment = _HDR_ALIGN
-        cell.border = _BORDER
-
-        if n_cols > 1:
-            ws.merge_cells(
-                start_row=1, end_row=1, start_column=start, end_column=end
-            )
-            # Estilo nas celulas mescladas (merge mantem so a esquerda)
-            for c in range(start + 1, end + 1):
-                mc = ws.cell(row=1, column=c)
-                mc.fill = _HDR_FILL_GRUPO
-                mc.border = _BORDER
-
-        col_idx = end + 1
-
-    # ---- Linha 2: campos ----
-    col_idx = 1
-    for grupo in colunas:
-        for campo in grupo.campos:
-            cell = ws.cell(row=2, column=col_idx, value=campo.label)
-            cell.fill = _HDR_FILL_CAMPO
-            cell.font = _HDR_FONT_CAMPO
-            cell.alignment = _HDR_ALIGN
-            cell.border = _BORDER
-            col_idx += 1
-
-    ws.freeze_panes = 'A3'  # congela cabecalhos
-
-    # ---- Linhas de dados ----
-    for idx, linha in enumerate(linhas, start=3):
-        col_idx = 1
-        for grupo in colunas:
-            for campo in grupo.campos:
-                raw = linha.get(campo.key)
-                cell = ws.cell(row=idx, column=col_idx, value=_fmt_value(raw, campo.fmt))
-                num_fmt = _numberformat(campo.fmt)
-                if num_fmt:
-                    cell.number_format = num_fmt
-                cell.border = _BORDER
-                col_idx += 1
-
-    # ---- Larguras ----
-    col_idx = 1
-    for grupo in colunas:
-        for campo in grupo.campos:
-            letter = get_column_letter(col_idx)
-            if campo.width:
-                ws.column_dimensions[letter].width = campo.width
-            else:
-                # auto: max(label, conteudo amostrado)
-                max_len = len(campo.label)
-                for linha in linhas[:200]:  # amostra
-                    v = linha.get(campo.key)
-                    if v is not None:
-                        l = len(str(_fmt_value(v, campo.fmt)))
-                        if l > max_len:
-                            max_len = l
-                ws.column_dimensions[letter].width = min(max(max_len + 2, 10), 50)
-            col_idx += 1
-
-    # ---- Altura linha 1 (grupos) ----
-    ws.row_dimensions[1].height = 22
-    ws.row_dimensions[2].height = 28
-
-    # ---- Gerar arquivo ----
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    if timestamp_fn is None:
-        from app.utils.timezone import agora_utc_naive
-        timestamp = agora_utc_naive().strftime('%Y%m%d_%H%M')
-    else:
-        timestamp = timestamp_fn()
-    filename = f'carvia_{entity_name}_{timestamp}.xlsx'
-
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=filename,
+    return resposta_export(
+        abas_duplo_cabecalho(colunas, linhas, sheet_name),
+        formato,
+        nome_arquivo_export(entity_name, timestamp_fn),
     )
 
 
@@ -0,0 +1,146 @@
+"""
+Job RQ: Processamento de uploads grandes de importacao CarVia.
+
+Uploads com muitos arquivos (>= CARVIA_IMPORT_ASYNC_MIN_ARQUIVOS) saem do
+request web: a rota grava os bytes em Redis (chaves temporarias, TTL 1h) e
+enfileira `processar_importacao_job`. O job roda
+`ImportacaoService.processar_arquivos(paralelo=True)` — parsing dos PDFs em
+pool de processos + cache por hash (ver parsers/parsing_pipeline.py).
+
+Progresso por arquivo em job.meta ('progress', 'msg', 'concluidos', 'total',
+'ultimo_arquivo') — a tela de upload faz polling em
+/carvia/importar/status/<job_id> e, ao terminar, abre o preview com a
+`importacao_chave` (mesma chave Redis do fluxo sincrono). Job que termina com
+sucesso=False (preview nao gravado) e reportado como 'failed' pela rota de
+status, com o `erro` do retorno — a tela nao abre um preview inexistente.
+
+Fila: `default`.
+"""
+import logging
+import os
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_ARQUIVO_TTL = 3600
+
+
+def _redis_binario():
+    """Conexao SEM decode_responses — os arquivos sao bytes."""
+    from redis import Redis
+    return Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+
+
+def _arquivo_redis_key(chave_uuid: str, indice: int) -> str:
+    return f'carvia:importacao_arquivo:{chave_uuid}:{indice}'
+
+
+def armazenar_arquivos_upload(chave_uuid: str, arquivos: List[Tuple[str, bytes]]) -> List[Tuple[str, str]]:
+    """Grava os bytes do upload no Redis para o worker. Retorna [(nome, chave_redis)]."""
+    conn = _redis_binario()
+    refs = []
+    pipe = conn.pipeline(transaction=False)
+    for indice, (nome, conteudo) in enumerate(arquivos):
+        chave = _arquivo_redis_key(chave_uuid, indice)
+        pipe.setex(chave, _ARQUIVO_TTL, conteudo)
+        refs.append((nome, chave))
+    pipe.execute()
+    return refs
+
+
+def processar_importacao_job(user_id: int, criado_por: str, chave_uuid: str,
+                             refs: List[Tuple[str, str]]) -> dict:
+    """Job RQ: parseia o upload e grava o resultado na chave de preview.
+
+    Args:
+        user_id: usuario dono da importacao (compoe a chave Redis do preview)
+        criado_por: email do usuario
+        chave_uuid: `importacao_chave` usada pelo preview/confirmacao
+        refs: [(nome_arquivo, chave_redis_dos_bytes)]
+
+    Returns:
+        dict com {sucesso, importacao_chave, arquivos, erros, erro}
+        (`erro` preenchido quando sucesso=False)
+    """
+    from rq import get_current_job
+
+    from app import create_app
+
+    job = get_current_job()
+
+    def _progress(p, msg, **extra):
+        if job is None:
+            return
+        try:
+            job.meta['progress'] = p
+            job.meta['msg'] = msg
+            job.meta.update(extra)
+            job.save_meta()
+        except Exception:
+            pass
+
+    conn = _redis_binario()
+    arquivos = []
+    faltando = []
+    for nome, chave in refs:
+        conteudo = conn.get(chave)
+        if conteudo is None:
+            faltando.append(nome)
+            continue
+        arquivos.append((nome, conteudo))
+
+    total = len(arquivos)
+    _progress(2, f'Processando {total} arquivos', concluidos=0, total=total)
+
+    def _progresso_arquivo(concluidos, total_lote, nome, tipo):
+        # Parsing = 2..90%; storage/matching/pre-checks = 90..100%
+        p = 2 + int(88 * concluidos / max(total_lote, 1))
+        _progress(
+            p, f'{concluidos}/{total_lote} arquivos parseados',
+            concluidos=concluidos, total=total_lote, ultimo_arquivo=nome, ultimo_tipo=tipo,
+        )
+
+    app = create_app()
+    with app.app_context():
+        from app.carvia.routes.importacao_routes import _IMPORTACAO_TTL, _importacao_redis_key
+        from app.carvia.services.parsers.importacao_service import ImportacaoService
+        from app.utils.redis_cache import redis_cache
+
+        resultado = ImportacaoService().processar_arquivos(
+            arquivos, criado_por=criado_por,
+            progresso=_progresso_arquivo, paralelo=True,
+        )
+        if faltando:
+            resultado['erros'] = [
+                f'{nome}: Arquivo expirou antes do processamento — reenvie'
+                for nome in faltando
+            ] + resultado.get('erros', [])
+
+        _progress(95, 'Salvando resultado')
+        salvo = redis_cache.set(
+            _importacao_redis_key(user_id, chave_uuid), resultado, ttl=_IMPORTACAO_TTL,
+        )
+
+    try:
+        conn.delete(*[chave for _, chave in refs])
+    except Exception as e:
+        logger.debug(f"Falha ao remover arquivos temporarios da importacao {chave_uuid}: {e}")
+
+    erro = None
+    if not salvo:
+        erro = 'Nao foi possivel salvar o resultado da importacao — reenvie os arquivos'
+        logger.error(f"Importacao CarVia {chave_uuid}: preview nao gravado no Redis (user={user_id})")
+        _progress(100, erro, concluidos=total, total=total)
+    else:
+        _progress(100, 'Concluido', concluidos=total, total=total)
+    logger.info(
+        f"Importacao CarVia {chave_uuid}: {total} arquivos, "
+        f"{len(resultado.get('erros', []))} erros (user={user_id})"
+    )
+    return {
+        'sucesso': bool(salvo),
+        'importacao_chave': chave_uuid,
+        'arquivos': total,
+        'erros': len(resultado.get('erros', [])),
+        'erro': erro,
+    }
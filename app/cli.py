@@ -255,4 +255,18 @@ def importar_cidades_cli(arquivo_excel):
         
     except Exception as e:
         db.session.rollback()
-        click.echo(f"❌ Erro na importação: {e}") 
\ No newline at end of file
+        click.echo(f"❌ Erro na importação: {e}") 
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_cli():
+    """Gera bundles CSS/JS com hash + .gz/.br em static/dist (build.sh)."""
+    from flask import current_app
+    from app.utils.asset_bundler import build_assets
+
+    static_root = os.path.join(current_app.root_path, 'static')
+    manifest = build_assets(static_root)
+    for nome, arquivo in sorted(manifest.items()):
+        tamanho = os.path.getsize(os.path.join(static_root, arquivo))
+        click.echo(f"✅ {nome} -> {arquivo} ({tamanho / 1024:.0f} KB)")
@@ -2,8 +2,12 @@
 Service otimizado para agregações do módulo comercial
 Elimina problemas N+1 e melhora performance em 90%
 
-Usa materialized views (mv_comercial_equipes, mv_comercial_vendedores) quando disponiveis.
-Fallback para CTE original se views nao existirem.
+Usa os agregados incrementais (comercial_agregado_cliente + comercial_agregado_delta,
+migration 2026-10-19_comercial_agregados_incrementais) quando disponiveis:
+triggers nas tabelas de origem gravam deltas por (origem, equipe, vendedor, cliente)
+e o scheduler compacta os deltas no resumo. A leitura soma resumo + deltas
+pendentes, entao o dashboard nunca fica defasado.
+Fallback para CTE original se as tabelas nao existirem.
 
 Autor: Sistema de Fretes
 Data: 21/01/2025
@@ -18,39 +22,167 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# Cache do status das materialized views (verificado 1x por processo)
-_mv_disponivel = None
+# Cache do status dos agregados incrementais (verificado 1x por processo)
+_agregado_disponivel = None
 
 
-def _verificar_mv_disponivel():
-    """Verifica se as materialized views existem no banco."""
-    global _mv_disponivel
-    if _mv_disponivel is not None:
-        return _mv_disponivel
+def _verificar_agregado_disponivel():
+    """Verifica se as tabelas de agregado incremental existem no banco."""
+    global _agregado_disponivel
+    if _agregado_disponivel is not None:
+        return _agregado_disponivel
     try:
         result = db.session.execute(text(
-            "SELECT COUNT(*) FROM pg_matviews WHERE matviewname = 'mv_comercial_equipes'"
+            "SELECT to_regclass('comercial_agregado_cliente') IS NOT NULL"
         ))
-        _mv_disponivel = result.scalar() > 0
+        _agregado_disponivel = bool(result.scalar())
     except Exception:
-        _mv_disponivel = False
-    return _mv_disponivel
+        db.session.rollback()
+        _agregado_disponivel = False
+    return _agregado_disponivel
+
+
+def _sql_agregado(filtro: str) -> str:
+    """
+    CTE `agregado`: resumo compactado + deltas ainda nao compactados, somados
+    por chave na mesma query (mesmo snapshot). Mantem so chaves com linhas > 0.
+    """
+    return f"""
+        WITH agregado AS (
+            SELECT origem, equipe_vendas, vendedor, cnpj,
+                   SUM(linhas) AS linhas,
+                   SUM(valor) AS valor,
+                   SUM(valor_exato) AS valor_exato
+            FROM (
+                SELECT origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato
+                FROM comercial_agregado_cliente
+                WHERE {filtro}
+                UNION ALL
+                SELECT origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato
+                FROM comercial_agregado_delta
+                WHERE {filtro}
+            ) u
+            GROUP BY origem, equipe_vendas, vendedor, cnpj
+            HAVING SUM(linhas) > 0
+        )
+    """
 
 
 def refresh_materialized_views():
-    """Atualiza as materialized views. Chamado pelo scheduler."""
+    """
+    Compacta os deltas pendentes no resumo comercial. Chamado pelo scheduler.
+
+    Mantem o nome historico (antes: REFRESH das MVs mv_comercial_*). Custo
+    proporcional ao que mudou desde a ultima compactacao, nao ao tamanho
+    da carteira/faturamento.
+    """
+    if not _verificar_agregado_disponivel():
+        logger.warning("Agregados comerciais incrementais indisponiveis (rodar migration 2026-10-19)")
+        return False
     try:
-        db.session.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_comercial_equipes"))
-        db.session.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_comercial_vendedores"))
+        deltas = db.session.execute(text("SELECT compactar_comercial_agregado()")).scalar()
         db.session.commit()
-        logger.info("Materialized views comerciais atualizadas")
+        logger.info(f"Agregados comerciais compactados: {deltas} deltas")
         return True
     except Exception as e:
-        logger.error(f"Erro ao atualizar materialized views: {e}")
+        logger.error(f"Erro ao compactar agregados comerciais: {e}")
         db.session.rollback()
         return False
 
 
+def reconstruir_agregados() -> int:
+    """
+    Recalcula o resumo comercial do zero (descarta deltas). Trava escritas em
+    carteira_principal/faturamento_produto/entregas_monitoradas durante a
+    recontagem — usar so para corrigir divergencia apontada por verificar_consistencia.
+
+    Returns:
+        Quantidade de chaves (origem, equipe, vendedor, cliente) no resumo
+    """
+    chaves = db.session.execute(text("SELECT reconstruir_comercial_agregado()")).scalar()
+    db.session.commit()
+    logger.info(f"Agregados comerciais reconstruidos: {chaves} chaves")
+    return int(chaves or 0)
+
+
+def comparar_agregados(
+    incremental: List[Dict[str, Any]],
+    completo: List[Dict[str, Any]],
+    chave: tuple,
+    campos: tuple,
+    tolerancia: float = 0.01
+) -> List[Dict[str, Any]]:
+    """
+    Compara duas listas de agregados pela chave.
+
+    Campos numericos divergem se a diferenca passar da tolerancia; chave
+    presente so de um lado diverge sempre.
+
+    Returns:
+        Lista de {'chave', 'campo', 'incremental', 'completo'} (vazia = consistente)
+    """
+    def indexar(linhas):
+        return {tuple(linha[c] for c in chave): linha for linha in linhas}
+
+    inc, comp = indexar(incremental), indexar(completo)
+    divergencias = []
+    for k in sorted(set(inc) | set(comp), key=lambda t: tuple('' if v is None else str(v) for v in t)):
+        a, b = inc.get(k), comp.get(k)
+        if a is None or b is None:
+            divergencias.append({'chave': k, 'campo': None, 'incremental': a, 'completo': b})
+            continue
+        for campo in campos:
+            va, vb = a.get(campo) or 0, b.get(campo) or 0
+            if abs(float(va) - float(vb)) > tolerancia:
+                divergencias.append({'chave': k, 'campo': campo, 'incremental': va, 'completo': vb})
+    return divergencias
+
+
+def verificar_consistencia(tolerancia: float = 0.01) -> Dict[str, Any]:
+    """
+    Compara os agregados incrementais com um recalculo completo.
+
+    1. Por chave (origem, equipe, vendedor, cliente): resumo + deltas x
+       comercial_agregado_completo() — pega delta perdido/duplicado.
+    2. Dashboard por equipe: leitura incremental x CTE original — pega
+       divergencia de regra entre as duas leituras.
+
+    Returns:
+        Dict com ok, chaves_divergentes e equipes_divergentes (ate 50 de cada)
+    """
+    campos_chave = ('origem', 'equipe_vendas', 'vendedor', 'cnpj')
+    campos_valor = ('linhas', 'valor', 'valor_exato')
+
+    incremental = [dict(r._mapping) for r in db.session.execute(text(
+        _sql_agregado('true') + " SELECT origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato FROM agregado"
+    ))]
+    completo = [dict(r._mapping) for r in db.session.execute(text(
+        "SELECT origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato "
+        "FROM comercial_agregado_completo()"
+    ))]
+    chaves = comparar_agregados(incremental, completo, campos_chave, campos_valor, tolerancia)
+
+    equipes = comparar_agregados(
+        AgregacaoComercialService._dashboard_via_agregado(),
+        AgregacaoComercialService._dashboard_via_cte(),
+        ('nome',), ('total_clientes', 'valor_em_aberto'), tolerancia
+    )
+
+    ok = not chaves and not equipes
+    if ok:
+        logger.info(f"Agregados comerciais consistentes ({len(completo)} chaves)")
+    else:
+        logger.warning(
+            f"Agregados comerciais divergentes: {len(chaves)} chaves, {len(equipes)} equipes"
+        )
+    return {
+        'ok': ok,
+        'total_chaves': len(completo),
+        'chaves_divergentes': chaves[:50],
+        'equipes_divergentes': equipes[:50],
+    }
+
+
 class AgregacaoComercialService:
     """
     Service otimizado que elimina queries N+1
@@ -61,8 +193,8 @@ class AgregacaoComercialService:
     def obter_dashboard_completo_otimizado(equipes_filtro: List[str] = None) -> List[Dict[str, Any]]:
         """
         Retorna todos os dados do dashboard.
-        Usa materialized view quando disponivel (leitura instantanea).
-        Fallback para CTE original se view nao existir.
+        Usa os agregados incrementais quando disponiveis (resumo + deltas).
+        Fallback para CTE original se as tabelas nao existirem.
 
         Args:
             equipes_filtro: Lista de equipes permitidas (para vendedores)
@@ -70,33 +202,35 @@ class AgregacaoComercialService:
         Returns:
             Lista com dados agregados de todas as equipes
         """
-        # Tentar usar materialized view primeiro
-        if _verificar_mv_disponivel():
+        # Tentar usar agregado incremental primeiro
+        if _verificar_agregado_disponivel():
             try:
-                return AgregacaoComercialService._dashboard_via_mv(equipes_filtro)
+                return AgregacaoComercialService._dashboard_via_agregado(equipes_filtro)
             except Exception as e:
-                logger.warning(f"Fallback para CTE: MV falhou ({e})")
+                logger.warning(f"Fallback para CTE: agregado falhou ({e})")
+                db.session.rollback()
 
         return AgregacaoComercialService._dashboard_via_cte(equipes_filtro)
 
     @staticmethod
-    def _dashboard_via_mv(equipes_filtro: List[str] = None) -> List[Dict[str, Any]]:
-        """Leitura direta da materialized view (microsegundos)."""
-        if equipes_filtro:
-            sql = text("""
-                SELECT equipe_vendas as nome, total_clientes, valor_em_aberto
-                FROM mv_comercial_equipes
-                WHERE equipe_vendas = ANY(:equipes)
-                ORDER BY equipe_vendas
-            """)
-            result = db.session.execute(sql, {'equipes': equipes_filtro})
-        else:
-            sql = text("""
-                SELECT equipe_vendas as nome, total_clientes, valor_em_aberto
-                FROM mv_comercial_equipes
-                ORDER BY equipe_vendas
-            """)
-            result = db.session.execute(sql)
+    def _dashboard_via_agregado(equipes_filtro: List[str] = None) -> List[Dict[str, Any]]:
+        """Leitura do resumo incremental por equipe (poucos milhares de linhas)."""
+        sql = text(_sql_agregado(
+            "equipe_vendas IS NOT NULL AND (:tem_filtro = false OR equipe_vendas = ANY(:equipes))"
+        ) + """
+            SELECT
+                equipe_vendas as nome,
+                COUNT(DISTINCT cnpj) FILTER (WHERE origem = 'C')
+                    + COUNT(DISTINCT cnpj) FILTER (WHERE origem = 'F') as total_clientes,
+                COALESCE(SUM(valor), 0) as valor_em_aberto
+            FROM agregado
+            GROUP BY equipe_vendas
+            ORDER BY equipe_vendas
+        """)
+        result = db.session.execute(sql, {
+            'tem_filtro': bool(equipes_filtro),
+            'equipes': equipes_filtro if equipes_filtro else []
+        })
 
         return [{
             'nome': row.nome,
@@ -179,37 +313,38 @@ class AgregacaoComercialService:
     def obter_vendedores_equipe_otimizado(equipe_nome: str, vendedores_filtro: List[str] = None) -> List[Dict[str, Any]]:
         """
         Retorna todos vendedores de uma equipe.
-        Usa materialized view quando disponivel. Fallback para CTE.
+        Usa os agregados incrementais quando disponiveis. Fallback para CTE.
         """
-        if _verificar_mv_disponivel():
+        if _verificar_agregado_disponivel():
             try:
-                return AgregacaoComercialService._vendedores_via_mv(equipe_nome, vendedores_filtro)
+                return AgregacaoComercialService._vendedores_via_agregado(equipe_nome, vendedores_filtro)
             except Exception as e:
-                logger.warning(f"Fallback para CTE vendedores: MV falhou ({e})")
+                logger.warning(f"Fallback para CTE vendedores: agregado falhou ({e})")
+                db.session.rollback()
 
         return AgregacaoComercialService._vendedores_via_cte(equipe_nome, vendedores_filtro)
 
     @staticmethod
-    def _vendedores_via_mv(equipe_nome: str, vendedores_filtro: List[str] = None) -> List[Dict[str, Any]]:
-        """Leitura direta da materialized view."""
-        params = {'equipe': equipe_nome}
-        if vendedores_filtro:
-            sql = text("""
-                SELECT vendedor as nome, total_clientes, valor_em_aberto
-                FROM mv_comercial_vendedores
-                WHERE equipe_vendas = :equipe AND vendedor = ANY(:vendedores)
-                ORDER BY vendedor
-            """)
-            params['vendedores'] = vendedores_filtro
-        else:
-            sql = text("""
-                SELECT vendedor as nome, total_clientes, valor_em_aberto
-                FROM mv_comercial_vendedores
-                WHERE equipe_vendas = :equipe
-                ORDER BY vendedor
-            """)
-
-        result = db.session.execute(sql, params)
+    def _vendedores_via_agregado(equipe_nome: str, vendedores_filtro: List[str] = None) -> List[Dict[str, Any]]:
+        """Leitura do resumo incremental por vendedor da equipe."""
+        sql = text(_sql_agregado(
+            "equipe_vendas = :equipe AND vendedor IS NOT NULL"
+            " AND (:tem_filtro = false OR vendedor = ANY(:vendedores))"
+        ) + """
+            SELECT
+                vendedor as nome,
+                COUNT(DISTINCT cnpj) FILTER (WHERE origem = 'C')
+                    + COUNT(DISTINCT cnpj) FILTER (WHERE origem = 'F') as total_clientes,
+                COALESCE(SUM(valor), 0) as valor_em_aberto
+            FROM agregado
+            GROUP BY vendedor
+            ORDER BY vendedor
+        """)
+        result = db.session.execute(sql, {
+            'equipe': equipe_nome,
+            'tem_filtro': bool(vendedores_filtro),
+            'vendedores': vendedores_filtro if vendedores_filtro else []
+        })
         return [{
             'nome': row.nome,
             'total_clientes': int(row.total_clientes) if row.total_clientes else 0,
@@ -406,6 +541,25 @@ class AgregacaoComercialService:
         if not cnpjs:
             return {}
 
+        if _verificar_agregado_disponivel():
+            try:
+                # valor_exato = SUM(saldo * preco) sem ROUND, saldo > 0.02 (mesma regra abaixo)
+                resultado = db.session.execute(text(_sql_agregado(
+                    "origem = 'C' AND cnpj = ANY(:cnpjs)"
+                ) + """
+                    SELECT cnpj, SUM(valor_exato) as valor_total
+                    FROM agregado
+                    GROUP BY cnpj
+                """), {'cnpjs': list(cnpjs)})
+                valores = {
+                    row.cnpj: Decimal(str(row.valor_total)) if row.valor_total else Decimal('0.00')
+                    for row in resultado
+                }
+                return {cnpj: valores.get(cnpj, Decimal('0.00')) for cnpj in cnpjs}
+            except Exception as e:
+                logger.warning(f"Fallback para carteira: agregado falhou ({e})")
+                db.session.rollback()
+
         try:
             # Query única para todos os CNPJs
             # TOLERÂNCIA: Considera saldo > 0.02 para evitar ruído de arredondamento
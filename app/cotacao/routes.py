@@ -206,124 +206,6 @@ def _resolver_tabela_da_cotacao_sessao(pedido, embarque, pedidos):
     return dados
 
 
-def calcular_otimizacoes_pedido_adicional(pedido, pedidos_atuais, transportadora, modalidade, peso_total, veiculos, frete_atual_kg):
-    """
-    Calcula as otimizações possíveis para um pedido que pode ser adicionado
-    ✅ NOVO: Usa TABELA MAIS CARA para cenário conservador
-    """
-    otimizacoes = {}
-    
-    # 1. Calcula frete COM este pedido adicionado
-    pedidos_com = pedidos_atuais + [pedido]
-    peso_com = peso_total + (pedido.peso_total or 0)
-    
-    # Recalcula frete com este pedido usando simulador
-    try:
-        
-        # ✅ LÓGICA TABELA MAIS CARA: Calcula com pior cenário
-        resultados = calcular_frete_otimizacao_conservadora(pedidos_com)
-        
-        # Se tem resultados diretos, pega a PIOR opção (mais cara)
-        if resultados and resultados.get('diretas'):
-            # ✅ MUDANÇA: Ordena do MAIOR para MENOR valor/kg (pior cenário)
-            opcoes_ordenadas = sorted(
-                resultados['diretas'], 
-                key=lambda x: x['valor_liquido'] / peso_com if peso_com > 0 else 0,
-                reverse=True  # Pior primeiro (mais caro)
-            )
-            
-            pior_opcao = opcoes_ordenadas[0]  # Tabela mais cara
-            novo_frete_kg = pior_opcao['valor_liquido'] / peso_com if peso_com > 0 else float('inf')
-            reducao_rota = frete_atual_kg - novo_frete_kg
-            
-            # ✅ CRITÉRIO CONSERVADOR: Se mesmo com tabela mais cara houve redução
-            if reducao_rota > 0.01:
-                otimizacoes['nova_rota_diff'] = reducao_rota
-                otimizacoes['reducao_por_kg_rota'] = reducao_rota
-                otimizacoes['nova_tabela'] = pior_opcao['nome_tabela']
-                otimizacoes['frete_bruto_novo'] = pior_opcao['valor_total']
-                otimizacoes['frete_liquido_novo'] = pior_opcao['valor_liquido']
-                otimizacoes['frete_kg_novo'] = novo_frete_kg
-                otimizacoes['frete_kg_atual'] = frete_atual_kg
-                otimizacoes['peso_atual'] = peso_total
-                otimizacoes['peso_novo'] = peso_com
-                otimizacoes['reducao_total'] = reducao_rota * peso_com
-                otimizacoes['nova_transportadora'] = pior_opcao['transportadora']
-                otimizacoes['nova_modalidade'] = pior_opcao['modalidade']
-                
-                print(f"[DEBUG] 💡 OTIMIZAÇÃO CONSERVADORA para adicionar {pedido.num_pedido}:")
-                print(f"[DEBUG]   - Frete atual: R${frete_atual_kg:.3f}/kg")
-                print(f"[DEBUG]   - Novo frete (PIOR): R${novo_frete_kg:.3f}/kg")
-                print(f"[DEBUG]   - Redução: R${reducao_rota:.3f}/kg")
-                print(f"[DEBUG]   - Tabela mais cara: {pior_opcao['nome_tabela']}")
-                
-    except Exception as e:
-        print(f"[DEBUG] Erro ao calcular otimização para adicionar {pedido.num_pedido}: {str(e)}")
-    
-    return otimizacoes if otimizacoes else None
-
-def calcular_otimizacoes_pedido(pedido, pedidos_atuais, modalidade, veiculos, frete_atual_kg):
-    """
-    Calcula as otimizações possíveis removendo um pedido específico
-    ✅ NOVO: Usa TABELA MAIS CARA para cenário conservador
-    """
-    otimizacoes = {}
-    
-    # 1. Calcula frete SEM este pedido
-    pedidos_sem = [p for p in pedidos_atuais if p.separacao_lote_id != pedido.separacao_lote_id]
-    peso_sem = sum(p.peso_total or 0 for p in pedidos_sem)
-    peso_total = sum(p.peso_total or 0 for p in pedidos_atuais)
-    
-    # Só calcula se ainda sobrar pelo menos 1 pedido
-    if not pedidos_sem:
-        return None
-    
-    # Recalcula frete sem este pedido usando simulador
-    try:
-        
-        # ✅ LÓGICA TABELA MAIS CARA: Calcula com pior cenário
-        resultados = calcular_frete_otimizacao_conservadora(pedidos_sem)
-        
-        # Se tem resultados diretos, pega a PIOR opção (mais cara)
-        if resultados and resultados.get('diretas'):
-            # ✅ MUDANÇA: Ordena do MAIOR para MENOR valor/kg (pior cenário)
-            opcoes_ordenadas = sorted(
-                resultados['diretas'], 
-                key=lambda x: x['valor_liquido'] / peso_sem if peso_sem > 0 else 0,
-                reverse=True  # Pior primeiro (mais caro)
-            )
-            
-            pior_opcao = opcoes_ordenadas[0]  # Tabela mais cara
-            novo_frete_kg = pior_opcao['valor_liquido'] / peso_sem if peso_sem > 0 else float('inf')
-            reducao_rota = frete_atual_kg - novo_frete_kg
-            
-            # ✅ CRITÉRIO CONSERVADOR: Se mesmo com tabela mais cara houve redução
-            if reducao_rota > 0.01:
-                otimizacoes['nova_rota_diff'] = reducao_rota
-                otimizacoes['reducao_por_kg_rota'] = reducao_rota
-                otimizacoes['nova_tabela'] = pior_opcao['nome_tabela']
-                otimizacoes['frete_bruto_novo'] = pior_opcao['valor_total']
-                otimizacoes['frete_liquido_novo'] = pior_opcao['valor_liquido']
-                otimizacoes['frete_kg_novo'] = novo_frete_kg
-                otimizacoes['frete_kg_atual'] = frete_atual_kg
-                otimizacoes['peso_atual'] = peso_total
-                otimizacoes['peso_novo'] = peso_sem
-                otimizacoes['reducao_total'] = reducao_rota * peso_sem
-                otimizacoes['nova_transportadora'] = pior_opcao['transportadora']
-                otimizacoes['nova_modalidade'] = pior_opcao['modalidade']
-                
-                print(f"[DEBUG] 💡 OTIMIZAÇÃO CONSERVADORA removendo {pedido.num_pedido}:")
-                print(f"[DEBUG]   - Frete atual: R${frete_atual_kg:.3f}/kg")
-                print(f"[DEBUG]   - Novo frete (PIOR): R${novo_frete_kg:.3f}/kg")
-                print(f"[DEBUG]   - Redução: R${reducao_rota:.3f}/kg")
-                print(f"[DEBUG]   - Tabela mais cara: {pior_opcao['nome_tabela']}")
-                
-    except Exception as e:
-        print(f"[DEBUG] Erro ao calcular otimização para remover {pedido.num_pedido}: {str(e)}")
-    
-    return otimizacoes if otimizacoes else None
-
-
 @cotacao_bp.route("/verificar_nf_cd", methods=["POST"])
 @login_required
 def verificar_nf_cd():
@@ -2585,11 +2467,6 @@ def otimizar():
         print(f"[OTIMIZADOR] 📊 Dados atuais: {transportadora} | {modalidade} | {peso_total}kg | R$/kg: {frete_atual_kg:.2f}")
         print(f"[OTIMIZADOR] 📦 Pedidos atuais: {len(pedidos)} | Pedidos disponíveis: {len(pedidos_mesmo_uf)}")
 
-        # ✅ CARREGA VEÍCULOS DISPONÍVEIS
-        # Import já está no topo do arquivo
-        veiculos_query = Veiculo.query.all()
-        veiculos = {normalizar_nome_veiculo(v.nome): v.peso_maximo for v in veiculos_query}
-        
         # ✅ CONVERTE PEDIDOS PARA REDESPACHO SE NECESSÁRIO
         pedidos_para_calculo = pedidos
         if redespacho_ativo:
@@ -2618,79 +2495,19 @@ def otimizar():
                 pedidos_para_calculo.append(pedido_copia)
                 print(f"[DEBUG] 📍 Convertido: {pedido_original.num_pedido} → Guarulhos/SP")
         
-        # ✅ CÁLCULO CORRETO DAS OTIMIZAÇÕES
-        otimizacoes = {
-            'remover': {},
-            'adicionar': {}
-        }
+        # ✅ OTIMIZADOR EM LOTE: carrega vinculos/tabelas uma vez e avalia
+        # todos os cenarios (remover/adicionar + consolidacoes) em memoria
+        from app.cotacao.services.otimizador_consolidacao import OtimizadorConsolidacao
 
-        print(f"[DEBUG] Calculando otimizações com pedidos {'convertidos' if redespacho_ativo else 'originais'}...")
-        
-        # Calcula otimizações para pedidos atuais (remoção)
-        for i, pedido in enumerate(pedidos):
-            try:
-                pedido_calculo = pedidos_para_calculo[i]  # Usa pedido convertido se redespacho
-                resultado = calcular_otimizacoes_pedido(pedido_calculo, pedidos_para_calculo, modalidade, veiculos, frete_atual_kg)
-                if resultado:
-                    otimizacoes['remover'][pedido.separacao_lote_id] = resultado
-                    pass  # Otimização encontrada
-                else:
-                    pass  # Nenhuma otimização encontrada
-                    # Cria uma otimização básica para mostrar dados atuais
-                    otimizacoes['remover'][pedido.separacao_lote_id] = {
-                        'frete_kg_atual': frete_atual_kg,
-                        'peso_pedido': pedido.peso_total or 0,
-                        'sem_otimizacao': True,
-                        'transportadora_atual': transportadora,
-                        'modalidade_atual': modalidade,
-                        'valor_liquido_atual': valor_liquido
-                    }
-            except Exception as e:
-                print(f"[DEBUG] ❌ Erro ao calcular otimização para pedido {pedido.num_pedido}: {str(e)}")
-                # Cria uma otimização básica mesmo com erro
-                otimizacoes['remover'][pedido.separacao_lote_id] = {
-                    'frete_kg_atual': frete_atual_kg,
-                    'peso_pedido': pedido.peso_total or 0,
-                    'erro': str(e),
-                    'transportadora_atual': transportadora,
-                    'modalidade_atual': modalidade,
-                    'valor_liquido_atual': valor_liquido
-                }
-
-        # Calcula otimizações para pedidos que podem ser adicionados
-        # ✅ CORREÇÃO: Remove limitação artificial e otimiza para performance
         max_otimizacoes = min(len(pedidos_mesmo_uf), 100)  # Limite dinâmico mais realista
         print(f"[OTIMIZADOR] 🔄 Processando {max_otimizacoes} de {len(pedidos_mesmo_uf)} pedidos para adicionar")
-        
-        for pedido in pedidos_mesmo_uf[:max_otimizacoes]:
-            try:
-                resultado = calcular_otimizacoes_pedido_adicional(pedido, pedidos_para_calculo, transportadora, modalidade, peso_total, veiculos, frete_atual_kg)
-                if resultado:
-                    otimizacoes['adicionar'][pedido.separacao_lote_id] = resultado
-                    pass  # Otimização encontrada  
-                else:
-                    pass  # Nenhuma otimização encontrada
-                    # Cria uma otimização básica para mostrar dados atuais
-                    otimizacoes['adicionar'][pedido.separacao_lote_id] = {
-                        'frete_kg_atual': frete_atual_kg,
-                        'peso_pedido': pedido.peso_total or 0,
-                        'sem_otimizacao': True,
-                        'transportadora_atual': transportadora,
-                        'modalidade_atual': modalidade,
-                        'valor_liquido_atual': valor_liquido
-                    }
-            except Exception as e:
-                print(f"[DEBUG] ❌ Erro ao calcular otimização para adicionar pedido {pedido.num_pedido}: {str(e)}")
-                # Cria uma otimização básica mesmo com erro
-                otimizacoes['adicionar'][pedido.separacao_lote_id] = {
-                    'frete_kg_atual': frete_atual_kg,
-                    'peso_pedido': pedido.peso_total or 0,
-                    'erro': str(e),
-                    'transportadora_atual': transportadora,
-                    'modalidade_atual': modalidade,
-                    'valor_liquido_atual': valor_liquido
-                }
-        
+
+        otimizador = OtimizadorConsolidacao.de_pedidos(
+            pedidos_para_calculo, pedidos_mesmo_uf[:max_otimizacoes], frete_atual_kg,
+        )
+        otimizacoes = otimizador.cenarios_unitarios(transportadora, modalidade, valor_liquido)
+        consolidacoes = otimizador.buscar_consolidacoes()
+
         print(f"[OTIMIZADOR] ✅ Finalizado: {len(otimizacoes['remover'])} otimizações de remoção | {len(otimizacoes['adicionar'])} otimizações de adição")
 
         return render_template(
@@ -2699,6 +2516,7 @@ def otimizar():
             pedidos=pedidos,
             pedidos_mesmo_uf=pedidos_mesmo_uf,
             otimizacoes=otimizacoes,
+            consolidacoes=consolidacoes,
             tipo=tipo
         )
 
@@ -3032,6 +2850,9 @@ def calcular_frete_otimizacao_conservadora(pedidos):
     11- Descarta as opções de transportadora / modalidade que atendam a apenas uma parte dos pedidos. (caso de transportadora / modalidade que não atenda a todas as cidades dos pedidos)
     12 - Descarta as modalidades que o peso_maximo (link entre veiculos.nome e tabelas.modalidade) não atenda ao total de peso dos pedidos cotados.
     13- Considera a opção mais cara
+
+    Versão em lote (vários cenários com uma carga de dados só):
+    app/cotacao/services/otimizador_consolidacao.py — ContextoTarifario.cotar
     """
     # ✅ Todos os imports já estão no topo do arquivo
     
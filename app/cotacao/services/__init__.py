@@ -0,0 +1 @@
+"""Services da cotacao de frete."""
@@ -0,0 +1,491 @@
+"""
+Otimizador de Consolidacao de Cargas
+====================================
+
+Substitui o laco de /cotacao/otimizar que, para CADA pedido da cotacao
+(remover) e CADA candidato do mesmo UF (adicionar, ate 100), chamava
+`calcular_frete_otimizacao_conservadora` — refazendo buscar_cidade_unificada,
+CidadeAtendida, TabelaFrete (1 query por vinculo), Veiculo e Cidade a cada
+cenario.
+
+1. ContextoTarifario carrega UMA vez vinculos, tabelas DIRETA, ICMS das
+   cidades e veiculos de todo o universo (pedidos atuais + candidatos).
+2. cotar() aplica a regra conservadora em memoria — tabela mais cara de cada
+   (transportadora, uf_destino, modalidade) que atende todas as cidades e
+   suporta o peso; vence a mais barata entre elas. CalculadoraFrete continua
+   sendo a fonte unica do calculo (memo por tabela/icms/peso/valor).
+3. cenarios_unitarios() gera o mesmo dict {'remover', 'adicionar'} que a tela
+   ja renderiza.
+4. buscar_consolidacoes(): busca gulosa + local (remover/trocar) sob a
+   capacidade dos veiculos (Veiculo.peso_maximo), com limite de tempo.
+   Devolve a fronteira de Pareto de R$/kg x entregas (cidades distintas) x
+   janela de datas (agendamento/expedicao).
+
+ENV vars:
+    COTACAO_OTIMIZADOR_TEMPO_MAX_S   (default 0.8)
+"""
+
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from app.utils.calculadora_frete import CalculadoraFrete
+from app.utils.tabela_frete_manager import TabelaFreteManager
+
+logger = logging.getLogger(__name__)
+
+_TEMPO_MAX_S = float(os.environ.get('COTACAO_OTIMIZADOR_TEMPO_MAX_S', '0.8'))
+
+# Reducao minima (R$/kg) para considerar otimizacao — mesmo criterio da tela
+REDUCAO_MINIMA_KG = 0.01
+
+# Candidatos testados por rodada da busca gulosa
+_LARGURA_BUSCA = 40
+
+
+@dataclass(frozen=True)
+class CargaPedido:
+    """Snapshot do pedido usado nos cenarios (sem tocar no ORM depois de carregar)."""
+    lote_id: str
+    num_pedido: str
+    peso: float
+    valor: float
+    cod_uf: Optional[str]
+    sub_rota: Optional[str]
+    cidade_id: Optional[int]
+    nome_cidade: Optional[str] = None
+    data_entrega: Optional[date] = None
+
+    @classmethod
+    def de_pedido(cls, pedido, cidade_id: Optional[int]) -> 'CargaPedido':
+        return cls(
+            lote_id=pedido.separacao_lote_id,
+            num_pedido=pedido.num_pedido,
+            peso=float(pedido.peso_total or 0),
+            valor=float(pedido.valor_saldo_total or 0),
+            cod_uf=pedido.cod_uf,
+            sub_rota=getattr(pedido, 'sub_rota', None) or None,
+            cidade_id=cidade_id,
+            nome_cidade=pedido.nome_cidade,
+            data_entrega=pedido.agendamento or pedido.expedicao,
+        )
+
+
+@dataclass
+class Cenario:
+    lotes: FrozenSet[str]
+    peso: float
+    valor: float
+    opcao: Dict
+    entregas: int
+    janela_dias: int
+
+    @property
+    def frete_kg(self) -> float:
+        return self.opcao['frete_por_kg']
+
+
+class ContextoTarifario:
+    """Vinculos/tabelas/ICMS/veiculos pre-carregados para cotar em memoria."""
+
+    def __init__(self, combinacoes: Dict[Tuple, List[Tuple[int, int]]],
+                 tabelas: Dict[int, Dict], icms_cidades: Dict[int, float],
+                 veiculos: Dict[str, float]):
+        """
+        Args:
+            combinacoes: (transportadora_id, uf_destino, modalidade) -> [(tabela_id, cidade_id)]
+            tabelas: tabela_id -> {'dados', 'optante', 'transportadora', 'nome_tabela',
+                     'valor_kg', 'percentual_valor'}
+            icms_cidades: cidade_id -> icms
+            veiculos: Veiculo.nome -> peso_maximo
+        """
+        self.combinacoes = combinacoes
+        self.tabelas = tabelas
+        self.icms_cidades = icms_cidades
+        self.veiculos = veiculos
+        self.cobertura = {
+            chave: frozenset(cidade_id for _, cidade_id in itens)
+            for chave, itens in combinacoes.items()
+        }
+        self._memo_frete: Dict[Tuple, Optional[Tuple[float, float]]] = {}
+        self._memo_cotacao: Dict[Tuple, Optional[Dict]] = {}
+        self.calculos = 0
+
+    @classmethod
+    def carregar(cls, cidade_ids: Iterable[int]) -> 'ContextoTarifario':
+        """4 queries para todo o universo de cidades (em vez de N por cenario)."""
+        from sqlalchemy import tuple_
+        from sqlalchemy.orm import joinedload
+
+        from app import db
+        from app.localidades.models import Cidade
+        from app.tabelas.models import TabelaFrete
+        from app.veiculos.models import Veiculo
+        from app.vinculos.models import CidadeAtendida
+
+        cidade_ids = {c for c in cidade_ids if c}
+        veiculos = {v.nome: v.peso_maximo or 0 for v in Veiculo.query.all()}
+        if not cidade_ids:
+            return cls({}, {}, {}, veiculos)
+
+        vinculos = CidadeAtendida.query.filter(
+            CidadeAtendida.cidade_id.in_(cidade_ids)
+        ).all()
+        pares = {(v.transportadora_id, v.nome_tabela) for v in vinculos}
+        cidades_por_par: Dict[Tuple, set] = {}
+        for v in vinculos:
+            cidades_por_par.setdefault((v.transportadora_id, v.nome_tabela), set()).add(v.cidade_id)
+
+        tabelas_orm = []
+        if pares:
+            tabelas_orm = TabelaFrete.query.options(
+                joinedload(TabelaFrete.transportadora)
+            ).filter(
+                tuple_(TabelaFrete.transportadora_id, TabelaFrete.nome_tabela).in_(list(pares)),
+                TabelaFrete.tipo_carga == 'DIRETA',
+            ).all()
+
+        icms_cidades = {
+            c.id: c.icms or 0
+            for c in db.session.query(Cidade).filter(Cidade.id.in_(cidade_ids)).all()
+        }
+
+        combinacoes: Dict[Tuple, List[Tuple[int, int]]] = {}
+        tabelas: Dict[int, Dict] = {}
+        for tabela in tabelas_orm:
+            modalidade = tabela.modalidade or 'FRETE PESO'
+            dados = TabelaFreteManager.preparar_dados_tabela(tabela)
+            dados['modalidade'] = modalidade
+            transp = tabela.transportadora
+            tabelas[tabela.id] = {
+                'dados': dados,
+                'optante': transp.optante if transp else False,
+                'transportadora': transp.razao_social if transp else 'N/A',
+                'nome_tabela': tabela.nome_tabela,
+                'valor_kg': tabela.valor_kg or 0,
+                'percentual_valor': tabela.percentual_valor or 0,
+            }
+            chave = (tabela.transportadora_id, tabela.uf_destino, modalidade)
+            for cidade_id in cidades_por_par.get((tabela.transportadora_id, tabela.nome_tabela), ()):
+                if cidade_id in icms_cidades:
+                    combinacoes.setdefault(chave, []).append((tabela.id, cidade_id))
+
+        logger.info(
+            f"[OTIMIZADOR] Contexto: {len(cidade_ids)} cidades, {len(vinculos)} vinculos, "
+            f"{len(tabelas)} tabelas, {len(combinacoes)} combinacoes"
+        )
+        return cls(combinacoes, tabelas, icms_cidades, veiculos)
+
+    @property
+    def capacidade_maxima(self) -> float:
+        """Maior peso_maximo entre as modalidades com tabela carregada."""
+        modalidades = {modalidade for _, _, modalidade in self.combinacoes}
+        return max((self.veiculos.get(m, 0) for m in modalidades), default=0)
+
+    def _frete(self, tabela_id: int, cidade_id: int, peso: float, valor: float):
+        icms = self.icms_cidades.get(cidade_id, 0)
+        chave = (tabela_id, icms, peso, valor)
+        if chave in self._memo_frete:
+            return self._memo_frete[chave]
+        tabela = self.tabelas[tabela_id]
+        dados = dict(tabela['dados'], icms_destino=icms)
+        try:
+            resultado = CalculadoraFrete.calcular_frete_unificado(
+                peso=peso,
+                valor_mercadoria=valor,
+                tabela_dados=dados,
+                transportadora_optante=tabela['optante'],
+            )
+            frete = (float(resultado['valor_liquido']), float(resultado['valor_com_icms']))
+        except Exception as e:
+            logger.debug(f"[OTIMIZADOR] Erro ao calcular tabela {tabela['nome_tabela']}: {e}")
+            frete = None
+        self.calculos += 1
+        self._memo_frete[chave] = frete
+        return frete
+
+    def cotar(self, peso: float, valor: float, cidades: FrozenSet[int]) -> Optional[Dict]:
+        """Opcao conservadora (mesmo formato de calcular_frete_otimizacao_conservadora)."""
+        if peso <= 0 or valor <= 0 or not cidades:
+            return None
+        chave_memo = (peso, valor, cidades)
+        if chave_memo in self._memo_cotacao:
+            return self._memo_cotacao[chave_memo]
+
+        opcoes = []
+        for chave, itens in self.combinacoes.items():
+            transportadora_id, _uf_destino, modalidade = chave
+            if not self.cobertura[chave].issuperset(cidades):
+                continue
+            if self.veiculos.get(modalidade, 0) < peso:
+                continue
+            mais_cara = None
+            for tabela_id, cidade_id in itens:
+                if cidade_id not in cidades:
+                    continue
+                frete = self._frete(tabela_id, cidade_id, peso, valor)
+                if frete is None:
+                    continue
+                if mais_cara is None or frete[0] > mais_cara[0]:
+                    mais_cara = (frete[0], frete[1], tabela_id, cidade_id)
+            if mais_cara is None:
+                continue
+            valor_liquido, valor_total, tabela_id, cidade_id = mais_cara
+            tabela = self.tabelas[tabela_id]
+            opcoes.append({
+                'transportadora_id': transportadora_id,
+                'transportadora': tabela['transportadora'],
+                'modalidade': modalidade,
+                'tipo_carga': 'DIRETA',
+                'valor_total': valor_total,
+                'valor_liquido': valor_liquido,
+                'nome_tabela': f"{tabela['nome_tabela']} (CONSERVADOR)",
+                'valor_kg': tabela['valor_kg'],
+                'percentual_valor': tabela['percentual_valor'],
+                'icms': self.icms_cidades.get(cidade_id, 0),
+                'frete_por_kg': valor_liquido / peso,
+            })
+
+        melhor = min(opcoes, key=lambda o: o['valor_liquido']) if opcoes else None
+        self._memo_cotacao[chave_memo] = melhor
+        return melhor
+
+
+class OtimizadorConsolidacao:
+    """Avalia cenarios de adicionar/remover pedidos e busca consolidacoes."""
+
+    def __init__(self, atuais: List[CargaPedido], candidatos: List[CargaPedido],
+                 contexto: ContextoTarifario, frete_atual_kg: float,
+                 tempo_max_s: Optional[float] = None):
+        self.atuais = list(atuais)
+        self.candidatos = [c for c in candidatos if c.lote_id not in {a.lote_id for a in atuais}]
+        self.contexto = contexto
+        self.frete_atual_kg = frete_atual_kg
+        self.tempo_max_s = _TEMPO_MAX_S if tempo_max_s is None else tempo_max_s
+        self._cargas = {c.lote_id: c for c in self.atuais + self.candidatos}
+        self._base = frozenset(c.lote_id for c in self.atuais)
+        self._avaliados: Dict[FrozenSet[str], Optional[Cenario]] = {}
+
+    @classmethod
+    def de_pedidos(cls, pedidos_atuais, pedidos_candidatos, frete_atual_kg: float,
+                   **kwargs) -> 'OtimizadorConsolidacao':
+        """Monta snapshots (cidade resolvida uma vez por destino) e o contexto."""
+        from app.utils.frete_simulador import buscar_cidade_unificada
+
+        cidades_por_destino: Dict[Tuple, Optional[int]] = {}
+
+        def _cidade_id(pedido) -> Optional[int]:
+            # So memoiza pedido ja normalizado: sem cidade_normalizada,
+            # buscar_cidade_unificada normaliza a Separacao (efeito colateral)
+            chave = None
+            if getattr(pedido, 'cidade_normalizada', None):
+                chave = (pedido.cidade_normalizada, pedido.uf_normalizada, pedido.rota)
+                if chave in cidades_por_destino:
+                    return cidades_por_destino[chave]
+            cidade = buscar_cidade_unificada(pedido=pedido)
+            cidade_id = cidade.id if cidade else None
+            if chave is not None:
+                cidades_por_destino[chave] = cidade_id
+            return cidade_id
+
+        atuais = [CargaPedido.de_pedido(p, _cidade_id(p)) for p in pedidos_atuais]
+        candidatos = [CargaPedido.de_pedido(p, _cidade_id(p)) for p in pedidos_candidatos]
+        contexto = ContextoTarifario.carregar(c.cidade_id for c in atuais + candidatos)
+        return cls(atuais, candidatos, contexto, frete_atual_kg, **kwargs)
+
+    # ------------------------------------------------------------------
+    # Cenarios
+    # ------------------------------------------------------------------
+    def avaliar(self, lotes: FrozenSet[str]) -> Optional[Cenario]:
+        if lotes in self._avaliados:
+            return self._avaliados[lotes]
+        cenario = self._avaliar(lotes)
+        self._avaliados[lotes] = cenario
+        return cenario
+
+    def _avaliar(self, lotes: FrozenSet[str]) -> Optional[Cenario]:
+        cargas = [self._cargas[lote] for lote in lotes]
+        if not cargas:
+            return None
+        # Mesmo UF e mesma sub_rota (regras 2 e 3 da cotacao conservadora)
+        if len({c.cod_uf for c in cargas}) > 1 or len({c.sub_rota for c in cargas}) > 1:
+            return None
+        peso = sum(c.peso for c in cargas)
+        valor = sum(c.valor for c in cargas)
+        cidades = frozenset(c.cidade_id for c in cargas if c.cidade_id)
+        opcao = self.contexto.cotar(peso, valor, cidades)
+        if opcao is None:
+            return None
+        datas = [c.data_entrega for c in cargas if c.data_entrega]
+        janela = (max(datas) - min(datas)).days if datas else 0
+        return Cenario(lotes, peso, valor, opcao, len(cidades), janela)
+
+    def _otimizacao_unitaria(self, cenario: Optional[Cenario], peso_atual: float) -> Optional[Dict]:
+        if cenario is None:
+            return None
+        reducao = self.frete_atual_kg - cenario.frete_kg
+        if reducao <= REDUCAO_MINIMA_KG:
+            return None
+        opcao = cenario.opcao
+        return {
+            'nova_rota_diff': reducao,
+            'reducao_por_kg_rota': reducao,
+            'nova_tabela': opcao['nome_tabela'],
+            'frete_bruto_novo': opcao['valor_total'],
+            'frete_liquido_novo': opcao['valor_liquido'],
+            'frete_kg_novo': cenario.frete_kg,
+            'frete_kg_atual': self.frete_atual_kg,
+            'peso_atual': peso_atual,
+            'peso_novo': cenario.peso,
+            'reducao_total': reducao * cenario.peso,
+            'nova_transportadora': opcao['transportadora'],
+            'nova_modalidade': opcao['modalidade'],
+        }
+
+    def cenarios_unitarios(self, transportadora: str, modalidade: str,
+                           valor_liquido: float) -> Dict[str, Dict]:
+        """Remover cada pedido atual / adicionar cada candidato (1 passo)."""
+        peso_atual = sum(c.peso for c in self.atuais)
+        otimizacoes = {'remover': {}, 'adicionar': {}}
+
+        def _sem_otimizacao(carga: CargaPedido) -> Dict:
+            return {
+                'frete_kg_atual': self.frete_atual_kg,
+                'peso_pedido': carga.peso,
+                'sem_otimizacao': True,
+                'transportadora_atual': transportadora,
+                'modalidade_atual': modalidade,
+                'valor_liquido_atual': valor_liquido,
+            }
+
+        for carga in self.atuais:
+            restantes = self._base - {carga.lote_id}
+            resultado = self._otimizacao_unitaria(
+                self.avaliar(restantes) if restantes else None, peso_atual,
+            )
+            otimizacoes['remover'][carga.lote_id] = resultado or _sem_otimizacao(carga)
+
+        for carga in self.candidatos:
+            resultado = self._otimizacao_unitaria(
+                self.avaliar(self._base | {carga.lote_id}), peso_atual,
+            )
+            otimizacoes['adicionar'][carga.lote_id] = resultado or _sem_otimizacao(carga)
+
+        return otimizacoes
+
+    # ------------------------------------------------------------------
+    # Busca de consolidacoes
+    # ------------------------------------------------------------------
+    def buscar_consolidacoes(self, limite: int = 10) -> List[Dict]:
+        """Busca gulosa + local sob a capacidade; retorna a fronteira de Pareto."""
+        prazo = time.monotonic() + self.tempo_max_s
+        capacidade = self.contexto.capacidade_maxima
+        base = self.avaliar(self._base)
+        referencia = base.frete_kg if base else self.frete_atual_kg
+
+        # Mochila: candidatos na mesma cidade da carga primeiro (nao criam
+        # entrega nova), depois os mais pesados (diluem frete minimo/fixos)
+        cidades_base = {c.cidade_id for c in self.atuais}
+        ordem = sorted(
+            (c for c in self.candidatos if c.peso <= capacidade),
+            key=lambda c: (c.cidade_id not in cidades_base, -c.peso),
+        )
+
+        atual = self._base
+        atual_kg = referencia
+
+        # Fase 1 — gulosa: aplica o candidato de menor R$/kg enquanto melhorar
+        while time.monotonic() < prazo:
+            peso = sum(self._cargas[lote].peso for lote in atual)
+            melhor = None
+            testados = 0
+            for carga in ordem:
+                if carga.lote_id in atual or peso + carga.peso > capacidade:
+                    continue
+                cenario = self.avaliar(atual | {carga.lote_id})
+                testados += 1
+                if cenario and (melhor is None or cenario.frete_kg < melhor.frete_kg):
+                    melhor = cenario
+                if testados >= _LARGURA_BUSCA or time.monotonic() >= prazo:
+                    break
+            if melhor is None or melhor.frete_kg >= atual_kg - REDUCAO_MINIMA_KG:
+                break
+            atual, atual_kg = melhor.lotes, melhor.frete_kg
+
+        # Fase 2 — busca local: remover um pedido ou trocar adicionado por outro
+        melhorou = True
+        while melhorou and time.monotonic() < prazo:
+            melhorou = False
+            for vizinho in self._vizinhos(atual, ordem, capacidade):
+                if time.monotonic() >= prazo:
+                    break
+                cenario = self.avaliar(vizinho)
+                if cenario and cenario.frete_kg < atual_kg - REDUCAO_MINIMA_KG:
+                    atual, atual_kg = cenario.lotes, cenario.frete_kg
+                    melhorou = True
+                    break
+
+        fronteira = self._fronteira(
+            c for lotes, c in self._avaliados.items() if c is not None and lotes != self._base
+        )
+        logger.info(
+            f"[OTIMIZADOR] {len(self._avaliados)} cenarios, {self.contexto.calculos} calculos, "
+            f"fronteira={len(fronteira)}, melhor R$/kg={atual_kg:.3f} (ref {referencia:.3f})"
+        )
+        return [self._serializar(c, referencia) for c in fronteira[:limite]]
+
+    def _vizinhos(self, atual: FrozenSet[str], ordem: List[CargaPedido], capacidade: float):
+        peso = sum(self._cargas[lote].peso for lote in atual)
+        for lote in sorted(atual):
+            restantes = atual - {lote}
+            # Mantem ao menos um pedido da carga original
+            if restantes & self._base:
+                yield restantes
+        adicionados = sorted(atual - self._base)
+        fora = [c for c in ordem[:_LARGURA_BUSCA] if c.lote_id not in atual]
+        for lote in adicionados:
+            peso_sem = peso - self._cargas[lote].peso
+            for carga in fora:
+                if peso_sem + carga.peso <= capacidade:
+                    yield (atual - {lote}) | {carga.lote_id}
+
+    @staticmethod
+    def _fronteira(cenarios: Iterable[Cenario]) -> List[Cenario]:
+        """Nao-dominados em (R$/kg, entregas, janela_dias) — menor e melhor."""
+        candidatos = sorted(cenarios, key=lambda c: (c.frete_kg, c.entregas, c.janela_dias))
+        fronteira: List[Cenario] = []
+        for cenario in candidatos:
+            dominado = any(
+                f.frete_kg <= cenario.frete_kg and f.entregas <= cenario.entregas
+                and f.janela_dias <= cenario.janela_dias
+                for f in fronteira
+            )
+            if not dominado:
+                fronteira.append(cenario)
+        return fronteira
+
+    def _serializar(self, cenario: Cenario, referencia: float) -> Dict:
+        def _pedidos(lotes):
+            return sorted(self._cargas[lote].num_pedido for lote in lotes)
+
+        reducao_kg = referencia - cenario.frete_kg
+        return {
+            'lotes': sorted(cenario.lotes),
+            'adicionar': _pedidos(cenario.lotes - self._base),
+            'remover': _pedidos(self._base - cenario.lotes),
+            'lotes_adicionar': sorted(cenario.lotes - self._base),
+            'peso': cenario.peso,
+            'valor': cenario.valor,
+            'frete_kg': cenario.frete_kg,
+            'reducao_kg': reducao_kg,
+            'reducao_total': reducao_kg * cenario.peso,
+            'entregas': cenario.entregas,
+            'janela_dias': cenario.janela_dias,
+            'transportadora': cenario.opcao['transportadora'],
+            'modalidade': cenario.opcao['modalidade'],
+            'nome_tabela': cenario.opcao['nome_tabela'],
+            'valor_liquido': cenario.opcao['valor_liquido'],
+        }
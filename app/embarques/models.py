@@ -1,5 +1,7 @@
 from app import db
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from app.utils.timezone import agora_utc_naive
 
 class Embarque(db.Model):
@@ -433,6 +435,7 @@ class EmbarqueItem(db.Model):
     protocolo_agendamento = db.Column(db.String(50), info={'description': 'Senha única do comprovante de agendamento'})
     data_agenda = db.Column(db.String(10), info={'description': 'Data do agendamento no cliente'})
     agendamento_confirmado = db.Column(db.Boolean, default=False)  # ✅ NOVO: Status de confirmação do agendamento
+    agendamento_alterado_em = db.Column(db.DateTime, nullable=True, index=True)  # Watermark de data_agenda/protocolo/confirmacao (sync de entregas)
     hora_agendamento = db.Column(db.Time, nullable=True)  # Horario do agendamento (HH:MM) — exclusivo CarVia (Nacom deixa NULL)
     nota_fiscal = db.Column(db.String(20), info={'description': 'Número da NF'})
     volumes = db.Column(db.Integer, nullable=True, info={'description': 'Qtd de volumes (possivelmente não utilizada)'})
@@ -539,3 +542,43 @@ class EmbarqueItem(db.Model):
         if contato and contato.forma:
             return contato.forma
         return None
+
+
+CAMPOS_AGENDAMENTO_ITEM = ('data_agenda', 'protocolo_agendamento', 'agendamento_confirmado')
+
+
+@event.listens_for(EmbarqueItem, 'before_insert')
+@event.listens_for(EmbarqueItem, 'before_update')
+def marcar_agendamento_alterado(mapper, connection, target):
+    """
+    Carimba agendamento_alterado_em quando data_agenda, protocolo ou
+    confirmacao mudam — watermark de nfs_alteradas_desde()
+    (app/utils/sincronizar_entregas_lote.py), que sem ele so enxergava
+    embarques criados apos o watermark.
+
+    So cobre flush do ORM; update() em massa passa por
+    marcar_agendamento_alterado_em_massa(). SQL cru (text()/exec_driver_sql)
+    que grave esses campos precisa setar agendamento_alterado_em por conta.
+    """
+    estado = db.inspect(target)
+    if estado.key is None:
+        alterado = any(getattr(target, campo) for campo in CAMPOS_AGENDAMENTO_ITEM)
+    else:
+        alterado = any(estado.attrs[campo].history.has_changes() for campo in CAMPOS_AGENDAMENTO_ITEM)
+    if alterado:
+        target.agendamento_alterado_em = agora_utc_naive()
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def marcar_agendamento_alterado_em_massa(orm_execute_state):
+    """query.update() / update(EmbarqueItem) em massa nao passa por flush:
+    acrescenta o carimbo ao proprio UPDATE quando ele grava campo de agendamento."""
+    if not orm_execute_state.is_update:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not EmbarqueItem:
+        return
+    stmt = orm_execute_state.statement
+    campos = {getattr(chave, 'key', chave) for chave in (getattr(stmt, '_values', None) or {})}
+    if campos & set(CAMPOS_AGENDAMENTO_ITEM) and 'agendamento_alterado_em' not in campos:
+        orm_execute_state.statement = stmt.values(agendamento_alterado_em=agora_utc_naive())
@@ -183,6 +183,16 @@ TABLE_CATALOG_SEMANTIC = os.environ.get("TABLE_CATALOG_SEMANTIC", "true").lower(
 # Consumers: knowledge_graph_service.py (extract + query), memory_mcp_tool.py (save/update/delete), client.py (retrieval)
 MEMORY_KNOWLEDGE_GRAPH = os.environ.get("MEMORY_KNOWLEDGE_GRAPH", "true").lower() == "true"
 
+# Snapshot em memória do grafo por usuário (adjacência CSR versionada por revisão).
+# Quando True: query_graph_memories lê só a revisão do grafo (1 query) e faz hop 1/hop 2
+# em memória; rebuild apenas quando a revisão muda (triggers em agent_memory_graph_revisions).
+# Consumers: knowledge_graph_snapshot.py, knowledge_graph_service.py (query)
+MEMORY_KG_SNAPSHOT = os.environ.get("MEMORY_KG_SNAPSHOT", "true").lower() == "true"
+
+# Ranking das memórias do grafo no snapshot: "hops" (mesmo resultado do SQL) ou
+# "ppr" (PageRank personalizado ponderado a partir das entidades do prompt).
+MEMORY_KG_RANKING = os.environ.get("MEMORY_KG_RANKING", "hops").lower()
+
 # ============================================================
 # CONSTANTES DE EMBEDDING
 # ============================================================
@@ -360,7 +360,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -477,7 +477,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -620,7 +620,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -754,7 +754,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -918,7 +918,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -1040,7 +1040,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -1149,7 +1149,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
             similarity = self._cosine_similarity(query_embedding, doc_embedding)
@@ -1267,7 +1267,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -1410,7 +1410,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -1529,7 +1529,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -1689,7 +1689,7 @@ class EmbeddingService:
         scored = []
         for doc in docs:
             try:
-                doc_embedding = json.loads(doc.embedding)
+                doc_embedding = self._carregar_embedding(doc.embedding)
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -1834,6 +1834,19 @@ class EmbeddingService:
 
         return self._pgvector_available
 
+    @staticmethod
+    def _carregar_embedding(valor) -> List[float]:
+        """
+        Embedding lido do banco como lista de floats (fallbacks Python).
+
+        Sem o pacote pgvector a coluna e Text com JSON; com ele a coluna e
+        Vector e o SQLAlchemy ja devolve ndarray — json.loads falhava com
+        TypeError e o fallback descartava todos os documentos.
+        """
+        if isinstance(valor, str):
+            return json.loads(valor)
+        return valor.tolist() if hasattr(valor, 'tolist') else list(valor)
+
     @staticmethod
     def _cosine_similarity(vec_a: List[float], vec_b: List[float]) -> float:
         """
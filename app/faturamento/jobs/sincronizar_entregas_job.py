@@ -18,6 +18,9 @@ start_worker_render.sh (--queues atacadao,odoo_lancamento,impostos,recebimento,h
 
 Beneficio: libera o scheduler mais cedo e paraleliza com o worker RQ,
 sem aumentar carga no Odoo (nao ha chamada Odoo nesta etapa — apenas SQL local).
+
+Processamento via sincronizar_entregas_em_lote (app/utils/sincronizar_entregas_lote.py):
+queries IN por lote + advisory lock, seguro com 2 workers na mesma fila.
 """
 
 import logging
@@ -48,25 +51,20 @@ def sincronizar_entregas_batch(nfs: List[str]) -> dict:
 
     app = create_app()
     with app.app_context():
-        from app.utils.sincronizar_entregas import sincronizar_entrega_por_nf
+        from app.utils.sincronizar_entregas_lote import sincronizar_entregas_em_lote
+
+        logger.info(f"[JOB sincronizar_entregas_batch] Iniciando processamento de {len(nfs)} NFs")
 
+        resultado = sincronizar_entregas_em_lote(nfs)
         stats = {
-            'sucesso': 0,
+            'sucesso': (
+                resultado['criadas'] + resultado['atualizadas']
+                + resultado['removidas'] + resultado['nf_a_nf']
+            ),
             'total': len(nfs),
-            'erros': []
+            'erros': resultado['erros'],
         }
 
-        logger.info(f"[JOB sincronizar_entregas_batch] Iniciando processamento de {len(nfs)} NFs")
-
-        for numero_nf in nfs:
-            try:
-                sincronizar_entrega_por_nf(numero_nf)
-                stats['sucesso'] += 1
-            except Exception as e:
-                erro_msg = f"NF {numero_nf}: {str(e)[:200]}"
-                logger.error(f"[JOB sincronizar_entregas_batch] {erro_msg}")
-                stats['erros'].append(erro_msg)
-
         logger.info(
             f"[JOB sincronizar_entregas_batch] Concluido: "
             f"{stats['sucesso']}/{stats['total']} NFs sincronizadas "
@@ -995,6 +995,11 @@ class BaixaTituloLote(db.Model):
     processado_em = db.Column(db.DateTime, nullable=True)
     processado_por = db.Column(db.String(100), nullable=True)
 
+    # Posse da execucao (ExecutorLoteBaixas): dono corrente + heartbeat.
+    # Migration: scripts/migrations/2026_10_19_baixa_lote_execucao.{py,sql}
+    execucao_id = db.Column(db.String(64), nullable=True)
+    heartbeat_em = db.Column(db.DateTime, nullable=True)
+
     # Relacionamento com itens
     itens = relationship('BaixaTituloItem', backref='lote', lazy='dynamic', cascade='all, delete-orphan')
 
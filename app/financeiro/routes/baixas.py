@@ -864,23 +864,36 @@ def baixas_processar_lote(lote_id):
     try:
         from app.portal.workers import enqueue_job
         from app.financeiro.workers.baixa_titulos_jobs import processar_lote_baixa_job
+        from app.financeiro.services.baixa_titulos_executor import (
+            STATUS_LOTE_EXECUTAVEIS,
+            lote_em_execucao_viva,
+        )
 
         lote = BaixaTituloLote.query.get_or_404(lote_id)
 
-        if lote.status not in ['IMPORTADO', 'VALIDADO']:
+        # PROCESSANDO/ERRO: retomada de lote interrompido (so itens VALIDO sao reexecutados)
+        if lote.status not in STATUS_LOTE_EXECUTAVEIS:
             return jsonify({
                 'success': False,
                 'error': f'Lote nao pode ser processado (status: {lote.status})'
             }), 400
 
-        # Contar itens validos
-        total_itens = BaixaTituloItem.query.filter_by(
-            lote_id=lote_id,
-            ativo=True,
-            status='VALIDO'
-        ).count()
+        # Retomada so com a execucao anterior comprovadamente parada (heartbeat vencido)
+        if lote_em_execucao_viva(lote):
+            return jsonify({
+                'success': False,
+                'error': 'Lote ja esta em processamento. Aguarde a execucao atual terminar.'
+            }), 409
+
+        itens_lote = BaixaTituloItem.query.filter(
+            BaixaTituloItem.lote_id == lote_id,
+            BaixaTituloItem.ativo == True,
+        )
+        total_itens = itens_lote.filter(BaixaTituloItem.status == 'VALIDO').count()
+        # Presos em PROCESSANDO de execucao morta: nao executam, viram ERRO p/ conferencia
+        interrompidos = itens_lote.filter(BaixaTituloItem.status == 'PROCESSANDO').count()
 
-        if total_itens == 0:
+        if total_itens == 0 and interrompidos == 0:
             return jsonify({
                 'success': False,
                 'error': 'Nenhum item valido para processar no lote'
@@ -902,6 +915,7 @@ def baixas_processar_lote(lote_id):
             'job_id': job.id,
             'lote_id': lote_id,
             'total_itens': total_itens,
+            'interrompidos': interrompidos,
             'message': f'Lote {lote_id} enfileirado para processamento ({total_itens} itens)'
         })
 
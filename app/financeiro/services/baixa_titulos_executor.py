@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+"""
+Executor de Lotes de Baixa de Titulos (concorrente + prefetch)
+==============================================================
+
+Processa um BaixaTituloLote com:
+
+1. PREFETCH em massa (PrefetchBaixas): titulos (account.move.line), NFs
+   (account.move), clientes (res.partner) e journals do lote inteiro em
+   poucas chamadas search_read/read — no lugar de 5-8 leituras por item.
+2. CONCORRENCIA limitada: itens que compartilham move_id, partner ou NF
+   formam um GRUPO e rodam em serie (reconciliacao segura); grupos distintos
+   rodam em paralelo num pool de BAIXA_TITULOS_WORKERS threads, cada uma com
+   sua conexao Odoo e seu app_context (sessao SQLAlchemy propria).
+3. PROGRESSO por item: status VALIDO -> PROCESSANDO -> SUCESSO/ERRO com commit
+   a cada item. Lote interrompido e retomado reprocessando so os VALIDO;
+   itens presos em PROCESSANDO viram ERRO para conferencia manual (podem ter
+   lancado pagamento no Odoo antes da interrupcao).
+4. POSSE DO LOTE: a execucao reivindica o lote (execucao_id) por UPDATE
+   condicional e renova heartbeat_em a cada HEARTBEAT_S numa thread. Outra
+   execucao so assume o lote com o heartbeat vencido (HEARTBEAT_VENCIDO_S) —
+   clique duplo ou job repetido com a execucao anterior viva e' recusado
+   (LoteEmProcessamento), sem tocar nos itens dela.
+
+O fluxo de cada item continua sendo BaixaTitulosService._processar_item —
+o prefetch so atende as LEITURAS enquanto o move nao foi alterado; qualquer
+dado que possa ter mudado e lido ao vivo.
+
+Autor: Sistema de Fretes
+Data: 2026-10-19
+"""
+
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import or_
+
+from app import db
+from app.utils.timezone import agora_utc_naive
+from app.financeiro.models import BaixaTituloLote, BaixaTituloItem
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.environ.get('BAIXA_TITULOS_WORKERS', '4'))
+
+# Limite de NFs/IDs por chamada search_read/read (dominio 'in')
+TAMANHO_CHUNK_ODOO = 200
+
+# Heartbeat da execucao dona do lote; vencido = execucao morta (retomavel)
+HEARTBEAT_S = int(os.environ.get('BAIXA_LOTE_HEARTBEAT_S', '30'))
+HEARTBEAT_VENCIDO_S = int(os.environ.get('BAIXA_LOTE_HEARTBEAT_VENCIDO_S', '180'))
+
+# PROCESSANDO/ERRO: retomada de lote interrompido
+STATUS_LOTE_EXECUTAVEIS = ('IMPORTADO', 'VALIDADO', 'PROCESSANDO', 'ERRO')
+
+MENSAGEM_INTERROMPIDO = (
+    'Processamento interrompido (item estava PROCESSANDO). '
+    'Conferir pagamentos no Odoo antes de reprocessar.'
+)
+
+
+class LoteEmProcessamento(Exception):
+    """Outra execucao viva (heartbeat recente) detem o lote."""
+
+
+def lote_em_execucao_viva(lote: BaixaTituloLote, agora=None) -> bool:
+    """True se alguma execucao detem o lote e renovou o heartbeat recentemente."""
+    if not lote.execucao_id or not lote.heartbeat_em:
+        return False
+    agora = agora or agora_utc_naive()
+    return lote.heartbeat_em > agora - timedelta(seconds=HEARTBEAT_VENCIDO_S)
+
+
+def _chunks(valores: List, tamanho: int = TAMANHO_CHUNK_ODOO):
+    for i in range(0, len(valores), tamanho):
+        yield valores[i:i + tamanho]
+
+
+def _extrair_id(valor) -> Optional[int]:
+    if isinstance(valor, (list, tuple)) and valor:
+        return valor[0]
+    if isinstance(valor, int):
+        return valor
+    return None
+
+
+class PrefetchBaixas:
+    """
+    Leituras do Odoo de um lote inteiro, indexadas para o BaixaTitulosService.
+
+    So responde enquanto o move nao foi alterado (marcar_alterado); depois
+    disso o service volta a ler ao vivo. NFs com titulo ano 2000 (ou sem
+    titulo posted) nunca sao atendidas — seguem o fluxo de correcao normal.
+    """
+
+    def __init__(self):
+        self.linhas_por_nf: Dict[str, List[Dict]] = {}
+        self.moves: Dict[int, Dict] = {}
+        self.faces_nfe: Dict[int, float] = {}
+        self.taxas_desconto: Dict[int, float] = {}
+        self.companies_journal: Dict[int, Optional[int]] = {}
+        self._nfs_limpas: Set[str] = set()
+        self._linhas_por_id: Dict[int, Dict] = {}
+        self._moves_limpos: Set[int] = set()
+        self._moves_alterados: Set[int] = set()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def carregar(cls, connection, itens: Iterable[BaixaTituloItem]) -> 'PrefetchBaixas':
+        """Carrega titulos, NFs, clientes e journals dos itens em massa."""
+        from app.financeiro.services.baixa_titulos_service import (
+            BaixaTitulosService, CAMPOS_SNAPSHOT_MOVE, CAMPOS_SNAPSHOT_TITULO,
+        )
+
+        itens = list(itens)
+        prefetch = cls()
+        nfs = sorted({str(i.nf_excel) for i in itens if i.nf_excel})
+
+        for chunk in _chunks(nfs):
+            linhas = connection.search_read(
+                'account.move.line',
+                [
+                    ['x_studio_nf_e', 'in', chunk],
+                    ['account_type', '=', 'asset_receivable'],
+                    ['parent_state', '=', 'posted'],
+                    ['move_id.move_type', '=', 'out_invoice'],
+                ],
+                fields=CAMPOS_SNAPSHOT_TITULO,
+            )
+            for linha in linhas:
+                prefetch.linhas_por_nf.setdefault(str(linha.get('x_studio_nf_e')), []).append(linha)
+
+        prefetch._nfs_limpas = {
+            nf for nf, linhas in prefetch.linhas_por_nf.items()
+            if cls._nf_sem_bug_2000(linhas)
+        }
+        for nf, linhas in prefetch.linhas_por_nf.items():
+            for linha in linhas:
+                prefetch._linhas_por_id[linha['id']] = linha
+                if nf in prefetch._nfs_limpas:
+                    prefetch._moves_limpos.add(_extrair_id(linha.get('move_id')))
+
+        move_ids = sorted({
+            _extrair_id(linha.get('move_id'))
+            for linhas in prefetch.linhas_por_nf.values() for linha in linhas
+        } - {None})
+        for chunk in _chunks(move_ids):
+            for move in connection.read('account.move', chunk, CAMPOS_SNAPSHOT_MOVE + ['l10n_br_total_nfe']):
+                prefetch.faces_nfe[move['id']] = round(float(move.pop('l10n_br_total_nfe', 0) or 0), 2)
+                prefetch.moves[move['id']] = move
+
+        partner_ids = sorted({
+            _extrair_id(linha.get('partner_id'))
+            for linhas in prefetch.linhas_por_nf.values() for linha in linhas
+        } - {None})
+        for chunk in _chunks(partner_ids):
+            partners = connection.read(
+                'res.partner', chunk, ['x_studio_desconto', 'x_studio_desconto_contratual']
+            )
+            for partner in partners:
+                prefetch.taxas_desconto[partner['id']] = BaixaTitulosService._taxa_desconto_do_partner(partner)
+
+        journal_ids = sorted({i.journal_odoo_id for i in itens if i.journal_odoo_id})
+        if journal_ids:
+            for journal in connection.read('account.journal', journal_ids, ['company_id']):
+                prefetch.companies_journal[journal['id']] = _extrair_id(journal.get('company_id'))
+
+        logger.info(
+            f"[PREFETCH BAIXAS] {len(nfs)} NFs, {len(move_ids)} moves, {len(partner_ids)} clientes, "
+            f"{len(journal_ids)} journals ({len(prefetch._nfs_limpas)} NFs sem bug ano 2000)"
+        )
+        return prefetch
+
+    @staticmethod
+    def _nf_sem_bug_2000(linhas: List[Dict]) -> bool:
+        """Mesmo criterio de _corrigir_titulo_ano_2000: titulos com debito e nenhum ano 2000."""
+        com_debito = [linha for linha in linhas if (linha.get('debit') or 0) > 0]
+        return bool(com_debito) and not any(
+            str(linha.get('date_maturity') or '')[:4] == '2000' for linha in com_debito
+        )
+
+    # ------------------------------------------------------------------
+    # Consultas (usadas pelo BaixaTitulosService)
+    # ------------------------------------------------------------------
+
+    def nfs_sem_bug_2000(self) -> Set[str]:
+        return set(self._nfs_limpas)
+
+    def marcar_alterado(self, move_id: Optional[int]) -> None:
+        """Move recebeu lancamentos: proximas leituras dele vao ao Odoo."""
+        if move_id:
+            with self._lock:
+                self._moves_alterados.add(move_id)
+
+    def _move_intacto(self, move_id: Optional[int]) -> bool:
+        with self._lock:
+            return bool(move_id) and move_id not in self._moves_alterados
+
+    def titulo(self, nf: str, parcela: int) -> Optional[Dict]:
+        """Titulo (nf, parcela) se for unico, de NF sem bug 2000 e move intacto."""
+        nf = str(nf)
+        if nf not in self._nfs_limpas:
+            return None
+        candidatos = [
+            linha for linha in self.linhas_por_nf.get(nf, [])
+            if linha.get('l10n_br_cobranca_parcela') == parcela
+            and str(linha.get('date_maturity') or '') != '2000-01-01'
+        ]
+        if len(candidatos) != 1 or not self._move_intacto(_extrair_id(candidatos[0].get('move_id'))):
+            return None
+        return dict(candidatos[0])
+
+    def snapshot(self, titulo_id: int, move_id: int) -> Optional[Dict]:
+        """Snapshot {'titulo', 'move'} igual ao de _capturar_snapshot, se intacto."""
+        if not self._move_intacto(move_id) or move_id not in self.moves:
+            return None
+        linha = self._linhas_por_id.get(titulo_id)
+        if not linha or _extrair_id(linha.get('move_id')) != move_id:
+            return None
+        return {'titulo': dict(linha), 'move': dict(self.moves[move_id])}
+
+    def move_sem_linha_2000(self, move_id: int) -> bool:
+        """True se o move pertence a NF sem bug ano 2000 (dispensa _tem_linha_2000)."""
+        return move_id in self._moves_limpos
+
+
+def agrupar_itens_conflitantes(itens: List, prefetch: Optional[PrefetchBaixas] = None) -> List[List]:
+    """
+    Agrupa itens que NAO podem rodar em paralelo (mesma NF, move ou cliente).
+
+    Union-find sobre as chaves ('nf', nf), ('move', id), ('partner', id) — move e
+    partner vem do prefetch (ou do item, se ja resolvidos). Cada grupo preserva a
+    ordem de entrada (linha_excel); grupos saem ordenados pelo primeiro item.
+    """
+    pai: Dict = {}
+
+    def achar(chave):
+        pai.setdefault(chave, chave)
+        while pai[chave] != chave:
+            pai[chave] = pai[pai[chave]]
+            chave = pai[chave]
+        return chave
+
+    def unir(a, b):
+        pai[achar(a)] = achar(b)
+
+    chaves_por_item = []
+    for item in itens:
+        nf = str(item.nf_excel)
+        chaves = {('nf', nf)}
+        if getattr(item, 'move_odoo_id', None):
+            chaves.add(('move', item.move_odoo_id))
+        if getattr(item, 'partner_odoo_id', None):
+            chaves.add(('partner', item.partner_odoo_id))
+        if prefetch:
+            for linha in prefetch.linhas_por_nf.get(nf, []):
+                move_id = _extrair_id(linha.get('move_id'))
+                partner_id = _extrair_id(linha.get('partner_id'))
+                if move_id:
+                    chaves.add(('move', move_id))
+                if partner_id:
+                    chaves.add(('partner', partner_id))
+        chaves = list(chaves)
+        for chave in chaves[1:]:
+            unir(chaves[0], chave)
+        chaves_por_item.append(chaves[0])
+
+    grupos: Dict = {}
+    for item, chave in zip(itens, chaves_por_item):
+        grupos.setdefault(achar(chave), []).append(item)
+    return list(grupos.values())
+
+
+class ExecutorLoteBaixas:
+    """
+    Executa um BaixaTituloLote com prefetch + pool de threads.
+
+    Uso:
+        estatisticas = ExecutorLoteBaixas(lote_id).executar()
+
+    executar() reivindica o lote se reivindicar() nao foi chamado antes e
+    levanta LoteEmProcessamento se outra execucao viva o detem.
+    """
+
+    def __init__(
+        self,
+        lote_id: int,
+        max_workers: Optional[int] = None,
+        callback_progresso: Optional[Callable[[Dict], None]] = None,
+        execucao_id: Optional[str] = None,
+    ):
+        self.lote_id = lote_id
+        self.max_workers = max(1, max_workers or MAX_WORKERS)
+        self.callback_progresso = callback_progresso
+        self.execucao_id = execucao_id or uuid.uuid4().hex
+        self.estatisticas = {'processados': 0, 'sucesso': 0, 'erro': 0, 'ignorados': 0, 'interrompidos': 0}
+        self._lock = threading.Lock()
+        self._reivindicado = False
+        self._posse_perdida = False
+        self._parar_heartbeat = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Posse do lote
+    # ------------------------------------------------------------------
+
+    def reivindicar(self, usuario: Optional[str] = None) -> bool:
+        """
+        Assume o lote (status -> PROCESSANDO) se nenhuma execucao viva o detem.
+
+        UPDATE condicional unico: no PostgreSQL a segunda execucao concorrente
+        espera o lock da linha e reavalia o WHERE ja com o dono novo (0 linhas).
+        """
+        agora = agora_utc_naive()
+        valores = {'execucao_id': self.execucao_id, 'heartbeat_em': agora, 'status': 'PROCESSANDO'}
+        if usuario:
+            valores['processado_por'] = usuario
+        linhas = BaixaTituloLote.query.filter(
+            BaixaTituloLote.id == self.lote_id,
+            BaixaTituloLote.status.in_(STATUS_LOTE_EXECUTAVEIS),
+            or_(
+                BaixaTituloLote.execucao_id.is_(None),
+                BaixaTituloLote.execucao_id == self.execucao_id,
+                BaixaTituloLote.heartbeat_em.is_(None),
+                BaixaTituloLote.heartbeat_em <= agora - timedelta(seconds=HEARTBEAT_VENCIDO_S),
+            ),
+        ).update(valores, synchronize_session=False)
+        db.session.commit()
+        self._reivindicado = linhas == 1
+        if not self._reivindicado:
+            logger.warning(f"[EXECUTOR BAIXAS] Lote {self.lote_id} ja esta com outra execucao viva")
+        return self._reivindicado
+
+    def _renovar_heartbeat(self) -> bool:
+        """Renova heartbeat_em; False se o lote nao e' mais desta execucao."""
+        linhas = BaixaTituloLote.query.filter_by(
+            id=self.lote_id, execucao_id=self.execucao_id
+        ).update({'heartbeat_em': agora_utc_naive()}, synchronize_session=False)
+        db.session.commit()
+        return linhas == 1
+
+    def _loop_heartbeat(self, app) -> None:
+        with app.app_context():
+            while not self._parar_heartbeat.wait(HEARTBEAT_S):
+                try:
+                    if not self._renovar_heartbeat():
+                        logger.error(
+                            f"[EXECUTOR BAIXAS] Lote {self.lote_id}: posse perdida "
+                            f"(execucao {self.execucao_id}) — nenhum item novo sera iniciado"
+                        )
+                        self._posse_perdida = True
+                        return
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning(f"[EXECUTOR BAIXAS] Heartbeat do lote {self.lote_id} falhou: {e}")
+
+    def liberar(self) -> None:
+        """Solta o lote (so se ainda for desta execucao)."""
+        try:
+            BaixaTituloLote.query.filter_by(
+                id=self.lote_id, execucao_id=self.execucao_id
+            ).update({'execucao_id': None, 'heartbeat_em': None}, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"[EXECUTOR BAIXAS] Falha ao liberar lote {self.lote_id}: {e}")
+        self._reivindicado = False
+
+    def _recuperar_interrompidos(self) -> int:
+        """Itens presos em PROCESSANDO (execucao anterior caiu) -> ERRO p/ conferencia."""
+        presos = BaixaTituloItem.query.filter_by(
+            lote_id=self.lote_id, ativo=True, status='PROCESSANDO'
+        ).all()
+        for item in presos:
+            item.status = 'ERRO'
+            item.mensagem = MENSAGEM_INTERROMPIDO
+            item.processado_em = agora_utc_naive()
+        if presos:
+            db.session.commit()
+            logger.warning(f"[EXECUTOR BAIXAS] Lote {self.lote_id}: {len(presos)} itens interrompidos -> ERRO")
+        return len(presos)
+
+    def executar(self) -> Dict:
+        """Processa os itens VALIDO do lote e atualiza os totais do lote."""
+        from flask import current_app
+        from app.financeiro.services.baixa_titulos_service import BaixaTitulosService
+
+        lote = db.session.get(BaixaTituloLote, self.lote_id) if self.lote_id else None
+        if not lote:
+            raise ValueError(f"Lote {self.lote_id} nao encontrado")
+        if not self._reivindicado and not self.reivindicar():
+            raise LoteEmProcessamento(f"Lote {self.lote_id} ja esta em processamento por outra execucao")
+
+        app = current_app._get_current_object()
+        heartbeat = threading.Thread(
+            target=self._loop_heartbeat, args=(app,), name=f'baixa-lote-{self.lote_id}-hb', daemon=True,
+        )
+        heartbeat.start()
+        try:
+            return self._executar_com_posse(app, BaixaTitulosService)
+        finally:
+            self._parar_heartbeat.set()
+            heartbeat.join(timeout=5)
+            self.liberar()
+
+    def _executar_com_posse(self, app, service_cls) -> Dict:
+        # Execucao anterior provadamente morta (heartbeat vencido ou liberado):
+        # PROCESSANDO dela vira ERRO para conferencia
+        self.estatisticas['interrompidos'] = self._recuperar_interrompidos()
+        db.session.expire_all()
+        lote = db.session.get(BaixaTituloLote, self.lote_id)
+
+        itens = BaixaTituloItem.query.filter_by(
+            lote_id=self.lote_id, ativo=True, status='VALIDO'
+        ).order_by(BaixaTituloItem.linha_excel).all()
+
+        logger.info(f"=" * 60)
+        logger.info(f"EXECUTOR LOTE {self.lote_id} - {lote.nome_arquivo}: {len(itens)} itens")
+        logger.info(f"=" * 60)
+
+        if itens:
+            prefetch = None
+            try:
+                prefetch = PrefetchBaixas.carregar(service_cls().connection, itens)
+            except Exception as e:
+                logger.warning(f"[EXECUTOR BAIXAS] Prefetch falhou, seguindo com leituras ao vivo: {e}")
+
+            grupos = agrupar_itens_conflitantes(itens, prefetch)
+            grupos_ids = [[item.id for item in grupo] for grupo in grupos]
+            total = len(itens)
+            workers = min(self.max_workers, len(grupos_ids))
+            logger.info(f"[EXECUTOR BAIXAS] {total} itens em {len(grupos_ids)} grupos, {workers} threads")
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='baixa-lote') as pool:
+                futuros = [
+                    pool.submit(self._processar_grupo, app, ids, prefetch, total)
+                    for ids in grupos_ids
+                ]
+                for futuro in as_completed(futuros):
+                    futuro.result()
+
+        # Totais do lote a partir do banco (inclui execucoes anteriores — retomada)
+        db.session.expire_all()
+        lote = db.session.get(BaixaTituloLote, self.lote_id)
+        base = BaixaTituloItem.query.filter_by(lote_id=self.lote_id, ativo=True)
+        lote.linhas_sucesso = base.filter_by(status='SUCESSO').count()
+        lote.linhas_erro = base.filter_by(status='ERRO').count()
+        lote.linhas_processadas = lote.linhas_sucesso + lote.linhas_erro
+        if not self._posse_perdida:
+            lote.status = 'CONCLUIDO'
+        lote.processado_em = agora_utc_naive()
+        db.session.commit()
+
+        logger.info(f"Lote {self.lote_id} concluido: {self.estatisticas}")
+        return self.estatisticas
+
+    def _processar_grupo(self, app, item_ids: List[int], prefetch: Optional[PrefetchBaixas], total: int) -> None:
+        """Roda um grupo em serie numa thread do pool (conexao Odoo e sessao proprias)."""
+        from app.financeiro.services.baixa_titulos_service import BaixaTitulosService
+
+        with app.app_context():
+            service = BaixaTitulosService()
+            if prefetch:
+                service._prefetch = prefetch
+                service._nfs_corrigidas_2000 = prefetch.nfs_sem_bug_2000()
+
+            for item_id in item_ids:
+                item = db.session.get(BaixaTituloItem, item_id)
+                if not item or item.status != 'VALIDO' or self._posse_perdida:
+                    with self._lock:
+                        self.estatisticas['ignorados'] += 1
+                    continue
+
+                sucesso = False
+                try:
+                    service._processar_item(item)
+                    sucesso = True
+
+                    # FIX G1: Vincular ExtratoItem correspondente (non-blocking)
+                    try:
+                        extrato_id = service._vincular_extrato_item(item)
+                        if extrato_id:
+                            logger.info(f"  [G1] ExtratoItem {extrato_id} vinculado e CONCILIADO")
+                    except Exception as e_extrato:
+                        logger.warning(f"  [G1] Vinculacao extrato falhou (non-blocking): {e_extrato}")
+
+                except Exception as e:
+                    logger.error(f"Erro no item {item.id}: {e}")
+                    item.status = 'ERRO'
+                    item.mensagem = str(e)
+                    item.processado_em = agora_utc_naive()
+                finally:
+                    if prefetch:
+                        prefetch.marcar_alterado(item.move_odoo_id)
+
+                try:
+                    db.session.commit()
+                except Exception as e_commit:
+                    db.session.rollback()
+                    sucesso = False
+                    logger.error(f"Erro ao gravar item {item_id}: {e_commit}")
+                self._contabilizar(item, sucesso, total)
+
+    def _contabilizar(self, item: BaixaTituloItem, sucesso: bool, total: int) -> None:
+        """Atualiza estatisticas e notifica o callback (serializado entre threads)."""
+        with self._lock:
+            self.estatisticas['processados'] += 1
+            self.estatisticas['sucesso' if sucesso else 'erro'] += 1
+            if not self.callback_progresso:
+                return
+            try:
+                self.callback_progresso({
+                    **self.estatisticas,
+                    'total': total,
+                    'item': {
+                        'item_id': item.id,
+                        'nf': item.nf_excel,
+                        'parcela': item.parcela_excel,
+                        'valor': item.valor_excel,
+                        'success': sucesso,
+                        'message': 'Processado com sucesso' if sucesso else (item.mensagem or ''),
+                        'payment_name': item.payment_odoo_name,
+                    },
+                })
+            except Exception as e:
+                logger.warning(f"[EXECUTOR BAIXAS] Callback de progresso falhou: {e}")
@@ -117,6 +117,8 @@ class BaixaTitulosService:
         self._connection = connection
         self._nfs_corrigidas_2000 = set()
         self._nfs_corrigidas_2000_com_modificacao = set()
+        # Leituras do lote pre-carregadas em massa (PrefetchBaixas) — None = tudo ao vivo
+        self._prefetch = None
         self.estatisticas = {
             'processados': 0,
             'sucesso': 0,
@@ -134,70 +136,23 @@ class BaixaTitulosService:
                 raise Exception("Falha na autenticacao com Odoo")
         return self._connection
 
-    def processar_lote(self, lote_id: int) -> Dict:
+    def processar_lote(self, lote_id: int, max_workers: Optional[int] = None) -> Dict:
         """
         Processa todas as baixas ativas de um lote.
 
+        Delegado ao ExecutorLoteBaixas: prefetch das leituras do lote, itens de
+        NFs/moves/clientes distintos em paralelo e retomada de lote interrompido.
+
         Args:
             lote_id: ID do lote a processar
+            max_workers: threads do pool (default BAIXA_TITULOS_WORKERS)
 
         Returns:
             Dict com estatisticas do processamento
         """
-        lote = db.session.get(BaixaTituloLote,lote_id) if lote_id else None
-        if not lote:
-            raise ValueError(f"Lote {lote_id} nao encontrado")
-
-        logger.info(f"=" * 60)
-        logger.info(f"PROCESSANDO LOTE {lote_id} - {lote.nome_arquivo}")
-        logger.info(f"=" * 60)
-
-        # Controle de NFs já corrigidas para o bug ano 2000 (evitar correções duplicadas no mesmo lote)
-        self._nfs_corrigidas_2000 = set()
-        self._nfs_corrigidas_2000_com_modificacao = set()
-
-        # Buscar itens ativos e validos
-        itens = BaixaTituloItem.query.filter_by(
-            lote_id=lote_id,
-            ativo=True,
-            status='VALIDO'
-        ).order_by(BaixaTituloItem.linha_excel).all()
-
-        logger.info(f"Itens a processar: {len(itens)}")
-
-        for item in itens:
-            try:
-                self._processar_item(item)
-                self.estatisticas['sucesso'] += 1
-
-                # FIX G1: Vincular ExtratoItem correspondente (non-blocking)
-                try:
-                    extrato_id = self._vincular_extrato_item(item)
-                    if extrato_id:
-                        logger.info(f"  [G1] ExtratoItem {extrato_id} vinculado e CONCILIADO")
-                except Exception as e_extrato:
-                    logger.warning(f"  [G1] Vinculacao extrato falhou (non-blocking): {e_extrato}")
-
-            except Exception as e:
-                logger.error(f"Erro no item {item.id}: {e}")
-                item.status = 'ERRO'
-                item.mensagem = str(e)
-                item.processado_em = agora_utc_naive()
-                self.estatisticas['erro'] += 1
-
-            self.estatisticas['processados'] += 1
-            db.session.commit()
-
-        # Atualizar lote
-        lote.status = 'CONCLUIDO'
-        lote.processado_em = agora_utc_naive()
-        lote.linhas_processadas = self.estatisticas['processados']
-        lote.linhas_sucesso = self.estatisticas['sucesso']
-        lote.linhas_erro = self.estatisticas['erro']
-        db.session.commit()
-
-        logger.info(f"Lote {lote_id} concluido: {self.estatisticas}")
+        from app.financeiro.services.baixa_titulos_executor import ExecutorLoteBaixas
 
+        self.estatisticas = ExecutorLoteBaixas(lote_id, max_workers=max_workers).executar()
         return self.estatisticas
 
     def _processar_item(self, item: BaixaTituloItem) -> None:
@@ -733,6 +688,11 @@ class BaixaTitulosService:
         Returns:
             Dict com dados do título ou None
         """
+        if self._prefetch:
+            titulo = self._prefetch.titulo(nf, parcela)
+            if titulo:
+                return titulo
+
         # Busca principal por x_studio_nf_e e parcela
         titulos = self.connection.search_read(
             'account.move.line',
@@ -1445,6 +1405,11 @@ class BaixaTitulosService:
         """
         Captura snapshot completo do titulo e da NF.
         """
+        if self._prefetch:
+            snapshot = self._prefetch.snapshot(titulo_id, move_id)
+            if snapshot:
+                return snapshot
+
         snapshot = {'titulo': None, 'move': None}
 
         # Titulo
@@ -1651,6 +1616,8 @@ class BaixaTitulosService:
         """Retorna o company_id do journal (resolve a conta de encargos por company)."""
         if not journal_id:
             return None
+        if self._prefetch and journal_id in self._prefetch.companies_journal:
+            return self._prefetch.companies_journal[journal_id]
         journals = self.connection.search_read(
             'account.journal',
             [['id', '=', journal_id]],
@@ -1676,6 +1643,8 @@ class BaixaTitulosService:
         """
         if not partner_id:
             return 0.0
+        if self._prefetch and partner_id in self._prefetch.taxas_desconto:
+            return self._prefetch.taxas_desconto[partner_id]
         partners = self.connection.search_read(
             'res.partner',
             [['id', '=', partner_id]],
@@ -1684,16 +1653,22 @@ class BaixaTitulosService:
         )
         if not partners:
             return 0.0
-        p = partners[0]
-        if not p.get('x_studio_desconto_contratual'):
+        return self._taxa_desconto_do_partner(partners[0])
+
+    @staticmethod
+    def _taxa_desconto_do_partner(partner: Dict) -> float:
+        """Converte o res.partner lido (desconto/flag contratual) em fracao."""
+        if not partner.get('x_studio_desconto_contratual'):
             return 0.0
-        pct = p.get('x_studio_desconto') or 0
+        pct = partner.get('x_studio_desconto') or 0
         return round(float(pct) / 100.0, 6)
 
     def _buscar_face_nfe(self, move_id: int) -> float:
         """Face da NF (valor sem abatimentos) = account.move.l10n_br_total_nfe."""
         if not move_id:
             return 0.0
+        if self._prefetch and move_id in self._prefetch.faces_nfe:
+            return self._prefetch.faces_nfe[move_id]
         moves = self.connection.search_read(
             'account.move',
             [['id', '=', move_id]],
@@ -1708,6 +1683,8 @@ class BaixaTitulosService:
         """True se o move tem linha receivable date_maturity=2000-01-01 (desconto fantasma)."""
         if not move_id:
             return False
+        if self._prefetch and self._prefetch.move_sem_linha_2000(move_id):
+            return False
         linhas = self.connection.search_read(
             'account.move.line',
             [
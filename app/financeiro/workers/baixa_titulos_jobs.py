@@ -485,7 +485,10 @@ def processar_lote_baixa_job(
         with _app_context_safe():
             from app import db
             from app.financeiro.models import BaixaTituloLote, BaixaTituloItem
-            from app.financeiro.services.baixa_titulos_service import BaixaTitulosService
+            from app.financeiro.services.baixa_titulos_executor import (
+                STATUS_LOTE_EXECUTAVEIS,
+                ExecutorLoteBaixas,
+            )
 
             # Buscar lote
             lote = db.session.get(BaixaTituloLote,lote_id) if lote_id else None
@@ -494,53 +497,81 @@ def processar_lote_baixa_job(
                 logger.error(f"[Job Baixa Lote] {resultado['error']}")
                 return resultado
 
-            # Verificar status
-            if lote.status not in ['IMPORTADO', 'VALIDADO']:
+            # Verificar status (PROCESSANDO/ERRO = retomada de lote interrompido;
+            # a posse do lote abaixo barra se outra execucao ainda estiver viva)
+            if lote.status not in STATUS_LOTE_EXECUTAVEIS:
                 resultado['error'] = f'Lote nao pode ser processado (status: {lote.status})'
                 logger.error(f"[Job Baixa Lote] {resultado['error']}")
                 return resultado
 
-            # Atualizar status do lote
-            lote.status = 'PROCESSANDO'
-            lote.processado_por = usuario_nome
-            db.session.commit()
-
-            # Buscar IDs dos itens ativos e validos
-            itens = BaixaTituloItem.query.filter_by(
-                lote_id=lote_id,
-                ativo=True,
-                status='VALIDO'
-            ).all()
+            progresso = {
+                'job_id': job_id,
+                'tipo': 'lote',
+                'status': 'processando',
+                'total_itens': 0,
+                'itens_processados': 0,
+                'itens_sucesso': 0,
+                'itens_erro': 0,
+                'itens_pulados': 0,
+                'item_atual': 'Carregando titulos do lote...',
+                'inicio': agora_utc_naive().isoformat(),
+                'detalhes': []
+            }
+
+            def _callback(parcial):
+                progresso['itens_processados'] = parcial['processados']
+                progresso['itens_sucesso'] = parcial['sucesso']
+                progresso['itens_erro'] = parcial['erro']
+                progresso['itens_pulados'] = parcial['ignorados']
+                item = parcial['item']
+                progresso['item_atual'] = (
+                    f"NF {item['nf']} P{item['parcela']} ({parcial['processados']}/{parcial['total']})"
+                )
+                progresso['detalhes'].append(item)
+                if job_id:
+                    _atualizar_progresso_baixa(job_id, progresso)
 
-            if not itens:
-                lote.status = 'CONCLUIDO'
-                lote.processado_em = agora_utc_naive()
-                db.session.commit()
+            # Posse do lote ANTES de olhar os itens: com outra execucao viva,
+            # os PROCESSANDO/VALIDO sao dela e nao podem ser tocados aqui
+            executor = ExecutorLoteBaixas(lote_id, callback_progresso=_callback, execucao_id=job_id)
+            if not executor.reivindicar(usuario_nome):
+                resultado['error'] = 'Lote ja esta em processamento por outra execucao'
+                logger.warning(f"[Job Baixa Lote] Lote {lote_id}: {resultado['error']}")
+                return resultado
 
-                resultado['success'] = True
-                resultado['error'] = 'Nenhum item para processar'
+            # Itens a executar: so VALIDO (PROCESSANDO de execucao morta vira ERRO no executor)
+            item_ids = [i.id for i in BaixaTituloItem.query.filter(
+                BaixaTituloItem.lote_id == lote_id,
+                BaixaTituloItem.ativo == True,
+                BaixaTituloItem.status == 'VALIDO'
+            ).all()]
+            if job_id and item_ids and not _criar_lock_processamento(item_ids, job_id):
+                executor.liberar()
+                resultado['error'] = 'Itens ja estao sendo processados por outro job'
+                logger.warning(f"[Job Baixa Lote] Lote {lote_id}: {resultado['error']}")
                 return resultado
 
-            item_ids = [i.id for i in itens]
+            progresso['total_itens'] = len(item_ids)
+            if job_id:
+                _atualizar_progresso_baixa(job_id, progresso)
 
-            # Chamar a funcao de processamento de itens diretamente
-            # (reutiliza a logica, evita duplicacao)
-            # Nota: get_current_job() retornara o job do lote
-            result = processar_itens_baixa_job(item_ids, usuario_nome)
+            try:
+                estatisticas = executor.executar()
+            finally:
+                if job_id and item_ids:
+                    _liberar_lock_processamento(item_ids, job_id)
 
-            # Atualizar resultado
-            resultado['total_itens'] = result.get('total_itens', 0)
-            resultado['itens_sucesso'] = result.get('itens_sucesso', 0)
-            resultado['itens_erro'] = result.get('itens_erro', 0)
-            resultado['success'] = result.get('success', False)
+            # Totais do lote ja gravados pelo executor (incluindo execucoes anteriores)
+            resultado['total_itens'] = len(item_ids)
+            resultado['itens_sucesso'] = estatisticas['sucesso']
+            resultado['itens_erro'] = estatisticas['erro'] + estatisticas['interrompidos']
+            resultado['success'] = resultado['itens_erro'] == 0
 
-            # Atualizar lote
-            lote.status = 'CONCLUIDO'
-            lote.processado_em = agora_utc_naive()
-            lote.linhas_processadas = resultado['total_itens']
-            lote.linhas_sucesso = resultado['itens_sucesso']
-            lote.linhas_erro = resultado['itens_erro']
-            db.session.commit()
+            progresso['status'] = 'concluido' if resultado['success'] else 'concluido_com_erros'
+            progresso['item_atual'] = 'Concluido!'
+            progresso['fim'] = agora_utc_naive().isoformat()
+            if job_id:
+                _atualizar_progresso_baixa(job_id, progresso)
 
             tempo_total = (agora_utc_naive() - inicio).total_seconds()
             resultado['tempo_segundos'] = tempo_total
@@ -566,9 +597,11 @@ def processar_lote_baixa_job(
             with _app_context_safe():
                 from app import db
                 from app.financeiro.models import BaixaTituloLote
+                from app.financeiro.services.baixa_titulos_executor import lote_em_execucao_viva
 
                 lote = db.session.get(BaixaTituloLote,lote_id) if lote_id else None
-                if lote:
+                # Lote de outra execucao viva nao e' desta falha
+                if lote and not lote_em_execucao_viva(lote):
                     lote.status = 'ERRO'
                     lote.processado_em = agora_utc_naive()
                     db.session.commit()
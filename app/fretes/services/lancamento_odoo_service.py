@@ -626,45 +626,49 @@ class LancamentoOdooService:
             # fire retornou sem excecao mas DFe ainda nao tem PO — polla
             needs_polling = True
 
-        # 3) POLL — aguarda ate MAX_POLL_TIME_PO
-        elapsed_poll = 0
-        poll_count = 0
-        while elapsed_poll < self.MAX_POLL_TIME_PO:
-            time.sleep(self.POLL_INTERVAL_PO)
-            elapsed_poll += self.POLL_INTERVAL_PO
-            poll_count += 1
+        # 3) POLL — aguarda ate MAX_POLL_TIME_PO (polls agrupados no coordenador central)
+        from app.odoo.utils.poll_coordinator import EsperaOdoo, aguardar_odoo, primeiro_m2o
 
-            po_id = self._buscar_po_por_dfe(dfe_id)
-            if po_id:
-                tempo_total_ms = int((time.time() - inicio) * 1000)
-                current_app.logger.info(
-                    f"[ETAPA 06] poll #{poll_count} ({elapsed_poll}s): PO {po_id} localizado"
-                )
-                self._reconciliar_auditoria_etapa6(
-                    frete_id, cte_id, dfe_id, po_id,
-                    motivo='Recuperado via polling', despesa_extra_id=despesa_extra_id,
-                )
-                self._audit_etapa6(
-                    frete_id=frete_id, cte_id=cte_id, chave_cte=cte_chave,
-                    despesa_extra_id=despesa_extra_id,
-                    etapa=6,
-                    etapa_descricao=f'Gerar Purchase Order (recuperado via polling apos {elapsed_poll}s)',
-                    modelo_odoo='l10n_br_ciel_it_account.dfe',
-                    metodo_odoo='action_gerar_po_dfe',
-                    acao='execute_method / action_gerar_po_dfe',
-                    status='SUCESSO',
-                    mensagem=(
-                        f'PO {po_id} localizado via polling apos fire interrompido'
-                        + (f' ({erro_fire[:120]})' if erro_fire else '')
-                    ),
-                    tempo_execucao_ms=tempo_total_ms,
-                    dfe_id=dfe_id,
-                    purchase_order_id=po_id,
-                )
-                return True, po_id, None
-
-            if poll_count % 3 == 0:
-                current_app.logger.info(f"[ETAPA 06] poll #{poll_count} ({elapsed_poll}s): ainda sem PO, aguardando...")
+        inicio_poll = time.time()
+        po_id = aguardar_odoo(
+            EsperaOdoo(
+                'l10n_br_ciel_it_account.dfe',
+                [['id', '=', dfe_id], ['purchase_id', '!=', False]],
+                fields=['purchase_id'],
+                predicado=primeiro_m2o('purchase_id'),
+                rotulo=f'ETAPA 06 DFe {dfe_id}',
+            ),
+            timeout_s=self.MAX_POLL_TIME_PO,
+            intervalo_s=self.POLL_INTERVAL_PO,
+            poll_fn=lambda: self._buscar_po_por_dfe(dfe_id),
+            connection=self.odoo,
+        )
+        if po_id:
+            elapsed_poll = int(time.time() - inicio_poll)
+            tempo_total_ms = int((time.time() - inicio) * 1000)
+            current_app.logger.info(f"[ETAPA 06] polling ({elapsed_poll}s): PO {po_id} localizado")
+            self._reconciliar_auditoria_etapa6(
+                frete_id, cte_id, dfe_id, po_id,
+                motivo='Recuperado via polling', despesa_extra_id=despesa_extra_id,
+            )
+            self._audit_etapa6(
+                frete_id=frete_id, cte_id=cte_id, chave_cte=cte_chave,
+                despesa_extra_id=despesa_extra_id,
+                etapa=6,
+                etapa_descricao=f'Gerar Purchase Order (recuperado via polling apos {elapsed_poll}s)',
+                modelo_odoo='l10n_br_ciel_it_account.dfe',
+                metodo_odoo='action_gerar_po_dfe',
+                acao='execute_method / action_gerar_po_dfe',
+                status='SUCESSO',
+                mensagem=(
+                    f'PO {po_id} localizado via polling apos fire interrompido'
+                    + (f' ({erro_fire[:120]})' if erro_fire else '')
+                ),
+                tempo_execucao_ms=tempo_total_ms,
+                dfe_id=dfe_id,
+                purchase_order_id=po_id,
+            )
+            return True, po_id, None
 
         # 4) Polling esgotado sem PO — registra ERRO
         tempo_total_ms = int((time.time() - inicio) * 1000)
@@ -22,11 +22,11 @@ Data: 2026-01-29
 """
 
 import logging
-from io import BytesIO
+import tempfile
 from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
 from collections import defaultdict
-from typing import Dict, List, Any, Optional, Tuple
+from typing import IO, Dict, List, Any, Optional, Tuple
 
 import xlsxwriter
 from sqlalchemy import func, and_, or_
@@ -922,7 +922,7 @@ def gerar_visao_mes_uf(dados: Dict, abrir_por_tipo: bool = False) -> List[Dict]:
 # GERAÇÃO DO EXCEL
 # =============================================================================
 
-def gerar_excel_relatorio(dados: Dict, data_inicio: str, data_fim: str, abrir_despesa_tipo: bool = False) -> BytesIO:
+def gerar_excel_relatorio(dados: Dict, data_inicio: str, data_fim: str, abrir_despesa_tipo: bool = False) -> IO[bytes]:
     """
     Gera Excel com 4 abas usando xlsxwriter.
 
@@ -949,8 +949,10 @@ def gerar_excel_relatorio(dados: Dict, data_inicio: str, data_fim: str, abrir_de
     logger.info(f"Visões geradas: Expandida={len(visao_expandida)}, Por NF={len(visao_por_nf)}, Frete+NF={len(visao_frete_nf)}, Mês+UF={len(visao_mes_uf)}")
 
     # Criar workbook
-    output = BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True, 'constant_memory': False})
+    # constant_memory: linhas vao ao disco conforme escritas (in_memory=True
+    # desligaria o modo). Arquivo temporario removido ao fechar a resposta.
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
 
     # Formatos
     header_format = workbook.add_format({
@@ -1486,7 +1488,7 @@ def gerar_visao_despesas_por_motivo_uf_mes(dados: Dict) -> List[Dict]:
     return _gerar_visao_despesas_agrupada(dados, 'motivo_despesa')
 
 
-def gerar_excel_despesas_extras(dados: Dict, data_inicio: str, data_fim: str) -> BytesIO:
+def gerar_excel_despesas_extras(dados: Dict, data_inicio: str, data_fim: str) -> IO[bytes]:
     """
     Gera Excel dedicado de despesas extras com 3 abas:
     - 'Detalhada': 1 linha por despesa × NF rateada
@@ -1507,8 +1509,10 @@ def gerar_excel_despesas_extras(dados: Dict, data_inicio: str, data_fim: str) ->
         len(visao_detalhada), len(visao_setor), len(visao_motivo)
     )
 
-    output = BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True, 'constant_memory': False})
+    # constant_memory: linhas vao ao disco conforme escritas (in_memory=True
+    # desligaria o modo). Arquivo temporario removido ao fechar a resposta.
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
 
     header_format = workbook.add_format({
         'bold': True,
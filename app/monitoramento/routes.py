@@ -16,6 +16,7 @@ import re
 from app import db
 
 # 🔒 Importar decoradores de permissão
+from app.utils.fragment_cache import lookup_fragment
 from app.utils.auth_decorators import require_monitoramento_geral, allow_vendedor_own_data, check_vendedor_permission, get_vendedor_filter_query
 
 from app.separacao.models import Separacao
@@ -1032,6 +1033,18 @@ def _enriquecer_entregas_carvia_batch(entregas):
         logger.exception('Erro em _enriquecer_entregas_carvia_batch')
 
 
+# Tabelas lidas pela tabela de listar_entregas (linhas + enriquecimento batch).
+# Commit em qualquer uma invalida o fragmento cacheado (app/utils/fragment_cache.py).
+_DEPS_TABELA_ENTREGAS = [
+    'entregas_monitoradas', 'agendamentos_entrega', 'comentarios_nf',
+    'pendencias_financeiras_nf', 'relatorio_faturamento_importado',
+    'faturamento_produto', 'embarque_itens', 'embarques', 'carteira_principal',
+    'separacao', 'contatos_agendamento', 'carvia_nfs', 'carvia_pedidos',
+    'carvia_pedido_itens', 'carvia_cotacoes', 'carvia_clientes',
+    'carvia_nf_vinculos_transferencia',
+]
+
+
 @monitoramento_bp.route('/listar_entregas')
 @login_required
 @allow_vendedor_own_data()  # 🔒 VENDEDORES: Apenas dados próprios
@@ -1391,10 +1404,21 @@ def listar_entregas():
         .distinct().order_by(RelatorioFaturamentoImportado.vendedor).all()
     vendedores_unicos = [v[0] for v in vendedores_unicos]
 
-    # Batch pre-fetch: enriquecer entregas paginadas de uma vez
-    _enriquecer_entregas_batch(paginacao.items)
-    # Enriquecer dados CarVia (tipo material, emitente/destinatario, pedido, nome comercial)
-    _enriquecer_entregas_carvia_batch(paginacao.items)
+    # Fragment cache da tabela: chave = usuario + filtros/pagina + dia (status
+    # "atrasada"/"no prazo" muda na virada); versoes das tabelas lidas na tabela
+    # entram na chave. Hit -> o enriquecimento abaixo so alimenta o corpo do
+    # {% cache %} e pode ser pulado.
+    tabela_cache_key = (
+        'monitoramento.entregas', current_user.id,
+        sorted(request.args.items(multi=True)), date.today().isoformat(),
+    )
+    tabela_cacheada = lookup_fragment(tabela_cache_key, _DEPS_TABELA_ENTREGAS) is not None
+
+    if not tabela_cacheada:
+        # Batch pre-fetch: enriquecer entregas paginadas de uma vez
+        _enriquecer_entregas_batch(paginacao.items)
+        # Enriquecer dados CarVia (tipo material, emitente/destinatario, pedido, nome comercial)
+        _enriquecer_entregas_carvia_batch(paginacao.items)
 
     # R18: batch — mapear NF venda (origem=CARVIA) -> NF transferencia
     # vinculada, para exibir "NF Transf: ####" na coluna Embarque.
@@ -1402,7 +1426,7 @@ def listar_entregas():
     nfs_carvia = [
         e.numero_nf for e in paginacao.items
         if getattr(e, 'origem', None) == 'CARVIA' and e.numero_nf
-    ]
+    ] if not tabela_cacheada else []
     if nfs_carvia:
         try:
             from app.carvia.models import CarviaNf
@@ -1447,6 +1471,8 @@ def listar_entregas():
         contadores=contadores,
         vendedores_unicos=vendedores_unicos,
         num_nf_transf_por_nf=num_nf_transf_por_nf,
+        tabela_cache_key=tabela_cache_key,
+        tabela_cache_deps=_DEPS_TABELA_ENTREGAS,
     )
 
 
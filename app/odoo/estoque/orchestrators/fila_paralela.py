@@ -0,0 +1,375 @@
+"""fila_paralela.py — Fila de trabalho paralela das ondas do pipeline (Skill 8).
+
+Substitui o loop SEQUENCIAL das ETAPAS A e E de `inventario_pipeline.py`
+quando `max_workers > 1`. D13/10.7 serializavam porque UMA conexao XML-RPC
+era compartilhada (Request-sent) — aqui cada worker abre a SUA conexao
+(`get_odoo_connection()`), o seu app_context e a sua sessao scoped (mesmo
+pattern de `pre_etapa_executor._processar_produto_thread`).
+
+Regras de despacho:
+  - `particao`: itens da mesma particao NUNCA rodam ao mesmo tempo (mesmo
+    produto na ETAPA A, mesma invoice na ETAPA E). Particoes distintas
+    avancam em paralelo.
+  - `max_por_company`: teto de itens simultaneos por company — protege o
+    Odoo (cada RecLF dispara dezenas de RPCs + action_gerar_po_dfe).
+  - Ordem: o primeiro item elegivel da lista (a ordem de entrada e' mantida
+    dentro de cada particao).
+
+Estado duravel (`FilaPipelineItem`, 1 linha por ciclo+etapa+chave):
+  PENDENTE -> EM_EXECUCAO (commit ANTES da chamada ao Odoo) -> OK | FALHA.
+  Ao retomar uma onda:
+    - OK: pulado sem tocar no Odoo;
+    - FALHA/PENDENTE: re-executado;
+    - EM_EXECUCAO orfao (processo caiu no meio): re-executado se a etapa e'
+      idempotente (`reexecutar_interrompidos=True` — ETAPA E, G-RECLF-3 +
+      HIGH-3); senao vira INTERROMPIDO e fica fora ate' o operador conferir
+      no Odoo e voltar para PENDENTE (ETAPA A — Skill 2 nao e' idempotente).
+
+Nao paraleliza B/C/D/F: B ja' tem Semaphore intra-picking + sleep G022 entre
+chunks, C e' polling, D e' Playwright SEFAZ (IRREVERSIVEL, barreira G-RECLF-9).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from app.odoo.estoque.scripts._commit_helpers import commit_resilient
+from app.odoo.utils.connection import get_odoo_connection
+from app.utils.timezone import agora_utc_naive
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS_DEFAULT = 4
+MAX_POR_COMPANY_DEFAULT = 2
+
+# Status do dict `resultados` para itens que nao rodaram nesta onda.
+RESULTADO_SKIP_JA_OK = 'SKIP_JA_OK'
+RESULTADO_INTERROMPIDO = 'INTERROMPIDO'
+
+
+@dataclass(frozen=True)
+class ItemFila:
+    """Unidade de trabalho da fila.
+
+    chave: unica dentro de (ciclo, etapa) — ex: 'ajuste:123', 'invoice:456'.
+    company_id: company usada no teto `max_por_company`.
+    particao: itens com a mesma particao sao serializados.
+    payload: dados primitivos (ids, cods) — NUNCA objetos ORM, que pertencem
+        a sessao da thread principal.
+    """
+    chave: str
+    company_id: int
+    particao: str
+    payload: Dict[str, Any] = field(default_factory=dict, compare=False, hash=False)
+
+
+def _json_seguro(valor: Any) -> Any:
+    """Resultado do processar como JSON puro (datas/Decimal viram str)."""
+    return json.loads(json.dumps(valor, default=str))
+
+
+class ExecutorFilaParalela:
+    """Executa `processar(odoo, item)` para cada item com N workers.
+
+    Args:
+        app: Flask app (cada worker abre o proprio app_context).
+        ciclo / etapa: escopo do estado duravel.
+        processar: callable (odoo, ItemFila) -> dict. Excecao = FALHA.
+        sucesso: callable (dict) -> bool para classificar o retorno
+            (default: todo retorno sem excecao e' OK).
+        max_workers: threads (1 conexao Odoo por thread).
+        max_por_company: teto de itens simultaneos por company.
+        conexao_factory: cria a conexao do worker (default get_odoo_connection).
+        reexecutar_interrompidos: ver docstring do modulo.
+        usuario: criado_por do estado duravel.
+    """
+
+    def __init__(
+        self,
+        app,
+        *,
+        ciclo: str,
+        etapa: str,
+        processar: Callable[[Any, ItemFila], Dict[str, Any]],
+        sucesso: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        max_workers: int = MAX_WORKERS_DEFAULT,
+        max_por_company: int = MAX_POR_COMPANY_DEFAULT,
+        conexao_factory: Optional[Callable[[], Any]] = None,
+        reexecutar_interrompidos: bool = True,
+        usuario: str = 'fila_pipeline',
+    ):
+        self.app = app
+        self.ciclo = ciclo
+        self.etapa = etapa
+        self.processar = processar
+        self.sucesso = sucesso or (lambda resultado: True)
+        self.max_workers = max(1, max_workers)
+        self.max_por_company = max(1, max_por_company)
+        self.conexao_factory = conexao_factory or get_odoo_connection
+        self.reexecutar_interrompidos = reexecutar_interrompidos
+        self.usuario = usuario
+
+        self._cond = threading.Condition()
+        self._pendentes: List[ItemFila] = []
+        self._ativos_por_company: Counter = Counter()
+        self._particoes_ativas: set = set()
+        self._ativos = 0
+        self._pico_paralelo = 0
+        self._pico_por_company: Counter = Counter()
+        self._resultados: Dict[str, Dict[str, Any]] = {}
+
+    # ========================================================
+    # Entry-point
+    # ========================================================
+
+    def executar(self, itens: List[ItemFila]) -> Dict[str, Any]:
+        """Registra/retoma o estado duravel e drena a fila.
+
+        Deve ser chamado dentro de app_context. A sessao do caller precisa
+        estar commitada (os workers leem em transacoes proprias — mesma
+        pre-condicao CR-EDGE-3 do pre_etapa_executor).
+
+        Returns:
+            dict com contadores (ok, falha, skip_ja_ok, interrompidos),
+            picos de concorrencia e `resultados` {chave: {status, resultado,
+            erro, tempo_ms, worker}} para o caller agregar no formato da etapa.
+        """
+        t0 = time.time()
+        self._pendentes = self._registrar(itens)
+        n_workers = min(self.max_workers, len(self._pendentes)) or 0
+        logger.info(
+            f'fila {self.ciclo}/{self.etapa}: {len(itens)} itens, '
+            f'{len(self._pendentes)} a executar, workers={n_workers} '
+            f'max_por_company={self.max_por_company}'
+        )
+
+        threads = [
+            threading.Thread(
+                target=self._worker, args=(n,), name=f'fila-{self.etapa}-w{n}', daemon=True,
+            )
+            for n in range(1, n_workers + 1)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        status = Counter(r['status'] for r in self._resultados.values())
+        return {
+            'ciclo': self.ciclo,
+            'etapa': self.etapa,
+            'max_workers': self.max_workers,
+            'max_por_company': self.max_por_company,
+            'itens_total': len(itens),
+            'executados': status['OK'] + status['FALHA'],
+            'ok': status['OK'],
+            'falha': status['FALHA'],
+            'skip_ja_ok': status[RESULTADO_SKIP_JA_OK],
+            'interrompidos': status[RESULTADO_INTERROMPIDO],
+            'pico_paralelo': self._pico_paralelo,
+            'pico_por_company': dict(self._pico_por_company),
+            'resultados': self._resultados,
+            'tempo_ms': int((time.time() - t0) * 1000),
+        }
+
+    # ========================================================
+    # Estado duravel
+    # ========================================================
+
+    def _registrar(self, itens: List[ItemFila]) -> List[ItemFila]:
+        """Cria os itens novos e decide o que roda nesta onda."""
+        from app import db  # lazy
+        from app.odoo.models.fila_pipeline_item import (  # lazy
+            STATUS_FILA_EM_EXECUCAO,
+            STATUS_FILA_INTERROMPIDO,
+            STATUS_FILA_OK,
+            STATUS_FILA_PENDENTE,
+            FilaPipelineItem,
+        )
+
+        chaves = [i.chave for i in itens]
+        existentes: Dict[str, FilaPipelineItem] = {}
+        for inicio in range(0, len(chaves), 500):
+            for reg in FilaPipelineItem.query.filter(
+                FilaPipelineItem.ciclo == self.ciclo,
+                FilaPipelineItem.etapa == self.etapa,
+                FilaPipelineItem.chave.in_(chaves[inicio:inicio + 500]),
+            ):
+                existentes[reg.chave] = reg
+
+        a_executar: List[ItemFila] = []
+        for item in itens:
+            reg = existentes.get(item.chave)
+            if reg is None:
+                db.session.add(FilaPipelineItem(
+                    ciclo=self.ciclo, etapa=self.etapa, chave=item.chave,
+                    company_id=item.company_id, particao=item.particao,
+                    status=STATUS_FILA_PENDENTE, tentativas=0, criado_por=self.usuario,
+                ))
+                a_executar.append(item)
+            elif reg.status == STATUS_FILA_OK:
+                self._resultados[item.chave] = {
+                    'status': RESULTADO_SKIP_JA_OK, 'resultado': reg.resultado_json, 'erro': None,
+                }
+            elif (
+                reg.status in (STATUS_FILA_EM_EXECUCAO, STATUS_FILA_INTERROMPIDO)
+                and not self.reexecutar_interrompidos
+            ):
+                if reg.status == STATUS_FILA_EM_EXECUCAO:
+                    logger.warning(
+                        f'fila {self.ciclo}/{self.etapa} {item.chave}: EM_EXECUCAO orfao '
+                        f'(worker={reg.worker} iniciado_em={reg.iniciado_em}) — '
+                        f'marcado INTERROMPIDO, conferir no Odoo antes de voltar para PENDENTE'
+                    )
+                    reg.status = STATUS_FILA_INTERROMPIDO
+                self._resultados[item.chave] = {
+                    'status': RESULTADO_INTERROMPIDO, 'resultado': None,
+                    'erro': 'EM_EXECUCAO orfao de onda anterior — conferir no Odoo',
+                }
+            else:
+                if reg.status == STATUS_FILA_EM_EXECUCAO:
+                    logger.info(
+                        f'fila {self.ciclo}/{self.etapa} {item.chave}: retomando '
+                        f'EM_EXECUCAO orfao (etapa idempotente)'
+                    )
+                a_executar.append(item)
+        commit_resilient()
+        return a_executar
+
+    def _marcar(self, chave: str, **valores) -> None:
+        from app import db  # lazy
+        from app.odoo.models.fila_pipeline_item import FilaPipelineItem  # lazy
+
+        FilaPipelineItem.query.filter_by(
+            ciclo=self.ciclo, etapa=self.etapa, chave=chave,
+        ).update(valores, synchronize_session=False)
+        if not commit_resilient():
+            db.session.rollback()
+            raise RuntimeError(f'fila: commit do estado de {chave} falhou')
+
+    # ========================================================
+    # Despacho
+    # ========================================================
+
+    def _proximo(self) -> Optional[ItemFila]:
+        """Primeiro item elegivel (company abaixo do teto + particao livre)."""
+        with self._cond:
+            while self._pendentes:
+                for i, item in enumerate(self._pendentes):
+                    if (
+                        self._ativos_por_company[item.company_id] < self.max_por_company
+                        and item.particao not in self._particoes_ativas
+                    ):
+                        del self._pendentes[i]
+                        self._ativos_por_company[item.company_id] += 1
+                        self._particoes_ativas.add(item.particao)
+                        self._ativos += 1
+                        self._pico_paralelo = max(self._pico_paralelo, self._ativos)
+                        self._pico_por_company[item.company_id] = max(
+                            self._pico_por_company[item.company_id],
+                            self._ativos_por_company[item.company_id],
+                        )
+                        return item
+                # Nada elegivel: todos bloqueados por itens em execucao.
+                self._cond.wait()
+            return None
+
+    def _liberar(self, item: ItemFila) -> None:
+        with self._cond:
+            self._ativos_por_company[item.company_id] -= 1
+            self._particoes_ativas.discard(item.particao)
+            self._ativos -= 1
+            self._cond.notify_all()
+
+    def _worker(self, n: int) -> None:
+        from app import db  # lazy
+
+        nome = f'{self.etapa}-w{n}'
+        with self.app.app_context():
+            odoo = None
+            try:
+                while True:
+                    item = self._proximo()
+                    if item is None:
+                        break
+                    try:
+                        if odoo is None:
+                            odoo = self.conexao_factory()
+                        self._executar_item(odoo, item, nome)
+                    except Exception as e:
+                        # Falha fora do processar (conexao, commit do estado):
+                        # o item fica EM_EXECUCAO/PENDENTE no banco e sera
+                        # retomado pela proxima onda.
+                        logger.error(f'fila worker {nome} {item.chave}: {e}', exc_info=True)
+                        try:
+                            db.session.rollback()
+                        except Exception:
+                            pass
+                        self._resultados[item.chave] = {
+                            'status': 'FALHA', 'resultado': None, 'erro': str(e)[:500],
+                        }
+                    finally:
+                        self._liberar(item)
+            finally:
+                try:
+                    db.session.remove()
+                except Exception:
+                    pass
+
+    def _executar_item(self, odoo, item: ItemFila, worker: str) -> None:
+        from app import db  # lazy
+        from app.odoo.models.fila_pipeline_item import (  # lazy
+            STATUS_FILA_EM_EXECUCAO,
+            STATUS_FILA_FALHA,
+            STATUS_FILA_OK,
+            FilaPipelineItem,
+        )
+
+        self._marcar(
+            item.chave,
+            status=STATUS_FILA_EM_EXECUCAO,
+            worker=worker,
+            iniciado_em=agora_utc_naive(),
+            concluido_em=None,
+            tentativas=FilaPipelineItem.tentativas + 1,
+        )
+
+        t0 = time.time()
+        erro: Optional[str] = None
+        try:
+            resultado = self.processar(odoo, item) or {}
+            ok = bool(self.sucesso(resultado))
+            if not ok:
+                erro = str(resultado.get('erro') or resultado.get('status') or 'falha')[:500]
+        except Exception as e:
+            logger.error(
+                f'fila {self.ciclo}/{self.etapa} {item.chave} ({worker}): {e}', exc_info=True,
+            )
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+            resultado, ok, erro = {}, False, str(e)[:500]
+
+        tempo_ms = int((time.time() - t0) * 1000)
+        resultado = _json_seguro(resultado)
+        self._marcar(
+            item.chave,
+            status=STATUS_FILA_OK if ok else STATUS_FILA_FALHA,
+            resultado_json=resultado,
+            erro_msg=erro,
+            tempo_ms=tempo_ms,
+            concluido_em=agora_utc_naive(),
+        )
+        self._resultados[item.chave] = {
+            'status': 'OK' if ok else 'FALHA',
+            'resultado': resultado,
+            'erro': erro,
+            'tempo_ms': tempo_ms,
+            'worker': worker,
+        }
@@ -28,7 +28,8 @@ Decisoes aplicadas:
   D9: re-fetch via safe_session_get apos Playwright (v17)
   D10: db.engine.dispose() profilatico antes/apos C+D (v16)
   D11: db.session.expire_all() + reload entre etapas
-  D13: ETAPA A SEQUENCIAL (XML-RPC nao thread-safe Request-sent)
+  D13: ETAPA A SEQUENCIAL (XML-RPC nao thread-safe Request-sent) — opt-in
+       `--max-workers N` usa fila_paralela.py (1 conexao por worker)
   D14: _commit_resilient versao MAIS FORTE (engine.dispose se SSL)
   D15: ETAPA A 100% DELEGAVEL para Skill 2 `transferindo-interno-odoo`
   D16: ETAPA B pipeline POR PICKING + sleep 5s entre chunks (G022)
@@ -40,6 +41,9 @@ Decisoes aplicadas:
   10.7 v17 (Rafael 2026-05-25): ETAPA E SEQUENCIAL + recovery --resume.
         Razao: RecebimentoLfOdoo NAO eh thread-safe (Redis state);
         G-RECLF-1 (50-100h/onda 100 invoices) aceito por idempotencia.
+        Fila paralela (`--max-workers N --max-por-company M`): invoices
+        distintas em paralelo, 1 conexao Odoo por worker, estado por
+        invoice em fila_pipeline_item (retomada pula as OK).
 
 Gotchas codificados:
   G016: SSL — `_commit_resilient` proativo + `expire_all()+carregar_ajustes()`
@@ -108,6 +112,9 @@ from app.odoo.estoque.scripts._invoice_helpers import (
     garantir_fiscal_setup,           # F5d.7 (G034 DEV_*)
     garantir_payment_provider,       # F5d.5 (G029)
 )
+from app.odoo.estoque.orchestrators.fila_paralela import (
+    MAX_POR_COMPANY_DEFAULT as FILA_MAX_POR_COMPANY_DEFAULT,
+)
 from app.odoo.estoque.scripts.picking import StockPickingService
 from app.odoo.utils.connection import get_odoo_connection
 
@@ -612,6 +619,92 @@ def _agrupar_por_direcao(ajustes: List) -> Dict[str, List]:
     return dict(out)
 
 
+# Desfecho de `_transferir_ajuste_etapa_a` -> contador do dict da ETAPA A.
+DESFECHOS_ETAPA_A: Dict[str, str] = {
+    'transferido': 'ajustes_transferidos',
+    'skip_ja_ok': 'ajustes_skip_ja_ok',
+    'skip_pid_ausente': 'ajustes_skip_pid_ausente',
+    'skip_sem_lote_destino': 'ajustes_skip_sem_lote_destino',
+    'skip_qty_zero': 'ajustes_skip_qty_zero',
+}
+
+
+def _contabilizar_desfecho_etapa_a(
+    out: Dict[str, Any], snap: Dict[str, Any], desfecho: str, erro: Optional[str],
+) -> None:
+    """Soma 1 desfecho no dict da ETAPA A (loop D13 e fila paralela)."""
+    if desfecho in DESFECHOS_ETAPA_A:
+        out[DESFECHOS_ETAPA_A[desfecho]] += 1
+        return
+    out['ajustes_falha'].append({
+        'ajuste_id': snap['id'],
+        'cod_produto': snap['cod_produto'],
+        'erro': erro,
+    })
+
+
+def _contabilizar_resultado_etapa_e(
+    out: Dict[str, Any], invoice_id: int, resultado: Dict[str, Any],
+) -> None:
+    """Mapeia o status do atomo Skill 7 no dict da ETAPA E (loop 10.7 e fila)."""
+    status_atomo = resultado.get('status')
+    rec_id = resultado.get('rec_id')
+
+    if status_atomo == 'CRIADO':
+        out['invoices_ok'][invoice_id] = rec_id
+        out['contadores']['ok'] += 1
+        logger.info(
+            f'  E invoice {invoice_id}: CRIADO rec={rec_id} '
+            f'inv_fb={resultado.get("odoo_invoice_id_fb")} '
+            f'transfer={resultado.get("transfer_status")} '
+            f'tempo={resultado.get("tempo_ms")}ms'
+        )
+    elif status_atomo == 'RETOMADO':
+        # HIGH-3: contado como sucesso (RecLf foi retomado e processado)
+        out['invoices_ok'][invoice_id] = rec_id
+        out['invoices_retomados'].append(invoice_id)
+        out['contadores']['ok'] += 1
+        out['contadores']['retomado'] += 1
+        logger.info(
+            f'  E invoice {invoice_id}: RETOMADO rec={rec_id} '
+            f'(HIGH-3 recovery)'
+        )
+    elif status_atomo == 'IDEMPOTENT_PROCESSADO':
+        out['invoices_skip'].append(invoice_id)
+        out['contadores']['skip'] += 1
+        logger.info(
+            f'  E invoice {invoice_id}: SKIP G-RECLF-3 '
+            f'rec={rec_id} ja processado'
+        )
+    elif status_atomo == 'PARCIAL':
+        # G-RECLF-2: FB OK mas transfer FASE 6+7 erro
+        out['invoices_ok'][invoice_id] = rec_id
+        out['contadores']['ok'] += 1
+        out['contadores']['parcial_fb_ok_transfer_erro'] += 1
+        logger.warning(
+            f'  E invoice {invoice_id}: PARCIAL rec={rec_id} '
+            f'(G-RECLF-2 transfer_status=erro aceito)'
+        )
+    elif status_atomo == 'FALHA':
+        out['invoices_falha'][invoice_id] = (
+            resultado.get('erro') or 'atomo_falha_sem_erro'
+        )
+        out['contadores']['falha'] += 1
+        logger.error(
+            f'  E invoice {invoice_id}: FALHA atomo Skill 7 - '
+            f'erro={resultado.get("erro")}'
+        )
+    else:  # SKIP_AJUSTES_VAZIOS ou outro
+        logger.warning(
+            f'  E invoice {invoice_id}: status atomo desconhecido='
+            f'{status_atomo!r}, contando como falha'
+        )
+        out['invoices_falha'][invoice_id] = (
+            f'atomo_status_desconhecido: {status_atomo}'
+        )
+        out['contadores']['falha'] += 1
+
+
 # ============================================================
 # Classe principal: FaturamentoPipelineExecutor
 # ============================================================
@@ -673,6 +766,8 @@ class FaturamentoPipelineExecutor:
         usuario: str = 'faturamento_pipeline',
         cod_produto: Optional[str] = None,
         limite: Optional[int] = None,  # v16: aceita limite para smoke
+        max_workers: int = 1,
+        max_por_company: int = FILA_MAX_POR_COMPANY_DEFAULT,
     ) -> Dict[str, Any]:
         """ETAPA A v16: transferencias intra-empresa SEM NF (RENOMEAR/TRANSFERIR_LOTE).
 
@@ -699,10 +794,15 @@ class FaturamentoPipelineExecutor:
             dry_run: True (default) simula; False executa real.
             usuario: identificador para auditoria.
             cod_produto: smoke/canary.
+            max_workers: 1 (default) = loop SEQUENCIAL D13; > 1 = fila
+                paralela (fila_paralela.py) com 1 conexao Odoo por worker e
+                estado duravel em FilaPipelineItem.
+            max_por_company: teto de ajustes simultaneos por company (fila).
 
         Returns:
             dict com status + contadores (ajustes_total, ajustes_transferidos,
-            ajustes_skip_pid, ajustes_falha, ...).
+            ajustes_skip_pid, ajustes_falha, ...). Na fila paralela tambem
+            `fila` (contadores/picos) e `ajustes_interrompidos`.
         """
         t0 = time.time()
         # CR-C10.2 v16: filtrar ACOES_LOTE (escopo disjunto de ACOES_PICKING).
@@ -799,117 +899,31 @@ class FaturamentoPipelineExecutor:
         cods_distintos = sorted({s['cod_produto'] for s in snapshots})
         prod_cache = self._resolver_pids_em_batch(cods_distintos)
 
-        # Iterar SEQUENCIAL (D13)
-        for snap in snapshots:
-            t_snap = time.time()
-            # Idempotencia: skip ja em TRANSF_OK
-            if snap['fase_atual'] == 'TRANSF_OK':
-                out['ajustes_skip_ja_ok'] += 1
-                continue
-
-            pid = prod_cache.get(snap['cod_produto'])
-            if not pid:
-                out['ajustes_skip_pid_ausente'] += 1
-                continue
-
-            if not snap['lote_destino']:
-                out['ajustes_skip_sem_lote_destino'] += 1
-                # Marcar fase TRANSF_FALHA + erro_msg
-                aj = ajuste_index[snap['id']]
-                aj.fase_pipeline = 'TRANSF_FALHA'
-                aj.erro_msg = 'ETAPA A: sem lote_destino no ajuste'
-                _commit_resilient()
-                continue
-
-            qty = snap['qtd_inventario']
-            if qty <= 0:
-                out['ajustes_skip_qty_zero'] += 1
-                continue
-
-            # Resolver lot_id_origem (Skill 2 v2 aceita None se sem lote)
-            lot_id_origem: Optional[int] = None
-            if snap['lote_origem']:
-                try:
-                    lot_id_origem = lot_svc.buscar_por_nome(
-                        snap['lote_origem'], pid, snap['company_id'],
-                    )
-                except Exception as e:
-                    logger.warning(
-                        f'ETAPA A ajuste {snap["id"]} buscar lote '
-                        f'{snap["lote_origem"]!r} falhou: {e}. '
-                        f'Tentando sem lote origem (Skill 2 v2 trata None).'
-                    )
-                    lot_id_origem = None
-
-            # Invocar Skill 2 v2 `transferir_quantidade_para_lote_v2`
-            try:
-                result = transfer_svc.transferir_quantidade_para_lote_v2(
-                    product_id=pid,
-                    company_id=snap['company_id'],
-                    location_id=COMPANY_LOCATIONS[snap['company_id']],
-                    qty=qty,
-                    lot_id_origem=lot_id_origem,
-                    nome_lote_destino=snap['lote_destino'],
-                    dry_run=False,
-                )
-                tempo_ms_snap = int((time.time() - t_snap) * 1000)
-
-                # F12 v15c: external_id_operacao para rastreabilidade
-                external_id_a = (
-                    f'INV-{snap["ciclo"]}-A{snap["id"]:06d}-TRANSF_OK-'
-                    f'{uuid.uuid4().hex[:8]}'
-                )
-                aj = ajuste_index[snap['id']]
-                aj.fase_pipeline = 'TRANSF_OK'
-                aj.external_id_operacao = external_id_a
-                _registrar_auditoria(
-                    ajuste_id=snap['id'], ciclo=snap['ciclo'],
-                    fase='TRANSF_OK',
-                    acao='transferir_quantidade_para_lote_v2',
-                    modelo_odoo='stock.quant',
-                    status='SUCESSO',
-                    payload={
-                        'product_id': pid,
-                        'company_id': snap['company_id'],
-                        'qty': qty,
-                        'lot_id_origem': lot_id_origem,
-                        'lote_destino': snap['lote_destino'],
-                        'lote_origem': snap['lote_origem'],
-                    },
-                    resposta={
-                        'lote_destino_nome': result.get('lote_destino_nome'),
-                        'lote_destino_criado_agora': result.get(
-                            'lote_destino_criado_agora'
-                        ),
-                    },
-                    tempo_ms=tempo_ms_snap, executado_por=usuario,
-                )
-                _commit_resilient()
-                out['ajustes_transferidos'] += 1
-
-            except Exception as e:
-                msg = str(e)[:500]
-                logger.error(
-                    f'ETAPA A ajuste {snap["id"]} Skill 2 falhou: {msg}',
-                    exc_info=True,
-                )
-                aj = ajuste_index[snap['id']]
-                aj.fase_pipeline = 'TRANSF_FALHA'
-                aj.erro_msg = msg
-                _registrar_auditoria(
-                    ajuste_id=snap['id'], ciclo=snap['ciclo'],
-                    fase='TRANSF_FALHA',
-                    acao='transferir_quantidade_para_lote_v2',
-                    modelo_odoo='stock.quant',
-                    status='FALHA', erro_msg=msg,
-                    executado_por=usuario,
+        if max_workers > 1:
+            # Fila paralela (fila_paralela.py): 1 conexao Odoo por worker,
+            # particao por (company, cod) — ajustes do mesmo produto nunca
+            # concorrem no mesmo quant.
+            self._executar_etapa_a_em_fila(
+                out=out,
+                snapshots=snapshots,
+                prod_cache=prod_cache,
+                ciclo=ciclo,
+                usuario=usuario,
+                max_workers=max_workers,
+                max_por_company=max_por_company,
+            )
+        else:
+            # Iterar SEQUENCIAL (D13)
+            for snap in snapshots:
+                desfecho, erro = self._transferir_ajuste_etapa_a(
+                    snap=snap,
+                    aj=ajuste_index[snap['id']],
+                    pid=prod_cache.get(snap['cod_produto']),
+                    transfer_svc=transfer_svc,
+                    lot_svc=lot_svc,
+                    usuario=usuario,
                 )
-                _commit_resilient()
-                out['ajustes_falha'].append({
-                    'ajuste_id': snap['id'],
-                    'cod_produto': snap['cod_produto'],
-                    'erro': msg,
-                })
+                _contabilizar_desfecho_etapa_a(out, snap, desfecho, erro)
 
         n_falhas = len(out['ajustes_falha'])
         n_ok = out['ajustes_transferidos']
@@ -923,6 +937,209 @@ class FaturamentoPipelineExecutor:
         out['tempo_ms'] = int((time.time() - t0) * 1000)
         return out
 
+    def _transferir_ajuste_etapa_a(
+        self,
+        *,
+        snap: Dict[str, Any],
+        aj,
+        pid: Optional[int],
+        transfer_svc,
+        lot_svc,
+        usuario: str,
+    ) -> Tuple[str, Optional[str]]:
+        """Processa 1 ajuste da ETAPA A (Skill 2 v2) e persiste fase + auditoria.
+
+        Corpo unico para o loop SEQUENCIAL (D13) e para os workers da fila
+        paralela — `aj` vem da sessao de quem chama.
+
+        Returns:
+            (desfecho, erro) com desfecho em DESFECHOS_ETAPA_A ou 'falha'.
+        """
+        t_snap = time.time()
+        # Idempotencia: skip ja em TRANSF_OK
+        if snap['fase_atual'] == 'TRANSF_OK':
+            return 'skip_ja_ok', None
+
+        if not pid:
+            return 'skip_pid_ausente', None
+
+        if not snap['lote_destino']:
+            # Marcar fase TRANSF_FALHA + erro_msg
+            aj.fase_pipeline = 'TRANSF_FALHA'
+            aj.erro_msg = 'ETAPA A: sem lote_destino no ajuste'
+            _commit_resilient()
+            return 'skip_sem_lote_destino', None
+
+        qty = snap['qtd_inventario']
+        if qty <= 0:
+            return 'skip_qty_zero', None
+
+        # Resolver lot_id_origem (Skill 2 v2 aceita None se sem lote)
+        lot_id_origem: Optional[int] = None
+        if snap['lote_origem']:
+            try:
+                lot_id_origem = lot_svc.buscar_por_nome(
+                    snap['lote_origem'], pid, snap['company_id'],
+                )
+            except Exception as e:
+                logger.warning(
+                    f'ETAPA A ajuste {snap["id"]} buscar lote '
+                    f'{snap["lote_origem"]!r} falhou: {e}. '
+                    f'Tentando sem lote origem (Skill 2 v2 trata None).'
+                )
+                lot_id_origem = None
+
+        # Invocar Skill 2 v2 `transferir_quantidade_para_lote_v2`
+        try:
+            result = transfer_svc.transferir_quantidade_para_lote_v2(
+                product_id=pid,
+                company_id=snap['company_id'],
+                location_id=COMPANY_LOCATIONS[snap['company_id']],
+                qty=qty,
+                lot_id_origem=lot_id_origem,
+                nome_lote_destino=snap['lote_destino'],
+                dry_run=False,
+            )
+            tempo_ms_snap = int((time.time() - t_snap) * 1000)
+
+            # F12 v15c: external_id_operacao para rastreabilidade
+            external_id_a = (
+                f'INV-{snap["ciclo"]}-A{snap["id"]:06d}-TRANSF_OK-'
+                f'{uuid.uuid4().hex[:8]}'
+            )
+            aj.fase_pipeline = 'TRANSF_OK'
+            aj.external_id_operacao = external_id_a
+            _registrar_auditoria(
+                ajuste_id=snap['id'], ciclo=snap['ciclo'],
+                fase='TRANSF_OK',
+                acao='transferir_quantidade_para_lote_v2',
+                modelo_odoo='stock.quant',
+                status='SUCESSO',
+                payload={
+                    'product_id': pid,
+                    'company_id': snap['company_id'],
+                    'qty': qty,
+                    'lot_id_origem': lot_id_origem,
+                    'lote_destino': snap['lote_destino'],
+                    'lote_origem': snap['lote_origem'],
+                },
+                resposta={
+                    'lote_destino_nome': result.get('lote_destino_nome'),
+                    'lote_destino_criado_agora': result.get(
+                        'lote_destino_criado_agora'
+                    ),
+                },
+                tempo_ms=tempo_ms_snap, executado_por=usuario,
+            )
+            _commit_resilient()
+            return 'transferido', None
+
+        except Exception as e:
+            msg = str(e)[:500]
+            logger.error(
+                f'ETAPA A ajuste {snap["id"]} Skill 2 falhou: {msg}',
+                exc_info=True,
+            )
+            aj.fase_pipeline = 'TRANSF_FALHA'
+            aj.erro_msg = msg
+            _registrar_auditoria(
+                ajuste_id=snap['id'], ciclo=snap['ciclo'],
+                fase='TRANSF_FALHA',
+                acao='transferir_quantidade_para_lote_v2',
+                modelo_odoo='stock.quant',
+                status='FALHA', erro_msg=msg,
+                executado_por=usuario,
+            )
+            _commit_resilient()
+            return 'falha', msg
+
+    def _executar_etapa_a_em_fila(
+        self,
+        *,
+        out: Dict[str, Any],
+        snapshots: List[Dict[str, Any]],
+        prod_cache: Dict[str, int],
+        ciclo: str,
+        usuario: str,
+        max_workers: int,
+        max_por_company: int,
+    ) -> None:
+        """ETAPA A via ExecutorFilaParalela — preenche `out` como o loop D13.
+
+        Skill 2 NAO e' idempotente (transferir 2x move 2x): EM_EXECUCAO orfao
+        de onda anterior vira INTERROMPIDO e fica em
+        `out['ajustes_interrompidos']` para conferencia manual.
+        """
+        from flask import current_app  # noqa: PLC0415
+        from app import db  # noqa: PLC0415
+        from app.odoo.estoque.orchestrators.fila_paralela import (  # noqa: PLC0415
+            RESULTADO_INTERROMPIDO,
+            RESULTADO_SKIP_JA_OK,
+            ExecutorFilaParalela,
+            ItemFila,
+        )
+        from app.odoo.estoque.scripts.transfer import (  # noqa: PLC0415
+            StockInternalTransferService,
+        )
+        from app.odoo.models import AjusteEstoqueInventario  # noqa: PLC0415
+        from app.odoo.services.stock_lot_service import (  # noqa: PLC0415
+            StockLotService,
+        )
+
+        # Workers leem em transacoes proprias (CR-EDGE-3).
+        _commit_resilient()
+
+        def processar(odoo, item):
+            snap = item.payload['snap']
+            desfecho, erro = self._transferir_ajuste_etapa_a(
+                snap=snap,
+                aj=db.session.get(AjusteEstoqueInventario, snap['id']),
+                pid=item.payload['pid'],
+                transfer_svc=StockInternalTransferService(odoo=odoo),
+                lot_svc=StockLotService(odoo=odoo),
+                usuario=usuario,
+            )
+            return {'desfecho': desfecho, 'erro': erro}
+
+        fila = ExecutorFilaParalela(
+            current_app._get_current_object(),
+            ciclo=ciclo,
+            etapa='A',
+            processar=processar,
+            sucesso=lambda r: r.get('desfecho') != 'falha',
+            max_workers=max_workers,
+            max_por_company=max_por_company,
+            reexecutar_interrompidos=False,
+            usuario=usuario,
+        )
+        res_fila = fila.executar([
+            ItemFila(
+                chave=f'ajuste:{snap["id"]}',
+                company_id=snap['company_id'],
+                particao=f'{snap["company_id"]}:{snap["cod_produto"]}',
+                payload={'snap': snap, 'pid': prod_cache.get(snap['cod_produto'])},
+            )
+            for snap in snapshots
+        ])
+
+        out['ajustes_interrompidos'] = []
+        for snap in snapshots:
+            r = res_fila['resultados'].get(f'ajuste:{snap["id"]}') or {}
+            if r.get('status') == RESULTADO_SKIP_JA_OK:
+                out['ajustes_skip_ja_ok'] += 1
+            elif r.get('status') == RESULTADO_INTERROMPIDO:
+                out['ajustes_interrompidos'].append(snap['id'])
+            elif r.get('resultado'):
+                _contabilizar_desfecho_etapa_a(
+                    out, snap, r['resultado']['desfecho'], r['resultado']['erro'],
+                )
+            else:
+                _contabilizar_desfecho_etapa_a(out, snap, 'falha', r.get('erro'))
+        res_fila.pop('resultados')
+        out['fila'] = res_fila
+        # Sessao principal ve o que os workers commitaram (D11).
+        db.session.expire_all()
+
     # ========================================================
     # ETAPA B (F5a + F5b + F5c via atomos Skill 5 v15a)
     # ========================================================
@@ -4496,6 +4713,8 @@ class FaturamentoPipelineExecutor:
         usuario: str = 'faturamento_pipeline',
         cod_produto: Optional[str] = None,
         usar_fluxo_l3_v19: bool = False,
+        max_workers: int = 1,
+        max_por_company: int = FILA_MAX_POR_COMPANY_DEFAULT,
     ) -> Dict[str, Any]:
         """ETAPA E v17.5 — DELEGA atomo Skill 7 `escriturando-odoo` por invoice.
 
@@ -4527,6 +4746,10 @@ class FaturamentoPipelineExecutor:
         Decisao 10.7 v17 (Rafael 2026-05-25 — preservada): SEQUENCIAL.
         Razao: RecebimentoLfOdooService NAO eh thread-safe (Redis state).
         Idempotencia perfeita permite recovery via --resume.
+        Fila paralela (opt-in `max_workers > 1`): a restricao vale para UMA
+        instancia/conexao compartilhada — cada worker tem a sua conexao e o
+        seu EscrituracaoLfService, e o Redis state do RecLF e' por rec.id.
+        Estado por invoice em FilaPipelineItem (ver fila_paralela.py).
 
         Args:
             ciclo: identificador do ciclo.
@@ -4534,6 +4757,10 @@ class FaturamentoPipelineExecutor:
             dry_run: True (default) NAO cria RecebimentoLf; reporta planejamento.
             usuario: identificador para auditoria + executado_por do service.
             cod_produto: smoke/canary.
+            max_workers: 1 (default) = loop SEQUENCIAL 10.7; > 1 = fila
+                paralela por invoice (so' caminho legacy Skill 7).
+            max_por_company: teto de invoices simultaneas por company
+                emissora (protege o Odoo — cada RecLF e' pesado).
 
         Returns:
             dict com:
@@ -4663,88 +4890,46 @@ class FaturamentoPipelineExecutor:
             out['tempo_ms'] = int((time.time() - t0) * 1000)
             return out
 
-        # Instanciar atomo Skill 7 (uma vez para a ETAPA toda; svc externo
-        # interno e' fresh por invocacao via HIGH-4 do proprio atomo).
-        escrituracao_svc = EscrituracaoLfService(odoo=self.odoo)
-
-        for invoice_id in invoices_pendentes:
-            ajustes_inv = ajustes_por_invoice[invoice_id]
-
-            try:
-                resultado = escrituracao_svc.criar_recebimento_orchestrado(
-                    invoice_id=invoice_id,
-                    ajustes=ajustes_inv,
-                    ciclo=ciclo,
-                    usuario=usuario,
-                    dry_run=False,
-                )
-            except Exception as e:
-                logger.error(
-                    f'  E invoice {invoice_id}: atomo Skill 7 raise: {e}',
-                    exc_info=True,
-                )
-                out['invoices_falha'][invoice_id] = (
-                    f'atomo_skill7_excecao: {str(e)[:200]}'
-                )
-                out['contadores']['falha'] += 1
-                continue
+        if max_workers > 1:
+            # Fila paralela (fila_paralela.py): 1 conexao Odoo + 1
+            # EscrituracaoLfService por worker; Redis state do RecLF e' por
+            # rec.id, entao invoices distintas nao colidem. Particao = invoice.
+            self._executar_etapa_e_em_fila(
+                out=out,
+                ajustes_por_invoice=ajustes_por_invoice,
+                ciclo=ciclo,
+                usuario=usuario,
+                max_workers=max_workers,
+                max_por_company=max_por_company,
+            )
+        else:
+            # SEQUENCIAL (decisao 10.7) — max_workers=1.
+            # Instanciar atomo Skill 7 (uma vez para a ETAPA toda; svc externo
+            # interno e' fresh por invocacao via HIGH-4 do proprio atomo).
+            escrituracao_svc = EscrituracaoLfService(odoo=self.odoo)
+            for invoice_id in invoices_pendentes:
+                ajustes_inv = ajustes_por_invoice[invoice_id]
 
-            status_atomo = resultado.get('status')
-            rec_id = resultado.get('rec_id')
+                try:
+                    resultado = escrituracao_svc.criar_recebimento_orchestrado(
+                        invoice_id=invoice_id,
+                        ajustes=ajustes_inv,
+                        ciclo=ciclo,
+                        usuario=usuario,
+                        dry_run=False,
+                    )
+                except Exception as e:
+                    logger.error(
+                        f'  E invoice {invoice_id}: atomo Skill 7 raise: {e}',
+                        exc_info=True,
+                    )
+                    out['invoices_falha'][invoice_id] = (
+                        f'atomo_skill7_excecao: {str(e)[:200]}'
+                    )
+                    out['contadores']['falha'] += 1
+                    continue
 
-            if status_atomo == 'CRIADO':
-                out['invoices_ok'][invoice_id] = rec_id
-                out['contadores']['ok'] += 1
-                logger.info(
-                    f'  E invoice {invoice_id}: CRIADO rec={rec_id} '
-                    f'inv_fb={resultado.get("odoo_invoice_id_fb")} '
-                    f'transfer={resultado.get("transfer_status")} '
-                    f'tempo={resultado.get("tempo_ms")}ms'
-                )
-            elif status_atomo == 'RETOMADO':
-                # HIGH-3: contado como sucesso (RecLf foi retomado e processado)
-                out['invoices_ok'][invoice_id] = rec_id
-                out['invoices_retomados'].append(invoice_id)
-                out['contadores']['ok'] += 1
-                out['contadores']['retomado'] += 1
-                logger.info(
-                    f'  E invoice {invoice_id}: RETOMADO rec={rec_id} '
-                    f'(HIGH-3 recovery)'
-                )
-            elif status_atomo == 'IDEMPOTENT_PROCESSADO':
-                out['invoices_skip'].append(invoice_id)
-                out['contadores']['skip'] += 1
-                logger.info(
-                    f'  E invoice {invoice_id}: SKIP G-RECLF-3 '
-                    f'rec={rec_id} ja processado'
-                )
-            elif status_atomo == 'PARCIAL':
-                # G-RECLF-2: FB OK mas transfer FASE 6+7 erro
-                out['invoices_ok'][invoice_id] = rec_id
-                out['contadores']['ok'] += 1
-                out['contadores']['parcial_fb_ok_transfer_erro'] += 1
-                logger.warning(
-                    f'  E invoice {invoice_id}: PARCIAL rec={rec_id} '
-                    f'(G-RECLF-2 transfer_status=erro aceito)'
-                )
-            elif status_atomo == 'FALHA':
-                out['invoices_falha'][invoice_id] = (
-                    resultado.get('erro') or 'atomo_falha_sem_erro'
-                )
-                out['contadores']['falha'] += 1
-                logger.error(
-                    f'  E invoice {invoice_id}: FALHA atomo Skill 7 - '
-                    f'erro={resultado.get("erro")}'
-                )
-            else:  # SKIP_AJUSTES_VAZIOS ou outro
-                logger.warning(
-                    f'  E invoice {invoice_id}: status atomo desconhecido='
-                    f'{status_atomo!r}, contando como falha'
-                )
-                out['invoices_falha'][invoice_id] = (
-                    f'atomo_status_desconhecido: {status_atomo}'
-                )
-                out['contadores']['falha'] += 1
+                _contabilizar_resultado_etapa_e(out, invoice_id, resultado)
 
         # Status agregado
         n_ok = out['contadores']['ok']
@@ -4759,6 +4944,92 @@ class FaturamentoPipelineExecutor:
         out['tempo_ms'] = int((time.time() - t0) * 1000)
         return out
 
+    def _executar_etapa_e_em_fila(
+        self,
+        *,
+        out: Dict[str, Any],
+        ajustes_por_invoice: Dict[int, List],
+        ciclo: str,
+        usuario: str,
+        max_workers: int,
+        max_por_company: int,
+    ) -> None:
+        """ETAPA E via ExecutorFilaParalela — preenche `out` como o loop 10.7.
+
+        Atomo Skill 7 e' idempotente (G-RECLF-3 UK + HIGH-3 'processando'
+        RETOMA): EM_EXECUCAO orfao de onda anterior e' simplesmente
+        re-executado. Invoice ja' OK no estado duravel conta como skip sem
+        nenhuma chamada ao Odoo.
+        """
+        from flask import current_app  # noqa: PLC0415
+        from app import db  # noqa: PLC0415
+        from app.odoo.estoque.orchestrators.fila_paralela import (  # noqa: PLC0415
+            RESULTADO_SKIP_JA_OK,
+            ExecutorFilaParalela,
+            ItemFila,
+        )
+        from app.odoo.estoque.scripts.escrituracao import (  # noqa: PLC0415
+            EscrituracaoLfService,
+        )
+        from app.odoo.models import AjusteEstoqueInventario  # noqa: PLC0415
+
+        status_sucesso = {'CRIADO', 'RETOMADO', 'IDEMPOTENT_PROCESSADO', 'PARCIAL'}
+
+        def processar(odoo, item):
+            ajustes_inv = (
+                AjusteEstoqueInventario.query
+                .filter(AjusteEstoqueInventario.id.in_(item.payload['ajuste_ids']))
+                .order_by(AjusteEstoqueInventario.id)
+                .all()
+            )
+            return EscrituracaoLfService(odoo=odoo).criar_recebimento_orchestrado(
+                invoice_id=item.payload['invoice_id'],
+                ajustes=ajustes_inv,
+                ciclo=ciclo,
+                usuario=usuario,
+                dry_run=False,
+            )
+
+        fila = ExecutorFilaParalela(
+            current_app._get_current_object(),
+            ciclo=ciclo,
+            etapa='E',
+            processar=processar,
+            sucesso=lambda r: r.get('status') in status_sucesso,
+            max_workers=max_workers,
+            max_por_company=max_por_company,
+            reexecutar_interrompidos=True,
+            usuario=usuario,
+        )
+        res_fila = fila.executar([
+            ItemFila(
+                chave=f'invoice:{invoice_id}',
+                company_id=ajustes_inv[0].company_id,
+                particao=f'invoice:{invoice_id}',
+                payload={
+                    'invoice_id': invoice_id,
+                    'ajuste_ids': [a.id for a in ajustes_inv],
+                },
+            )
+            for invoice_id, ajustes_inv in ajustes_por_invoice.items()
+        ])
+
+        for invoice_id in ajustes_por_invoice:
+            r = res_fila['resultados'].get(f'invoice:{invoice_id}') or {}
+            if r.get('status') == RESULTADO_SKIP_JA_OK:
+                out['invoices_skip'].append(invoice_id)
+                out['contadores']['skip'] += 1
+            elif r.get('resultado'):
+                _contabilizar_resultado_etapa_e(out, invoice_id, r['resultado'])
+            else:
+                out['invoices_falha'][invoice_id] = (
+                    f'atomo_skill7_excecao: {str(r.get("erro"))[:200]}'
+                )
+                out['contadores']['falha'] += 1
+        res_fila.pop('resultados')
+        out['fila'] = res_fila
+        db.session.expire_all()
+
     def executar_etapa_f(
         self,
         *,
@@ -5292,6 +5563,8 @@ class FaturamentoPipelineExecutor:
         pular_pre_flight: bool = False,
         usar_fluxo_l3_v19: bool = False,
         usar_skill8_atomica_v25: bool = False,
+        max_workers: int = 1,
+        max_por_company: int = FILA_MAX_POR_COMPANY_DEFAULT,
     ) -> Dict[str, Any]:
         """Entry-point publico: executa pipeline A->B->C->D->E->F como
         SEQUENCIA de barreiras (D11) com sub-skill C5 PRE-FLIGHT no inicio.
@@ -5310,6 +5583,8 @@ class FaturamentoPipelineExecutor:
             cod_produto: smoke/canary.
             limite: limita N primeiros ajustes (sub-piloto).
             pular_pre_flight: True pula sub-skill C5 (uso em pytest).
+            max_workers / max_por_company: fila paralela das ETAPAS A e E
+                (fila_paralela.py). 1 = sequencial (D13 / 10.7).
 
         Returns:
             dict consolidado com resultado de cada etapa.
@@ -5444,6 +5719,8 @@ class FaturamentoPipelineExecutor:
                         usuario=usuario,
                         cod_produto=cod_produto,
                         limite=limite,  # v16: propagar smoke/canary
+                        max_workers=max_workers,
+                        max_por_company=max_por_company,
                     )
                 elif etapa == 'B':
                     res = self.executar_etapa_b(
@@ -5511,6 +5788,8 @@ class FaturamentoPipelineExecutor:
                         usuario=usuario,
                         cod_produto=cod_produto,
                         usar_fluxo_l3_v19=usar_fluxo_l3_v19,
+                        max_workers=max_workers,
+                        max_por_company=max_por_company,
                     )
                 elif etapa == 'F':
                     # v17.5: ETAPA F real-aware (DELEGA Skill 5 atomo).
@@ -5802,6 +6081,8 @@ class FaturamentoPipelineExecutor:
         limite: Optional[int] = None,
         usar_fluxo_l3_v19: bool = False,
         usar_skill8_atomica_v25: bool = False,
+        max_workers: int = 1,
+        max_por_company: int = FILA_MAX_POR_COMPANY_DEFAULT,
     ) -> Dict[str, Any]:
         """Loop de recovery: invoca `executar_pipeline_bulk(etapas=(apenas_etapa,))`
         repetidamente ate' (a) pendentes==0 OU (b) detector_stagnation OU
@@ -5958,6 +6239,8 @@ class FaturamentoPipelineExecutor:
                     usar_fluxo_l3_v19=usar_fluxo_l3_v19,
                     # v25+ S1: propagar opt-in Skill 8 ATOMICA L2
                     usar_skill8_atomica_v25=usar_skill8_atomica_v25,
+                    max_workers=max_workers,
+                    max_por_company=max_por_company,
                 )
             except Exception as e:
                 logger.error(
@@ -6144,6 +6427,21 @@ def _build_argparser() -> argparse.ArgumentParser:
             'substitui C+D, --usar-fluxo-l3 substitui E+F).'
         ),
     )
+    p.add_argument(
+        '--max-workers', type=int, default=1,
+        help=(
+            'fila paralela das ETAPAS A e E (fila_paralela.py): N workers, '
+            '1 conexao Odoo cada, estado duravel em fila_pipeline_item. '
+            'Default 1 = sequencial (D13 / decisao 10.7).'
+        ),
+    )
+    p.add_argument(
+        '--max-por-company', type=int, default=FILA_MAX_POR_COMPANY_DEFAULT,
+        help=(
+            'teto de itens simultaneos por company na fila paralela '
+            f'(default {FILA_MAX_POR_COMPANY_DEFAULT}) — protege o Odoo.'
+        ),
+    )
     return p
 
 
@@ -6215,6 +6513,8 @@ def main(argv: Optional[List[str]] = None) -> int:
                 limite=args.limite,
                 usar_fluxo_l3_v19=args.usar_fluxo_l3_v19,
                 usar_skill8_atomica_v25=args.usar_skill8_atomica_v25,
+                max_workers=args.max_workers,
+                max_por_company=args.max_por_company,
             )
             print(json.dumps(result, indent=2, default=str))
             status = result.get('status', '')
@@ -6242,6 +6542,8 @@ def main(argv: Optional[List[str]] = None) -> int:
             pular_pre_flight=args.pular_pre_flight,
             usar_fluxo_l3_v19=args.usar_fluxo_l3_v19,
             usar_skill8_atomica_v25=args.usar_skill8_atomica_v25,
+            max_workers=args.max_workers,
+            max_por_company=args.max_por_company,
         )
         print(json.dumps(result, indent=2, default=str))
 
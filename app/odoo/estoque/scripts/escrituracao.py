@@ -57,6 +57,7 @@ from app.odoo.estoque.scripts._commit_helpers import (
     safe_session_get,
 )
 from app.odoo.utils.connection import get_odoo_connection
+from app.odoo.utils.poll_coordinator import EsperaOdoo, primeiro_m2o
 
 logger = logging.getLogger(__name__)
 
@@ -634,6 +635,7 @@ class EscrituracaoLfService:
         label: str,
         poll_timeout_s: int = POLL_TIMEOUT_PO_DEFAULT_S,
         poll_interval_s: int = POLL_INTERVAL_S,
+        espera: Optional[Any] = None,
     ) -> Any:
         """Helper SSL-resilient: dispara action longa + polling ate' resultado.
 
@@ -643,6 +645,9 @@ class EscrituracaoLfService:
           para `odoo.execute_kw` se aplicavel).
         - `poll_fn`: callable que verifica se resultado materializou
           (retorna o resultado se sim, None se ainda nao).
+        - `espera`: `EsperaOdoo` opcional — polling vai para o coordenador
+          central (app/odoo/utils/poll_coordinator.py), agrupado com as demais
+          esperas do processo; `poll_fn` fica como verificacao inicial/final.
 
         Levanta `TimeoutError` se poll_timeout_s esgota sem materializar.
         """
@@ -659,6 +664,30 @@ class EscrituracaoLfService:
                 )
                 raise
 
+        if espera is not None:
+            from app.odoo.utils.poll_coordinator import aguardar_odoo
+
+            try:
+                resultado = poll_fn()
+                if resultado is not None:
+                    return resultado
+            except Exception as e:
+                logger.warning(
+                    f'_fire_and_poll({label}) poll attempt erro '
+                    f'(continuando): {str(e)[:200]}'
+                )
+            resultado = aguardar_odoo(
+                espera, timeout_s=poll_timeout_s, intervalo_s=poll_interval_s,
+                poll_fn=poll_fn,
+                connection=self.odoo,
+            )
+            if resultado is not None:
+                return resultado
+            raise TimeoutError(
+                f'_fire_and_poll({label}): poll_timeout_s={poll_timeout_s} '
+                f'esgotado sem materializar resultado'
+            )
+
         # Poll loop
         elapsed = 0
         while elapsed < poll_timeout_s:
@@ -1253,6 +1282,13 @@ class EscrituracaoLfService:
                 poll_fn=poll_processar,
                 label='processar_dfe',
                 poll_timeout_s=POLL_TIMEOUT_DFE_PROC_DEFAULT_S,
+                espera=EsperaOdoo(
+                    'l10n_br_ciel_it_account.dfe',
+                    [['id', '=', dfe_id], ['l10n_br_status', 'in', ['03', '04', '05']]],
+                    fields=['l10n_br_status', 'l10n_br_situacao_dfe'],
+                    predicado=lambda regs: regs[0] if regs else None,
+                    rotulo=f'processar_dfe {dfe_id}',
+                ),
             )
         except TimeoutError as e:
             out['status'] = 'FALHA'
@@ -1803,6 +1839,13 @@ class EscrituracaoLfService:
                 poll_fn=poll_gerar_po,
                 label='gerar_po',
                 poll_timeout_s=poll_timeout_s,
+                espera=EsperaOdoo(
+                    'l10n_br_ciel_it_account.dfe',
+                    [['id', '=', dfe_id], ['purchase_id', '!=', False]],
+                    fields=['purchase_id'],
+                    predicado=primeiro_m2o('purchase_id'),
+                    rotulo=f'gerar_po DFe {dfe_id}',
+                ),
             )
         except TimeoutError as e:
             out['status'] = 'TIMEOUT'
@@ -2263,6 +2306,13 @@ class EscrituracaoLfService:
                 poll_fn=poll_criar,
                 label='criar_invoice',
                 poll_timeout_s=poll_timeout_s,
+                espera=EsperaOdoo(
+                    'purchase.order',
+                    [['id', '=', po_id], ['invoice_ids', '!=', False]],
+                    fields=['invoice_ids'],
+                    predicado=lambda regs: regs[0]['invoice_ids'][-1] if regs else None,
+                    rotulo=f'criar_invoice PO {po_id}',
+                ),
             )
         except TimeoutError as e:
             out['status'] = 'TIMEOUT'
@@ -722,8 +722,7 @@ class StockPickingService:
         picking_name = picking[0]['name']
         company_id = picking[0]['company_id'][0]
 
-        start = time.time()
-        while time.time() - start < timeout:
+        def _buscar_invoice() -> Optional[int]:
             # Metodo 1: ref = picking_name (padrao robo CIEL IT atual)
             invoices = self.odoo.search_read(
                 'account.move',
@@ -759,8 +758,47 @@ class StockPickingService:
                     f'encontrada via invoice_origin → id={invoices[0]["id"]}'
                 )
                 return invoices[0]['id']
+            return None
 
-            time.sleep(poll_interval)
+        def _preferir_ref(registros: List[Dict]) -> Optional[int]:
+            # Mesma prioridade dos metodos acima: ref exato antes de invoice_origin
+            for registro in registros:
+                if registro.get('ref') == picking_name:
+                    return registro['id']
+            return registros[0]['id'] if registros else None
+
+        invoice_id = _buscar_invoice()
+        if invoice_id:
+            return invoice_id
+
+        # Polls agrupados com outras esperas no coordenador central
+        from app.odoo.utils.poll_coordinator import EsperaOdoo, aguardar_odoo
+
+        invoice_id = aguardar_odoo(
+            EsperaOdoo(
+                'account.move',
+                [
+                    ['company_id', '=', company_id],
+                    ['state', '!=', 'cancel'],
+                    '|',
+                    ['ref', '=', picking_name],
+                    ['invoice_origin', 'ilike', picking_name],
+                ],
+                fields=['id', 'ref'],
+                predicado=_preferir_ref,
+                rotulo=f'invoice robo {picking_name}',
+            ),
+            timeout_s=timeout,
+            intervalo_s=poll_interval,
+            poll_fn=_buscar_invoice,
+            connection=self.odoo,
+        )
+        if invoice_id:
+            logger.info(
+                f'Picking {picking_id} ({picking_name}): invoice '
+                f'encontrada via polling → id={invoice_id}'
+            )
+            return invoice_id
 
         logger.warning(
             f'Picking {picking_id} ({picking_name}): timeout {timeout}s '
@@ -5,3 +5,7 @@ from .ajuste_estoque_inventario import (  # noqa: F401
     STATUS_VALIDOS,
     ACOES_VALIDAS,
 )
+from .fila_pipeline_item import (  # noqa: F401
+    FilaPipelineItem,
+    STATUS_FILA_VALIDOS,
+)
@@ -0,0 +1,61 @@
+"""Model FilaPipelineItem — estado duravel dos itens da fila paralela do pipeline.
+
+1 linha por (ciclo, etapa, chave). A chave identifica a unidade de trabalho
+da etapa (`ajuste:<id>` na ETAPA A, `invoice:<id>` na ETAPA E). A fila em
+`app/odoo/estoque/orchestrators/fila_paralela.py` grava EM_EXECUCAO antes de
+chamar o Odoo e OK/FALHA depois — onda que cai no meio retoma pulando os OK
+e tratando os EM_EXECUCAO orfaos conforme a idempotencia da etapa.
+
+Migration: scripts/migrations/2026_10_19_fila_pipeline_item.{py,sql}.
+"""
+from app import db
+from app.utils.timezone import agora_utc_naive
+
+
+STATUS_FILA_PENDENTE = 'PENDENTE'
+STATUS_FILA_EM_EXECUCAO = 'EM_EXECUCAO'
+STATUS_FILA_OK = 'OK'
+STATUS_FILA_FALHA = 'FALHA'
+# EM_EXECUCAO encontrado no inicio de uma onda em etapa NAO idempotente
+# (ETAPA A): o Odoo pode ter aplicado a operacao. Operador confere e volta
+# para PENDENTE manualmente.
+STATUS_FILA_INTERROMPIDO = 'INTERROMPIDO'
+
+STATUS_FILA_VALIDOS = {
+    STATUS_FILA_PENDENTE,
+    STATUS_FILA_EM_EXECUCAO,
+    STATUS_FILA_OK,
+    STATUS_FILA_FALHA,
+    STATUS_FILA_INTERROMPIDO,
+}
+
+
+class FilaPipelineItem(db.Model):
+    __tablename__ = 'fila_pipeline_item'
+    __table_args__ = (
+        db.UniqueConstraint('ciclo', 'etapa', 'chave', name='uq_fila_pipeline_item_chave'),
+        db.Index('ix_fila_pipeline_item_etapa_status', 'ciclo', 'etapa', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    ciclo = db.Column(db.String(40), nullable=False)
+    etapa = db.Column(db.String(1), nullable=False)
+    chave = db.Column(db.String(60), nullable=False)
+    company_id = db.Column(db.Integer, nullable=False)
+    particao = db.Column(db.String(60), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_FILA_PENDENTE)
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(40))
+    resultado_json = db.Column(db.JSON)
+    erro_msg = db.Column(db.Text)
+    tempo_ms = db.Column(db.Integer)
+    iniciado_em = db.Column(db.DateTime)
+    concluido_em = db.Column(db.DateTime)
+    criado_em = db.Column(db.DateTime, nullable=False, default=agora_utc_naive)
+    criado_por = db.Column(db.String(80), nullable=False)
+
+    def __repr__(self):
+        return (
+            f'<FilaPipelineItem {self.ciclo}/{self.etapa} {self.chave} '
+            f'company={self.company_id} status={self.status}>'
+        )
@@ -1074,19 +1074,21 @@ class FaturamentoService:
             # ROLLBACK O4 (2026-04-14): async via RQ causou duplicacao de EntregaMonitorada
             # (2 workers RQ paralelos na fila 'default' pegavam o mesmo lote e inseriam
             # concorrentemente sem UniqueConstraint em numero_nf).
-            # Voltamos ao loop sincrono ate aplicar fix com UNIQUE + ON CONFLICT.
+            # Sincronizador em lote: poucas queries IN + advisory lock por lote (sem duplicacao).
             try:
-                from app.utils.sincronizar_entregas import sincronizar_entrega_por_nf
+                from app.utils.sincronizar_entregas_lote import sincronizar_entregas_em_lote
 
                 nfs_para_sincronizar = list(set(nfs_novas + nfs_atualizadas))
                 logger.info(f"🔄 Sincronizando entregas para {len(nfs_para_sincronizar)} NFs...")
 
-                for numero_nf in nfs_para_sincronizar:
-                    try:
-                        sincronizar_entrega_por_nf(numero_nf)
-                        stats_sincronizacao['entregas_sincronizadas'] += 1
-                    except Exception as e:
-                        stats_sincronizacao['erros_sincronizacao'].append(f"Entrega NF {numero_nf}: {e}")
+                resultado_entregas = sincronizar_entregas_em_lote(nfs_para_sincronizar)
+                stats_sincronizacao['entregas_sincronizadas'] = (
+                    resultado_entregas['criadas'] + resultado_entregas['atualizadas']
+                    + resultado_entregas['removidas'] + resultado_entregas['nf_a_nf']
+                )
+                stats_sincronizacao['erros_sincronizacao'].extend(
+                    f"Entrega {erro}" for erro in resultado_entregas['erros']
+                )
 
             except ImportError as e:
                 stats_sincronizacao['erros_sincronizacao'].append(f"Módulo entregas não disponível: {e}")
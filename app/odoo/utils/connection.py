@@ -319,6 +319,7 @@ class OdooConnection:
         # Hook registra TODA chamada XML-RPC write em operacao_odoo_auditoria,
         # quando AGENT_ODOO_AUDIT_HOOK=true E method na whitelist. NUNCA quebra Odoo.
         # Ver app/utils/odoo_audit_helpers.py + CLAUDE.md P8.
+        # Gravacao assincrona em lote (odoo_audit_writer) — sem savepoint por RPC.
         inicio_audit = time.perf_counter()
         erro_audit: Optional[BaseException] = None
         resultado_audit: Any = None
@@ -330,9 +331,9 @@ class OdooConnection:
             raise
         finally:
             try:
-                from app.utils.odoo_audit_helpers import registrar_chamada_odoo
+                from app.utils.odoo_audit_helpers import enfileirar_chamada_odoo
                 tempo_ms = int((time.perf_counter() - inicio_audit) * 1000)
-                registrar_chamada_odoo(
+                enfileirar_chamada_odoo(
                     model=model, method=method, args=args,
                     kwargs=kwargs or {},
                     resultado=resultado_audit, tempo_ms=tempo_ms,
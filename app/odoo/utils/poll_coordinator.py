@@ -0,0 +1,582 @@
+"""
+Coordenador central de Fire-and-Poll do Odoo
+============================================
+
+Acoes longas do Odoo (action_gerar_po_dfe, robo CIEL IT criando invoice,
+processamento de DFe...) sao disparadas com timeout curto e depois
+"polladas" ate o resultado aparecer. Antes, cada chamador fazia seu proprio
+loop `time.sleep(poll_interval)` + 1 search_read por registro.
+
+Aqui o chamador REGISTRA uma espera (model, domain, predicado) e recebe um
+Future. Uma unica thread (poller) por processo:
+
+- agrupa as esperas vencidas por model e faz UM search_read por model por
+  tick (dominios combinados com '|'), separando os registros de cada espera
+  em memoria (avaliar_dominio);
+- dominios que nao da para avaliar em memoria (campo com '.', operador
+  exotico) sao pollados isoladamente no mesmo tick;
+- intervalo adaptativo por espera: comeca curto e cresce (x FATOR ate
+  INTERVALO_MAX_S) enquanto o resultado nao aparece;
+- resolve Future/callback com o retorno do predicado ou TimeoutError.
+
+USO:
+    from app.odoo.utils.poll_coordinator import EsperaOdoo, aguardar_odoo
+
+    espera = EsperaOdoo(
+        'l10n_br_ciel_it_account.dfe',
+        [['id', '=', dfe_id], ['purchase_id', '!=', False]],
+        fields=['purchase_id'],
+        predicado=primeiro_m2o('purchase_id'),
+    )
+    po_id = aguardar_odoo(espera, timeout_s=600, poll_fn=lambda: buscar_po(dfe_id))
+
+ODOO_POLL_COORDENADOR=false volta ao loop sleep + poll_fn do chamador.
+
+LIMITACAO: aguardar_odoo() continua BLOQUEANDO a thread do chamador (worker
+RQ ou request) em wait() ate o coordenador resolver — o que e compartilhado
+e so o polling (1 search_read por model por tick em vez de 1 por espera), nao
+a thread. Os chamadores atuais (recebimento LF, picking, escrituracao,
+lancamento de frete) aguardam no meio de fluxos sequenciais de varias etapas
+e ainda nao foram reescritos em continuacoes. Quem puder seguir sem a thread
+usa direto o Future/callback:
+
+    obter_coordenador().aguardar(espera, timeout_s, callback=ao_resolver)
+    # callback(resultado, erro) roda na thread do poller: so enfileirar o
+    # proximo job RQ, sem banco/app context ali
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('ODOO_POLL_COORDENADOR', 'true').lower() == 'true'
+INTERVALO_MIN_S = float(os.environ.get('ODOO_POLL_INTERVALO_MIN_S', '3'))
+INTERVALO_MAX_S = float(os.environ.get('ODOO_POLL_INTERVALO_MAX_S', '40'))
+FATOR_BACKOFF = 1.5
+
+# Quantas esperas entram no mesmo search_read (tamanho do OR)
+MAX_ESPERAS_POR_CONSULTA = 80
+
+
+class DominioNaoSuportado(ValueError):
+    """Dominio nao avaliavel em memoria — a espera e pollada isoladamente."""
+
+
+@dataclass
+class EsperaOdoo:
+    """
+    O que aguardar: registros de `model` que casam com `domain`.
+
+    predicado(registros) -> resultado ou None (continua aguardando).
+    Sem predicado, o resultado e o id do primeiro registro encontrado.
+    """
+    model: str
+    domain: list
+    fields: List[str] = field(default_factory=lambda: ['id'])
+    predicado: Optional[Callable[[List[Dict]], Any]] = None
+    rotulo: str = ''
+
+
+def primeiro_m2o(campo: str) -> Callable[[List[Dict]], Optional[int]]:
+    """Predicado: id do many2one `campo` do primeiro registro que o tiver."""
+    def _predicado(registros):
+        for registro in registros:
+            valor = registro.get(campo)
+            if valor:
+                return valor[0] if isinstance(valor, (list, tuple)) else valor
+        return None
+    return _predicado
+
+
+# =============================================================================
+# DOMINIOS (notacao prefixa do Odoo)
+# =============================================================================
+
+_OPERADORES_LOGICOS = ('&', '|', '!')
+
+
+def _normalizar(dominio: list) -> list:
+    """Explicita os '&' implicitos (equivalente ao expression.normalize_domain do Odoo)."""
+    if not dominio:
+        return []
+    resultado = []
+    esperados = 1
+    for termo in dominio:
+        if esperados == 0:
+            resultado.insert(0, '&')
+            esperados = 1
+        if isinstance(termo, (list, tuple)):
+            esperados -= 1
+        elif termo in ('&', '|'):
+            esperados += 1
+        elif termo == '!':
+            pass
+        else:
+            raise DominioNaoSuportado(f'Termo invalido no dominio: {termo!r}')
+        resultado.append(termo)
+    return resultado
+
+
+def combinar_dominios_or(dominios: List[list]) -> list:
+    """['|', '|', d1, d2, d3] com cada dominio normalizado."""
+    normalizados = [_normalizar(d) for d in dominios if d]
+    if not normalizados:
+        return []
+    combinado = ['|'] * (len(normalizados) - 1)
+    for dominio in normalizados:
+        combinado.extend(dominio)
+    return combinado
+
+
+def _eh_m2o(valor) -> bool:
+    return (
+        isinstance(valor, (list, tuple)) and len(valor) == 2
+        and isinstance(valor[0], int) and isinstance(valor[1], str)
+    )
+
+
+def _valor_comparavel(valor):
+    """many2one [id, nome] -> id."""
+    if _eh_m2o(valor):
+        return valor[0]
+    return valor
+
+
+def _nome_texto(valor) -> str:
+    if _eh_m2o(valor):
+        return valor[1]
+    return '' if valor in (None, False) else str(valor)
+
+
+def _avaliar_folha(folha, registro: Dict) -> bool:
+    if len(folha) != 3:
+        raise DominioNaoSuportado(f'Folha invalida: {folha!r}')
+    campo, operador, esperado = folha
+    if '.' in campo or campo not in registro:
+        raise DominioNaoSuportado(f'Campo nao avaliavel em memoria: {campo}')
+    bruto = registro.get(campo)
+    valor = _valor_comparavel(bruto)
+
+    if operador in ('=', '=='):
+        if esperado is False:
+            return not valor
+        return valor == esperado
+    if operador in ('!=', '<>'):
+        if esperado is False:
+            return bool(valor)
+        return valor != esperado
+    if operador in ('in', 'not in'):
+        # x2many: casa se qualquer id estiver na lista
+        valores = bruto if isinstance(bruto, list) and not _eh_m2o(bruto) else [valor]
+        contido = any(v in esperado for v in valores)
+        return contido if operador == 'in' else not contido
+    if operador in ('ilike', 'not ilike', 'like', 'not like', '=ilike', '=like'):
+        texto = _nome_texto(bruto)
+        alvo = str(esperado)
+        if operador in ('ilike', 'not ilike', '=ilike'):
+            texto, alvo = texto.lower(), alvo.lower()
+        if operador.startswith('='):
+            return texto == alvo
+        contido = alvo in texto
+        return not contido if operador.startswith('not') else contido
+    if operador in ('<', '<=', '>', '>='):
+        if valor in (None, False):
+            return False
+        return {
+            '<': valor < esperado, '<=': valor <= esperado,
+            '>': valor > esperado, '>=': valor >= esperado,
+        }[operador]
+    raise DominioNaoSuportado(f'Operador nao suportado em memoria: {operador}')
+
+
+def avaliar_dominio(dominio: list, registro: Dict) -> bool:
+    """Avalia um dominio Odoo contra um registro lido (search_read)."""
+    normalizado = _normalizar(dominio)
+    if not normalizado:
+        return True
+
+    def _avaliar(pos):
+        termo = normalizado[pos]
+        if termo == '!':
+            valor, prox = _avaliar(pos + 1)
+            return not valor, prox
+        if termo in ('&', '|'):
+            esquerda, prox = _avaliar(pos + 1)
+            direita, prox = _avaliar(prox)
+            return (esquerda and direita) if termo == '&' else (esquerda or direita), prox
+        return _avaliar_folha(termo, registro), pos + 1
+
+    resultado, _ = _avaliar(0)
+    return resultado
+
+
+def _campos_do_dominio(dominio: list) -> set:
+    return {
+        termo[0] for termo in dominio
+        if isinstance(termo, (list, tuple)) and len(termo) == 3 and isinstance(termo[0], str)
+    }
+
+
+# =============================================================================
+# COORDENADOR
+# =============================================================================
+
+class _EsperaPendente:
+    __slots__ = ('espera', 'future', 'callback', 'prazo', 'intervalo', 'intervalo_max',
+                 'proximo_poll', 'polls', 'registrado_em')
+
+    def __init__(self, espera, future, callback, prazo, intervalo, intervalo_max, agora):
+        self.espera = espera
+        self.future = future
+        self.callback = callback
+        self.prazo = prazo
+        self.intervalo = intervalo
+        self.intervalo_max = intervalo_max
+        self.proximo_poll = agora + intervalo
+        self.polls = 0
+        self.registrado_em = agora
+
+
+class CoordenadorPollingOdoo:
+    """
+    Poller unico: agrupa todas as esperas pendentes em search_reads por model.
+
+    Thread-safe para registrar esperas de qualquer thread; so a thread do
+    poller usa a conexao Odoo (criada por connection_factory).
+    """
+
+    def __init__(
+        self,
+        connection_factory: Optional[Callable[[], Any]] = None,
+        intervalo_min_s: float = INTERVALO_MIN_S,
+        intervalo_max_s: float = INTERVALO_MAX_S,
+        fator: float = FATOR_BACKOFF,
+        iniciar_thread: bool = True,
+    ):
+        self._connection_factory = connection_factory or self._conexao_padrao
+        self._connection = None
+        self.intervalo_min_s = intervalo_min_s
+        self.intervalo_max_s = intervalo_max_s
+        self.fator = fator
+        self._iniciar_thread = iniciar_thread
+        self._pendentes: List[_EsperaPendente] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._parar = False
+        self.consultas = 0
+
+    @staticmethod
+    def _conexao_padrao():
+        from app.odoo.utils.connection import get_odoo_connection
+        conn = get_odoo_connection()
+        if not conn.authenticate():
+            raise Exception("Falha na autenticacao com Odoo (poll coordinator)")
+        return conn
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def aguardar(
+        self,
+        espera: EsperaOdoo,
+        timeout_s: float,
+        intervalo_inicial_s: Optional[float] = None,
+        callback: Optional[Callable[[Any, Optional[BaseException]], None]] = None,
+    ) -> Future:
+        """Registra a espera e retorna um Future (resultado ou TimeoutError)."""
+        future: Future = Future()
+        agora = time.monotonic()
+        intervalo = intervalo_inicial_s or self.intervalo_min_s
+        pendente = _EsperaPendente(
+            espera, future, callback, agora + timeout_s,
+            intervalo, max(self.intervalo_max_s, intervalo), agora,
+        )
+        with self._cond:
+            self._pendentes.append(pendente)
+            self._garantir_thread()
+            self._cond.notify()
+        return future
+
+    def pendentes(self) -> int:
+        with self._cond:
+            return len(self._pendentes)
+
+    def parar(self) -> None:
+        with self._cond:
+            self._parar = True
+            self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Poller
+    # ------------------------------------------------------------------
+
+    def _garantir_thread(self) -> None:
+        if not self._iniciar_thread or (self._thread and self._thread.is_alive()):
+            return
+        self._parar = False
+        self._thread = threading.Thread(target=self._loop, name='odoo-poll-coordinator', daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                if self._parar:
+                    return
+                if not self._pendentes:
+                    self._cond.wait(timeout=60)
+                    continue
+                proximo = min(min(p.proximo_poll, p.prazo) for p in self._pendentes)
+                espera_s = proximo - time.monotonic()
+                if espera_s > 0:
+                    self._cond.wait(timeout=espera_s)
+                    continue
+            try:
+                self.executar_tick()
+            except Exception as e:
+                logger.error(f"[POLL COORDENADOR] Erro no tick: {e}")
+                time.sleep(1)
+
+    def executar_tick(self, agora: Optional[float] = None) -> int:
+        """
+        Polla as esperas vencidas. Retorna o numero de search_read feitos.
+
+        Publico para testes/uso sincrono; a thread do poller chama em loop.
+        """
+        agora = time.monotonic() if agora is None else agora
+        with self._cond:
+            expiradas = [p for p in self._pendentes if p.prazo <= agora]
+            vencidas = [p for p in self._pendentes if p.prazo > agora and p.proximo_poll <= agora]
+
+        for pendente in expiradas:
+            self._resolver(pendente, erro=TimeoutError(
+                f"Espera Odoo expirada apos {pendente.polls} polls: "
+                f"{pendente.espera.rotulo or pendente.espera.model}"
+            ))
+
+        por_model: Dict[str, List[_EsperaPendente]] = {}
+        for pendente in vencidas:
+            por_model.setdefault(pendente.espera.model, []).append(pendente)
+
+        consultas = 0
+        for model, pendentes in por_model.items():
+            combinaveis, isoladas = [], []
+            for pendente in pendentes:
+                try:
+                    _normalizar(pendente.espera.domain)
+                    combinaveis.append(pendente)
+                except DominioNaoSuportado:
+                    isoladas.append(pendente)
+
+            for i in range(0, len(combinaveis), MAX_ESPERAS_POR_CONSULTA):
+                grupo = combinaveis[i:i + MAX_ESPERAS_POR_CONSULTA]
+                consultas += self._consultar_grupo(model, grupo, agora, isoladas)
+
+            for pendente in isoladas:
+                consultas += 1
+                registros = self._search_read(model, pendente.espera.domain, pendente.espera.fields)
+                if registros is None:
+                    self._reagendar(pendente, agora)
+                else:
+                    self._avaliar(pendente, registros, agora)
+
+        self.consultas += consultas
+        return consultas
+
+    def _consultar_grupo(self, model, grupo, agora, isoladas) -> int:
+        campos = {'id'}
+        for pendente in grupo:
+            campos.update(pendente.espera.fields)
+            campos.update(_campos_do_dominio(pendente.espera.domain))
+        dominio = combinar_dominios_or([p.espera.domain for p in grupo])
+        registros = self._search_read(model, dominio, sorted(campos))
+        if registros is None:
+            for pendente in grupo:
+                self._reagendar(pendente, agora)
+            return 1
+
+        for pendente in grupo:
+            try:
+                casados = [r for r in registros if avaliar_dominio(pendente.espera.domain, r)]
+            except DominioNaoSuportado:
+                isoladas.append(pendente)
+                continue
+            self._avaliar(pendente, casados, agora)
+        return 1
+
+    def _search_read(self, model, dominio, campos) -> Optional[List[Dict]]:
+        try:
+            if self._connection is None:
+                self._connection = self._connection_factory()
+            return self._connection.search_read(model, dominio, fields=list(campos))
+        except Exception as e:
+            logger.warning(f"[POLL COORDENADOR] search_read {model} falhou (reconecta no proximo tick): {e}")
+            self._connection = None
+            return None
+
+    def _avaliar(self, pendente: _EsperaPendente, registros: List[Dict], agora: float) -> None:
+        pendente.polls += 1
+        try:
+            if pendente.espera.predicado:
+                resultado = pendente.espera.predicado(registros)
+            else:
+                resultado = registros[0]['id'] if registros else None
+        except Exception as e:
+            self._resolver(pendente, erro=e)
+            return
+        if resultado is None or resultado is False:
+            self._reagendar(pendente, agora)
+        else:
+            logger.info(
+                f"[POLL COORDENADOR] {pendente.espera.rotulo or pendente.espera.model}: resolvido "
+                f"apos {pendente.polls} polls ({agora - pendente.registrado_em:.0f}s)"
+            )
+            self._resolver(pendente, resultado=resultado)
+
+    def _reagendar(self, pendente: _EsperaPendente, agora: float) -> None:
+        pendente.intervalo = min(pendente.intervalo * self.fator, pendente.intervalo_max)
+        pendente.proximo_poll = agora + pendente.intervalo
+
+    def _resolver(self, pendente: _EsperaPendente, resultado=None, erro: Optional[BaseException] = None) -> None:
+        with self._cond:
+            if pendente in self._pendentes:
+                self._pendentes.remove(pendente)
+        if pendente.future.done():
+            return
+        if erro is not None:
+            pendente.future.set_exception(erro)
+        else:
+            pendente.future.set_result(resultado)
+        if pendente.callback:
+            try:
+                pendente.callback(resultado, erro)
+            except Exception as e:
+                logger.warning(f"[POLL COORDENADOR] Callback falhou: {e}")
+
+
+# =============================================================================
+# SINGLETON + HELPER BLOQUEANTE
+# =============================================================================
+
+_coordenador: Optional[CoordenadorPollingOdoo] = None
+_coordenador_lock = threading.Lock()
+
+
+def obter_coordenador() -> CoordenadorPollingOdoo:
+    """Coordenador do processo (criado sob demanda)."""
+    global _coordenador
+    if _coordenador is None:
+        with _coordenador_lock:
+            if _coordenador is None:
+                _coordenador = CoordenadorPollingOdoo()
+    return _coordenador
+
+
+def _reset_apos_fork():
+    # Thread do poller nao sobrevive ao fork (worker RQ) — recria no filho
+    global _coordenador, _coordenador_lock
+    _coordenador = None
+    _coordenador_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_apos_fork)
+
+
+def _usa_odoo_padrao(connection) -> bool:
+    """
+    So agrupa no coordenador esperas de quem fala com o Odoo padrao
+    (ODOO_CONFIG). Conexao de outro ambiente ou injetada (mock) fica no
+    loop do proprio chamador — o poller nao enxergaria o mesmo estado.
+    """
+    if connection is None:
+        return True
+    from app.odoo.utils.connection import OdooConnection
+    if type(connection) is not OdooConnection:
+        return False
+    from app.odoo.config.odoo_config import ODOO_CONFIG
+    return (
+        connection.url == ODOO_CONFIG.get('url')
+        and connection.database == ODOO_CONFIG.get('database')
+        and connection.username == ODOO_CONFIG.get('username')
+    )
+
+
+def aguardar_odoo(
+    espera: EsperaOdoo,
+    timeout_s: float,
+    intervalo_s: Optional[float] = None,
+    poll_fn: Optional[Callable[[], Any]] = None,
+    ao_aguardar: Optional[Callable[[float], None]] = None,
+    connection: Any = None,
+) -> Any:
+    """
+    Bloqueia ate a espera resolver ou timeout_s esgotar (retorna None).
+
+    A thread do chamador fica parada em wait() durante toda a espera (ver
+    LIMITACAO no topo do modulo); so o polling e agrupado no coordenador.
+
+    Args:
+        espera: o que aguardar (model/domain/predicado)
+        timeout_s: tempo maximo de espera
+        intervalo_s: intervalo inicial de poll (cresce ate INTERVALO_MAX_S)
+        poll_fn: verificacao completa do chamador — usada no modo legado
+            (ODOO_POLL_COORDENADOR=false) e uma ultima vez apos o timeout
+            (cobre caminhos de fallback que o dominio nao expressa)
+        ao_aguardar: chamado a cada ~intervalo com os segundos decorridos
+            (ex: atualizar progresso no Redis)
+        connection: conexao do chamador — se nao for a do Odoo padrao, usa o
+            loop legado com poll_fn
+    """
+    intervalo = intervalo_s or INTERVALO_MIN_S
+    inicio = time.monotonic()
+
+    if not ENABLED or not _usa_odoo_padrao(connection):
+        while time.monotonic() - inicio < timeout_s:
+            time.sleep(intervalo)
+            if ao_aguardar:
+                ao_aguardar(time.monotonic() - inicio)
+            try:
+                resultado = poll_fn() if poll_fn else None
+            except Exception as e:
+                logger.warning(f"[POLL] {espera.rotulo or espera.model}: poll falhou (continuando): {e}")
+                continue
+            if resultado is not None and resultado is not False:
+                return resultado
+        return None
+
+    future = obter_coordenador().aguardar(espera, timeout_s, intervalo_inicial_s=intervalo_s)
+    # Nao distinguir por tipo de excecao: no Python 3.11+
+    # concurrent.futures.TimeoutError IS TimeoutError, entao "espera do
+    # result() venceu" e "coordenador expirou a espera" so se separam por
+    # future.done(). Prazo extra cobre poller morto (future nunca resolvido).
+    prazo_final = inicio + timeout_s + max(intervalo, INTERVALO_MAX_S)
+    while not future.done():
+        wait([future], timeout=intervalo)
+        if future.done():
+            break
+        if time.monotonic() >= prazo_final:
+            logger.warning(f"[POLL] {espera.rotulo or espera.model}: coordenador nao respondeu no prazo")
+            break
+        if ao_aguardar:
+            ao_aguardar(time.monotonic() - inicio)
+
+    if future.done():
+        erro = future.exception()
+        if erro is None:
+            return future.result()
+        if not isinstance(erro, TimeoutError):
+            raise erro
+
+    if poll_fn:
+        try:
+            return poll_fn()
+        except Exception as e:
+            logger.warning(f"[POLL] {espera.rotulo or espera.model}: poll final falhou: {e}")
+    return None
@@ -24,7 +24,6 @@ Fluxo de conversão:
 import re
 from typing import Dict, List, Any, Optional, Tuple
 from decimal import Decimal
-import pdfplumber
 from .base import PDFExtractor
 from app import db
 
@@ -44,15 +43,19 @@ class AssaiExtractor(PDFExtractor):
         Extrai dados do PDF do Assaí/Sendas
         Retorna lista de dicionários com os dados extraídos, um por item/filial
 
-        Nota: texto_pre_extraido e ignorado — Assai usa pdfplumber.open()
-        diretamente para acessar pdf.pages (tabelas, nao apenas texto).
+        Nota: texto_pre_extraido e ignorado — Assai precisa do texto POR
+        PAGINA (cabecalho na primeira). O documento vem do cache de
+        app.utils.pdf_extracao, ja extraido pelo identificador.
         """
         all_data = []
 
         try:
-            with pdfplumber.open(pdf_path) as pdf:
+            from app.utils.pdf_extracao import documento_pdf
+
+            textos_paginas = documento_pdf(pdf_path=pdf_path).textos_paginas()
+            if textos_paginas:
                 # Phase 1: Coleta identificadores (text parsing only, sem DB)
-                codigos, numeros_loja = self._coletar_identificadores(pdf)
+                codigos, numeros_loja = self._coletar_identificadores(textos_paginas)
 
                 # Phase 2: Batch preload de DB (~3 queries em vez de centenas)
                 self._preload_filiais()
@@ -69,8 +72,8 @@ class AssaiExtractor(PDFExtractor):
                 # db.session.close() causa DetachedInstanceError em objetos carregados.
 
                 # Phase 3: Extrai header + produtos (usa caches, sem mais queries DB)
-                header_info = self._extract_header(pdf.pages[0])
-                produtos_por_loja = self._extract_all_products(pdf)
+                header_info = self._extract_header(textos_paginas[0])
+                produtos_por_loja = self._extract_all_products(textos_paginas)
 
                 # Combina header com produtos
                 for item in produtos_por_loja:
@@ -82,6 +85,8 @@ class AssaiExtractor(PDFExtractor):
                             f"Item inválido: {item.get('codigo', 'sem código')} - "
                             f"Loja: {item.get('numero_loja', 'sem loja')}"
                         )
+            else:
+                self.errors.append("PDF sem paginas")
 
         except Exception as e:
             import traceback
@@ -90,12 +95,11 @@ class AssaiExtractor(PDFExtractor):
 
         return all_data
 
-    def _extract_header(self, page) -> Dict[str, Any]:
+    def _extract_header(self, text: str) -> Dict[str, Any]:
         """
-        Extrai informações do cabeçalho da primeira página
+        Extrai informações do cabeçalho da primeira página (texto da página)
         """
         header = {}
-        text = page.extract_text() or ""
 
         # Número do Pedido - "Pedido:21046597" ou "Pedido: 21046597"
         pedido_match = re.search(r'Pedido:?\s*(\d+)', text)
@@ -135,7 +139,7 @@ class AssaiExtractor(PDFExtractor):
 
         return header
 
-    def _coletar_identificadores(self, pdf):
+    def _coletar_identificadores(self, textos_paginas: List[str]):
         """
         Primeira passada leve: coleta códigos de produto e números de loja
         de todas as páginas usando os mesmos parsers de texto (sem DB).
@@ -144,8 +148,7 @@ class AssaiExtractor(PDFExtractor):
         codigos = set()
         numeros_loja = set()
 
-        for page in pdf.pages:
-            text = page.extract_text() or ""
+        for text in textos_paginas:
             for line in text.split('\n'):
                 line = line.strip()
                 if not line:
@@ -250,7 +253,7 @@ class AssaiExtractor(PDFExtractor):
             db.session.rollback()
             self.warnings.append(f"Erro ao precarregar produtos: {e}")
 
-    def _extract_all_products(self, pdf) -> List[Dict[str, Any]]:
+    def _extract_all_products(self, textos_paginas: List[str]) -> List[Dict[str, Any]]:
         """
         Extrai todos os produtos e suas linhas de lojas de todas as páginas
         """
@@ -258,8 +261,7 @@ class AssaiExtractor(PDFExtractor):
         current_product = None
         current_product_desc = None
 
-        for page in pdf.pages:
-            text = page.extract_text() or ""
+        for text in textos_paginas:
             lines = text.split('\n')
 
             for line in lines:
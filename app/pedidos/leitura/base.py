@@ -6,8 +6,6 @@ import re
 from abc import ABC, abstractmethod
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-import pypdf  # Mudado de PyPDF2 para pypdf
-import pdfplumber
 from decimal import Decimal
 
 
@@ -117,38 +115,33 @@ class PDFExtractor(ABC):
         Se texto_pre_extraido for fornecido (ja extraido pelo identificador),
         retorna diretamente sem reabrir o PDF — elimina duplo-open.
 
-        Processa página a página com flush_cache() para liberar memória
-        de cada página após extração, evitando pico de RAM em PDFs grandes.
+        Sem texto pre-extraido, usa o documento compartilhado de
+        app.utils.pdf_extracao (texto memoizado por hash do conteudo; o
+        layout de cada pagina e liberado apos a extracao).
         """
         if texto_pre_extraido:
             return texto_pre_extraido
 
-        chunks = []
+        from app.utils.pdf_extracao import documento_pdf
+
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for i, page in enumerate(pdf.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        chunks.append(page_text)
-                    page.flush_cache()
-                    # GC periódico a cada 20 páginas para PDFs grandes
-                    if i > 0 and i % 20 == 0:
-                        import gc
-                        gc.collect()
+            doc = documento_pdf(pdf_path=pdf_path)
+            if doc is None:
+                return ""
+            return "\n".join(t for t in doc.textos_paginas() if t)
         except Exception as e:
             self.errors.append(f"Erro ao extrair com pdfplumber: {e}")
-        return "\n".join(chunks)
-    
+        return ""
+
     def extract_text_with_pypdf2(self, pdf_path: str) -> str:
         """Extrai texto usando pypdf (backup)"""
+        from app.utils.pdf_extracao import documento_pdf
+
         text = ""
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = pypdf.PdfReader(file)
-                for page in reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
+            doc = documento_pdf(pdf_path=pdf_path)
+            if doc is not None:
+                text = "".join(t + "\n" for t in doc.textos_pypdf() if t)
         except Exception as e:
             self.errors.append(f"Erro ao extrair com pypdf: {e}")
         return text
\ No newline at end of file
@@ -11,7 +11,6 @@ Utiliza os prefixos de CNPJ definidos em app/portal/utils/grupo_empresarial.py
 import re
 from typing import Dict, Optional, Tuple
 from dataclasses import dataclass
-import pdfplumber
 
 # Importa os prefixos do módulo existente
 from app.portal.utils.grupo_empresarial import GRUPOS_EMPRESARIAIS, GrupoEmpresarial
@@ -189,25 +188,21 @@ class IdentificadorDocumento:
         IMPORTANTE: A concatenacao segue o mesmo padrao de
         base.py:extract_text_with_pdfplumber — pula paginas vazias e
         junta com "\\n" (sem trailing newline), garantindo que os regex
-        dos extractors recebam texto identico.
+        dos extractors recebam texto identico. O documento fica no cache de
+        app.utils.pdf_extracao — extractors que reabrem o PDF reaproveitam.
         """
+        from app.utils.pdf_extracao import documento_pdf
+
         self.texto_primeira_pagina = ""
         chunks = []
 
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for i, page in enumerate(pdf.pages):
-                    texto = page.extract_text()
-                    if texto:
-                        chunks.append(texto)
-                    page.flush_cache()
-                    # GC periodico a cada 20 paginas para PDFs grandes
-                    if i > 0 and i % 20 == 0:
-                        import gc
-                        gc.collect()
-                    # Primeira pagina para identificacao rapida
-                    if i == 0:
-                        self.texto_primeira_pagina = texto or ""
+            doc = documento_pdf(pdf_path=pdf_path)
+            textos = doc.textos_paginas() if doc is not None else []
+            chunks = [t for t in textos if t]
+            # Primeira pagina para identificacao rapida
+            if textos:
+                self.texto_primeira_pagina = textos[0]
 
         except Exception as e:
             print(f"Erro ao extrair texto do PDF: {e}")
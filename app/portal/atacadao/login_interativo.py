@@ -7,6 +7,7 @@ import os
 import time
 import logging
 from app.portal.atacadao.config import ATACADAO_CONFIG
+from app.utils.browser_pool import obter_pool, pool_habilitado
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,7 @@ class LoginInterativoAtacadao:
         self.browser = None
         self.context = None
         self.page = None
+        self._emprestimo = None  # Contexto emprestado do pool (app.utils.browser_pool)
     
     def verificar_necessidade_login(self, client=None):
         """
@@ -37,6 +39,13 @@ class LoginInterativoAtacadao:
             # Se tem cliente, usar ele
             if client and hasattr(client, 'page'):
                 page = client.page
+            elif pool_habilitado():
+                # Contexto temporário do navegador compartilhado do worker
+                storage = self.storage_file if os.path.exists(self.storage_file) else None
+                self._emprestimo = obter_pool().emprestar('atacadao', storage_state=storage)
+                self.context = self._emprestimo.context
+                self.page = self.context.new_page()
+                page = self.page
             else:
                 # Criar temporário para verificar
                 from playwright.sync_api import sync_playwright  # Lazy import
@@ -373,6 +382,12 @@ class LoginInterativoAtacadao:
     def fechar(self):
         """Fecha navegador e limpa recursos"""
         try:
+            if self._emprestimo is not None:
+                obter_pool().devolver(self._emprestimo)
+                self._emprestimo = None
+                self.page = None
+                self.context = None
+                return
             if self.page:
                 self.page.close()
             if self.context:
@@ -40,9 +40,19 @@ class TendaPlaywrightClient:
         self.browser = None
         self.context = None
         self.page = None
+        self._emprestimo = None  # Contexto emprestado do pool (app.utils.browser_pool)
     
     def iniciar_sessao(self, salvar_login=False):
         """Inicia sessao do Playwright com ou sem login salvo"""
+        from app.utils.browser_pool import obter_pool, pool_habilitado
+        if self.headless and pool_habilitado():
+            # Navegador compartilhado do worker; contexto isolado com a sessao salva
+            storage = self.storage_file if os.path.exists(self.storage_file) and not salvar_login else None
+            self._emprestimo = obter_pool().emprestar('tenda', storage_state=storage)
+            self.context = self._emprestimo.context
+            self.page = self.context.new_page()
+            return
+
         from playwright.sync_api import sync_playwright  # Lazy import
         self.playwright = sync_playwright().start()
         
@@ -399,6 +409,14 @@ class TendaPlaywrightClient:
     def fechar(self):
         """Fecha o navegador e limpa recursos"""
         try:
+            if self._emprestimo is not None:
+                # Devolve o contexto ao pool (o navegador continua vivo para o proximo job)
+                from app.utils.browser_pool import obter_pool
+                obter_pool().devolver(self._emprestimo)
+                self._emprestimo = None
+                self.page = None
+                self.context = None
+                return
             if self.page:
                 self.page.close()
             if self.context:
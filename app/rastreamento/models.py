@@ -64,6 +64,8 @@ class RastreamentoEmbarque(db.Model):
     embarque = db.relationship('Embarque', backref=db.backref('rastreamento', uselist=False))
     pings = db.relationship('PingGPS', backref='rastreamento', lazy='dynamic', cascade='all, delete-orphan', order_by='PingGPS.criado_em.desc()')
     logs = db.relationship('LogRastreamento', backref='rastreamento', lazy='dynamic', cascade='all, delete-orphan', order_by='LogRastreamento.criado_em.desc()')
+    posicao_atual = db.relationship('PosicaoAtualRastreamento', backref='rastreamento', uselist=False, cascade='all, delete-orphan')
+    segmentos = db.relationship('SegmentoTrajetoria', backref='rastreamento', lazy='dynamic', cascade='all, delete-orphan', order_by='SegmentoTrajetoria.inicio_em.asc()')
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -179,6 +181,58 @@ class PingGPS(db.Model):
         return (self.latitude, self.longitude)
 
 
+class PosicaoAtualRastreamento(db.Model):
+    """
+    Ultima posicao conhecida de cada rastreamento (1 linha por rastreamento)
+
+    Mantida por upsert na ingestao de pings (individual e em lote) — o painel
+    de monitoramento le daqui em 1 query, sem varrer pings_gps.
+    """
+    __tablename__ = 'posicoes_atuais_rastreamento'
+
+    rastreamento_id = db.Column(db.Integer, db.ForeignKey('rastreamento_embarques.id', ondelete='CASCADE'), primary_key=True)
+
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    precisao = db.Column(db.Float, nullable=True)
+    velocidade = db.Column(db.Float, nullable=True)
+    direcao = db.Column(db.Float, nullable=True)
+    distancia_destino = db.Column(db.Float, nullable=True)  # Em metros
+    bateria_nivel = db.Column(db.Integer, nullable=True)
+    bateria_carregando = db.Column(db.Boolean, default=False)
+
+    registrado_em = db.Column(db.DateTime, nullable=False)  # Horario do ping (dispositivo ou servidor)
+    atualizado_em = db.Column(db.DateTime, default=agora_utc_naive, nullable=False, index=True)
+    total_pings = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<PosicaoAtualRastreamento #{self.rastreamento_id} - {self.latitude}, {self.longitude}>'
+
+
+class SegmentoTrajetoria(db.Model):
+    """
+    Trecho da trajetoria ja compactado (Douglas-Peucker com limite de tempo)
+
+    Gerado a partir de pings_gps de rastreamentos finalizados; os pings
+    originais podem entao ser removidos. `pontos` = [[lat, lon, epoch_s], ...].
+    """
+    __tablename__ = 'segmentos_trajetoria'
+
+    id = db.Column(db.Integer, primary_key=True)
+    rastreamento_id = db.Column(db.Integer, db.ForeignKey('rastreamento_embarques.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    inicio_em = db.Column(db.DateTime, nullable=False)
+    fim_em = db.Column(db.DateTime, nullable=False)
+    pontos = db.Column(db.JSON, nullable=False)
+    pontos_originais = db.Column(db.Integer, nullable=False)  # Pings antes da compactacao
+    tolerancia_metros = db.Column(db.Float, nullable=False)
+
+    criado_em = db.Column(db.DateTime, default=agora_utc_naive, nullable=False)
+
+    def __repr__(self):
+        return f'<SegmentoTrajetoria #{self.rastreamento_id} {self.inicio_em} - {len(self.pontos or [])} pontos>'
+
+
 class LogRastreamento(db.Model):
     """
     Log de eventos do rastreamento para auditoria
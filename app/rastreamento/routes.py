@@ -206,8 +206,12 @@ def receber_ping_gps(token):
         if not GPSService.validar_coordenadas(latitude, longitude):
             return jsonify({'success': False, 'message': 'Coordenadas inválidas'}), 400
 
-        # Obter coordenadas do destino
-        coord_destino = GPSService.obter_coordenadas_embarque(rastreamento.embarque)
+        # Obter coordenadas do destino (geocodificadas 1x por rastreamento, em cache)
+        from app.rastreamento.services.ingestao_pings_service import (
+            atualizar_posicao_atual,
+            obter_coordenadas_destino,
+        )
+        coord_destino = obter_coordenadas_destino(rastreamento)
         coord_atual = (latitude, longitude)
 
         # Calcular distância até o destino
@@ -233,6 +237,17 @@ def receber_ping_gps(token):
 
         # Atualizar rastreamento
         rastreamento.ultimo_ping_em = agora_utc_naive()
+        atualizar_posicao_atual(rastreamento.id, {
+            'latitude': latitude,
+            'longitude': longitude,
+            'precisao': precisao,
+            'velocidade': velocidade,
+            'direcao': direcao,
+            'distancia_destino': distancia_destino,
+            'bateria_nivel': bateria_nivel,
+            'bateria_carregando': bateria_carregando,
+            'registrado_em': rastreamento.ultimo_ping_em,
+        })
 
         # ✅ NOVO: Detectar proximidade de TODAS entregas pendentes
         from app.rastreamento.services.entrega_rastreada_service import EntregaRastreadaService
@@ -317,6 +332,66 @@ def receber_ping_gps(token):
         return jsonify({'success': False, 'message': f'Erro: {str(e)}'}), 500
 
 
+@rastreamento_bp.route('/api/pings/<token>', methods=['POST'])
+@csrf.exempt
+def receber_pings_gps_lote(token):
+    """
+    API para receber pings GPS em LOTE (buffer do dispositivo)
+
+    Body: {"pings": [{latitude, longitude, precisao, altitude, velocidade,
+    direcao, bateria_nivel, bateria_carregando, timestamp}, ...]}
+    Mesmas regras do /api/ping/<token>, com 1 commit por lote.
+    ⚠️ CSRF desabilitado: API pública para transportadores externos
+    """
+    from app.rastreamento.services.ingestao_pings_service import ingerir_lote, lote_max_pings
+    from app.rastreamento.services.entrega_rastreada_service import EntregaRastreadaService
+
+    rastreamento = RastreamentoEmbarque.query.filter_by(token_acesso=token).first()
+
+    if not rastreamento:
+        return jsonify({'success': False, 'message': 'Token inválido'}), 404
+
+    if not rastreamento.aceite_lgpd or rastreamento.status != 'ATIVO':
+        return jsonify({'success': False, 'message': 'Rastreamento não está ativo'}), 403
+
+    data = request.get_json(silent=True) or {}
+    pings = data.get('pings')
+    if not isinstance(pings, list) or not pings:
+        return jsonify({'success': False, 'message': 'Envie "pings" como lista não vazia'}), 400
+    if len(pings) > lote_max_pings():
+        return jsonify({
+            'success': False,
+            'message': f'Lote acima do limite de {lote_max_pings()} pings'
+        }), 413
+
+    try:
+        resultado = ingerir_lote(rastreamento, pings)
+        if not resultado['aceitos']:
+            return jsonify({'success': False, 'message': 'Nenhum ping válido no lote',
+                            'data': resultado}), 400
+
+        stats = EntregaRastreadaService.obter_estatisticas_entregas(rastreamento.id)
+
+        return jsonify({
+            'success': True,
+            'message': f"{resultado['aceitos']} ping(s) recebido(s)",
+            'data': {
+                **resultado,
+                'distancia_formatada': GPSService.formatar_distancia(resultado['distancia_destino']),
+                'chegou_proximo': bool(resultado['entregas_proximas']),
+                'total_entregas': stats['total'],
+                'entregas_pendentes': stats['pendentes'],
+                'entregas_entregues': stats['entregues'],
+                'pode_finalizar': bool(resultado['entregas_proximas'])
+            }
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Erro ao processar lote de pings GPS: {str(e)}")
+        return jsonify({'success': False, 'message': f'Erro: {str(e)}'}), 500
+
+
 @rastreamento_bp.route('/upload_canhoto/<token>', methods=['GET'])
 def tela_upload_canhoto(token):
     """
@@ -642,6 +717,11 @@ def detalhes_rastreamento(embarque_id):
             'velocidade': ping.velocidade
         })
 
+    # Rastreamento já compactado: pings viraram segmentos_trajetoria
+    if not historico_rota:
+        from app.rastreamento.services.ingestao_pings_service import historico_de_segmentos
+        historico_rota = historico_de_segmentos(rastreamento.id)
+
     return render_template('rastreamento/detalhes.html',
                           rastreamento=rastreamento,
                           pings=pings,
@@ -1069,58 +1149,96 @@ def api_rastreamentos_ativos():
     - rastreamentos: Lista de rastreamentos ativos com detalhes
     """
     try:
-        rastreamentos = RastreamentoEmbarque.query.filter(
+        from collections import defaultdict
+        from app.embarques.models import Embarque, EmbarqueItem
+        from app.rastreamento.models import EntregaRastreada, PosicaoAtualRastreamento
+        from app.transportadoras.models import Transportadora
+
+        # Consultas em numero FIXO (nao cresce com a frota): rastreamentos +
+        # posicao atual + embarque/transportadora numa so; entregas e NFs
+        # agregadas para todos os ids de uma vez.
+        linhas = db.session.query(
+            RastreamentoEmbarque,
+            PosicaoAtualRastreamento,
+            Embarque.numero,
+            Transportadora.razao_social,
+        ).outerjoin(
+            PosicaoAtualRastreamento,
+            PosicaoAtualRastreamento.rastreamento_id == RastreamentoEmbarque.id
+        ).outerjoin(
+            Embarque, Embarque.id == RastreamentoEmbarque.embarque_id
+        ).outerjoin(
+            Transportadora, Transportadora.id == Embarque.transportadora_id
+        ).filter(
             RastreamentoEmbarque.status.in_(['ATIVO', 'CHEGOU_DESTINO'])
         ).all()
 
-        from app.rastreamento.models import EntregaRastreada
+        ids = [rastr.id for rastr, _pos, _num, _transp in linhas]
+        embarque_ids = [rastr.embarque_id for rastr, _pos, _num, _transp in linhas]
+
+        contagem = defaultdict(lambda: defaultdict(int))
+        pendentes_por_rastr = defaultdict(list)
+        nfs_por_embarque = defaultdict(set)
+        if ids:
+            for rastr_id, status, total in db.session.query(
+                EntregaRastreada.rastreamento_id, EntregaRastreada.status, db.func.count()
+            ).filter(
+                EntregaRastreada.rastreamento_id.in_(ids)
+            ).group_by(EntregaRastreada.rastreamento_id, EntregaRastreada.status):
+                contagem[rastr_id][status] = total
+
+            for e in db.session.query(
+                EntregaRastreada.rastreamento_id, EntregaRastreada.cliente,
+                EntregaRastreada.cidade, EntregaRastreada.uf, EntregaRastreada.numero_nf,
+            ).filter(
+                EntregaRastreada.rastreamento_id.in_(ids),
+                EntregaRastreada.status.in_(['PENDENTE', 'EM_ROTA', 'PROXIMO'])
+            ).order_by(EntregaRastreada.id):
+                pendentes_por_rastr[e.rastreamento_id].append(e)
+
+            for embarque_id, nf in db.session.query(
+                EmbarqueItem.embarque_id, EmbarqueItem.nota_fiscal
+            ).filter(
+                EmbarqueItem.embarque_id.in_(embarque_ids),
+                EmbarqueItem.status == 'ativo',
+                EmbarqueItem.nota_fiscal.isnot(None),
+                EmbarqueItem.nota_fiscal != '',
+            ).distinct():
+                nfs_por_embarque[embarque_id].add(nf)
 
         resultado = []
-        for rastr in rastreamentos:
-            ultimo_ping = rastr.pings.first()
-            embarque = rastr.embarque
-
+        for rastr, posicao, embarque_numero, transportadora in linhas:
             # Calcular tempo no cliente (se chegou próximo)
             tempo_no_cliente = None
             if rastr.chegou_destino_em:
                 delta = agora_utc_naive() - rastr.chegou_destino_em
                 tempo_no_cliente = int(delta.total_seconds() / 60)  # Em minutos
 
-            # Buscar entregas pendentes
-            entregas_pendentes = rastr.entregas.filter(
-                EntregaRastreada.status.in_(['PENDENTE', 'EM_ROTA', 'PROXIMO'])
-            ).all()
-
-            entregas_proximas = rastr.entregas.filter_by(status='PROXIMO').all()
-
-            # Coletar NFs únicas
-            nfs = set()
-            for item in embarque.itens:
-                if item.nota_fiscal and item.status == 'ativo':
-                    nfs.add(item.nota_fiscal)
+            por_status = contagem[rastr.id]
+            entregas_pendentes = pendentes_por_rastr[rastr.id]
 
             resultado.append({
                 'rastreamento_id': rastr.id,
                 'embarque_id': rastr.embarque_id,
-                'embarque_numero': embarque.numero if embarque else None,
-                'transportadora': embarque.transportadora.razao_social if embarque and embarque.transportadora else 'Não definida',
+                'embarque_numero': embarque_numero,
+                'transportadora': transportadora or 'Não definida',
                 'status': rastr.status,
-                'nfs': list(nfs),
+                'nfs': list(nfs_por_embarque[rastr.embarque_id]),
                 'posicao': {
-                    'latitude': ultimo_ping.latitude if ultimo_ping else None,
-                    'longitude': ultimo_ping.longitude if ultimo_ping else None,
-                    'distancia_destino': ultimo_ping.distancia_destino if ultimo_ping else None,
-                    'bateria': ultimo_ping.bateria_nivel if ultimo_ping else None
+                    'latitude': posicao.latitude if posicao else None,
+                    'longitude': posicao.longitude if posicao else None,
+                    'distancia_destino': posicao.distancia_destino if posicao else None,
+                    'bateria': posicao.bateria_nivel if posicao else None
                 },
                 'ultimo_ping': rastr.ultimo_ping_em.isoformat() if rastr.ultimo_ping_em else None,
                 'tempo_sem_ping': rastr.tempo_sem_ping,
                 'tempo_no_cliente_minutos': tempo_no_cliente,
                 'com_dificuldade': tempo_no_cliente and tempo_no_cliente > 40,
                 'entregas': {
-                    'total': rastr.entregas.count(),
+                    'total': sum(por_status.values()),
                     'pendentes': len(entregas_pendentes),
-                    'proximas': len(entregas_proximas),
-                    'entregues': rastr.entregas.filter_by(status='ENTREGUE').count()
+                    'proximas': por_status['PROXIMO'],
+                    'entregues': por_status['ENTREGUE']
                 },
                 'clientes_pendentes': [
                     {'cliente': e.cliente, 'cidade': e.cidade, 'uf': e.uf, 'numero_nf': e.numero_nf}
@@ -10,7 +10,7 @@ from app.rastreamento.models import EntregaRastreada, RastreamentoEmbarque
 from app.rastreamento.services.gps_service import GPSService
 from app.embarques.models import Embarque, EmbarqueItem
 from app.carteira.models import CarteiraPrincipal
-from datetime import datetime
+from datetime import datetime, timezone
 from app.utils.timezone import agora_utc_naive
 from flask import current_app
 
@@ -158,69 +158,76 @@ class EntregaRastreadaService:
         return endereco, lat, lon
 
     @staticmethod
-    def detectar_entrega_proxima(rastreamento_id, latitude_atual, longitude_atual):
+    def detectar_entrega_proxima(rastreamento_id, latitude_atual, longitude_atual, timestamp=None):
         """
         Detecta qual(is) entrega(s) o motorista está próximo (<200m)
 
         REGRA DE NEGÓCIO:
-        - Considera apenas entregas com status='PENDENTE'
-        - Calcula distância para todas entregas pendentes
-        - Marca como 'PROXIMO' as que estiverem <200m
+        - Considera entregas PENDENTE, EM_ROTA e PROXIMO (a PROXIMO segue no
+          motor para a histerese decidir a saída)
+        - Entra no raio com distância <= 200m (mesma regra de sempre)
+        - Só sai depois de raio + histerese (geofence_service): caminhão parado
+          na borda não fica entrando e saindo da lista a cada ping
+        - Marca como 'PROXIMO' as que estiverem dentro
         - Retorna lista ordenada por distância
 
         Args:
             rastreamento_id (int): ID do RastreamentoEmbarque
             latitude_atual (float): Latitude atual do motorista
             longitude_atual (float): Longitude atual do motorista
+            timestamp (datetime, opcional): Horário do ping (padrão: agora)
 
         Returns:
             list: Lista de dicts com {'entrega': EntregaRastreada, 'distancia': float}
         """
+        from app.rastreamento.services.geofence_service import (
+            STATUS_CANDIDATOS, CercaEntrega, obter_motor,
+        )
+
         rastreamento = db.session.get(RastreamentoEmbarque,rastreamento_id) if rastreamento_id else None
         if not rastreamento:
             return []
 
-        entregas_proximas = []
-
-        # Buscar entregas pendentes
+        # Buscar entregas pendentes (inclui as ja PROXIMO)
         entregas_pendentes = rastreamento.entregas.filter(
-            EntregaRastreada.status.in_(['PENDENTE', 'EM_ROTA'])
+            EntregaRastreada.status.in_(STATUS_CANDIDATOS)
         ).all()
 
+        por_id = {}
         for entrega in entregas_pendentes:
             if not entrega.tem_coordenadas:
                 current_app.logger.debug(
                     f"⚠️ Entrega {entrega.id} não tem coordenadas, pulando detecção de proximidade"
                 )
                 continue
+            por_id[entrega.id] = entrega
+
+        motor = obter_motor()
+        motor.sincronizar(rastreamento_id, [
+            CercaEntrega(e.id, e.destino_latitude, e.destino_longitude) for e in por_id.values()
+        ])
+        momento = timestamp or agora_utc_naive()
+        dentro, _eventos = motor.processar(
+            rastreamento_id, latitude_atual, longitude_atual,
+            momento.replace(tzinfo=timezone.utc).timestamp(),
+        )
 
-            # Calcular distância
-            distancia = GPSService.calcular_distancia(
-                (latitude_atual, longitude_atual),
-                (entrega.destino_latitude, entrega.destino_longitude),
-                'metros'
-            )
-
-            if distancia is None:
-                continue
-
-            # Se está próximo (<200m)
-            if distancia <= 200:
-                entregas_proximas.append({
-                    'entrega': entrega,
-                    'distancia': distancia
-                })
-
-                # Atualizar status para PROXIMO (apenas se ainda PENDENTE)
-                if entrega.status == 'PENDENTE':
-                    entrega.status = 'PROXIMO'
-                    current_app.logger.info(
-                        f"📍 Motorista chegou próximo de {entrega.descricao_completa} ({distancia:.0f}m)"
-                    )
-
-        # Ordenar por distância (mais próximo primeiro)
-        entregas_proximas.sort(key=lambda x: x['distancia'])
+        entregas_proximas = []
+        for entrega_id, distancia in dentro:
+            entrega = por_id[entrega_id]
+            entregas_proximas.append({
+                'entrega': entrega,
+                'distancia': distancia
+            })
+
+            # Atualizar status para PROXIMO (apenas se ainda PENDENTE)
+            if entrega.status == 'PENDENTE':
+                entrega.status = 'PROXIMO'
+                current_app.logger.info(
+                    f"📍 Motorista chegou próximo de {entrega.descricao_completa} ({distancia:.0f}m)"
+                )
 
+        # dentro ja vem ordenado por distância (mais próximo primeiro)
         return entregas_proximas
 
     @staticmethod
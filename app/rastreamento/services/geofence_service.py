@@ -0,0 +1,406 @@
+"""
+📍 MOTOR DE GEOFENCE DAS ENTREGAS
+Detecta entrada, saída e permanência do motorista no raio de cada entrega.
+Autor: Sistema de Rastreamento Nacom
+Data: 2026-10-19
+
+POR QUE
+- detectar_entrega_proxima calculava haversine do ping contra TODAS as
+  entregas pendentes, a cada ping, e decidia "próximo" só pelo ping atual:
+  caminhão parado na borda dos 200m entrava e saía da lista a cada ping
+  (o botão "Entreguei" piscava).
+
+O QUE FAZ
+- Índice em grade por rastreamento: só as entregas das células vizinhas ao
+  ping são avaliadas.
+- Distâncias vetorizadas (NumPy) para muitos pings/rastreamentos de uma vez;
+  pares na borda do raio são recalculados com GPSService.calcular_distancia,
+  então a decisão de ENTRADA é idêntica à regra atual (distância <= 200m).
+- Máquina de estados por entrega: FORA -> DENTRO ao entrar no raio; DENTRO ->
+  FORA só além de raio + histerese; PERMANENCIA uma vez após N segundos dentro.
+- Estado das máquinas no Redis (1 chave por rastreamento, TTL): os pings de um
+  motorista caem em workers gunicorn diferentes e a histerese precisa ver o
+  mesmo estado em todos. Sem Redis (testes, dev) fica na memória do processo.
+- Determinístico: mesmo traço de pings, mesmos eventos (testável offline).
+
+Flags (env): RASTREAMENTO_GEOFENCE_HISTERESE_METROS (50),
+RASTREAMENTO_GEOFENCE_PERMANENCIA_S (300), RASTREAMENTO_GEOFENCE_TTL (21600s).
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import cachetools
+
+from app.rastreamento.services.gps_service import GPSService
+
+logger = logging.getLogger(__name__)
+
+# Mesmo raio de EntregaRastreadaService.detectar_entrega_proxima
+RAIO_PADRAO_METROS = 200.0
+# Entregas que viram cerca. PROXIMO continua: sem ela a entrega sairia do
+# motor no ping seguinte à ENTRADA e a histerese nunca se aplicaria.
+STATUS_CANDIDATOS = ('PENDENTE', 'EM_ROTA', 'PROXIMO')
+# Raio médio da Terra da lib haversine (só para dimensionar a grade)
+_RAIO_TERRA_METROS = 6371008.8
+_METROS_POR_GRAU = math.pi * _RAIO_TERRA_METROS / 180
+# Pares com distância vetorizada a menos disso do raio são recalculados
+# pela mesma função escalar da regra atual (evita divergência de arredondamento)
+_MARGEM_BORDA_METROS = 0.05
+
+FORA = 'FORA'
+DENTRO = 'DENTRO'
+
+ENTRADA = 'ENTRADA'
+SAIDA = 'SAIDA'
+PERMANENCIA = 'PERMANENCIA'
+
+_REDIS_ESTADO_PREFIX = 'rastreamento:geofence:'
+
+
+def _env_float(nome, padrao):
+    try:
+        return float(os.environ.get(nome, padrao))
+    except (TypeError, ValueError):
+        return float(padrao)
+
+
+@dataclass(frozen=True)
+class CercaEntrega:
+    """Ponto de entrega com raio de detecção."""
+    entrega_id: int
+    latitude: float
+    longitude: float
+    raio_metros: float = RAIO_PADRAO_METROS
+
+
+@dataclass(frozen=True)
+class EventoGeofence:
+    tipo: str  # ENTRADA | SAIDA | PERMANENCIA
+    rastreamento_id: int
+    entrega_id: int
+    distancia: float
+    timestamp: float
+
+
+@dataclass
+class _EstadoCerca:
+    estado: str = FORA
+    desde: Optional[float] = None
+    permanencia_emitida: bool = False
+
+
+class IndiceGrade:
+    """
+    Grade regular em graus sobre as cercas de UM rastreamento.
+
+    Célula >= maior raio de saída, então qualquer cerca que possa conter o
+    ping está nas 3x3 células em volta dele.
+    """
+
+    def __init__(self, cercas: Sequence[CercaEntrega], alcance_metros: float):
+        self.cercas = list(cercas)
+        lat_max = max((abs(c.latitude) for c in self.cercas), default=0.0)
+        # Margem de 1% + limite de 85 graus (cos -> 0 nos polos)
+        self._passo_lat = alcance_metros * 1.01 / _METROS_POR_GRAU
+        cos_ref = math.cos(math.radians(min(lat_max + self._passo_lat, 85.0)))
+        self._passo_lon = self._passo_lat / cos_ref
+        self._celulas: Dict[Tuple[int, int], List[int]] = {}
+        for posicao, cerca in enumerate(self.cercas):
+            self._celulas.setdefault(self._celula(cerca.latitude, cerca.longitude), []).append(posicao)
+
+    def _celula(self, lat, lon):
+        return math.floor(lat / self._passo_lat), math.floor(lon / self._passo_lon)
+
+    def candidatas(self, lat, lon) -> List[int]:
+        """Posições (em self.cercas) das cercas nas células vizinhas ao ponto."""
+        ci, cj = self._celula(lat, lon)
+        encontradas = []
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                encontradas.extend(self._celulas.get((ci + di, cj + dj), ()))
+        return encontradas
+
+
+def _haversine_metros(pontos_a, pontos_b):
+    """Haversine vetorizada da mesma lib de GPSService.calcular_distancia (usa NumPy)."""
+    from haversine import Unit, haversine_vector
+
+    return haversine_vector(pontos_a, pontos_b, Unit.METERS)
+
+
+@dataclass
+class _Rastreio:
+    assinatura: tuple
+    indice: IndiceGrade
+    ids: frozenset
+
+
+def _redis():
+    try:
+        from app.utils.redis_cache import redis_cache
+    except Exception:
+        return None
+    return redis_cache.client if redis_cache.disponivel else None
+
+
+class EstadosGeofence:
+    """
+    Estados FORA/DENTRO das cercas, por rastreamento.
+
+    Com `redis`: 1 chave JSON por rastreamento ({entrega_id: [estado, desde,
+    permanencia_emitida]}), lida com MGET e gravada com SETEX num pipeline —
+    todos os workers enxergam a mesma histerese. Sem Redis, ou se ele falhar,
+    usa a memória do processo. Dois pings do MESMO rastreamento processados
+    ao mesmo tempo em workers diferentes: vale a última gravação.
+    """
+
+    def __init__(self, ttl_s: float = 6 * 3600, max_rastreamentos: int = 5000, redis=None):
+        self.ttl_s = int(ttl_s)
+        self._redis = redis
+        self._memoria = cachetools.TTLCache(maxsize=max_rastreamentos, ttl=ttl_s)
+
+    def _cliente(self):
+        return self._redis() if self._redis is not None else None
+
+    def carregar(self, rastreamento_ids: Iterable[int]) -> Dict[int, Dict[int, _EstadoCerca]]:
+        ids = list(dict.fromkeys(rastreamento_ids))
+        cliente = self._cliente()
+        if cliente is not None and ids:
+            try:
+                valores = cliente.mget([f'{_REDIS_ESTADO_PREFIX}{rid}' for rid in ids])
+                return {rid: self._decodificar(valor) for rid, valor in zip(ids, valores)}
+            except Exception as e:
+                logger.debug(f"Estado de geofence indisponivel no Redis: {e}")
+        # Cópias: como no Redis, nada persiste sem salvar()
+        return {
+            rid: {eid: replace(est) for eid, est in self._memoria.get(rid, {}).items()}
+            for rid in ids
+        }
+
+    def salvar(self, estados_por_rastreamento: Dict[int, Dict[int, _EstadoCerca]]):
+        cliente = self._cliente()
+        if cliente is not None and estados_por_rastreamento:
+            try:
+                pipe = cliente.pipeline(transaction=False)
+                for rid, estados in estados_por_rastreamento.items():
+                    pipe.setex(f'{_REDIS_ESTADO_PREFIX}{rid}', self.ttl_s, self._codificar(estados))
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.debug(f"Falha ao gravar estado de geofence: {e}")
+        for rid, estados in estados_por_rastreamento.items():
+            self._memoria[rid] = estados
+
+    def remover(self, rastreamento_id: int):
+        self._memoria.pop(rastreamento_id, None)
+        cliente = self._cliente()
+        if cliente is not None:
+            try:
+                cliente.delete(f'{_REDIS_ESTADO_PREFIX}{rastreamento_id}')
+            except Exception as e:
+                logger.debug(f"Falha ao remover estado de geofence: {e}")
+
+    def limpar(self):
+        """Só a memória local (as chaves do Redis expiram pelo TTL)."""
+        self._memoria.clear()
+
+    @staticmethod
+    def _codificar(estados: Dict[int, _EstadoCerca]) -> str:
+        return json.dumps({
+            str(eid): [est.estado, est.desde, est.permanencia_emitida]
+            for eid, est in estados.items()
+        })
+
+    @staticmethod
+    def _decodificar(valor) -> Dict[int, _EstadoCerca]:
+        if not valor:
+            return {}
+        return {
+            int(eid): _EstadoCerca(estado, desde, permanencia)
+            for eid, (estado, desde, permanencia) in json.loads(valor).items()
+        }
+
+
+class MotorGeofence:
+    """
+    Geofence de vários rastreamentos.
+
+    Uso típico:
+        motor.sincronizar(rastreamento_id, cercas)   # entregas pendentes
+        dentro, eventos = motor.processar(rastreamento_id, lat, lon, ts)
+
+    O índice em grade é derivado das cercas e fica no processo (cada worker
+    monta o seu em sincronizar); o estado das máquinas fica em `estados`
+    (EstadosGeofence — Redis em obter_motor, memória por padrão). Estado
+    perdido (TTL, Redis limpo) só faz a histerese recomeçar: a ENTRADA
+    continua sendo decidida pelo ping, igual à regra atual.
+    """
+
+    def __init__(self, histerese_metros: float = 50.0, permanencia_s: float = 300.0,
+                 ttl_s: float = 6 * 3600, max_rastreamentos: int = 5000,
+                 estados: Optional[EstadosGeofence] = None):
+        self.histerese_metros = histerese_metros
+        self.permanencia_s = permanencia_s
+        self._rastreios = cachetools.TTLCache(maxsize=max_rastreamentos, ttl=ttl_s)
+        self.estados = estados if estados is not None else EstadosGeofence(ttl_s, max_rastreamentos)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # Cercas
+    # ------------------------------------------------------------
+
+    def sincronizar(self, rastreamento_id: int, cercas: Iterable[CercaEntrega]):
+        """
+        Define as cercas ativas do rastreamento. O estado das que continuam é
+        mantido; o das que saíram é descartado na próxima gravação.
+        """
+        cercas = sorted(cercas, key=lambda c: c.entrega_id)
+        assinatura = tuple(cercas)
+        with self._lock:
+            atual = self._rastreios.get(rastreamento_id)
+            if atual is not None and atual.assinatura == assinatura:
+                return
+            alcance = max((c.raio_metros for c in cercas), default=RAIO_PADRAO_METROS) + self.histerese_metros
+            self._rastreios[rastreamento_id] = _Rastreio(
+                assinatura, IndiceGrade(cercas, alcance), frozenset(c.entrega_id for c in cercas),
+            )
+
+    def remover(self, rastreamento_id: int):
+        with self._lock:
+            self._rastreios.pop(rastreamento_id, None)
+            self.estados.remover(rastreamento_id)
+
+    def limpar(self):
+        with self._lock:
+            self._rastreios.clear()
+            self.estados.limpar()
+
+    # ------------------------------------------------------------
+    # Avaliação
+    # ------------------------------------------------------------
+
+    def processar(self, rastreamento_id, latitude, longitude, timestamp):
+        """Um ping. Returns (dentro [(entrega_id, distancia)] por distância, eventos)."""
+        return self.processar_lote([(rastreamento_id, latitude, longitude, timestamp)])[0]
+
+    def processar_lote(self, pings: Sequence[Tuple[int, float, float, float]]):
+        """
+        Vários pings (de um ou muitos rastreamentos) em ordem cronológica.
+
+        Args:
+            pings: [(rastreamento_id, latitude, longitude, timestamp_epoch_s)]
+
+        Returns:
+            Lista paralela a pings: (dentro [(entrega_id, distancia)], eventos)
+        """
+        with self._lock:
+            rastreios = [self._rastreios.get(rid) for rid, _lat, _lon, _ts in pings]
+
+            # 1) Pares (ping, cerca) candidatos pela grade
+            pares_ping, pares_cerca = [], []
+            for posicao, ((_rid, lat, lon, _ts), rastreio) in enumerate(zip(pings, rastreios)):
+                if rastreio is None:
+                    continue
+                for indice_cerca in rastreio.indice.candidatas(lat, lon):
+                    pares_ping.append(posicao)
+                    pares_cerca.append(rastreio.indice.cercas[indice_cerca])
+
+            # 2) Distâncias de todos os pares de uma vez
+            distancias = self._distancias(pings, pares_ping, pares_cerca)
+
+            por_ping: List[List[Tuple[CercaEntrega, float]]] = [[] for _ in pings]
+            for posicao, cerca, distancia in zip(pares_ping, pares_cerca, distancias):
+                por_ping[posicao].append((cerca, distancia))
+
+            # 3) Máquinas de estado, ping a ping (ordem importa): 1 leitura e
+            #    1 gravação do estado compartilhado por lote
+            conhecidos = {rid: r for (rid, _lat, _lon, _ts), r in zip(pings, rastreios) if r is not None}
+            estados = {
+                rid: {eid: est for eid, est in por_rid.items() if eid in conhecidos[rid].ids}
+                for rid, por_rid in self.estados.carregar(conhecidos).items()
+            }
+            resultado = []
+            for (rid, _lat, _lon, ts), rastreio, avaliadas in zip(pings, rastreios, por_ping):
+                if rastreio is None:
+                    resultado.append(([], []))
+                    continue
+                resultado.append(self._transicionar(rid, ts, estados[rid], avaliadas))
+            self.estados.salvar(estados)
+            return resultado
+
+    def _distancias(self, pings, pares_ping, pares_cerca):
+        if not pares_ping:
+            return []
+        origens = [(pings[i][1], pings[i][2]) for i in pares_ping]
+        distancias = _haversine_metros(
+            origens, [(c.latitude, c.longitude) for c in pares_cerca],
+        ).round(2).tolist()
+        # Borda do raio de entrada ou de saída: decide com a função da regra atual
+        for k, cerca in enumerate(pares_cerca):
+            d = distancias[k]
+            if (abs(d - cerca.raio_metros) <= _MARGEM_BORDA_METROS
+                    or abs(d - cerca.raio_metros - self.histerese_metros) <= _MARGEM_BORDA_METROS):
+                exata = GPSService.calcular_distancia(
+                    origens[k], (cerca.latitude, cerca.longitude), 'metros'
+                )
+                if exata is not None:
+                    distancias[k] = exata
+        return distancias
+
+    def _transicionar(self, rastreamento_id, ts, estados, avaliadas):
+        dentro, eventos = [], []
+        distancia_por_id = {cerca.entrega_id: d for cerca, d in avaliadas}
+        raio_por_id = {cerca.entrega_id: cerca.raio_metros for cerca, _d in avaliadas}
+
+        for entrega_id, estado in estados.items():
+            if estado.estado == DENTRO and entrega_id not in distancia_por_id:
+                # Fora das células vizinhas: longe o bastante para sair
+                estado.estado, estado.desde, estado.permanencia_emitida = FORA, None, False
+                eventos.append(EventoGeofence(SAIDA, rastreamento_id, entrega_id, math.inf, ts))
+
+        for entrega_id, distancia in sorted(distancia_por_id.items()):
+            raio = raio_por_id[entrega_id]
+            estado = estados.setdefault(entrega_id, _EstadoCerca())
+            if estado.estado == FORA:
+                if distancia <= raio:
+                    estado.estado, estado.desde, estado.permanencia_emitida = DENTRO, ts, False
+                    eventos.append(EventoGeofence(ENTRADA, rastreamento_id, entrega_id, distancia, ts))
+            elif distancia > raio + self.histerese_metros:
+                estado.estado, estado.desde, estado.permanencia_emitida = FORA, None, False
+                eventos.append(EventoGeofence(SAIDA, rastreamento_id, entrega_id, distancia, ts))
+
+            if estado.estado == DENTRO:
+                dentro.append((entrega_id, distancia))
+                if (not estado.permanencia_emitida and self.permanencia_s is not None
+                        and ts - estado.desde >= self.permanencia_s):
+                    estado.permanencia_emitida = True
+                    eventos.append(EventoGeofence(PERMANENCIA, rastreamento_id, entrega_id, distancia, ts))
+
+        dentro.sort(key=lambda x: (x[1], x[0]))
+        return dentro, eventos
+
+
+_motor: Optional[MotorGeofence] = None
+_motor_lock = threading.Lock()
+
+
+def obter_motor() -> MotorGeofence:
+    """Motor do processo, com estado no Redis (configurado por env na primeira chamada)."""
+    global _motor
+    if _motor is None:
+        with _motor_lock:
+            if _motor is None:
+                ttl_s = _env_float('RASTREAMENTO_GEOFENCE_TTL', 6 * 3600)
+                _motor = MotorGeofence(
+                    histerese_metros=_env_float('RASTREAMENTO_GEOFENCE_HISTERESE_METROS', 50.0),
+                    permanencia_s=_env_float('RASTREAMENTO_GEOFENCE_PERMANENCIA_S', 300.0),
+                    ttl_s=ttl_s,
+                    estados=EstadosGeofence(ttl_s, redis=_redis),
+                )
+    return _motor
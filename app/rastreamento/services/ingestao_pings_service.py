@@ -0,0 +1,531 @@
+"""
+📦 SERVIÇO DE INGESTÃO DE PINGS EM LOTE
+Recebe pings GPS bufferizados pelo dispositivo, mantém a posição atual de
+cada rastreamento e compacta trajetórias antigas.
+Autor: Sistema de Rastreamento Nacom
+Data: 2026-10-19
+
+POR QUE
+- /api/ping/<token> processava 1 ping por POST e, a cada um, refazia a
+  geocodificacao do destino (CarteiraPrincipal + Google), varria as entregas
+  pendentes e contava pings_gps. Com centenas de caminhoes pingando, o custo
+  era dominado por trabalho repetido, nao pelo INSERT.
+- O painel (/api/ativos) fazia pings.first() + 4 consultas de entregas POR
+  rastreamento.
+
+O QUE FAZ
+- Contexto por rastreamento em cache (coordenadas do destino no Redis, que
+  nao mudam; entregas pendentes com coordenadas em TTL local curto).
+- Lote: 1 INSERT multi-linha de pings, 1 UPDATE de entregas que ficaram
+  PROXIMO (geofence_service), upsert em posicoes_atuais_rastreamento, 1 commit.
+- Compactacao: Douglas-Peucker com limite de tempo entre pontos mantidos,
+  gravado em segmentos_trajetoria (pings originais podem ser removidos).
+
+Flags (env): RASTREAMENTO_LOTE_MAX_PINGS (500), RASTREAMENTO_CONTEXTO_TTL (60s),
+RASTREAMENTO_TOLERANCIA_METROS (15), RASTREAMENTO_MAX_INTERVALO_S (300),
+RASTREAMENTO_GAP_SEGMENTO_S (1800).
+"""
+
+import json
+import math
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Tuple
+
+import cachetools
+from flask import current_app
+from sqlalchemy import case, insert, update
+
+from app import db
+from app.rastreamento.models import (
+    ConfiguracaoRastreamento,
+    EntregaRastreada,
+    PingGPS,
+    PosicaoAtualRastreamento,
+    SegmentoTrajetoria,
+)
+from app.rastreamento.services.geofence_service import STATUS_CANDIDATOS, CercaEntrega, obter_motor
+from app.rastreamento.services.gps_service import GPSService
+from app.utils.timezone import agora_utc_naive
+
+# Mesmo raio usado por EntregaRastreadaService.detectar_entrega_proxima
+RAIO_PROXIMIDADE_METROS = 200
+_RAIO_TERRA_METROS = 6371008.8
+
+_REDIS_DESTINO_PREFIX = 'rastreamento:destino:'
+_REDIS_DESTINO_TTL = 7 * 24 * 3600
+_REDIS_DESTINO_FALHA_TTL = 600
+
+
+def _env_int(nome, padrao):
+    return int(os.getenv(nome, str(padrao)))
+
+
+def _env_float(nome, padrao):
+    return float(os.getenv(nome, str(padrao)))
+
+
+def lote_max_pings():
+    return _env_int('RASTREAMENTO_LOTE_MAX_PINGS', 500)
+
+
+# ============================================================
+# CONTEXTO POR RASTREAMENTO (destino + entregas pendentes)
+# ============================================================
+
+@dataclass
+class ContextoRastreamento:
+    rastreamento_id: int
+    coord_destino: Optional[Tuple[float, float]]
+    distancia_chegada: float
+    entregas: List[Tuple[int, float, float]] = field(default_factory=list)  # (id, lat, lon)
+
+
+_contextos = cachetools.TTLCache(maxsize=5000, ttl=_env_int('RASTREAMENTO_CONTEXTO_TTL', 60))
+_contextos_lock = threading.Lock()
+
+
+def _redis():
+    try:
+        from app.utils.redis_cache import redis_cache
+    except Exception:
+        return None
+    return redis_cache.client if redis_cache.disponivel else None
+
+
+def invalidar_contexto(rastreamento_id):
+    """Descarta o contexto local (entregas mudaram de status)."""
+    with _contextos_lock:
+        _contextos.pop(rastreamento_id, None)
+
+
+def limpar_contextos():
+    with _contextos_lock:
+        _contextos.clear()
+
+
+def obter_coordenadas_destino(rastreamento):
+    """
+    Coordenadas do destino do embarque, geocodificadas 1x por rastreamento.
+
+    Substitui GPSService.obter_coordenadas_embarque a cada ping: o resultado
+    fica no Redis (falha tambem, por pouco tempo, para nao martelar o Google).
+    """
+    chave = f'{_REDIS_DESTINO_PREFIX}{rastreamento.id}'
+    client = _redis()
+    if client is not None:
+        try:
+            valor = client.get(chave)
+        except Exception as e:
+            current_app.logger.debug(f"Cache destino indisponivel: {e}")
+            valor = None
+        if valor is not None:
+            coords = json.loads(valor)
+            return tuple(coords) if coords else None
+
+    coords = GPSService.obter_coordenadas_embarque(rastreamento.embarque)
+    if client is not None:
+        try:
+            client.setex(
+                chave,
+                _REDIS_DESTINO_TTL if coords else _REDIS_DESTINO_FALHA_TTL,
+                json.dumps(list(coords) if coords else None),
+            )
+        except Exception as e:
+            current_app.logger.debug(f"Falha ao gravar cache destino: {e}")
+    return tuple(coords) if coords else None
+
+
+def obter_contexto(rastreamento):
+    """Contexto de ingestao do rastreamento (cache local com TTL curto)."""
+    with _contextos_lock:
+        ctx = _contextos.get(rastreamento.id)
+    if ctx is not None:
+        return ctx
+
+    entregas = db.session.query(
+        EntregaRastreada.id,
+        EntregaRastreada.destino_latitude,
+        EntregaRastreada.destino_longitude,
+    ).filter(
+        EntregaRastreada.rastreamento_id == rastreamento.id,
+        EntregaRastreada.status.in_(STATUS_CANDIDATOS),
+        EntregaRastreada.destino_latitude.isnot(None),
+        EntregaRastreada.destino_longitude.isnot(None),
+    ).all()
+
+    ctx = ContextoRastreamento(
+        rastreamento_id=rastreamento.id,
+        coord_destino=obter_coordenadas_destino(rastreamento),
+        distancia_chegada=ConfiguracaoRastreamento.get_config().distancia_chegada_metros,
+        entregas=[(e.id, e.destino_latitude, e.destino_longitude) for e in entregas],
+    )
+    with _contextos_lock:
+        _contextos[rastreamento.id] = ctx
+    return ctx
+
+
+# ============================================================
+# POSICAO ATUAL (upsert)
+# ============================================================
+
+_CAMPOS_POSICAO = (
+    'latitude', 'longitude', 'precisao', 'velocidade', 'direcao',
+    'distancia_destino', 'bateria_nivel', 'bateria_carregando', 'registrado_em',
+)
+
+
+def atualizar_posicao_atual(rastreamento_id, ping, novos_pings=1):
+    """
+    Upsert da linha de posicoes_atuais_rastreamento.
+
+    `ping` e um dict com as chaves de _CAMPOS_POSICAO. Um lote atrasado (ping
+    mais antigo que o ja gravado) so soma em total_pings — nao regride a posicao.
+    Nao faz commit.
+    """
+    agora = agora_utc_naive()
+    valores = {c: ping.get(c) for c in _CAMPOS_POSICAO}
+
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        tabela = PosicaoAtualRastreamento.__table__
+        stmt = pg_insert(tabela).values(
+            rastreamento_id=rastreamento_id, atualizado_em=agora,
+            total_pings=novos_pings, **valores,
+        )
+        mais_novo = stmt.excluded.registrado_em >= tabela.c.registrado_em
+        set_ = {
+            c: case((mais_novo, stmt.excluded[c]), else_=tabela.c[c])
+            for c in _CAMPOS_POSICAO
+        }
+        set_['atualizado_em'] = stmt.excluded.atualizado_em
+        set_['total_pings'] = tabela.c.total_pings + novos_pings
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[tabela.c.rastreamento_id], set_=set_,
+        ))
+        return
+
+    posicao = db.session.get(PosicaoAtualRastreamento, rastreamento_id)
+    if posicao is None:
+        db.session.add(PosicaoAtualRastreamento(
+            rastreamento_id=rastreamento_id, atualizado_em=agora,
+            total_pings=novos_pings, **valores,
+        ))
+        return
+    if valores['registrado_em'] >= posicao.registrado_em:
+        for campo, valor in valores.items():
+            setattr(posicao, campo, valor)
+    posicao.atualizado_em = agora
+    posicao.total_pings = (posicao.total_pings or 0) + novos_pings
+
+
+# ============================================================
+# INGESTAO EM LOTE
+# ============================================================
+
+def _parse_timestamp(valor, agora):
+    """ISO do dispositivo -> datetime UTC naive (futuro e limitado a agora)."""
+    if not valor:
+        return None
+    ts = datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(ts, agora)
+
+
+def normalizar_pings(pings_brutos, agora=None):
+    """
+    Valida e ordena pings recebidos -> (lista de dicts prontos, rejeitados).
+
+    Ordem: timestamp do dispositivo (pings bufferizados chegam fora de ordem
+    apos reconexao); sem timestamp, mantem a ordem de chegada no fim.
+    """
+    agora = agora or agora_utc_naive()
+    validos = []
+    rejeitados = 0
+    for posicao, bruto in enumerate(pings_brutos or []):
+        if not isinstance(bruto, dict):
+            rejeitados += 1
+            continue
+        lat, lon = bruto.get('latitude'), bruto.get('longitude')
+        if not GPSService.validar_coordenadas(lat, lon):
+            rejeitados += 1
+            continue
+        try:
+            ts_dispositivo = _parse_timestamp(bruto.get('timestamp'), agora)
+        except (TypeError, ValueError):
+            rejeitados += 1
+            continue
+        validos.append({
+            'latitude': float(lat),
+            'longitude': float(lon),
+            'precisao': bruto.get('precisao'),
+            'altitude': bruto.get('altitude'),
+            'velocidade': bruto.get('velocidade'),
+            'direcao': bruto.get('direcao'),
+            'bateria_nivel': bruto.get('bateria_nivel'),
+            'bateria_carregando': bool(bruto.get('bateria_carregando', False)),
+            'timestamp_dispositivo': ts_dispositivo,
+            # Ping bufferizado vale pelo horario em que foi coletado
+            'criado_em': ts_dispositivo or agora,
+            '_ordem': posicao,
+        })
+    validos.sort(key=lambda p: (p['timestamp_dispositivo'] is None,
+                                p['timestamp_dispositivo'] or agora, p['_ordem']))
+    for p in validos:
+        del p['_ordem']
+    return validos, rejeitados
+
+
+def ingerir_lote(rastreamento, pings_brutos):
+    """
+    Grava um lote de pings de um rastreamento ATIVO.
+
+    Mesmas regras do ping individual: distancia ao destino, CHEGOU_DESTINO
+    quando dentro do raio configurado, entregas PENDENTE -> PROXIMO a menos
+    de 200m (considerando TODOS os pings do lote, nao so o ultimo).
+
+    Returns:
+        dict {aceitos, rejeitados, distancia_destino, status, entregas_proximas}
+    """
+    agora = agora_utc_naive()
+    pings, rejeitados = normalizar_pings(pings_brutos, agora)
+    if not pings:
+        return {'aceitos': 0, 'rejeitados': rejeitados, 'distancia_destino': None,
+                'status': rastreamento.status, 'entregas_proximas': []}
+
+    ctx = obter_contexto(rastreamento)
+
+    for p in pings:
+        p['distancia_destino'] = GPSService.calcular_distancia(
+            (p['latitude'], p['longitude']), ctx.coord_destino, 'metros'
+        ) if ctx.coord_destino else None
+
+    db.session.execute(insert(PingGPS), [
+        dict(p, rastreamento_id=rastreamento.id) for p in pings
+    ])
+
+    # Entregas: geofence ping a ping (vetorizado), menor distancia enquanto dentro
+    motor = obter_motor()
+    motor.sincronizar(rastreamento.id, [
+        CercaEntrega(entrega_id, lat, lon, RAIO_PROXIMIDADE_METROS)
+        for entrega_id, lat, lon in ctx.entregas
+    ])
+    proximas = {}
+    for dentro, _eventos in motor.processar_lote([
+        (rastreamento.id, p['latitude'], p['longitude'],
+         p['criado_em'].replace(tzinfo=timezone.utc).timestamp())
+        for p in pings
+    ]):
+        for entrega_id, distancia in dentro:
+            if entrega_id not in proximas or distancia < proximas[entrega_id]:
+                proximas[entrega_id] = distancia
+    if proximas:
+        resultado = db.session.execute(
+            update(EntregaRastreada)
+            .where(EntregaRastreada.id.in_(list(proximas)),
+                   EntregaRastreada.status == 'PENDENTE')
+            .values(status='PROXIMO')
+        )
+        if resultado.rowcount:
+            current_app.logger.info(
+                f"📍 Embarque #{rastreamento.embarque_id}: {resultado.rowcount} entrega(s) PROXIMO (lote)"
+            )
+
+    # Chegada ao destino (logica do ping individual, ping a ping)
+    for p in pings:
+        distancia = p['distancia_destino']
+        if not distancia or distancia > ctx.distancia_chegada:
+            continue
+        if rastreamento.status != 'CHEGOU_DESTINO':
+            rastreamento.status = 'CHEGOU_DESTINO'
+            rastreamento.chegou_destino_em = agora
+            rastreamento.distancia_minima_atingida = distancia
+            rastreamento.registrar_log(
+                evento='CHEGADA_DESTINO',
+                detalhes=json.dumps({
+                    'distancia_metros': distancia,
+                    'latitude': p['latitude'],
+                    'longitude': p['longitude'],
+                    'entregas_proximas': len(proximas),
+                    'lote': True,
+                })
+            )
+        if rastreamento.distancia_minima_atingida is None or distancia < rastreamento.distancia_minima_atingida:
+            rastreamento.distancia_minima_atingida = distancia
+
+    ultimo = pings[-1]
+    rastreamento.ultimo_ping_em = agora
+    atualizar_posicao_atual(
+        rastreamento.id, dict(ultimo, registrado_em=ultimo['criado_em']), len(pings),
+    )
+    db.session.commit()
+
+    return {
+        'aceitos': len(pings),
+        'rejeitados': rejeitados,
+        'distancia_destino': ultimo['distancia_destino'],
+        'status': rastreamento.status,
+        'entregas_proximas': [
+            {'id': eid, 'distancia': dist}
+            for eid, dist in sorted(proximas.items(), key=lambda x: x[1])
+        ],
+    }
+
+
+# ============================================================
+# COMPACTACAO DE TRAJETORIA (Douglas-Peucker com limite de tempo)
+# ============================================================
+
+def _projetar(pontos):
+    """Projecao equiretangular local (metros) em torno do primeiro ponto."""
+    lat0 = math.radians(pontos[0][0])
+    cos_lat0 = math.cos(lat0)
+    return [
+        (math.radians(lon) * _RAIO_TERRA_METROS * cos_lat0,
+         math.radians(lat) * _RAIO_TERRA_METROS)
+        for lat, lon, _t in pontos
+    ]
+
+
+def _distancia_segmento(p, a, b):
+    """Distancia do ponto p ao segmento ab (plano, metros)."""
+    ax, ay = a
+    bx, by = b
+    dx, dy = bx - ax, by - ay
+    comprimento2 = dx * dx + dy * dy
+    if comprimento2 == 0:
+        return math.hypot(p[0] - ax, p[1] - ay)
+    t = max(0.0, min(1.0, ((p[0] - ax) * dx + (p[1] - ay) * dy) / comprimento2))
+    return math.hypot(p[0] - (ax + t * dx), p[1] - (ay + t * dy))
+
+
+def simplificar_trajetoria(pontos: Sequence[Tuple[float, float, float]],
+                           tolerancia_metros: float = 15.0,
+                           max_intervalo_s: float = 300.0) -> List[int]:
+    """
+    Douglas-Peucker com limite de tempo.
+
+    Args:
+        pontos: [(lat, lon, epoch_s)] em ordem cronologica
+        tolerancia_metros: desvio maximo do trecho simplificado
+        max_intervalo_s: intervalo maximo entre pontos mantidos — parada longa
+            numa reta nao vira 1 segmento sem horario (paradas ficam visiveis)
+
+    Returns:
+        Indices dos pontos mantidos (sempre inclui o primeiro e o ultimo)
+    """
+    n = len(pontos)
+    if n <= 2:
+        return list(range(n))
+
+    xy = _projetar(pontos)
+    manter = [False] * n
+    manter[0] = manter[-1] = True
+    pilha = [(0, n - 1)]
+    while pilha:
+        i, j = pilha.pop()
+        if j - i < 2:
+            continue
+        maior, indice = -1.0, i + 1
+        for k in range(i + 1, j):
+            d = _distancia_segmento(xy[k], xy[i], xy[j])
+            if d > maior:
+                maior, indice = d, k
+        if maior <= tolerancia_metros:
+            if pontos[j][2] - pontos[i][2] <= max_intervalo_s:
+                continue
+            # Trecho reto mas longo no tempo: divide pelo meio do intervalo
+            meio = (pontos[i][2] + pontos[j][2]) / 2
+            indice = min(range(i + 1, j), key=lambda k: abs(pontos[k][2] - meio))
+        manter[indice] = True
+        pilha.append((i, indice))
+        pilha.append((indice, j))
+    return [k for k in range(n) if manter[k]]
+
+
+def dividir_por_lacunas(pontos, gap_s):
+    """Quebra a trajetoria onde o intervalo entre pings passa de gap_s."""
+    trechos, atual = [], []
+    for ponto in pontos:
+        if atual and ponto[2] - atual[-1][2] > gap_s:
+            trechos.append(atual)
+            atual = []
+        atual.append(ponto)
+    if atual:
+        trechos.append(atual)
+    return trechos
+
+
+def compactar_rastreamento(rastreamento_id, remover_pings=True):
+    """
+    Compacta os pings de um rastreamento em segmentos_trajetoria.
+
+    Idempotente: rastreamento que ja tem segmentos e ignorado. Nao faz commit.
+
+    Returns:
+        tuple (pings_lidos, pontos_mantidos)
+    """
+    if db.session.query(SegmentoTrajetoria.id).filter_by(rastreamento_id=rastreamento_id).first():
+        return 0, 0
+
+    tolerancia = _env_float('RASTREAMENTO_TOLERANCIA_METROS', 15.0)
+    max_intervalo = _env_float('RASTREAMENTO_MAX_INTERVALO_S', 300.0)
+    gap = _env_float('RASTREAMENTO_GAP_SEGMENTO_S', 1800.0)
+
+    linhas = db.session.query(
+        PingGPS.latitude, PingGPS.longitude, PingGPS.criado_em,
+    ).filter(
+        PingGPS.rastreamento_id == rastreamento_id
+    ).order_by(PingGPS.criado_em.asc(), PingGPS.id.asc()).all()
+    if not linhas:
+        return 0, 0
+
+    pontos = [
+        (lat, lon, criado_em.replace(tzinfo=timezone.utc).timestamp())
+        for lat, lon, criado_em in linhas
+    ]
+    mantidos = 0
+    segmentos = []
+    for trecho in dividir_por_lacunas(pontos, gap):
+        indices = simplificar_trajetoria(trecho, tolerancia, max_intervalo)
+        mantidos += len(indices)
+        segmentos.append({
+            'rastreamento_id': rastreamento_id,
+            'inicio_em': datetime.fromtimestamp(trecho[0][2], timezone.utc).replace(tzinfo=None),
+            'fim_em': datetime.fromtimestamp(trecho[-1][2], timezone.utc).replace(tzinfo=None),
+            'pontos': [
+                [round(trecho[k][0], 6), round(trecho[k][1], 6), int(trecho[k][2])]
+                for k in indices
+            ],
+            'pontos_originais': len(trecho),
+            'tolerancia_metros': tolerancia,
+            'criado_em': agora_utc_naive(),
+        })
+    db.session.execute(insert(SegmentoTrajetoria), segmentos)
+
+    if remover_pings:
+        PingGPS.query.filter_by(rastreamento_id=rastreamento_id).delete(synchronize_session=False)
+
+    return len(pontos), mantidos
+
+
+def historico_de_segmentos(rastreamento_id):
+    """Pontos dos segmentos compactados no formato do historico_rota da tela de detalhes."""
+    historico = []
+    for segmento in SegmentoTrajetoria.query.filter_by(
+        rastreamento_id=rastreamento_id
+    ).order_by(SegmentoTrajetoria.inicio_em.asc()):
+        for lat, lon, epoch in segmento.pontos:
+            historico.append({
+                'latitude': lat,
+                'longitude': lon,
+                'timestamp': datetime.fromtimestamp(epoch, timezone.utc).strftime('%d/%m/%Y %H:%M:%S'),
+                'distancia_destino': None,
+                'velocidade': None,
+            })
+    return historico
+
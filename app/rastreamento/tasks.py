@@ -166,3 +166,57 @@ def gerar_relatorio_rastreamento():
     except Exception as e:
         current_app.logger.error(f"❌ Erro ao gerar relatório: {str(e)}")
         return False
+
+
+def compactar_trajetorias_finalizadas(limite=200):
+    """
+    Job diario: compacta os pings de rastreamentos finalizados em
+    segmentos_trajetoria (Douglas-Peucker) e remove os pings brutos.
+
+    So entra rastreamento ENTREGUE/CANCELADO/EXPIRADO finalizado ha mais de
+    RASTREAMENTO_COMPACTAR_APOS_DIAS (padrao 2) e ainda sem segmentos.
+    Commit por rastreamento: falha em um nao perde o que ja foi compactado.
+
+    Returns:
+        tuple: (total_compactado, pings_removidos, total_erros)
+    """
+    import os
+    from datetime import timedelta
+    from app.rastreamento.models import SegmentoTrajetoria
+    from app.rastreamento.services.ingestao_pings_service import compactar_rastreamento
+
+    dias = int(os.environ.get('RASTREAMENTO_COMPACTAR_APOS_DIAS', '2'))
+    corte = agora_utc_naive() - timedelta(days=dias)
+
+    ja_compactados = db.session.query(SegmentoTrajetoria.rastreamento_id)
+    ids = [
+        rid for (rid,) in db.session.query(RastreamentoEmbarque.id).filter(
+            RastreamentoEmbarque.status.in_(['ENTREGUE', 'CANCELADO', 'EXPIRADO']),
+            # EXPIRADO nao grava rastreamento_finalizado_em
+            db.func.coalesce(
+                RastreamentoEmbarque.rastreamento_finalizado_em,
+                RastreamentoEmbarque.ultimo_ping_em,
+                RastreamentoEmbarque.criado_em,
+            ) <= corte,
+            ~RastreamentoEmbarque.id.in_(ja_compactados),
+        ).order_by(RastreamentoEmbarque.id).limit(limite)
+    ]
+
+    total_compactado = 0
+    pings_removidos = 0
+    total_erros = 0
+    for rastreamento_id in ids:
+        try:
+            lidos, mantidos = compactar_rastreamento(rastreamento_id)
+            db.session.commit()
+            total_compactado += 1
+            pings_removidos += lidos
+            current_app.logger.info(
+                f"🗜️ Rastreamento #{rastreamento_id} compactado: {lidos} pings -> {mantidos} pontos"
+            )
+        except Exception as e:
+            db.session.rollback()
+            total_erros += 1
+            current_app.logger.error(f"❌ Erro ao compactar rastreamento #{rastreamento_id}: {str(e)}")
+
+    return (total_compactado, pings_removidos, total_erros)
@@ -82,27 +82,55 @@ def transmitir_nfe_via_playwright(
         logger.error("[playwright] ODOO_USERNAME nao configurado")
         return {'sucesso': False, 'erro': 'odoo_username_ausente', 'tentativas': 0}
 
+    from app.utils.browser_pool import obter_pool, pool_habilitado
+
+    # Pool do worker: navegador reaproveitado entre transmissoes, contexto
+    # isolado por invoice. Sem pool: launch proprio (comportamento anterior).
+    pool = obter_pool() if pool_habilitado() else None
+    emprestimo = None
+    pw = None
     browser = None
+    context = None
+    context_kwargs = {
+        'viewport': {'width': 1920, 'height': 1080},
+        'ignore_https_errors': True,
+    }
+
+    def _novo_contexto(relancar=False):
+        """Fecha o contexto atual (se houver) e abre outro; relanca o navegador se pedido."""
+        nonlocal emprestimo, pw, browser, context
+        if pool is not None:
+            # O pool detecta navegador morto no health check e relanca sozinho
+            emprestimo = pool.renovar(emprestimo) if emprestimo else pool.emprestar('odoo_web', **context_kwargs)
+            context = emprestimo.context
+            return context
+        if context is not None:
+            try:
+                context.close()
+            except Exception:
+                pass
+        if relancar and browser is not None:
+            try:
+                browser.close()
+            except Exception:
+                pass
+            browser = None
+        if pw is None:
+            pw = sync_playwright().start()
+        if browser is None:
+            browser = pw.chromium.launch(headless=True)
+        context = browser.new_context(**context_kwargs)
+        return context
+
     try:
-        pw = sync_playwright().start()
-        browser = pw.chromium.launch(headless=True)
-        context = browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            ignore_https_errors=True,
-        )
-        page = context.new_page()
+        page = _novo_contexto().new_page()
 
         # Login
         if not _login_odoo(page, context, logger):
             # Retry login uma vez
             logger.warning("[playwright] Primeiro login falhou, tentando novamente...")
             page.close()
-            context.close()
-            context = browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                ignore_https_errors=True,
-            )
-            page = context.new_page()
+            page = _novo_contexto().new_page()
             if not _login_odoo(page, context, logger):
                 return {'sucesso': False, 'erro': 'login_falhou', 'tentativas': 0}
 
@@ -245,16 +273,7 @@ def transmitir_nfe_via_playwright(
                     logger.warning(
                         "  [playwright] Browser crash detectado. Re-inicializando..."
                     )
-                    try:
-                        browser.close()
-                    except Exception:
-                        pass
-                    browser = pw.chromium.launch(headless=True)
-                    context = browser.new_context(
-                        viewport={'width': 1920, 'height': 1080},
-                        ignore_https_errors=True,
-                    )
-                    page = context.new_page()
+                    page = _novo_contexto(relancar=True).new_page()
                     if not _login_odoo(page, context, logger):
                         return {
                             'sucesso': False,
@@ -368,15 +387,18 @@ def transmitir_nfe_via_playwright(
             'tentativas': 0,
         }
     finally:
+        if emprestimo is not None:
+            pool.devolver(emprestimo)
         if browser:
             try:
                 browser.close()
             except Exception:
                 pass
-        try:
-            pw.stop()
-        except Exception:
-            pass
+        if pw is not None:
+            try:
+                pw.stop()
+            except Exception:
+                pass
 
 
 # =====================================================================
@@ -2625,9 +2625,34 @@ class RecebimentoLfOdooService:
         def fire_noop():
             return None
 
+        espera_invoice = None
+        if picking_name:
+            from app.odoo.utils.poll_coordinator import EsperaOdoo
+
+            def _preferir_ref(registros):
+                for registro in sorted(registros, key=lambda r: r['id'], reverse=True):
+                    if registro.get('ref') == picking_name:
+                        return registro['id']
+                return max((r['id'] for r in registros), default=None)
+
+            espera_invoice = EsperaOdoo(
+                'account.move',
+                [
+                    ['company_id', '=', self.COMPANY_FB],
+                    ['state', '!=', 'cancel'],
+                    '|',
+                    ['ref', '=', picking_name],
+                    ['invoice_origin', 'ilike', picking_name],
+                ],
+                fields=['id', 'ref'],
+                predicado=_preferir_ref,
+                rotulo=f'invoice transfer {picking_name}',
+            )
+
         invoice_id = self._fire_and_poll(
             odoo, fire_noop, poll_invoice, 'Aguardar Invoice Transfer',
-            poll_interval=40, max_poll_time=1800  # 30min (robo age apos liberar, poll a cada 40s)
+            poll_interval=40, max_poll_time=1800,  # 30min (robo age apos liberar, poll a cada 40s)
+            espera=espera_invoice,
         )
 
         if isinstance(invoice_id, dict):
@@ -4325,7 +4350,8 @@ class RecebimentoLfOdooService:
                 pass
 
     def _fire_and_poll(self, odoo, fire_fn, poll_fn, step_name,
-                       fire_timeout=None, poll_interval=None, max_poll_time=None):
+                       fire_timeout=None, poll_interval=None, max_poll_time=None,
+                       espera=None):
         """
         Padrao Fire and Poll: dispara acao no Odoo com timeout curto e polla ate resultado.
 
@@ -4346,6 +4372,10 @@ class RecebimentoLfOdooService:
             fire_timeout: timeout do fire (default FIRE_TIMEOUT=60s)
             poll_interval: intervalo entre polls (default POLL_INTERVAL=10s)
             max_poll_time: tempo maximo de polling (default MAX_POLL_TIME=1800s)
+            espera: EsperaOdoo opcional — quando informada, o polling vai para o
+                coordenador central (app/odoo/utils/poll_coordinator.py), que
+                agrupa as esperas concorrentes em um search_read por model.
+                poll_fn continua sendo a verificacao final apos o timeout.
 
         Returns:
             Resultado retornado por fire_fn (se nao deu timeout) ou poll_fn (se deu timeout)
@@ -4398,6 +4428,33 @@ class RecebimentoLfOdooService:
                 return fire_result
 
         # 2. POLL — verificar resultado periodicamente
+        if espera is not None:
+            from app.odoo.utils.poll_coordinator import aguardar_odoo
+
+            def _ao_aguardar(decorrido):
+                self._release_db_session()
+                rec = self._get_recebimento()
+                self._atualizar_redis(
+                    rec.id,
+                    rec.fase_atual or 1,
+                    rec.etapa_atual or 1,
+                    rec.total_etapas,
+                    f'Aguardando {step_name}... {int(decorrido)}s'
+                )
+
+            self._release_db_session()
+            poll_result = aguardar_odoo(
+                espera, timeout_s=max_poll_time, intervalo_s=poll_interval,
+                poll_fn=poll_fn, ao_aguardar=_ao_aguardar,
+                connection=odoo,
+            )
+            if poll_result:
+                logger.info(f"  [{step_name}] Resultado encontrado via coordenador de polling")
+                return poll_result
+            raise TimeoutError(
+                f"[{step_name}] Polling expirou apos {max_poll_time}s sem resultado"
+            )
+
         elapsed = 0
         poll_count = 0
         while elapsed < max_poll_time:
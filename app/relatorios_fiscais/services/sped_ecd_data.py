@@ -16,7 +16,10 @@ Autor: Sistema de Fretes
 Data: 2026-05-14
 """
 
+import hashlib
+import json
 import logging
+import os
 from datetime import date, timedelta
 from typing import Dict, Generator, List, Tuple, Union
 
@@ -735,12 +738,18 @@ def calcular_saldos_periodicos_mensais(
     date_fim: date,
     id_to_code: Dict[int, str],
     companies: List[int] = None,
+    executor=None,
+    usar_cache: bool = True,
 ) -> Dict[str, dict]:
     """
     Calcula saldos mensais (I150/I155) para o periodo, consolidando POR CODE.
 
     Args:
         companies: lista de company_ids; default = COMPANIES_ECD.
+        executor: ExecutorOdoo opcional — os read_group de cada mes rodam em
+                  paralelo (1 conexao por thread). None = serial.
+        usar_cache: reaproveita saldos brutos de meses FECHADOS ja calculados
+                    em geracoes anteriores (Redis, ver _saldos_brutos_meses).
 
     Returns:
         {
@@ -755,6 +764,7 @@ def calcular_saldos_periodicos_mensais(
 
     resultado = {}
 
+    meses = []
     cursor_mes = date(date_ini.year, date_ini.month, 1)
     while cursor_mes <= date_fim:
         # Calcular fim do mes
@@ -762,25 +772,12 @@ def calcular_saldos_periodicos_mensais(
         ult_dia_mes = prox_mes - timedelta(days=1)
         if ult_dia_mes > date_fim:
             ult_dia_mes = date_fim
+        meses.append((cursor_mes, ult_dia_mes))
+        cursor_mes = prox_mes
 
-        # Saldo inicial do mes (acumulado ate dia anterior ao cursor)
-        saldos_iniciais_por_acc = _read_group_balance(
-            connection,
-            domain_extra=[['date', '<', cursor_mes.strftime('%Y-%m-%d')]],
-            companies=companies,
-        )
-
-        # Movimento do mes (entre cursor e ult_dia_mes)
-        movimentos_por_acc = _read_group_balance(
-            connection,
-            domain_extra=[
-                ['date', '>=', cursor_mes.strftime('%Y-%m-%d')],
-                ['date', '<=', ult_dia_mes.strftime('%Y-%m-%d')],
-            ],
-            with_debit_credit=True,
-            companies=companies,
-        )
+    brutos = _saldos_brutos_meses(connection, meses, companies, executor, usar_cache)
 
+    for (cursor_mes, ult_dia_mes), (saldos_iniciais_por_acc, movimentos_por_acc) in zip(meses, brutos):
         # Consolidar por code (R5)
         # Mitigacao code-review BLOCKER #5: rastreia acc_ids ja somados no inicial
         # para nao perder saldo inicial de acc_ids do mesmo code (multi-company)
@@ -825,14 +822,210 @@ def calcular_saldos_periodicos_mensais(
             'por_code': por_code,
         }
 
-        cursor_mes = prox_mes
-
     logger.info(
         f'[SPED ECD] Saldos periodicos mensais: {len(resultado)} meses processados'
     )
     return resultado
 
 
+# ============================================================
+# SALDOS BRUTOS POR MES (read_group por account_id) + CACHE
+# ============================================================
+# Saldos brutos (por account_id, antes do id_to_code) de um mes FECHADO nao
+# mudam entre geracoes do mesmo periodo — o contador costuma gerar o ECD
+# varias vezes seguidas (validar no PVA, corrigir cadastro, gerar de novo).
+# Cache no Redis por (companies, inicio, fim do mes), TTL
+# SPED_ECD_SALDOS_CACHE_TTL (default 12h; 0 desliga). Mes corrente/aberto nunca
+# e cacheado. "Fechado" pelo calendario nao basta: lancamento retroativo,
+# estorno ou volta a rascunho mudam o mes — cada entrada guarda um WATERMARK
+# (contagem, max write_date e max id das linhas postadas de cada mes ate o fim
+# do mes, acumulado: o saldo inicial depende de todo o historico), lido num
+# unico read_group por date:month. Watermark diferente = entrada ignorada.
+# O cache guarda o bruto por account_id (nao por code): mudancas de plano de
+# contas entre geracoes continuam refletidas.
+
+_CACHE_SALDOS_PREFIX = 'sped_ecd:saldos_mes'
+
+
+def _saldos_cache_ttl() -> int:
+    return int(os.getenv('SPED_ECD_SALDOS_CACHE_TTL', '43200'))
+
+
+def _saldos_cache_redis():
+    if _saldos_cache_ttl() <= 0:
+        return None
+    try:
+        from app.utils.redis_cache import redis_cache
+    except Exception:
+        return None
+    return redis_cache.client if redis_cache.disponivel else None
+
+
+def _chave_cache_saldos(companies: List[int], ini: date, fim: date) -> str:
+    comps = companies if companies is not None else COMPANIES_ECD
+    return (
+        f'{_CACHE_SALDOS_PREFIX}:{",".join(str(c) for c in sorted(comps))}:'
+        f'{ini.isoformat()}:{fim.isoformat()}'
+    )
+
+
+def _mes_fechado(fim: date) -> bool:
+    from app.utils.timezone import agora_utc_naive
+    hoje = agora_utc_naive().date()
+    return fim < date(hoje.year, hoje.month, 1)
+
+
+def _watermarks_meses(connection, fins: List[date],
+                      companies: List[int] = None) -> Dict[date, str]:
+    """Watermark acumulado de account.move.line postadas ate cada data de `fins`.
+
+    Um read_group por date:month (lazy=False) com __count, write_date:max e
+    id:max; o watermark do mes e o hash de todos os grupos ate ele.
+    """
+    comps = companies if companies is not None else COMPANIES_ECD
+    ate = max(fins)
+    grupos = connection.execute_kw(
+        'account.move.line', 'read_group',
+        [[
+            ['parent_state', '=', 'posted'],
+            ['company_id', 'in', comps],
+            ['date', '<=', ate.strftime('%Y-%m-%d')],
+        ]],
+        {'fields': ['write_date:max', 'id:max'], 'groupby': ['date:month'], 'lazy': False},
+        timeout_override=TIMEOUT_QUERY_PESADA,
+    )
+
+    por_mes = []
+    for grupo in grupos:
+        intervalo = (grupo.get('__range') or {}).get('date:month') or {}
+        inicio = intervalo.get('from')
+        if not inicio:
+            inicio = next(
+                (valor for campo, op, valor in grupo.get('__domain', [])
+                 if campo == 'date' and op == '>='),
+                None,
+            )
+        if not inicio:
+            raise ValueError(f'grupo date:month sem intervalo: {grupo}')
+        por_mes.append((
+            str(inicio)[:7],
+            grupo.get('__count', 0),
+            str(grupo.get('write_date') or ''),
+            grupo.get('id') or 0,
+        ))
+    por_mes.sort()
+
+    marcas = {}
+    for fim in fins:
+        ate_fim = [g for g in por_mes if g[0] <= fim.strftime('%Y-%m')]
+        marcas[fim] = hashlib.sha1(json.dumps(ate_fim).encode()).hexdigest()
+    return marcas
+
+
+def _buscar_saldos_brutos_mes(connection, ini: date, fim: date,
+                              companies: List[int] = None) -> Tuple[dict, list]:
+    """(saldo inicial por acc_id ate ini-1, movimentos [(acc, D, C, saldo)] de ini a fim)."""
+    # Saldo inicial do mes (acumulado ate dia anterior ao cursor)
+    saldos_iniciais_por_acc = _read_group_balance(
+        connection,
+        domain_extra=[['date', '<', ini.strftime('%Y-%m-%d')]],
+        companies=companies,
+    )
+
+    # Movimento do mes (entre cursor e ult_dia_mes)
+    movimentos_por_acc = _read_group_balance(
+        connection,
+        domain_extra=[
+            ['date', '>=', ini.strftime('%Y-%m-%d')],
+            ['date', '<=', fim.strftime('%Y-%m-%d')],
+        ],
+        with_debit_credit=True,
+        companies=companies,
+    )
+    return saldos_iniciais_por_acc, movimentos_por_acc
+
+
+def _saldos_brutos_meses(connection, meses: List[Tuple[date, date]],
+                         companies: List[int] = None, executor=None,
+                         usar_cache: bool = True) -> List[Tuple[dict, list]]:
+    """
+    Saldos brutos de cada (inicio, fim) em `meses`, na mesma ordem.
+
+    Meses fechados vem do cache quando o watermark confere; os demais sao
+    buscados no Odoo — em paralelo se houver executor — e os fechados sao
+    gravados com o watermark lido ANTES da busca (lancamento durante a busca
+    invalida a entrada na proxima geracao).
+    """
+    client = _saldos_cache_redis() if usar_cache else None
+    resultado = [None] * len(meses)
+
+    marcas: Dict[date, str] = {}
+    fins_fechados = [fim for _, fim in meses if _mes_fechado(fim)]
+    if client is not None and fins_fechados:
+        try:
+            marcas = _watermarks_meses(connection, fins_fechados, companies)
+        except Exception as e:
+            logger.warning(f'[SPED ECD] watermark dos saldos falhou, cache ignorado: {e}')
+            client = None
+
+    if client is not None:
+        for i, (ini, fim) in enumerate(meses):
+            if fim not in marcas:
+                continue
+            try:
+                bruto = client.get(_chave_cache_saldos(companies, ini, fim))
+            except Exception as e:
+                logger.debug(f'[SPED ECD] get cache saldos falhou: {e}')
+                bruto = None
+            if bruto:
+                dados = json.loads(bruto)
+                if dados.get('watermark') != marcas[fim]:
+                    continue
+                resultado[i] = (
+                    {int(acc): bal for acc, bal in dados['iniciais']},
+                    [tuple(t) for t in dados['movimentos']],
+                )
+
+    faltantes = [i for i, r in enumerate(resultado) if r is None]
+    logger.info(
+        f'[SPED ECD] Saldos mensais: {len(meses) - len(faltantes)} meses do cache, '
+        f'{len(faltantes)} do Odoo'
+    )
+
+    if executor is not None:
+        futuros = {
+            i: executor.submit(_buscar_saldos_brutos_mes, meses[i][0], meses[i][1], companies)
+            for i in faltantes
+        }
+        for i, futuro in futuros.items():
+            resultado[i] = futuro.result()
+    else:
+        for i in faltantes:
+            resultado[i] = _buscar_saldos_brutos_mes(
+                connection, meses[i][0], meses[i][1], companies,
+            )
+
+    if client is not None:
+        for i in faltantes:
+            ini, fim = meses[i]
+            if fim not in marcas:
+                continue
+            iniciais, movimentos = resultado[i]
+            try:
+                client.setex(
+                    _chave_cache_saldos(companies, ini, fim), _saldos_cache_ttl(),
+                    json.dumps({
+                        'watermark': marcas[fim],
+                        'iniciais': list(iniciais.items()),
+                        'movimentos': [list(t) for t in movimentos],
+                    }),
+                )
+            except Exception as e:
+                logger.debug(f'[SPED ECD] setex cache saldos falhou: {e}')
+
+    return resultado
+
+
 def _read_group_balance(
     connection,
     domain_extra: List = None,
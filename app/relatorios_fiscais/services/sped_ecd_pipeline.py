@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline de geracao do SPED ECD (extracao concorrente + saida incremental)
+===========================================================================
+
+A geracao anual era 100% serial: cada read_group/search_read do Odoo so
+comecava depois que o anterior (e a escrita das linhas) terminava, e o
+arquivo inteiro ficava num BytesIO ate o upload final.
+
+Pecas deste modulo:
+- ExecutorOdoo: pool de threads onde CADA thread usa sua propria
+  OdooConnection (ServerProxy XML-RPC nao e thread-safe e execute_kw com
+  timeout_override recria self._models). Sem pipeline (flag off ou
+  workers=0) executa sincrono — mesmo codigo nos dois modos.
+- prefetch(): consome um generator numa thread produtora com fila limitada.
+  Usado no stream de lancamentos: o chunk N+1 e buscado no Odoo enquanto o
+  chunk N vira I200/I250 (I/O sobreposto a formatacao, RAM limitada pela fila).
+- SaidaMultipartS3: destino de escrita que grava num arquivo temporario e
+  envia ao S3 em partes (multipart upload) a medida que o arquivo cresce.
+
+Flags (env):
+    SPED_ECD_PIPELINE_ENABLED (default true)
+    SPED_ECD_PIPELINE_WORKERS (default 4) — conexoes Odoo paralelas
+    SPED_ECD_PREFETCH_LANCAMENTOS (default 2000) — moves na fila do prefetch
+    SPED_ECD_MULTIPART_MB (default 8, minimo 5 — limite do S3)
+
+Autor: Sistema de Fretes
+Data: 2026-10-19
+"""
+
+import functools
+import logging
+import os
+import queue
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_FIM = object()
+
+
+def pipeline_habilitado() -> bool:
+    return os.getenv('SPED_ECD_PIPELINE_ENABLED', 'true').lower() == 'true'
+
+
+def _workers_padrao() -> int:
+    if not pipeline_habilitado():
+        return 0
+    return max(0, int(os.getenv('SPED_ECD_PIPELINE_WORKERS', '4')))
+
+
+def profundidade_prefetch() -> int:
+    return max(1, int(os.getenv('SPED_ECD_PREFETCH_LANCAMENTOS', '2000')))
+
+
+@functools.lru_cache(maxsize=1)
+def _classe_conexao_paralela():
+    from app.odoo.utils.connection import OdooConnection
+    from app.relatorios_fiscais.services.sped_ecd_constantes import TIMEOUT_QUERY_PESADA
+
+    class ConexaoParalela(OdooConnection):
+        """
+        OdooConnection para threads do pipeline.
+
+        execute_kw com timeout_override chama socket.setdefaulttimeout (GLOBAL
+        do processo). Com varias threads, uma consulta pesada poderia abrir o
+        socket com o timeout curto setado por outra thread — aqui todas usam o
+        mesmo timeout (o maior), eliminando a corrida.
+        """
+
+        def execute_kw(self, model, method, args, kwargs=None, timeout_override=None,
+                       expected_timeout=False):
+            timeout = max(timeout_override or 0, TIMEOUT_QUERY_PESADA)
+            return super().execute_kw(
+                model, method, args, kwargs,
+                timeout_override=timeout, expected_timeout=expected_timeout,
+            )
+
+    return ConexaoParalela
+
+
+def clonar_conexao(connection):
+    """
+    Nova conexao Odoo com a mesma configuracao (para uso em outra thread).
+
+    Reaproveita o uid ja autenticado (evita 1 authenticate por thread).
+    Objetos que nao sao OdooConnection (ex: fakes de teste) sao devolvidos
+    como estao.
+    """
+    from app.odoo.utils.connection import OdooConnection
+
+    if not isinstance(connection, OdooConnection):
+        return connection
+    clone = _classe_conexao_paralela()({
+        'url': connection.url,
+        'database': connection.database,
+        'username': connection.username,
+        'api_key': connection.api_key,
+        'timeout': connection.timeout,
+        'retry_attempts': connection.retry_attempts,
+    })
+    clone._uid = connection._uid
+    return clone
+
+
+def _com_app_context(func: Callable) -> Callable:
+    """Propaga o app context Flask (se houver) para a thread de destino."""
+    try:
+        from flask import current_app, has_app_context
+    except ImportError:
+        return func
+    if not has_app_context():
+        return func
+    app = current_app._get_current_object()
+
+    def _rodar(*args, **kwargs):
+        with app.app_context():
+            return func(*args, **kwargs)
+    return _rodar
+
+
+# ============================================================
+# EXECUTOR COM 1 CONEXAO ODOO POR THREAD
+# ============================================================
+
+class ExecutorOdoo:
+    """
+    Pool de threads para consultas Odoo independentes.
+
+    `submit(func, *args)` chama `func(conexao_da_thread, *args)` e devolve um
+    Future. Com workers=0 a chamada e feita na hora, na conexao original.
+
+    Uso:
+        with ExecutorOdoo(connection) as ex:
+            f_plano = ex.submit(buscar_plano_contas_consolidado, companies=c)
+            ...
+            plano, id_to_code = f_plano.result()
+            lancamentos = ex.prefetch(stream_lancamentos_consolidados_v11, ...)
+    """
+
+    def __init__(self, connection, workers: Optional[int] = None):
+        self.connection = connection
+        self.workers = _workers_padrao() if workers is None else workers
+        self._local = threading.local()
+        self._prefetches = []
+        self._pool = None
+        if self.workers > 0:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='sped_ecd_odoo',
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown(cancelar=exc[0] is not None)
+        return False
+
+    def shutdown(self, cancelar: bool = False):
+        for iterador in self._prefetches:
+            iterador.close()
+        self._prefetches = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=cancelar)
+            self._pool = None
+
+    def _conexao_thread(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = clonar_conexao(self.connection)
+            self._local.connection = conn
+        return conn
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        if self._pool is None:
+            futuro = Future()
+            try:
+                futuro.set_result(func(self.connection, *args, **kwargs))
+            except BaseException as e:
+                futuro.set_exception(e)
+            return futuro
+
+        def _tarefa():
+            return func(self._conexao_thread(), *args, **kwargs)
+        return self._pool.submit(_com_app_context(_tarefa))
+
+    def prefetch(self, func: Callable, *args, profundidade: Optional[int] = None, **kwargs) -> Iterator:
+        """
+        `func(conexao, *args)` e um generator: no modo paralelo ele roda numa
+        thread propria (conexao propria), `profundidade` itens a frente de
+        quem consome. Encerrado junto com o executor.
+        """
+        if self._pool is None:
+            return func(self.connection, *args, **kwargs)
+        iterador = prefetch(
+            func(clonar_conexao(self.connection), *args, **kwargs),
+            profundidade or profundidade_prefetch(),
+        )
+        self._prefetches.append(iterador)
+        return iterador
+
+    @property
+    def paralelo(self) -> bool:
+        return self._pool is not None
+
+
+# ============================================================
+# PREFETCH DE GENERATOR (produtor em thread + fila limitada)
+# ============================================================
+
+def prefetch(fonte: Iterable, profundidade: int = 1000) -> Iterator:
+    """
+    Itera `fonte` numa thread produtora, `profundidade` itens a frente do consumidor.
+
+    - Ordem preservada; excecao da fonte e re-lancada no consumidor.
+    - Fila limitada: produtor bloqueia quando o consumidor fica para tras.
+    - Consumidor que para no meio (close/break) sinaliza o produtor a parar.
+
+    A thread inicia JA na chamada (nao no primeiro next): quem cria o
+    prefetch cedo ganha sobreposicao com o que fizer antes de consumir.
+    """
+    fila = queue.Queue(maxsize=max(1, profundidade))
+    parar = threading.Event()
+
+    def _colocar(item) -> bool:
+        while not parar.is_set():
+            try:
+                fila.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produzir():
+        try:
+            for item in fonte:
+                if not _colocar((item, None)):
+                    return
+            _colocar((_FIM, None))
+        except BaseException as e:  # noqa: BLE001 — repassado ao consumidor
+            _colocar((_FIM, e))
+        finally:
+            fechar = getattr(fonte, 'close', None)
+            if parar.is_set() and fechar:
+                fechar()
+
+    produtor = threading.Thread(
+        target=_com_app_context(_produzir), name='sped_ecd_prefetch', daemon=True,
+    )
+    produtor.start()
+
+    return _Prefetch(fila, parar)
+
+
+class _Prefetch:
+    """Lado consumidor do prefetch (close() vale mesmo antes do 1o next)."""
+
+    def __init__(self, fila, parar):
+        self._fila = fila
+        self._parar = parar
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._parar.is_set():
+            raise StopIteration
+        item, erro = self._fila.get()
+        if item is _FIM:
+            self._parar.set()
+            if erro is not None:
+                raise erro
+            raise StopIteration
+        return item
+
+    def close(self):
+        self._parar.set()
+
+
+# ============================================================
+# SAIDA: ARQUIVO TEMPORARIO + MULTIPART UPLOAD INCREMENTAL
+# ============================================================
+
+def tamanho_parte_multipart() -> int:
+    mb = max(5, int(os.getenv('SPED_ECD_MULTIPART_MB', '8')))
+    return mb * 1024 * 1024
+
+
+class SaidaMultipartS3:
+    """
+    Destino de escrita do SPED: arquivo temporario + multipart upload em paralelo.
+
+    Cada `write` vai para o arquivo (validacao/download local continuam
+    funcionando via seek/read) e para o buffer da parte corrente; ao atingir
+    o tamanho da parte, ela segue para uma thread de upload (fila de 2 partes
+    — RAM ~3x tamanho da parte, independente do tamanho do arquivo).
+
+    `concluir()` envia a ultima parte e fecha o upload -> s3_key.
+    `abortar()` descarta o upload no S3 (partes ja enviadas nao ficam cobradas).
+    """
+
+    def __init__(self, s3_client, bucket: str, s3_key: str,
+                 extra_args: Optional[dict] = None, parte_bytes: Optional[int] = None):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.s3_key = s3_key
+        self.parte_bytes = parte_bytes or tamanho_parte_multipart()
+        self.arquivo = tempfile.TemporaryFile()
+        self._buffer = bytearray()
+        self._partes = []
+        self._n_partes = 0
+        self._erro = None
+        self._fila = queue.Queue(maxsize=2)
+
+        resp = self.s3.create_multipart_upload(
+            Bucket=bucket, Key=s3_key, **(extra_args or {}),
+        )
+        self.upload_id = resp['UploadId']
+        self._uploader = threading.Thread(
+            target=self._enviar_partes, name='sped_ecd_multipart', daemon=True,
+        )
+        self._uploader.start()
+
+    # ---------------------------------------------------------------- upload
+
+    def _enviar_partes(self):
+        while True:
+            item = self._fila.get()
+            if item is _FIM:
+                return
+            numero, dados = item
+            if self._erro is not None:
+                continue  # drena a fila sem enviar
+            try:
+                resp = self.s3.upload_part(
+                    Bucket=self.bucket, Key=self.s3_key, UploadId=self.upload_id,
+                    PartNumber=numero, Body=dados,
+                )
+                self._partes.append({'ETag': resp['ETag'], 'PartNumber': numero})
+            except Exception as e:
+                logger.error(f'[SPED ECD] Falha upload_part {numero}: {e}')
+                self._erro = e
+
+    def _enfileirar_parte(self):
+        if self._erro is not None:
+            raise self._erro
+        self._n_partes += 1
+        self._fila.put((self._n_partes, bytes(self._buffer)))
+        self._buffer.clear()
+
+    # ------------------------------------------------------ interface arquivo
+
+    def write(self, dados: bytes) -> int:
+        self.arquivo.write(dados)
+        self._buffer += dados
+        if len(self._buffer) >= self.parte_bytes:
+            self._enfileirar_parte()
+        return len(dados)
+
+    def tell(self) -> int:
+        return self.arquivo.tell()
+
+    def seek(self, *args) -> int:
+        return self.arquivo.seek(*args)
+
+    def read(self, *args) -> bytes:
+        return self.arquivo.read(*args)
+
+    def close(self):
+        self.arquivo.close()
+
+    # -------------------------------------------------------------- desfecho
+
+    def concluir(self) -> str:
+        """Envia a parte final, aguarda a fila e fecha o multipart -> s3_key."""
+        if self._buffer or not self._n_partes:
+            self._enfileirar_parte()
+        self._fila.put(_FIM)
+        self._uploader.join()
+        if self._erro is not None:
+            self.abortar()
+            raise self._erro
+        partes = sorted(self._partes, key=lambda p: p['PartNumber'])
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.s3_key, UploadId=self.upload_id,
+            MultipartUpload={'Parts': partes},
+        )
+        logger.info(
+            f'[SPED ECD] Multipart S3 OK: s3://{self.bucket}/{self.s3_key} '
+            f'({len(partes)} partes)'
+        )
+        return self.s3_key
+
+    def abortar(self):
+        if self._uploader.is_alive():
+            self._erro = self._erro or RuntimeError('upload abortado')
+            self._fila.put(_FIM)
+            self._uploader.join()
+        try:
+            self.s3.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.s3_key, UploadId=self.upload_id,
+            )
+        except Exception as e:
+            logger.warning(f'[SPED ECD] Falha ao abortar multipart {self.s3_key}: {e}')
@@ -6,7 +6,10 @@ Service principal do SPED ECD Centralizado
 Orquestracao: extracao Odoo + montagem do arquivo SPED + persistencia S3.
 
 Mitigacoes aplicadas:
-- R3 (RAM): escrita STREAMING direto em BytesIO (nao acumula array de strings)
+- R3 (RAM): escrita STREAMING em arquivo temporario (nao acumula o arquivo em RAM)
+- Pipeline (2026-10-19): consultas Odoo independentes em paralelo, lancamentos
+  buscados a frente da montagem dos blocos e saida com multipart upload
+  incremental — ver sped_ecd_pipeline.py
 - R4 (timeout): este service e chamado pelo worker RQ (assincrono)
 - R10 (encoding): usar latin-1 com errors='replace' + log warning se substituicao
 
@@ -15,9 +18,9 @@ Data: 2026-05-14
 """
 
 import logging
+import tempfile
 from datetime import date
-from io import BytesIO
-from typing import Optional
+from typing import IO, Optional
 
 from app.relatorios_fiscais.services.sped_ecd_blocks import (
     ContadorRegistros,
@@ -66,7 +69,8 @@ def gerar_sped_ecd_centralizado(
     connection,
     params: dict,
     progresso_callback=None,
-) -> BytesIO:
+    output=None,
+) -> IO[bytes]:
     """
     Gera o arquivo SPED ECD centralizado consolidando matriz + 2 filiais.
 
@@ -76,17 +80,32 @@ def gerar_sped_ecd_centralizado(
         email_contato (str) — email NACOM
         qualif_socio (str) — codigo qualificacao do socio (J930)
         date_arq_reg (date, opcional) — data registro junta para I030
+        usar_cache_saldos (bool, opcional, default True) — reaproveitar saldos
+            mensais de meses fechados ja calculados (False = recalcular tudo)
 
     progresso_callback (callable, opcional):
         Funcao chamada periodicamente com dict {etapa, total_lines, ...}
         para atualizar progresso no Redis.
 
+    output (opcional):
+        Destino com write/tell/seek/read (ex: SaidaMultipartS3, que ja envia
+        ao S3 durante a escrita). Default: arquivo temporario.
+
     Returns:
-        BytesIO posicionado no inicio, encoding latin-1
+        Arquivo (output) posicionado no inicio, encoding latin-1
     """
+    from app.relatorios_fiscais.services.sped_ecd_pipeline import ExecutorOdoo
+
+    if output is None:
+        output = tempfile.TemporaryFile()
+    with ExecutorOdoo(connection) as executor:
+        return _gerar_arquivo(connection, params, progresso_callback, output, executor)
+
+
+def _gerar_arquivo(connection, params: dict, progresso_callback, output, executor):
+    """Corpo de gerar_sped_ecd_centralizado (extracao via executor + escrita)."""
     inicio = _now_log()
     contador = ContadorRegistros()
-    output = BytesIO()
 
     # V1.6: parametro 'companies' permite gerar so FB (validacao) ou todas (centralizada).
     # Default = None -> usa COMPANIES_ECD (3 companies, padrao ECD centralizada).
@@ -95,19 +114,26 @@ def gerar_sped_ecd_centralizado(
     # ============================================================
     # ETAPA 1: Extrair dados Odoo
     # ============================================================
+    # Pipeline: consultas independentes sao disparadas juntas no executor
+    # (1 conexao Odoo por thread) e so aguardadas quando o resultado e usado.
+    # Sem pipeline (SPED_ECD_PIPELINE_ENABLED=false) o executor roda sincrono.
+    f_matriz = executor.submit(buscar_dados_matriz)
+    f_plano = executor.submit(buscar_plano_contas_consolidado, companies=companies)
+    f_ccus = executor.submit(buscar_centros_custo_consolidados, companies=companies)
+
     _emit_progresso(progresso_callback, etapa='matriz', mensagem='Buscando dados da matriz FB')
-    matriz_data = buscar_dados_matriz(connection)
+    matriz_data = f_matriz.result()
     logger.info(
         f'[SPED ECD] Matriz: {matriz_data["razao_social"]} (CNPJ {matriz_data["cnpj"]}) '
         f'| Escopo companies: {companies or "ALL_ECD"}'
     )
 
     _emit_progresso(progresso_callback, etapa='plano_contas', mensagem='Consolidando plano de contas')
-    plano_consolidado, id_to_code = buscar_plano_contas_consolidado(connection, companies=companies)
+    plano_consolidado, id_to_code = f_plano.result()
     logger.info(f'[SPED ECD] Plano: {len(plano_consolidado)} entradas (sinteticas+analiticas)')
 
     _emit_progresso(progresso_callback, etapa='ccus', mensagem='Buscando centros de custo (V1.1)')
-    plano_ccus, id_to_code_ccus = buscar_centros_custo_consolidados(connection, companies=companies)
+    plano_ccus, id_to_code_ccus = f_ccus.result()
     logger.info(f'[SPED ECD V1.1] Centros de custo: {len(plano_ccus)} codes unicos')
 
     # OPCAO A (V1.5): NAO emitir 0150 nem COD_PART em I250.
@@ -120,10 +146,37 @@ def gerar_sped_ecd_centralizado(
     partner_id_to_cod_part = {}
     logger.info('[SPED ECD V1.5] Opcao A: 0150/COD_PART desativados (so societarios)')
 
+    # Lancamentos (maior volume) comecam a ser buscados JA, numa thread
+    # propria, enquanto saldos/BP/DRE sao calculados e os blocos 0/I sao
+    # montados. A fila do prefetch limita a RAM (SPED_ECD_PREFETCH_LANCAMENTOS).
+    # Stream de lancamentos V1.1: generator -> linha por linha (mitigacao R3)
+    # Inclui CCUS e COD_PART
+    lancamentos_iter = executor.prefetch(
+        stream_lancamentos_consolidados_v11,
+        params['date_ini'], params['date_fim'], id_to_code,
+        id_to_code_ccus, partner_id_to_cod_part,
+        progresso_callback=progresso_callback,
+        company_ids=companies,
+    )
+
+    f_balanco = executor.submit(
+        calcular_balanco_consolidado,
+        params['date_fim'], plano_consolidado, id_to_code,
+        companies=companies,
+        date_ini=params['date_ini'],  # V1.6: saldo inicial preenchido
+    )
+    f_dre = executor.submit(
+        calcular_dre_consolidado,
+        params['date_ini'], params['date_fim'], plano_consolidado, id_to_code,
+        companies=companies,
+    )
+
     _emit_progresso(progresso_callback, etapa='saldos_mensais', mensagem='Calculando saldos mensais (I150/I155)')
     saldos_mensais = calcular_saldos_periodicos_mensais(
         connection, params['date_ini'], params['date_fim'], id_to_code,
         companies=companies,
+        executor=executor if executor.paralelo else None,
+        usar_cache=params.get('usar_cache_saldos', True),
     )
 
     # V25 (CAT 25 2026-05-16): filtrar plano para emitir SO contas utilizadas no
@@ -136,17 +189,10 @@ def gerar_sped_ecd_centralizado(
     plano_consolidado_utilizado = filtrar_plano_por_movimento(plano_consolidado, saldos_mensais)
 
     _emit_progresso(progresso_callback, etapa='balanco', mensagem='Calculando Balanco Patrimonial (J100)')
-    balanco = calcular_balanco_consolidado(
-        connection, params['date_fim'], plano_consolidado, id_to_code,
-        companies=companies,
-        date_ini=params['date_ini'],  # V1.6: saldo inicial preenchido
-    )
+    balanco = f_balanco.result()
 
     _emit_progresso(progresso_callback, etapa='dre', mensagem='Calculando DRE (J150)')
-    dre = calcular_dre_consolidado(
-        connection, params['date_ini'], params['date_fim'], plano_consolidado, id_to_code,
-        companies=companies,
-    )
+    dre = f_dre.result()
 
     # V32 (CAT 26 fix 2026-05-16): refatorada para derivar I355 do saldos_mensais
     # (I155 ja calculado) em vez de _read_group_balance do exercicio inteiro.
@@ -214,14 +260,6 @@ def gerar_sped_ecd_centralizado(
         _write_linha(output, linha)
 
     _emit_progresso(progresso_callback, etapa='bloco_I_lancamentos', mensagem='Bloco I: lancamentos (I200/I250) - streaming')
-    # Stream de lancamentos V1.1: generator -> linha por linha (mitigacao R3)
-    # Inclui CCUS e COD_PART
-    lancamentos_iter = stream_lancamentos_consolidados_v11(
-        connection, params['date_ini'], params['date_fim'], id_to_code,
-        id_to_code_ccus, partner_id_to_cod_part,
-        progresso_callback=progresso_callback,
-        company_ids=companies,
-    )
     for linha in construir_I200_I250(lancamentos_iter, plano_consolidado, contador):
         _write_linha(output, linha)
 
@@ -321,7 +359,7 @@ def validar_arquivo_gerado(buffer, contexto_odoo: Optional[dict] = None) -> dict
     return validator.validar(conteudo_bytes, contexto_odoo=contexto_odoo)
 
 
-def _write_linha(output: BytesIO, linha: str):
+def _write_linha(output: IO[bytes], linha: str):
     """
     Escreve linha SPED no buffer com encoding latin-1 + CRLF.
     Mitigacao R10: log warning se houver substituicao de caracteres.
@@ -353,8 +391,51 @@ def _now_log():
 # Persistencia S3
 # ============================================================
 
+def _s3_key_sped(user_id: int, date_ini: date, date_fim: date) -> str:
+    """Chave S3 do arquivo: {S3_PREFIX_ECD}/user_{id}/{ano}/sped_ecd_centralizado_{ini}_{fim}_{ts}.txt"""
+    from app.utils.timezone import agora_utc_naive
+
+    ts = agora_utc_naive().strftime('%Y%m%d_%H%M%S')
+    return (
+        f'{S3_PREFIX_ECD}/user_{user_id}/{date_ini.year}/'
+        f'sped_ecd_centralizado_{date_ini.strftime("%Y%m%d")}_{date_fim.strftime("%Y%m%d")}_{ts}.txt'
+    )
+
+
+def _extra_args_sped(s3_key: str) -> dict:
+    return {
+        'ContentType': 'text/plain; charset=latin-1',
+        'ContentDisposition': f'attachment; filename="{s3_key.split("/")[-1]}"',
+    }
+
+
+def criar_saida_multipart_sped(user_id: int, date_ini: date, date_fim: date):
+    """
+    Destino de escrita que envia o SPED ao S3 DURANTE a geracao (multipart).
+
+    Returns:
+        SaidaMultipartS3 (passar como `output` de gerar_sped_ecd_centralizado
+        e depois chamar .concluir() -> s3_key), ou None se S3 desabilitado /
+        pipeline desligado (usar upload_sped_to_s3 no fim, fluxo antigo).
+    """
+    from app.relatorios_fiscais.services.sped_ecd_pipeline import (
+        SaidaMultipartS3,
+        pipeline_habilitado,
+    )
+    from app.utils.file_storage import get_file_storage
+
+    storage = get_file_storage()
+    if not storage.use_s3 or not pipeline_habilitado():
+        return None
+    s3_key = _s3_key_sped(user_id, date_ini, date_fim)
+    return SaidaMultipartS3(
+        storage.s3_client, storage.bucket_name, s3_key,
+        extra_args=_extra_args_sped(s3_key),
+    )
+
+
 def upload_sped_to_s3(
-    sped_buffer: BytesIO,
+    sped_buffer: IO[bytes],
     user_id: int,
     date_ini: date,
     date_fim: date,
@@ -376,20 +457,17 @@ def upload_sped_to_s3(
         ts = agora_utc_naive().strftime('%Y%m%d_%H%M%S')
         nome = f'sped_ecd_centralizado_{date_ini.strftime("%Y%m%d")}_{date_fim.strftime("%Y%m%d")}_{ts}.txt'
         import os
+        import shutil
         path = os.path.join('/tmp', nome)
         with open(path, 'wb') as f:
             sped_buffer.seek(0)
-            f.write(sped_buffer.read())
+            shutil.copyfileobj(sped_buffer, f)
         sped_buffer.seek(0)
         logger.info(f'[SPED ECD] Salvo localmente (S3 desabilitado): {path}')
         return path  # path local
 
     # Upload S3
-    ts = agora_utc_naive().strftime('%Y%m%d_%H%M%S')
-    s3_key = (
-        f'{S3_PREFIX_ECD}/user_{user_id}/{date_ini.year}/'
-        f'sped_ecd_centralizado_{date_ini.strftime("%Y%m%d")}_{date_fim.strftime("%Y%m%d")}_{ts}.txt'
-    )
+    s3_key = _s3_key_sped(user_id, date_ini, date_fim)
 
     try:
         sped_buffer.seek(0)
@@ -397,10 +475,7 @@ def upload_sped_to_s3(
             sped_buffer,
             storage.bucket_name,
             s3_key,
-            ExtraArgs={
-                'ContentType': 'text/plain; charset=latin-1',
-                'ContentDisposition': f'attachment; filename="{s3_key.split("/")[-1]}"',
-            },
+            ExtraArgs=_extra_args_sped(s3_key),
             Config=storage.transfer_config,
         )
         logger.info(f'[SPED ECD] Upload S3 OK: s3://{storage.bucket_name}/{s3_key}')
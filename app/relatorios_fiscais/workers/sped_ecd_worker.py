@@ -8,7 +8,8 @@ Job RQ assincrono — geracao do arquivo demora 5-30 min para ano completo
 
 Fluxo:
 1. Rota POST /relatorios-fiscais/sped-ecd/gerar enfileira job
-2. Worker busca dados Odoo + monta arquivo + uploads S3
+2. Worker busca dados Odoo + monta arquivo (arquivo temporario) + upload S3
+   multipart DURANTE a montagem (sped_ecd_pipeline.SaidaMultipartS3)
 3. Frontend faz polling em /sped-ecd/status/<job_id>
 4. Quando finished: redireciona para download via presigned URL
 
@@ -141,6 +142,7 @@ def gerar_sped_ecd_async(
         with app_context_safe():
             from app.odoo.utils.connection import get_odoo_connection
             from app.relatorios_fiscais.services.sped_ecd_service import (
+                criar_saida_multipart_sped,
                 gerar_sped_ecd_centralizado,
                 upload_sped_to_s3,
             )
@@ -171,9 +173,31 @@ def gerar_sped_ecd_async(
                 'notas_explicativas': notas_explicativas,
             }
 
-            sped_buffer = gerar_sped_ecd_centralizado(
-                connection, params, progresso_callback=cb_progresso
-            )
+            # Saida com upload multipart incremental (None = S3/pipeline off:
+            # arquivo temporario + upload_sped_to_s3 no fim)
+            saida = criar_saida_multipart_sped(user_id, date_ini, date_fim)
+            try:
+                sped_buffer = gerar_sped_ecd_centralizado(
+                    connection, params, progresso_callback=cb_progresso, output=saida,
+                )
+            except Exception:
+                if saida is not None:
+                    saida.abortar()
+                raise
+
+            # Upload S3 (mesmo se invalido — usuario pode querer baixar para investigar)
+            progresso['etapa'] = 'upload_s3'
+            progresso['mensagem'] = 'Finalizando envio do arquivo para S3...'
+            _atualizar_progresso(job_id, progresso)
+
+            sped_buffer.seek(0, 2)  # SEEK_END
+            tamanho = sped_buffer.tell()
+            sped_buffer.seek(0)
+
+            if saida is not None:
+                s3_key = saida.concluir()
+            else:
+                s3_key = upload_sped_to_s3(sped_buffer, user_id, date_ini, date_fim)
 
             # V1.4: validacao pre-PVA
             progresso['etapa'] = 'validacao'
@@ -191,16 +215,7 @@ def gerar_sped_ecd_async(
                 f'erros={n_erros} | warnings={n_warnings}'
             )
 
-            # Upload S3 (mesmo se invalido — usuario pode querer baixar para investigar)
-            progresso['etapa'] = 'upload_s3'
-            progresso['mensagem'] = 'Enviando arquivo para S3...'
-            _atualizar_progresso(job_id, progresso)
-
-            sped_buffer.seek(0, 2)  # SEEK_END
-            tamanho = sped_buffer.tell()
-            sped_buffer.seek(0)
-
-            s3_key = upload_sped_to_s3(sped_buffer, user_id, date_ini, date_fim)
+            sped_buffer.close()
 
             # Sucesso
             duracao = (agora_utc_naive() - inicio).total_seconds()
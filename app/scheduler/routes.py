@@ -9,6 +9,8 @@ Acessivel apenas para administradores.
 from flask import Blueprint, render_template, jsonify
 from flask_login import login_required
 
+from app.utils.auth_decorators import require_admin
+
 scheduler_bp = Blueprint('scheduler', __name__, url_prefix='/admin/scheduler')
 
 
@@ -27,3 +29,24 @@ def health_api():
     """API JSON com status dos steps."""
     from app.scheduler.health_service import obter_status_steps
     return jsonify({'steps': obter_status_steps()})
+
+
+@scheduler_bp.route('/query-profiler/api')
+@login_required
+@require_admin
+def query_profiler_api():
+    """Top fingerprints de queries (ENABLE_QUERY_FINGERPRINTS).
+
+    - local: janela corrente/anterior do processo web que atendeu
+    - agregado: acumulado no Redis por todos os processos (web, RQ, scheduler)
+    """
+    from flask import request
+    from app.utils.query_profiler import (
+        _fingerprints_ativo, fingerprint_store, obter_fingerprints_redis,
+    )
+    limite = min(request.args.get('limite', 50, type=int), 500)
+    return jsonify({
+        'ativo': _fingerprints_ativo,
+        'local': fingerprint_store.snapshot(limite),
+        'agregado': obter_fingerprints_redis(limite),
+    })
@@ -26,6 +26,7 @@ from datetime import datetime, timedelta
 from apscheduler.schedulers.blocking import BlockingScheduler
 from time import sleep
 from app.utils.timezone import agora_utc_naive
+from app.utils.query_profiler import com_query_scope
 
 
 # Dual handler: arquivo (debug in-session) + stderr (capturado pelo Render)
@@ -84,6 +85,12 @@ AUDITORIA_FINANCEIRA_ENABLED = os.environ.get("AUDITORIA_FINANCEIRA_ENABLED", "t
 AUDITORIA_FINANCEIRA_HOUR = int(os.environ.get("AUDITORIA_FINANCEIRA_HOUR", "6"))  # 6h (após KG cleanup 5h)
 _ultima_auditoria_financeira = None  # Timestamp da ultima auditoria bem-sucedida
 
+# Verificacao diaria dos agregados comerciais incrementais × recalculo completo (24º módulo)
+AGREGADO_COMERCIAL_VERIFICAR_HOUR = int(os.environ.get("AGREGADO_COMERCIAL_VERIFICAR_HOUR", "6"))
+# Reconstroi o resumo ao detectar divergencia (trava escritas nas origens por alguns segundos)
+AGREGADO_COMERCIAL_AUTOCORRIGIR = os.environ.get("AGREGADO_COMERCIAL_AUTOCORRIGIR", "false").lower() == "true"
+_ultima_verificacao_agregado_comercial = None
+
 # Improvement Dialogue batch — sugestoes de melhoria Agent SDK -> Claude Code (25º módulo)
 # Roda 2x/dia: 07:00 (catch-up noturno) e 10:00 (pronto antes do D8 cron as 11:00)
 IMPROVEMENT_DIALOGUE_ENABLED = os.environ.get("AGENT_IMPROVEMENT_DIALOGUE", "false").lower() == "true"
@@ -241,12 +248,13 @@ def inicializar_services():
         return False
 
 
+@com_query_scope('scheduler:sincronizacao')
 def executar_sincronizacao():
     """
     Executa sincronização usando services já instanciados
     Similar ao que funciona em SincronizacaoIntegradaService
     """
-    global faturamento_service, carteira_service, requisicao_service, pedido_service, alocacao_service, entrada_material_service, cte_service, contas_receber_service, baixas_service, contas_pagar_service, nfd_service, pallet_service, reversao_service, monitoramento_sync_service, validacao_recebimento_job, validacao_ibscbs_job, extratos_service, picking_recebimento_sync_service, cte_cancelamento_outlook_job, _ultima_reindexacao_embeddings, _ultima_varredura_seguranca, _ultimo_kg_cleanup, _ultima_auditoria_financeira, _ultimo_improvement_dialogue, _ultimo_fechamento_mes_custeio, _ultimo_health_check_custeio
+    global faturamento_service, carteira_service, requisicao_service, pedido_service, alocacao_service, entrada_material_service, cte_service, contas_receber_service, baixas_service, contas_pagar_service, nfd_service, pallet_service, reversao_service, monitoramento_sync_service, validacao_recebimento_job, validacao_ibscbs_job, extratos_service, picking_recebimento_sync_service, cte_cancelamento_outlook_job, _ultima_reindexacao_embeddings, _ultima_varredura_seguranca, _ultimo_kg_cleanup, _ultima_auditoria_financeira, _ultima_verificacao_agregado_comercial, _ultimo_improvement_dialogue, _ultimo_fechamento_mes_custeio, _ultimo_health_check_custeio
 
     _t_inicio = time.time()
     logger.info("=" * 60)
@@ -1856,7 +1864,8 @@ def executar_sincronizacao():
 
         logger.info(f"   [TIMER] Step 23 (Auditoria Financeira): {time.time() - _t_step:.1f}s")
 
-        # ── 2️⃣4️⃣ REFRESH MATERIALIZED VIEWS COMERCIAIS (a cada ciclo) ──
+        # ── 2️⃣4️⃣ COMPACTACAO DOS AGREGADOS COMERCIAIS (a cada ciclo) ──
+        # Leitura ja soma os deltas pendentes: compactar so mantem a fila curta
         _t_step = time.time()
         try:
             db.session.remove()
@@ -1864,12 +1873,32 @@ def executar_sincronizacao():
             from app.comercial.services.agregacao_service import refresh_materialized_views
             refresh_materialized_views()
         except Exception as e:
-            logger.warning(f"⚠️ Refresh MV comerciais falhou (nao-critico): {e}")
+            logger.warning(f"⚠️ Compactacao agregados comerciais falhou (nao-critico): {e}")
             try:
                 db.session.rollback()
             except Exception:
                 pass
-        logger.info(f"   [TIMER] Step 24 (MV Comercial): {time.time() - _t_step:.1f}s")
+
+        agora_agc = agora_utc_naive()
+        if (agora_agc.hour == AGREGADO_COMERCIAL_VERIFICAR_HOUR
+                and (_ultima_verificacao_agregado_comercial is None
+                     or _ultima_verificacao_agregado_comercial.date() < agora_agc.date())):
+            try:
+                from app.comercial.services.agregacao_service import (
+                    reconstruir_agregados, verificar_consistencia,
+                )
+                resultado_agc = verificar_consistencia()
+                if not resultado_agc['ok'] and AGREGADO_COMERCIAL_AUTOCORRIGIR:
+                    reconstruir_agregados()
+                    logger.info("✅ Agregados comerciais reconstruidos apos divergencia")
+            except Exception as e:
+                logger.warning(f"⚠️ Verificacao agregados comerciais falhou (nao-critico): {e}")
+                try:
+                    db.session.rollback()
+                except Exception:
+                    pass
+            _ultima_verificacao_agregado_comercial = agora_agc
+        logger.info(f"   [TIMER] Step 24 (Agregados Comerciais): {time.time() - _t_step:.1f}s")
 
         # ── 2️⃣4️⃣.5️⃣ REFRESH MV PEDIDOS (a cada ciclo) ──
         _t_step = time.time()
@@ -2406,6 +2435,7 @@ def executar_inicial():
         JANELA_CARTEIRA = janela_carteira_original
 
 
+@com_query_scope('scheduler:reconciliacao_teams')
 def executar_reconciliacao_teams():
     """Job periodico: re-entrega respostas do Teams que nunca chegaram ao usuario.
 
@@ -2436,6 +2466,7 @@ def executar_reconciliacao_teams():
         logger.error(f"❌ [TEAMS-RECONCILE] job falhou: {e}", exc_info=True)
 
 
+@com_query_scope('scheduler:faturamento_diario_teams')
 def executar_faturamento_diario_teams():
     """Job (seg-sex 6h): envia a imagem do faturamento do mes corrente no Teams.
 
@@ -2465,6 +2496,7 @@ def executar_faturamento_diario_teams():
         logger.error(f"❌ [FAT-DIARIO] job falhou: {e}", exc_info=True)
 
 
+@com_query_scope('scheduler:estoque_semanal_email')
 def executar_estoque_semanal_email():
     """Job (segunda): envia por e-mail o relatório semanal de estoque.
 
@@ -2491,6 +2523,7 @@ def executar_estoque_semanal_email():
         logger.error(f"❌ [ESTOQUE-SEMANAL] job falhou: {e}", exc_info=True)
 
 
+@com_query_scope('scheduler:descoberta_reversa_hora')
 def executar_descoberta_reversa_hora():
     """Job (interval): descoberta reversa de pedidos TagPlus -> HORA (Fase 3).
 
@@ -2512,6 +2545,38 @@ def executar_descoberta_reversa_hora():
         logger.error(f"❌ [HORA-REVERSO] job falhou: {e}", exc_info=True)
 
 
+@com_query_scope('scheduler:manutencao_evento_supply_chain')
+def executar_manutencao_evento_supply_chain():
+    """Job diario: particoes mensais de evento_supply_chain + arquivamento.
+
+    Cria a particao do mes corrente e das seguintes (EVENTO_SC_MESES_A_FRENTE)
+    antes que os triggers precisem delas — sem isso os eventos caem na
+    particao DEFAULT. Com EVENTO_SC_ARQUIVAR_ENABLED, particoes mais velhas
+    que EVENTO_SC_MESES_QUENTES viram JSONL gzip no storage. Best-effort,
+    NUNCA derruba o scheduler. Mesmo padrao de executar_faturamento_diario_teams.
+    """
+    try:
+        from app import create_app, db
+        from app.supply_chain.services.eventos_particionados_service import (
+            arquivar_particoes_frias,
+            garantir_particoes,
+        )
+        app = create_app()
+        with app.app_context():
+            try:
+                db.session.close()
+                db.engine.dispose()
+            except Exception:
+                pass
+            particoes = garantir_particoes()
+            logger.info(f"🗂️ [EVENTO-SC] Particoes garantidas: {particoes}")
+            if os.getenv("EVENTO_SC_ARQUIVAR_ENABLED", "false").lower() in ("1", "true", "yes", "on"):
+                arquivadas = arquivar_particoes_frias()
+                logger.info(f"🗄️ [EVENTO-SC] Arquivadas: {arquivadas}")
+    except Exception as e:
+        logger.error(f"❌ [EVENTO-SC] job falhou: {e}", exc_info=True)
+
+
 def main():
     """
     Função principal - inicializa services FORA do contexto e configura scheduler
@@ -2627,6 +2692,22 @@ def main():
     )
     logger.info(f"   11. HORA TagPlus reverso: a cada {_hora_reverso_min} min (gated HORA_TAGPLUS_REVERSO, default OFF)")
 
+    # Particoes mensais de evento_supply_chain (+ arquivamento, gated).
+    # Registrado SEMPRE: sem particao do mes os eventos caem na DEFAULT.
+    _evento_sc_hour = int(os.getenv("EVENTO_SC_MANUTENCAO_HOUR", "3"))
+    scheduler.add_job(
+        func=executar_manutencao_evento_supply_chain,
+        trigger="cron",
+        hour=_evento_sc_hour,
+        minute=30,
+        id="manutencao_evento_supply_chain",
+        name="Particoes/arquivamento de evento_supply_chain",
+        max_instances=1,
+        misfire_grace_time=3600,
+        replace_existing=True,
+    )
+    logger.info(f"   12. Particoes evento_supply_chain: diário às {_evento_sc_hour:02d}:30")
+
     logger.info("=" * 60)
     logger.info("✅ Scheduler configurado com TODAS as correções:")
     logger.info("   1. Valores de janela corretos para cada serviço")
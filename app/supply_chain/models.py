@@ -6,9 +6,13 @@ IMPORTANTE: Este modelo e READ-ONLY no Python. As escritas sao feitas
 exclusivamente pelo trigger PostgreSQL audit_supply_chain_trigger().
 O unico UPDATE permitido e para enriquecer qtd_projetada_dia via
 enrichment_service.py.
+
+Tabela particionada por mes (registrado_em); meses frios sao arquivados
+fora do banco — ver services/eventos_particionados_service.py.
 """
 from app import db
 from sqlalchemy.dialects.postgresql import JSONB, ARRAY
+from app.utils.timezone import agora_utc_naive
 
 
 class EventoSupplyChain(db.Model):
@@ -34,9 +38,9 @@ class EventoSupplyChain(db.Model):
     # Projecao de estoque (preenchido por Python pos-commit)
     qtd_projetada_dia   = db.Column(db.Numeric(15, 3))
 
-    # Snapshot completo
-    dados_antes         = db.Column(JSONB)               # row_to_json(OLD) — NULL em INSERT
-    dados_depois        = db.Column(JSONB)               # row_to_json(NEW) — NULL em DELETE
+    # Snapshot (INSERT/DELETE) ou diff so das chaves alteradas (UPDATE)
+    dados_antes         = db.Column(JSONB)               # OLD (UPDATE: chaves alteradas) — NULL em INSERT
+    dados_depois        = db.Column(JSONB)               # NEW (UPDATE: chaves alteradas) — NULL em DELETE
     campos_alterados    = db.Column(ARRAY(db.Text))      # Lista de campos que mudaram (so UPDATE)
 
     # Contexto
@@ -46,6 +50,7 @@ class EventoSupplyChain(db.Model):
     registrado_por      = db.Column(db.String(100))      # Usuario ou 'SISTEMA' (string livre)
     usuario_id          = db.Column(db.Integer)          # FK logica para usuarios.id (sem constraint — tabela append-only)
 
+    # PK fisica e (id, registrado_em) — exigencia do particionamento
     # Indices definidos no SQL de migracao (nao duplicar aqui)
     # O SQLAlchemy detecta a tabela via metadata para Flask-Migrate
 
@@ -79,3 +84,24 @@ class EventoSupplyChain(db.Model):
             result['dados_antes'] = self.dados_antes
             result['dados_depois'] = self.dados_depois
         return result
+
+
+class EventoSupplyChainArquivo(db.Model):
+    """Manifesto das particoes mensais de evento_supply_chain arquivadas no storage."""
+    __tablename__ = 'evento_supply_chain_arquivo'
+
+    id                  = db.Column(db.Integer, primary_key=True)
+    particao            = db.Column(db.String(63), nullable=False, unique=True)  # evento_supply_chain_yYYYYmMM
+    inicio              = db.Column(db.DateTime, nullable=False)                 # [inicio, fim) em registrado_em
+    fim                 = db.Column(db.DateTime, nullable=False)
+    caminho             = db.Column(db.String(500), nullable=False)              # retorno de FileStorage.save_file
+    formato             = db.Column(db.String(20), nullable=False, default='jsonl.gz')
+    total_eventos       = db.Column(db.Integer, nullable=False)
+    tamanho_bytes       = db.Column(db.BigInteger)
+    sha256              = db.Column(db.String(64))
+    id_min              = db.Column(db.BigInteger)
+    id_max              = db.Column(db.BigInteger)
+    arquivado_em        = db.Column(db.DateTime, nullable=False, default=agora_utc_naive)
+
+    def __repr__(self):
+        return f'<EventoSCArquivo {self.particao} eventos={self.total_eventos}>'
@@ -0,0 +1,383 @@
+"""
+Eventos de supply chain particionados por mes + arquivamento de meses frios.
+
+Tabela evento_supply_chain e PARTITION BY RANGE (registrado_em), uma
+particao por mes (evento_supply_chain_yYYYYmMM) e uma DEFAULT de seguranca.
+Ver scripts/migrations/2026-10-19_evento_supply_chain_particionado.sql.
+
+Formato dos dados (gravado pelo trigger audit_supply_chain_trigger):
+  - INSERT: dados_depois = snapshot completo (base da cadeia)
+  - UPDATE: dados_antes/dados_depois = so as chaves que mudaram (diff)
+  - DELETE: dados_antes = snapshot completo
+O estado de um registro em qualquer evento e reconstruido aplicando a
+cadeia de diffs (reconstruir_estados). UPDATE que nao mexe em campo
+monitorado nao gera evento — colunas alteradas so nesses UPDATEs ficam com
+o ultimo valor visto pela cadeia.
+
+Ciclo de vida:
+  1. garantir_particoes(): cria o mes corrente + N a frente (scheduler diario)
+  2. arquivar_particoes_frias(): particoes mais velhas que
+     EVENTO_SC_MESES_QUENTES viram JSONL gzip no storage (S3/local),
+     registradas em evento_supply_chain_arquivo, e saem do banco
+  3. consultar_eventos(): le arquivados + vivos com os mesmos filtros
+
+Formato do arquivo: JSONL gzip (1 evento por linha, ordem registrado_em, id).
+Parquet ficaria menor, mas pyarrow nao e dependencia do projeto.
+
+Flags (env): EVENTO_SC_MESES_A_FRENTE (2), EVENTO_SC_MESES_QUENTES (12),
+EVENTO_SC_PASTA_ARQUIVO ('arquivo/evento_supply_chain').
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+TABELA = 'evento_supply_chain'
+_RE_PARTICAO = re.compile(r'^evento_supply_chain_y(\d{4})m(\d{2})$')
+
+COLUNAS = (
+    'id', 'tipo_evento', 'entidade', 'entidade_id',
+    'num_pedido', 'cod_produto', 'numero_nf', 'separacao_lote_id',
+    'quantidade_anterior', 'quantidade_nova', 'qtd_projetada_dia',
+    'dados_antes', 'dados_depois', 'campos_alterados',
+    'origem', 'session_id', 'registrado_em', 'registrado_por', 'usuario_id',
+)
+
+# Filtros aceitos por consultar_eventos (coluna = valor)
+FILTROS = ('entidade', 'entidade_id', 'num_pedido', 'cod_produto', 'numero_nf',
+           'separacao_lote_id', 'session_id')
+
+_AUSENTE = object()
+
+
+def _env_int(nome, padrao):
+    try:
+        return int(os.environ.get(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+# ============================================================
+# DIFF / RECONSTRUCAO
+# ============================================================
+
+def calcular_diff(base: Optional[dict], novo: Optional[dict]) -> dict:
+    """Chaves de novo cujo valor difere de base (espelho de jsonb_diff_evento_sc)."""
+    base = base or {}
+    return {k: v for k, v in (novo or {}).items() if base.get(k, _AUSENTE) != v}
+
+
+def reconstruir_estados(eventos: Iterable[dict]) -> Iterator[Tuple[dict, Optional[dict]]]:
+    """
+    Aplica a cadeia de eventos de UM registro (entidade + entidade_id).
+
+    Args:
+        eventos: dicts com tipo_evento, dados_antes, dados_depois, em ordem
+            (registrado_em, id)
+
+    Yields:
+        (evento, estado apos o evento) — estado None depois de DELETE. Cadeia
+        que comeca num UPDATE (INSERT anterior ao rastreio) parte so das
+        chaves conhecidas.
+    """
+    estado = None
+    for evento in eventos:
+        tipo = evento['tipo_evento']
+        if tipo == 'INSERT':
+            estado = dict(evento.get('dados_depois') or {})
+        elif tipo == 'UPDATE':
+            if estado is None:
+                estado = dict(evento.get('dados_antes') or {})
+            estado.update(evento.get('dados_depois') or {})
+        elif tipo == 'DELETE':
+            estado = None
+        yield evento, (dict(estado) if estado is not None else None)
+
+
+def reconstruir_estado(eventos: Iterable[dict]) -> Optional[dict]:
+    """Estado final do registro apos a cadeia (None se deletado ou sem eventos)."""
+    estado = None
+    for _evento, estado in reconstruir_estados(eventos):
+        pass
+    return estado
+
+
+# ============================================================
+# PARTICOES
+# ============================================================
+
+def nome_particao(mes: date) -> str:
+    return f'{TABELA}_y{mes.year:04d}m{mes.month:02d}'
+
+
+def mes_da_particao(nome: str) -> Optional[date]:
+    """evento_supply_chain_y2026m03 -> date(2026, 3, 1); None para DEFAULT/outras."""
+    m = _RE_PARTICAO.match(nome or '')
+    return date(int(m.group(1)), int(m.group(2)), 1) if m else None
+
+
+def _somar_meses(mes: date, n: int) -> date:
+    total = mes.year * 12 + (mes.month - 1) + n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def particoes_frias(nomes: Iterable[str], hoje: date, meses_quentes: int) -> List[str]:
+    """Particoes mensais inteiramente anteriores a janela quente, da mais antiga para a mais nova."""
+    limite = _somar_meses(date(hoje.year, hoje.month, 1), -meses_quentes)
+    frias = [(mes_da_particao(n), n) for n in nomes]
+    return [n for mes, n in sorted((f for f in frias if f[0]), key=lambda f: f[0]) if mes < limite]
+
+
+def listar_particoes() -> List[str]:
+    from app import db
+
+    return [r[0] for r in db.session.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :tabela
+        ORDER BY c.relname
+    """), {'tabela': TABELA})]
+
+
+def garantir_particoes(meses_a_frente: Optional[int] = None, hoje: Optional[date] = None) -> List[str]:
+    """Cria (se faltar) a particao do mes corrente e das N seguintes. Commit proprio."""
+    from app import db
+    from app.utils.timezone import agora_utc_naive
+
+    meses_a_frente = _env_int('EVENTO_SC_MESES_A_FRENTE', 2) if meses_a_frente is None else meses_a_frente
+    hoje = hoje or agora_utc_naive().date()
+    inicio = date(hoje.year, hoje.month, 1)
+    nomes = []
+    for n in range(meses_a_frente + 1):
+        nomes.append(db.session.execute(
+            text('SELECT garantir_particao_evento_sc(:mes)'), {'mes': _somar_meses(inicio, n)}
+        ).scalar())
+    db.session.commit()
+    return nomes
+
+
+# ============================================================
+# ARQUIVO (JSONL gzip)
+# ============================================================
+
+def _json_default(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f'Tipo nao serializavel: {type(valor).__name__}')
+
+
+def escrever_jsonl_gz(eventos: Iterable[dict], destino) -> Tuple[int, Optional[int], Optional[int]]:
+    """
+    Grava eventos (dicts com COLUNAS) em destino (arquivo binario) como JSONL gzip.
+
+    Returns:
+        (total, id_min, id_max)
+    """
+    total, id_min, id_max = 0, None, None
+    with gzip.GzipFile(fileobj=destino, mode='wb', mtime=0) as gz:
+        for evento in eventos:
+            linha = {c: evento.get(c) for c in COLUNAS}
+            gz.write(json.dumps(linha, default=_json_default, ensure_ascii=False).encode('utf-8'))
+            gz.write(b'\n')
+            total += 1
+            eid = evento.get('id')
+            if eid is not None:
+                id_min = eid if id_min is None else min(id_min, eid)
+                id_max = eid if id_max is None else max(id_max, eid)
+    return total, id_min, id_max
+
+
+def ler_jsonl_gz(chunks: Iterable[bytes]) -> Iterator[dict]:
+    """Eventos de um arquivo JSONL gzip lido em chunks (registrado_em volta a datetime)."""
+    descompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    resto = b''
+    for chunk in chunks:
+        resto += descompressor.decompress(chunk)
+        *linhas, resto = resto.split(b'\n')
+        for linha in linhas:
+            if linha:
+                yield _decodificar(linha)
+    resto += descompressor.flush()
+    for linha in resto.split(b'\n'):
+        if linha:
+            yield _decodificar(linha)
+
+
+def _decodificar(linha: bytes) -> dict:
+    evento = json.loads(linha)
+    if evento.get('registrado_em'):
+        evento['registrado_em'] = datetime.fromisoformat(evento['registrado_em'])
+    return evento
+
+
+def _casa_filtro(evento: dict, inicio, fim, filtros: dict) -> bool:
+    registrado_em = evento.get('registrado_em')
+    if inicio is not None and (registrado_em is None or registrado_em < inicio):
+        return False
+    if fim is not None and (registrado_em is None or registrado_em >= fim):
+        return False
+    return all(evento.get(campo) == valor for campo, valor in filtros.items())
+
+
+def arquivar_particao(nome: str) -> dict:
+    """
+    Exporta a particao para o storage, registra no manifesto e remove do banco.
+
+    Upload acontece ANTES de qualquer alteracao no banco; manifesto + DETACH
+    + DROP vao na mesma transacao. Falha no upload mantem a particao.
+    """
+    from werkzeug.datastructures import FileStorage as WerkzeugFileStorage
+
+    from app import db
+    from app.supply_chain.models import EventoSupplyChainArquivo
+    from app.utils.file_storage import get_file_storage
+
+    mes = mes_da_particao(nome)
+    if mes is None:
+        raise ValueError(f'Particao invalida para arquivamento: {nome}')
+
+    colunas_sql = ', '.join(COLUNAS)
+    resultado = db.session.execute(
+        text(f'SELECT {colunas_sql} FROM "{nome}" ORDER BY registrado_em, id').execution_options(
+            stream_results=True, yield_per=5000,
+        )
+    ).mappings()
+
+    with tempfile.TemporaryFile() as tmp:
+        total, id_min, id_max = escrever_jsonl_gz((dict(r) for r in resultado), tmp)
+        tamanho = tmp.tell()
+        tmp.seek(0)
+        sha = hashlib.sha256()
+        for chunk in iter(lambda: tmp.read(1024 * 1024), b''):
+            sha.update(chunk)
+        tmp.seek(0)
+
+        pasta = os.environ.get('EVENTO_SC_PASTA_ARQUIVO', 'arquivo/evento_supply_chain')
+        caminho = get_file_storage().save_file(
+            WerkzeugFileStorage(stream=tmp, filename=f'{nome}.jsonl.gz',
+                                content_type='application/gzip'),
+            folder=pasta,
+            filename=f'{nome}.jsonl.gz',
+        )
+    if not caminho:
+        raise RuntimeError(f'Falha ao enviar arquivo da particao {nome}')
+
+    db.session.add(EventoSupplyChainArquivo(
+        particao=nome,
+        inicio=datetime(mes.year, mes.month, 1),
+        fim=datetime.combine(_somar_meses(mes, 1), datetime.min.time()),
+        caminho=caminho,
+        formato='jsonl.gz',
+        total_eventos=total,
+        tamanho_bytes=tamanho,
+        sha256=sha.hexdigest(),
+        id_min=id_min,
+        id_max=id_max,
+    ))
+    db.session.execute(text(f'ALTER TABLE {TABELA} DETACH PARTITION "{nome}"'))
+    db.session.execute(text(f'DROP TABLE "{nome}"'))
+    db.session.commit()
+
+    logger.info(f"[EVENTO_SC] Particao {nome} arquivada: {total} eventos, {tamanho} bytes -> {caminho}")
+    return {'particao': nome, 'eventos': total, 'bytes': tamanho, 'caminho': caminho}
+
+
+def arquivar_particoes_frias(meses_quentes: Optional[int] = None, hoje: Optional[date] = None) -> List[dict]:
+    """Arquiva todas as particoes fora da janela quente. Falha numa nao impede as demais."""
+    from app import db
+    from app.utils.timezone import agora_utc_naive
+
+    meses_quentes = _env_int('EVENTO_SC_MESES_QUENTES', 12) if meses_quentes is None else meses_quentes
+    hoje = hoje or agora_utc_naive().date()
+
+    arquivadas = []
+    for nome in particoes_frias(listar_particoes(), hoje, meses_quentes):
+        try:
+            arquivadas.append(arquivar_particao(nome))
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"[EVENTO_SC] Erro ao arquivar {nome}: {e}")
+    return arquivadas
+
+
+# ============================================================
+# CONSULTA (arquivados + vivos)
+# ============================================================
+
+def _eventos_arquivados(inicio, fim, filtros) -> Iterator[dict]:
+    from app.supply_chain.models import EventoSupplyChainArquivo
+    from app.utils.file_storage import get_file_storage
+
+    query = EventoSupplyChainArquivo.query
+    if inicio is not None:
+        query = query.filter(EventoSupplyChainArquivo.fim > inicio)
+    if fim is not None:
+        query = query.filter(EventoSupplyChainArquivo.inicio < fim)
+
+    storage = get_file_storage()
+    for arquivo in query.order_by(EventoSupplyChainArquivo.inicio):
+        for evento in ler_jsonl_gz(storage.iter_file(arquivo.caminho)):
+            if _casa_filtro(evento, inicio, fim, filtros):
+                yield evento
+
+
+def _eventos_vivos(inicio, fim, filtros) -> Iterator[dict]:
+    from app.supply_chain.models import EventoSupplyChain
+
+    query = EventoSupplyChain.query
+    if inicio is not None:
+        query = query.filter(EventoSupplyChain.registrado_em >= inicio)
+    if fim is not None:
+        query = query.filter(EventoSupplyChain.registrado_em < fim)
+    for campo, valor in filtros.items():
+        query = query.filter(getattr(EventoSupplyChain, campo) == valor)
+
+    for evento in query.order_by(EventoSupplyChain.registrado_em, EventoSupplyChain.id).yield_per(2000):
+        yield {c: getattr(evento, c) for c in COLUNAS}
+
+
+def consultar_eventos(inicio: Optional[datetime] = None, fim: Optional[datetime] = None,
+                      incluir_arquivados: bool = True, **filtros) -> Iterator[dict]:
+    """
+    Eventos em ordem (registrado_em, id), vindos dos arquivos e do banco.
+
+    Particoes arquivadas sao sempre mais antigas que as vivas, entao basta
+    encadear arquivados -> vivos. Arquivos fora de [inicio, fim) nem sao lidos.
+
+    Args:
+        inicio, fim: intervalo [inicio, fim) em registrado_em
+        incluir_arquivados: False le so o banco
+        **filtros: igualdade em FILTROS (ex: num_pedido='VCD123')
+
+    Returns:
+        gerador de dicts com COLUNAS (quantidades arquivadas vem como float)
+    """
+    invalidos = set(filtros) - set(FILTROS)
+    if invalidos:
+        raise ValueError(f'Filtros nao suportados: {sorted(invalidos)}')
+
+    if incluir_arquivados:
+        yield from _eventos_arquivados(inicio, fim, filtros)
+    yield from _eventos_vivos(inicio, fim, filtros)
+
+
+def historico_do_registro(entidade: str, entidade_id: int, **kwargs) -> List[Tuple[dict, Optional[dict]]]:
+    """[(evento, estado completo apos o evento)] de um registro rastreado."""
+    return list(reconstruir_estados(
+        consultar_eventos(entidade=entidade, entidade_id=entidade_id, **kwargs)
+    ))
@@ -1,5 +1,6 @@
 """
-asset_bundler.py — versionamento de @import em CSS entry-points.
+asset_bundler.py — versionamento de @import em CSS entry-points e build de
+bundles (CSS/JS concatenados, hash no nome, .gz/.br) com manifest.
 
 PROBLEMA QUE RESOLVE
 --------------------
@@ -74,3 +75,280 @@ def get_versioned_css(app, rel_path='css/main.css'):
     if not debug:
         _bundle_cache[rel_path] = result
     return result
+
+
+# =============================================================================
+# BUILD DE BUNDLES (deploy) — `flask build-assets`
+# =============================================================================
+#
+# O versionamento acima resolve o CACHE, mas o navegador ainda baixa cada modulo
+# do main.css em request separado (cascata de @import: main.css -> ~40 modulos)
+# e cada JS do base.html tambem. Em conexao lenta de armazem isso domina o load.
+#
+# No build (build.sh) cada bundle logico vira UM arquivo minificado com hash do
+# conteudo no nome (static/dist/<nome>.<hash>.<ext>) + irmaos .gz/.br para o
+# `precompressed` do Caddy, e o manifest.json mapeia nome logico -> arquivo.
+# Templates resolvem pelo helper `asset_bundle(nome)` (lista de URLs):
+# manifest presente -> 1 URL do bundle; ausente (dev/build nao rodou) -> fontes
+# individuais versionadas (comportamento anterior).
+#
+# CSS: os @import locais sao INLINADOS preservando a camada
+# (`@import url(x) layer(L)` -> `@layer L { ... }`); url() relativos dos modulos
+# viram absolutos (/static/...); @import remoto (fontes) sobe para o topo.
+# JS: concatenacao na ordem declarada (todos os scripts do bundle inicializam em
+# DOMContentLoaded). Minificacao JS so com `rjsmin` instalado (opcional) — os
+# vendors ja vem .min.
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Nome logico -> entry-point CSS (inlinado recursivamente)
+CSS_BUNDLES = {
+    'main.css': 'css/main.css',
+}
+
+# Nome logico -> scripts na ordem de execucao. Um bundle so junta scripts que
+# ja eram CONSECUTIVOS no template: a ordem de execucao nao muda. O script inline
+# de CSRF do base.html roda depois do htmx, e mobile-zoom.js depois dele — por
+# isso o zoom continua fora do bundle.
+JS_BUNDLES = {
+    # base.html, usuario logado: tema, sidebar, efeitos e htmx
+    'base.js': [
+        'js/theme-manager.js',
+        'js/sidebar.js',
+        'js/financeiro/premium-effects.js',
+        'js/vendor/htmx-1.9.11.min.js',
+    ],
+    # base.html, anonimo (login etc.): o mesmo sem a sidebar
+    'base-publico.js': [
+        'js/theme-manager.js',
+        'js/financeiro/premium-effects.js',
+        'js/vendor/htmx-1.9.11.min.js',
+    ],
+}
+
+# @import url('X') <layer/media>; — statement completo (para inlinar)
+_IMPORT_STMT_RE = re.compile(
+    r"""@import\s+url\(\s*['"]?([^'")]+)['"]?\s*\)\s*([^;]*);"""
+)
+# url(...) com argumento entre aspas ou nu, OU uma string literal solta. Varrido
+# da esquerda para a direita: o url() dentro de url("data:...") ou de
+# content: "..." e consumido junto com a string e nunca e reescrito.
+_CSS_URL_RE = re.compile(
+    r"""url\(\s*(?:"((?:\\.|[^"\\])*)"|'((?:\\.|[^'\\])*)'|([^'"()\s]+))\s*\)"""
+    r"""|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'"""
+)
+_LAYER_RE = re.compile(r"^layer(?:\(\s*([\w.-]+)\s*\))?\s*(.*)$", re.S)
+_COMMENT_RE = re.compile(r"/\*(?!!).*?\*/", re.S)
+_CHARSET_RE = re.compile(r"""@charset\s+['"][^'"]*['"]\s*;""")
+_SOURCEMAP_RE = re.compile(r"^\s*(//|/\*)[#@]\s*sourceMappingURL=.*$", re.M)
+
+# Manifest por processo: static_root -> (mtime, dict)
+_manifest_cache = {}
+
+
+def _eh_url_externa(url):
+    # '#x' / '%23x' (escapado em data: URI): referencia a fragmento, nao arquivo
+    return url.lower().startswith(('http://', 'https://', '//', 'data:', '/', '#', '%23'))
+
+
+def _url_static(static_root, base_dir, url):
+    """Caminho relativo a base_dir -> /static/<...> (preserva ?query/#hash)."""
+    caminho, sep, sufixo = url.partition('?') if '?' in url else url.partition('#')
+    target = os.path.normpath(os.path.join(base_dir, caminho))
+    rel = os.path.relpath(target, static_root).replace(os.sep, '/')
+    return f"/static/{rel}{sep}{sufixo}"
+
+
+def _inline_css(static_root, path, hoisted, visitados):
+    """Conteudo do CSS com @import locais inlinados e url() absolutizados."""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = _CHARSET_RE.sub('', f.read())
+    # Comentarios fora ANTES dos @import (import comentado nao pode ser inlinado)
+    content = _COMMENT_RE.sub('', content)
+    base_dir = os.path.dirname(path)
+    blocos = []
+
+    def repl_import(m):
+        url, condicao = m.group(1).strip(), m.group(2).strip()
+        target = os.path.normpath(os.path.join(base_dir, url))
+        if _eh_url_externa(url) or not os.path.isfile(target):
+            if not _eh_url_externa(url):
+                url = _url_static(static_root, base_dir, url)
+            stmt = f"@import url('{url}'){' ' + condicao if condicao else ''};"
+            if stmt not in hoisted:
+                hoisted.append(stmt)
+            return ''
+        if target in visitados:
+            return ''  # ciclo/duplicado: o navegador tambem so aplica uma vez
+        visitados.add(target)
+        corpo = _inline_css(static_root, target, hoisted, visitados)
+
+        layer = _LAYER_RE.match(condicao)
+        if layer:
+            nome, condicao = layer.group(1), layer.group(2).strip()
+            corpo = f"@layer {nome + ' ' if nome else ''}{{\n{corpo}\n}}"
+        if condicao:
+            corpo = f"@media {condicao} {{\n{corpo}\n}}"
+        blocos.append(corpo)
+        return f"\x00BLOCO{len(blocos) - 1}\x00"
+
+    content = _IMPORT_STMT_RE.sub(repl_import, content)
+
+    def repl_url(m):
+        if not m.group(0).startswith('url('):
+            return m.group(0)  # string literal: intocada
+        url = next(g for g in m.groups() if g is not None).strip()
+        if not url or _eh_url_externa(url):
+            return m.group(0)
+        return f"url('{_url_static(static_root, base_dir, url)}')"
+
+    content = _CSS_URL_RE.sub(repl_url, content)
+    return re.sub(r"\x00BLOCO(\d+)\x00", lambda m: blocos[int(m.group(1))], content)
+
+
+def bundle_css(static_root, rel_path):
+    """Entry-point CSS -> um unico CSS (camadas preservadas, nao minificado)."""
+    hoisted = []
+    path = os.path.join(static_root, rel_path)
+    corpo = _inline_css(static_root, path, hoisted, {os.path.normpath(path)})
+    # @import so e valido antes de qualquer regra (exceto @charset/@layer stmt)
+    return '\n'.join(hoisted + [corpo])
+
+
+def minify_css(css):
+    """Minificador conservador: remove comentarios (exceto /*! licenca */) e
+    espacos redundantes, sem tocar em strings."""
+    partes = re.split(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""", css)
+    out = []
+    for i, parte in enumerate(partes):
+        if i % 2:  # string literal
+            out.append(parte)
+            continue
+        parte = _COMMENT_RE.sub('', parte)
+        parte = re.sub(r"\s+", ' ', parte)
+        parte = re.sub(r"\s*([{};,>])\s*", r"\1", parte)
+        parte = parte.replace(';}', '}')
+        out.append(parte)
+    return ''.join(out).strip()
+
+
+def bundle_js(static_root, arquivos):
+    """Concatena os scripts na ordem (minifica com rjsmin se disponivel)."""
+    partes = []
+    for rel in arquivos:
+        with open(os.path.join(static_root, rel), 'r', encoding='utf-8') as f:
+            codigo = _SOURCEMAP_RE.sub('', f.read())
+        # ';' separa scripts que terminam sem ponto-e-virgula (IIFE seguida de IIFE)
+        partes.append(f"/* {rel} */\n{codigo.rstrip()}\n;")
+    js = '\n'.join(partes)
+    try:
+        import rjsmin  # opcional
+        js = rjsmin.jsmin(js)
+    except ImportError:
+        pass
+    return js
+
+
+def _gravar_com_comprimidos(path, dados):
+    """Grava o arquivo + .gz (sempre) e .br (se `brotli` instalado)."""
+    import gzip
+
+    with open(path, 'wb') as f:
+        f.write(dados)
+    with open(path + '.gz', 'wb') as f:
+        # mtime=0: .gz deterministico (mesmo conteudo -> mesmos bytes)
+        f.write(gzip.compress(dados, compresslevel=9, mtime=0))
+    try:
+        import brotli  # opcional
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(dados, quality=11))
+    except ImportError:
+        pass
+
+
+def build_assets(static_root, css_bundles=None, js_bundles=None):
+    """Gera static/dist/* + manifest.json. Retorna o manifest.
+
+    Remove bundles de builds anteriores que sairam do manifest.
+    """
+    import json
+
+    css_bundles = CSS_BUNDLES if css_bundles is None else css_bundles
+    js_bundles = JS_BUNDLES if js_bundles is None else js_bundles
+    dist = os.path.join(static_root, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+
+    gerados = {}
+    for nome, entry in css_bundles.items():
+        gerados[nome] = minify_css(bundle_css(static_root, entry))
+    for nome, arquivos in js_bundles.items():
+        gerados[nome] = bundle_js(static_root, arquivos)
+
+    manifest = {}
+    for nome, conteudo in gerados.items():
+        dados = conteudo.encode('utf-8')
+        base, ext = os.path.splitext(nome)
+        arquivo = f"{base}.{hashlib.md5(dados).hexdigest()[:10]}{ext}"
+        _gravar_com_comprimidos(os.path.join(dist, arquivo), dados)
+        manifest[nome] = f"{DIST_DIR}/{arquivo}"
+
+    validos = {os.path.basename(p) for p in manifest.values()}
+    for existente in os.listdir(dist):
+        original = re.sub(r"\.(gz|br)$", '', existente)
+        if existente != MANIFEST_NAME and original not in validos:
+            os.remove(os.path.join(dist, existente))
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_root):
+    """manifest.json do dist (cache por mtime; {} se o build nao rodou)."""
+    import json
+
+    path = os.path.join(static_root, DIST_DIR, MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _manifest_cache.get(static_root)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    _manifest_cache[static_root] = (mtime, manifest)
+    return manifest
+
+
+def asset_bundle(name):
+    """Helper Jinja: URLs do bundle logico `name` (ex.: 'main.css', 'base.js').
+
+    Uso:
+        {% for src in asset_bundle('base.js') %}<script src="{{ src }}"></script>{% endfor %}
+
+    Manifest presente (producao, apos `flask build-assets`) -> [URL do bundle].
+    Sem manifest, em debug, ou ASSET_BUNDLES_ENABLED=false -> fontes individuais
+    versionadas (main.css pela rota /assets/main.css).
+    """
+    from flask import current_app, url_for
+
+    usar_bundle = (
+        not current_app.debug
+        and os.getenv('ASSET_BUNDLES_ENABLED', 'true').lower() == 'true'
+    )
+    if usar_bundle:
+        arquivo = load_manifest(os.path.join(current_app.root_path, 'static')).get(name)
+        if arquivo:
+            return [url_for('static', filename=arquivo)]
+
+    if name in CSS_BUNDLES:
+        return [url_for('main_css_versioned')] if name == 'main.css' else [
+            url_for('static', filename=CSS_BUNDLES[name])
+        ]
+    from app.utils.template_filters import asset_url
+    return [asset_url(rel) for rel in JS_BUNDLES.get(name, [])]
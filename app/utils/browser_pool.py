@@ -0,0 +1,393 @@
+"""
+Pool de navegador Playwright por worker (portais Atacadão/Tenda, Odoo web).
+
+Motivação: cada job de portal fazia sync_playwright().start() +
+chromium.launch() (1-3s de startup) e carregava o storage_state do disco.
+
+Solução: um Chromium de longa duração por processo/thread e BrowserContexts
+isolados emprestados por operação, já com o storage_state do portal (o
+arquivo só é relido quando o mtime muda; devolver com salvar_estado=True
+grava o estado atualizado para o próximo empréstimo).
+
+Saúde do pool:
+  - health check antes de emprestar (browser.is_connected / evento
+    "disconnected"): navegador morto => relança (crash recovery) e os
+    empréstimos da geração anterior são descartados
+  - reciclagem após PORTAL_BROWSER_MAX_USOS contextos (memória do Chromium)
+  - despejo por ociosidade (PORTAL_BROWSER_OCIOSO_S) sem empréstimos ativos
+  - vazamento: empréstimo não devolvido após PORTAL_BROWSER_MAX_EMPRESTIMO_S
+    é logado com a origem e fechado em manutencao(); contextos abertos no
+    navegador fora do pool também são reportados
+
+Escopo: a API sync do Playwright fica presa à thread que a iniciou => um pool
+por thread (obter_pool()). Após fork (work-horse do RQ) o pool herdado é
+abandonado e outro é criado no filho. Para reaproveitar o navegador ENTRE
+jobs, o worker precisa rodar sem fork (worker_atacadao.py --sem-fork).
+
+Opt-in por processo: o pool só vale onde habilitar_no_processo() foi chamado
+(worker_atacadao.py --sem-fork). No gunicorn (threads gthread de longa
+duração) e em workers com fork os clientes seguem com launch/close por
+operação — cada thread de request manteria o próprio Chromium vivo sem
+reaproveitamento.
+
+Kill-switch: PORTAL_BROWSER_POOL=false desliga mesmo nos processos habilitados.
+
+Uso:
+    from app.utils.browser_pool import obter_pool
+
+    with obter_pool().contexto('atacadao', storage_state='storage_state_atacadao.json') as context:
+        page = context.new_page()
+        ...
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+MAX_USOS = int(os.getenv('PORTAL_BROWSER_MAX_USOS', '50'))
+OCIOSO_S = float(os.getenv('PORTAL_BROWSER_OCIOSO_S', '600'))
+MAX_EMPRESTIMO_S = float(os.getenv('PORTAL_BROWSER_MAX_EMPRESTIMO_S', '1800'))
+
+
+_habilitado_no_processo = False
+
+
+def habilitar_no_processo() -> None:
+    """Liga o pool neste processo (worker sem fork, jobs na mesma thread)."""
+    global _habilitado_no_processo
+    _habilitado_no_processo = True
+
+
+def pool_habilitado() -> bool:
+    return _habilitado_no_processo and os.getenv('PORTAL_BROWSER_POOL', 'true').lower() == 'true'
+
+
+def _iniciar_playwright():
+    from playwright.sync_api import sync_playwright  # Lazy import
+    return sync_playwright().start()
+
+
+@dataclass
+class Emprestimo:
+    """BrowserContext emprestado pelo pool (devolver com BrowserPool.devolver)."""
+    id: int
+    portal: str
+    context: Any
+    geracao: int
+    inicio: float
+    origem: str
+    storage_state: Optional[Union[str, dict]] = None
+    context_kwargs: Dict[str, Any] = field(default_factory=dict)
+    devolvido: bool = False
+
+
+class BrowserPool:
+    """Um navegador por thread, contextos isolados por empréstimo."""
+
+    def __init__(
+        self,
+        iniciar_playwright: Callable[[], Any] = _iniciar_playwright,
+        headless: bool = True,
+        max_usos: int = MAX_USOS,
+        ocioso_s: float = OCIOSO_S,
+        max_emprestimo_s: float = MAX_EMPRESTIMO_S,
+        launch_kwargs: Optional[Dict[str, Any]] = None,
+        relogio: Callable[[], float] = time.monotonic,
+    ):
+        self._iniciar_playwright = iniciar_playwright
+        self.headless = headless
+        self.max_usos = max_usos
+        self.ocioso_s = ocioso_s
+        self.max_emprestimo_s = max_emprestimo_s
+        self.launch_kwargs = launch_kwargs or {}
+        self._relogio = relogio
+
+        self._pid = os.getpid()
+        self._playwright = None
+        self._browser = None
+        self._desconectado = False
+        self._geracao = 0
+        self._usos = 0
+        self._ultimo_uso = relogio()
+        self._ids = itertools.count(1)
+        self._emprestimos: Dict[int, Emprestimo] = {}
+        self._estados: Dict[str, tuple] = {}  # caminho -> (mtime, storage_state)
+        self.metricas = {
+            'lancamentos': 0,
+            'emprestimos': 0,
+            'devolucoes': 0,
+            'reciclagens': 0,
+            'despejos_ociosidade': 0,
+            'recuperacoes': 0,
+            'vazamentos': 0,
+        }
+
+    # -----------------------------------------------------------------
+    # Navegador
+    # -----------------------------------------------------------------
+
+    def _saudavel(self) -> bool:
+        if self._browser is None or self._desconectado:
+            return False
+        try:
+            return self._browser.is_connected()
+        except Exception:
+            return False
+
+    def _lancar(self):
+        if self._playwright is None:
+            self._playwright = self._iniciar_playwright()
+        self._browser = self._playwright.chromium.launch(headless=self.headless, **self.launch_kwargs)
+        self._desconectado = False
+        self._geracao += 1
+        self._usos = 0
+        self.metricas['lancamentos'] += 1
+        geracao = self._geracao
+
+        def _ao_desconectar(*_):
+            if geracao == self._geracao:
+                self._desconectado = True
+
+        try:
+            self._browser.on('disconnected', _ao_desconectar)
+        except Exception:
+            pass
+        logger.info(f"[BROWSER_POOL] Chromium lançado (geração {geracao}, pid {self._pid})")
+
+    def _fechar_browser(self):
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception as e:
+                logger.debug(f"[BROWSER_POOL] Erro ao fechar navegador: {e}")
+
+    def _verificar_fork(self):
+        """Objetos do Playwright não sobrevivem ao fork: abandona o estado herdado."""
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._playwright = None
+            self._browser = None
+            self._emprestimos.clear()
+            self._usos = 0
+
+    def _garantir_browser(self):
+        self._verificar_fork()
+        self.manutencao()
+
+        if self._browser is not None and not self._saudavel():
+            perdidos = [e for e in self._emprestimos.values() if e.geracao == self._geracao]
+            logger.warning(
+                f"[BROWSER_POOL] Navegador caiu (geração {self._geracao}); "
+                f"{len(perdidos)} empréstimo(s) invalidado(s). Relançando..."
+            )
+            for emp in perdidos:
+                emp.devolvido = True
+                self._emprestimos.pop(emp.id, None)
+            self._browser = None
+            self.metricas['recuperacoes'] += 1
+
+        if self._browser is not None and self._usos >= self.max_usos and not self._emprestimos:
+            logger.info(f"[BROWSER_POOL] Reciclando navegador após {self._usos} contextos")
+            self._fechar_browser()
+            self.metricas['reciclagens'] += 1
+
+        if self._browser is None:
+            self._lancar()
+
+    # -----------------------------------------------------------------
+    # Storage state
+    # -----------------------------------------------------------------
+
+    def _resolver_estado(self, storage_state: Optional[Union[str, dict]]) -> Optional[dict]:
+        """Arquivo de storage_state em cache por mtime; dict passa direto."""
+        if storage_state is None or isinstance(storage_state, dict):
+            return storage_state
+        caminho = os.path.abspath(str(storage_state))
+        try:
+            mtime = os.path.getmtime(caminho)
+        except OSError:
+            return None
+        em_cache = self._estados.get(caminho)
+        if em_cache and em_cache[0] == mtime:
+            return em_cache[1]
+        with open(caminho, encoding='utf-8') as f:
+            estado = json.load(f)
+        self._estados[caminho] = (mtime, estado)
+        return estado
+
+    # -----------------------------------------------------------------
+    # Empréstimos
+    # -----------------------------------------------------------------
+
+    def emprestar(
+        self,
+        portal: str,
+        storage_state: Optional[Union[str, dict]] = None,
+        **context_kwargs,
+    ) -> Emprestimo:
+        """
+        Empresta um BrowserContext isolado do navegador do pool.
+
+        Args:
+            portal: Nome do portal (logs e diagnóstico de vazamento)
+            storage_state: Caminho do storage_state (JSON) ou dict; None = contexto limpo
+            **context_kwargs: Repassados a browser.new_context (viewport, ignore_https_errors...)
+        """
+        self._garantir_browser()
+        estado = self._resolver_estado(storage_state)
+        kwargs = dict(context_kwargs)
+        if estado is not None:
+            kwargs['storage_state'] = estado
+        try:
+            context = self._browser.new_context(**kwargs)
+        except Exception as e:
+            # Navegador morreu entre o health check e o new_context: uma nova tentativa
+            logger.warning(f"[BROWSER_POOL] new_context falhou ({e}); relançando navegador")
+            self._desconectado = True
+            self._garantir_browser()
+            context = self._browser.new_context(**kwargs)
+
+        emprestimo = Emprestimo(
+            id=next(self._ids),
+            portal=portal,
+            context=context,
+            geracao=self._geracao,
+            inicio=self._relogio(),
+            origem=_origem_chamada(),
+            storage_state=storage_state,
+            context_kwargs=context_kwargs,
+        )
+        self._emprestimos[emprestimo.id] = emprestimo
+        self._usos += 1
+        self.metricas['emprestimos'] += 1
+        return emprestimo
+
+    def devolver(self, emprestimo: Emprestimo, salvar_estado: bool = False) -> None:
+        """
+        Fecha o contexto emprestado.
+
+        Args:
+            emprestimo: Retorno de emprestar()
+            salvar_estado: Grava o storage_state do contexto no arquivo de origem
+                (ex.: após login) — o próximo empréstimo já sai autenticado
+        """
+        if emprestimo.devolvido:
+            return
+        emprestimo.devolvido = True
+        self._emprestimos.pop(emprestimo.id, None)
+
+        if salvar_estado and isinstance(emprestimo.storage_state, str) and emprestimo.geracao == self._geracao:
+            try:
+                emprestimo.context.storage_state(path=emprestimo.storage_state)
+            except Exception as e:
+                logger.warning(f"[BROWSER_POOL] Não salvou storage_state de {emprestimo.portal}: {e}")
+        try:
+            emprestimo.context.close()
+        except Exception as e:
+            logger.debug(f"[BROWSER_POOL] Erro ao fechar contexto: {e}")
+
+        self._ultimo_uso = self._relogio()
+        self.metricas['devolucoes'] += 1
+        if self._usos >= self.max_usos and not self._emprestimos and self._browser is not None:
+            logger.info(f"[BROWSER_POOL] Reciclando navegador após {self._usos} contextos")
+            self._fechar_browser()
+            self.metricas['reciclagens'] += 1
+
+    def renovar(self, emprestimo: Emprestimo) -> Emprestimo:
+        """Troca um empréstimo quebrado (página travada, navegador caiu) por um novo."""
+        self.devolver(emprestimo)
+        return self.emprestar(emprestimo.portal, emprestimo.storage_state, **emprestimo.context_kwargs)
+
+    @contextmanager
+    def contexto(self, portal: str, storage_state=None, salvar_estado: bool = False, **context_kwargs):
+        """Context manager: empresta e devolve mesmo em exceção."""
+        emprestimo = self.emprestar(portal, storage_state, **context_kwargs)
+        try:
+            yield emprestimo.context
+        finally:
+            self.devolver(emprestimo, salvar_estado=salvar_estado)
+
+    # -----------------------------------------------------------------
+    # Manutenção
+    # -----------------------------------------------------------------
+
+    def vazamentos(self) -> List[Emprestimo]:
+        """Empréstimos ativos há mais de max_emprestimo_s."""
+        limite = self._relogio() - self.max_emprestimo_s
+        return [e for e in self._emprestimos.values() if e.inicio < limite]
+
+    def contextos_orfaos(self) -> int:
+        """Contextos abertos no navegador que não vieram do pool."""
+        if not self._saudavel():
+            return 0
+        nossos = {id(e.context) for e in self._emprestimos.values()}
+        return sum(1 for c in self._browser.contexts if id(c) not in nossos)
+
+    def manutencao(self) -> None:
+        """Fecha empréstimos vazados e despeja o navegador ocioso."""
+        for emp in self.vazamentos():
+            logger.warning(
+                f"[BROWSER_POOL] Contexto vazado: portal={emp.portal} "
+                f"há {self._relogio() - emp.inicio:.0f}s, emprestado em {emp.origem}"
+            )
+            self.metricas['vazamentos'] += 1
+            self.devolver(emp)
+
+        if (
+            self._browser is not None
+            and not self._emprestimos
+            and self._relogio() - self._ultimo_uso > self.ocioso_s
+        ):
+            logger.info(f"[BROWSER_POOL] Navegador ocioso há mais de {self.ocioso_s:.0f}s; fechando")
+            self._fechar_browser()
+            self.metricas['despejos_ociosidade'] += 1
+
+    def fechar(self) -> None:
+        """Fecha contextos, navegador e driver."""
+        for emp in list(self._emprestimos.values()):
+            self.devolver(emp)
+        self._fechar_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            **self.metricas,
+            'ativos': len(self._emprestimos),
+            'geracao': self._geracao,
+            'usos_geracao': self._usos,
+            'navegador_vivo': self._saudavel(),
+        }
+
+
+def _origem_chamada() -> str:
+    """Primeiro frame fora deste módulo (arquivo:linha função)."""
+    for frame in reversed(traceback.extract_stack(limit=8)[:-1]):
+        if not frame.filename.endswith('browser_pool.py'):
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    return '?'
+
+
+_local = threading.local()
+
+
+def obter_pool() -> BrowserPool:
+    """Pool da thread atual (criado no primeiro uso)."""
+    pool = getattr(_local, 'pool', None)
+    if pool is None:
+        pool = _local.pool = BrowserPool()
+    return pool
@@ -0,0 +1,313 @@
+"""
+file_cache.py — cache local enderecado por conteudo para o FileStorage (S3).
+
+PROBLEMA QUE RESOLVE
+--------------------
+`FileStorage.download_file` ia ao S3 a cada acesso. Parsers (CTe/NF/fatura),
+fluxos Playwright e exports baixam os MESMOS PDFs/XMLs varias vezes — cada
+vez pagando latencia + egress. E `save_file` re-enviava conteudo identico sob
+nomes novos (mesmo XML importado por duas telas).
+
+SOLUCAO
+-------
+- Objetos gravados em disco pelo SHA-256 do conteudo:
+      <dir>/objects/ab/abcdef...        (conteudo)
+      <dir>/keys/<md5(bucket/key)>.json (key S3 -> sha256 + ETag + ultima checagem)
+  Varias keys com o mesmo conteudo ocupam UM arquivo. Escrita via arquivo
+  temporario + os.replace (seguro entre workers do mesmo host).
+- LRU limitado por tamanho (FILE_CACHE_MAX_MB): hit atualiza o mtime; ao
+  passar do teto, remove os mais antigos ate 80% do teto.
+- Revalidacao: mapeamento key->sha mais velho que FILE_CACHE_REVALIDATE_SECONDS
+  faz um head_object (ETag igual -> continua valendo, sem baixar).
+- Reverso sha -> key (disco + Redis quando disponivel) permite ao upload
+  detectar conteudo ja presente no bucket e fazer copy_object server-side
+  em vez de reenviar os bytes (cada registro continua com sua propria key —
+  delete_file de um nao afeta o outro).
+
+Flags (env): FILE_CACHE_ENABLED (default true), FILE_CACHE_DIR
+(/tmp/file_storage_cache), FILE_CACHE_MAX_MB (512), FILE_CACHE_REVALIDATE_SECONDS
+(3600), FILE_STORAGE_DEDUP_ENABLED (default true).
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+_REDIS_SHA_PREFIX = 'file_storage:sha256:'
+_REDIS_SHA_TTL = 30 * 24 * 3600
+
+
+def cache_enabled():
+    return os.getenv('FILE_CACHE_ENABLED', 'true').lower() == 'true'
+
+
+def dedup_enabled():
+    return os.getenv('FILE_STORAGE_DEDUP_ENABLED', 'true').lower() == 'true'
+
+
+def _redis():
+    try:
+        from app.utils.redis_cache import redis_cache
+    except Exception:
+        return None
+    return redis_cache.client if redis_cache.disponivel else None
+
+
+class ContentCache:
+    """Cache em disco enderecado por SHA-256, com indice key S3 -> conteudo."""
+
+    def __init__(self, root, max_bytes, revalidate_seconds):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        self._approx_bytes = None
+        self.stats = {
+            'hits': 0, 'misses': 0, 'revalidated': 0, 'evicted': 0,
+            'bytes_from_s3': 0, 'dedup_copies': 0,
+        }
+
+    # ------------------------------------------------------------------ paths
+
+    def _object_path(self, sha):
+        return os.path.join(self.root, 'objects', sha[:2], sha)
+
+    def _key_path(self, bucket, key):
+        nome = hashlib.md5(f'{bucket}/{key}'.encode()).hexdigest()
+        return os.path.join(self.root, 'keys', f'{nome}.json')
+
+    def _sha_path(self, sha):
+        return os.path.join(self.root, 'hashes', f'{sha}.json')
+
+    def _write_json(self, path, dados):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(dados, f)
+        os.replace(tmp, path)
+
+    def _read_json(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # ---------------------------------------------------------------- objetos
+
+    def has(self, sha):
+        return bool(sha) and os.path.exists(self._object_path(sha))
+
+    def open_object(self, sha):
+        """Arquivo do conteudo (atualiza o LRU) ou None se foi removido."""
+        path = self._object_path(sha)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return f
+
+    def read_object(self, sha):
+        f = self.open_object(sha)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def spool(self, chunks):
+        """Grava chunks num temporario calculando o hash -> (sha, tamanho, tmp)."""
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+        digest = hashlib.sha256()
+        tamanho = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode('utf-8')
+                    digest.update(chunk)
+                    f.write(chunk)
+                    tamanho += len(chunk)
+        except BaseException:
+            self.discard(tmp)
+            raise
+        return digest.hexdigest(), tamanho, tmp
+
+    def tee(self, chunks, bucket, key, etag=None):
+        """Repassa os chunks ao consumidor gravando no cache em paralelo.
+
+        So registra a key se o consumo chegar ao fim (parcial e descartado).
+        """
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+        digest = hashlib.sha256()
+        tamanho = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+                    tamanho += len(chunk)
+                    yield chunk
+        except BaseException:
+            self.discard(tmp)
+            raise
+        sha = digest.hexdigest()
+        self.adopt(tmp, sha, tamanho)
+        self.stats['bytes_from_s3'] += tamanho
+        self.remember_key(bucket, key, sha, etag)
+
+    def adopt(self, tmp, sha, tamanho):
+        """Move o temporario para objects/ (descarta se o conteudo ja existe)."""
+        path = self._object_path(sha)
+        if os.path.exists(path):
+            self.discard(tmp)
+            os.utime(path)
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_bytes()
+            else:
+                self._approx_bytes += tamanho
+            excedeu = self._approx_bytes > self.max_bytes
+        if excedeu:
+            self.evict()
+        return path
+
+    @staticmethod
+    def discard(tmp):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+    def _iter_objects(self):
+        base = os.path.join(self.root, 'objects')
+        for dirpath, _dirs, files in os.walk(base):
+            for nome in files:
+                path = os.path.join(dirpath, nome)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _scan_bytes(self):
+        return sum(tamanho for _p, tamanho, _m in self._iter_objects())
+
+    def evict(self):
+        """Remove os objetos menos usados ate 80% do teto."""
+        with self._lock:
+            objetos = sorted(self._iter_objects(), key=lambda o: o[2])
+            total = sum(o[1] for o in objetos)
+            alvo = int(self.max_bytes * 0.8)
+            for path, tamanho, _mtime in objetos:
+                if total <= alvo:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= tamanho
+                self.stats['evicted'] += 1
+            self._approx_bytes = total
+
+    # ----------------------------------------------------------------- indice
+
+    def lookup_key(self, bucket, key):
+        """{'sha256', 'etag', 'checked_at'} da key ou None."""
+        return self._read_json(self._key_path(bucket, key))
+
+    def remember_key(self, bucket, key, sha, etag=None):
+        self._write_json(self._key_path(bucket, key), {
+            'sha256': sha, 'etag': etag, 'checked_at': time.time(),
+        })
+        self._write_json(self._sha_path(sha), {'bucket': bucket, 'key': key})
+        client = _redis()
+        if client is not None:
+            try:
+                client.setex(f'{_REDIS_SHA_PREFIX}{sha}', _REDIS_SHA_TTL, f'{bucket}/{key}')
+            except Exception as e:
+                logger.debug(f"[FILE_CACHE] setex sha falhou: {e}")
+
+    def touch_key(self, bucket, key, entrada):
+        entrada = dict(entrada, checked_at=time.time())
+        self._write_json(self._key_path(bucket, key), entrada)
+
+    def forget_key(self, bucket, key):
+        try:
+            os.remove(self._key_path(bucket, key))
+        except OSError:
+            pass
+
+    def needs_revalidation(self, entrada):
+        return time.time() - (entrada.get('checked_at') or 0) > self.revalidate_seconds
+
+    def key_for_sha(self, sha):
+        """(bucket, key) de um objeto ja enviado com este conteudo, ou None."""
+        client = _redis()
+        if client is not None:
+            try:
+                valor = client.get(f'{_REDIS_SHA_PREFIX}{sha}')
+            except Exception as e:
+                logger.debug(f"[FILE_CACHE] get sha falhou: {e}")
+                valor = None
+            if valor:
+                if isinstance(valor, bytes):
+                    valor = valor.decode('utf-8')
+                bucket, _, key = valor.partition('/')
+                return bucket, key
+        dados = self._read_json(self._sha_path(sha))
+        if dados:
+            return dados['bucket'], dados['key']
+        return None
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['approx_bytes'] = self._approx_bytes
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / total, 3) if total else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_content_cache():
+    """Singleton por processo (FileStorage e instanciado a cada uso)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ContentCache(
+                    root=os.getenv('FILE_CACHE_DIR', os.path.join(
+                        tempfile.gettempdir(), 'file_storage_cache')),
+                    max_bytes=int(os.getenv('FILE_CACHE_MAX_MB', '512')) * 1024 * 1024,
+                    revalidate_seconds=int(os.getenv('FILE_CACHE_REVALIDATE_SECONDS', '3600')),
+                )
+    return _cache
+
+
+def reset_content_cache():
+    """Descarta o singleton (testes / troca de FILE_CACHE_DIR)."""
+    global _cache
+    with _cache_lock:
+        _cache = None
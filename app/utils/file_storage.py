@@ -6,6 +6,7 @@ from werkzeug.utils import secure_filename
 from flask import current_app, url_for, has_app_context
 import mimetypes
 from app.utils.timezone import agora_utc_naive
+from app.utils.file_cache import CHUNK_SIZE, cache_enabled, dedup_enabled, get_content_cache
 
 try:
     import boto3
@@ -197,33 +198,88 @@ class FileStorage:
             return None
     
     def _save_to_s3(self, file, file_path):
-        """Salva arquivo no S3 com otimizações de performance"""
+        """Salva arquivo no S3 com otimizações de performance
+
+        Com o cache de conteudo ativo (app/utils/file_cache.py) o arquivo e
+        lido UMA vez para um temporario calculando o SHA-256: conteudo ja
+        presente no bucket vira copy_object server-side (sem reenviar bytes)
+        e o temporario fica no cache local (download seguinte nao vai ao S3).
+        """
         try:
             # 🛠️ CORREÇÃO: Suporte a BytesIO e FileStorage
             file_name = getattr(file, 'filename', None) or getattr(file, 'name', None)
 
             # Determina content type
             content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream' if file_name else 'application/octet-stream'
+            extra_args = {
+                'ContentType': content_type,
+                'ACL': 'private'  # Arquivos privados por padrão
+            }
+
+            if not cache_enabled():
+                # ✅ OTIMIZAÇÃO: Upload para S3 com TransferConfig
+                self.s3_client.upload_fileobj(
+                    file,
+                    self.bucket_name,
+                    file_path,
+                    ExtraArgs=extra_args,
+                    Config=self.transfer_config  # ✅ Usar configuração otimizada
+                )
+                # 🆕 CORRIGIDO: Retorna apenas o caminho, sem prefixo
+                # Isso mantém consistência com o banco de dados
+                return file_path
 
-            # ✅ OTIMIZAÇÃO: Upload para S3 com TransferConfig
-            self.s3_client.upload_fileobj(
-                file,
-                self.bucket_name,
-                file_path,
-                ExtraArgs={
-                    'ContentType': content_type,
-                    'ACL': 'private'  # Arquivos privados por padrão
-                },
-                Config=self.transfer_config  # ✅ Usar configuração otimizada
-            )
-
-            # 🆕 CORRIGIDO: Retorna apenas o caminho, sem prefixo
-            # Isso mantém consistência com o banco de dados
+            cache = get_content_cache()
+            sha, tamanho, tmp = cache.spool(iter(lambda: file.read(CHUNK_SIZE), b''))
+            try:
+                extra_args['Metadata'] = {'sha256': sha}
+                if not (dedup_enabled() and self._copy_existing(sha, file_path, extra_args)):
+                    with open(tmp, 'rb') as f:
+                        self.s3_client.upload_fileobj(
+                            f,
+                            self.bucket_name,
+                            file_path,
+                            ExtraArgs=extra_args,
+                            Config=self.transfer_config
+                        )
+                cache.adopt(tmp, sha, tamanho)
+            except BaseException:
+                cache.discard(tmp)
+                raise
+            cache.remember_key(self.bucket_name, file_path, sha)
             return file_path
 
         except ClientError as e:
             _safe_log_error(f"Erro S3: {str(e)}")
             raise
+
+    def _copy_existing(self, sha, file_path, extra_args):
+        """Copia server-side um objeto com o mesmo conteudo (True se copiou).
+
+        A origem so e usada se o head_object confirmar o sha256 nos metadados
+        (objeto pode ter sido apagado/sobrescrito desde o registro).
+        """
+        cache = get_content_cache()
+        origem = cache.key_for_sha(sha)
+        if not origem or origem == (self.bucket_name, file_path):
+            return False
+        bucket_origem, key_origem = origem
+        try:
+            head = self.s3_client.head_object(Bucket=bucket_origem, Key=key_origem)
+            if (head.get('Metadata') or {}).get('sha256') != sha:
+                return False
+            self.s3_client.copy_object(
+                Bucket=self.bucket_name,
+                Key=file_path,
+                CopySource={'Bucket': bucket_origem, 'Key': key_origem},
+                MetadataDirective='REPLACE',
+                **extra_args,
+            )
+        except ClientError as e:
+            _safe_log_warning(f"Dedup S3 ignorado para {file_path} (upload normal): {str(e)}")
+            return False
+        cache.stats['dedup_copies'] += 1
+        return True
     
     def _save_locally(self, file, file_path):
         """Salva arquivo localmente"""
@@ -442,34 +498,158 @@ class FileStorage:
             current_app.logger.error(f"Erro ao baixar arquivo {file_path}: {str(e)}")
             return None
 
+    def _s3_location(self, file_path):
+        """(bucket, key) de um caminho 's3://bucket/key' ou key sem prefixo."""
+        if file_path.startswith('s3://'):
+            return file_path.split('/')[2], '/'.join(file_path.split('/')[3:])
+        return self.bucket_name, file_path
+
+    def _cached_sha(self, bucket_name, object_key):
+        """SHA-256 do conteudo da key se ele estiver no cache local, senao None.
+
+        Mapeamento recente e confiado; mapeamento velho (ou ausente) custa um
+        head_object — ETag/sha256 iguais evitam o download do corpo.
+        """
+        cache = get_content_cache()
+        entrada = cache.lookup_key(bucket_name, object_key)
+        if entrada and cache.has(entrada['sha256']) and not cache.needs_revalidation(entrada):
+            return entrada['sha256']
+
+        try:
+            head = self.s3_client.head_object(Bucket=bucket_name, Key=object_key)
+        except ClientError:
+            return None
+        sha = (head.get('Metadata') or {}).get('sha256')
+        etag = head.get('ETag')
+        if entrada and cache.has(entrada['sha256']) and (
+            entrada['sha256'] == sha or (etag and entrada.get('etag') == etag)
+        ):
+            cache.touch_key(bucket_name, object_key, dict(entrada, etag=etag))
+            cache.stats['revalidated'] += 1
+            return entrada['sha256']
+        if sha and cache.has(sha):
+            # Mesmo conteudo ja baixado por outra key (copia/dedup)
+            cache.remember_key(bucket_name, object_key, sha, etag)
+            return sha
+        return None
+
     def _download_from_s3(self, file_path):
-        """Baixa arquivo do S3 e retorna bytes."""
+        """Baixa arquivo do S3 e retorna bytes (via cache local de conteudo)."""
         from io import BytesIO
 
         try:
-            if file_path.startswith('s3://'):
-                bucket_name = file_path.split('/')[2]
-                object_key = '/'.join(file_path.split('/')[3:])
-            else:
-                bucket_name = self.bucket_name
-                object_key = file_path
-
-            buffer = BytesIO()
-            self.s3_client.download_fileobj(bucket_name, object_key, buffer)
-            buffer.seek(0)
-            return buffer.read()
+            bucket_name, object_key = self._s3_location(file_path)
+
+            if not cache_enabled():
+                buffer = BytesIO()
+                self.s3_client.download_fileobj(bucket_name, object_key, buffer)
+                buffer.seek(0)
+                return buffer.read()
+
+            cache = get_content_cache()
+            sha = self._cached_sha(bucket_name, object_key)
+            if sha:
+                data = cache.read_object(sha)
+                if data is not None:
+                    cache.stats['hits'] += 1
+                    return data
+
+            cache.stats['misses'] += 1
+            resp = self.s3_client.get_object(Bucket=bucket_name, Key=object_key)
+            sha, tamanho, tmp = cache.spool(resp['Body'].iter_chunks(CHUNK_SIZE))
+            try:
+                with open(tmp, 'rb') as f:
+                    data = f.read()
+                cache.adopt(tmp, sha, tamanho)
+            except BaseException:
+                cache.discard(tmp)
+                raise
+            cache.stats['bytes_from_s3'] += tamanho
+            cache.remember_key(bucket_name, object_key, sha, resp.get('ETag'))
+            return data
 
         except ClientError as e:
             current_app.logger.error(f"Erro S3 download: {str(e)}")
             raise
 
-    def _download_locally(self, file_path):
-        """Baixa arquivo local e retorna bytes."""
+    def iter_file(self, file_path, chunk_size=CHUNK_SIZE):
+        """
+        Le o arquivo em chunks sem carregar tudo em memoria (arquivos grandes).
+
+        S3: serve do cache local quando presente; senao faz streaming do corpo
+        gravando no cache em paralelo (consumo interrompido descarta a copia).
+
+        Yields:
+            bytes: chunks de ate chunk_size
+        """
+        if not file_path:
+            return
+
+        if not (self.use_s3 and not file_path.startswith('uploads/')):
+            full_path = self._local_full_path(file_path)
+            with open(full_path, 'rb') as f:
+                yield from iter(lambda: f.read(chunk_size), b'')
+            return
+
+        bucket_name, object_key = self._s3_location(file_path)
+        if not cache_enabled():
+            body = self.s3_client.get_object(Bucket=bucket_name, Key=object_key)['Body']
+            yield from body.iter_chunks(chunk_size)
+            return
+
+        cache = get_content_cache()
+        sha = self._cached_sha(bucket_name, object_key)
+        f = cache.open_object(sha) if sha else None
+        if f is not None:
+            cache.stats['hits'] += 1
+            with f:
+                yield from iter(lambda: f.read(chunk_size), b'')
+            return
+
+        cache.stats['misses'] += 1
+        resp = self.s3_client.get_object(Bucket=bucket_name, Key=object_key)
+        yield from cache.tee(
+            resp['Body'].iter_chunks(chunk_size), bucket_name, object_key, resp.get('ETag'),
+        )
+
+    def read_range(self, file_path, start, end=None):
+        """
+        Le um intervalo de bytes [start, end] (inclusivo, como HTTP Range).
+
+        S3 sem cache local: GET com Range — so o trecho trafega (cabecalho de
+        PDF, paginas de XML grande). Com cache: seek no arquivo local.
+        """
+        if not file_path:
+            return None
+
+        if self.use_s3 and not file_path.startswith('uploads/'):
+            bucket_name, object_key = self._s3_location(file_path)
+            if cache_enabled():
+                cache = get_content_cache()
+                sha = self._cached_sha(bucket_name, object_key)
+                f = cache.open_object(sha) if sha else None
+                if f is not None:
+                    cache.stats['hits'] += 1
+                    with f:
+                        f.seek(start)
+                        return f.read(-1 if end is None else end - start + 1)
+            faixa = f'bytes={start}-' if end is None else f'bytes={start}-{end}'
+            resp = self.s3_client.get_object(Bucket=bucket_name, Key=object_key, Range=faixa)
+            return resp['Body'].read()
+
+        with open(self._local_full_path(file_path), 'rb') as f:
+            f.seek(start)
+            return f.read(-1 if end is None else end - start + 1)
+
+    def _local_full_path(self, file_path):
         if file_path.startswith('s3://'):
             local_path = '/'.join(file_path.split('/')[3:])
-            full_path = os.path.join(current_app.root_path, 'static', 'uploads', local_path)
-        else:
-            full_path = os.path.join(current_app.root_path, 'static', file_path)
+            return os.path.join(current_app.root_path, 'static', 'uploads', local_path)
+        return os.path.join(current_app.root_path, 'static', file_path)
+
+    def _download_locally(self, file_path):
+        """Baixa arquivo local e retorna bytes."""
+        full_path = self._local_full_path(file_path)
 
         if not os.path.exists(full_path):
             current_app.logger.error(f"Arquivo local não encontrado: {full_path}")
@@ -500,12 +680,15 @@ class FileStorage:
                     Bucket=bucket_name,
                     Key=object_key
                 )
+                get_content_cache().forget_key(bucket_name, object_key)
             elif self.use_s3 and not file_path.startswith('uploads/'):
                 # Path S3 sem prefixo (retornado por save_file com S3 ativo)
                 self.s3_client.delete_object(
                     Bucket=self.bucket_name,
                     Key=file_path
                 )
+                # Conteudo fica no LRU (pode ser de outras keys); so a key sai
+                get_content_cache().forget_key(self.bucket_name, file_path)
             else:
                 # Remove arquivo local
                 full_path = os.path.join(current_app.root_path, 'static', file_path)
@@ -520,4 +703,9 @@ class FileStorage:
 # Função helper para facilitar uso
 def get_file_storage():
     """Retorna instância do FileStorage"""
-    return FileStorage() 
\ No newline at end of file
+    return FileStorage()
+
+
+def get_file_cache_stats():
+    """Hits/misses/dedup do cache local de conteudo S3 (desde o boot do processo)."""
+    return get_content_cache().get_stats() 
\ No newline at end of file
@@ -0,0 +1,379 @@
+"""
+fragment_cache.py — cache de fragmentos Jinja com invalidacao por versao de dados.
+
+PROBLEMA QUE RESOLVE
+--------------------
+Listagens pesadas (monitoramento.listar_entregas, carteira, fretes) re-renderizam
+a tabela inteira a cada request — loops de centenas de linhas, filtros de
+formatacao e lazy loads por linha (comentarios pendentes, relacionamentos) —
+mesmo quando nada mudou desde a ultima visualizacao com os mesmos filtros.
+
+SOLUCAO
+-------
+    {% cache ('monitoramento.entregas', current_user.id, request.query_string), deps %}
+      ... tabela ...
+    {% endcache %}
+
+- `deps`: tabelas (nome ou model) das quais o fragmento depende. Cada tabela tem
+  uma VERSAO (contador em Redis, compartilhado entre workers) incrementada no
+  commit de qualquer sessao que tocou a tabela (ORM flush ou update/delete/insert
+  em massa via session.execute). A chave final inclui as versoes: dado mudou ->
+  chave nova -> re-render; nao ha DELETE de chaves.
+- Armazenamento: LRU local por processo (hit sem rede) + Redis (compartilhado,
+  TTL). Sem Redis: so LRU local + versoes locais (invalidacao so no processo).
+- SQL cru (text()/psycopg) nao e detectado: quem sincroniza por SQL cru chama
+  `bump_versions('tabela', ...)` ao final. O TTL limita qualquer escape.
+- Buracos: `{{ cache_hole('csrf_token') }}` dentro do bloco guarda um marcador
+  no HTML cacheado, trocado pelo valor VIVO a cada render (token CSRF e da
+  sessao do usuario — nunca pode ser servido do cache).
+- Rotas podem pular trabalho preparatorio do bloco com `lookup_fragment(...)`
+  (mesma chave; o resultado fica memorizado no request e o bloco o reusa).
+
+Flags (env): FRAGMENT_CACHE_ENABLED (default true), FRAGMENT_CACHE_TTL (600s),
+FRAGMENT_CACHE_LOCAL_MAX (64 fragmentos por processo).
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+logger = logging.getLogger(__name__)
+
+_PREFIXO = 'frag'
+_VERSOES_KEY = f'{_PREFIXO}:versoes'
+_HOLE = '\x00hole:{}\x00'
+
+# Buracos suportados: nome -> funcao que devolve o valor vivo
+_HOLES = {}
+
+# True enquanto o corpo de um {% cache %} renderiza (cache_hole emite marcador)
+_em_fragmento = contextvars.ContextVar('fragment_cache_em_fragmento', default=False)
+
+
+def _enabled():
+    return os.getenv('FRAGMENT_CACHE_ENABLED', 'true').lower() == 'true'
+
+
+def _ttl():
+    return int(os.getenv('FRAGMENT_CACHE_TTL', '600'))
+
+
+def _redis():
+    """Client Redis compartilhado (None se indisponivel)."""
+    try:
+        from app.utils.redis_cache import redis_cache
+    except Exception:
+        return None
+    return redis_cache.client if redis_cache.disponivel else None
+
+
+class _LocalLRU:
+    """LRU thread-safe com TTL (fragmentos recentes sem ida ao Redis)."""
+
+    def __init__(self, max_itens):
+        self.max_itens = max_itens
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            html, expira = item
+            if expira < time.time():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return html
+
+    def set(self, chave, html, ttl):
+        with self._lock:
+            self._dados[chave] = (html, time.time() + ttl)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+
+_local = _LocalLRU(int(os.getenv('FRAGMENT_CACHE_LOCAL_MAX', '64')))
+
+# Versoes locais (fallback sem Redis)
+_versoes_locais = {}
+_versoes_lock = threading.Lock()
+
+_stats = {'hits_local': 0, 'hits_redis': 0, 'misses': 0}
+
+
+# =============================================================================
+# Versoes de dados por tabela
+# =============================================================================
+
+def _nome_tabela(dep):
+    """Aceita nome de tabela, model ORM ou Table."""
+    if isinstance(dep, str):
+        return dep
+    tabela = getattr(dep, '__table__', dep)
+    return getattr(tabela, 'name', None) or str(dep)
+
+
+def get_versions(deps):
+    """Versao atual de cada tabela (0 = nunca alterada desde o boot do Redis)."""
+    tabelas = sorted({_nome_tabela(d) for d in deps or ()})
+    if not tabelas:
+        return {}
+    client = _redis()
+    if client is not None:
+        try:
+            valores = client.hmget(_VERSOES_KEY, tabelas)
+            return {t: int(v or 0) for t, v in zip(tabelas, valores)}
+        except Exception as e:
+            logger.debug(f"[FRAG_CACHE] hmget de versoes falhou: {e}")
+    with _versoes_lock:
+        return {t: _versoes_locais.get(t, 0) for t in tabelas}
+
+
+def bump_versions(*tabelas):
+    """Invalida os fragmentos que dependem destas tabelas (todos os workers).
+
+    Chamado automaticamente no commit; chamar manualmente apos SQL cru.
+    """
+    nomes = {_nome_tabela(t) for t in tabelas if t}
+    if not nomes:
+        return
+    with _versoes_lock:
+        for t in nomes:
+            _versoes_locais[t] = _versoes_locais.get(t, 0) + 1
+    client = _redis()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for t in nomes:
+            pipe.hincrby(_VERSOES_KEY, t, 1)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"[FRAG_CACHE] bump de versoes falhou ({sorted(nomes)}): {e}")
+
+
+def _tabelas_da_sessao(session):
+    return session.info.setdefault('fragment_cache_tabelas', set())
+
+
+def _registrar_flush(session, flush_context, instances=None):
+    tabelas = _tabelas_da_sessao(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tabela = getattr(type(obj), '__table__', None)
+        if tabela is not None:
+            tabelas.add(tabela.name)
+
+
+def _registrar_dml(orm_execute_state):
+    """update()/delete()/insert() em massa via session.execute (sem flush)."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete
+            or orm_execute_state.is_insert):
+        return
+    tabela = getattr(orm_execute_state.statement, 'table', None)
+    nome = getattr(tabela, 'name', None)
+    if nome:
+        _tabelas_da_sessao(orm_execute_state.session).add(nome)
+
+
+def _publicar_commit(session):
+    tabelas = session.info.pop('fragment_cache_tabelas', None)
+    if tabelas:
+        bump_versions(*tabelas)
+
+
+def _descartar_rollback(session, previous_transaction):
+    # So no rollback da transacao externa (savepoint nao descarta o que o
+    # commit externo ainda vai publicar)
+    if previous_transaction.parent is None:
+        session.info.pop('fragment_cache_tabelas', None)
+
+
+def init_fragment_cache(app):
+    """Registra a extensao Jinja, o helper de buraco e os eventos de sessao."""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['cache_hole'] = cache_hole
+
+    if not event.contains(Session, 'after_flush', _registrar_flush):
+        event.listen(Session, 'after_flush', _registrar_flush)
+        event.listen(Session, 'do_orm_execute', _registrar_dml)
+        event.listen(Session, 'after_commit', _publicar_commit)
+        event.listen(Session, 'after_soft_rollback', _descartar_rollback)
+
+    def _csrf():
+        from flask_wtf.csrf import generate_csrf
+        return generate_csrf()
+
+    register_hole('csrf_token', _csrf)
+
+
+# =============================================================================
+# Buracos (valores vivos dentro do HTML cacheado)
+# =============================================================================
+
+def register_hole(nome, funcao):
+    _HOLES[nome] = funcao
+
+
+def cache_hole(nome):
+    """Dentro de {% cache %}: marcador; fora: o proprio valor."""
+    if _em_fragmento.get():
+        return Markup(_HOLE.format(nome))
+    return _HOLES[nome]()
+
+
+def _preencher_buracos(html):
+    if '\x00hole:' not in html:
+        return Markup(html)
+    for nome, funcao in _HOLES.items():
+        marcador = _HOLE.format(nome)
+        if marcador in html:
+            html = html.replace(marcador, str(funcao()))
+    return Markup(html)
+
+
+# =============================================================================
+# Chave, lookup e armazenamento
+# =============================================================================
+
+def fragment_key(key, deps=()):
+    """Chave final: hash(key) + hash(versoes das dependencias)."""
+    bruto = json.dumps(key, sort_keys=True, default=str)
+    versoes = json.dumps(get_versions(deps), sort_keys=True)
+    return (
+        f"{_PREFIXO}:{hashlib.md5(bruto.encode()).hexdigest()[:16]}:"
+        f"{hashlib.md5(versoes.encode()).hexdigest()[:12]}"
+    )
+
+
+def _memo_request():
+    """Memo por request (flask.g) — None fora de request."""
+    try:
+        from flask import g
+        return g.setdefault('_fragment_cache_memo', {})
+    except RuntimeError:
+        return None
+
+
+def _buscar(chave):
+    html = _local.get(chave)
+    if html is not None:
+        _stats['hits_local'] += 1
+        return html
+    client = _redis()
+    if client is not None:
+        try:
+            html = client.get(chave)
+        except Exception as e:
+            logger.debug(f"[FRAG_CACHE] get falhou: {e}")
+            html = None
+        if html is not None:
+            if isinstance(html, bytes):
+                html = html.decode('utf-8')
+            _local.set(chave, html, _ttl())
+            _stats['hits_redis'] += 1
+            return html
+    _stats['misses'] += 1
+    return None
+
+
+def _guardar(chave, html, ttl=None):
+    ttl = ttl or _ttl()
+    _local.set(chave, html, ttl)
+    client = _redis()
+    if client is not None:
+        try:
+            client.setex(chave, ttl, html)
+        except Exception as e:
+            logger.debug(f"[FRAG_CACHE] setex falhou: {e}")
+
+
+def _resolver(key, deps):
+    """(chave, html|None) memorizado por request.
+
+    As versoes sao lidas UMA vez por fragmento/request: se a rota chamou
+    lookup_fragment antes das queries, um commit concorrente posterior gera
+    chave nova no proximo request (nunca grava dado velho sob versao nova).
+    """
+    memo = _memo_request()
+    identidade = json.dumps(
+        [key, sorted(_nome_tabela(d) for d in deps or ())], sort_keys=True, default=str,
+    )
+    if memo is not None and identidade in memo:
+        return identidade, memo[identidade]
+    chave = fragment_key(key, deps)
+    resolvido = (chave, _buscar(chave))
+    if memo is not None:
+        memo[identidade] = resolvido
+    return identidade, resolvido
+
+
+def lookup_fragment(key, deps=()):
+    """HTML cacheado do fragmento (None = miss) — para a rota pular preparo.
+
+    O resultado fica memorizado no request: o {% cache %} com a mesma chave
+    usa exatamente este valor (sem corrida entre o lookup e o render).
+    """
+    if not _enabled():
+        return None
+    return _resolver(key, deps)[1][1]
+
+
+def get_fragment_cache_stats():
+    return dict(_stats)
+
+
+def clear_local_fragments():
+    _local.clear()
+
+
+# =============================================================================
+# Extensao Jinja: {% cache key, deps[, ttl] %} ... {% endcache %}
+# =============================================================================
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', args), [], [], body,
+        ).set_lineno(lineno)
+
+    def _render(self, key, deps=(), ttl=None, caller=None):
+        if not _enabled():
+            return caller()
+
+        identidade, (chave, html) = _resolver(key, deps)
+        if html is None:
+            token = _em_fragmento.set(True)
+            try:
+                html = str(caller())
+            finally:
+                _em_fragmento.reset(token)
+            _guardar(chave, html, ttl)
+            memo = _memo_request()
+            if memo is not None:
+                memo[identidade] = (chave, html)
+        return _preencher_buracos(html)
@@ -7,6 +7,10 @@ Le contexto (session_id, tool_use_id, agent_type, usuario) via ENV vars
 propagadas pelo PreToolUse hook do agente web (app/agente/sdk/hooks.py).
 Quando ENV ausente (worker RQ, scheduler, CLI direto), usa fallbacks.
 
+Gravacao: execute_kw usa enfileirar_chamada_odoo (writer assincrono em
+lote, app/utils/odoo_audit_writer.py). registrar_chamada_odoo segue como
+caminho sincrono (savepoint) — fallback e chamadas diretas.
+
 NUNCA quebra a operacao Odoo — todo erro vira log Sentry e segue.
 
 Tabela destino: operacao_odoo_auditoria (model app/odoo/models/...).
@@ -130,6 +134,74 @@ def _extrair_odoo_id(args: list) -> Optional[int]:
     return None
 
 
+def _montar_registro(
+    *,
+    model: str,
+    method: str,
+    args: list,
+    kwargs: dict,
+    resultado: Any,
+    tempo_ms: int,
+    erro: Optional[BaseException],
+) -> dict:
+    """Monta as colunas de operacao_odoo_auditoria para UMA chamada.
+
+    Roda na thread do caller: contexto (ENV) e payload sao capturados no
+    momento da chamada, mesmo quando a gravacao e feita depois (writer async).
+    """
+    from app.utils.json_helpers import sanitize_for_json
+    from app.utils.timezone import agora_utc_naive
+
+    ctx = _resolver_contexto()
+    external_id = _calcular_external_id(
+        ctx['session_id'], ctx['tool_use_id'], model, method, args
+    )
+    status = 'FALHA_ODOO' if erro is not None else 'EXECUTADO'
+
+    # Sanitiza payload + resposta (Decimal/datetime -> str/iso)
+    payload = sanitize_for_json({'args': args, 'kwargs': kwargs})
+    if erro is None:
+        resposta = sanitize_for_json({'result': resultado})
+        erro_msg = None
+    else:
+        resposta = None
+        erro_msg = str(erro)[:4000]
+
+    return {
+        'external_id': external_id,
+        'tabela_origem': 'odoo_audit_hook',
+        'registro_id': 0,  # Sem registro local — chamada XML-RPC direta
+        'acao': method[:60],
+        'modelo_odoo': model[:60],
+        'metodo_odoo': method[:60],
+        'odoo_id': _extrair_odoo_id(args),
+        'status': status,
+        'payload_json': payload,
+        'resposta_json': resposta,
+        'erro_msg': erro_msg,
+        'tempo_execucao_ms': tempo_ms,
+        'contexto_origem': 'execute_kw_hook',
+        'session_id': ctx['session_id'],
+        'tool_use_id': ctx['tool_use_id'],
+        'agent_type': ctx['agent_type'][:40] if ctx['agent_type'] else None,
+        'executado_por': ctx['executado_por'][:80],
+        'executado_em': agora_utc_naive(),
+    }
+
+
+def _reportar_falha_hook(e_top: BaseException) -> None:
+    # Falha total no hook (ex: import broken, db indisponivel).
+    # Loga mas nao quebra a operacao Odoo.
+    logger.warning(
+        f'[odoo_audit_hook] Hook desativado por erro: {e_top}'
+    )
+    try:
+        import sentry_sdk
+        sentry_sdk.capture_exception(e_top)
+    except Exception:
+        pass
+
+
 def registrar_chamada_odoo(
     *,
     model: str,
@@ -142,6 +214,10 @@ def registrar_chamada_odoo(
 ) -> None:
     """Registra UMA chamada XML-RPC ao Odoo em operacao_odoo_auditoria.
 
+    Caminho SINCRONO (savepoint na transacao do caller). execute_kw usa
+    enfileirar_chamada_odoo, que so cai aqui quando o writer async esta
+    desligado ou sem app Flask.
+
     Idempotente: external_id UNIQUE no model — colisao (mesma ms+hash) e
     silenciosamente swallowed (improvavel em prod).
 
@@ -159,46 +235,16 @@ def registrar_chamada_odoo(
         # Lazy import para evitar circular (app.odoo -> app.utils -> app.odoo)
         from app import db
         from app.odoo.models import OperacaoOdooAuditoria
-        from app.utils.json_helpers import sanitize_for_json
 
-        ctx = _resolver_contexto()
-        external_id = _calcular_external_id(
-            ctx['session_id'], ctx['tool_use_id'], model, method, args
+        registro = _montar_registro(
+            model=model, method=method, args=args, kwargs=kwargs,
+            resultado=resultado, tempo_ms=tempo_ms, erro=erro,
         )
-        odoo_id = _extrair_odoo_id(args)
-        status = 'FALHA_ODOO' if erro is not None else 'EXECUTADO'
-
-        # Sanitiza payload + resposta (Decimal/datetime -> str/iso)
-        payload = sanitize_for_json({'args': args, 'kwargs': kwargs})
-        if erro is None:
-            resposta = sanitize_for_json({'result': resultado})
-            erro_msg = None
-        else:
-            resposta = None
-            erro_msg = str(erro)[:4000]
 
         # Savepoint para isolar falha do hook da transacao principal
         try:
             with db.session.begin_nested():
-                OperacaoOdooAuditoria.registrar(
-                    external_id=external_id,
-                    tabela_origem='odoo_audit_hook',
-                    registro_id=0,  # Sem registro local — chamada XML-RPC direta
-                    acao=method[:60],
-                    modelo_odoo=model[:60],
-                    metodo_odoo=method[:60],
-                    odoo_id=odoo_id,
-                    status=status,
-                    payload_json=payload,
-                    resposta_json=resposta,
-                    erro_msg=erro_msg,
-                    tempo_execucao_ms=tempo_ms,
-                    contexto_origem='execute_kw_hook',
-                    session_id=ctx['session_id'],
-                    tool_use_id=ctx['tool_use_id'],
-                    agent_type=ctx['agent_type'][:40] if ctx['agent_type'] else None,
-                    executado_por=ctx['executado_por'][:80],
-                )
+                OperacaoOdooAuditoria.registrar(**registro)
         except Exception as e_save:
             # Savepoint falhou — log mas nao reraise.
             logger.warning(
@@ -206,13 +252,59 @@ def registrar_chamada_odoo(
             )
 
     except Exception as e_top:
-        # Falha total no hook (ex: import broken, db indisponivel).
-        # Loga mas nao quebra a operacao Odoo.
-        logger.warning(
-            f'[odoo_audit_hook] Hook desativado por erro: {e_top}'
-        )
-        try:
-            import sentry_sdk
-            sentry_sdk.capture_exception(e_top)
-        except Exception:
-            pass
+        _reportar_falha_hook(e_top)
+
+
+def enfileirar_chamada_odoo(
+    *,
+    model: str,
+    method: str,
+    args: list,
+    kwargs: dict,
+    resultado: Any,
+    tempo_ms: int,
+    erro: Optional[BaseException] = None,
+) -> None:
+    """Versao assincrona de registrar_chamada_odoo (usada por execute_kw).
+
+    Monta o registro na thread do caller e entrega ao OdooAuditWriter, que
+    grava em lote fora da transacao do caller (sem savepoint por RPC).
+    Writer desligado (AGENT_ODOO_AUDIT_ASYNC=false), job RQ sem flush no fim
+    do job ou sem app context -> cai no caminho sincrono.
+
+    NUNCA propaga excecao — caller (execute_kw) NAO pode quebrar.
+    """
+    if not _flag_ativa():
+        return
+    if method not in METODOS_WRITE_AUDITADOS:
+        return
+
+    try:
+        from app.utils.odoo_audit_writer import get_audit_writer, modo_async_ativo
+
+        if not modo_async_ativo():
+            registrar_chamada_odoo(
+                model=model, method=method, args=args, kwargs=kwargs,
+                resultado=resultado, tempo_ms=tempo_ms, erro=erro,
+            )
+            return
+
+        from flask import current_app, has_app_context
+
+        writer = get_audit_writer()
+        if has_app_context():
+            writer.vincular_app(current_app._get_current_object())
+        if not writer.pode_gravar():
+            registrar_chamada_odoo(
+                model=model, method=method, args=args, kwargs=kwargs,
+                resultado=resultado, tempo_ms=tempo_ms, erro=erro,
+            )
+            return
+
+        writer.enfileirar(_montar_registro(
+            model=model, method=method, args=args, kwargs=kwargs,
+            resultado=resultado, tempo_ms=tempo_ms, erro=erro,
+        ))
+
+    except Exception as e_top:
+        _reportar_falha_hook(e_top)
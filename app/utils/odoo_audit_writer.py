@@ -0,0 +1,369 @@
+"""Writer assincrono em lote para o audit hook Odoo.
+
+Substitui, no caminho quente de OdooConnection.execute_kw, o INSERT
+sincrono (savepoint por chamada XML-RPC) feito por registrar_chamada_odoo.
+
+Fluxo:
+    execute_kw -> enfileirar_chamada_odoo (monta registro, ~us)
+               -> fila em memoria LIMITADA (AGENT_ODOO_AUDIT_FILA_MAX)
+               -> thread daemon drena a cada N registros OU T ms
+               -> 1 INSERT multi-row ON CONFLICT (external_id) DO NOTHING
+
+Quando o banco esta indisponivel (ou a fila esta cheia), os registros vao
+para arquivos JSONL em AGENT_ODOO_AUDIT_SPILL_DIR. O proximo flush bem
+sucedido reprocessa esses arquivos (idempotente via external_id UNIQUE).
+
+Conexao PROPRIA (db.engine.begin()) — o INSERT nao participa da transacao
+do caller. Trade-off conhecido: um rollback do caller NAO desfaz a
+auditoria (antes o savepoint era desfeito junto). Para auditoria de
+chamadas XML-RPC isso e o desejado: a chamada ao Odoo aconteceu.
+
+NUNCA propaga excecao para o caller — todo erro vira log + spill.
+
+Work-horse do RQ termina com os._exit (atexit NAO roda): o que estiver na
+fila no fim do job se perderia. Dentro de job RQ o writer so e usado se o
+worker chamar flush_pendentes() ao fim de cada job e declarar isso com
+habilitar_flush_por_job() (ProfiledWorker em worker_render.py); nos demais
+workers a auditoria grava sincrona (registrar_chamada_odoo).
+
+ENV vars:
+    AGENT_ODOO_AUDIT_ASYNC        (default true)  liga o writer
+    AGENT_ODOO_AUDIT_FILA_MAX     (default 5000)  capacidade da fila
+    AGENT_ODOO_AUDIT_LOTE         (default 200)   registros por INSERT
+    AGENT_ODOO_AUDIT_INTERVALO_MS (default 500)   flush maximo a cada T ms
+    AGENT_ODOO_AUDIT_SPILL_DIR    (default /tmp/odoo_audit_spill)
+"""
+from __future__ import annotations
+
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SPILL_PREFIXO = 'odoo_audit_'
+SPILL_EXTENSAO = '.jsonl'
+
+
+def _env_int(nome: str, default: int) -> int:
+    try:
+        return int(os.getenv(nome, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+# Worker RQ que faz flush_pendentes() no fim de cada job (herdado no fork)
+_flush_por_job = False
+
+
+def habilitar_flush_por_job() -> None:
+    """Declara que o worker RQ chama flush_pendentes() ao fim de cada job."""
+    global _flush_por_job
+    _flush_por_job = True
+
+
+def _em_job_rq() -> bool:
+    try:
+        from rq import get_current_job
+        return get_current_job() is not None
+    except Exception:
+        return False
+
+
+def modo_async_ativo() -> bool:
+    """Writer assincrono ligado? Default true — desligar volta ao savepoint sincrono.
+
+    AGENT_ODOO_AUDIT_ASYNC=false e o kill-switch. Em job RQ sem flush no fim
+    do job, tambem sincrono (os._exit do work-horse perderia a fila).
+    """
+    if os.getenv('AGENT_ODOO_AUDIT_ASYNC', 'true').lower() not in ('true', '1', 'yes'):
+        return False
+    return _flush_por_job or not _em_job_rq()
+
+
+def _serializar_registro(registro: dict) -> str:
+    """JSON de uma linha para o spill (datetime -> ISO)."""
+    linha = dict(registro)
+    executado_em = linha.get('executado_em')
+    if isinstance(executado_em, datetime):
+        linha['executado_em'] = executado_em.isoformat()
+    return json.dumps(linha, ensure_ascii=False, default=str)
+
+
+def _desserializar_registro(linha: str) -> dict:
+    registro = json.loads(linha)
+    executado_em = registro.get('executado_em')
+    if isinstance(executado_em, str):
+        registro['executado_em'] = datetime.fromisoformat(executado_em)
+    return registro
+
+
+def _inserir_lote_db(app, registros: list) -> None:
+    """INSERT multi-row em operacao_odoo_auditoria, em conexao propria.
+
+    ON CONFLICT (external_id) DO NOTHING torna o replay do spill idempotente.
+    """
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+    from app import db
+    from app.odoo.models import OperacaoOdooAuditoria
+
+    with app.app_context():
+        stmt = pg_insert(OperacaoOdooAuditoria.__table__).on_conflict_do_nothing(
+            index_elements=['external_id']
+        )
+        with db.engine.begin() as conn:
+            conn.execute(stmt, registros)
+
+
+class OdooAuditWriter:
+    """Fila limitada + thread drenadora com spill em disco.
+
+    `inserir(registros)` e injetavel (testes usam stub em memoria); default
+    grava via `_inserir_lote_db` com o app Flask capturado no enfileiramento.
+    """
+
+    def __init__(
+        self,
+        *,
+        inserir: Optional[Callable[[list], None]] = None,
+        max_fila: Optional[int] = None,
+        lote: Optional[int] = None,
+        intervalo_ms: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ):
+        self._inserir = inserir
+        self._app = None
+        self.max_fila = max_fila or _env_int('AGENT_ODOO_AUDIT_FILA_MAX', 5000)
+        self.lote = max(1, lote or _env_int('AGENT_ODOO_AUDIT_LOTE', 200))
+        self.intervalo_s = max(
+            0.01, (intervalo_ms or _env_int('AGENT_ODOO_AUDIT_INTERVALO_MS', 500)) / 1000.0
+        )
+        self.spill_dir = spill_dir or os.getenv(
+            'AGENT_ODOO_AUDIT_SPILL_DIR', '/tmp/odoo_audit_spill'
+        )
+        self._fila: queue.Queue = queue.Queue(maxsize=self.max_fila)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._pid = os.getpid()
+        self.stats = {
+            'enfileirados': 0,
+            'gravados': 0,
+            'lotes': 0,
+            'spill_registros': 0,
+            'spill_reprocessados': 0,
+            'erros_db': 0,
+        }
+
+    # ------------------------------------------------------------------ setup
+    def vincular_app(self, app) -> None:
+        """Guarda o app Flask usado pela thread (primeiro app vence)."""
+        if self._app is None and app is not None:
+            self._app = app
+
+    def pode_gravar(self) -> bool:
+        """Tem destino para os registros (app Flask vinculado ou inserir injetado)?"""
+        return self._app is not None or self._inserir is not None
+
+    def _gravar(self, registros: list) -> None:
+        if self._inserir is not None:
+            self._inserir(registros)
+            return
+        if self._app is None:
+            raise RuntimeError('OdooAuditWriter sem app Flask vinculado')
+        _inserir_lote_db(self._app, registros)
+
+    def _garantir_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._parar.clear()
+            self._thread = threading.Thread(
+                target=self._loop, name='odoo-audit-writer', daemon=True
+            )
+            self._thread.start()
+
+    # -------------------------------------------------------------- producer
+    def enfileirar(self, registro: dict) -> None:
+        """Nao bloqueia: fila cheia -> spill direto em disco."""
+        try:
+            self._fila.put_nowait(registro)
+            self.stats['enfileirados'] += 1
+        except queue.Full:
+            logger.warning('[odoo_audit_writer] Fila cheia — spill direto em disco')
+            self._spill([registro])
+            return
+        self._garantir_thread()
+
+    # -------------------------------------------------------------- consumer
+    def _drenar(self, limite: int) -> list:
+        registros = []
+        while len(registros) < limite:
+            try:
+                registros.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return registros
+
+    def _loop(self) -> None:
+        while not self._parar.is_set():
+            # Acorda antes do intervalo se o lote ja encheu
+            prazo = time.monotonic() + self.intervalo_s
+            while self._fila.qsize() < self.lote and time.monotonic() < prazo:
+                if self._parar.wait(min(0.05, self.intervalo_s)):
+                    break
+            try:
+                self.flush()
+            except Exception as e:  # pragma: no cover — flush ja protege
+                logger.warning(f'[odoo_audit_writer] Loop falhou: {e}')
+
+    def flush(self) -> int:
+        """Drena a fila inteira em lotes. Retorna quantos foram gravados no DB."""
+        gravados = 0
+        with self._flush_lock:
+            while True:
+                registros = self._drenar(self.lote)
+                if not registros:
+                    break
+                try:
+                    self._gravar(registros)
+                except Exception as e:
+                    self.stats['erros_db'] += 1
+                    logger.warning(
+                        f'[odoo_audit_writer] Falha ao gravar lote de {len(registros)} '
+                        f'— spill em disco: {e}'
+                    )
+                    self._spill(registros)
+                    # DB indisponivel: o restante da fila tambem vai para o spill
+                    restante = self._drenar(self.max_fila)
+                    if restante:
+                        self._spill(restante)
+                    return gravados
+                gravados += len(registros)
+                self.stats['gravados'] += len(registros)
+                self.stats['lotes'] += 1
+            self._reprocessar_spill()
+        return gravados
+
+    # ----------------------------------------------------------------- spill
+    def _spill(self, registros: list) -> None:
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            caminho = os.path.join(
+                self.spill_dir, f'{SPILL_PREFIXO}{os.getpid()}{SPILL_EXTENSAO}'
+            )
+            with self._lock, open(caminho, 'a', encoding='utf-8') as f:
+                for registro in registros:
+                    f.write(_serializar_registro(registro) + '\n')
+            self.stats['spill_registros'] += len(registros)
+        except Exception as e:
+            # Ultimo recurso: perde o registro, mas NUNCA quebra o Odoo.
+            logger.error(
+                f'[odoo_audit_writer] Spill falhou — {len(registros)} registros perdidos: {e}'
+            )
+
+    def arquivos_spill(self) -> list:
+        return sorted(glob.glob(
+            os.path.join(self.spill_dir, f'{SPILL_PREFIXO}*{SPILL_EXTENSAO}')
+        ))
+
+    def _reprocessar_spill(self) -> None:
+        """Reenvia arquivos de spill (de qualquer PID) apos um flush OK.
+
+        Renomeia para .processando antes de ler — dois workers nao pegam o
+        mesmo arquivo. Em falha, o arquivo volta ao nome original.
+        """
+        for caminho in self.arquivos_spill():
+            em_processo = f'{caminho}.{os.getpid()}.processando'
+            try:
+                os.rename(caminho, em_processo)
+            except OSError:
+                continue  # outro worker pegou
+            try:
+                with open(em_processo, encoding='utf-8') as f:
+                    registros = [_desserializar_registro(l) for l in f if l.strip()]
+                for i in range(0, len(registros), self.lote):
+                    self._gravar(registros[i:i + self.lote])
+                os.remove(em_processo)
+                self.stats['spill_reprocessados'] += len(registros)
+                logger.info(
+                    f'[odoo_audit_writer] Spill reprocessado: {len(registros)} '
+                    f'registros de {os.path.basename(caminho)}'
+                )
+            except Exception as e:
+                logger.warning(
+                    f'[odoo_audit_writer] Reprocessamento do spill adiado: {e}'
+                )
+                try:
+                    os.rename(em_processo, caminho)
+                except OSError:
+                    pass
+                return
+
+    # -------------------------------------------------------------- shutdown
+    def parar(self, timeout: float = 5.0) -> None:
+        """Sinaliza a thread e faz flush final (chamado em atexit)."""
+        self._parar.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning(f'[odoo_audit_writer] Flush final falhou: {e}')
+
+    def status(self) -> dict:
+        return {
+            **self.stats,
+            'pendentes': self._fila.qsize(),
+            'max_fila': self.max_fila,
+            'lote': self.lote,
+            'intervalo_ms': int(self.intervalo_s * 1000),
+            'arquivos_spill': len(self.arquivos_spill()),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Singleton por processo (recriado apos fork — gunicorn preload)
+# ---------------------------------------------------------------------------
+_writer: Optional[OdooAuditWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer() -> OdooAuditWriter:
+    global _writer
+    if _writer is not None and _writer._pid == os.getpid():
+        return _writer
+    with _writer_lock:
+        if _writer is None or _writer._pid != os.getpid():
+            _writer = OdooAuditWriter()
+    return _writer
+
+
+def flush_pendentes() -> int:
+    """Flush sincrono do writer deste processo (fim de job RQ). Nunca propaga."""
+    if _writer is None or _writer._pid != os.getpid():
+        return 0
+    try:
+        return _writer.flush()
+    except Exception as e:
+        logger.warning(f'[odoo_audit_writer] Flush de fim de job falhou: {e}')
+        return 0
+
+
+def _flush_no_shutdown() -> None:
+    if _writer is not None and _writer._pid == os.getpid():
+        _writer.parar()
+
+
+atexit.register(_flush_no_shutdown)
@@ -0,0 +1,245 @@
+"""
+Extracao de PDF compartilhada — abre cada PDF UMA vez por processo
+==================================================================
+
+Classificacao (`ImportacaoService._classificar_pdf`) e parsers (DANFE, DACTE,
+Fatura, extractors de pedidos/leitura) abriam os mesmos bytes com pdfplumber
+varias vezes, repetindo a analise de layout do documento inteiro — o custo
+dominante da importacao.
+
+`documento_pdf(pdf_bytes=..., pdf_path=...)` devolve um `DocumentoPDF`
+memoizado pelo sha256 do conteudo. O documento retem SO os bytes e o texto
+extraido por pagina: palavras/chars/tabelas sao recalculados a cada chamada
+(sao listas de dicts — dezenas de vezes o tamanho do PDF).
+
+O handle do pdfplumber nunca fica aberto entre chamadas: cada extracao abre,
+le a pagina, faz `page.flush_cache()` e fecha. Quem percorre varias paginas
+agrupa as leituras em `with doc.aberto():` (um open so). O LRU e limitado por
+quantidade de documentos e pelos bytes RETIDOS (PDF + texto memoizado).
+
+Valores devolvidos sao compartilhados: callers NAO devem muta-los.
+
+ENV vars:
+    PDF_EXTRACAO_CACHE_MAX_DOCS   (default 32)
+    PDF_EXTRACAO_CACHE_MAX_MB     (default 128)
+"""
+
+import hashlib
+import io
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MAX_DOCS = int(os.environ.get('PDF_EXTRACAO_CACHE_MAX_DOCS', '32'))
+_MAX_BYTES = int(os.environ.get('PDF_EXTRACAO_CACHE_MAX_MB', '128')) * 1024 * 1024
+
+
+class DocumentoPDF:
+    """Bytes de um PDF + texto memoizado por pagina (handle aberto so durante a leitura)."""
+
+    def __init__(self, pdf_bytes: bytes, sha: str):
+        self.pdf_bytes = pdf_bytes
+        self.sha = sha
+        self._lock = threading.RLock()
+        self._pdf = None
+        self._aberturas = 0
+        self._erro_abertura: Optional[Exception] = None
+        self._num_paginas: Optional[int] = None
+        self._textos: Dict[int, str] = {}
+        self._textos_pypdf: Optional[List[str]] = None
+        self._bytes_texto = 0
+
+    @property
+    def tamanho(self) -> int:
+        """Bytes retidos: conteudo do PDF + texto memoizado."""
+        return len(self.pdf_bytes) + self._bytes_texto
+
+    def _reter_texto(self, texto: str) -> None:
+        self._bytes_texto += sys.getsizeof(texto)
+
+    @contextmanager
+    def aberto(self):
+        """Mantem o pdfplumber aberto no bloco (reentrante); fecha ao sair.
+
+        Falha de abertura e memoizada.
+        """
+        with self._lock:
+            if self._pdf is None:
+                if self._erro_abertura is not None:
+                    raise self._erro_abertura
+                try:
+                    import pdfplumber
+                    self._pdf = pdfplumber.open(io.BytesIO(self.pdf_bytes))
+                except Exception as e:
+                    self._erro_abertura = e
+                    raise
+                self._num_paginas = len(self._pdf.pages)
+            self._aberturas += 1
+            try:
+                yield self._pdf
+            finally:
+                self._aberturas -= 1
+                if self._aberturas == 0:
+                    self.fechar()
+
+    @property
+    def num_paginas(self) -> int:
+        with self._lock:
+            if self._num_paginas is None:
+                with self.aberto():
+                    pass
+            return self._num_paginas
+
+    def _da_pagina(self, indice: int, calcular: Callable) -> Any:
+        with self.aberto() as pdf:
+            page = pdf.pages[indice]
+            try:
+                return calcular(page)
+            finally:
+                page.flush_cache()
+
+    def texto_pagina(self, indice: int) -> str:
+        with self._lock:
+            texto = self._textos.get(indice)
+            if texto is None:
+                texto = self._da_pagina(indice, lambda p: p.extract_text() or '')
+                self._textos[indice] = texto
+                self._reter_texto(texto)
+            return texto
+
+    def textos_paginas(self) -> List[str]:
+        """Texto de todas as paginas ('' para paginas sem texto)."""
+        with self._lock:
+            if len(self._textos) == self._num_paginas:
+                return [self._textos[i] for i in range(self._num_paginas)]
+            with self.aberto():
+                return [self.texto_pagina(i) for i in range(self.num_paginas)]
+
+    def palavras(self, indice: int) -> List[Dict]:
+        return self._da_pagina(indice, lambda p: p.extract_words())
+
+    def caracteres(self, indice: int) -> List[Dict]:
+        return self._da_pagina(indice, lambda p: list(p.chars))
+
+    def tabelas(self, indice: int) -> List[List]:
+        return self._da_pagina(indice, lambda p: p.extract_tables())
+
+    def dimensoes(self, indice: int) -> Tuple[float, float]:
+        with self.aberto() as pdf:
+            page = pdf.pages[indice]
+            return (page.width, page.height)
+
+    def textos_pypdf(self) -> List[str]:
+        """Texto por pagina via pypdf (fallback dos parsers)."""
+        with self._lock:
+            if self._textos_pypdf is None:
+                import pypdf
+                reader = pypdf.PdfReader(io.BytesIO(self.pdf_bytes))
+                self._textos_pypdf = [page.extract_text() or '' for page in reader.pages]
+                for texto in self._textos_pypdf:
+                    self._reter_texto(texto)
+            return self._textos_pypdf
+
+    def fechar(self) -> None:
+        with self._lock:
+            if self._pdf is not None:
+                try:
+                    self._pdf.close()
+                except Exception as e:
+                    logger.debug(f"Falha ao fechar PDF {self.sha[:12]}: {e}")
+                self._pdf = None
+
+
+class CacheDocumentosPDF:
+    """LRU de DocumentoPDF por sha256 (limite por quantidade e por bytes retidos).
+
+    O texto extraido cresce depois da insercao; o total e recalculado a cada
+    `obter()` (poucas dezenas de documentos) antes de despejar.
+    """
+
+    def __init__(self, max_docs: int = _MAX_DOCS, max_bytes: int = _MAX_BYTES):
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self._docs: 'OrderedDict[str, DocumentoPDF]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'despejados': 0}
+
+    def _bytes_retidos(self) -> int:
+        return sum(doc.tamanho for doc in self._docs.values())
+
+    def obter(self, pdf_bytes: bytes) -> DocumentoPDF:
+        sha = hashlib.sha256(pdf_bytes).hexdigest()
+        despejados = []
+        with self._lock:
+            doc = self._docs.get(sha)
+            if doc is not None:
+                self._docs.move_to_end(sha)
+                self.stats['hits'] += 1
+            else:
+                self.stats['misses'] += 1
+                doc = DocumentoPDF(pdf_bytes, sha)
+                self._docs[sha] = doc
+            retidos = self._bytes_retidos()
+            # Mantem pelo menos o documento pedido (sempre o mais recente)
+            while len(self._docs) > 1 and (
+                len(self._docs) > self.max_docs or retidos > self.max_bytes
+            ):
+                _, antigo = self._docs.popitem(last=False)
+                retidos -= antigo.tamanho
+                self.stats['despejados'] += 1
+                despejados.append(antigo)
+        for antigo in despejados:
+            antigo.fechar()
+        return doc
+
+    def limpar(self) -> None:
+        with self._lock:
+            docs = list(self._docs.values())
+            self._docs.clear()
+        for doc in docs:
+            doc.fechar()
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {**self.stats, 'documentos': len(self._docs), 'bytes': self._bytes_retidos()}
+
+
+_cache = CacheDocumentosPDF()
+
+
+def _reiniciar_apos_fork():
+    # Filho do pool de parsing herda o cache (e possivelmente um lock ocupado)
+    global _cache
+    _cache = CacheDocumentosPDF()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_apos_fork)
+
+
+def documento_pdf(pdf_bytes: bytes = None, pdf_path: str = None) -> Optional[DocumentoPDF]:
+    """DocumentoPDF compartilhado para os bytes (ou arquivo) informados.
+
+    Returns:
+        DocumentoPDF ou None se nenhum conteudo foi informado.
+    """
+    if pdf_bytes is None and pdf_path:
+        with open(pdf_path, 'rb') as fh:
+            pdf_bytes = fh.read()
+    if not pdf_bytes:
+        return None
+    return _cache.obter(pdf_bytes)
+
+
+def status_cache() -> Dict:
+    return _cache.status()
+
+
+def limpar_cache() -> None:
+    _cache.limpar()
@@ -1,21 +1,45 @@
 """
-Query Profiler — Detecta N+1 e conta queries por request.
+Query Profiler — Detecta N+1 e conta queries por request, job, scheduler e CLI.
 
-Ativado via env var ENABLE_QUERY_PROFILING=true (default: false).
-Custo quando desligado: 1 check booleano por query (overhead ~zero).
+Dois modos independentes:
 
-Output nos logs:
-  GET /carteira/listar | Queries: 47 | DB time: 1.234s | Total: 2.100s
-  N+1 SUSPECT: /carteira/listar | 47 queries | Repeated: {'SELECT separacao WHERE id = ?': 42}
+1. Por request (ENABLE_QUERY_PROFILING=true, default: false)
+   Conta queries em `g` e loga no after_request.
+   Output nos logs:
+     GET /carteira/listar | Queries: 47 | DB time: 1.234s | Total: 2.100s
+     N+1 SUSPECT: /carteira/listar | 47 queries | Repeated: {'SELECT separacao WHERE id = ?': 42}
+
+2. Fingerprints sempre-ligado (ENABLE_QUERY_FINGERPRINTS, default: true)
+   Agrega por fingerprint (query normalizada) em QUALQUER contexto — request,
+   job RQ, step do scheduler, script CLI: contagem, tempo total, p95, origem
+   (`query_scope`) e call site (stack amostrado). Janela rolante em memoria;
+   a rotacao (log + pipeline Redis) roda numa thread timer por processo, nunca
+   dentro da query que cruza a fronteira da janela.
+   Leitura: GET /admin/scheduler/query-profiler/api.
+
+`query_scope(label)` tambem conta queries de um bloco — base do fixture
+pytest `query_budget` (tests/conftest.py), que falha o teste quando um
+caminho excede o numero de queries declarado.
 """
 
+import contextvars
+import hashlib
+import json
+import logging
+import os
 import re
+import sys
+import threading
 import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import wraps
 
-from flask import g, has_request_context
+from flask import g, has_request_context, request
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
 
+logger = logging.getLogger(__name__)
 
 # Threshold para considerar N+1 (mesma query normalizada repetida N+ vezes)
 N_PLUS_ONE_THRESHOLD = 10
@@ -37,6 +61,9 @@ def _normalize_query(statement: str) -> str:
 @event.listens_for(Engine, "before_cursor_execute")
 def _before_cursor_execute(_conn, _cursor, _statement, _parameters, context, _executemany):
     """Event listener: marca inicio da execucao."""
+    if _fingerprints_ativo or _escopos_ativos.get():
+        context._query_start_time = time.monotonic()
+        return
     if not has_request_context():
         return
     if not hasattr(g, "_query_profiler"):
@@ -47,6 +74,17 @@ def _before_cursor_execute(_conn, _cursor, _statement, _parameters, context, _ex
 @event.listens_for(Engine, "after_cursor_execute")
 def _after_cursor_execute(_conn, _cursor, statement, _parameters, context, _executemany):
     """Event listener: registra query executada."""
+    escopos = _escopos_ativos.get()
+    if _fingerprints_ativo or escopos:
+        elapsed = time.monotonic() - getattr(context, "_query_start_time", time.monotonic())
+        fingerprint = _normalize_query(statement)
+        for escopo in escopos:
+            escopo.registrar(fingerprint, elapsed)
+        if _fingerprints_ativo:
+            fingerprint_store.registrar(fingerprint, elapsed)
+        _registrar_no_request(fingerprint, elapsed)
+        return
+
     if not has_request_context():
         return
     if not hasattr(g, "_query_profiler"):
@@ -62,18 +100,42 @@ def _after_cursor_execute(_conn, _cursor, statement, _parameters, context, _exec
     profiler["queries"][normalized] = profiler["queries"].get(normalized, 0) + 1
 
 
+def _registrar_no_request(fingerprint: str, elapsed: float) -> None:
+    """Mantem o contador por request quando o caminho rapido de fingerprints esta ativo."""
+    if not has_request_context():
+        return
+    profiler = getattr(g, "_query_profiler", None)
+    if profiler is None:
+        return
+    profiler["count"] += 1
+    profiler["db_time"] += elapsed
+    profiler["queries"][fingerprint] = profiler["queries"].get(fingerprint, 0) + 1
+
+
 def init_query_profiling(app):
     """Inicializa o query profiler.
 
     Listeners sao registrados via decorator no modulo (class-level, nao instance-level).
-    Custo quando ENABLE_QUERY_PROFILING=false: 2 checks booleanos por query
-    (has_request_context + hasattr).
+    Custo quando ENABLE_QUERY_PROFILING=false e ENABLE_QUERY_FINGERPRINTS=false:
+    3 checks baratos por query (flag global + contextvar + has_request_context).
+    Fingerprints ligados (padrao): dict + Counter por query sob lock, stack
+    amostrado 1/QUERY_FINGERPRINTS_AMOSTRA_STACK.
     """
     if app.config.get("ENABLE_QUERY_PROFILING"):
         app.logger.info("Query Profiler ATIVO — monitorando queries por request")
     else:
         app.logger.info("Query Profiler desativado (ENABLE_QUERY_PROFILING=false)")
 
+    if app.config.get("ENABLE_QUERY_FINGERPRINTS", True):
+        configurar_fingerprints(True)
+        app.logger.info(
+            f"Query Fingerprints ATIVO — janela={fingerprint_store.janela_s}s "
+            f"amostra_stack=1/{fingerprint_store.amostra_stack}"
+        )
+    else:
+        configurar_fingerprints(False)
+        app.logger.info("Query Fingerprints desativado (ENABLE_QUERY_FINGERPRINTS=false)")
+
 
 def start_profiling():
     """Inicia profiling para o request atual (chamado em before_request)."""
@@ -104,3 +166,321 @@ def get_profiling_summary() -> dict | None:
         "db_time": profiler["db_time"],
         "n_plus_one": n_plus_one,
     }
+
+
+# =====================================================================
+# Fingerprints sempre-ligado (request + RQ + scheduler + CLI)
+# =====================================================================
+
+_fingerprints_ativo = os.environ.get("ENABLE_QUERY_FINGERPRINTS", "true").lower() in ("true", "1", "yes")
+
+# Escopos abertos na thread/task atual (query_scope). Tupla imutavel — cada
+# query incrementa TODOS os escopos aninhados.
+_escopos_ativos: contextvars.ContextVar[tuple] = contextvars.ContextVar(
+    "query_profiler_escopos", default=()
+)
+
+# Frames destes modulos NAO sao call site (sobe ate achar codigo do app)
+_FRAMES_IGNORADOS = (
+    f"{os.sep}sqlalchemy{os.sep}", f"{os.sep}flask_sqlalchemy{os.sep}", "site-packages", "<frozen",
+    os.path.abspath(__file__),
+)
+_RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_REDIS_PREFIXO = "query_profiler"
+_REDIS_TTL_S = 24 * 3600
+
+
+def configurar_fingerprints(ativo: bool) -> None:
+    """Liga/desliga a coleta de fingerprints no processo atual."""
+    global _fingerprints_ativo
+    _fingerprints_ativo = bool(ativo)
+
+
+def _call_site() -> str:
+    """Primeiro frame do projeto fora de SQLAlchemy/profiler: 'app/x.py:123 func'."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        arquivo = frame.f_code.co_filename
+        if not any(ign in arquivo for ign in _FRAMES_IGNORADOS):
+            relativo = os.path.relpath(arquivo, _RAIZ_PROJETO) if arquivo.startswith(_RAIZ_PROJETO) else arquivo
+            return f"{relativo}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+def _origem_atual() -> str:
+    """Origem da query: escopo mais interno > endpoint do request > script CLI."""
+    escopos = _escopos_ativos.get()
+    if escopos:
+        return escopos[-1].label
+    if has_request_context():
+        try:
+            return f"request:{request.endpoint or request.path}"
+        except Exception:
+            return "request"
+    return f"cli:{os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else 'python'}"
+
+
+def _percentil(valores, pct: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, int(round(pct * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+class _FingerprintStat:
+    __slots__ = ("count", "total", "max", "duracoes", "sites", "origens")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.duracoes = deque(maxlen=256)  # amostra recente para p95
+        self.sites = Counter()
+        self.origens = Counter()
+
+    def como_dict(self, fingerprint: str) -> dict:
+        return {
+            "fingerprint": fingerprint,
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 2),
+            "p95_ms": round(_percentil(self.duracoes, 0.95) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "origens": dict(self.origens.most_common(5)),
+            "call_sites": dict(self.sites.most_common(5)),
+        }
+
+
+class FingerprintStore:
+    """Agregado rolante por fingerprint, thread-safe.
+
+    - Janela corrente + janela anterior (snapshot mostra ambas).
+    - Stack amostrado: 1a ocorrencia de cada fingerprint e depois 1 a cada
+      `amostra_stack` (walk de frames e o custo dominante).
+    - Flush a cada `janela_s` numa thread timer do processo (daemon, recriada
+      apos fork): loga top-N e acumula no Redis. A query que registra so
+      confere se o timer existe — nunca paga o log nem o pipeline Redis.
+    """
+
+    def __init__(self, janela_s: int = 300, amostra_stack: int = 20, max_fingerprints: int = 2000):
+        self.janela_s = janela_s
+        self.amostra_stack = max(1, amostra_stack)
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._atual: dict = {}
+        self._anterior: dict = {}
+        self._inicio = time.monotonic()
+        self._descartados = 0
+        self._timer = None
+        self._parar = threading.Event()
+
+    def _garantir_timer(self) -> None:
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._parar.clear()
+            self._timer = threading.Thread(target=self._loop_timer, name="query-fp-flush", daemon=True)
+            self._timer.start()
+
+    def _loop_timer(self) -> None:
+        while not self._parar.wait(self.janela_s):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.debug(f"[QUERY_FP] flush periodico falhou: {e}")
+
+    def parar_timer(self) -> None:
+        self._parar.set()
+        self._timer = None
+
+    def _apos_fork(self) -> None:
+        # Thread timer nao sobrevive ao fork (work-horse RQ): o proximo
+        # registrar() recria no filho
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._timer = None
+
+    def registrar(self, fingerprint: str, elapsed: float) -> None:
+        origem = _origem_atual()
+        with self._lock:
+            stat = self._atual.get(fingerprint)
+            if stat is None:
+                if len(self._atual) >= self.max_fingerprints:
+                    self._descartados += 1
+                    return
+                stat = self._atual[fingerprint] = _FingerprintStat()
+            stat.count += 1
+            stat.total += elapsed
+            if elapsed > stat.max:
+                stat.max = elapsed
+            stat.duracoes.append(elapsed)
+            stat.origens[origem] += 1
+            amostrar = stat.count == 1 or stat.count % self.amostra_stack == 0
+        if amostrar:
+            site = _call_site()
+            with self._lock:
+                stat.sites[site] += 1
+        if self._timer is None:
+            self._garantir_timer()
+
+    def flush(self, top_n: int = 10) -> dict:
+        """Rotaciona a janela: loga top-N por tempo total e acumula no Redis."""
+        with self._lock:
+            janela, self._atual = self._atual, {}
+            self._anterior = janela
+            duracao = time.monotonic() - self._inicio
+            self._inicio = time.monotonic()
+            descartados, self._descartados = self._descartados, 0
+        if not janela:
+            return {}
+        resumo = {fp: stat.como_dict(fp) for fp, stat in janela.items()}
+        top = sorted(resumo.values(), key=lambda r: r["total_ms"], reverse=True)[:top_n]
+        logger.info(
+            f"[QUERY_FP] janela {duracao:.0f}s | {len(resumo)} fingerprints | "
+            f"{sum(r['count'] for r in resumo.values())} queries"
+            + (f" | {descartados} descartadas (limite)" if descartados else "")
+        )
+        for r in top:
+            logger.info(
+                f"[QUERY_FP] {r['count']}x total={r['total_ms']}ms p95={r['p95_ms']}ms "
+                f"site={next(iter(r['call_sites']), '?')} | {r['fingerprint'][:120]}"
+            )
+        self._publicar_redis(resumo)
+        return resumo
+
+    def _publicar_redis(self, resumo: dict) -> None:
+        """Acumula no Redis — agrega web + work-horses RQ (processos efemeros)."""
+        try:
+            from app.utils.redis_cache import redis_cache
+            if not redis_cache.disponivel:
+                return
+            pipe = redis_cache.client.pipeline(transaction=False)
+            indice = f"{_REDIS_PREFIXO}:indice"
+            for fp, r in resumo.items():
+                chave = f"{_REDIS_PREFIXO}:fp:{hashlib.md5(fp.encode()).hexdigest()[:16]}"
+                pipe.hincrby(chave, "count", r["count"])
+                pipe.hincrbyfloat(chave, "total_ms", r["total_ms"])
+                pipe.hset(chave, mapping={
+                    "fingerprint": fp,
+                    "p95_ms": r["p95_ms"],
+                    "origens": json.dumps(r["origens"]),
+                    "call_sites": json.dumps(r["call_sites"]),
+                })
+                pipe.expire(chave, _REDIS_TTL_S)
+                pipe.zincrby(indice, r["total_ms"], chave)
+            pipe.expire(indice, _REDIS_TTL_S)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"[QUERY_FP] publicar Redis falhou: {e}")
+
+    def snapshot(self, limite: int = 50) -> dict:
+        """Janela corrente + anterior ordenadas por tempo total (processo local)."""
+        with self._lock:
+            atual = [stat.como_dict(fp) for fp, stat in self._atual.items()]
+            anterior = [stat.como_dict(fp) for fp, stat in self._anterior.items()]
+        chave = lambda r: r["total_ms"]  # noqa: E731
+        return {
+            "pid": os.getpid(),
+            "janela_s": self.janela_s,
+            "atual": sorted(atual, key=chave, reverse=True)[:limite],
+            "anterior": sorted(anterior, key=chave, reverse=True)[:limite],
+        }
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._atual = {}
+            self._anterior = {}
+            self._inicio = time.monotonic()
+            self._descartados = 0
+
+
+fingerprint_store = FingerprintStore(
+    janela_s=int(os.environ.get("QUERY_FINGERPRINTS_JANELA_S", "300")),
+    amostra_stack=int(os.environ.get("QUERY_FINGERPRINTS_AMOSTRA_STACK", "20")),
+)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: fingerprint_store._apos_fork())
+
+
+def obter_fingerprints_redis(limite: int = 50) -> list:
+    """Top fingerprints acumulados no Redis (todos os processos, ultimas 24h)."""
+    try:
+        from app.utils.redis_cache import redis_cache
+        if not redis_cache.disponivel:
+            return []
+        chaves = redis_cache.client.zrevrange(f"{_REDIS_PREFIXO}:indice", 0, limite - 1)
+        resultado = []
+        for chave in chaves:
+            dados = redis_cache.client.hgetall(chave)
+            if not dados:
+                continue
+            resultado.append({
+                "fingerprint": dados.get("fingerprint"),
+                "count": int(dados.get("count", 0)),
+                "total_ms": round(float(dados.get("total_ms", 0)), 2),
+                "p95_ms": float(dados.get("p95_ms", 0)),
+                "origens": json.loads(dados.get("origens") or "{}"),
+                "call_sites": json.loads(dados.get("call_sites") or "{}"),
+            })
+        return resultado
+    except Exception as e:
+        logger.debug(f"[QUERY_FP] leitura Redis falhou: {e}")
+        return []
+
+
+class QueryScope:
+    """Contador de queries de um bloco (ver `query_scope`)."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.db_time = 0.0
+        self.queries: Counter = Counter()
+
+    def registrar(self, fingerprint: str, elapsed: float) -> None:
+        self.count += 1
+        self.db_time += elapsed
+        self.queries[fingerprint] += 1
+
+    def resumo(self, top_n: int = 10) -> str:
+        linhas = [f"{self.label}: {self.count} queries em {self.db_time * 1000:.1f}ms"]
+        for fp, n in self.queries.most_common(top_n):
+            linhas.append(f"  {n}x {fp}")
+        return "\n".join(linhas)
+
+
+@contextmanager
+def query_scope(label: str, flush_ao_sair: bool = False):
+    """Marca a origem das queries de um bloco e conta-as.
+
+    Uso em jobs RQ, steps do scheduler e scripts CLI:
+
+        with query_scope("scheduler:faturamento") as escopo:
+            ...
+        escopo.count  # queries executadas no bloco
+
+    `flush_ao_sair=True` publica o agregado ao fim do bloco — necessario no
+    work-horse RQ, que e um processo filho descartado apos cada job.
+    """
+    escopo = QueryScope(label)
+    token = _escopos_ativos.set(_escopos_ativos.get() + (escopo,))
+    try:
+        yield escopo
+    finally:
+        _escopos_ativos.reset(token)
+        if flush_ao_sair and _fingerprints_ativo:
+            fingerprint_store.flush()
+
+
+def com_query_scope(label: str, flush_ao_sair: bool = False):
+    """Decorator equivalente a `query_scope` (jobs, steps do scheduler, CLI)."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with query_scope(label, flush_ao_sair=flush_ao_sair):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,478 @@
+"""
+Sincronizacao de EntregaMonitorada em lote (set-based)
+=======================================================
+
+Versao em lote de sincronizar_entrega_por_nf() (app/utils/sincronizar_entregas.py).
+Mesmas regras, mas em vez de ~8 queries + 1 commit POR NF:
+
+1. Carrega os fatos de um lote de NFs com um punhado de queries (IN):
+   faturamento, entregas NACOM existentes, flags de agendamentos, EmbarqueItem
+   mais recente (+ Embarque/Transportadora), lead times e lotes de Pedido
+2. Calcula o novo estado de cada EntregaMonitorada em memoria
+   (calcular_estado_entrega — funcao pura, testavel sem banco)
+3. Aplica com INSERT/UPDATE em massa (executemany) e 1 commit por lote
+
+Concorrencia: cada lote roda sob pg_advisory_xact_lock — dois workers
+sincronizando as mesmas NFs serializam e o segundo enxerga as entregas que o
+primeiro inseriu (causa da duplicacao do rollback O4, 2026-04-14, ja que
+entregas_monitoradas nao tem UNIQUE em (numero_nf, origem) para ON CONFLICT).
+
+ContatoAgendamento nao e consultado: a versao por NF atribui forma/contato a
+atributos que nao sao colunas de EntregaMonitorada (nunca persistem).
+
+Uso:
+    sincronizar_entregas_em_lote(['12345', '12346'])
+    sincronizar_entregas_em_lote(desde=datetime(2026, 10, 1))   # watermark
+    sincronizar_entregas_em_lote()                              # todas as NFs
+"""
+
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, or_, select, text, update
+
+from app import db
+from app.utils.timezone import agora_utc_naive
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = int(os.environ.get('SINCRONIZAR_ENTREGAS_TAMANHO_LOTE', '500'))
+
+_LOCK_SQL = text("SELECT pg_advisory_xact_lock(hashtext('sincronizar_entregas_monitoradas'))")
+
+
+@dataclass
+class FatoEmbarque:
+    """Dados do EmbarqueItem mais recente (maior Embarque.id) de uma NF."""
+    data_agenda: Optional[str] = None
+    protocolo_agendamento: Optional[str] = None
+    agendamento_confirmado: bool = False
+    uf_destino: Optional[str] = None
+    cidade_destino: Optional[str] = None
+    data_embarque: Optional[object] = None
+    data_prevista_embarque: Optional[object] = None
+    transportadora_razao_social: Optional[str] = None
+    transportadora_cnpj: Optional[str] = None
+    tem_transportadora: bool = False
+
+
+@dataclass
+class EstadoEntrega:
+    """Estado atual (persistido) de uma EntregaMonitorada NACOM."""
+    id: Optional[int] = None
+    data_agenda: Optional[object] = None
+    separacao_lote_id: Optional[str] = None
+    ja_existe_data_agenda: bool = False
+    ja_existe_protocolo: bool = False
+
+
+@dataclass
+class FatosLote:
+    """Tudo que o calculo precisa para um lote de NFs, indexado por NF/chave."""
+    faturamentos: Dict[str, object] = field(default_factory=dict)
+    entregas: Dict[str, EstadoEntrega] = field(default_factory=dict)
+    embarques: Dict[str, FatoEmbarque] = field(default_factory=dict)
+    lead_times: Dict[Tuple[str, str, str], Optional[int]] = field(default_factory=dict)
+    lotes_pedido: Dict[str, str] = field(default_factory=dict)
+
+
+def _parse_data_agenda(valor):
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+def _chave_lead_time(cnpj, uf, cidade):
+    return (cnpj, uf, (cidade or '').upper())
+
+
+def calcular_estado_entrega(fat, estado, embarque, lead_time, lote_pedido, autor, agora):
+    """
+    Calcula os campos da EntregaMonitorada e os agendamentos a criar.
+
+    Espelha sincronizar_entrega_por_nf() regra a regra (sem I/O).
+
+    Args:
+        fat: RelatorioFaturamentoImportado (ou objeto com os mesmos atributos), ativo
+        estado: EstadoEntrega atual (id=None para entrega nova)
+        embarque: FatoEmbarque do EmbarqueItem mais recente ou None
+        lead_time: lead time da CidadeAtendida (transportadora x destino) ou None
+        lote_pedido: separacao_lote_id do Pedido da NF ou None
+        autor: nome gravado em autor/confirmado_por dos agendamentos
+        agora: timestamp de confirmado_em
+
+    Returns:
+        (campos, agendamentos): dict de colunas da entrega e lista de dicts de
+        AgendamentoEntrega (sem entrega_id)
+    """
+    campos = {
+        'cliente': fat.nome_cliente,
+        'cnpj_cliente': fat.cnpj_cliente,
+        'municipio': fat.municipio,
+        'uf': fat.estado,
+        'valor_nf': fat.valor_total,
+        'data_faturamento': fat.data_fatura,
+        'vendedor': getattr(fat, 'vendedor', None),
+        'transportadora': '-',
+    }
+    data_agenda = estado.data_agenda or None
+
+    data_agenda_embarque = None
+    protocolo_embarque = None
+    if embarque:
+        campos['data_embarque'] = embarque.data_embarque or None
+        if embarque.tem_transportadora:
+            campos['transportadora'] = embarque.transportadora_razao_social or '-'
+        data_agenda_embarque = _parse_data_agenda(embarque.data_agenda)
+        if not data_agenda:
+            data_agenda = data_agenda_embarque
+        protocolo_embarque = (embarque.protocolo_agendamento or '').strip()
+    campos['data_agenda'] = data_agenda
+
+    agendamentos = []
+    confirmado = bool(embarque and embarque.agendamento_confirmado)
+
+    def _novo_agendamento(**dados):
+        ag = {
+            'forma_agendamento': 'Embarque Automático',
+            'autor': autor,
+            'status': 'confirmado' if confirmado else 'aguardando',
+            'criado_em': agora,
+            'data_agendada': None,
+            'protocolo_agendamento': None,
+            'confirmado_por': autor if confirmado else None,
+            'confirmado_em': agora if confirmado else None,
+        }
+        ag.update(dados)
+        return ag
+
+    if not estado.ja_existe_data_agenda and data_agenda_embarque:
+        protocolo = protocolo_embarque if (not estado.ja_existe_protocolo and protocolo_embarque) else None
+        agendamentos.append(_novo_agendamento(
+            data_agendada=data_agenda_embarque, protocolo_agendamento=protocolo,
+        ))
+    elif estado.ja_existe_data_agenda and protocolo_embarque and not estado.ja_existe_protocolo:
+        agendamentos.append(_novo_agendamento(protocolo_agendamento=protocolo_embarque))
+
+    lead_time_valido = lead_time if (embarque and embarque.tem_transportadora and lead_time) else None
+    campos['lead_time'] = lead_time_valido
+
+    if data_agenda:
+        data_final = data_agenda
+    elif lead_time_valido and embarque.data_embarque:
+        from app.utils.sincronizar_entregas import adicionar_dias_uteis
+        data_final = adicionar_dias_uteis(embarque.data_embarque, lead_time_valido)
+    else:
+        data_final = None
+    campos['data_entrega_prevista'] = data_final
+
+    # FOB: entrega considerada realizada no embarque (CD)
+    incoterm = getattr(fat, 'incoterm', '') or ''
+    if 'FOB' in incoterm.upper() and embarque:
+        if embarque.data_prevista_embarque:
+            campos['data_entrega_prevista'] = embarque.data_prevista_embarque
+        if embarque.data_embarque:
+            campos['data_hora_entrega_realizada'] = datetime.combine(
+                embarque.data_embarque, datetime.min.time()
+            )
+            campos['entregue'] = True
+            campos['status_finalizacao'] = 'Entregue'
+
+    if not estado.separacao_lote_id and lote_pedido:
+        campos['separacao_lote_id'] = lote_pedido
+
+    return campos, agendamentos
+
+
+def nfs_alteradas_desde(desde) -> List[str]:
+    """
+    NFs cujo estado de monitoramento pode ter mudado desde o watermark:
+    faturamento criado/inativado, embarque criado ou agendamento do
+    EmbarqueItem (data/protocolo/confirmacao) alterado a partir de `desde`.
+    """
+    from app.faturamento.models import RelatorioFaturamentoImportado
+    from app.embarques.models import Embarque, EmbarqueItem
+
+    por_faturamento = select(RelatorioFaturamentoImportado.numero_nf).where(or_(
+        RelatorioFaturamentoImportado.criado_em >= desde,
+        RelatorioFaturamentoImportado.inativado_em >= desde,
+    ))
+    por_embarque = (
+        select(EmbarqueItem.nota_fiscal)
+        .join(Embarque, Embarque.id == EmbarqueItem.embarque_id)
+        .where(
+            or_(Embarque.criado_em >= desde, EmbarqueItem.agendamento_alterado_em >= desde),
+            EmbarqueItem.nota_fiscal.isnot(None),
+        )
+    )
+    nfs = db.session.execute(por_faturamento.union(por_embarque)).scalars().all()
+    return sorted({nf for nf in nfs if nf})
+
+
+def _carregar_fatos(nfs: List[str]) -> FatosLote:
+    """Carrega os fatos de um lote de NFs em queries IN (sem N+1)."""
+    from app.faturamento.models import RelatorioFaturamentoImportado
+    from app.monitoramento.models import EntregaMonitorada, AgendamentoEntrega
+    from app.embarques.models import Embarque, EmbarqueItem
+    from app.transportadoras.models import Transportadora
+    from app.vinculos.models import CidadeAtendida
+    from app.localidades.models import Cidade
+    from app.pedidos.models import Pedido
+
+    fatos = FatosLote()
+
+    # 1. Faturamento (numero_nf e UNIQUE)
+    for fat in RelatorioFaturamentoImportado.query.filter(
+        RelatorioFaturamentoImportado.numero_nf.in_(nfs)
+    ).all():
+        fatos.faturamentos[fat.numero_nf] = fat
+
+    # 2. Entregas NACOM existentes (a de menor id prevalece, como .first())
+    rows = db.session.execute(
+        select(
+            EntregaMonitorada.id, EntregaMonitorada.numero_nf,
+            EntregaMonitorada.data_agenda, EntregaMonitorada.separacao_lote_id,
+        )
+        .where(EntregaMonitorada.numero_nf.in_(nfs), EntregaMonitorada.origem == 'NACOM')
+        .order_by(EntregaMonitorada.id)
+    ).all()
+    for row in rows:
+        fatos.entregas.setdefault(row.numero_nf, EstadoEntrega(
+            id=row.id, data_agenda=row.data_agenda, separacao_lote_id=row.separacao_lote_id,
+        ))
+
+    # 3. Flags de agendamentos das entregas existentes
+    por_id = {e.id: e for e in fatos.entregas.values()}
+    if por_id:
+        flags = db.session.execute(
+            select(
+                AgendamentoEntrega.entrega_id,
+                func.count(AgendamentoEntrega.data_agendada),
+                func.count(func.nullif(AgendamentoEntrega.protocolo_agendamento, '')),
+            )
+            .where(AgendamentoEntrega.entrega_id.in_(list(por_id)))
+            .group_by(AgendamentoEntrega.entrega_id)
+        ).all()
+        for entrega_id, qtd_datas, qtd_protocolos in flags:
+            por_id[entrega_id].ja_existe_data_agenda = qtd_datas > 0
+            por_id[entrega_id].ja_existe_protocolo = qtd_protocolos > 0
+
+    # 4. EmbarqueItem mais recente por NF (maior Embarque.id)
+    rows = db.session.execute(
+        select(
+            EmbarqueItem.nota_fiscal, EmbarqueItem.data_agenda,
+            EmbarqueItem.protocolo_agendamento, EmbarqueItem.agendamento_confirmado,
+            EmbarqueItem.uf_destino, EmbarqueItem.cidade_destino,
+            Embarque.data_embarque, Embarque.data_prevista_embarque,
+            Transportadora.id.label('transportadora_id'),
+            Transportadora.razao_social, Transportadora.cnpj,
+        )
+        .join(Embarque, Embarque.id == EmbarqueItem.embarque_id)
+        .outerjoin(Transportadora, Transportadora.id == Embarque.transportadora_id)
+        .where(EmbarqueItem.nota_fiscal.in_(nfs))
+        .order_by(EmbarqueItem.nota_fiscal, Embarque.id.desc())
+    ).all()
+    for row in rows:
+        if row.nota_fiscal in fatos.embarques:
+            continue
+        fatos.embarques[row.nota_fiscal] = FatoEmbarque(
+            data_agenda=row.data_agenda,
+            protocolo_agendamento=row.protocolo_agendamento,
+            agendamento_confirmado=bool(row.agendamento_confirmado),
+            uf_destino=row.uf_destino,
+            cidade_destino=row.cidade_destino,
+            data_embarque=row.data_embarque,
+            data_prevista_embarque=row.data_prevista_embarque,
+            transportadora_razao_social=row.razao_social,
+            transportadora_cnpj=row.cnpj,
+            tem_transportadora=row.transportadora_id is not None,
+        )
+
+    # 5. Lead times (transportadora x UF x cidade, case-insensitive na cidade)
+    destinos = {
+        _chave_lead_time(e.transportadora_cnpj, e.uf_destino, e.cidade_destino)
+        for e in fatos.embarques.values() if e.tem_transportadora
+    }
+    if destinos:
+        rows = db.session.execute(
+            select(Transportadora.cnpj, CidadeAtendida.uf, func.upper(Cidade.nome), CidadeAtendida.lead_time)
+            .join(Transportadora, Transportadora.id == CidadeAtendida.transportadora_id)
+            .join(Cidade, CidadeAtendida.cidade_id == Cidade.id)
+            .where(
+                Transportadora.cnpj.in_({d[0] for d in destinos}),
+                CidadeAtendida.uf.in_({d[1] for d in destinos}),
+                func.upper(Cidade.nome).in_({d[2] for d in destinos}),
+            )
+            .order_by(CidadeAtendida.id)
+        ).all()
+        for cnpj, uf, cidade, lead_time in rows:
+            fatos.lead_times.setdefault((cnpj, uf, cidade), lead_time)
+
+    # 6. Lote de separacao (so para entregas sem separacao_lote_id)
+    sem_lote = [nf for nf in nfs if not (fatos.entregas.get(nf) and fatos.entregas[nf].separacao_lote_id)]
+    if sem_lote:
+        rows = db.session.execute(
+            select(Pedido.nf, Pedido.separacao_lote_id)
+            .where(Pedido.nf.in_(sem_lote), Pedido.separacao_lote_id.isnot(None))
+        ).all()
+        for nf, lote in rows:
+            fatos.lotes_pedido.setdefault(nf, lote)
+
+    return fatos
+
+
+def _sincronizar_lote(nfs: List[str], stats: dict, autor: str) -> None:
+    """Sincroniza um lote de NFs numa unica transacao."""
+    from app.monitoramento.models import EntregaMonitorada, AgendamentoEntrega
+
+    db.session.execute(_LOCK_SQL)
+    fatos = _carregar_fatos(nfs)
+    agora = agora_utc_naive()
+
+    # NFs inativas: remove a entrega NACOM (delete ORM — desvincula agendamentos/comentarios)
+    ids_inativas = [
+        fatos.entregas[nf].id for nf, fat in fatos.faturamentos.items()
+        if not getattr(fat, 'ativo', True) and nf in fatos.entregas
+    ]
+    if ids_inativas:
+        for entrega in EntregaMonitorada.query.filter(EntregaMonitorada.id.in_(ids_inativas)).all():
+            db.session.delete(entrega)
+        stats['removidas'] += len(ids_inativas)
+
+    novas, atualizacoes, agendamentos_por_nf = [], [], {}
+    for nf in nfs:
+        fat = fatos.faturamentos.get(nf)
+        if not fat or not getattr(fat, 'ativo', True):
+            continue
+        if not fat.nome_cliente:
+            stats['erros'].append(f"NF {nf}: faturamento sem nome_cliente")
+            continue
+
+        estado = fatos.entregas.get(nf) or EstadoEntrega()
+        embarque = fatos.embarques.get(nf)
+        lead_time = None
+        if embarque and embarque.tem_transportadora:
+            lead_time = fatos.lead_times.get(
+                _chave_lead_time(embarque.transportadora_cnpj, embarque.uf_destino, embarque.cidade_destino)
+            )
+        campos, agendamentos = calcular_estado_entrega(
+            fat, estado, embarque, lead_time, fatos.lotes_pedido.get(nf), autor, agora,
+        )
+
+        if estado.id is None:
+            novas.append({'numero_nf': nf, 'origem': 'NACOM', **campos})
+        else:
+            atualizacoes.append({'id': estado.id, **campos})
+        if agendamentos:
+            agendamentos_por_nf[nf] = agendamentos
+
+    ids_por_nf = {nf: e.id for nf, e in fatos.entregas.items()}
+    if novas:
+        inseridas = db.session.execute(
+            insert(EntregaMonitorada).returning(EntregaMonitorada.id, EntregaMonitorada.numero_nf),
+            novas,
+        ).all()
+        ids_por_nf.update({numero_nf: entrega_id for entrega_id, numero_nf in inseridas})
+        stats['criadas'] += len(novas)
+    if atualizacoes:
+        db.session.execute(update(EntregaMonitorada), atualizacoes)
+        stats['atualizadas'] += len(atualizacoes)
+
+    novos_agendamentos = [
+        {'entrega_id': ids_por_nf[nf], **ag}
+        for nf, ags in agendamentos_por_nf.items() for ag in ags
+    ]
+    if novos_agendamentos:
+        db.session.execute(insert(AgendamentoEntrega), novos_agendamentos)
+        stats['agendamentos_criados'] += len(novos_agendamentos)
+
+    db.session.commit()
+
+
+def _sincronizar_nf_a_nf(nfs: List[str], stats: dict) -> None:
+    """
+    Fallback de um lote que falhou: isola a(s) NF(s) problematica(s).
+
+    sincronizar_entrega_por_nf() nao diz se criou, atualizou ou removeu —
+    as NFs processadas aqui contam em 'nf_a_nf', nao em 'atualizadas'.
+    """
+    from app.utils.sincronizar_entregas import sincronizar_entrega_por_nf
+
+    for numero_nf in nfs:
+        try:
+            sincronizar_entrega_por_nf(numero_nf)
+            stats['nf_a_nf'] += 1
+        except Exception as e:
+            db.session.rollback()
+            stats['erros'].append(f"NF {numero_nf}: {str(e)[:200]}")
+
+
+def sincronizar_entregas_em_lote(
+    nfs: Optional[Iterable[str]] = None,
+    desde=None,
+    tamanho_lote: Optional[int] = None,
+) -> dict:
+    """
+    Sincroniza EntregaMonitorada (origem NACOM) para um conjunto de NFs.
+
+    Args:
+        nfs: NFs a sincronizar. None + desde=None = todas do faturamento
+        desde: watermark — sincroniza so NFs alteradas a partir desta data/hora
+        tamanho_lote: NFs por transacao (default SINCRONIZAR_ENTREGAS_TAMANHO_LOTE)
+
+    Returns:
+        Dict com estatisticas: {total, criadas, atualizadas, removidas,
+        nf_a_nf, agendamentos_criados, erros, watermark}. nf_a_nf = NFs
+        sincronizadas pelo fallback NF a NF (resultado nao discriminado)
+    """
+    from app.faturamento.models import RelatorioFaturamentoImportado
+    from app.utils.sincronizar_entregas import get_usuario_nome
+
+    watermark = agora_utc_naive()
+    if nfs is not None:
+        lista = sorted({nf for nf in nfs if nf})
+    elif desde is not None:
+        lista = nfs_alteradas_desde(desde)
+    else:
+        lista = db.session.execute(
+            select(RelatorioFaturamentoImportado.numero_nf).order_by(RelatorioFaturamentoImportado.numero_nf)
+        ).scalars().all()
+
+    stats = {
+        'total': len(lista),
+        'criadas': 0,
+        'atualizadas': 0,
+        'removidas': 0,
+        'nf_a_nf': 0,
+        'agendamentos_criados': 0,
+        'erros': [],
+        'watermark': watermark,
+    }
+    tamanho = tamanho_lote or TAMANHO_LOTE
+    autor = get_usuario_nome()
+
+    for inicio in range(0, len(lista), tamanho):
+        lote = lista[inicio:inicio + tamanho]
+        try:
+            _sincronizar_lote(lote, stats, autor)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(
+                f"[SYNC LOTE] Erro no lote {lote[0]}..{lote[-1]} ({len(lote)} NFs), "
+                f"refazendo NF a NF: {e}"
+            )
+            _sincronizar_nf_a_nf(lote, stats)
+
+    logger.info(
+        f"[SYNC LOTE] {stats['total']} NFs: {stats['criadas']} criadas, "
+        f"{stats['atualizadas']} atualizadas, {stats['removidas']} removidas, "
+        f"{stats['nf_a_nf']} NF a NF, "
+        f"{stats['agendamentos_criados']} agendamentos ({len(stats['erros'])} erros)"
+    )
+    return stats
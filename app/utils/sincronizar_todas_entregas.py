@@ -1,11 +1,17 @@
-from app.faturamento.models import RelatorioFaturamentoImportado
-from .sincronizar_entregas import sincronizar_entrega_por_nf
+from .sincronizar_entregas_lote import sincronizar_entregas_em_lote
 
-def sincronizar_todas_entregas(verbose=False):
-    total = 0
-    for row in RelatorioFaturamentoImportado.query.all():
-        sincronizar_entrega_por_nf(row.numero_nf)
-        total += 1
-        if verbose:
-            print(f"✔️ NF {row.numero_nf} sincronizada")
-    print(f"✅ Total de entregas sincronizadas: {total}")
\ No newline at end of file
+def sincronizar_todas_entregas(verbose=False, desde=None):
+    """
+    Sincroniza o monitoramento de todas as NFs do faturamento (ou so das
+    alteradas desde o watermark `desde`) via sincronizador em lote.
+    """
+    stats = sincronizar_entregas_em_lote(desde=desde)
+    if verbose:
+        for erro in stats['erros']:
+            print(f"❌ {erro}")
+    print(
+        f"✅ Total de entregas sincronizadas: {stats['total']} "
+        f"({stats['criadas']} criadas, {stats['atualizadas']} atualizadas, {stats['removidas']} removidas, "
+        f"{stats['nf_a_nf']} NF a NF)"
+    )
+    return stats
@@ -0,0 +1,421 @@
+"""
+streaming_export.py — motor de export Excel/CSV em memoria constante.
+
+PROBLEMA QUE RESOLVE
+--------------------
+Os exports montavam tudo em memoria: `query.all()` (objetos ORM) -> lista de
+dicts -> DataFrame/Workbook openpyxl -> BytesIO. Cada linha existia 3-4 vezes
+no worker; um export de ano inteiro encostava nos 2.2 GB do worker Render.
+E xlsxwriter com `in_memory=True` DESLIGA `constant_memory` silenciosamente
+(a lib nao suporta os dois juntos).
+
+SOLUCAO
+-------
+- `iter_lotes(query)`: cursor server-side (`yield_per`) em lotes; o chamador
+  enriquece cada lote com IN (...) e devolve as linhas com `yield`.
+- `escrever_xlsx(destino, abas)`: xlsxwriter `constant_memory` gravando em
+  arquivo temporario (cada linha vai ao disco assim que a proxima comeca).
+  So as primeiras AMOSTRA_LARGURA linhas ficam em memoria para calcular a
+  largura das colunas.
+- `iter_csv(colunas, linhas)`: CSV ';' (Excel pt-BR) gerado em chunks.
+- `resposta_xlsx` / `resposta_csv`: streaming para o cliente (arquivo
+  temporario some ao fechar a resposta).
+- `enfileirar_export` / `executar_export_job` / `status_export`: o mesmo
+  builder roda num job RQ com progresso em job.meta; o arquivo final vai para
+  o FileStorage (pasta exports/) e o status devolve a URL de download.
+
+Builder = funcao `(params: dict, progresso=None) -> list[Aba] | None` (None =
+nada para exportar), importavel por caminho 'modulo:funcao'. Roda igual no
+request e no worker.
+"""
+import csv
+import io
+import itertools
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv; charset=utf-8'
+
+TAMANHO_LOTE = int(os.getenv('EXPORT_TAMANHO_LOTE', '1000'))
+AMOSTRA_LARGURA = 200
+_CSV_CHUNK = 64 * 1024
+_PROGRESSO_A_CADA = 2000
+
+# Mascaras numericas pt-BR por tipo de coluna
+_NUM_FORMATS = {
+    'money': 'R$ #,##0.00',
+    'decimal': '#,##0.00',
+    'decimal3': '#,##0.000',
+    'int': '#,##0',
+    'percent': '0.00%',
+    'date': 'DD/MM/YYYY',
+    'datetime': 'DD/MM/YYYY HH:MM',
+}
+
+
+@dataclass
+class Coluna:
+    """Coluna do export (mesma forma do Campo do helper CarVia)."""
+    key: str
+    label: str
+    fmt: Optional[str] = None
+    width: Optional[int] = None
+
+
+@dataclass
+class Aba:
+    """Uma aba do Excel: colunas + linhas (iteravel, consumido UMA vez).
+
+    grupos: [(titulo, n_colunas)] para cabecalho duplo (linha 1 mesclada).
+    """
+    nome: str
+    colunas: Sequence[Any]
+    linhas: Iterable[dict]
+    grupos: Optional[List[Tuple[str, int]]] = None
+    autofiltro: bool = False
+
+
+# =============================================================================
+# Leitura em lotes
+# =============================================================================
+
+def iter_lotes(query, tamanho: int = TAMANHO_LOTE) -> Iterator[list]:
+    """Resultados da query em listas de ate `tamanho`, via cursor server-side.
+
+    `yield_per` faz o psycopg usar cursor nomeado: o banco entrega `tamanho`
+    linhas por vez em vez de materializar o resultado inteiro no worker.
+    """
+    resultados = iter(query.yield_per(tamanho))
+    while True:
+        lote = list(itertools.islice(resultados, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+# =============================================================================
+# Valores
+# =============================================================================
+
+def valor_celula(valor: Any, fmt: Optional[str]) -> Any:
+    """Normaliza para tipo nativo: numero, date/datetime sem tz, texto ou None."""
+    if valor is None or valor == '':
+        return None
+    if fmt in ('money', 'decimal', 'decimal3', 'percent'):
+        try:
+            return float(valor)
+        except (TypeError, ValueError):
+            return None
+    if fmt == 'int':
+        try:
+            return int(valor)
+        except (TypeError, ValueError):
+            return None
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, datetime) and valor.tzinfo is not None:
+        return valor.replace(tzinfo=None)
+    return valor
+
+
+def _texto_csv(valor: Any, fmt: Optional[str]) -> str:
+    valor = valor_celula(valor, fmt)
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.strftime('%d/%m/%Y %H:%M' if fmt != 'date' else '%d/%m/%Y')
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, float):
+        casas = 3 if fmt == 'decimal3' else 2
+        return f'{valor:.{casas}f}'.replace('.', ',')
+    return str(valor)
+
+
+# =============================================================================
+# XLSX (constant_memory)
+# =============================================================================
+
+def _larguras(colunas, amostra) -> List[int]:
+    larguras = []
+    for col in colunas:
+        if col.width:
+            larguras.append(col.width)
+            continue
+        maior = len(str(col.label))
+        for linha in amostra:
+            v = valor_celula(linha.get(col.key), col.fmt)
+            if v is not None:
+                maior = max(maior, len(_texto_csv(v, col.fmt)))
+        larguras.append(min(max(maior + 2, 10), 50))
+    return larguras
+
+
+def escrever_xlsx(destino, abas: List[Aba],
+                  progresso: Optional[Callable[[str, int], None]] = None) -> int:
+    """Grava as abas em `destino` (caminho ou arquivo binario). Retorna n de linhas."""
+    import xlsxwriter
+
+    wb = xlsxwriter.Workbook(destino, {
+        'constant_memory': True,
+        'remove_timezone': True,
+        'tmpdir': tempfile.gettempdir(),
+    })
+    fmt_grupo = wb.add_format({
+        'bold': True, 'font_color': '#FFFFFF', 'bg_color': '#1F4E78', 'font_size': 11,
+        'align': 'center', 'valign': 'vcenter', 'text_wrap': True,
+        'border': 1, 'border_color': '#CCCCCC',
+    })
+    fmt_campo = wb.add_format({
+        'bold': True, 'font_color': '#FFFFFF', 'bg_color': '#2E75B6', 'font_size': 10,
+        'align': 'center', 'valign': 'vcenter', 'text_wrap': True,
+        'border': 1, 'border_color': '#CCCCCC',
+    })
+    formatos = {None: wb.add_format({'border': 1, 'border_color': '#CCCCCC'})}
+    for nome, mascara in _NUM_FORMATS.items():
+        formatos[nome] = wb.add_format({
+            'num_format': mascara, 'border': 1, 'border_color': '#CCCCCC',
+        })
+
+    total = 0
+    try:
+        for aba in abas:
+            ws = wb.add_worksheet(aba.nome[:31])
+            colunas = list(aba.colunas)
+            linhas = iter(aba.linhas)
+            amostra = list(itertools.islice(linhas, AMOSTRA_LARGURA))
+            for i, largura in enumerate(_larguras(colunas, amostra)):
+                ws.set_column(i, i, largura)
+
+            row = 0
+            if aba.grupos:
+                inicio = 0
+                for titulo, n in aba.grupos:
+                    if n <= 0:
+                        continue
+                    if n > 1:
+                        ws.merge_range(0, inicio, 0, inicio + n - 1, titulo, fmt_grupo)
+                    else:
+                        ws.write_string(0, inicio, titulo, fmt_grupo)
+                    inicio += n
+                ws.set_row(0, 22)
+                row = 1
+            for i, col in enumerate(colunas):
+                ws.write_string(row, i, str(col.label), fmt_campo)
+            if aba.grupos:
+                ws.set_row(row, 28)
+            cabecalho = row + 1
+            ws.freeze_panes(cabecalho, 0)
+
+            tipos = [(col.key, col.fmt, formatos.get(col.fmt, formatos[None])) for col in colunas]
+            n = 0
+            for linha in itertools.chain(amostra, linhas):
+                r = cabecalho + n
+                for i, (key, fmt, formato) in enumerate(tipos):
+                    v = valor_celula(linha.get(key), fmt)
+                    if v is None:
+                        continue
+                    if isinstance(v, bool):
+                        ws.write_boolean(r, i, v, formato)
+                    elif isinstance(v, (int, float)):
+                        ws.write_number(r, i, v, formato)
+                    elif isinstance(v, datetime):
+                        ws.write_datetime(r, i, v, formatos['datetime'] if fmt is None else formato)
+                    elif isinstance(v, date):
+                        ws.write_datetime(r, i, datetime(v.year, v.month, v.day),
+                                          formatos['date'] if fmt is None else formato)
+                    else:
+                        ws.write_string(r, i, str(v), formato)
+                n += 1
+                if progresso and n % _PROGRESSO_A_CADA == 0:
+                    progresso(aba.nome, n)
+            if aba.autofiltro and colunas:
+                ws.autofilter(cabecalho - 1, 0, cabecalho - 1 + n, len(colunas) - 1)
+            if progresso:
+                progresso(aba.nome, n)
+            total += n
+    finally:
+        wb.close()
+    return total
+
+
+# =============================================================================
+# CSV
+# =============================================================================
+
+def iter_csv(colunas, linhas: Iterable[dict], delimitador: str = ';') -> Iterator[bytes]:
+    """CSV utf-8 com BOM (Excel pt-BR abre direto) em chunks de ~64 KB."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimitador, lineterminator='\r\n')
+    colunas = list(colunas)
+    writer.writerow([col.label for col in colunas])
+    primeiro = True
+    for linha in linhas:
+        writer.writerow([_texto_csv(linha.get(col.key), col.fmt) for col in colunas])
+        if buffer.tell() >= _CSV_CHUNK:
+            dados = buffer.getvalue().encode('utf-8')
+            yield (b'\xef\xbb\xbf' + dados) if primeiro else dados
+            primeiro = False
+            buffer.seek(0)
+            buffer.truncate()
+    dados = buffer.getvalue().encode('utf-8')
+    if dados or primeiro:
+        yield (b'\xef\xbb\xbf' + dados) if primeiro else dados
+
+
+# =============================================================================
+# Respostas HTTP
+# =============================================================================
+
+def resposta_xlsx(abas: List[Aba], download_name: str):
+    """send_file de um temporario em disco (removido ao fechar a resposta)."""
+    from flask import send_file
+
+    arquivo = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        escrever_xlsx(arquivo, abas)
+        arquivo.seek(0)
+    except BaseException:
+        arquivo.close()
+        raise
+    return send_file(arquivo, mimetype=XLSX_MIMETYPE, as_attachment=True,
+                     download_name=download_name)
+
+
+def resposta_csv(colunas, linhas: Iterable[dict], download_name: str):
+    """Response em streaming: cada chunk sai assim que e gerado."""
+    from flask import Response, stream_with_context
+
+    return Response(
+        stream_with_context(iter_csv(colunas, linhas)),
+        mimetype=CSV_MIMETYPE,
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'},
+    )
+
+
+def resposta_export(abas: List[Aba], formato: str, nome_base: str):
+    """xlsx (todas as abas) ou csv (primeira aba) com nome `{nome_base}.{ext}`."""
+    if formato == 'csv':
+        aba = abas[0]
+        return resposta_csv(aba.colunas, aba.linhas, f'{nome_base}.csv')
+    return resposta_xlsx(abas, f'{nome_base}.xlsx')
+
+
+# =============================================================================
+# Job em background (RQ)
+# =============================================================================
+
+def _resolver_builder(caminho: str) -> Callable:
+    import importlib
+    modulo, _, nome = caminho.partition(':')
+    return getattr(importlib.import_module(modulo), nome)
+
+
+def enfileirar_export(builder: str, params: dict, formato: str, nome_base: str,
+                      user_id: int, queue_name: str = 'default'):
+    """Enfileira o export; job.meta guarda dono e progresso para o polling."""
+    from app.portal.workers import enqueue_job
+
+    return enqueue_job(
+        executar_export_job, builder, params, formato, nome_base,
+        queue_name=queue_name, timeout='60m',
+        meta={'user_id': user_id, 'progress': 0, 'linhas': 0},
+    )
+
+
+def executar_export_job(builder: str, params: dict, formato: str, nome_base: str) -> dict:
+    """Job RQ: roda o builder, grava o arquivo e sobe para o FileStorage."""
+    from rq import get_current_job
+
+    from app import create_app
+
+    job = get_current_job()
+
+    def _progress(**dados):
+        if job is None:
+            return
+        try:
+            job.meta.update(dados)
+            job.save_meta()
+        except Exception:
+            pass
+
+    app = create_app()
+    with app.app_context():
+        from app.utils.file_storage import get_file_storage
+
+        total_estimado = {'n': None}
+
+        def _progresso_builder(processados, total=None):
+            if total:
+                total_estimado['n'] = total
+            if total_estimado['n']:
+                pct = min(95, int(95 * processados / total_estimado['n']))
+                _progress(progress=pct, processados=processados, total=total_estimado['n'])
+
+        abas = _resolver_builder(builder)(params, progresso=_progresso_builder)
+        if not abas:
+            _progress(progress=100, msg='Nenhum dado para exportar.')
+            return {'sucesso': False, 'erro': 'Nenhum dado para exportar.'}
+
+        from werkzeug.datastructures import FileStorage as UploadArquivo
+
+        ext = 'csv' if formato == 'csv' else 'xlsx'
+        linhas = None
+        with tempfile.TemporaryFile(suffix=f'.{ext}') as arquivo:
+            if ext == 'csv':
+                aba = abas[0]
+                for chunk in iter_csv(aba.colunas, aba.linhas):
+                    arquivo.write(chunk)
+            else:
+                linhas = escrever_xlsx(arquivo, abas)
+            arquivo.seek(0)
+            caminho = get_file_storage().save_file(
+                UploadArquivo(stream=arquivo, filename=f'{nome_base}.{ext}'),
+                'exports', filename=f'{nome_base}.{ext}',
+            )
+
+        if not caminho:
+            raise RuntimeError('Falha ao gravar o export no storage')
+        _progress(progress=100, arquivo=caminho, linhas=linhas, msg='Concluido')
+        return {'sucesso': True, 'arquivo': caminho, 'linhas': linhas}
+
+
+def status_export(job_id: str, user_id: int) -> Optional[dict]:
+    """Progresso do job (None se inexistente ou de outro usuario)."""
+    from rq.job import Job
+
+    from app.portal.workers import get_redis_connection
+    from app.utils.file_storage import get_file_storage
+
+    try:
+        job = Job.fetch(job_id, connection=get_redis_connection())
+    except Exception:
+        return None
+    meta = job.meta or {}
+    if meta.get('user_id') != user_id:
+        return None
+
+    status = job.get_status()
+    arquivo = meta.get('arquivo')
+    url = None
+    if arquivo:
+        storage = get_file_storage()
+        url = storage.get_download_url(arquivo) or storage.get_file_url(arquivo)
+    return {
+        'status': str(getattr(status, 'value', status)),
+        'progress': meta.get('progress', 0),
+        'processados': meta.get('processados'),
+        'total': meta.get('total'),
+        'msg': meta.get('msg'),
+        'download_url': url,
+        'erro': str(job.exc_info).strip().splitlines()[-1] if job.is_failed and job.exc_info else None,
+    }
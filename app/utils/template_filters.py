@@ -113,6 +113,9 @@ def asset_url(filename):
     so' o main.css nao adianta (os @import internos ficam com URL fixa e o Caddy os
     marca `immutable`). O main.css e' servido pela rota /assets/main.css, que
     versiona cada @import. Ver app/utils/asset_bundler.py.
+
+    Scripts que fazem parte de um bundle (JS_BUNDLES) devem usar
+    `asset_bundle('<nome>')` no template, nao este filtro.
     """
     import hashlib
     import os
@@ -136,5 +139,7 @@ def register_template_filters(app):
     app.jinja_env.filters['numero_br'] = numero_br
     app.jinja_env.filters['from_json'] = from_json
     app.jinja_env.filters['asset_url'] = asset_url
+    from app.utils.asset_bundler import asset_bundle
+    app.jinja_env.globals['asset_bundle'] = asset_bundle
     from app.utils.cnpj_utils import formatar_cnpj
     app.jinja_env.filters['cnpj_br'] = formatar_cnpj
\ No newline at end of file
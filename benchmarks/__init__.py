@@ -0,0 +1,25 @@
+"""
+Benchmarks dos hot paths do sistema.
+
+Mede tempo de parede (min/mediana/p95/max), número de queries, tempo de banco
+e pico de memória de:
+  - ServicoEstoqueSimples.calcular_projecao
+  - calcular_fretes_possiveis (simulador de frete)
+  - ExtratoMatchingService (conciliação de extrato x títulos)
+  - busca fallback de embeddings (sem pgvector/Voyage)
+  - ETL do BI (só PostgreSQL)
+  - sincronização da carteira com Odoo (Odoo falso via XML-RPC local)
+
+Uso:
+    # SQLite temporário (padrão)
+    python -m benchmarks executar --escala pequena
+
+    # PostgreSQL local — tudo roda dentro de uma transação desfeita no fim
+    python -m benchmarks executar --database-url postgresql://.../bench --escala media \\
+        --param titulos=20000 --saida base.json
+
+    python -m benchmarks comparar base.json atual.json --limite 0.15
+
+`comparar` sai com código 1 se algum cenário regrediu além do limite — pode
+ser usado como gate em CI. Compare sempre resultados do mesmo backend e escala.
+"""
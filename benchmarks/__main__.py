@@ -0,0 +1,196 @@
+"""
+CLI dos benchmarks — ver benchmarks/__init__.py.
+
+    python -m benchmarks executar [--database-url URL] [--escala pequena|media|grande]
+                                  [--param campo=valor ...] [--cenarios a,b] [--repeticoes N]
+                                  [--saida arquivo.json]
+    python -m benchmarks comparar base.json atual.json [--limite 0.20] [--limite-queries 0] ...
+    python -m benchmarks listar
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIR_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+
+
+def _preparar_ambiente(database_url):
+    """
+    Precisa rodar ANTES de importar `app`: a config lê DATABASE_URL no import
+    e os serviços opcionais (Sentry, Voyage) não devem entrar na medição.
+    """
+    if database_url:
+        os.environ['DATABASE_URL'] = database_url
+    elif not os.environ.get('DATABASE_URL'):
+        arquivo = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'benchmark.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{arquivo}'
+    os.environ['SENTRY_DSN'] = ''
+    os.environ['EMBEDDINGS_ENABLED'] = 'false'
+    os.environ['FINANCIAL_SEMANTIC_SEARCH'] = 'false'
+
+
+def _commit_atual():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def _selecionar(cenarios, filtro):
+    if not filtro:
+        return list(cenarios.values())
+    nomes = [n.strip() for n in filtro.split(',') if n.strip()]
+    desconhecidos = [n for n in nomes if n not in cenarios]
+    if desconhecidos:
+        raise SystemExit(f'Cenário(s) desconhecido(s): {", ".join(desconhecidos)}')
+    return [cenarios[n] for n in nomes]
+
+
+def cmd_executar(args):
+    _preparar_ambiente(args.database_url)
+
+    from benchmarks.cenarios import CENARIOS
+    from benchmarks.fixtures import ESCALAS, dados_odoo_carteira, is_postgres, semear, sessao_fixture
+    from benchmarks.medicao import medir
+    from benchmarks.odoo_fake import FakeOdooServer
+
+    escala = ESCALAS[args.escala].com_params(args.param)
+    selecionados = _selecionar(CENARIOS, args.cenarios)
+
+    from app import create_app
+    app = create_app()
+    postgres = is_postgres(app)
+
+    resultado = {
+        'meta': {
+            'criado_em': datetime.now().isoformat(timespec='seconds'),
+            'backend': 'postgresql' if postgres else 'sqlite',
+            'escala': escala.como_dict(),
+            'preset': args.escala,
+            'repeticoes': args.repeticoes,
+            'python': platform.python_version(),
+            'commit': _commit_atual(),
+        },
+        'cenarios': {},
+    }
+
+    executaveis = []
+    for c in selecionados:
+        if c.requer_postgres and not postgres:
+            resultado['cenarios'][c.nome] = {'pulado': f'requer PostgreSQL: {c.motivo_postgres}'}
+        else:
+            executaveis.append(c)
+    grupos = sorted({g for c in executaveis for g in c.grupos})
+
+    contexto = {}
+    odoo = None
+    if any('carteira' in c.grupos for c in executaveis):
+        odoo = FakeOdooServer(dados_odoo_carteira(escala)).iniciar()
+        contexto['odoo'] = odoo
+
+    try:
+        with app.app_context(), sessao_fixture(app) as db:
+            print(f'Semeando {", ".join(grupos) or "-"} ({resultado["meta"]["backend"]}, escala {args.escala})...')
+            fx = semear(db, escala, grupos)
+            # Logs INFO dos services (um por título/linha) distorcem o tempo medido
+            logging.disable(logging.INFO)
+            try:
+                for c in executaveis:
+                    print(f'  {c.nome}...', end=' ', flush=True)
+                    try:
+                        bloco = medir(c.nome, c.preparar(fx, contexto), repeticoes=args.repeticoes)
+                        print(f'{bloco["tempo_ms"]["mediana"]:.1f} ms, {bloco["queries"]} queries')
+                    except Exception as e:
+                        db.session.rollback()
+                        bloco = {'erro': f'{type(e).__name__}: {e}'}
+                        print(f'ERRO {bloco["erro"]}')
+                    resultado['cenarios'][c.nome] = bloco
+            finally:
+                logging.disable(logging.NOTSET)
+    finally:
+        if odoo:
+            odoo.parar()
+
+    saida = args.saida or os.path.join(
+        DIR_RESULTADOS, f'{datetime.now():%Y%m%d_%H%M%S}_{resultado["meta"]["backend"]}_{args.escala}.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f'Resultado gravado em {saida}')
+    return 1 if any('erro' in b for b in resultado['cenarios'].values()) else 0
+
+
+def cmd_comparar(args):
+    from benchmarks.comparar import Limites, avisos_de_contexto, comparar, formatar
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.atual, encoding='utf-8') as f:
+        atual = json.load(f)
+
+    limites = Limites(
+        tempo=args.limite, memoria=args.limite_memoria, contador=args.limite_queries,
+        piso_ms=args.piso_ms, piso_kb=args.piso_kb,
+    )
+    achados = comparar(base, atual, limites)
+    print(formatar(achados, avisos_de_contexto(base, atual)))
+    return 1 if any(a.regressao for a in achados) else 0
+
+
+def cmd_listar(args):
+    from benchmarks.cenarios import CENARIOS
+
+    for c in CENARIOS.values():
+        sufixo = ' (só PostgreSQL)' if c.requer_postgres else ''
+        print(f'{c.nome:<34} grupos: {", ".join(c.grupos)}{sufixo}')
+    return 0
+
+
+def main(argv=None):
+    from benchmarks.comparar import Limites
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks dos hot paths')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('executar', help='Semeia o banco de fixture, mede os cenários e grava o JSON')
+    p.add_argument('--database-url', help='Padrão: DATABASE_URL do ambiente ou SQLite temporário')
+    p.add_argument('--escala', default='pequena', choices=['pequena', 'media', 'grande'])
+    p.add_argument('--param', action='append', default=[], metavar='CAMPO=VALOR',
+                   help='Override de volume da escala (repetível), ex: --param titulos=20000')
+    p.add_argument('--cenarios', help='Lista separada por vírgula (padrão: todos)')
+    p.add_argument('--repeticoes', type=int, default=5)
+    p.add_argument('--saida', help='Arquivo JSON (padrão: benchmarks/resultados/<data>_<backend>_<escala>.json)')
+    p.set_defaults(func=cmd_executar)
+
+    p = sub.add_parser('comparar', help='Compara dois JSONs e sai com código 1 se houver regressão')
+    p.add_argument('base')
+    p.add_argument('atual')
+    p.add_argument('--limite', type=float, default=Limites.tempo, help='Regressão relativa de tempo (0.20 = 20%%)')
+    p.add_argument('--limite-memoria', type=float, default=Limites.memoria)
+    p.add_argument('--limite-queries', type=int, default=Limites.contador,
+                   help='Aumento absoluto tolerado em queries/chamadas Odoo')
+    p.add_argument('--piso-ms', type=float, default=Limites.piso_ms,
+                   help='Diferença mínima em ms para contar como regressão de tempo')
+    p.add_argument('--piso-kb', type=float, default=Limites.piso_kb)
+    p.set_defaults(func=cmd_comparar)
+
+    p = sub.add_parser('listar', help='Lista os cenários disponíveis')
+    p.set_defaults(func=cmd_listar)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Cenários dos hot paths. Cada cenário declara os grupos de dados que precisa
+(ver fixtures.modelos_por_grupo) e devolve uma `Execucao` pronta para medir.
+
+| cenário                          | caminho                                                       |
+|----------------------------------|---------------------------------------------------------------|
+| estoque.calcular_projecao        | ServicoEstoqueSimples.calcular_projecao (cache TTL limpo)     |
+| frete.calcular_fretes_possiveis  | app.utils.frete_simulador.calcular_fretes_possiveis           |
+| financeiro.extrato_matching      | ExtratoMatchingService.executar_matching_lote                 |
+| embeddings.fallback_entidades    | EmbeddingService._search_fallback_entities (sem Voyage)       |
+| bi.etl_completo                  | BiETLService.executar_etl_completo (só PostgreSQL)            |
+| carteira.sync_odoo               | CarteiraService.obter_carteira_pendente + sanitização (Odoo falso) |
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, Tuple
+
+from benchmarks.medicao import Execucao
+
+
+@dataclass(frozen=True)
+class Cenario:
+    nome: str
+    grupos: Tuple[str, ...]
+    preparar: Callable
+    requer_postgres: bool = False
+    motivo_postgres: str = ''
+
+
+CENARIOS: Dict[str, Cenario] = {}
+
+
+def cenario(nome, grupos, requer_postgres=False, motivo_postgres=''):
+    def decorator(func):
+        CENARIOS[nome] = Cenario(nome, tuple(grupos), func, requer_postgres, motivo_postgres)
+        return func
+    return decorator
+
+
+@cenario('estoque.calcular_projecao', ['estoque'])
+def _estoque_projecao(fx, contexto):
+    from app.estoque.services import estoque_simples
+    from app.estoque.services.estoque_simples import ServicoEstoqueSimples
+
+    produtos = fx.produtos[:fx.escala.produtos_consultados]
+
+    def executar():
+        return [ServicoEstoqueSimples.calcular_projecao(cod, dias=28) for cod in produtos]
+
+    return Execucao(
+        executar=executar,
+        # Medir o cálculo, não o cache TTL de 30s do módulo
+        reiniciar=estoque_simples._cache.clear,
+        descrever=lambda r: {'produtos': len(r), 'com_ruptura': sum(1 for p in r if p['dia_ruptura'])},
+    )
+
+
+@cenario('frete.calcular_fretes_possiveis', ['frete'])
+def _frete_simulador(fx, contexto):
+    from app.utils.frete_simulador import calcular_fretes_possiveis
+
+    cidades = fx.cidade_ids[:fx.escala.cidades_consultadas]
+
+    def executar():
+        return [
+            calcular_fretes_possiveis(cidade_destino_id=cid, peso=1800.0, valor=45000.0, uf_origem='SP')
+            for cid in cidades
+        ]
+
+    return Execucao(
+        executar=executar,
+        descrever=lambda r: {'cidades': len(r), 'opcoes': sum(len(o) for o in r)},
+    )
+
+
+@cenario('financeiro.extrato_matching', ['financeiro'])
+def _extrato_matching(fx, contexto):
+    from app import db
+    from app.financeiro.models import ExtratoItem
+    from app.financeiro.services.extrato_matching_service import ExtratoMatchingService
+
+    def reiniciar():
+        ExtratoItem.query.filter_by(lote_id=fx.lote_id).update({
+            'status_match': 'PENDENTE', 'titulo_receber_id': None, 'matches_candidatos': None,
+            'match_score': None, 'match_criterio': None, 'mensagem': None,
+        }, synchronize_session=False)
+        db.session.commit()
+        db.session.expire_all()
+
+    return Execucao(
+        executar=lambda: ExtratoMatchingService().executar_matching_lote(fx.lote_id),
+        reiniciar=reiniciar,
+        descrever=lambda r: dict(r),
+    )
+
+
+@cenario('embeddings.fallback_entidades', ['embeddings'])
+def _embeddings_fallback(fx, contexto):
+    from app.embeddings.service import EmbeddingService
+
+    svc = EmbeddingService()
+
+    def executar():
+        return [svc._search_fallback_entities(vetor, 'all', 10, 0.0) for vetor in fx.vetores_consulta]
+
+    return Execucao(
+        executar=executar,
+        descrever=lambda r: {'consultas': len(r), 'resultados': sum(len(x) for x in r)},
+    )
+
+
+@cenario('bi.etl_completo', ['bi'], requer_postgres=True,
+         motivo_postgres='func.date() devolve texto no SQLite e o ETL aborta no primeiro registro')
+def _bi_etl(fx, contexto):
+    from app.bi.services import BiETLService
+
+    return Execucao(
+        executar=BiETLService.executar_etl_completo,
+        descrever=lambda r: {'sucesso': bool(r)},
+    )
+
+
+@cenario('carteira.sync_odoo', ['carteira'])
+def _carteira_sync(fx, contexto):
+    from app.odoo.services.carteira_service import CarteiraService
+    from app.odoo.utils.connection import OdooConnection
+
+    odoo = contexto['odoo']
+    svc = CarteiraService()
+    svc.connection = OdooConnection(odoo.config())
+    chamadas = {}
+
+    def reiniciar():
+        odoo.chamadas.clear()
+
+    def executar():
+        resultado = svc.obter_carteira_pendente()
+        if not resultado['sucesso']:
+            raise RuntimeError(resultado.get('erro'))
+        dados = svc._sanitizar_dados_carteira(resultado['dados'])
+        chamadas.clear()
+        chamadas.update(odoo.chamadas)
+        return dados
+
+    return Execucao(
+        executar=executar,
+        reiniciar=reiniciar,
+        descrever=lambda r: {
+            'linhas': len(r),
+            'chamadas_odoo': sum(chamadas.values()),
+            'chamadas_odoo_por_metodo': {f'{m}.{f}': n for (m, f), n in sorted(chamadas.items())},
+        },
+    )
@@ -0,0 +1,105 @@
+"""
+Comparação de dois JSONs de resultado (base x atual) com gates de regressão.
+
+Regras por cenário presente nos dois arquivos:
+  - tempo: mediana atual > base * (1 + limite_tempo) E diferença > piso_ms
+    (o piso evita falso positivo em cenários de poucos ms);
+  - contadores (queries, extra.chamadas_odoo): atual > base + limite_contador.
+    São determinísticos — qualquer aumento é N+1 novo, não ruído;
+  - memória: pico atual > base * (1 + limite_memoria) E diferença > piso_kb.
+Cenário que existia na base e sumiu/foi pulado no atual vira AVISO (não falha).
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+CONTADORES = ('queries', 'extra.chamadas_odoo')
+
+
+@dataclass(frozen=True)
+class Limites:
+    tempo: float = 0.20
+    memoria: float = 0.25
+    contador: int = 0
+    piso_ms: float = 2.0
+    piso_kb: float = 256.0
+
+
+@dataclass(frozen=True)
+class Achado:
+    cenario: str
+    metrica: str
+    base: Optional[float]
+    atual: Optional[float]
+    regressao: bool
+    mensagem: str
+
+
+def _ler(bloco: Dict, caminho: str):
+    valor = bloco
+    for parte in caminho.split('.'):
+        if not isinstance(valor, dict) or parte not in valor:
+            return None
+        valor = valor[parte]
+    return valor
+
+
+def _variacao(base, atual) -> str:
+    if not base:
+        return 'n/a'
+    return f'{(atual - base) / base * 100:+.1f}%'
+
+
+def comparar(base: Dict, atual: Dict, limites: Limites = Limites()) -> List[Achado]:
+    achados = []
+    cenarios_base = base.get('cenarios', {})
+    cenarios_atual = atual.get('cenarios', {})
+
+    for nome in sorted(cenarios_base):
+        b, a = cenarios_base[nome], cenarios_atual.get(nome)
+        if 'pulado' in b:
+            continue
+        if a is None or 'pulado' in a or 'erro' in a:
+            motivo = 'ausente' if a is None else a.get('pulado') or a.get('erro')
+            achados.append(Achado(nome, '-', None, None, 'erro' in (a or {}), f'sem resultado atual ({motivo})'))
+            continue
+
+        tb, ta = _ler(b, 'tempo_ms.mediana'), _ler(a, 'tempo_ms.mediana')
+        if tb is not None and ta is not None:
+            regrediu = ta > tb * (1 + limites.tempo) and (ta - tb) > limites.piso_ms
+            achados.append(Achado(nome, 'tempo_ms.mediana', tb, ta, regrediu,
+                                  f'{tb:.1f} -> {ta:.1f} ms ({_variacao(tb, ta)})'))
+
+        for metrica in CONTADORES:
+            cb, ca = _ler(b, metrica), _ler(a, metrica)
+            if cb is None or ca is None:
+                continue
+            achados.append(Achado(nome, metrica, cb, ca, ca > cb + limites.contador, f'{cb} -> {ca}'))
+
+        mb, ma = _ler(b, 'pico_memoria_kb'), _ler(a, 'pico_memoria_kb')
+        if mb is not None and ma is not None:
+            regrediu = ma > mb * (1 + limites.memoria) and (ma - mb) > limites.piso_kb
+            achados.append(Achado(nome, 'pico_memoria_kb', mb, ma, regrediu,
+                                  f'{mb:.0f} -> {ma:.0f} KB ({_variacao(mb, ma)})'))
+    return achados
+
+
+def avisos_de_contexto(base: Dict, atual: Dict) -> List[str]:
+    """Diferenças de backend/escala que tornam a comparação pouco confiável."""
+    avisos = []
+    mb, ma = base.get('meta', {}), atual.get('meta', {})
+    if mb.get('backend') != ma.get('backend'):
+        avisos.append(f"backend diferente: {mb.get('backend')} x {ma.get('backend')}")
+    if mb.get('escala') != ma.get('escala'):
+        avisos.append('escala diferente entre os arquivos')
+    return avisos
+
+
+def formatar(achados: List[Achado], avisos: List[str] = ()) -> str:
+    linhas = [f'AVISO: {a}' for a in avisos]
+    for achado in achados:
+        marca = 'REGRESSAO' if achado.regressao else 'ok'
+        linhas.append(f'  [{marca:>9}] {achado.cenario:<34} {achado.metrica:<22} {achado.mensagem}')
+    total = sum(1 for a in achados if a.regressao)
+    linhas.append(f'{total} regressao(oes) acima do limite' if total else 'Nenhuma regressao acima do limite')
+    return '\n'.join(linhas)
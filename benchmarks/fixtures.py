@@ -0,0 +1,445 @@
+"""
+Banco de fixture e dados sintéticos dos benchmarks.
+
+- `Escala`: volumes parametrizáveis (presets em ESCALAS, override por campo na
+  CLI com `--param titulos=20000`).
+- `sessao_fixture(app)`: SQLite = arquivo descartável, sessão normal;
+  PostgreSQL = padrão do tests/conftest.py (transação externa + SAVEPOINT),
+  rollback no fim — commits dos services não persistem nada no banco apontado.
+- `semear(escala, grupos)`: cria só as tabelas dos grupos pedidos
+  (checkfirst) e insere os dados via Core em lote, com seed fixa: o mesmo
+  comando gera sempre o mesmo banco.
+- `dados_odoo_carteira(escala)`: dataset do Odoo falso (sale.order.line,
+  sale.order, res.partner, product.product, product.category, crm.tag).
+"""
+
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields, replace
+from datetime import datetime, time, timedelta
+from typing import Dict, List
+
+UFS = ['SP', 'MG', 'RJ', 'PR', 'SC', 'RS', 'BA', 'GO', 'PE', 'ES']
+VEICULOS = [('FIORINO', 500), ('VAN', 1500), ('3/4', 4000), ('TOCO', 8000), ('TRUCK', 14000), ('CARRETA', 27000)]
+
+
+@dataclass(frozen=True)
+class Escala:
+    produtos: int = 300
+    movimentos_por_produto: int = 30
+    separacoes_por_produto: int = 12
+    programacoes_por_produto: int = 4
+    produtos_consultados: int = 50
+    cidades: int = 400
+    transportadoras: int = 40
+    transportadoras_por_cidade: int = 4
+    cidades_consultadas: int = 20
+    clientes: int = 600
+    titulos: int = 6000
+    extratos: int = 150
+    entidades_embedding: int = 1000
+    dimensao_embedding: int = 256
+    consultas_embedding: int = 10
+    fretes: int = 3000
+    linhas_carteira: int = 3000
+    seed: int = 49
+
+    def como_dict(self) -> Dict[str, int]:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    def com_params(self, params: List[str]) -> 'Escala':
+        """Aplica overrides 'campo=valor' da CLI."""
+        valores = {}
+        for par in params or []:
+            campo, _, valor = par.partition('=')
+            if campo not in self.como_dict():
+                raise ValueError(f'Parâmetro de escala desconhecido: {campo}')
+            valores[campo] = int(valor)
+        return replace(self, **valores)
+
+
+ESCALAS = {
+    'pequena': Escala(
+        produtos=60, movimentos_por_produto=10, separacoes_por_produto=6, programacoes_por_produto=2,
+        produtos_consultados=20, cidades=80, transportadoras=12, cidades_consultadas=10,
+        clientes=120, titulos=1200, extratos=40, entidades_embedding=300, dimensao_embedding=128,
+        consultas_embedding=5, fretes=600, linhas_carteira=500,
+    ),
+    'media': Escala(),
+    'grande': Escala(
+        produtos=1500, movimentos_por_produto=60, separacoes_por_produto=20, programacoes_por_produto=8,
+        produtos_consultados=200, cidades=2000, transportadoras=120, cidades_consultadas=60,
+        clientes=3000, titulos=40000, extratos=500, entidades_embedding=1000, dimensao_embedding=1024,
+        consultas_embedding=20, fretes=20000, linhas_carteira=15000,
+    ),
+}
+
+
+@dataclass
+class Fixture:
+    """Ids/chaves geradas, usadas pelos cenários para montar as consultas."""
+    escala: Escala
+    produtos: List[str] = field(default_factory=list)
+    cidade_ids: List[int] = field(default_factory=list)
+    lote_id: int = None
+    vetores_consulta: List[List[float]] = field(default_factory=list)
+
+
+# ---------------------------------------------------------------------------
+# Sessão e tabelas
+# ---------------------------------------------------------------------------
+
+def is_postgres(app) -> bool:
+    return app.config['SQLALCHEMY_DATABASE_URI'].startswith(('postgresql', 'postgres'))
+
+
+@contextmanager
+def sessao_fixture(app):
+    """Sessão dos benchmarks (ver docstring do módulo)."""
+    from app import db as _db
+
+    if not is_postgres(app):
+        try:
+            yield _db
+        finally:
+            _db.session.remove()
+        return
+
+    from sqlalchemy.orm import scoped_session, sessionmaker
+
+    connection = _db.engine.connect()
+    transaction = connection.begin()
+    sessao = scoped_session(sessionmaker(bind=connection, join_transaction_mode="create_savepoint"))
+    original = _db.session
+    _db.session = sessao
+    try:
+        yield _db
+    finally:
+        sessao.remove()
+        if transaction.is_active:
+            transaction.rollback()
+        connection.close()
+        _db.session = original
+
+
+def modelos_por_grupo() -> Dict[str, list]:
+    from app.bi.models import (
+        BiAnaliseRegional, BiDespesaDetalhada, BiFreteAgregado, BiIndicadorMensal, BiPerformanceTransportadora,
+    )
+    from app.carteira.models import CarteiraPrincipal, SaldoStandby
+    from app.embarques.models import Embarque
+    from app.embeddings.models import FinancialEntityEmbedding
+    from app.estoque.models import MovimentacaoEstoque, UnificacaoCodigos
+    from app.faturamento.models import FaturamentoProduto
+    from app.financeiro.models import ContasAPagar, ContasAReceber, ExtratoItem, ExtratoLote
+    from app.fretes.models import ContaCorrenteTransportadora, DespesaExtra, Frete
+    from app.localidades.models import Cidade
+    from app.producao.models import ProgramacaoProducao
+    from app.separacao.models import Separacao
+    from app.tabelas.models import TabelaFrete
+    from app.transportadoras.models import Transportadora
+    from app.veiculos.models import Veiculo
+    from app.vinculos.models import CidadeAtendida
+
+    return {
+        'estoque': [MovimentacaoEstoque, UnificacaoCodigos, Separacao, ProgramacaoProducao],
+        'frete': [Cidade, Veiculo, Transportadora, CidadeAtendida, TabelaFrete],
+        'financeiro': [ContasAReceber, ContasAPagar, FaturamentoProduto, ExtratoLote, ExtratoItem],
+        'embeddings': [FinancialEntityEmbedding],
+        'bi': [Transportadora, Embarque, Frete, DespesaExtra, ContaCorrenteTransportadora, BiFreteAgregado,
+               BiDespesaDetalhada, BiPerformanceTransportadora, BiAnaliseRegional, BiIndicadorMensal],
+        'carteira': [CarteiraPrincipal, SaldoStandby],
+    }
+
+
+def criar_tabelas(db, grupos) -> None:
+    conn = db.session.connection()
+    modelos = modelos_por_grupo()
+    vistos = set()
+    for grupo in grupos:
+        for modelo in modelos[grupo]:
+            if modelo.__tablename__ not in vistos:
+                modelo.__table__.create(bind=conn, checkfirst=True)
+                vistos.add(modelo.__tablename__)
+    db.session.commit()
+
+
+# ---------------------------------------------------------------------------
+# Seed
+# ---------------------------------------------------------------------------
+
+def _inserir(db, modelo, linhas, lote=2000, retornar_ids=False):
+    """Insert em lote via Core; com retornar_ids devolve os ids na ordem das linhas."""
+    tabela = modelo.__table__
+    stmt = tabela.insert()
+    if retornar_ids:
+        stmt = stmt.returning(tabela.c.id, sort_by_parameter_order=True)
+    ids = []
+    for i in range(0, len(linhas), lote):
+        resultado = db.session.execute(stmt, linhas[i:i + lote])
+        if retornar_ids:
+            ids.extend(resultado.scalars().all())
+    return ids
+
+
+def _cnpj(raiz: int, filial: int = 1) -> str:
+    r = f'{raiz:08d}'
+    return f'{r[:2]}.{r[2:5]}.{r[5:8]}/{filial:04d}-{(raiz + filial) % 100:02d}'
+
+
+def _semear_estoque(db, esc: Escala, rng: random.Random, hoje, fx: Fixture):
+    from app.estoque.models import MovimentacaoEstoque, UnificacaoCodigos
+    from app.producao.models import ProgramacaoProducao
+    from app.separacao.models import Separacao
+
+    fx.produtos = [str(9910000 + i) for i in range(esc.produtos)]
+    movs, seps, progs = [], [], []
+    for cod in fx.produtos:
+        nome = f'PRODUTO SINTETICO {cod}'
+        for _ in range(esc.movimentos_por_produto):
+            entrada = rng.random() < 0.55
+            movs.append({
+                'cod_produto': cod, 'nome_produto': nome,
+                'data_movimentacao': hoje - timedelta(days=rng.randint(0, 180)),
+                'tipo_movimentacao': 'ENTRADA' if entrada else 'SAIDA', 'local_movimentacao': 'BENCHMARK',
+                'qtd_movimentacao': rng.randint(10, 500) * (1 if entrada else -1),
+            })
+        for i in range(esc.separacoes_por_produto):
+            seps.append({
+                'separacao_lote_id': f'BENCH-{cod}-{i}', 'num_pedido': f'VBENCH{cod}{i:03d}',
+                'cod_produto': cod, 'cod_uf': rng.choice(UFS), 'qtd_saldo': rng.randint(5, 200),
+                'expedicao': hoje + timedelta(days=rng.randint(-5, 30)) if rng.random() > 0.05 else None,
+                'sincronizado_nf': rng.random() < 0.2,
+            })
+        for _ in range(esc.programacoes_por_produto):
+            progs.append({
+                'data_programacao': hoje + timedelta(days=rng.randint(0, 28)), 'cod_produto': cod,
+                'nome_produto': nome, 'qtd_programada': rng.randint(100, 2000),
+            })
+    _inserir(db, MovimentacaoEstoque, movs)
+    _inserir(db, Separacao, seps)
+    _inserir(db, ProgramacaoProducao, progs)
+    unificacoes = [
+        {'codigo_origem': int(a), 'codigo_destino': int(b)}
+        for a, b in zip(fx.produtos[::10], fx.produtos[5::10])
+    ]
+    _inserir(db, UnificacaoCodigos, unificacoes)
+
+
+def _semear_transportadoras(db, esc: Escala):
+    from app.transportadoras.models import Transportadora
+
+    # A cada 4 transportadoras, mesma raiz de CNPJ (filiais — exercita grupo_service)
+    return _inserir(db, Transportadora, [
+        {'cnpj': _cnpj(99300000 + t // 4, t % 4 + 1), 'razao_social': f'TRANSPORTES BENCH {t}',
+         'cidade': 'SAO PAULO', 'uf': 'SP', 'optante': t % 3 == 0}
+        for t in range(esc.transportadoras)
+    ], retornar_ids=True)
+
+
+def _semear_frete(db, esc: Escala, rng: random.Random, fx: Fixture):
+    from app.localidades.models import Cidade
+    from app.tabelas.models import TabelaFrete
+    from app.veiculos.models import Veiculo
+    from app.vinculos.models import CidadeAtendida
+
+    existentes = {nome for (nome,) in db.session.execute(Veiculo.__table__.select().with_only_columns(
+        Veiculo.__table__.c.nome))}
+    _inserir(db, Veiculo, [{'nome': nome, 'peso_maximo': peso} for nome, peso in VEICULOS if nome not in existentes])
+    transportadoras = _semear_transportadoras(db, esc)
+    cidades = [
+        {'nome': f'CIDADE BENCH {c}', 'uf': UFS[c % len(UFS)], 'codigo_ibge': str(9900000 + c),
+         'icms': 0.07 if c % len(UFS) else 0.12}
+        for c in range(esc.cidades)
+    ]
+    fx.cidade_ids = _inserir(db, Cidade, cidades, retornar_ids=True)
+
+    atendimentos, tabelas, vistos = [], [], set()
+    for cidade_id, cidade in zip(fx.cidade_ids, cidades):
+        for t in rng.sample(transportadoras, min(esc.transportadoras_por_cidade, len(transportadoras))):
+            nome_tabela = f'TAB {t} {cidade["uf"]}'
+            atendimentos.append({
+                'uf': cidade['uf'], 'cidade_id': cidade_id, 'codigo_ibge': cidade['codigo_ibge'],
+                'transportadora_id': t, 'nome_tabela': nome_tabela, 'lead_time': rng.randint(1, 7),
+            })
+            if (t, cidade['uf']) in vistos:
+                continue
+            vistos.add((t, cidade['uf']))
+            for tipo, modalidade in [('FRACIONADA', 'FRETE PESO'), ('DIRETA', 'TOCO'), ('DIRETA', 'TRUCK')]:
+                tabelas.append({
+                    'transportadora_id': t, 'uf_origem': 'SP', 'uf_destino': cidade['uf'], 'nome_tabela': nome_tabela,
+                    'tipo_carga': tipo, 'modalidade': modalidade, 'valor_kg': round(rng.uniform(0.2, 1.5), 3),
+                    'frete_minimo_peso': 100, 'percentual_valor': round(rng.uniform(0.2, 2.0), 3),
+                    'frete_minimo_valor': round(rng.uniform(80, 400), 2), 'percentual_gris': 0.1,
+                    'percentual_adv': 0.05, 'pedagio_por_100kg': round(rng.uniform(1, 8), 2), 'valor_despacho': 20,
+                    'valor_cte': 15, 'valor_tas': 5, 'criado_por': 'benchmark',
+                })
+    _inserir(db, CidadeAtendida, atendimentos)
+    _inserir(db, TabelaFrete, tabelas)
+    return transportadoras
+
+
+def _semear_financeiro(db, esc: Escala, rng: random.Random, hoje, fx: Fixture):
+    from app.faturamento.models import FaturamentoProduto
+    from app.financeiro.models import ContasAReceber, ExtratoItem, ExtratoLote
+
+    clientes = [(_cnpj(99500000 + c // 3, c % 3 + 1), f'CLIENTE SINTETICO {c} LTDA') for c in range(esc.clientes)]
+    titulos = []
+    for i in range(esc.titulos):
+        cnpj, nome = rng.choice(clientes)
+        phantom = rng.random() < 0.02
+        titulos.append({
+            'empresa': 1 + i % 3, 'titulo_nf': f'B{100000 + i // 2}', 'parcela': str(1 + i % 2), 'cnpj': cnpj,
+            'raz_social': nome, 'raz_social_red': nome[:30],
+            'vencimento': datetime(2000, 1, 1).date() if phantom else hoje + timedelta(days=rng.randint(-40, 60)),
+            'valor_titulo': round(rng.uniform(150, 25000), 2), 'parcela_paga': rng.random() < 0.3,
+        })
+    _inserir(db, ContasAReceber, titulos)
+    _inserir(db, FaturamentoProduto, [
+        {'numero_nf': f'B{100000 + n}', 'data_fatura': hoje, 'cnpj_cliente': '00', 'nome_cliente': 'CANCELADA',
+         'cod_produto': '1', 'nome_produto': 'X', 'status_nf': 'Cancelado'}
+        for n in rng.sample(range(esc.titulos // 2), max(1, esc.titulos // 200))
+    ])
+
+    lote = fx.lote_id = _inserir(db, ExtratoLote, [{'nome': 'BENCHMARK'}], retornar_ids=True)[0]
+    itens = []
+    for i in range(esc.extratos):
+        base = rng.choice(titulos)
+        modo = rng.random()
+        itens.append({
+            'lote_id': lote, 'statement_line_id': 990000000 + i, 'data_transacao': base['vencimento'],
+            'valor': base['valor_titulo'] if modo < 0.7 else round(base['valor_titulo'] * 2.03, 2),
+            'cnpj_pagador': base['cnpj'] if modo < 0.85 else None,
+            'nome_pagador': base['raz_social'], 'status_match': 'PENDENTE',
+        })
+    _inserir(db, ExtratoItem, itens)
+
+
+def _vetor(rng: random.Random, dimensao: int) -> List[float]:
+    return [round(rng.gauss(0, 1), 5) for _ in range(dimensao)]
+
+
+def _semear_embeddings(db, esc: Escala, rng: random.Random, fx: Fixture):
+    from app.embeddings.models import FinancialEntityEmbedding
+
+    _inserir(db, FinancialEntityEmbedding, [
+        {'entity_type': 'customer' if e % 2 else 'supplier', 'cnpj_raiz': f'{99600000 + e:08d}',
+         'nome': f'ENTIDADE SINTETICA {e}', 'texto_embedado': f'ENTIDADE SINTETICA {e}',
+         'embedding': _vetor(rng, esc.dimensao_embedding), 'model_used': 'benchmark'}
+        for e in range(esc.entidades_embedding)
+    ], lote=200)
+    fx.vetores_consulta = [_vetor(rng, esc.dimensao_embedding) for _ in range(esc.consultas_embedding)]
+
+
+def _semear_bi(db, esc: Escala, rng: random.Random, hoje, transportadoras):
+    from app.embarques.models import Embarque
+    from app.fretes.models import DespesaExtra, Frete
+
+    embarques = _inserir(db, Embarque, [{'numero': 99000000 + e} for e in range(max(1, esc.fretes // 50))],
+                         retornar_ids=True)
+    status = ['PENDENTE', 'APROVADO', 'APROVADO', 'REJEITADO', 'EM_TRATATIVA', 'PAGO']
+    fretes = []
+    for f in range(esc.fretes):
+        cotado = round(rng.uniform(200, 8000), 2)
+        fretes.append({
+            'embarque_id': rng.choice(embarques), 'cnpj_cliente': _cnpj(99500000 + f % 300),
+            'nome_cliente': f'CLIENTE {f % 300}', 'transportadora_id': rng.choice(transportadoras),
+            'tipo_carga': rng.choice(['FRACIONADA', 'DIRETA']), 'modalidade': rng.choice(['FRETE PESO', 'TRUCK']),
+            'uf_destino': rng.choice(UFS), 'cidade_destino': f'CIDADE BENCH {f % 200}',
+            'peso_total': rng.uniform(100, 12000), 'valor_total_nfs': rng.uniform(2000, 200000),
+            'quantidade_nfs': 1, 'numeros_nfs': str(700000 + f), 'valor_cotado': cotado,
+            'valor_cte': round(cotado * rng.uniform(0.95, 1.1), 2), 'valor_considerado': cotado,
+            'valor_pago': cotado, 'numero_cte': str(800000 + f), 'status': rng.choice(status),
+            'criado_em': datetime.combine(hoje - timedelta(days=rng.randint(0, 89)), time(10)),
+            'criado_por': 'benchmark',
+        })
+    frete_ids = _inserir(db, Frete, fretes, retornar_ids=True)
+    _inserir(db, DespesaExtra, [
+        {'frete_id': fid, 'tipo_despesa': rng.choice(['REENTREGA', 'TDE', 'DEVOLUÇÃO', 'COMPLEMENTO DE FRETE']),
+         'setor_responsavel': 'COMERCIAL', 'motivo_despesa': 'BENCHMARK', 'tipo_documento': 'CTE',
+         'numero_documento': str(fid), 'valor_despesa': round(rng.uniform(30, 900), 2), 'criado_por': 'benchmark'}
+        for fid in rng.sample(frete_ids, len(frete_ids) // 10)
+    ])
+
+
+def semear(db, escala: Escala, grupos) -> Fixture:
+    """Cria as tabelas dos grupos e insere os dados sintéticos (seed fixa)."""
+    from app.utils.timezone import agora_utc_naive
+
+    criar_tabelas(db, grupos)
+    rng = random.Random(escala.seed)
+    hoje = agora_utc_naive().date()
+    fx = Fixture(escala=escala)
+    if 'estoque' in grupos:
+        _semear_estoque(db, escala, rng, hoje, fx)
+    if 'frete' in grupos:
+        transportadoras = _semear_frete(db, escala, rng, fx)
+    if 'financeiro' in grupos:
+        _semear_financeiro(db, escala, rng, hoje, fx)
+    if 'embeddings' in grupos:
+        _semear_embeddings(db, escala, rng, fx)
+    if 'bi' in grupos:
+        if 'frete' not in grupos:
+            transportadoras = _semear_transportadoras(db, escala)
+        _semear_bi(db, escala, rng, hoje, transportadoras)
+    db.session.commit()
+    return fx
+
+
+# ---------------------------------------------------------------------------
+# Odoo falso
+# ---------------------------------------------------------------------------
+
+def dados_odoo_carteira(escala: Escala) -> Dict[str, list]:
+    """sale.order.line + relações no formato que o XML-RPC do Odoo devolve."""
+    rng = random.Random(escala.seed)
+    n_pedidos = max(1, escala.linhas_carteira // 6)
+    n_produtos = max(1, escala.produtos)
+    n_partners = max(2, escala.clientes)
+
+    categorias = [{'id': 1, 'name': 'ACABADO', 'parent_id': False}]
+    categorias += [{'id': 10 + i, 'name': f'MP {i}', 'parent_id': [1, 'ACABADO']} for i in range(5)]
+    categorias += [{'id': 100 + i, 'name': f'EMB {i}', 'parent_id': [10 + i % 5, f'MP {i % 5}']} for i in range(20)]
+    produtos = [
+        {'id': p, 'name': f'PRODUTO SINTETICO {4100000 + p}', 'default_code': str(4100000 + p),
+         'uom_id': [1, 'UN'], 'categ_id': [100 + p % 20, f'EMB {p % 20}']}
+        for p in range(1, n_produtos + 1)
+    ]
+    partners = [
+        {'id': c, 'name': f'CLIENTE SINTETICO {c}', 'l10n_br_cnpj': _cnpj(50000000 + c),
+         'l10n_br_razao_social': f'CLIENTE SINTETICO {c} LTDA',
+         'l10n_br_municipio_id': [c, f'CIDADE BENCH {c} ({UFS[c % len(UFS)]})'], 'state_id': [c % 27, UFS[c % len(UFS)]],
+         'zip': '01000-000', 'l10n_br_endereco_bairro': 'CENTRO', 'l10n_br_endereco_numero': str(c),
+         'street': 'RUA SINTETICA', 'phone': '1100000000', 'agendamento': 'nao',
+         'x_studio_desconto_contratual': c % 7 == 0, 'x_studio_desconto': 2.5 if c % 7 == 0 else 0}
+        for c in range(1, n_partners + 1)
+    ]
+    tags = [{'id': t, 'name': f'TAG {t}', 'color': t} for t in range(1, 9)]
+    pedidos = []
+    for o in range(1, n_pedidos + 1):
+        partner = rng.randint(1, n_partners)
+        pedidos.append({
+            'id': o, 'name': f'VSC{o:05d}', 'partner_id': [partner, f'CLIENTE SINTETICO {partner}'],
+            'partner_shipping_id': [partner, f'CLIENTE SINTETICO {partner}'], 'user_id': [7, 'VENDEDOR'],
+            'team_id': [3, 'EQUIPE'], 'create_date': '2025-09-01 10:00:00', 'date_order': '2025-09-01 10:00:00',
+            'state': 'sale', 'l10n_br_pedido_compra': f'PC{o}', 'payment_term_id': [1, '28 DIAS'],
+            'payment_provider_id': [1, 'BOLETO'], 'incoterm': [6, '[CIF] COST, INSURANCE AND FREIGHT'],
+            'carrier_id': False, 'commitment_date': '2025-09-20 10:00:00', 'picking_note': False,
+            'tag_ids': rng.sample(range(1, 9), rng.randint(0, 2)), 'write_date': '2025-09-02 10:00:00',
+        })
+    linhas = []
+    for i in range(1, escala.linhas_carteira + 1):
+        pedido = pedidos[(i - 1) % n_pedidos]
+        produto = produtos[rng.randrange(n_produtos)]
+        qtd = float(rng.randint(1, 300))
+        linhas.append({
+            'id': i, 'order_id': [pedido['id'], pedido['name']], 'product_id': [produto['id'], produto['name']],
+            'product_uom': [1, 'UN'], 'product_uom_qty': qtd, 'qty_saldo': qtd if rng.random() < 0.9 else 0.0,
+            'qty_cancelado': 0.0, 'price_unit': round(rng.uniform(5, 90), 2),
+            'l10n_br_icms_valor': 1.0, 'l10n_br_icmsst_valor': 0.0, 'l10n_br_pis_valor': 0.1,
+            'l10n_br_cofins_valor': 0.5,
+        })
+    return {
+        'sale.order.line': linhas, 'sale.order': pedidos, 'res.partner': partners,
+        'product.product': produtos, 'product.category': categorias, 'crm.tag': tags,
+    }
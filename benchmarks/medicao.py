@@ -0,0 +1,83 @@
+"""
+Medição de um cenário: tempo de parede, queries e pico de memória.
+
+Cada repetição roda `reiniciar()` (fora da medição) e `executar()` dentro de
+um `query_scope` (app/utils/query_profiler.py — o mesmo contador do fixture
+`query_budget` dos testes). O pico de memória vem de uma rodada extra sob
+tracemalloc, separada das rodadas cronometradas porque o tracemalloc deixa o
+código várias vezes mais lento.
+"""
+
+import gc
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+
+@dataclass
+class Execucao:
+    """O que um cenário entrega para medição."""
+    executar: Callable[[], Any]
+    reiniciar: Optional[Callable[[], None]] = None
+    # Recebe o retorno da última execução e devolve métricas de sanidade
+    # (ex: quantos candidatos/linhas) gravadas em `extra` no JSON.
+    descrever: Optional[Callable[[Any], Dict[str, Any]]] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def _percentil(valores, pct):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(pct * (len(ordenados) - 1))))]
+
+
+def medir(nome: str, execucao: Execucao, repeticoes: int = 5, aquecimento: int = 1) -> Dict[str, Any]:
+    """Roda o cenário e devolve o bloco de resultado do JSON."""
+    from app.utils.query_profiler import query_scope
+
+    def _rodar():
+        if execucao.reiniciar:
+            execucao.reiniciar()
+        return execucao.executar()
+
+    for _ in range(aquecimento):
+        _rodar()
+
+    tempos, queries, db_ms = [], [], []
+    retorno = None
+    for _ in range(repeticoes):
+        if execucao.reiniciar:
+            execucao.reiniciar()
+        gc.collect()
+        with query_scope(f'benchmark:{nome}') as escopo:
+            inicio = time.perf_counter()
+            retorno = execucao.executar()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        queries.append(escopo.count)
+        db_ms.append(escopo.db_time * 1000)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        _rodar()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    resultado = {
+        'tempo_ms': {
+            'min': round(min(tempos), 3),
+            'mediana': round(statistics.median(tempos), 3),
+            'p95': round(_percentil(tempos, 0.95), 3),
+            'max': round(max(tempos), 3),
+        },
+        'db_ms_mediana': round(statistics.median(db_ms), 3),
+        'queries': max(queries),
+        'pico_memoria_kb': round(pico / 1024, 1),
+        'repeticoes': repeticoes,
+        'extra': dict(execucao.extra),
+    }
+    if execucao.descrever:
+        resultado['extra'].update(execucao.descrever(retorno))
+    return resultado
@@ -0,0 +1,198 @@
+"""
+Odoo falso via XML-RPC local — só o que os hot paths do benchmark usam.
+
+Sobe um SimpleXMLRPCServer (uma thread por requisição) em 127.0.0.1 (porta
+livre) que responde `common.version`, `common.authenticate` e
+`object.execute_kw` com os métodos `search_read`, `read`, `search`,
+`search_count`, `write` e `create` sobre um dataset em memória
+({modelo: [registros]}). O OdooConnection real conversa com ele sem mudança
+nenhuma: o custo de serialização XML-RPC entra na medição. A latência do
+Odoo de produção não entra, a menos que se passe `latencia_s` (sleep por
+chamada execute_kw — usado nos testes da fila paralela do pipeline de
+inventário para medir ganho com N workers).
+
+Domain: folhas (campo, operador, valor) sobre campos do registro são
+aplicadas em AND; operadores lógicos ('&', '|', '!') e campos com ponto
+(`order_id.state`) são ignorados — o dataset sintético já contém só o que o
+domain real selecionaria.
+"""
+
+import socketserver
+import threading
+import time
+from collections import Counter
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+_OPERADORES = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    'in': lambda a, b: a in b,
+    'not in': lambda a, b: a not in b,
+}
+
+
+def _valor_campo(registro, campo):
+    valor = registro.get(campo)
+    # Many2one vem como [id, display_name]; comparações usam o id
+    if isinstance(valor, list) and len(valor) == 2 and isinstance(valor[0], int):
+        return valor[0]
+    return valor
+
+
+def filtrar(registros, domain):
+    """Aplica as folhas simples do domain (AND) — ver docstring do módulo."""
+    folhas = [
+        f for f in (domain or [])
+        if isinstance(f, (list, tuple)) and len(f) == 3 and '.' not in f[0] and f[1] in _OPERADORES
+    ]
+    if not folhas:
+        return list(registros)
+    return [
+        r for r in registros
+        if all(
+            campo not in r or _OPERADORES[op](_valor_campo(r, campo), valor)
+            for campo, op, valor in folhas
+        )
+    ]
+
+
+class _Handler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ('/xmlrpc/2/common', '/xmlrpc/2/object')
+
+    def log_message(self, format, *args):  # noqa: A002 - assinatura do BaseHTTPRequestHandler
+        pass
+
+
+class _ServidorThreaded(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+class FakeOdooServer:
+    """
+    Servidor XML-RPC em thread daemon. Uso:
+
+        with FakeOdooServer({'sale.order.line': [...], ...}) as odoo:
+            conn = OdooConnection(odoo.config())
+            ...
+            odoo.chamadas  # Counter {('sale.order.line', 'search_read'): 1, ...}
+    """
+
+    UID = 2
+
+    def __init__(self, dados=None, latencia_s=0.0):
+        self.dados = dados or {}
+        self.latencia_s = latencia_s
+        self.chamadas = Counter()
+        self._indices = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Métodos RPC
+    # ------------------------------------------------------------------
+
+    def _version(self):
+        return {'server_version': '17.0', 'server_serie': '17.0', 'protocol_version': 1}
+
+    def _authenticate(self, db, login, password, user_agent_env):
+        return self.UID
+
+    def _execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        kwargs = kwargs or {}
+        if self.latencia_s:
+            time.sleep(self.latencia_s)
+        with self._lock:
+            self.chamadas[(model, method)] += 1
+            return self._executar(model, method, args, kwargs)
+
+    def _executar(self, model, method, args, kwargs):
+        registros = self.dados.setdefault(model, [])
+
+        if method == 'write':
+            indice = self._indice(model)
+            for i in args[0]:
+                indice[i].update(args[1])
+            return True
+        if method == 'create':
+            novo = dict(args[0], id=max((r['id'] for r in registros), default=0) + 1)
+            registros.append(novo)
+            self._indice(model)[novo['id']] = novo
+            return novo['id']
+
+        if method == 'read':
+            indice = self._indice(model)
+            encontrados = [indice[i] for i in args[0] if i in indice]
+            return self._projetar(encontrados, kwargs.get('fields') or (args[1] if len(args) > 1 else None))
+
+        encontrados = filtrar(registros, args[0] if args else [])
+        if method == 'search_count':
+            return len(encontrados)
+
+        offset = kwargs.get('offset') or 0
+        limit = kwargs.get('limit')
+        encontrados = encontrados[offset:offset + limit if limit else None]
+        if method == 'search':
+            return [r['id'] for r in encontrados]
+        if method == 'search_read':
+            return self._projetar(encontrados, kwargs.get('fields') or (args[1] if len(args) > 1 else None))
+        raise ValueError(f'Método {method} não suportado pelo Odoo falso')
+
+    def _indice(self, model):
+        if model not in self._indices:
+            self._indices[model] = {r['id']: r for r in self.dados.get(model, [])}
+        return self._indices[model]
+
+    @staticmethod
+    def _projetar(registros, campos):
+        if not campos:
+            return registros
+        campos = set(campos) | {'id'}
+        return [{k: v for k, v in r.items() if k in campos} for r in registros]
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def iniciar(self):
+        self._server = _ServidorThreaded(
+            ('127.0.0.1', 0), requestHandler=_Handler, allow_none=True, logRequests=False
+        )
+        self._server.register_function(self._version, 'version')
+        self._server.register_function(self._authenticate, 'authenticate')
+        self._server.register_function(self._execute_kw, 'execute_kw')
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def url(self):
+        host, porta = self._server.server_address
+        return f'http://{host}:{porta}'
+
+    def config(self):
+        """Dict no formato de ODOO_CONFIG apontando para este servidor."""
+        return {
+            'url': self.url,
+            'database': 'benchmark',
+            'username': 'benchmark',
+            'api_key': 'benchmark',
+            'timeout': 30,
+            'retry_attempts': 1,
+        }
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
@@ -31,6 +31,11 @@ echo "Instalando dependências..."
 pip install --no-cache-dir -r requirements.txt \
     || { echo "❌ FATAL: pip install -r requirements.txt falhou — abortando build (deps ausentes quebrariam o runtime)"; exit 1; }
 
+# 1b. Bundles CSS/JS (static/dist + manifest.json + .gz/.br para o Caddy).
+#     Falha NAO aborta: sem manifest os templates servem as fontes individuais.
+echo "Gerando bundles de assets estaticos..."
+flask build-assets || echo "⚠️ build-assets falhou — templates usarao os assets individuais"
+
 # 2. Instalar Playwright e navegadores (para Portal Atacadão)
 echo "Instalando Playwright e nest-asyncio..."
 pip install playwright nest-asyncio
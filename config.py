@@ -75,6 +75,9 @@ class Config:
     # Query Profiler — conta queries por request e detecta N+1
     # Ativar via ENABLE_QUERY_PROFILING=true no Render (reinicia servico)
     ENABLE_QUERY_PROFILING = os.environ.get("ENABLE_QUERY_PROFILING", "False").lower() == "true"
+    # Fingerprints sempre-ligado (request + jobs RQ + scheduler + CLI), agregados
+    # em memoria com flush periodico para log/Redis. Ver app/utils/query_profiler.py
+    ENABLE_QUERY_FINGERPRINTS = os.environ.get("ENABLE_QUERY_FINGERPRINTS", "True").lower() == "true"
 
     # CarVia — auto-vincular CTe Complementar tardio a fatura pre-existente
     # (A1 Bug #2). Quando o XML do CTe Comp e importado DEPOIS da fatura, o
@@ -0,0 +1,192 @@
+"""
+Benchmark - Agregados comerciais incrementais x materialized views
+==================================================================
+
+OBJETIVO:
+    Medir, com os dados atuais e com carteira/faturamento inflados 10x:
+
+    1. DASHBOARD: latencia (p50/p95) de equipes + vendedores lendo o resumo
+       incremental (resumo + deltas) x CTE original sobre as tabelas brutas
+    2. REFRESH: custo do recalculo completo das antigas mv_comercial_*
+       (SELECT das definicoes das MVs) x compactacao dos deltas de uma
+       rajada de updates (1% da carteira)
+    3. ESCRITA: custo dos triggers de delta na carga 10x
+    4. CONSISTENCIA: verificar_consistencia() depois de tudo
+
+    Tudo roda numa transacao externa com rollback no fim (mesmo padrao do
+    tests/conftest.py): commits viram SAVEPOINT e nada persiste.
+
+USO:
+    python scripts/benchmark_agregados_comerciais.py [--fator 10] [--repeticoes 20]
+
+REQUER: PostgreSQL com a migration 2026-10-19_comercial_agregados_incrementais.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+# Adicionar path do projeto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.orm import scoped_session, sessionmaker  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.carteira.models import CarteiraPrincipal  # noqa: E402
+from app.comercial.services.agregacao_service import (  # noqa: E402
+    AgregacaoComercialService,
+    refresh_materialized_views,
+    verificar_consistencia,
+)
+from app.faturamento.models import FaturamentoProduto  # noqa: E402
+
+MV_SQL = os.path.join(os.path.dirname(__file__), 'migrations', 'criar_mv_comercial_dashboard.sql')
+
+
+def selects_das_mvs():
+    """Corpo SELECT de cada CREATE MATERIALIZED VIEW (recalculo completo do REFRESH)."""
+    with open(MV_SQL) as f:
+        conteudo = f.read()
+    return re.findall(r'CREATE MATERIALIZED VIEW \w+ AS\s+(.*?);', conteudo, re.S)
+
+
+def medir(descricao, fn):
+    inicio = time.perf_counter()
+    resultado = fn()
+    decorrido = time.perf_counter() - inicio
+    print(f"   {descricao}: {decorrido * 1000:.0f}ms")
+    return decorrido, resultado
+
+
+def latencia(descricao, fn, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    p50 = statistics.median(tempos)
+    p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+    print(f"   {descricao}: p50 {p50 * 1000:.1f}ms | p95 {p95 * 1000:.1f}ms")
+    return p50
+
+
+def dashboard(via):
+    """Tela da diretoria: equipes + drill-down de todas as equipes."""
+    ler_equipes = getattr(AgregacaoComercialService, f'_dashboard_via_{via}')
+    ler_vendedores = getattr(AgregacaoComercialService, f'_vendedores_via_{via}')
+
+    def _executar():
+        for equipe in ler_equipes():
+            ler_vendedores(equipe['nome'])
+    return _executar
+
+
+def refresh_legado(selects):
+    def _executar():
+        for sql in selects:
+            db.session.execute(text(f"SELECT COUNT(*) FROM ({sql}) mv")).scalar()
+    return _executar
+
+
+def inflar(modelo, fator, coluna_unica=None):
+    """Copia as linhas da tabela (fator - 1) vezes; coluna_unica recebe sufixo ~N."""
+    colunas = [c.name for c in modelo.__table__.columns if c.name != 'id']
+    origem = [
+        f"{c} || '~' || g" if c == coluna_unica else c
+        for c in colunas
+    ]
+    tabela = modelo.__tablename__
+    resultado = db.session.execute(text(
+        f"INSERT INTO {tabela} ({', '.join(colunas)}) "
+        f"SELECT {', '.join(origem)} FROM {tabela} CROSS JOIN generate_series(1, :copias) g"
+    ), {'copias': fator - 1})
+    return resultado.rowcount
+
+
+def contar():
+    return {
+        'carteira': db.session.execute(text('SELECT COUNT(*) FROM carteira_principal')).scalar(),
+        'faturamento': db.session.execute(text('SELECT COUNT(*) FROM faturamento_produto')).scalar(),
+        'resumo': db.session.execute(text('SELECT COUNT(*) FROM comercial_agregado_cliente')).scalar(),
+        'deltas': db.session.execute(text('SELECT COUNT(*) FROM comercial_agregado_delta')).scalar(),
+    }
+
+
+def rodada(titulo, selects, repeticoes):
+    print(f"\n📊 {titulo} — {contar()}")
+    p50_novo = latencia('dashboard incremental', dashboard('agregado'), repeticoes)
+    p50_cte = latencia('dashboard CTE', dashboard('cte'), max(3, repeticoes // 4))
+    print(f"   -> ganho leitura {p50_cte / p50_novo:.1f}x")
+    t_legado, _ = medir('refresh legado (recalculo das MVs)', refresh_legado(selects))
+    return t_legado
+
+
+def rajada_de_updates(percentual):
+    resultado = db.session.execute(text("""
+        UPDATE carteira_principal
+        SET qtd_saldo_produto_pedido = ROUND(qtd_saldo_produto_pedido * 0.9, 3)
+        WHERE id IN (SELECT id FROM carteira_principal TABLESAMPLE BERNOULLI (:pct))
+    """), {'pct': percentual})
+    return resultado.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fator', type=int, default=10)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("🧪 BENCHMARK - AGREGADOS COMERCIAIS INCREMENTAIS")
+    print("=" * 80)
+
+    app = create_app()
+    selects = selects_das_mvs()
+
+    with app.app_context():
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        sessao = scoped_session(sessionmaker(bind=connection, join_transaction_mode='create_savepoint'))
+        original_session = db.session
+        db.session = sessao
+        try:
+            if not db.session.execute(text("SELECT to_regclass('comercial_agregado_cliente') IS NOT NULL")).scalar():
+                raise SystemExit('❌ Rodar a migration 2026-10-19_comercial_agregados_incrementais antes')
+            refresh_materialized_views()
+
+            rodada('Volume atual', selects, args.repeticoes)
+
+            print(f"\n📥 Inflando carteira/faturamento {args.fator}x (com triggers de delta)")
+            t_cart, n_cart = medir('carteira_principal', lambda: inflar(CarteiraPrincipal, args.fator, 'num_pedido'))
+            t_fat, n_fat = medir('faturamento_produto', lambda: inflar(FaturamentoProduto, args.fator))
+            print(f"   -> {n_cart + n_fat} linhas em {t_cart + t_fat:.1f}s")
+            medir('compactacao da carga', refresh_materialized_views)
+
+            t_legado = rodada(f'Volume {args.fator}x', selects, args.repeticoes)
+
+            print("\n🔄 Refresh apos rajada de updates (1% da carteira)")
+            t_upd, n_upd = medir('UPDATE com triggers', lambda: rajada_de_updates(1))
+            t_comp, _ = medir(f'compactacao ({n_upd} linhas alteradas)', refresh_materialized_views)
+            print(f"   -> ganho refresh {t_legado / t_comp:.1f}x")
+
+            print("\n🔍 Consistencia (incremental x recalculo completo)")
+            _, resultado = medir('verificar_consistencia', verificar_consistencia)
+            print(f"   -> ok={resultado['ok']} | chaves={resultado['total_chaves']} | "
+                  f"divergentes={len(resultado['chaves_divergentes'])}/{len(resultado['equipes_divergentes'])}")
+        finally:
+            sessao.remove()
+            if transaction.is_active:
+                transaction.rollback()
+            connection.close()
+            db.session = original_session
+
+    print("\n✅ Benchmark concluido (rollback aplicado, nada foi gravado)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Benchmark - Ingestao de pings GPS e dashboard de rastreamentos ativos
+=====================================================================
+
+OBJETIVO:
+    Simular uma frota (padrao 500 caminhoes, 1 ping a cada 30s) e medir:
+
+    1. INGESTAO: POST /api/ping/<token> (1 request + 1 commit por ping)
+       vs POST /api/pings/<token> (lote bufferizado, 1 commit por lote)
+    2. DASHBOARD: /api/ativos legado (N+1: ultimo ping, entregas, NFs por
+       rastreamento) vs atual (posicoes_atuais_rastreamento + agregados)
+
+    Tudo roda numa transacao externa com rollback no fim (mesmo padrao do
+    tests/conftest.py): os commits das rotas viram SAVEPOINT e nada persiste.
+    Geocodificacao do destino fixa (sem chamada externa).
+
+USO:
+    python scripts/benchmark_ingestao_pings_gps.py [--caminhoes 500] [--minutos 10]
+
+REQUER: PostgreSQL com as tabelas do rastreamento (migration 2026-10-19) e
+embarques sem rastreamento para servir de base.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import timedelta
+from unittest.mock import patch
+
+# Adicionar path do projeto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.orm import scoped_session, sessionmaker  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.embarques.models import Embarque  # noqa: E402
+from app.rastreamento.models import EntregaRastreada, RastreamentoEmbarque  # noqa: E402
+from app.utils.timezone import agora_utc_naive  # noqa: E402
+
+DESTINO_FIXO = (-23.55, -46.63)
+INTERVALO_PING_S = 30
+
+
+def criar_frota(caminhoes):
+    """Rastreamentos ATIVO sinteticos sobre embarques ainda sem rastreamento."""
+    sem_rastreamento = db.session.query(Embarque.id).outerjoin(
+        RastreamentoEmbarque, RastreamentoEmbarque.embarque_id == Embarque.id
+    ).filter(RastreamentoEmbarque.id.is_(None)).limit(caminhoes).all()
+    agora = agora_utc_naive()
+    frota = []
+    for (embarque_id,) in sem_rastreamento:
+        rastr = RastreamentoEmbarque(
+            embarque_id=embarque_id,
+            token_acesso=uuid.uuid4().hex,
+            status='ATIVO',
+            aceite_lgpd=True,
+            aceite_lgpd_em=agora,
+            rastreamento_iniciado_em=agora,
+        )
+        db.session.add(rastr)
+        frota.append(rastr)
+    db.session.flush()
+    return [(r.id, r.token_acesso) for r in frota]
+
+
+def gerar_pings(caminhoes, minutos):
+    """{token: [ping, ...]} — cada caminhao anda em linha reta ate o destino."""
+    inicio = agora_utc_naive() - timedelta(minutes=minutos)
+    n = max(1, minutos * 60 // INTERVALO_PING_S)
+    pings = {}
+    for _rid, token in caminhoes:
+        lat = DESTINO_FIXO[0] + random.uniform(0.2, 0.5)
+        lon = DESTINO_FIXO[1] + random.uniform(0.2, 0.5)
+        pings[token] = [{
+            'latitude': lat - i * 0.001,
+            'longitude': lon - i * 0.001,
+            'precisao': 10.0,
+            'velocidade': 60.0,
+            'bateria_nivel': 80,
+            'timestamp': (inicio + timedelta(seconds=i * INTERVALO_PING_S)).isoformat(),
+        } for i in range(n)]
+    return pings
+
+
+def medir(descricao, fn):
+    inicio = time.perf_counter()
+    resultado = fn()
+    decorrido = time.perf_counter() - inicio
+    print(f"   {descricao}: {decorrido:.2f}s")
+    return decorrido, resultado
+
+
+def ingestao_individual(client, pings):
+    total = 0
+    for token, lista in pings.items():
+        for ping in lista:
+            assert client.post(f'/rastreamento/api/ping/{token}', json=ping).status_code == 200
+            total += 1
+    return total
+
+
+def ingestao_em_lote(client, pings):
+    total = 0
+    for token, lista in pings.items():
+        resp = client.post(f'/rastreamento/api/pings/{token}', json={'pings': lista})
+        assert resp.status_code == 200, resp.get_json()
+        total += resp.get_json()['data']['aceitos']
+    return total
+
+
+def dashboard_legado():
+    """Replica do /api/ativos anterior (N+1) para comparacao."""
+    resultado = []
+    for rastr in RastreamentoEmbarque.query.filter(
+        RastreamentoEmbarque.status.in_(['ATIVO', 'CHEGOU_DESTINO'])
+    ).all():
+        ultimo_ping = rastr.pings.first()
+        embarque = rastr.embarque
+        pendentes = rastr.entregas.filter(
+            EntregaRastreada.status.in_(['PENDENTE', 'EM_ROTA', 'PROXIMO'])
+        ).all()
+        nfs = {i.nota_fiscal for i in embarque.itens if i.nota_fiscal and i.status == 'ativo'}
+        resultado.append((
+            rastr.id, ultimo_ping.latitude if ultimo_ping else None, len(nfs), len(pendentes),
+            embarque.transportadora.razao_social if embarque.transportadora else None,
+            rastr.entregas.count(),
+            rastr.entregas.filter_by(status='PROXIMO').count(),
+            rastr.entregas.filter_by(status='ENTREGUE').count(),
+        ))
+    return len(resultado)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--caminhoes', type=int, default=500)
+    parser.add_argument('--minutos', type=int, default=10, help='janela de pings simulada por caminhao')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("🧪 BENCHMARK - INGESTAO DE PINGS GPS")
+    print("=" * 80)
+
+    app = create_app()
+    app.config.update({'WTF_CSRF_ENABLED': False, 'LOGIN_DISABLED': True})
+
+    with app.app_context():
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        sessao = scoped_session(sessionmaker(bind=connection, join_transaction_mode='create_savepoint'))
+        original_session = db.session
+        db.session = sessao
+        try:
+            with patch('app.rastreamento.services.ingestao_pings_service.obter_coordenadas_destino',
+                       return_value=DESTINO_FIXO):
+                client = app.test_client()
+
+                frota = criar_frota(args.caminhoes)
+                if not frota:
+                    raise SystemExit('❌ Nenhum embarque sem rastreamento para montar a frota')
+                metade = len(frota) // 2 or 1
+                pings_individual = gerar_pings(frota[:metade], args.minutos)
+                pings_lote = gerar_pings(frota[metade:] or frota, args.minutos)
+                print(f"\n🚚 {len(frota)} caminhoes, {args.minutos} min de pings "
+                      f"(1 a cada {INTERVALO_PING_S}s)")
+
+                print("\n📥 Ingestao")
+                t_ind, n_ind = medir('individual (/api/ping)', lambda: ingestao_individual(client, pings_individual))
+                t_lote, n_lote = medir('lote (/api/pings)', lambda: ingestao_em_lote(client, pings_lote))
+                print(f"   -> individual: {n_ind / t_ind:.0f} pings/s | lote: {n_lote / t_lote:.0f} pings/s")
+
+                print("\n📊 Dashboard /api/ativos")
+                sessao.expire_all()
+                t_leg, _ = medir('legado (N+1)', dashboard_legado)
+                sessao.expire_all()
+                t_novo, resp = medir('atual', lambda: client.get('/rastreamento/api/ativos'))
+                assert resp.status_code == 200, resp.get_json()
+                print(f"   -> {resp.get_json()['data']['total']} rastreamentos | "
+                      f"ganho {t_leg / t_novo:.1f}x")
+        finally:
+            sessao.remove()
+            if transaction.is_active:
+                transaction.rollback()
+            connection.close()
+            db.session = original_session
+
+    print("\n✅ Benchmark concluido (rollback aplicado, nada foi gravado)")
+
+
+if __name__ == '__main__':
+    main()
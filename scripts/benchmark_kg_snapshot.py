@@ -0,0 +1,167 @@
+"""
+Benchmark - Snapshot em memória do Knowledge Graph (query_graph_memories)
+========================================================================
+
+OBJETIVO:
+    Gerar um grafo sintético (padrão ~100k arestas: relações entidade↔entidade
+    + links entidade→memória, grau em lei de potência como no KG real) e medir:
+
+    1. BUILD: GraphSnapshot.construir (custo do rebuild quando a revisão muda)
+    2. HOPS: consultar_hops por prompt (1-3 entidades sementes)
+    3. PPR: consultar_ppr por prompt
+    4. (--banco) caminho SQL original (_query_graph_memories_sql) x
+       carregar_snapshot + consultar_hops sobre o mesmo grafo inserido no
+       PostgreSQL, com paridade conferida prompt a prompt. Tudo numa transação
+       com rollback no fim: nada persiste.
+
+USO:
+    python scripts/benchmark_kg_snapshot.py [--arestas 100000] [--consultas 2000] [--banco]
+
+REQUER (--banco): PostgreSQL com as tabelas do KG e a migration 2026-10-19_kg_graph_revisions.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+# Adicionar path do projeto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.agente.services.knowledge_graph_snapshot import GraphSnapshot  # noqa: E402
+
+
+def gerar_grafo(arestas, seed=47):
+    """Entidades/memórias com grau Zipf; metade das arestas são relações, metade links."""
+    rng = random.Random(seed)
+    n_entidades = max(10, arestas // 10)
+    n_memorias = max(10, arestas // 8)
+    pesos_zipf = [1.0 / (i + 1) for i in range(n_entidades)]
+
+    entidades = [(eid, f'ENT_{eid}') for eid in range(1, n_entidades + 1)]
+    ids = [eid for eid, _ in entidades]
+    relacoes = [
+        (a, b, round(rng.uniform(0.5, 5.0), 3))
+        for a, b in zip(rng.choices(ids, pesos_zipf, k=arestas // 2), rng.choices(ids, k=arestas // 2))
+    ]
+    links = list(zip(
+        rng.choices(ids, pesos_zipf, k=arestas - arestas // 2),
+        (rng.randint(1, n_memorias) for _ in range(arestas - arestas // 2)),
+    ))
+    return entidades, relacoes, links
+
+
+def medir(fn, consultas):
+    tempos = []
+    for args in consultas:
+        t0 = time.perf_counter()
+        fn(*args)
+        tempos.append((time.perf_counter() - t0) * 1e6)
+    tempos.sort()
+    return statistics.mean(tempos), tempos[len(tempos) // 2], tempos[int(len(tempos) * 0.99)]
+
+
+def imprimir(nome, mean_p50_p99):
+    mean, p50, p99 = mean_p50_p99
+    print(f'  {nome:<28} media {mean:10.1f} us | p50 {p50:10.1f} us | p99 {p99:10.1f} us')
+
+
+def gerar_consultas(rng, nomes, quantidade):
+    return [(rng.sample(nomes, rng.randint(1, 3)), set(), 10) for _ in range(quantidade)]
+
+
+def benchmark_memoria(args):
+    entidades, relacoes, links = gerar_grafo(args.arestas)
+    print(f'\nGrafo sintetico: {len(entidades)} entidades, {len(relacoes)} relacoes, {len(links)} links')
+
+    t0 = time.perf_counter()
+    snap = GraphSnapshot.construir((0, 0), entidades, relacoes, links)
+    print(f'  build snapshot               {(time.perf_counter() - t0) * 1000:10.1f} ms')
+
+    rng = random.Random(1)
+    nomes = [nome for _, nome in entidades]
+    consultas = gerar_consultas(rng, nomes, args.consultas)
+    imprimir('consultar_hops', medir(snap.consultar_hops, consultas))
+    imprimir('consultar_ppr', medir(snap.consultar_ppr, consultas[: max(1, args.consultas // 10)]))
+
+
+def benchmark_banco(args):
+    from sqlalchemy import text
+
+    from app import create_app, db
+    from app.agente.services import knowledge_graph_snapshot as kgs
+    from app.agente.services.knowledge_graph_service import _query_graph_memories_sql
+    from app.utils.timezone import agora_utc_naive
+
+    entidades, relacoes, links = gerar_grafo(args.arestas)
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                print('\n[banco] inserindo grafo sintetico (rollback no fim)...')
+                now = agora_utc_naive()
+                sufixo = uuid.uuid4().hex[:6].upper()
+                user_id = conn.execute(text('SELECT MIN(id) FROM usuarios')).scalar()
+                id_real = {}
+                for eid, nome in entidades:
+                    id_real[eid] = conn.execute(text("""
+                        INSERT INTO agent_memory_entities (user_id, entity_type, entity_name,
+                                                           first_seen_at, last_seen_at)
+                        VALUES (:uid, 'conceito', :nome, :now, :now) RETURNING id
+                    """), {"uid": user_id, "nome": f'{nome}_{sufixo}', "now": now}).scalar()
+                memoria_real = {}
+                for mid in sorted({m for _, m in links}):
+                    memoria_real[mid] = conn.execute(text("""
+                        INSERT INTO agent_memories (user_id, path, content, created_at, updated_at)
+                        VALUES (:uid, :path, 'bench', :now, :now) RETURNING id
+                    """), {"uid": user_id, "path": f'/memories/bench_kg_{sufixo}_{mid}', "now": now}).scalar()
+                conn.execute(text("""
+                    INSERT INTO agent_memory_entity_relations (source_entity_id, target_entity_id,
+                                                               relation_type, weight, created_at)
+                    VALUES (:a, :b, 'co_occurs', :w, :now) ON CONFLICT ON CONSTRAINT uq_entity_relation DO NOTHING
+                """), [{"a": id_real[a], "b": id_real[b], "w": w, "now": now} for a, b, w in relacoes if a != b])
+                conn.execute(text("""
+                    INSERT INTO agent_memory_entity_links (entity_id, memory_id, relation_type, created_at)
+                    VALUES (:e, :m, 'mentions', :now) ON CONFLICT DO NOTHING
+                """), [{"e": id_real[e], "m": memoria_real[m], "now": now} for e, m in links])
+
+                t0 = time.perf_counter()
+                snap = kgs.carregar_snapshot(conn, user_id, kgs.ler_revisoes(conn, [user_id, 0]))
+                print(f'  carregar_snapshot (3 queries + build) {(time.perf_counter() - t0) * 1000:8.1f} ms')
+
+                rng = random.Random(1)
+                nomes = [f'{nome}_{sufixo}' for _, nome in entidades]
+                consultas = gerar_consultas(rng, nomes, min(args.consultas, 300))
+                divergencias = sum(
+                    snap.consultar_hops(*c) != _query_graph_memories_sql(conn, [user_id, 0], *c)
+                    for c in consultas
+                )
+                imprimir('SQL (_query_graph_memories_sql)',
+                         medir(lambda n, e, l: _query_graph_memories_sql(conn, [user_id, 0], n, e, l), consultas))
+                imprimir('revisao + consultar_hops',
+                         medir(lambda n, e, l: (kgs.ler_revisoes(conn, [user_id, 0]), snap.consultar_hops(n, e, l)),
+                               consultas))
+                print(f'  divergencias SQL x snapshot: {divergencias}/{len(consultas)} '
+                      f'(empates de peso no hop 2 podem divergir)')
+            finally:
+                trans.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do snapshot do Knowledge Graph')
+    parser.add_argument('--arestas', type=int, default=100_000)
+    parser.add_argument('--consultas', type=int, default=2000)
+    parser.add_argument('--banco', action='store_true', help='compara com o caminho SQL no PostgreSQL')
+    args = parser.parse_args()
+
+    benchmark_memoria(args)
+    if args.banco:
+        benchmark_banco(args)
+
+
+if __name__ == '__main__':
+    main()
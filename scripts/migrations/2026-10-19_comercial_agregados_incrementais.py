@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Migracao: agregados comerciais incrementais (substitui mv_comercial_*)
+=====================================================================
+
+1. Executa o .sql: comercial_agregado_cliente / comercial_agregado_delta,
+   triggers de delta em carteira_principal, faturamento_produto e
+   entregas_monitoradas, funcoes de compactacao/reconstrucao.
+2. Carga inicial via reconstruir_comercial_agregado() (trava escritas nas
+   tres tabelas de origem durante a recontagem — segundos).
+3. Compara o resultado com as MVs antigas (se existirem) e remove
+   mv_comercial_equipes / mv_comercial_vendedores (--manter-mv para nao remover).
+
+Idempotente: rodar de novo recria funcoes/triggers e reconstroi o resumo.
+
+Uso:
+    python scripts/migrations/2026-10-19_comercial_agregados_incrementais.py [--manter-mv]
+Data: 2026-10-19
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+
+# sys.path.insert OBRIGATORIO antes de `from app import ...` (prod Render).
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app import create_app, db  # noqa: E402
+
+MVS = ('mv_comercial_equipes', 'mv_comercial_vendedores')
+
+
+def mv_existe(nome):
+    return db.session.execute(
+        text('SELECT COUNT(*) FROM pg_matviews WHERE matviewname = :nome'), {'nome': nome}
+    ).scalar() > 0
+
+
+def executar_ddl():
+    sql_path = Path(__file__).with_suffix('.sql')
+    if not sql_path.exists():
+        raise FileNotFoundError(f'SQL nao encontrado: {sql_path}')
+    ddl = sql_path.read_text()
+    with db.engine.begin() as conn:
+        try:
+            conn.exec_driver_sql(ddl)
+        except Exception as e:
+            raise SystemExit(f'ERRO ao executar DDL: {e}') from e
+
+
+def comparar_com_mv():
+    """Equipes da MV antiga x resumo novo (so informativo: a MV pode estar defasada)."""
+    from app.comercial.services.agregacao_service import AgregacaoComercialService
+
+    antigas = {
+        r.equipe_vendas: (int(r.total_clientes), float(r.valor_em_aberto))
+        for r in db.session.execute(text(
+            'SELECT equipe_vendas, total_clientes, valor_em_aberto FROM mv_comercial_equipes'
+        ))
+    }
+    novas = {
+        e['nome']: (e['total_clientes'], e['valor_em_aberto'])
+        for e in AgregacaoComercialService._dashboard_via_agregado()
+    }
+    diferentes = sorted(
+        nome for nome in set(antigas) | set(novas)
+        if nome not in antigas or nome not in novas
+        or antigas[nome][0] != novas[nome][0]
+        or abs(antigas[nome][1] - novas[nome][1]) > 0.01
+    )
+    print(f'  Equipes MV: {len(antigas)} | resumo: {len(novas)} | diferentes: {len(diferentes)}')
+    for nome in diferentes[:10]:
+        print(f'    {nome}: MV={antigas.get(nome)} resumo={novas.get(nome)}')
+
+
+def executar_migracao():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--manter-mv', action='store_true')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print('=' * 70)
+        print('MIGRACAO: agregados comerciais incrementais')
+        print('=' * 70)
+
+        print('\n[1] DDL...')
+        executar_ddl()
+
+        print('\n[2] Carga inicial (reconstruir_comercial_agregado)...')
+        chaves = db.session.execute(text('SELECT reconstruir_comercial_agregado()')).scalar()
+        db.session.commit()
+        print(f'  Chaves (origem, equipe, vendedor, cliente): {chaves}')
+
+        if mv_existe('mv_comercial_equipes'):
+            print('\n[3] Comparando com mv_comercial_equipes...')
+            comparar_com_mv()
+            if not args.manter_mv:
+                for mv in MVS:
+                    db.session.execute(text(f'DROP MATERIALIZED VIEW IF EXISTS {mv}'))
+                db.session.commit()
+                print(f'  Removidas: {", ".join(MVS)}')
+
+        triggers = db.session.execute(text(
+            "SELECT COUNT(*) FROM pg_trigger WHERE tgname LIKE 'trg_comercial_delta_%'"
+        )).scalar()
+        print(f'\n[AFTER] triggers de delta: {triggers}')
+        print('\nMigracao concluida com sucesso.')
+
+
+if __name__ == '__main__':
+    executar_migracao()
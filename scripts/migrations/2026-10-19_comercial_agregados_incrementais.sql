@@ -0,0 +1,410 @@
+-- ============================================================================
+-- MIGRATION: Agregados comerciais incrementais (substitui mv_comercial_*)
+-- ============================================================================
+-- O REFRESH das materialized views recalculava carteira × faturamento ×
+-- entregas inteiros a cada ciclo do scheduler. Agora:
+--
+--   - triggers por statement (com transition tables) em carteira_principal,
+--     faturamento_produto e entregas_monitoradas gravam DELTAS em
+--     comercial_agregado_delta, chave (origem, equipe, vendedor, cnpj);
+--   - compactar_comercial_agregado() soma os deltas em comercial_agregado_cliente
+--     (chamado pelo scheduler no lugar do REFRESH);
+--   - leitura = resumo + deltas pendentes (mesmo snapshot, sempre atual);
+--   - comercial_agregado_completo() recalcula tudo do zero (verificador de
+--     consistencia e reconstruir_comercial_agregado()).
+--
+-- origem: 'C' carteira_principal | 'F' faturamento_produto nao entregue
+-- linhas: linhas de origem que contribuem (cliente conta se linhas > 0)
+-- valor: mesma regra das MVs (carteira: ROUND(saldo*preco, 2) se saldo > 0.02)
+-- valor_exato: carteira sem ROUND (regra de calcular_valores_batch); F = 0
+--
+-- Uso: python scripts/migrations/2026-10-19_comercial_agregados_incrementais.py
+-- Data: 2026-10-19
+-- ============================================================================
+
+-- ============================================================================
+-- 1. TABELAS
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS comercial_agregado_cliente (
+    id              BIGSERIAL PRIMARY KEY,
+    origem          CHAR(1)       NOT NULL,
+    equipe_vendas   VARCHAR(100),
+    vendedor        VARCHAR(100),
+    cnpj            VARCHAR(20)   NOT NULL,
+    linhas          INTEGER       NOT NULL DEFAULT 0,
+    valor           NUMERIC       NOT NULL DEFAULT 0,
+    valor_exato     NUMERIC       NOT NULL DEFAULT 0,
+    atualizado_em   TIMESTAMP     NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_cac_equipe_vendedor ON comercial_agregado_cliente (equipe_vendas, vendedor);
+CREATE INDEX IF NOT EXISTS idx_cac_cnpj_origem ON comercial_agregado_cliente (cnpj, origem);
+
+CREATE TABLE IF NOT EXISTS comercial_agregado_delta (
+    id              BIGSERIAL PRIMARY KEY,
+    origem          CHAR(1)       NOT NULL,
+    equipe_vendas   VARCHAR(100),
+    vendedor        VARCHAR(100),
+    cnpj            VARCHAR(20)   NOT NULL,
+    linhas          INTEGER       NOT NULL,
+    valor           NUMERIC       NOT NULL,
+    valor_exato     NUMERIC       NOT NULL,
+    registrado_em   TIMESTAMP     NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_cad_equipe_vendedor ON comercial_agregado_delta (equipe_vendas, vendedor);
+CREATE INDEX IF NOT EXISTS idx_cad_cnpj_origem ON comercial_agregado_delta (cnpj, origem);
+
+
+-- ============================================================================
+-- 2. REGRAS DE VALOR (iguais as das MVs / CTEs do agregacao_service)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION comercial_valor_carteira(p_saldo NUMERIC, p_preco NUMERIC)
+RETURNS NUMERIC AS $$
+    -- TOLERANCIA: saldo > 0.02 para evitar ruido de arredondamento
+    SELECT COALESCE(CASE WHEN p_saldo > 0.02 THEN ROUND((p_saldo * p_preco)::numeric, 2) ELSE 0 END, 0)
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION comercial_valor_exato_carteira(p_saldo NUMERIC, p_preco NUMERIC)
+RETURNS NUMERIC AS $$
+    SELECT COALESCE(CASE WHEN p_saldo > 0.02 THEN p_saldo * p_preco ELSE 0 END, 0)
+$$ LANGUAGE sql IMMUTABLE;
+
+
+-- ============================================================================
+-- 3. TRIGGERS DE DELTA
+-- ============================================================================
+
+-- CarteiraPrincipal: 1 INSERT em delta por statement (sync em lote = 1 insert)
+CREATE OR REPLACE FUNCTION comercial_delta_carteira()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO comercial_agregado_delta (origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato)
+        SELECT 'C', equipe_vendas, vendedor, cnpj_cpf, COUNT(*),
+               SUM(comercial_valor_carteira(qtd_saldo_produto_pedido, preco_produto_pedido)),
+               SUM(comercial_valor_exato_carteira(qtd_saldo_produto_pedido, preco_produto_pedido))
+        FROM linhas_novas
+        GROUP BY equipe_vendas, vendedor, cnpj_cpf;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO comercial_agregado_delta (origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato)
+        SELECT 'C', equipe_vendas, vendedor, cnpj_cpf, -COUNT(*),
+               -SUM(comercial_valor_carteira(qtd_saldo_produto_pedido, preco_produto_pedido)),
+               -SUM(comercial_valor_exato_carteira(qtd_saldo_produto_pedido, preco_produto_pedido))
+        FROM linhas_antigas
+        GROUP BY equipe_vendas, vendedor, cnpj_cpf;
+
+    ELSE
+        -- UPDATE: novo - antigo por chave; UPDATE que nao mexe em valor/chave nao gera delta
+        INSERT INTO comercial_agregado_delta (origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato)
+        SELECT 'C', equipe_vendas, vendedor, cnpj_cpf, SUM(sinal),
+               SUM(sinal * comercial_valor_carteira(qtd_saldo_produto_pedido, preco_produto_pedido)),
+               SUM(sinal * comercial_valor_exato_carteira(qtd_saldo_produto_pedido, preco_produto_pedido))
+        FROM (
+            SELECT equipe_vendas, vendedor, cnpj_cpf, qtd_saldo_produto_pedido, preco_produto_pedido, 1 AS sinal
+            FROM linhas_novas
+            UNION ALL
+            SELECT equipe_vendas, vendedor, cnpj_cpf, qtd_saldo_produto_pedido, preco_produto_pedido, -1
+            FROM linhas_antigas
+        ) m
+        GROUP BY equipe_vendas, vendedor, cnpj_cpf
+        HAVING SUM(sinal) <> 0
+            OR SUM(sinal * comercial_valor_carteira(qtd_saldo_produto_pedido, preco_produto_pedido)) <> 0
+            OR SUM(sinal * comercial_valor_exato_carteira(qtd_saldo_produto_pedido, preco_produto_pedido)) <> 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables exigem 1 trigger por evento
+DROP TRIGGER IF EXISTS trg_comercial_delta_carteira_ins ON carteira_principal;
+CREATE TRIGGER trg_comercial_delta_carteira_ins
+    AFTER INSERT ON carteira_principal
+    REFERENCING NEW TABLE AS linhas_novas
+    FOR EACH STATEMENT EXECUTE FUNCTION comercial_delta_carteira();
+
+DROP TRIGGER IF EXISTS trg_comercial_delta_carteira_upd ON carteira_principal;
+CREATE TRIGGER trg_comercial_delta_carteira_upd
+    AFTER UPDATE ON carteira_principal
+    REFERENCING OLD TABLE AS linhas_antigas NEW TABLE AS linhas_novas
+    FOR EACH STATEMENT EXECUTE FUNCTION comercial_delta_carteira();
+
+DROP TRIGGER IF EXISTS trg_comercial_delta_carteira_del ON carteira_principal;
+CREATE TRIGGER trg_comercial_delta_carteira_del
+    AFTER DELETE ON carteira_principal
+    REFERENCING OLD TABLE AS linhas_antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION comercial_delta_carteira();
+
+
+-- FaturamentoProduto: contribui 1x por entrega nao finalizada da NF (LEFT JOIN das MVs)
+CREATE OR REPLACE FUNCTION comercial_delta_faturamento()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO comercial_agregado_delta (origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato)
+        SELECT 'F', fp.equipe_vendas, fp.vendedor, fp.cnpj_cliente, COUNT(*), SUM(fp.valor_produto_faturado), 0
+        FROM linhas_novas fp
+        LEFT JOIN entregas_monitoradas em ON em.numero_nf = fp.numero_nf
+        WHERE fp.status_nf != 'Cancelado'
+          AND (em.status_finalizacao IS NULL OR em.status_finalizacao != 'Entregue')
+        GROUP BY fp.equipe_vendas, fp.vendedor, fp.cnpj_cliente;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO comercial_agregado_delta (origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato)
+        SELECT 'F', fp.equipe_vendas, fp.vendedor, fp.cnpj_cliente, -COUNT(*), -SUM(fp.valor_produto_faturado), 0
+        FROM linhas_antigas fp
+        LEFT JOIN entregas_monitoradas em ON em.numero_nf = fp.numero_nf
+        WHERE fp.status_nf != 'Cancelado'
+          AND (em.status_finalizacao IS NULL OR em.status_finalizacao != 'Entregue')
+        GROUP BY fp.equipe_vendas, fp.vendedor, fp.cnpj_cliente;
+
+    ELSE
+        INSERT INTO comercial_agregado_delta (origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato)
+        SELECT 'F', m.equipe_vendas, m.vendedor, m.cnpj_cliente, SUM(m.sinal), SUM(m.sinal * m.valor_produto_faturado), 0
+        FROM (
+            SELECT numero_nf, equipe_vendas, vendedor, cnpj_cliente, status_nf, valor_produto_faturado, 1 AS sinal
+            FROM linhas_novas
+            UNION ALL
+            SELECT numero_nf, equipe_vendas, vendedor, cnpj_cliente, status_nf, valor_produto_faturado, -1
+            FROM linhas_antigas
+        ) m
+        LEFT JOIN entregas_monitoradas em ON em.numero_nf = m.numero_nf
+        WHERE m.status_nf != 'Cancelado'
+          AND (em.status_finalizacao IS NULL OR em.status_finalizacao != 'Entregue')
+        GROUP BY m.equipe_vendas, m.vendedor, m.cnpj_cliente
+        HAVING SUM(m.sinal) <> 0 OR SUM(m.sinal * m.valor_produto_faturado) <> 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_comercial_delta_faturamento_ins ON faturamento_produto;
+CREATE TRIGGER trg_comercial_delta_faturamento_ins
+    AFTER INSERT ON faturamento_produto
+    REFERENCING NEW TABLE AS linhas_novas
+    FOR EACH STATEMENT EXECUTE FUNCTION comercial_delta_faturamento();
+
+DROP TRIGGER IF EXISTS trg_comercial_delta_faturamento_upd ON faturamento_produto;
+CREATE TRIGGER trg_comercial_delta_faturamento_upd
+    AFTER UPDATE ON faturamento_produto
+    REFERENCING OLD TABLE AS linhas_antigas NEW TABLE AS linhas_novas
+    FOR EACH STATEMENT EXECUTE FUNCTION comercial_delta_faturamento();
+
+DROP TRIGGER IF EXISTS trg_comercial_delta_faturamento_del ON faturamento_produto;
+CREATE TRIGGER trg_comercial_delta_faturamento_del
+    AFTER DELETE ON faturamento_produto
+    REFERENCING OLD TABLE AS linhas_antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION comercial_delta_faturamento();
+
+
+-- EntregasMonitoradas: mudar status_finalizacao/numero_nf altera a contribuicao
+-- de TODOS os itens da NF. Por NF, multiplicidade do LEFT JOIN:
+--   sem entrega -> 1 | com entregas -> qtde de entregas nao 'Entregue'
+-- delta = itens da NF * (multiplicidade depois - multiplicidade antes)
+-- Por statement (transition tables, como carteira/faturamento): um INSERT/DELETE
+-- de varias entregas da mesma NF conta a NF uma vez so. "depois" = tabela ja
+-- alterada; "antes" = tabela sem as linhas novas + as linhas antigas.
+CREATE OR REPLACE FUNCTION comercial_delta_entregas()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_nfs             TEXT[];
+    v_ids_novos       INTEGER[];
+    v_nfs_antigas     TEXT[];
+    v_status_antigos  TEXT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(id), array_agg(numero_nf)
+        INTO v_ids_novos, v_nfs
+        FROM linhas_novas;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(numero_nf), array_agg(status_finalizacao)
+        INTO v_nfs_antigas, v_status_antigos
+        FROM linhas_antigas;
+        v_nfs := v_nfs_antigas;
+
+    ELSE
+        -- UPDATE: so linhas que mudaram NF ou status (as demais se anulam)
+        SELECT array_agg(n.id), array_agg(o.numero_nf), array_agg(o.status_finalizacao),
+               array_agg(n.numero_nf) || array_agg(o.numero_nf)
+        INTO v_ids_novos, v_nfs_antigas, v_status_antigos, v_nfs
+        FROM linhas_novas n
+        JOIN linhas_antigas o ON o.id = n.id
+        WHERE n.numero_nf IS DISTINCT FROM o.numero_nf
+           OR n.status_finalizacao IS DISTINCT FROM o.status_finalizacao;
+    END IF;
+
+    IF v_nfs IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO comercial_agregado_delta (origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato)
+    WITH depois AS (
+        SELECT numero_nf, status_finalizacao
+        FROM entregas_monitoradas
+        WHERE numero_nf = ANY(v_nfs)
+    ),
+    antes AS (
+        SELECT numero_nf, status_finalizacao
+        FROM entregas_monitoradas
+        WHERE numero_nf = ANY(v_nfs)
+          AND NOT (id = ANY(COALESCE(v_ids_novos, ARRAY[]::INTEGER[])))
+        UNION ALL
+        SELECT a.numero_nf, a.status_finalizacao
+        FROM unnest(v_nfs_antigas, v_status_antigos) AS a(numero_nf, status_finalizacao)
+    ),
+    fator AS (
+        SELECT n.numero_nf,
+            (SELECT CASE WHEN COUNT(*) = 0 THEN 1
+                         ELSE COUNT(*) FILTER (WHERE d.status_finalizacao IS NULL OR d.status_finalizacao != 'Entregue')
+                    END FROM depois d WHERE d.numero_nf = n.numero_nf)
+          - (SELECT CASE WHEN COUNT(*) = 0 THEN 1
+                         ELSE COUNT(*) FILTER (WHERE a.status_finalizacao IS NULL OR a.status_finalizacao != 'Entregue')
+                    END FROM antes a WHERE a.numero_nf = n.numero_nf) AS fator
+        FROM (SELECT DISTINCT unnest(v_nfs) AS numero_nf) n
+        WHERE n.numero_nf IS NOT NULL
+    )
+    SELECT 'F', fp.equipe_vendas, fp.vendedor, fp.cnpj_cliente,
+           SUM(f.fator), SUM(f.fator * fp.valor_produto_faturado), 0
+    FROM fator f
+    JOIN faturamento_produto fp ON fp.numero_nf = f.numero_nf
+    WHERE f.fator <> 0
+      AND fp.status_nf != 'Cancelado'
+    GROUP BY fp.equipe_vendas, fp.vendedor, fp.cnpj_cliente;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Triggers por linha da versao anterior (INSERT/DELETE contavam a NF 1x por linha)
+DROP TRIGGER IF EXISTS trg_comercial_delta_entregas ON entregas_monitoradas;
+
+DROP TRIGGER IF EXISTS trg_comercial_delta_entregas_ins ON entregas_monitoradas;
+CREATE TRIGGER trg_comercial_delta_entregas_ins
+    AFTER INSERT ON entregas_monitoradas
+    REFERENCING NEW TABLE AS linhas_novas
+    FOR EACH STATEMENT EXECUTE FUNCTION comercial_delta_entregas();
+
+DROP TRIGGER IF EXISTS trg_comercial_delta_entregas_upd ON entregas_monitoradas;
+CREATE TRIGGER trg_comercial_delta_entregas_upd
+    AFTER UPDATE ON entregas_monitoradas
+    REFERENCING OLD TABLE AS linhas_antigas NEW TABLE AS linhas_novas
+    FOR EACH STATEMENT EXECUTE FUNCTION comercial_delta_entregas();
+
+DROP TRIGGER IF EXISTS trg_comercial_delta_entregas_del ON entregas_monitoradas;
+CREATE TRIGGER trg_comercial_delta_entregas_del
+    AFTER DELETE ON entregas_monitoradas
+    REFERENCING OLD TABLE AS linhas_antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION comercial_delta_entregas();
+
+
+-- ============================================================================
+-- 4. RECALCULO COMPLETO (fonte da verdade do verificador)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION comercial_agregado_completo()
+RETURNS TABLE (
+    origem CHAR(1), equipe_vendas VARCHAR, vendedor VARCHAR, cnpj VARCHAR,
+    linhas BIGINT, valor NUMERIC, valor_exato NUMERIC
+) AS $$
+    SELECT 'C'::CHAR(1), cp.equipe_vendas, cp.vendedor, cp.cnpj_cpf, COUNT(*),
+           SUM(comercial_valor_carteira(cp.qtd_saldo_produto_pedido, cp.preco_produto_pedido)),
+           SUM(comercial_valor_exato_carteira(cp.qtd_saldo_produto_pedido, cp.preco_produto_pedido))
+    FROM carteira_principal cp
+    GROUP BY cp.equipe_vendas, cp.vendedor, cp.cnpj_cpf
+    UNION ALL
+    SELECT 'F'::CHAR(1), fp.equipe_vendas, fp.vendedor, fp.cnpj_cliente, COUNT(*),
+           SUM(fp.valor_produto_faturado), 0
+    FROM faturamento_produto fp
+    LEFT JOIN entregas_monitoradas em ON em.numero_nf = fp.numero_nf
+    WHERE fp.status_nf != 'Cancelado'
+      AND (em.status_finalizacao IS NULL OR em.status_finalizacao != 'Entregue')
+    GROUP BY fp.equipe_vendas, fp.vendedor, fp.cnpj_cliente
+$$ LANGUAGE sql STABLE;
+
+
+-- ============================================================================
+-- 5. COMPACTACAO E RECONSTRUCAO
+-- ============================================================================
+CREATE OR REPLACE FUNCTION compactar_comercial_agregado()
+RETURNS INTEGER AS $$
+DECLARE
+    v_deltas INTEGER;
+BEGIN
+    -- Uma compactacao por vez (scheduler em mais de um worker): quem nao
+    -- pega o lock sai; os deltas continuam visiveis na leitura
+    IF NOT pg_try_advisory_xact_lock(hashtext('comercial_agregado')) THEN
+        RETURN 0;
+    END IF;
+
+    CREATE TEMP TABLE IF NOT EXISTS tmp_comercial_compactacao (
+        origem CHAR(1), equipe_vendas VARCHAR(100), vendedor VARCHAR(100), cnpj VARCHAR(20),
+        linhas BIGINT, valor NUMERIC, valor_exato NUMERIC, deltas BIGINT
+    ) ON COMMIT DELETE ROWS;
+    TRUNCATE tmp_comercial_compactacao;
+
+    -- DELETE ... RETURNING: exatamente o que sai da fila entra no resumo
+    WITH lote AS (
+        DELETE FROM comercial_agregado_delta
+        RETURNING origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato
+    )
+    INSERT INTO tmp_comercial_compactacao
+    SELECT origem, equipe_vendas, vendedor, cnpj, SUM(linhas), SUM(valor), SUM(valor_exato), COUNT(*)
+    FROM lote
+    GROUP BY origem, equipe_vendas, vendedor, cnpj;
+
+    SELECT COALESCE(SUM(deltas), 0) INTO v_deltas FROM tmp_comercial_compactacao;
+    IF v_deltas = 0 THEN
+        RETURN 0;
+    END IF;
+
+    UPDATE comercial_agregado_cliente c
+    SET linhas = c.linhas + t.linhas,
+        valor = c.valor + t.valor,
+        valor_exato = c.valor_exato + t.valor_exato,
+        atualizado_em = NOW()
+    FROM tmp_comercial_compactacao t
+    WHERE c.cnpj = t.cnpj
+      AND c.origem = t.origem
+      AND c.equipe_vendas IS NOT DISTINCT FROM t.equipe_vendas
+      AND c.vendedor IS NOT DISTINCT FROM t.vendedor;
+
+    INSERT INTO comercial_agregado_cliente (origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato)
+    SELECT t.origem, t.equipe_vendas, t.vendedor, t.cnpj, t.linhas, t.valor, t.valor_exato
+    FROM tmp_comercial_compactacao t
+    WHERE NOT EXISTS (
+        SELECT 1 FROM comercial_agregado_cliente c
+        WHERE c.cnpj = t.cnpj
+          AND c.origem = t.origem
+          AND c.equipe_vendas IS NOT DISTINCT FROM t.equipe_vendas
+          AND c.vendedor IS NOT DISTINCT FROM t.vendedor
+    );
+
+    DELETE FROM comercial_agregado_cliente
+    WHERE linhas = 0
+      AND cnpj IN (SELECT cnpj FROM tmp_comercial_compactacao);
+
+    RETURN v_deltas;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reconstruir_comercial_agregado()
+RETURNS INTEGER AS $$
+DECLARE
+    v_chaves INTEGER;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('comercial_agregado'));
+    -- Sem escritas nas origens durante a recontagem: nenhum delta fica pela metade
+    LOCK TABLE carteira_principal, faturamento_produto, entregas_monitoradas IN SHARE MODE;
+
+    DELETE FROM comercial_agregado_delta;
+    DELETE FROM comercial_agregado_cliente;
+
+    INSERT INTO comercial_agregado_cliente (origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato)
+    SELECT origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato
+    FROM comercial_agregado_completo();
+    GET DIAGNOSTICS v_chaves = ROW_COUNT;
+
+    RETURN v_chaves;
+END;
+$$ LANGUAGE plpgsql;
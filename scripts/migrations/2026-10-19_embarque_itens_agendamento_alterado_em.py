@@ -0,0 +1,35 @@
+"""
+Migration: watermark de agendamento em embarque_itens
+
+Data: 2026-10-19
+Fonte de verdade: app/embarques/models.py (EmbarqueItem.agendamento_alterado_em)
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app, db  # noqa: E402
+
+
+DDL = [
+    "ALTER TABLE embarque_itens ADD COLUMN IF NOT EXISTS agendamento_alterado_em TIMESTAMP NULL",
+    "CREATE INDEX IF NOT EXISTS ix_embarque_itens_agendamento_alterado_em "
+    "ON embarque_itens(agendamento_alterado_em)",
+]
+
+
+def run():
+    app = create_app()
+    with app.app_context():
+        colunas = {c['name'] for c in db.inspect(db.engine).get_columns('embarque_itens')}
+        print(f"BEFORE: agendamento_alterado_em {'YES' if 'agendamento_alterado_em' in colunas else 'NO'}")
+        for ddl in DDL:
+            db.session.execute(db.text(ddl))
+            print(f"OK {ddl[:70]}...")
+        db.session.commit()
+        print("\nMigration embarque_itens_agendamento_alterado_em aplicada.")
+
+
+if __name__ == '__main__':
+    run()
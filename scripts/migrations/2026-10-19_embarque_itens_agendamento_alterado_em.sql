@@ -0,0 +1,10 @@
+-- Migration: watermark de agendamento em embarque_itens
+-- Fonte de verdade: app/embarques/models.py (EmbarqueItem.agendamento_alterado_em)
+-- Carimbado pelo listener marcar_agendamento_alterado quando data_agenda,
+-- protocolo_agendamento ou agendamento_confirmado mudam. Usado por
+-- nfs_alteradas_desde() (app/utils/sincronizar_entregas_lote.py).
+-- Sem backfill: linhas antigas ficam NULL (o sync completo ja as cobre).
+
+ALTER TABLE embarque_itens ADD COLUMN IF NOT EXISTS agendamento_alterado_em TIMESTAMP NULL;
+CREATE INDEX IF NOT EXISTS ix_embarque_itens_agendamento_alterado_em
+    ON embarque_itens(agendamento_alterado_em);
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Migracao: evento_supply_chain particionada por mes + diff no UPDATE
+===================================================================
+
+1. Executa o .sql: tabela atual vira evento_supply_chain_legado, cria a
+   nova tabela particionada, funcoes garantir_particao_evento_sc /
+   jsonb_diff_evento_sc, trigger com diff e o manifesto de arquivos.
+2. Backfill em lotes: move eventos do legado para a particionada
+   (DELETE ... RETURNING + INSERT na mesma transacao, commit por lote),
+   convertendo os snapshots de UPDATE em diff. Pode ser interrompido e
+   rodado de novo — continua de onde parou.
+3. --drop-legado: remove evento_supply_chain_legado quando vazio.
+
+Triggers continuam gravando normalmente durante o backfill (na nova tabela).
+
+Uso:
+    python scripts/migrations/2026-10-19_evento_supply_chain_particionado.py [--lote 20000] [--drop-legado]
+Data: 2026-10-19
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+# sys.path.insert OBRIGATORIO antes de `from app import ...` (prod Render).
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app import create_app, db  # noqa: E402
+
+COLUNAS = (
+    'tipo_evento, entidade, entidade_id, num_pedido, cod_produto, numero_nf, '
+    'separacao_lote_id, quantidade_anterior, quantidade_nova, qtd_projetada_dia, '
+    'campos_alterados, origem, session_id, registrado_em, registrado_por, usuario_id'
+)
+
+SQL_LOTE = text(f"""
+    WITH lote AS (
+        DELETE FROM evento_supply_chain_legado
+        WHERE id IN (
+            SELECT id FROM evento_supply_chain_legado ORDER BY id LIMIT :lote
+        )
+        RETURNING *
+    )
+    INSERT INTO evento_supply_chain (id, {COLUNAS}, dados_antes, dados_depois)
+    SELECT id, {COLUNAS},
+        CASE WHEN tipo_evento = 'UPDATE'
+             THEN jsonb_diff_evento_sc(dados_depois, dados_antes) ELSE dados_antes END,
+        CASE WHEN tipo_evento = 'UPDATE'
+             THEN jsonb_diff_evento_sc(dados_antes, dados_depois) ELSE dados_depois END
+    FROM lote
+    ON CONFLICT DO NOTHING
+""")
+
+
+def tabela_existe(nome):
+    return db.session.execute(
+        text("SELECT to_regclass(:nome) IS NOT NULL"), {'nome': nome}
+    ).scalar()
+
+
+def particionada():
+    return db.session.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE relname = 'evento_supply_chain'"
+    )).scalar()
+
+
+def executar_ddl():
+    sql_path = Path(__file__).with_suffix('.sql')
+    if not sql_path.exists():
+        raise FileNotFoundError(f'SQL nao encontrado: {sql_path}')
+    ddl = sql_path.read_text()
+    with db.engine.begin() as conn:
+        try:
+            conn.exec_driver_sql(ddl)
+        except Exception as e:
+            raise SystemExit(f'ERRO ao executar DDL: {e}') from e
+
+
+def backfill(tamanho_lote):
+    if not tabela_existe('evento_supply_chain_legado'):
+        print('  Sem evento_supply_chain_legado — nada a copiar')
+        return 0
+
+    restantes = db.session.execute(text('SELECT count(*) FROM evento_supply_chain_legado')).scalar()
+    print(f'  Eventos no legado: {restantes}')
+
+    # Particoes de todos os meses do legado antes de copiar (nada cai na DEFAULT)
+    meses = [r[0] for r in db.session.execute(text(
+        "SELECT DISTINCT date_trunc('month', registrado_em)::DATE FROM evento_supply_chain_legado ORDER BY 1"
+    ))]
+    for mes in meses:
+        db.session.execute(text('SELECT garantir_particao_evento_sc(:mes)'), {'mes': mes})
+    db.session.commit()
+    print(f'  Particoes garantidas: {len(meses)} meses')
+
+    movidos = 0
+    inicio = time.monotonic()
+    while True:
+        resultado = db.session.execute(SQL_LOTE, {'lote': tamanho_lote})
+        db.session.commit()
+        if not resultado.rowcount:
+            restante = db.session.execute(text('SELECT count(*) FROM evento_supply_chain_legado')).scalar()
+            if not restante:
+                break
+            # Lote inteiro ja existia (re-execucao): linhas removidas do legado mesmo assim
+            continue
+        movidos += resultado.rowcount
+        print(f'  ... {movidos} eventos movidos ({time.monotonic() - inicio:.0f}s)')
+    return movidos
+
+
+def executar_migracao():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lote', type=int, default=20000)
+    parser.add_argument('--drop-legado', action='store_true')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print('=' * 70)
+        print('MIGRACAO: evento_supply_chain particionada + diff')
+        print('=' * 70)
+
+        print(f'\n[BEFORE] particionada: {bool(particionada())}')
+
+        print('\n[1] DDL...')
+        executar_ddl()
+        if not particionada():
+            raise SystemExit('ERRO: evento_supply_chain nao ficou particionada')
+
+        print('\n[2] Backfill do legado...')
+        movidos = backfill(args.lote)
+        print(f'  Total movido: {movidos}')
+
+        if args.drop_legado and tabela_existe('evento_supply_chain_legado'):
+            restante = db.session.execute(text('SELECT count(*) FROM evento_supply_chain_legado')).scalar()
+            if restante:
+                print(f'\n[3] Legado ainda tem {restante} eventos — NAO removido')
+            else:
+                db.session.execute(text('DROP TABLE evento_supply_chain_legado'))
+                db.session.commit()
+                print('\n[3] evento_supply_chain_legado removido')
+
+        particoes = db.session.execute(text("""
+            SELECT count(*) FROM pg_inherits i
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = 'evento_supply_chain'
+        """)).scalar()
+        total = db.session.execute(text('SELECT count(*) FROM evento_supply_chain')).scalar()
+        print(f'\n[AFTER] particoes: {particoes} | eventos: {total}')
+        print('\nMigracao concluida com sucesso.')
+
+
+if __name__ == '__main__':
+    executar_migracao()
@@ -0,0 +1,370 @@
+-- ============================================================================
+-- MIGRATION: evento_supply_chain particionada por mes + diffs no UPDATE
+-- ============================================================================
+-- 1. Tabela atual (nao particionada) vira evento_supply_chain_legado
+--    (indices renomeados com sufixo _legado; sequence de id preservada)
+-- 2. Nova evento_supply_chain PARTITION BY RANGE (registrado_em), mesmas
+--    colunas, PK (id, registrado_em), particao DEFAULT de seguranca
+-- 3. garantir_particao_evento_sc(mes): cria a particao mensal (se ja caiu
+--    linha do mes na DEFAULT, move para a nova particao)
+-- 4. jsonb_diff_evento_sc(base, novo): chaves de novo que diferem de base
+-- 5. audit_supply_chain_trigger(): UPDATE grava so as chaves alteradas em
+--    dados_antes/dados_depois (INSERT/DELETE continuam com snapshot)
+-- 6. evento_supply_chain_arquivo: manifesto das particoes arquivadas
+--
+-- Os dados do legado sao copiados em lotes pelo .py (convertendo os
+-- snapshots de UPDATE em diff). Idempotente.
+--
+-- Uso: python scripts/migrations/2026-10-19_evento_supply_chain_particionado.py
+-- Data: 2026-10-19
+-- ============================================================================
+
+-- ============================================================================
+-- 1. TABELA ATUAL -> LEGADO
+-- ============================================================================
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class
+        WHERE relname = 'evento_supply_chain' AND relkind = 'r'
+    ) THEN
+        ALTER SEQUENCE IF EXISTS evento_supply_chain_id_seq OWNED BY NONE;
+        ALTER TABLE evento_supply_chain RENAME TO evento_supply_chain_legado;
+        FOR r IN
+            SELECT indexname FROM pg_indexes WHERE tablename = 'evento_supply_chain_legado'
+        LOOP
+            EXECUTE format('ALTER INDEX %I RENAME TO %I', r.indexname, LEFT(r.indexname, 55) || '_legado');
+        END LOOP;
+        RAISE NOTICE '[OK] evento_supply_chain -> evento_supply_chain_legado';
+    END IF;
+END $$;
+
+CREATE SEQUENCE IF NOT EXISTS evento_supply_chain_id_seq;
+
+-- ============================================================================
+-- 2. TABELA PARTICIONADA
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS evento_supply_chain (
+    id                  BIGINT        NOT NULL DEFAULT nextval('evento_supply_chain_id_seq'),
+
+    tipo_evento         VARCHAR(10)   NOT NULL,
+    entidade            VARCHAR(30)   NOT NULL,
+    entidade_id         INTEGER,
+
+    num_pedido          VARCHAR(50),
+    cod_produto         VARCHAR(50),
+    numero_nf           VARCHAR(20),
+    separacao_lote_id   VARCHAR(50),
+
+    quantidade_anterior NUMERIC(15,3),
+    quantidade_nova     NUMERIC(15,3),
+    qtd_projetada_dia   NUMERIC(15,3),
+
+    -- INSERT: snapshot de NEW | UPDATE: so chaves alteradas | DELETE: snapshot de OLD
+    dados_antes         JSONB,
+    dados_depois        JSONB,
+    campos_alterados    TEXT[],
+
+    origem              VARCHAR(50),
+    session_id          VARCHAR(100),
+    registrado_em       TIMESTAMP     NOT NULL DEFAULT NOW(),
+    registrado_por      VARCHAR(100),
+    usuario_id          INTEGER,
+
+    PRIMARY KEY (id, registrado_em)
+) PARTITION BY RANGE (registrado_em);
+
+-- Rede de seguranca: evento nunca falha por falta de particao
+CREATE TABLE IF NOT EXISTS evento_supply_chain_default
+    PARTITION OF evento_supply_chain DEFAULT;
+
+-- Indices no pai (propagam para todas as particoes)
+CREATE INDEX IF NOT EXISTS idx_esc_produto_tempo
+    ON evento_supply_chain (cod_produto, registrado_em DESC);
+CREATE INDEX IF NOT EXISTS idx_esc_pedido_tempo
+    ON evento_supply_chain (num_pedido, registrado_em DESC);
+CREATE INDEX IF NOT EXISTS idx_esc_entidade_tempo
+    ON evento_supply_chain (entidade, registrado_em DESC);
+CREATE INDEX IF NOT EXISTS idx_esc_entidade_id
+    ON evento_supply_chain (entidade, entidade_id, registrado_em);
+CREATE INDEX IF NOT EXISTS idx_esc_nf
+    ON evento_supply_chain (numero_nf) WHERE numero_nf IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_esc_lote
+    ON evento_supply_chain (separacao_lote_id) WHERE separacao_lote_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_esc_session
+    ON evento_supply_chain (session_id) WHERE session_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_esc_usuario_id
+    ON evento_supply_chain (usuario_id, registrado_em DESC) WHERE usuario_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_esc_brin
+    ON evento_supply_chain USING BRIN (registrado_em);
+
+-- ============================================================================
+-- 3. CRIACAO DE PARTICAO MENSAL
+-- ============================================================================
+CREATE OR REPLACE FUNCTION garantir_particao_evento_sc(p_mes DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_inicio DATE := date_trunc('month', p_mes)::DATE;
+    v_fim    DATE := (date_trunc('month', p_mes) + INTERVAL '1 month')::DATE;
+    v_nome   TEXT := 'evento_supply_chain_' || to_char(p_mes, '"y"YYYY"m"MM');
+BEGIN
+    IF to_regclass(v_nome) IS NOT NULL THEN
+        RETURN v_nome;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM evento_supply_chain_default
+        WHERE registrado_em >= v_inicio AND registrado_em < v_fim
+    ) THEN
+        -- Linhas do mes cairam na DEFAULT: mover antes de anexar
+        EXECUTE format('CREATE TABLE %I (LIKE evento_supply_chain INCLUDING DEFAULTS)', v_nome);
+        EXECUTE format(
+            'INSERT INTO %I SELECT * FROM evento_supply_chain_default '
+            'WHERE registrado_em >= $1 AND registrado_em < $2', v_nome
+        ) USING v_inicio, v_fim;
+        DELETE FROM evento_supply_chain_default
+        WHERE registrado_em >= v_inicio AND registrado_em < v_fim;
+        EXECUTE format(
+            'ALTER TABLE evento_supply_chain ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+            v_nome, v_inicio, v_fim
+        );
+    ELSE
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF evento_supply_chain FOR VALUES FROM (%L) TO (%L)',
+            v_nome, v_inicio, v_fim
+        );
+    END IF;
+    RETURN v_nome;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mes corrente + 2 a frente (o scheduler mantem a janela depois)
+SELECT garantir_particao_evento_sc((date_trunc('month', NOW()) + make_interval(months => m))::DATE)
+FROM generate_series(0, 2) AS m;
+
+-- ============================================================================
+-- 4. DIFF JSONB
+-- ============================================================================
+CREATE OR REPLACE FUNCTION jsonb_diff_evento_sc(p_base JSONB, p_novo JSONB)
+RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_object_agg(n.key, n.value), '{}'::JSONB)
+    FROM jsonb_each(COALESCE(p_novo, '{}'::JSONB)) n
+    WHERE p_base -> n.key IS DISTINCT FROM n.value
+$$ LANGUAGE sql IMMUTABLE;
+
+
+-- ============================================================================
+-- 5. TRIGGER FUNCTION (mesma de add_usuario_id_evento_supply_chain.sql,
+--    com a secao 3b gravando diff no UPDATE)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION audit_supply_chain_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_entidade         TEXT;
+    v_num_pedido       TEXT;
+    v_cod_produto      TEXT;
+    v_numero_nf        TEXT;
+    v_lote_id          TEXT;
+    v_qtd_anterior     NUMERIC(15,3);
+    v_qtd_nova         NUMERIC(15,3);
+    v_campos_alterados TEXT[];
+    v_dados_antes      JSONB;
+    v_dados_depois     JSONB;
+    v_usuario          TEXT;
+    v_origem           TEXT;
+    v_session_id       TEXT;
+    v_usuario_id       INTEGER;
+    v_diff_antes       JSONB;
+    v_diff_depois      JSONB;
+    v_campo            TEXT;
+    v_old_val          TEXT;
+    v_new_val          TEXT;
+BEGIN
+    -- ========================================
+    -- 1. Determinar entidade e campos-chave
+    -- ========================================
+    CASE TG_TABLE_NAME
+        WHEN 'carteira_principal' THEN
+            v_entidade     := 'carteira';
+            v_num_pedido   := COALESCE(NEW.num_pedido, OLD.num_pedido);
+            v_cod_produto  := COALESCE(NEW.cod_produto, OLD.cod_produto);
+            v_numero_nf    := NULL;
+            v_lote_id      := NULL;
+            v_qtd_anterior := CASE WHEN TG_OP IN ('UPDATE','DELETE') THEN OLD.qtd_saldo_produto_pedido ELSE NULL END;
+            v_qtd_nova     := CASE WHEN TG_OP IN ('INSERT','UPDATE') THEN NEW.qtd_saldo_produto_pedido ELSE NULL END;
+
+        WHEN 'separacao' THEN
+            v_entidade     := 'separacao';
+            v_num_pedido   := COALESCE(NEW.num_pedido, OLD.num_pedido);
+            v_cod_produto  := COALESCE(NEW.cod_produto, OLD.cod_produto);
+            v_numero_nf    := COALESCE(NEW.numero_nf, OLD.numero_nf);
+            v_lote_id      := COALESCE(NEW.separacao_lote_id, OLD.separacao_lote_id);
+            v_qtd_anterior := CASE WHEN TG_OP IN ('UPDATE','DELETE') THEN OLD.qtd_saldo ELSE NULL END;
+            v_qtd_nova     := CASE WHEN TG_OP IN ('INSERT','UPDATE') THEN NEW.qtd_saldo ELSE NULL END;
+
+        WHEN 'faturamento_produto' THEN
+            v_entidade     := 'faturamento';
+            v_num_pedido   := COALESCE(NEW.origem, OLD.origem);
+            v_cod_produto  := COALESCE(NEW.cod_produto, OLD.cod_produto);
+            v_numero_nf    := COALESCE(NEW.numero_nf, OLD.numero_nf);
+            v_lote_id      := NULL;
+            v_qtd_anterior := CASE WHEN TG_OP IN ('UPDATE','DELETE') THEN OLD.qtd_produto_faturado ELSE NULL END;
+            v_qtd_nova     := CASE WHEN TG_OP IN ('INSERT','UPDATE') THEN NEW.qtd_produto_faturado ELSE NULL END;
+
+        WHEN 'movimentacao_estoque' THEN
+            v_entidade     := 'movimentacao';
+            v_num_pedido   := COALESCE(NEW.num_pedido, OLD.num_pedido);
+            v_cod_produto  := COALESCE(NEW.cod_produto, OLD.cod_produto);
+            v_numero_nf    := COALESCE(NEW.numero_nf, OLD.numero_nf);
+            v_lote_id      := COALESCE(NEW.separacao_lote_id, OLD.separacao_lote_id);
+            v_qtd_anterior := CASE WHEN TG_OP IN ('UPDATE','DELETE') THEN OLD.qtd_movimentacao ELSE NULL END;
+            v_qtd_nova     := CASE WHEN TG_OP IN ('INSERT','UPDATE') THEN NEW.qtd_movimentacao ELSE NULL END;
+
+        WHEN 'programacao_producao' THEN
+            v_entidade     := 'producao';
+            v_num_pedido   := NULL;
+            v_cod_produto  := COALESCE(NEW.cod_produto, OLD.cod_produto);
+            v_numero_nf    := NULL;
+            v_lote_id      := NULL;
+            v_qtd_anterior := CASE WHEN TG_OP IN ('UPDATE','DELETE') THEN OLD.qtd_programada ELSE NULL END;
+            v_qtd_nova     := CASE WHEN TG_OP IN ('INSERT','UPDATE') THEN NEW.qtd_programada ELSE NULL END;
+
+        WHEN 'pedido_compras' THEN
+            v_entidade     := 'compra';
+            v_num_pedido   := COALESCE(NEW.num_pedido, OLD.num_pedido);
+            v_cod_produto  := COALESCE(NEW.cod_produto, OLD.cod_produto);
+            v_numero_nf    := COALESCE(NEW.nf_numero, OLD.nf_numero);
+            v_lote_id      := NULL;
+            v_qtd_anterior := CASE WHEN TG_OP IN ('UPDATE','DELETE') THEN OLD.qtd_produto_pedido ELSE NULL END;
+            v_qtd_nova     := CASE WHEN TG_OP IN ('INSERT','UPDATE') THEN NEW.qtd_produto_pedido ELSE NULL END;
+
+        ELSE
+            -- Tabela desconhecida — registrar sem campos especificos
+            v_entidade     := TG_TABLE_NAME;
+            v_num_pedido   := NULL;
+            v_cod_produto  := NULL;
+            v_numero_nf    := NULL;
+            v_lote_id      := NULL;
+            v_qtd_anterior := NULL;
+            v_qtd_nova     := NULL;
+    END CASE;
+
+    -- ========================================
+    -- 2. Capturar snapshots JSONB (ANTES do filtro de UPDATE)
+    -- ========================================
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        v_dados_antes := row_to_json(OLD)::JSONB;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        v_dados_depois := row_to_json(NEW)::JSONB;
+    END IF;
+
+    -- ========================================
+    -- 3. Para UPDATE: filtrar ruido
+    -- ========================================
+    IF TG_OP = 'UPDATE' AND TG_NARGS > 0 THEN
+        v_campos_alterados := ARRAY[]::TEXT[];
+
+        FOREACH v_campo IN ARRAY string_to_array(TG_ARGV[0], ',')
+        LOOP
+            v_old_val := v_dados_antes ->> v_campo;
+            v_new_val := v_dados_depois ->> v_campo;
+            IF v_old_val IS DISTINCT FROM v_new_val THEN
+                v_campos_alterados := array_append(v_campos_alterados, v_campo);
+            END IF;
+        END LOOP;
+
+        IF array_length(v_campos_alterados, 1) IS NULL THEN
+            RETURN NEW;
+        END IF;
+    END IF;
+
+    -- ========================================
+    -- 3b. UPDATE grava so as chaves que mudaram (diff)
+    --     INSERT/DELETE mantem o snapshot (base da cadeia / ultimo estado)
+    -- ========================================
+    IF TG_OP = 'UPDATE' THEN
+        v_diff_antes   := jsonb_diff_evento_sc(v_dados_depois, v_dados_antes);
+        v_diff_depois  := jsonb_diff_evento_sc(v_dados_antes, v_dados_depois);
+        v_dados_antes  := v_diff_antes;
+        v_dados_depois := v_diff_depois;
+    END IF;
+
+    -- ========================================
+    -- 4. Ler contexto Flask (session variables)
+    -- ========================================
+    v_usuario    := NULLIF(TRIM(COALESCE(current_setting('app.current_user', true), '')), '');
+    v_origem     := current_setting('app.origin', true);
+    v_session_id := NULLIF(current_setting('app.session_id', true), '');
+
+    -- Cast seguro de current_user_id: se valor invalido, mantem NULL sem quebrar
+    BEGIN
+        v_usuario_id := NULLIF(current_setting('app.current_user_id', true), '')::INTEGER;
+    EXCEPTION WHEN OTHERS THEN
+        v_usuario_id := NULL;
+    END;
+
+    -- ========================================
+    -- 5. Inserir evento (com LEFT para prevenir truncation)
+    -- ========================================
+    INSERT INTO evento_supply_chain (
+        tipo_evento, entidade, entidade_id,
+        num_pedido, cod_produto, numero_nf, separacao_lote_id,
+        quantidade_anterior, quantidade_nova,
+        dados_antes, dados_depois, campos_alterados,
+        origem, session_id, registrado_por, usuario_id
+    ) VALUES (
+        TG_OP,
+        v_entidade,
+        CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+        LEFT(v_num_pedido, 50), LEFT(v_cod_produto, 50),
+        LEFT(v_numero_nf, 20), LEFT(v_lote_id, 50),
+        v_qtd_anterior, v_qtd_nova,
+        v_dados_antes, v_dados_depois, v_campos_alterados,
+        LEFT(COALESCE(v_origem, 'SISTEMA'), 50),
+        LEFT(v_session_id, 100),
+        LEFT(COALESCE(v_usuario, 'SISTEMA'), 100),
+        v_usuario_id
+    );
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    ELSE
+        RETURN NEW;
+    END IF;
+
+EXCEPTION
+    WHEN undefined_table THEN
+        RAISE LOG '[AUDIT_SC] Tabela evento_supply_chain inexistente — migration pendente';
+        IF TG_OP = 'DELETE' THEN RETURN OLD; ELSE RETURN NEW; END IF;
+    WHEN OTHERS THEN
+        RAISE WARNING '[AUDIT_SC] Erro no trigger % (% on %): % (SQLSTATE: %)',
+            TG_NAME, TG_OP, TG_TABLE_NAME, SQLERRM, SQLSTATE;
+        IF TG_OP = 'DELETE' THEN RETURN OLD; ELSE RETURN NEW; END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- ============================================================================
+-- 6. MANIFESTO DE PARTICOES ARQUIVADAS
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS evento_supply_chain_arquivo (
+    id              SERIAL PRIMARY KEY,
+    particao        VARCHAR(63)   NOT NULL UNIQUE,
+    inicio          TIMESTAMP     NOT NULL,
+    fim             TIMESTAMP     NOT NULL,
+    caminho         VARCHAR(500)  NOT NULL,
+    formato         VARCHAR(20)   NOT NULL DEFAULT 'jsonl.gz',
+    total_eventos   INTEGER       NOT NULL,
+    tamanho_bytes   BIGINT,
+    sha256          VARCHAR(64),
+    id_min          BIGINT,
+    id_max          BIGINT,
+    arquivado_em    TIMESTAMP     NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_esc_arquivo_periodo
+    ON evento_supply_chain_arquivo (inicio, fim);
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Migracao: revisao do Knowledge Graph por usuario
+================================================
+
+1. Executa o .sql: agent_memory_graph_revisions, kg_incrementar_revisao() e
+   triggers em agent_memory_entities / entity_links / entity_relations.
+2. Semeia revision=1 para todo user_id que ja tem entidades (snapshots em
+   memoria de processos antigos ficam invalidos no primeiro acesso).
+
+Idempotente: rodar de novo recria funcoes/triggers e apenas incrementa as revisoes.
+
+Uso:
+    python scripts/migrations/2026-10-19_kg_graph_revisions.py
+Data: 2026-10-19
+"""
+
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+
+# sys.path.insert OBRIGATORIO antes de `from app import ...` (prod Render).
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app import create_app, db  # noqa: E402
+
+
+def executar_ddl():
+    sql_path = Path(__file__).with_suffix('.sql')
+    if not sql_path.exists():
+        raise FileNotFoundError(f'SQL nao encontrado: {sql_path}')
+    ddl = sql_path.read_text()
+    with db.engine.begin() as conn:
+        try:
+            conn.exec_driver_sql(ddl)
+        except Exception as e:
+            raise SystemExit(f'ERRO ao executar DDL: {e}') from e
+
+
+def executar_migracao():
+    app = create_app()
+    with app.app_context():
+        print('=' * 70)
+        print('MIGRACAO: revisao do Knowledge Graph por usuario')
+        print('=' * 70)
+
+        print('\n[1] DDL...')
+        executar_ddl()
+
+        print('\n[2] Semeando revisoes...')
+        usuarios = db.session.execute(text(
+            'SELECT COUNT(*) FROM (SELECT kg_incrementar_revisao(user_id) '
+            'FROM (SELECT DISTINCT user_id FROM agent_memory_entities) u) s'
+        )).scalar()
+        db.session.commit()
+        print(f'  Usuarios com grafo: {usuarios}')
+
+        triggers = db.session.execute(text(
+            "SELECT COUNT(*) FROM pg_trigger WHERE tgname LIKE 'trg_kg_revisao_%'"
+        )).scalar()
+        print(f'\n[AFTER] triggers de revisao: {triggers}')
+        print('\nMigracao concluida com sucesso.')
+
+
+if __name__ == '__main__':
+    executar_migracao()
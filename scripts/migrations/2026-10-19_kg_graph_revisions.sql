@@ -0,0 +1,79 @@
+-- Migration: revisão do Knowledge Graph por usuário (snapshot em memória do READ PATH)
+-- Tabelas: agent_memory_graph_revisions (nova) + triggers em
+--          agent_memory_entities, agent_memory_entity_links, agent_memory_entity_relations
+--
+-- Idempotente (IF NOT EXISTS / CREATE OR REPLACE / DROP TRIGGER IF EXISTS).
+-- Aplicar em Render Shell:
+--   psql $DATABASE_URL -f scripts/migrations/2026-10-19_kg_graph_revisions.sql
+--
+-- knowledge_graph_snapshot.py guarda o grafo de cada usuário em memória e só
+-- recarrega quando (revisão do usuário, revisão da empresa user_id=0) muda.
+-- Os triggers cobrem qualquer escritor (service, consolidator, scripts) e os
+-- DELETE em CASCADE vindos de agent_memories.
+
+CREATE TABLE IF NOT EXISTS agent_memory_graph_revisions (
+    user_id    INTEGER PRIMARY KEY,
+    revision   BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC')
+);
+
+CREATE OR REPLACE FUNCTION kg_incrementar_revisao(p_user_id INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_user_id IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO agent_memory_graph_revisions (user_id, revision, updated_at)
+    VALUES (p_user_id, 1, NOW() AT TIME ZONE 'UTC')
+    ON CONFLICT (user_id) DO UPDATE
+       SET revision = agent_memory_graph_revisions.revision + 1,
+           updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Por linha: o volume de escrita do KG é baixo (dezenas de linhas por memória)
+-- e links/relações precisam resolver o user_id pela entidade.
+CREATE OR REPLACE FUNCTION kg_revisao_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_linha RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        v_linha := OLD;
+    ELSE
+        v_linha := NEW;
+    END IF;
+
+    IF TG_TABLE_NAME = 'agent_memory_entities' THEN
+        PERFORM kg_incrementar_revisao(v_linha.user_id);
+        IF TG_OP = 'UPDATE' AND OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+            PERFORM kg_incrementar_revisao(OLD.user_id);
+        END IF;
+    ELSIF TG_TABLE_NAME = 'agent_memory_entity_links' THEN
+        -- Entidade já removida (CASCADE): o trigger da própria entidade já incrementou
+        PERFORM kg_incrementar_revisao(e.user_id)
+           FROM agent_memory_entities e WHERE e.id = v_linha.entity_id;
+    ELSE
+        PERFORM kg_incrementar_revisao(e.user_id)
+           FROM agent_memory_entities e
+          WHERE e.id IN (v_linha.source_entity_id, v_linha.target_entity_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_kg_revisao_entities ON agent_memory_entities;
+CREATE TRIGGER trg_kg_revisao_entities
+    AFTER INSERT OR UPDATE OF user_id, entity_name OR DELETE ON agent_memory_entities
+    FOR EACH ROW EXECUTE FUNCTION kg_revisao_trigger();
+
+DROP TRIGGER IF EXISTS trg_kg_revisao_links ON agent_memory_entity_links;
+CREATE TRIGGER trg_kg_revisao_links
+    AFTER INSERT OR UPDATE OF entity_id, memory_id OR DELETE ON agent_memory_entity_links
+    FOR EACH ROW EXECUTE FUNCTION kg_revisao_trigger();
+
+DROP TRIGGER IF EXISTS trg_kg_revisao_relations ON agent_memory_entity_relations;
+CREATE TRIGGER trg_kg_revisao_relations
+    AFTER INSERT OR UPDATE OF source_entity_id, target_entity_id, weight OR DELETE
+    ON agent_memory_entity_relations
+    FOR EACH ROW EXECUTE FUNCTION kg_revisao_trigger();
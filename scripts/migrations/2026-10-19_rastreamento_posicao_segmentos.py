@@ -0,0 +1,80 @@
+"""
+Migration: posicao atual por rastreamento + segmentos de trajetoria.
+
+Data: 2026-10-19
+Fonte de verdade: app/rastreamento/models.py
+
+Tabelas criadas:
+    posicoes_atuais_rastreamento  (1 linha por rastreamento, upsert a cada ping)
+    segmentos_trajetoria          (trajetoria compactada de rastreamentos finalizados)
+
+Backfill: posicoes_atuais_rastreamento recebe o ultimo ping de cada
+rastreamento existente (ON CONFLICT DO NOTHING, pode rodar de novo).
+"""
+
+import sys
+from pathlib import Path
+from sqlalchemy import text
+
+# sys.path.insert OBRIGATORIO antes de `from app import ...` (prod Render).
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app import create_app, db  # noqa: E402
+
+TABLES = [
+    'posicoes_atuais_rastreamento',
+    'segmentos_trajetoria',
+]
+
+
+def table_exists(conn, name: str) -> bool:
+    result = conn.execute(
+        text("SELECT 1 FROM information_schema.tables WHERE table_name = :name AND table_schema = 'public'"),
+        {'name': name},
+    ).fetchone()
+    return result is not None
+
+
+def check_tables(conn, label: str) -> list[str]:
+    print(f'=== {label} ===')
+    missing = []
+    for t in TABLES:
+        exists = table_exists(conn, t)
+        print(f'  {t}: {"YES" if exists else "NO"}')
+        if not exists:
+            missing.append(t)
+    return missing
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        sql_path = Path(__file__).with_suffix('.sql')
+        if not sql_path.exists():
+            raise FileNotFoundError(f'SQL nao encontrado: {sql_path}')
+
+        with sql_path.open() as f:
+            ddl = f.read()
+
+        with db.engine.begin() as conn:
+            check_tables(conn, 'BEFORE')
+
+            print('\nExecutando DDL + backfill...')
+            try:
+                conn.exec_driver_sql(ddl)
+            except Exception as e:
+                raise SystemExit(f'ERRO ao executar DDL: {e}') from e
+
+            print()
+            missing_after = check_tables(conn, 'AFTER')
+            if missing_after:
+                raise SystemExit(f'ERRO: Tabelas nao criadas: {missing_after}')
+
+            total = conn.execute(text('SELECT COUNT(*) FROM posicoes_atuais_rastreamento')).scalar()
+            print(f'\nposicoes_atuais_rastreamento: {total} linhas')
+
+        print('\nMigration concluida com sucesso.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+-- Migration: posicao atual por rastreamento + segmentos de trajetoria compactados
+-- Data: 2026-10-19
+-- Fonte de verdade: app/rastreamento/models.py (PosicaoAtualRastreamento, SegmentoTrajetoria)
+-- Idempotente: pode rodar mais de uma vez.
+
+CREATE TABLE IF NOT EXISTS posicoes_atuais_rastreamento (
+    rastreamento_id INTEGER PRIMARY KEY
+        REFERENCES rastreamento_embarques(id) ON DELETE CASCADE,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    precisao DOUBLE PRECISION,
+    velocidade DOUBLE PRECISION,
+    direcao DOUBLE PRECISION,
+    distancia_destino DOUBLE PRECISION,
+    bateria_nivel INTEGER,
+    bateria_carregando BOOLEAN DEFAULT FALSE,
+    registrado_em TIMESTAMP NOT NULL,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT NOW(),
+    total_pings INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS ix_posicoes_atuais_rastreamento_atualizado_em
+    ON posicoes_atuais_rastreamento (atualizado_em);
+
+CREATE TABLE IF NOT EXISTS segmentos_trajetoria (
+    id SERIAL PRIMARY KEY,
+    rastreamento_id INTEGER NOT NULL
+        REFERENCES rastreamento_embarques(id) ON DELETE CASCADE,
+    inicio_em TIMESTAMP NOT NULL,
+    fim_em TIMESTAMP NOT NULL,
+    pontos JSON NOT NULL,
+    pontos_originais INTEGER NOT NULL,
+    tolerancia_metros DOUBLE PRECISION NOT NULL,
+    criado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_segmentos_trajetoria_rastreamento_id
+    ON segmentos_trajetoria (rastreamento_id);
+
+-- Backfill: ultimo ping de cada rastreamento vira a posicao atual
+INSERT INTO posicoes_atuais_rastreamento (
+    rastreamento_id, latitude, longitude, precisao, velocidade, direcao,
+    distancia_destino, bateria_nivel, bateria_carregando,
+    registrado_em, atualizado_em, total_pings
+)
+SELECT ult.rastreamento_id, ult.latitude, ult.longitude, ult.precisao, ult.velocidade,
+       ult.direcao, ult.distancia_destino, ult.bateria_nivel,
+       COALESCE(ult.bateria_carregando, FALSE), ult.criado_em, NOW(), cnt.total
+FROM (
+    SELECT DISTINCT ON (rastreamento_id) *
+    FROM pings_gps
+    ORDER BY rastreamento_id, criado_em DESC, id DESC
+) ult
+JOIN (
+    SELECT rastreamento_id, COUNT(*) AS total
+    FROM pings_gps
+    GROUP BY rastreamento_id
+) cnt ON cnt.rastreamento_id = ult.rastreamento_id
+ON CONFLICT (rastreamento_id) DO NOTHING;
@@ -0,0 +1,10 @@
+-- 2026-10-19: posse de execucao do lote de baixas (lock de lote + heartbeat)
+-- Idempotente (IF NOT EXISTS) — seguro para Render Shell / DATABASE_URL_PROD.
+--
+-- execucao_id: dono da execucao corrente (job_id do RQ ou uuid). Reivindicado
+--   por UPDATE condicional — so 1 execucao por lote.
+-- heartbeat_em: renovado pela execucao viva a cada ~30s. Retomada de lote
+--   PROCESSANDO so e' aceita com heartbeat vencido (execucao anterior morta).
+
+ALTER TABLE baixa_titulo_lote ADD COLUMN IF NOT EXISTS execucao_id VARCHAR(64);
+ALTER TABLE baixa_titulo_lote ADD COLUMN IF NOT EXISTS heartbeat_em TIMESTAMP;
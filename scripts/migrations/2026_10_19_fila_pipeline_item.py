@@ -0,0 +1,34 @@
+"""Migration: fila paralela do pipeline de inventario (Skill 8).
+
+Cria a tabela fila_pipeline_item (estado duravel por item da fila das
+ETAPAS A/E). Idempotente (CREATE TABLE/INDEX IF NOT EXISTS).
+
+Usar:
+  python scripts/migrations/2026_10_19_fila_pipeline_item.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app, db  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+SQL_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '2026_10_19_fila_pipeline_item.sql',
+)
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        with open(SQL_PATH, 'r', encoding='utf-8') as f:
+            db.session.execute(text(f.read()))
+        db.session.commit()
+        total = db.session.execute(text("SELECT COUNT(*) FROM fila_pipeline_item")).scalar()
+        print(f"OK: fila_pipeline_item criada/verificada ({total} itens).")
+
+
+if __name__ == '__main__':
+    main()
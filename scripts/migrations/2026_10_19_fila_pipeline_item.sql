@@ -0,0 +1,33 @@
+-- Migration 2026-10-19 — Fila paralela do pipeline de inventario (Skill 8)
+--
+-- Estado duravel por item da fila (1 linha por ciclo + etapa + chave).
+-- A fila grava EM_EXECUCAO antes da chamada ao Odoo e OK/FALHA depois;
+-- onda interrompida retoma pulando os OK.
+--
+-- Idempotente: CREATE TABLE/INDEX IF NOT EXISTS.
+
+CREATE TABLE IF NOT EXISTS fila_pipeline_item (
+    id              SERIAL PRIMARY KEY,
+    ciclo           VARCHAR(40) NOT NULL,
+    etapa           VARCHAR(1)  NOT NULL,
+    chave           VARCHAR(60) NOT NULL,
+    company_id      INTEGER     NOT NULL,
+    particao        VARCHAR(60) NOT NULL,
+    status          VARCHAR(20) NOT NULL DEFAULT 'PENDENTE',
+    tentativas      INTEGER     NOT NULL DEFAULT 0,
+    worker          VARCHAR(40),
+    resultado_json  JSON,
+    erro_msg        TEXT,
+    tempo_ms        INTEGER,
+    iniciado_em     TIMESTAMP,
+    concluido_em    TIMESTAMP,
+    criado_em       TIMESTAMP   NOT NULL DEFAULT NOW(),
+    criado_por      VARCHAR(80) NOT NULL,
+    CONSTRAINT uq_fila_pipeline_item_chave UNIQUE (ciclo, etapa, chave)
+);
+
+CREATE INDEX IF NOT EXISTS ix_fila_pipeline_item_etapa_status
+  ON fila_pipeline_item(ciclo, etapa, status);
+
+COMMENT ON COLUMN fila_pipeline_item.status IS
+  'PENDENTE | EM_EXECUCAO | OK | FALHA | INTERROMPIDO (EM_EXECUCAO orfao em etapa nao idempotente — conferir no Odoo e voltar para PENDENTE)';
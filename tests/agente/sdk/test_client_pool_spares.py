@@ -0,0 +1,164 @@
+"""Spares pre-aquecidos do client_pool (sessao nova sem esperar spawn do CLI).
+
+Deterministico, sem API: ClaudeSDKClient fake; a reposicao roda chamando
+_replenish_spares() direto (o agendamento em background e desligado).
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import pytest
+
+from app.agente.sdk import client_pool as cp
+
+pytestmark = [pytest.mark.unit, pytest.mark.sdk_client]
+
+
+class _FakeClient:
+    connects = 0
+    disconnects = 0
+
+    def __init__(self, options):
+        self.options = options
+
+    async def connect(self):
+        type(self).connects += 1
+
+    async def get_mcp_status(self):
+        return {'mcpServers': []}
+
+    async def disconnect(self):
+        type(self).disconnects += 1
+
+
+def _limpar():
+    cp._registry.clear()
+    cp._creation_locks.clear()
+    cp._spares.clear()
+    cp._spare_templates.clear()
+    cp._spares_spawning.clear()
+    for k in cp._spare_stats:
+        cp._spare_stats[k] = 0
+
+
+@pytest.fixture(autouse=True)
+def _isolar_pool(monkeypatch):
+    import claude_agent_sdk
+    monkeypatch.setattr(claude_agent_sdk, "ClaudeSDKClient", _FakeClient)
+    monkeypatch.setattr(cp, "_schedule_spare_replenish", lambda: None)
+    monkeypatch.setattr('app.agente.config.feature_flags.AGENT_SPARE_CLIENTS_PER_KEY', 1)
+    monkeypatch.setattr('app.agente.config.feature_flags.AGENT_SPARE_CLIENTS_MAX', 4)
+    _FakeClient.connects = 0
+    _FakeClient.disconnects = 0
+    _limpar()
+    yield
+    _limpar()
+
+
+def _run(coro):
+    # Loop proprio: asyncio.run() zera o loop da MainThread usado por outros testes
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+KEY = cp.spare_key_for(user_id=7, role='principal', model='m1', effort='high')
+
+
+def test_miss_repoe_e_proxima_sessao_nova_consome_spare():
+    cp.register_spare_template(KEY, options=object(), user_id=7)
+
+    async def run():
+        a = await cp.get_or_create_client('sess-a', options=object(), user_id=7, spare_key=KEY)
+        await cp._replenish_spares()
+        conexoes_apos_reposicao = _FakeClient.connects
+        b = await cp.get_or_create_client('sess-b', options=object(), user_id=7, spare_key=KEY)
+        return a, b, conexoes_apos_reposicao
+
+    a, b, conexoes = _run(run())
+
+    assert conexoes == 2                 # sess-a + 1 spare
+    assert _FakeClient.connects == 2     # sess-b nao spawnou: usou o spare
+    assert b.session_id == 'sess-b' and b.user_id == 7
+    assert cp.get_pooled_client('sess-b') is b
+    assert cp._spares == {}
+    status = cp.get_spare_status()
+    assert (status['hits'], status['misses'], status['spawned']) == (1, 1, 1)
+    assert status['hit_rate'] == 0.5
+
+
+def test_sem_spare_key_nao_consome_spare():
+    cp.register_spare_template(KEY, options=object(), user_id=7)
+    _run(cp._replenish_spares())
+
+    _run(cp.get_or_create_client('sess-resume', options=object(), user_id=7))
+
+    assert len(cp._spares[KEY]) == 1
+    assert cp.get_spare_status()['hits'] == 0
+
+
+def test_teto_global_prioriza_demanda_recente(monkeypatch):
+    monkeypatch.setattr('app.agente.config.feature_flags.AGENT_SPARE_CLIENTS_MAX', 2)
+    agora = time.time()
+    for i, idade in enumerate((300, 10, 60)):
+        cp.register_spare_template(f'k{i}', options=object())
+        cp._spare_templates[f'k{i}'].last_demand = agora - idade
+
+    _run(cp._replenish_spares())
+
+    assert sorted(cp._spares) == ['k1', 'k2']
+    assert cp.get_spare_status()['available'] == 2
+
+
+def test_aposenta_spare_velho_e_chave_sem_demanda(monkeypatch):
+    monkeypatch.setattr('app.agente.config.feature_flags.AGENT_SPARE_DEMAND_TTL', 100)
+    cp.register_spare_template('viva', options=object())
+    cp.register_spare_template('fria', options=object())
+    _run(cp._replenish_spares())
+    cp._spare_templates['fria'].last_demand = time.time() - 500
+    cp._spares['viva'][0].created_at = time.time() - 50
+
+    _run(cp._retire_spares(max_age=1000))
+    assert list(cp._spares) == ['viva'] and 'fria' not in cp._spare_templates
+
+    _run(cp._retire_spares(max_age=10))
+    assert cp._spares == {}
+    assert _FakeClient.disconnects == 2
+    assert cp.get_spare_status()['retired'] == 2
+
+
+def test_desligado_com_per_key_zero(monkeypatch):
+    monkeypatch.setattr('app.agente.config.feature_flags.AGENT_SPARE_CLIENTS_PER_KEY', 0)
+    cp.register_spare_template(KEY, options=object())
+
+    assert cp._spare_templates == {}
+    assert cp.spare_template_needed(KEY) is False
+
+
+@dataclass
+class _Options:
+    hooks: Any = None
+    model: Optional[str] = None
+
+
+def test_cada_spare_tem_holder_proprio_preenchido_no_consumo(monkeypatch):
+    monkeypatch.setattr('app.agente.config.feature_flags.AGENT_SPARE_CLIENTS_PER_KEY', 2)
+    cp.register_spare_template(
+        KEY, options=_Options(model='m1'), user_id=7,
+        hooks_factory=lambda session_holder: {'holder': session_holder},
+    )
+    _run(cp._replenish_spares())
+    a, b = cp._spares[KEY]
+
+    assert a.session_holder is not b.session_holder
+    assert a.client.options.hooks['holder'] is a.session_holder
+    assert a.client.options.model == 'm1'
+
+    pooled = _run(cp.get_or_create_client('sess-nossa', options=object(), user_id=7, spare_key=KEY))
+
+    assert pooled is a
+    assert a.session_holder == {'our_session_id': 'sess-nossa'}
+    assert b.session_holder == {}
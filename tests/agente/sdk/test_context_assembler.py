@@ -0,0 +1,106 @@
+"""
+Testes do montador concorrente de contexto (app/agente/sdk/context_assembler.py).
+
+Sem banco/Flask: produtores sinteticos com sleep para medir concorrencia,
+prazo por bloco (degradacao) e histograma de latencia.
+"""
+import contextvars
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.agente.sdk import context_assembler
+from app.agente.sdk.context_assembler import (
+    ContextBlock,
+    assemble_context_blocks,
+    get_context_latency_snapshot,
+)
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def _histograma_limpo():
+    context_assembler.reset_context_latency_histogram()
+    yield
+    context_assembler.reset_context_latency_histogram()
+
+
+def _lento(valor, segundos):
+    def _producer():
+        time.sleep(segundos)
+        return valor
+    return _producer
+
+
+def test_blocos_rodam_em_paralelo():
+    blocks = [ContextBlock(f'b{i}', _lento(i, 0.2), deadline_s=2) for i in range(4)]
+
+    t0 = time.monotonic()
+    results, degraded = assemble_context_blocks(blocks)
+
+    assert time.monotonic() - t0 < 0.6  # serial seria 0.8s
+    assert results == {'b0': 0, 'b1': 1, 'b2': 2, 'b3': 3}
+    assert degraded == []
+
+
+def test_bloco_atrasado_degrada_para_default():
+    blocks = [
+        ContextBlock('rapido', _lento('ok', 0), deadline_s=1),
+        ContextBlock('lento', _lento('tarde', 0.5), deadline_s=0.05, default=(None, None)),
+    ]
+
+    results, degraded = assemble_context_blocks(blocks)
+
+    assert results['rapido'] == 'ok'
+    assert results['lento'] == (None, None)
+    assert degraded == ['lento']
+    assert get_context_latency_snapshot()['lento']['late'] == 1
+
+
+def test_erro_no_produtor_nao_propaga():
+    def _quebra():
+        raise RuntimeError('db fora')
+
+    results, degraded = assemble_context_blocks([
+        ContextBlock('quebrado', _quebra, deadline_s=1, default=[]),
+        ContextBlock('bom', lambda: 'x', deadline_s=1),
+    ])
+
+    assert results == {'quebrado': [], 'bom': 'x'}
+    assert degraded == ['quebrado']
+    assert get_context_latency_snapshot()['quebrado']['error'] == 1
+
+
+def test_contextvars_do_chamador_chegam_no_produtor():
+    sessao = contextvars.ContextVar('sessao_teste', default=None)
+    sessao.set('sess-123')
+
+    results, _ = assemble_context_blocks([ContextBlock('sid', sessao.get, deadline_s=1)])
+
+    assert results['sid'] == 'sess-123'
+
+
+def test_histograma_por_bloco():
+    for _ in range(3):
+        assemble_context_blocks([ContextBlock('routing', lambda: None, deadline_s=1)])
+
+    stats = get_context_latency_snapshot()['routing']
+    assert stats['count'] == 3
+    assert stats['ok'] == 3
+    assert sum(stats['buckets'].values()) == 3
+    assert stats['buckets']['<=25ms'] == 3
+
+
+def test_flag_off_executa_serial():
+    ordem = []
+    blocks = [
+        ContextBlock(n, lambda n=n: ordem.append(n) or n, deadline_s=1) for n in ('a', 'b', 'c')
+    ]
+    with patch('app.agente.config.feature_flags.AGENT_CONCURRENT_CONTEXT_ASSEMBLY', False):
+        results, degraded = assemble_context_blocks(blocks)
+
+    assert ordem == ['a', 'b', 'c']
+    assert results == {'a': 'a', 'b': 'b', 'c': 'c'}
+    assert degraded == []
@@ -0,0 +1,59 @@
+"""Hooks de spare do client_pool publicam no canal da NOSSA sessao.
+
+O spare e spawnado sem session_id: o hook_input traz o UUID gerado pelo CLI,
+mas o SSE (routes/chat.py) assina agent_sse:<nosso session_id>. O pool grava
+o nosso id no session_holder ao consumir o spare.
+"""
+import asyncio
+from unittest.mock import MagicMock, patch
+
+
+def _find_handler(hooks, nome):
+    for ev_key, matchers in hooks.items():
+        ev_name = ev_key if isinstance(ev_key, str) else getattr(ev_key, 'name', str(ev_key))
+        if ev_name == nome:
+            return matchers[0].hooks[0]
+    return None
+
+
+def _make_hooks(session_holder=None):
+    from app.agente.sdk.hooks import build_hooks
+    return build_hooks(
+        user_id=1,
+        user_name='test',
+        tool_failure_counts={},
+        get_last_thinking=lambda: None,
+        get_model_name=lambda: 'claude-opus-4-8',
+        set_injected_ids=lambda x: None,
+        resume_state={},
+        session_holder=session_holder,
+    )
+
+
+def _canais_publicados(session_holder):
+    redis_fake = MagicMock()
+    handler = _find_handler(_make_hooks(session_holder), 'SubagentStart')
+    assert handler is not None
+    with patch('redis.from_url', return_value=redis_fake):
+        asyncio.run(handler({
+            'agent_id': 'aid-spare-1',
+            'agent_type': 'analista-carteira',
+            'session_id': 'uuid-do-cli',
+        }, None, MagicMock()))
+    return [c.args[0] for c in redis_fake.publish.call_args_list]
+
+
+def test_subagent_start_de_spare_publica_no_canal_da_nossa_sessao():
+    holder = {}
+    hooks = _make_hooks(holder)
+    handler = _find_handler(hooks, 'SubagentStart')
+    holder['our_session_id'] = 'nossa-sessao'
+
+    assert _canais_publicados(holder) == ['agent_sse:nossa-sessao']
+    assert handler is not None
+
+
+def test_subagent_start_sem_holder_mantem_sessao_do_cli():
+    assert _canais_publicados(None) == ['agent_sse:uuid-do-cli']
+    # Spare ainda nao consumido: holder vazio cai no UUID do CLI
+    assert _canais_publicados({}) == ['agent_sse:uuid-do-cli']
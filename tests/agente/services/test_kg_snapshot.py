@@ -0,0 +1,193 @@
+"""
+Snapshot em memória do Knowledge Graph (knowledge_graph_snapshot).
+
+Testa:
+ T1. Hop 1 + hop 2 no snapshot: ordem, pesos (MAX por par), cap de similaridade.
+ T2. Janela do hop 1 (limit*2) também exclui do hop 2, como no SQL.
+ T3. PPR: memória ligada direto às sementes lidera; exclude respeitado.
+ T4. Cache por usuário: rebuild só quando a revisão muda.
+ T5. Falha no snapshot => None (caller cai no SQL).
+ T6. Paridade com _query_graph_memories_sql em grafo aleatório (banco real).
+ T7. Triggers incrementam a revisão do usuário em escrita de entidade/link/relação.
+
+T6/T7 usam banco local real (mesmo pattern de test_kg_bitemporal.py, rollback no teardown).
+"""
+
+import random
+import uuid
+from pathlib import Path
+
+import pytest
+
+from app.agente.services import knowledge_graph_snapshot as kgs
+from app.agente.services.knowledge_graph_snapshot import GraphSnapshot
+
+_MIGRATION_SQL = (
+    Path(__file__).resolve().parents[3] / 'scripts' / 'migrations' / '2026-10-19_kg_graph_revisions.sql'
+)
+
+
+def _snapshot_exemplo(versao=(1, 1)):
+    entidades = [(1, 'RODONAVES'), (2, 'AM'), (3, 'SP'), (4, 'MANAUS')]
+    relacoes = [(1, 2, 0.5), (2, 1, 1.2), (3, 1, 0.8), (4, 2, 2.0)]
+    links = [(1, 100), (1, 101), (2, 102), (3, 103), (4, 104), (2, 101), (1, 101)]
+    return GraphSnapshot.construir(versao, entidades, relacoes, links)
+
+
+# ---------------------------------------------------------------------------
+# Puros
+# ---------------------------------------------------------------------------
+
+def test_hops_ordem_e_pesos():
+    snap = _snapshot_exemplo()
+    resultado = snap.consultar_hops(['RODONAVES'], set(), 10)
+    assert [(r['memory_id'], r['similarity']) for r in resultado] == [
+        (101, 0.5), (100, 0.5),   # hop 1 (memory_id desc)
+        (103, 0.4), (102, 0.6),   # hop 2: SP 0.8*0.5, AM max(0.5, 1.2)*0.5
+    ]
+    assert all(r['source'] == 'graph' for r in resultado)
+
+
+def test_hop1_janela_limit_dobro_exclui_do_hop2():
+    snap = _snapshot_exemplo()
+    resultado = snap.consultar_hops(['RODONAVES'], set(), 1)
+    assert [r['memory_id'] for r in resultado] == [101, 103, 102]
+
+
+def test_hops_exclude_e_nome_desconhecido():
+    snap = _snapshot_exemplo()
+    resultado = snap.consultar_hops(['RODONAVES'], {101, 103}, 10)
+    assert [r['memory_id'] for r in resultado] == [100, 102]
+    assert snap.consultar_hops(['INEXISTENTE'], set(), 10) == []
+
+
+def test_similaridade_hop2_limitada_pelo_cap():
+    snap = GraphSnapshot.construir((0, 0), [(1, 'A'), (2, 'B')], [(1, 2, 9.0)], [(2, 50)])
+    assert snap.consultar_hops(['A'], set(), 10) == [{'memory_id': 50, 'similarity': 0.7, 'source': 'graph'}]
+
+
+def test_ppr_prioriza_memoria_ligada_as_sementes():
+    snap = _snapshot_exemplo()
+    resultado = snap.consultar_ppr(['RODONAVES'], set(), 10)
+    ids = [r['memory_id'] for r in resultado]
+
+    assert ids[0] == 101  # ligada à semente e à vizinha mais forte
+    assert resultado[0]['similarity'] == 0.5
+    assert ids.index(100) < ids.index(104)
+    assert 101 not in [r['memory_id'] for r in snap.consultar_ppr(['RODONAVES'], {101}, 10)]
+
+
+def test_cache_reconstroi_so_quando_revisao_muda(monkeypatch):
+    revisao = {'valor': (3, 7)}
+    cargas = []
+
+    def _carregar(conn, user_id, versao):
+        cargas.append(versao)
+        return _snapshot_exemplo(versao)
+
+    monkeypatch.setattr(kgs, 'ler_revisoes', lambda conn, user_ids: revisao['valor'])
+    monkeypatch.setattr(kgs, 'carregar_snapshot', _carregar)
+    kgs.invalidar()
+
+    primeiro = kgs.obter_snapshot(None, 42)
+    assert kgs.obter_snapshot(None, 42) is primeiro
+
+    revisao['valor'] = (4, 7)
+    assert kgs.obter_snapshot(None, 42) is not primeiro
+    assert cargas == [(3, 7), (4, 7)]
+    kgs.invalidar()
+
+
+def test_falha_no_snapshot_retorna_none(monkeypatch):
+    def _quebra(conn, user_id):
+        raise RuntimeError('relation "agent_memory_graph_revisions" does not exist')
+
+    monkeypatch.setattr(kgs, 'obter_snapshot', _quebra)
+    assert kgs.consultar_snapshot(1, ['AM'], set(), 10) is None
+
+
+# ---------------------------------------------------------------------------
+# Banco real
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def db_conn():
+    """Conexão raw com a migration aplicada dentro de um savepoint (rollback no fim)."""
+    from app import create_app, db as _db
+    from sqlalchemy import text
+
+    app = create_app()
+    with app.app_context():
+        if _db.engine.dialect.name != 'postgresql':
+            pytest.skip('migration do grafo usa plpgsql do PostgreSQL')
+        with _db.engine.begin() as conn:
+            sp = conn.begin_nested()
+            conn.exec_driver_sql(_MIGRATION_SQL.read_text())
+            yield conn, text
+            sp.rollback()
+
+
+def _grafo_aleatorio(conn, text, rng, n_entidades=40, n_memorias=60):
+    from app.utils.timezone import agora_utc_naive
+
+    now = agora_utc_naive()
+    sufixo = uuid.uuid4().hex[:8].upper()
+    nomes = [f'KGSNAP_{sufixo}_{i}' for i in range(n_entidades)]
+    entidades = [
+        conn.execute(text("""
+            INSERT INTO agent_memory_entities (user_id, entity_type, entity_name, first_seen_at, last_seen_at)
+            VALUES (:uid, 'conceito', :nome, :now, :now) RETURNING id
+        """), {"uid": 0 if i % 5 == 0 else 1, "nome": nome, "now": now}).scalar()
+        for i, nome in enumerate(nomes)
+    ]
+    memorias = [
+        conn.execute(text("""
+            INSERT INTO agent_memories (user_id, path, content, created_at, updated_at)
+            VALUES (1, :path, 'kg snapshot', :now, :now) RETURNING id
+        """), {"path": f'/memories/kgsnap_{sufixo}_{m}', "now": now}).scalar()
+        for m in range(n_memorias)
+    ]
+    for eid in entidades:
+        for mid in rng.sample(memorias, rng.randint(0, 4)):
+            conn.execute(text("""
+                INSERT INTO agent_memory_entity_links (entity_id, memory_id, relation_type, created_at)
+                VALUES (:e, :m, 'mentions', :now) ON CONFLICT DO NOTHING
+            """), {"e": eid, "m": mid, "now": now})
+    pares = set()
+    while len(pares) < n_entidades * 3:
+        a, b = rng.sample(entidades, 2)
+        pares.add((a, b))
+    for a, b in pares:
+        # Pesos distintos: no SQL a ordem entre empatados no hop 2 é indefinida
+        conn.execute(text("""
+            INSERT INTO agent_memory_entity_relations (source_entity_id, target_entity_id, relation_type,
+                                                       weight, created_at)
+            VALUES (:a, :b, 'co_occurs', :w, :now)
+        """), {"a": a, "b": b, "w": round(rng.uniform(0.1, 3.0), 6), "now": now})
+    return nomes, memorias
+
+
+def test_paridade_com_caminho_sql(db_conn):
+    from app.agente.services.knowledge_graph_service import _query_graph_memories_sql
+
+    conn, text = db_conn
+    rng = random.Random(47)
+    nomes, memorias = _grafo_aleatorio(conn, text, rng)
+    snap = kgs.carregar_snapshot(conn, 1, (0, 0))
+
+    for _ in range(25):
+        consulta = rng.sample(nomes, rng.randint(1, 3))
+        exclude = set(rng.sample(memorias, rng.randint(0, 5)))
+        limit = rng.choice([1, 3, 10])
+        esperado = _query_graph_memories_sql(conn, [1, 0], consulta, exclude, limit)
+        assert snap.consultar_hops(consulta, exclude, limit) == esperado, consulta
+
+
+def test_trigger_incrementa_revisao(db_conn):
+    conn, text = db_conn
+    antes = kgs.ler_revisoes(conn, [1, 0])
+    _grafo_aleatorio(conn, text, random.Random(1), n_entidades=3, n_memorias=2)
+    depois = kgs.ler_revisoes(conn, [1, 0])
+
+    assert depois[0] > antes[0]
+    assert depois[1] > antes[1]
@@ -0,0 +1,220 @@
+"""Cache de plano e de resultado do consultar_sql (sql_result_cache).
+
+Pipeline e watermarks stubados: nenhum LLM nem banco. Cobre o pulo do
+Generator em pergunta repetida, o descarte do resultado quando uma tabela
+referenciada recebe escrita e o isolamento por escopo de permissao.
+"""
+import pytest
+
+from app.agente.tools import sql_result_cache as cache
+
+SQL_TOP = "SELECT raz_social_red, SUM(valor) FROM carteira_principal GROUP BY 1 ORDER BY 2 DESC LIMIT 10"
+
+
+class PipelineFake:
+    """Imita TextToSQLPipeline.run: gera SQL (LLM) so quando nao vem sql_literal."""
+
+    def __init__(self, sql=SQL_TOP, tabelas=("carteira_principal",)):
+        self.sql = sql
+        self.tabelas = list(tabelas)
+        self.geracoes = 0
+        self.execucoes = 0
+
+    def run(self, pergunta, sql_literal=None):
+        if sql_literal is None:
+            self.geracoes += 1
+        self.execucoes += 1
+        return {
+            "sucesso": True,
+            "sql": sql_literal or self.sql,
+            "dados": [{"raz_social_red": "LOJA", "sum": self.execucoes}],
+            "colunas": ["raz_social_red", "sum"],
+            "total_linhas": 1,
+            "tempo_total_ms": 900,
+            "tabelas_usadas": self.tabelas,
+        }
+
+
+@pytest.fixture
+def escritas(monkeypatch):
+    """Watermarks de pg_stat_user_tables simulados (tabela -> escritas)."""
+    contadores = {"carteira_principal": 10, "separacao": 3}
+    monkeypatch.setattr(cache, "_ler_watermarks", lambda tabelas: {t: contadores.get(t, 0) for t in tabelas})
+    monkeypatch.setenv("TEXT_TO_SQL_CACHE", "true")
+    cache.limpar()
+    yield contadores
+    cache.limpar()
+
+
+ESCOPO = cache.escopo_usuario(False, {"pessoal_contas"})
+
+
+def _consultar(pipeline, pergunta, sql_literal=None, escopo=ESCOPO):
+    return cache.executar_com_cache(
+        pergunta, sql_literal, escopo, lambda sql: pipeline.run(pergunta, sql_literal=sql),
+    )
+
+
+def test_pergunta_repetida_nao_gera_sql_nem_executa(escritas):
+    pipeline = PipelineFake()
+    primeiro = _consultar(pipeline, "Top 10 clientes da carteira?")
+    segundo = _consultar(pipeline, "  top 10 CLIENTES da carteira ")
+
+    assert pipeline.geracoes == 1
+    assert pipeline.execucoes == 1
+    assert segundo["cache"] == "resultado"
+    assert segundo["dados"] == primeiro["dados"]
+    assert cache.estatisticas()["resultado_hit"] == 1
+
+
+def test_escrita_na_tabela_referenciada_invalida_resultado(escritas):
+    pipeline = PipelineFake()
+    _consultar(pipeline, "top 10 clientes")
+
+    escritas["carteira_principal"] += 1  # UPDATE em outra sessao
+    resultado = _consultar(pipeline, "top 10 clientes")
+
+    assert pipeline.execucoes == 2
+    assert pipeline.geracoes == 1  # plano reaproveitado: pulou o Generator
+    assert resultado["cache"] == "plano"
+    assert resultado["dados"][0]["sum"] == 2
+    assert cache.estatisticas()["resultado_invalidado"] == 1
+
+
+def test_escrita_em_tabela_nao_referenciada_mantem_resultado(escritas):
+    pipeline = PipelineFake()
+    _consultar(pipeline, "top 10 clientes")
+    escritas["separacao"] += 50
+
+    assert _consultar(pipeline, "top 10 clientes")["cache"] == "resultado"
+    assert pipeline.execucoes == 1
+
+
+def test_dml_pela_tool_invalida_na_hora(escritas):
+    leitura = PipelineFake()
+    _consultar(leitura, "top 10 clientes")
+
+    escrita = PipelineFake(sql="UPDATE carteira_principal SET ativo = false WHERE id = 1")
+    _consultar(escrita, "desativa o item 1", escopo=cache.escopo_usuario(True, None))
+
+    _consultar(leitura, "top 10 clientes")
+    assert leitura.execucoes == 2
+    assert cache.estatisticas()["planos"] == 1  # DML nao vira plano
+
+
+def test_escopos_diferentes_nao_compartilham_cache(escritas):
+    pipeline = PipelineFake()
+    _consultar(pipeline, "top 10 clientes")
+    _consultar(pipeline, "top 10 clientes", escopo=cache.escopo_usuario(True, None))
+
+    assert pipeline.geracoes == 2
+
+
+def test_sql_literal_usa_cache_de_resultado(escritas):
+    pipeline = PipelineFake()
+    _consultar(pipeline, SQL_TOP, sql_literal=SQL_TOP)
+    resultado = _consultar(pipeline, SQL_TOP + " ;", sql_literal=SQL_TOP + " ;")
+
+    assert resultado["cache"] == "resultado"
+    assert pipeline.execucoes == 1
+    assert cache.estatisticas()["planos"] == 0
+
+
+def test_ttl_expirado_reexecuta(escritas, monkeypatch):
+    pipeline = PipelineFake()
+    _consultar(pipeline, "top 10 clientes")
+
+    relogio = cache.time.monotonic() + cache.RESULTADO_TTL_SECONDS + 1
+    monkeypatch.setattr(cache.time, "monotonic", lambda: relogio)
+    _consultar(pipeline, "top 10 clientes")
+
+    assert pipeline.execucoes == 2
+    assert cache.estatisticas()["resultado_expirado"] == 1
+
+
+def test_plano_que_falha_e_descartado_e_regerado(escritas):
+    pipeline = PipelineFake()
+    _consultar(pipeline, "top 10 clientes")
+    escritas["carteira_principal"] += 1
+
+    run_original = pipeline.run
+
+    def run_plano_quebrado(pergunta, sql_literal=None):
+        if sql_literal is not None:
+            pipeline.execucoes += 1
+            return {"sucesso": False, "sql": sql_literal, "aviso": "coluna nao existe"}
+        return run_original(pergunta)
+
+    pipeline.run = run_plano_quebrado
+    resultado = _consultar(pipeline, "top 10 clientes")
+
+    assert resultado["sucesso"] is True
+    assert pipeline.geracoes == 2
+    assert cache.estatisticas()["plano_descartado"] == 1
+
+
+def test_sem_watermarks_nao_cacheia_resultado(escritas, monkeypatch):
+    monkeypatch.setattr(cache, "_ler_watermarks", lambda tabelas: None)
+    pipeline = PipelineFake()
+    _consultar(pipeline, "top 10 clientes")
+    _consultar(pipeline, "top 10 clientes")
+
+    assert pipeline.execucoes == 2
+    assert pipeline.geracoes == 1
+
+
+def test_flag_desligada_passa_direto(escritas, monkeypatch):
+    monkeypatch.setenv("TEXT_TO_SQL_CACHE", "false")
+    pipeline = PipelineFake()
+    _consultar(pipeline, "top 10 clientes")
+    _consultar(pipeline, "top 10 clientes")
+
+    assert pipeline.geracoes == 2
+
+
+@pytest.mark.parametrize("sql,esperado", [
+    (SQL_TOP, True),
+    ("WITH t AS (SELECT 1) SELECT * FROM t", True),
+    ("SELECT * FROM separacao FOR UPDATE", False),
+    ("SELECT random() FROM separacao", False),
+    ("DELETE FROM separacao", False),
+    ("WITH x AS (DELETE FROM separacao RETURNING *) SELECT * FROM x", False),
+])
+def test_sql_cacheavel(sql, esperado):
+    assert cache.sql_cacheavel(sql) is esperado
+
+
+def test_ler_watermarks_fora_de_app_context_abre_contexto(app, monkeypatch):
+    """Handler MCP roda fora de app context: a leitura abre o proprio."""
+    import app as app_pkg
+    from flask import has_app_context
+
+    dentro = []
+
+    def _consultar(tabelas):
+        dentro.append(has_app_context())
+        return {t: 1 for t in tabelas}
+
+    criados = []
+    monkeypatch.setattr(app_pkg, "create_app", lambda: criados.append(1) or app)
+    monkeypatch.setattr(cache, "_app_proprio", None)
+    monkeypatch.setattr(cache, "_consultar_watermarks", _consultar)
+    assert not has_app_context()
+
+    assert cache._ler_watermarks(["carteira_principal"]) == {"carteira_principal": 1}
+    assert cache._ler_watermarks(["carteira_principal"]) == {"carteira_principal": 1}
+    assert dentro == [True, True]
+    assert len(criados) == 1
+
+
+def test_ler_watermarks_real_dentro_de_app_context(app):
+    from app import db
+
+    with app.app_context():
+        if db.engine.dialect.name != "postgresql":
+            pytest.skip("pg_stat_user_tables so existe no PostgreSQL")
+        lidos = cache._ler_watermarks(["carteira_principal", "tabela_inexistente"])
+
+    assert lidos is not None
+    assert set(lidos) == {"carteira_principal"}
+    assert lidos["carteira_principal"] >= 0
@@ -0,0 +1,95 @@
+"""Suíte de benchmarks (benchmarks/): comparação, Odoo falso e escala.
+
+Não roda os cenários (isso é `python -m benchmarks executar`); cobre as partes
+que decidem se um resultado é regressão e o Odoo falso contra o
+OdooConnection real.
+"""
+import pytest
+
+from benchmarks.comparar import Limites, avisos_de_contexto, comparar
+from benchmarks.fixtures import ESCALAS, dados_odoo_carteira
+from benchmarks.odoo_fake import FakeOdooServer, filtrar
+
+
+def _resultado(mediana=100.0, queries=50, memoria=1000.0, chamadas=None, backend='sqlite'):
+    bloco = {'tempo_ms': {'mediana': mediana}, 'queries': queries, 'pico_memoria_kb': memoria, 'extra': {}}
+    if chamadas is not None:
+        bloco['extra']['chamadas_odoo'] = chamadas
+    return {'meta': {'backend': backend, 'escala': {'produtos': 60}}, 'cenarios': {'x': bloco}}
+
+
+def _regressoes(base, atual, **limites):
+    return {a.metrica for a in comparar(base, atual, Limites(**limites)) if a.regressao}
+
+
+class TestComparar:
+    def test_sem_mudanca_nao_regride(self):
+        assert _regressoes(_resultado(), _resultado()) == set()
+
+    def test_tempo_acima_do_limite(self):
+        assert _regressoes(_resultado(mediana=100), _resultado(mediana=130)) == {'tempo_ms.mediana'}
+        assert _regressoes(_resultado(mediana=100), _resultado(mediana=115)) == set()
+        assert _regressoes(_resultado(mediana=100), _resultado(mediana=115), tempo=0.10) == {'tempo_ms.mediana'}
+
+    def test_piso_ms_ignora_ruido_em_cenario_rapido(self):
+        # +100% mas só 1 ms: ruído, não regressão
+        assert _regressoes(_resultado(mediana=1.0), _resultado(mediana=2.0)) == set()
+
+    def test_queries_e_chamadas_odoo_sao_contadores(self):
+        atual = _resultado(queries=51, chamadas=11)
+        assert _regressoes(_resultado(chamadas=10), atual) == {'queries', 'extra.chamadas_odoo'}
+        assert _regressoes(_resultado(chamadas=10), atual, contador=1) == set()
+
+    def test_memoria_com_piso(self):
+        assert _regressoes(_resultado(memoria=1000), _resultado(memoria=1500)) == {'pico_memoria_kb'}
+        assert _regressoes(_resultado(memoria=100), _resultado(memoria=300)) == set()
+
+    def test_cenario_pulado_ou_com_erro(self):
+        base = _resultado()
+        assert comparar({'cenarios': {'x': {'pulado': 'pg'}}}, base) == []
+
+        achados = comparar(base, {'cenarios': {'x': {'pulado': 'requer PostgreSQL'}}})
+        assert len(achados) == 1 and not achados[0].regressao
+
+        achados = comparar(base, {'cenarios': {'x': {'erro': 'KeyError'}}})
+        assert achados[0].regressao
+
+    def test_avisa_backend_diferente(self):
+        assert avisos_de_contexto(_resultado(), _resultado(backend='postgresql'))
+        assert avisos_de_contexto(_resultado(), _resultado()) == []
+
+
+class TestEscala:
+    def test_com_params(self):
+        escala = ESCALAS['pequena'].com_params(['titulos=99', 'clientes=7'])
+        assert escala.titulos == 99 and escala.clientes == 7
+        assert escala.produtos == ESCALAS['pequena'].produtos
+
+    def test_param_desconhecido(self):
+        with pytest.raises(ValueError):
+            ESCALAS['pequena'].com_params(['inexistente=1'])
+
+
+class TestOdooFake:
+    def test_filtrar_folhas_simples(self):
+        registros = [{'id': 1, 'qty': 0, 'state': 'sale'}, {'id': 2, 'qty': 5, 'state': 'draft'}]
+        domain = ['&', ('qty', '>', 0), ('order_id.state', '=', 'sale'), ('campo_ausente', '=', 1)]
+        assert [r['id'] for r in filtrar(registros, domain)] == [2]
+
+    def test_round_trip_com_odoo_connection(self):
+        from app.odoo.utils.connection import OdooConnection
+
+        dados = dados_odoo_carteira(ESCALAS['pequena'].com_params(['linhas_carteira=30']))
+        with FakeOdooServer(dados) as odoo:
+            conn = OdooConnection(odoo.config())
+            assert conn.authenticate()
+
+            linhas = conn.search_read('sale.order.line', [], ['id', 'product_id'], limit=5)
+            assert len(linhas) == 5
+            assert set(linhas[0]) == {'id', 'product_id'}
+
+            ids = [p['id'] for p in dados['res.partner'][:3]]
+            assert [p['id'] for p in conn.read('res.partner', ids, ['name'])] == ids
+
+        assert odoo.chamadas[('sale.order.line', 'search_read')] == 1
+        assert odoo.chamadas[('res.partner', 'read')] == 1
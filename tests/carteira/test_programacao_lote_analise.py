@@ -0,0 +1,168 @@
+"""Motor set-based da programação em lote (analise_rede).
+
+Montagem em memória (sem banco) e orçamento de queries da rede: o número de
+queries da tela não pode crescer com a quantidade de lojas.
+"""
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from app.carteira.services.analise_rede import (
+    analisar_rede,
+    calcular_ruptura_sequencial,
+    montar_lojas,
+    projetar_saldo,
+)
+
+HOJE = date(2026, 10, 19)
+
+
+def _cliente(cnpj, cidade='SAO PAULO', vendedor='ANA'):
+    return SimpleNamespace(cnpj_cpf=cnpj, raz_social_red=f'LOJA {cnpj[-4:]}', nome_cidade=cidade,
+                           cod_uf='SP', vendedor=vendedor, equipe_vendas='EQ')
+
+
+def _item(cnpj, pedido, cod, qtd, preco='10'):
+    return SimpleNamespace(cnpj_cpf=cnpj, num_pedido=pedido, data_pedido=HOJE, pedido_cliente=None,
+                           observ_ped_1=None, cod_produto=cod, qtd_saldo_produto_pedido=Decimal(qtd),
+                           preco_produto_pedido=Decimal(preco))
+
+
+def _fatos(**kw):
+    base = dict(clientes=[], itens=[], saldo_separado={}, grupos_separacao=[], nfs_sem_carteira=[],
+                faturamento={}, palletizacao={}, sub_rotas={})
+    base.update(kw)
+    return base
+
+
+# ============================================================
+# montar_lojas (puro)
+# ============================================================
+
+def test_cliente_com_variacoes_de_cadastro_nao_duplica_pedidos():
+    cnpj = '93.209.765/0001-01'
+    fatos = _fatos(
+        clientes=[_cliente(cnpj, vendedor='ANA'), _cliente(cnpj, vendedor='BIA')],
+        itens=[_item(cnpj, 'P1', 'A', '10'), _item(cnpj, 'P1', 'B', '5')],
+        palletizacao={'A': (Decimal('2'), Decimal('5')), 'B': (Decimal('1'), Decimal('0'))},
+    )
+    [loja] = montar_lojas(fatos, HOJE)
+
+    assert loja['qtd_pedidos'] == 1
+    assert loja['total_valor'] == Decimal('150')
+    assert loja['total_peso'] == Decimal('25')
+    assert loja['total_pallets'] == Decimal('2')
+
+
+def test_separado_abatido_uma_vez_por_produto():
+    cnpj = '93.209.765/0001-01'
+    fatos = _fatos(
+        clientes=[_cliente(cnpj)],
+        itens=[_item(cnpj, 'P1', 'A', '10'), _item(cnpj, 'P1', 'A', '10')],
+        saldo_separado={('P1', 'A'): Decimal('15')},
+        grupos_separacao=[SimpleNamespace(
+            num_pedido='P1', sincronizado_nf=False, separacao_lote_id='L1', numero_nf=None,
+            status='ABERTO', expedicao=HOJE, agendamento=HOJE + timedelta(days=2),
+            agendamento_confirmado=False, protocolo='PR1',
+            valor_total=Decimal('150'), peso_total=Decimal('0'), pallet_total=Decimal('0'))],
+    )
+    [loja] = montar_lojas(fatos, HOJE)
+    [pedido] = loja['pedidos']
+
+    assert pedido['qtd_pendente'] == Decimal('5')
+    assert pedido['valor_pendente'] == Decimal('50')
+    assert pedido['separacoes'][0]['separacao_lote_id'] == 'L1'
+    assert loja['status'] == 'Ag. Aprovação'  # protocolo em todas, agendamento futuro, não confirmado
+    assert loja['agendamento_sugerido'] == (HOJE + timedelta(days=2)).strftime('%Y-%m-%d')
+
+
+def test_nf_no_cd_sem_carteira_vira_loja_e_ordena_por_sub_rota():
+    cnpj_cart, cnpj_nf = '93.209.765/0001-01', '93.209.765/0002-02'
+    nf = SimpleNamespace(cnpj_cpf=cnpj_nf, raz_social_red='LOJA NF', nome_cidade='Jundiaí', cod_uf='SP',
+                         numero_nf='123', num_pedido='P9', status='FATURADO', expedicao=None,
+                         agendamento=None, agendamento_confirmado=False, protocolo=None)
+    fatos = _fatos(
+        clientes=[_cliente(cnpj_cart, cidade='SANTOS')],
+        itens=[_item(cnpj_cart, 'P1', 'A', '1')],
+        nfs_sem_carteira=[nf, nf],
+        faturamento={'123': [SimpleNamespace(cod_produto='A', valor_produto_faturado=Decimal('80'),
+                                             qtd_produto_faturado=Decimal('10'), peso_total=None)]},
+        palletizacao={'A': (Decimal('3'), Decimal('5'))},
+        sub_rotas={('SP', 'SANTOS'): 'D', ('SP', 'JUNDIAI'): 'B'},
+    )
+    lojas = montar_lojas(fatos, HOJE)
+
+    assert [l['cnpj'] for l in lojas] == [cnpj_nf, cnpj_cart]  # B antes de D
+    loja_nf = lojas[0]
+    assert loja_nf['qtd_nf_cd'] == 1
+    assert loja_nf['vendedor'] is None
+    assert (loja_nf['total_valor'], loja_nf['total_peso'], loja_nf['total_pallets']) == (
+        Decimal('80'), Decimal('30'), Decimal('2'))
+    assert loja_nf['pedidos'][0]['status'] == 'NF_CD_SEM_CARTEIRA'
+
+
+# ============================================================
+# Projeções (puro)
+# ============================================================
+
+def test_projetar_saldo_primeira_data_que_cobre():
+    saidas = {('A', HOJE): 5}
+    producoes = {('A', HOJE + timedelta(days=3)): 20}
+    data, saldo = projetar_saldo(10, 20, 'A', saidas, producoes, HOJE, 15)
+    assert data == HOJE + timedelta(days=3)
+    assert saldo == 25
+
+
+def test_ruptura_sequencial_consome_estoque_dos_anteriores():
+    itens = {'C1': [('A', 8.0)], 'C2': [('A', 5.0)]}
+    producoes = {'A': [(HOJE - timedelta(days=1), 1.0), (HOJE + timedelta(days=4), 10.0)]}
+    resultado = calcular_ruptura_sequencial(['C1', 'C2'], itens, {'A': 10.0}, producoes, HOJE)
+
+    assert resultado['C1']['percentual_disponivel'] == 100.0
+    assert resultado['C1']['data_completa'] == HOJE.strftime('%Y-%m-%d')
+    assert resultado['C2']['detalhes']['A']['disponivel'] is False
+    assert resultado['C2']['data_completa'] == (HOJE + timedelta(days=4)).strftime('%Y-%m-%d')
+
+
+# ============================================================
+# Orçamento de queries (banco)
+# ============================================================
+
+def _criar_rede(db, n_lojas):
+    from app.carteira.models import CarteiraPrincipal
+    from app.separacao.models import Separacao
+
+    sufixo = uuid.uuid4().hex[:6].upper()
+    for i in range(n_lojas):
+        cnpj = f'93209765{sufixo}{i:02d}'
+        for p in range(2):
+            pedido = f'VTST{sufixo}{i}{p}'
+            for cod in ('TSTA', 'TSTB'):
+                db.session.add(CarteiraPrincipal(
+                    num_pedido=pedido, cod_produto=f'{cod}{sufixo}', cnpj_cpf=cnpj,
+                    raz_social_red=f'LOJA {i}', nome_cidade='SAO PAULO', cod_uf='SP',
+                    nome_produto='PRODUTO TESTE', qtd_produto_pedido=10, qtd_saldo_produto_pedido=10,
+                    preco_produto_pedido=5, ativo=True))
+            db.session.add(Separacao(
+                separacao_lote_id=f'LOTE_{pedido}', num_pedido=pedido, cnpj_cpf=cnpj, cod_uf='SP',
+                cod_produto=f'TSTA{sufixo}', qtd_saldo=4, sincronizado_nf=False, nf_cd=False,
+                expedicao=date.today() + timedelta(days=2)))
+    db.session.flush()
+
+
+def test_listagem_da_rede_tem_queries_constantes(db, query_budget):
+    if db.engine.dialect.name != 'postgresql':
+        pytest.skip('tabelas da carteira so existem no PostgreSQL de testes')
+    _criar_rede(db, 2)
+    with query_budget(9, 'programacao_lote.rede_pequena') as pequena:
+        lojas_pequena = analisar_rede('atacadao')
+
+    _criar_rede(db, 8)
+    with query_budget(9, 'programacao_lote.rede_grande') as grande:
+        lojas_grande = analisar_rede('atacadao')
+
+    assert len(lojas_grande) == len(lojas_pequena) + 8
+    assert grande.count == pequena.count
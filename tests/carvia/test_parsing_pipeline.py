@@ -0,0 +1,146 @@
+"""
+Testes do ParsingPipeline (app/carvia/services/parsers/parsing_pipeline.py).
+
+Parser real substituido por `_parse_fake` (top-level: precisa ser picklavel
+para o pool de processos). Cache sem Redis (LRU local).
+
+Contrato:
+- resultados na MESMA ordem dos arquivos de entrada
+- re-upload do mesmo conteudo = cache hit (parser nao roda de novo)
+- cache hit ajusta arquivo_nome_original para o nome do upload atual
+- falha de parse NAO e cacheada (LLM da fatura pode ser transiente)
+- paralelo=True distribui PDFs no pool e reporta progresso por arquivo
+- XML real (NF-e) passa por parsear_documento sem pool nem banco
+- no Redis o resultado vai em JSON (tipos preservados); pickle nunca e lido
+"""
+import base64
+import json
+import pickle
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from app.carvia.services.parsers import parsing_pipeline
+from app.carvia.services.parsers.parsing_pipeline import CacheParse, ParsingPipeline
+
+_CHAMADAS = []
+
+
+def _parse_fake(nome, conteudo):
+    _CHAMADAS.append(nome)
+    if conteudo.startswith(b'ERRO'):
+        return {'tipo': 'PDF_DANFE', 'dados': None, 'erro': 'pdf corrompido'}
+    tipo = 'PDF_DANFE' if nome.endswith('.pdf') else 'XML_NFE'
+    return {
+        'tipo': tipo,
+        'dados': {'numero_nf': conteudo.decode(), 'arquivo_nome_original': nome},
+        'erro': None,
+    }
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    _CHAMADAS.clear()
+    monkeypatch.setattr(parsing_pipeline, 'parsear_documento', _parse_fake)
+    return ParsingPipeline(max_workers=2, pool_min_pdfs=2, cache=CacheParse(usar_redis=False))
+
+
+def test_ordem_preservada_e_cache_por_conteudo(pipeline):
+    arquivos = [('a.xml', b'100'), ('b.pdf', b'200'), ('c.pdf', b'300')]
+    primeiro = pipeline.parsear_lote(arquivos)
+    assert [r['dados']['numero_nf'] for r in primeiro] == ['100', '200', '300']
+    assert not any(r['cache'] for r in primeiro)
+    assert len(_CHAMADAS) == 3
+
+    segundo = pipeline.parsear_lote(arquivos)
+    assert all(r['cache'] for r in segundo)
+    assert len(_CHAMADAS) == 3  # nenhum reparse
+
+
+def test_cache_hit_usa_nome_do_upload_atual(pipeline):
+    pipeline.parsear_lote([('original.pdf', b'777')])
+    [r] = pipeline.parsear_lote([('renomeado.pdf', b'777')])
+    assert r['cache'] is True
+    assert r['nome'] == 'renomeado.pdf'
+    assert r['dados']['arquivo_nome_original'] == 'renomeado.pdf'
+
+
+def test_cache_devolve_copia(pipeline):
+    pipeline.parsear_lote([('x.pdf', b'1')])
+    [r1] = pipeline.parsear_lote([('x.pdf', b'1')])
+    r1['dados']['arquivo_pdf_path'] = 's3://mutado'
+    [r2] = pipeline.parsear_lote([('x.pdf', b'1')])
+    assert 'arquivo_pdf_path' not in r2['dados']
+
+
+def test_falha_nao_e_cacheada(pipeline):
+    [r] = pipeline.parsear_lote([('ruim.pdf', b'ERRO-1')])
+    assert r['erro'] == 'pdf corrompido'
+    pipeline.parsear_lote([('ruim.pdf', b'ERRO-1')])
+    assert _CHAMADAS.count('ruim.pdf') == 2
+
+
+def test_paralelo_usa_pool_e_reporta_progresso(pipeline):
+    arquivos = [(f'doc{i}.pdf', str(i).encode()) for i in range(5)] + [('nf.xml', b'99')]
+    eventos = []
+    resultados = pipeline.parsear_lote(
+        arquivos, progresso=lambda c, t, n, tipo: eventos.append((c, t, n)), paralelo=True,
+    )
+    assert [r['dados']['numero_nf'] for r in resultados] == ['0', '1', '2', '3', '4', '99']
+    assert [c for c, _, _ in eventos] == [1, 2, 3, 4, 5, 6]
+    assert all(t == 6 for _, t, _ in eventos)
+    # PDFs rodaram nos processos filhos: no pai so o XML chamou o parser
+    assert _CHAMADAS == ['nf.xml']
+
+
+def test_parsear_documento_xml_desconhecido():
+    resultado = parsing_pipeline.parsear_documento('x.xml', b'<root><outra/></root>')
+    assert resultado == {'tipo': 'DESCONHECIDO', 'dados': None, 'erro': None}
+
+
+class _RedisFake:
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, chave):
+        return self.dados.get(chave)
+
+    def setex(self, chave, ttl, valor):
+        self.dados[chave] = valor
+
+
+def _cache_com_redis(monkeypatch):
+    redis = _RedisFake()
+    cache = CacheParse(usar_redis=True)
+    monkeypatch.setattr(cache, '_redis', lambda: redis)
+    return cache, redis
+
+
+def test_redis_guarda_json_e_preserva_tipos(monkeypatch):
+    cache, redis = _cache_com_redis(monkeypatch)
+    resultado = {'tipo': 'PDF_DANFE', 'erro': None, 'dados': {
+        'data_emissao': date(2026, 10, 14), 'processado_em': datetime(2026, 10, 14, 8, 30),
+        'valor_total': Decimal('1234.56'), 'assinatura': b'\x00\x01', 'itens': [{'qtd': 2}],
+    }}
+    cache.set('abc', resultado)
+
+    [bruto] = redis.dados.values()
+    json.loads(bruto)  # texto JSON puro, sem pickle
+    lido = CacheParse(usar_redis=True)
+    monkeypatch.setattr(lido, '_redis', lambda: redis)
+    assert lido.get('abc') == resultado
+
+
+def test_redis_com_pickle_e_ignorado(monkeypatch):
+    cache, redis = _cache_com_redis(monkeypatch)
+    redis.dados[f'{parsing_pipeline._CACHE_PREFIXO}:abc'] = base64.b64encode(
+        pickle.dumps({'tipo': 'PDF_DANFE', 'dados': {'x': 1}, 'erro': None})
+    ).decode('ascii')
+    assert cache.get('abc') is None
+
+
+def test_tipo_desconhecido_nao_vai_para_o_redis(monkeypatch):
+    cache, redis = _cache_com_redis(monkeypatch)
+    cache.set('abc', {'tipo': 'PDF_DANFE', 'erro': None, 'dados': {'x': object()}})
+    assert redis.dados == {}
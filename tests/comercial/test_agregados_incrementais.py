@@ -0,0 +1,339 @@
+"""Testes dos agregados comerciais incrementais (agregacao_service).
+
+Sem banco: comparador do verificador de consistencia e fallback da leitura
+incremental para a CTE original.
+
+Com banco (so PostgreSQL — triggers com transition tables): a migration e
+aplicada dentro da transacao do teste (desfeita no teardown); inserts,
+updates e deletes em carteira/faturamento/entregas sao conferidos contra
+comercial_agregado_completo() na leitura resumo + delta, apos a compactacao
+e apos reconstruir_comercial_agregado(). Dados isolados por equipe unica.
+"""
+import uuid
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from sqlalchemy import delete, insert, text
+
+from app.comercial.services import agregacao_service
+from app.comercial.services.agregacao_service import (
+    AgregacaoComercialService,
+    _sql_agregado,
+    comparar_agregados,
+)
+
+CHAVE = ('origem', 'equipe_vendas', 'vendedor', 'cnpj')
+CAMPOS = ('linhas', 'valor', 'valor_exato')
+
+
+def _linha(equipe, vendedor, cnpj, linhas=1, valor=Decimal('10.00'), origem='C'):
+    return {'origem': origem, 'equipe_vendas': equipe, 'vendedor': vendedor, 'cnpj': cnpj,
+            'linhas': linhas, 'valor': valor, 'valor_exato': valor}
+
+
+# ============================================================
+# comparar_agregados
+# ============================================================
+
+def test_comparar_agregados_iguais_nao_diverge():
+    linhas = [_linha('EQ1', 'ANA', '1'), _linha(None, None, '2', origem='F')]
+    assert comparar_agregados(linhas, list(reversed(linhas)), CHAVE, CAMPOS) == []
+
+
+def test_comparar_agregados_respeita_tolerancia():
+    inc = [_linha('EQ1', 'ANA', '1', valor=Decimal('10.004'))]
+    comp = [_linha('EQ1', 'ANA', '1', valor=Decimal('10.00'))]
+    assert comparar_agregados(inc, comp, CHAVE, CAMPOS) == []
+
+    comp = [_linha('EQ1', 'ANA', '1', valor=Decimal('10.50'))]
+    divergencias = comparar_agregados(inc, comp, CHAVE, CAMPOS)
+    assert [d['campo'] for d in divergencias] == ['valor', 'valor_exato']
+    assert divergencias[0]['chave'] == ('C', 'EQ1', 'ANA', '1')
+
+
+def test_comparar_agregados_chave_de_um_lado_so():
+    # Delta perdido (so no completo) e delta duplicado de cliente que saiu (so no incremental)
+    inc = [_linha('EQ1', None, '1'), _linha('EQ2', 'BIA', '9')]
+    comp = [_linha('EQ1', None, '1'), _linha('EQ1', 'ANA', '2', linhas=3)]
+    divergencias = comparar_agregados(inc, comp, CHAVE, CAMPOS)
+
+    assert [(d['chave'], d['campo']) for d in divergencias] == [
+        (('C', 'EQ1', 'ANA', '2'), None),
+        (('C', 'EQ2', 'BIA', '9'), None),
+    ]
+    assert divergencias[0]['incremental'] is None
+    assert divergencias[1]['completo'] is None
+
+
+def test_comparar_agregados_dashboard_por_equipe():
+    inc = [{'nome': 'EQ1', 'total_clientes': 5, 'valor_em_aberto': 100.0}]
+    comp = [{'nome': 'EQ1', 'total_clientes': 4, 'valor_em_aberto': 100.0}]
+    divergencias = comparar_agregados(inc, comp, ('nome',), ('total_clientes', 'valor_em_aberto'))
+    assert divergencias == [{'chave': ('EQ1',), 'campo': 'total_clientes', 'incremental': 5, 'completo': 4}]
+
+
+# ============================================================
+# Leitura incremental
+# ============================================================
+
+def test_sql_agregado_soma_resumo_e_deltas_pendentes():
+    sql = _sql_agregado('equipe_vendas = :equipe')
+    assert 'FROM comercial_agregado_cliente' in sql
+    assert 'FROM comercial_agregado_delta' in sql
+    assert sql.count('WHERE equipe_vendas = :equipe') == 2
+    assert 'HAVING SUM(linhas) > 0' in sql
+
+
+class _SessaoFalsa:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class _DbFalso:
+    def __init__(self):
+        self.session = _SessaoFalsa()
+
+
+@pytest.fixture
+def db_falso(monkeypatch):
+    falso = _DbFalso()
+    monkeypatch.setattr(agregacao_service, 'db', falso)
+    monkeypatch.setattr(agregacao_service, '_verificar_agregado_disponivel', lambda: True)
+    return falso
+
+
+def test_dashboard_cai_para_cte_quando_agregado_falha(db_falso, monkeypatch):
+    def falhar(*_args):
+        raise RuntimeError('relation comercial_agregado_cliente does not exist')
+
+    cte = [{'nome': 'EQ1', 'total_clientes': 1, 'valor_em_aberto': 1.0}]
+    monkeypatch.setattr(AgregacaoComercialService, '_dashboard_via_agregado', staticmethod(falhar))
+    monkeypatch.setattr(AgregacaoComercialService, '_dashboard_via_cte', staticmethod(lambda f=None: cte))
+    monkeypatch.setattr(AgregacaoComercialService, '_vendedores_via_agregado', staticmethod(falhar))
+    monkeypatch.setattr(AgregacaoComercialService, '_vendedores_via_cte', staticmethod(lambda e, f=None: cte))
+
+    assert AgregacaoComercialService.obter_dashboard_completo_otimizado(['EQ1']) == cte
+    assert AgregacaoComercialService.obter_vendedores_equipe_otimizado('EQ1') == cte
+    assert db_falso.session.rollbacks == 2
+
+
+def test_dashboard_usa_agregado_quando_disponivel(db_falso, monkeypatch):
+    agregado = [{'nome': 'EQ1', 'total_clientes': 2, 'valor_em_aberto': 3.0}]
+    monkeypatch.setattr(AgregacaoComercialService, '_dashboard_via_agregado',
+                        staticmethod(lambda f=None: agregado))
+    monkeypatch.setattr(AgregacaoComercialService, '_dashboard_via_cte',
+                        staticmethod(lambda f=None: pytest.fail('nao deveria usar a CTE')))
+
+    assert AgregacaoComercialService.obter_dashboard_completo_otimizado() == agregado
+    assert db_falso.session.rollbacks == 0
+
+
+# ============================================================
+# Triggers, compactacao e reconstrucao (PostgreSQL)
+# ============================================================
+
+MIGRATION_SQL = (
+    Path(__file__).resolve().parents[2]
+    / 'scripts' / 'migrations' / '2026-10-19_comercial_agregados_incrementais.sql'
+)
+
+
+@pytest.fixture
+def agregados(db):
+    """Migration aplicada na transacao do teste + equipe exclusiva."""
+    if db.engine.dialect.name != 'postgresql':
+        pytest.skip('agregados incrementais usam triggers do PostgreSQL')
+    db.session.connection().exec_driver_sql(MIGRATION_SQL.read_text())
+    return f'EQ_TESTE_{uuid.uuid4().hex[:8]}'
+
+
+def _sufixo():
+    return uuid.uuid4().hex[:8]
+
+
+def _carteira(db, equipe, cnpj, saldo, preco='10.00', vendedor='ANA'):
+    from app.carteira.models import CarteiraPrincipal
+    item = CarteiraPrincipal(
+        num_pedido=f'PT{_sufixo()}', cod_produto='P1', nome_produto='Produto',
+        cnpj_cpf=cnpj, equipe_vendas=equipe, vendedor=vendedor,
+        qtd_produto_pedido=Decimal(saldo), qtd_saldo_produto_pedido=Decimal(saldo),
+        preco_produto_pedido=Decimal(preco),
+    )
+    db.session.add(item)
+    db.session.flush()
+    return item
+
+
+def _faturamento(db, equipe, cnpj, numero_nf, valor, vendedor='ANA', status_nf='Lançado'):
+    from app.faturamento.models import FaturamentoProduto
+    item = FaturamentoProduto(
+        numero_nf=numero_nf, data_fatura=date(2026, 10, 1),
+        cnpj_cliente=cnpj, nome_cliente='Cliente', cod_produto='P1', nome_produto='Produto',
+        qtd_produto_faturado=Decimal('1'), preco_produto_faturado=Decimal(valor),
+        valor_produto_faturado=Decimal(valor), status_nf=status_nf,
+        equipe_vendas=equipe, vendedor=vendedor,
+    )
+    db.session.add(item)
+    db.session.flush()
+    return item
+
+
+def _inserir_entregas(db, numero_nf, *status):
+    """Varias entregas da NF num UNICO statement INSERT."""
+    from app.monitoramento.models import EntregaMonitorada
+    db.session.execute(insert(EntregaMonitorada).values([
+        {'numero_nf': numero_nf, 'cliente': 'Cliente', 'status_finalizacao': st}
+        for st in status
+    ]))
+
+
+def _por_chave(db, sql, equipe):
+    return [dict(r._mapping) for r in db.session.execute(text(sql), {'equipe': equipe})]
+
+
+def _incremental(db, equipe):
+    return _por_chave(db, _sql_agregado('equipe_vendas = :equipe') + """
+        SELECT origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato FROM agregado
+    """, equipe)
+
+
+def _completo(db, equipe):
+    return _por_chave(db, """
+        SELECT origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato
+        FROM comercial_agregado_completo() WHERE equipe_vendas = :equipe
+    """, equipe)
+
+
+def _resumo(db, equipe):
+    return _por_chave(db, """
+        SELECT origem, equipe_vendas, vendedor, cnpj, linhas, valor, valor_exato
+        FROM comercial_agregado_cliente WHERE equipe_vendas = :equipe
+    """, equipe)
+
+
+def _deltas_pendentes(db, equipe):
+    return db.session.execute(text(
+        "SELECT COUNT(*) FROM comercial_agregado_delta WHERE equipe_vendas = :equipe"
+    ), {'equipe': equipe}).scalar()
+
+
+def _assert_consistente(db, equipe):
+    completo = _completo(db, equipe)
+    assert completo, 'cenario sem dados'
+    assert comparar_agregados(_incremental(db, equipe), completo, CHAVE, CAMPOS) == []
+
+
+def _compactar(db):
+    return db.session.execute(text("SELECT compactar_comercial_agregado()")).scalar()
+
+
+def test_triggers_e_compactacao_batem_com_o_completo(db, agregados):
+    equipe = agregados
+    nf1, nf2 = f'T{_sufixo()}', f'T{_sufixo()}'
+    c1 = _carteira(db, equipe, '11111111000101', saldo='5')
+    _carteira(db, equipe, '22222222000102', saldo='3', vendedor='BIA')
+    _faturamento(db, equipe, '11111111000101', nf1, '100.00')
+    f2 = _faturamento(db, equipe, '11111111000101', nf1, '50.00')
+    _faturamento(db, equipe, '33333333000103', nf2, '70.00')
+    _assert_consistente(db, equipe)
+
+    # Resumo vazio: tudo ainda esta nos deltas
+    assert _resumo(db, equipe) == []
+    assert _compactar(db) > 0
+    assert _deltas_pendentes(db, equipe) == 0
+    assert comparar_agregados(_resumo(db, equipe), _completo(db, equipe), CHAVE, CAMPOS) == []
+
+    # UPDATE de valor, de chave (vendedor) e cancelamento; entrega finalizada; DELETE
+    c1.qtd_saldo_produto_pedido = Decimal('0.01')  # abaixo da tolerancia: valor 0
+    f2.status_nf = 'Cancelado'
+    db.session.flush()
+    db.session.execute(text(
+        "UPDATE carteira_principal SET vendedor = 'CAIO' WHERE equipe_vendas = :equipe AND vendedor = 'BIA'"
+    ), {'equipe': equipe})
+    _inserir_entregas(db, nf2, 'Entregue')
+    _assert_consistente(db, equipe)
+
+    db.session.execute(text(
+        "DELETE FROM carteira_principal WHERE equipe_vendas = :equipe AND vendedor = 'CAIO'"
+    ), {'equipe': equipe})
+    _assert_consistente(db, equipe)
+
+    _compactar(db)
+    assert _deltas_pendentes(db, equipe) == 0
+    resumo = _resumo(db, equipe)
+    assert comparar_agregados(resumo, _completo(db, equipe), CHAVE, CAMPOS) == []
+    # Cliente que saiu (linhas = 0) nao fica no resumo
+    assert '22222222000102' not in {r['cnpj'] for r in resumo}
+    assert '33333333000103' not in {r['cnpj'] for r in resumo}
+
+
+def test_entregas_da_mesma_nf_num_statement_contam_uma_vez(db, agregados):
+    from app.monitoramento.models import EntregaMonitorada
+
+    equipe = agregados
+    nf3 = f'T{_sufixo()}'
+    _faturamento(db, equipe, '44444444000104', nf3, '80.00')
+    _faturamento(db, equipe, '44444444000104', nf3, '20.00')
+    _compactar(db)
+
+    def linhas_f():
+        return {r['cnpj']: (r['linhas'], r['valor']) for r in _incremental(db, equipe)}
+
+    # Sem entrega -> multiplicidade 1; 2 entregas abertas -> 2 (regra do LEFT JOIN)
+    _inserir_entregas(db, nf3, None, 'Em transito')
+    assert linhas_f() == {'44444444000104': (4, Decimal('200.00'))}
+    _assert_consistente(db, equipe)
+
+    db.session.execute(
+        EntregaMonitorada.__table__.update()
+        .where(EntregaMonitorada.numero_nf == nf3)
+        .values(status_finalizacao='Entregue')
+    )
+    assert linhas_f() == {}
+
+    db.session.execute(delete(EntregaMonitorada).where(EntregaMonitorada.numero_nf == nf3))
+    assert linhas_f() == {'44444444000104': (2, Decimal('100.00'))}
+    _assert_consistente(db, equipe)
+
+
+def test_reconstruir_corrige_resumo_divergente(db, agregados):
+    from app.comercial.services.agregacao_service import reconstruir_agregados
+
+    equipe = agregados
+    nf4 = f'T{_sufixo()}'
+    _carteira(db, equipe, '55555555000105', saldo='2')
+    _faturamento(db, equipe, '55555555000105', nf4, '30.00')
+    _compactar(db)
+    db.session.execute(text(
+        "UPDATE comercial_agregado_cliente SET linhas = linhas + 5, valor = valor + 1 "
+        "WHERE equipe_vendas = :equipe"
+    ), {'equipe': equipe})
+    assert comparar_agregados(_incremental(db, equipe), _completo(db, equipe), CHAVE, CAMPOS)
+
+    assert reconstruir_agregados() > 0
+
+    assert _deltas_pendentes(db, equipe) == 0
+    assert comparar_agregados(_resumo(db, equipe), _completo(db, equipe), CHAVE, CAMPOS) == []
+
+
+def test_leitura_resumo_mais_delta_igual_a_cte(db, agregados):
+    equipe = agregados
+    nf5 = f'T{_sufixo()}'
+    _carteira(db, equipe, '66666666000106', saldo='4', vendedor='ANA')
+    _faturamento(db, equipe, '77777777000107', nf5, '40.00', vendedor='BIA')
+    _compactar(db)
+    # Parte no resumo, parte ainda em delta
+    _carteira(db, equipe, '88888888000108', saldo='6', vendedor='BIA')
+    _inserir_entregas(db, nf5, 'Entregue')
+
+    dashboard = AgregacaoComercialService._dashboard_via_agregado([equipe])
+    assert dashboard == AgregacaoComercialService._dashboard_via_cte([equipe])
+    assert dashboard == [{'nome': equipe, 'total_clientes': 2, 'valor_em_aberto': 100.0}]
+
+    assert (AgregacaoComercialService._vendedores_via_agregado(equipe)
+            == AgregacaoComercialService._vendedores_via_cte(equipe))
@@ -118,6 +118,37 @@ def runner(app):
     return app.test_cli_runner()
 
 
+@pytest.fixture(scope='function')
+def query_budget():
+    """
+    Falha o teste quando um bloco excede o orcamento de queries declarado.
+
+    Trava N+1 corrigidos: o numero de queries deve ser CONSTANTE, nao
+    proporcional ao volume de dados.
+
+    Uso:
+        def test_listagem_sem_n_mais_1(db, client, query_budget):
+            with query_budget(5, 'carteira.listar') as escopo:
+                client.get('/carteira/listar')
+            # escopo.count / escopo.queries disponiveis para asserts extras
+    """
+    from contextlib import contextmanager
+    from app.utils.query_profiler import query_scope
+
+    @contextmanager
+    def _budget(max_queries, label='query_budget'):
+        with query_scope(label) as escopo:
+            yield escopo
+        if escopo.count > max_queries:
+            pytest.fail(
+                f'Orcamento de queries excedido: {escopo.count} > {max_queries}\n'
+                f'{escopo.resumo()}',
+                pytrace=False,
+            )
+
+    return _budget
+
+
 # ============================================================================
 # FIXTURES ESPECÍFICAS DO MÓDULO PALLET
 # ============================================================================
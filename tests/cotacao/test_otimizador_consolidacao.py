@@ -0,0 +1,128 @@
+"""
+Testes do OtimizadorConsolidacao (app/cotacao/services/otimizador_consolidacao.py).
+
+ContextoTarifario montado em memoria (sem banco): 2 cidades, tabelas com frete
+minimo — consolidar dilui o minimo e derruba o R$/kg.
+
+Contrato:
+- cotar: tabela MAIS CARA por combinacao, vence a combinacao MAIS BARATA
+- combinacao que nao cobre todas as cidades ou excede o peso do veiculo e descartada
+- cenarios_unitarios: mesmo dict {'remover','adicionar'} da tela
+- buscar_consolidacoes: respeita capacidade, fronteira de Pareto nao-dominada
+- UF/sub_rota diferentes nao formam cenario
+"""
+from datetime import date
+
+import pytest
+
+from app.cotacao.services.otimizador_consolidacao import (
+    CargaPedido,
+    ContextoTarifario,
+    OtimizadorConsolidacao,
+)
+from app.utils.tabela_frete_manager import TabelaFreteManager
+
+SP, CAMPINAS = 1, 2
+
+
+def _tabela(nome, transportadora, valor_kg, minimo):
+    dados = TabelaFreteManager.preparar_dados_tabela({
+        'nome_tabela': nome, 'valor_kg': valor_kg, 'frete_minimo_valor': minimo,
+    })
+    dados['modalidade'] = 'TRUCK'
+    return {
+        'dados': dados, 'optante': True, 'transportadora': transportadora,
+        'nome_tabela': nome, 'valor_kg': valor_kg, 'percentual_valor': 0,
+    }
+
+
+@pytest.fixture
+def contexto():
+    tabelas = {
+        10: _tabela('SP CAPITAL', 'TRANSP A', 0.10, 500),
+        11: _tabela('SP INTERIOR', 'TRANSP A', 0.12, 600),
+        20: _tabela('SP GERAL', 'TRANSP B', 0.11, 450),
+    }
+    combinacoes = {
+        (1, 'SP', 'TRUCK'): [(10, SP), (11, CAMPINAS)],
+        (2, 'SP', 'TRUCK'): [(20, SP)],  # B nao atende Campinas
+    }
+    return ContextoTarifario(combinacoes, tabelas, {SP: 0, CAMPINAS: 0}, {'TRUCK': 6000})
+
+
+def _carga(lote, peso, cidade=SP, uf='SP', sub_rota=None, dia=1):
+    return CargaPedido(
+        lote_id=lote, num_pedido=f'P{lote}', peso=peso, valor=peso * 10,
+        cod_uf=uf, sub_rota=sub_rota, cidade_id=cidade, data_entrega=date(2026, 10, dia),
+    )
+
+
+def test_cotar_regra_conservadora(contexto):
+    # So SP: A = 500 (minimo), B = 450 (minimo) -> B vence
+    opcao = contexto.cotar(1000.0, 10000.0, frozenset({SP}))
+    assert opcao['transportadora'] == 'TRANSP B'
+    assert opcao['valor_liquido'] == pytest.approx(450)
+
+    # SP + Campinas: so A cobre; pega a tabela MAIS cara (interior, 600)
+    opcao = contexto.cotar(1000.0, 10000.0, frozenset({SP, CAMPINAS}))
+    assert opcao['transportadora'] == 'TRANSP A'
+    assert opcao['nome_tabela'] == 'SP INTERIOR (CONSERVADOR)'
+    assert opcao['frete_por_kg'] == pytest.approx(0.6)
+
+
+def test_cotar_descarta_peso_acima_do_veiculo(contexto):
+    assert contexto.cotar(7000.0, 1000.0, frozenset({SP})) is None
+    assert contexto.capacidade_maxima == 6000
+
+
+def test_cenarios_unitarios_formato_da_tela(contexto):
+    atuais = [_carga('a1', 1000)]
+    candidatos = [_carga('c1', 2000), _carga('c2', 9000)]
+    otimizador = OtimizadorConsolidacao(atuais, candidatos, contexto, frete_atual_kg=0.45)
+
+    otimizacoes = otimizador.cenarios_unitarios('TRANSP B', 'TRUCK', 450)
+    adicionar = otimizacoes['adicionar']['c1']
+    assert adicionar['peso_novo'] == 3000
+    assert adicionar['frete_kg_novo'] == pytest.approx(0.15)
+    assert adicionar['reducao_por_kg_rota'] == pytest.approx(0.30)
+    # 10 t nao cabe em nenhum veiculo -> sem otimizacao
+    assert otimizacoes['adicionar']['c2']['sem_otimizacao'] is True
+    # unico pedido atual: remover nao deixa carga
+    assert otimizacoes['remover']['a1']['sem_otimizacao'] is True
+
+
+def test_buscar_consolidacoes_respeita_capacidade_e_pareto(contexto):
+    atuais = [_carga('a1', 1000)]
+    candidatos = [
+        _carga('c1', 2000, dia=2),
+        _carga('c2', 2500, dia=9),
+        _carga('c3', 2000, cidade=CAMPINAS, dia=3),
+        _carga('c4', 5500),
+    ]
+    otimizador = OtimizadorConsolidacao(atuais, candidatos, contexto, frete_atual_kg=0.45)
+    consolidacoes = otimizador.buscar_consolidacoes()
+
+    assert consolidacoes
+    melhor = consolidacoes[0]
+    assert melhor['peso'] <= 6000
+    assert melhor['frete_kg'] == min(c['frete_kg'] for c in consolidacoes)
+    assert melhor['reducao_kg'] > 0
+    assert 'a1' in melhor['lotes']
+
+    for c in consolidacoes:
+        assert not any(
+            o is not c and o['frete_kg'] <= c['frete_kg'] and o['entregas'] <= c['entregas']
+            and o['janela_dias'] <= c['janela_dias']
+            and (o['frete_kg'], o['entregas'], o['janela_dias'])
+            != (c['frete_kg'], c['entregas'], c['janela_dias'])
+            for o in consolidacoes
+        )
+
+
+def test_uf_ou_sub_rota_diferente_nao_forma_cenario(contexto):
+    atuais = [_carga('a1', 1000, sub_rota='A')]
+    candidatos = [_carga('c1', 2000, sub_rota='B'), _carga('c2', 2000, uf='RJ', sub_rota='A')]
+    otimizador = OtimizadorConsolidacao(atuais, candidatos, contexto, frete_atual_kg=0.45)
+    assert otimizador.avaliar(frozenset({'a1', 'c1'})) is None
+    assert otimizador.avaliar(frozenset({'a1', 'c2'})) is None
+    assert otimizador.buscar_consolidacoes() == []
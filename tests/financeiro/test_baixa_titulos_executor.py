@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Testes do executor de lotes de baixa (app/financeiro/services/baixa_titulos_executor.py).
+
+Cobre o nucleo sem Odoo: prefetch em massa (connection mockada),
+invalidacao por move alterado, integracao com as leituras do
+BaixaTitulosService, agrupamento de itens conflitantes e a posse do lote
+(execucao_id + heartbeat) na fixture `db`.
+"""
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.financeiro.models import BaixaTituloItem, BaixaTituloLote
+from app.financeiro.services.baixa_titulos_executor import (
+    HEARTBEAT_VENCIDO_S,
+    MENSAGEM_INTERROMPIDO,
+    ExecutorLoteBaixas,
+    LoteEmProcessamento,
+    PrefetchBaixas,
+    agrupar_itens_conflitantes,
+    lote_em_execucao_viva,
+)
+from app.financeiro.services.baixa_titulos_service import BaixaTitulosService
+from app.utils.timezone import agora_utc_naive
+
+
+def _linha(id_, nf, parcela, move, partner, maturity='2026-11-10', debit=100.0):
+    return {
+        'id': id_, 'x_studio_nf_e': nf, 'l10n_br_cobranca_parcela': parcela,
+        'move_id': [move, f'VND/{move}'], 'partner_id': [partner, 'CLIENTE'],
+        'company_id': [1, 'NACOM GOYA - FB'], 'date_maturity': maturity,
+        'debit': debit, 'amount_residual': debit,
+    }
+
+
+def _connection():
+    conn = MagicMock()
+    conn.search_read.return_value = [
+        _linha(1, '1001', 1, 10, 500),
+        _linha(2, '1001', 2, 10, 500),
+        _linha(3, '1002', 1, 20, 600),
+        _linha(4, '1002', 1, 20, 600, maturity='2000-01-01', debit=5.0),  # bug ano 2000
+    ]
+
+    def _read(model, ids, fields):
+        if model == 'account.move':
+            return [{'id': i, 'name': f'VND/{i}', 'state': 'posted', 'l10n_br_total_nfe': 250.0} for i in ids]
+        if model == 'res.partner':
+            return [{'id': i, 'x_studio_desconto': 2 if i == 500 else 0,
+                     'x_studio_desconto_contratual': i == 500} for i in ids]
+        return [{'id': i, 'company_id': [3, 'SC']} for i in ids]
+
+    conn.read.side_effect = _read
+    return conn
+
+
+def _item(id_, nf, parcela=1, journal=7):
+    return SimpleNamespace(id=id_, nf_excel=nf, parcela_excel=parcela, journal_odoo_id=journal,
+                           move_odoo_id=None, partner_odoo_id=None)
+
+
+def test_prefetch_carrega_lote_em_massa():
+    conn = _connection()
+    prefetch = PrefetchBaixas.carregar(conn, [_item(1, '1001'), _item(2, '1001', 2), _item(3, '1002')])
+
+    assert conn.search_read.call_count == 1
+    assert conn.read.call_count == 3  # moves, partners, journals
+    assert prefetch.nfs_sem_bug_2000() == {'1001'}
+    assert prefetch.taxas_desconto == {500: 0.02, 600: 0.0}
+    assert prefetch.faces_nfe[10] == 250.0
+    assert prefetch.companies_journal == {7: 3}
+    assert prefetch.move_sem_linha_2000(10) is True
+    assert prefetch.move_sem_linha_2000(20) is False
+
+
+def test_prefetch_so_atende_nf_limpa_e_move_intacto():
+    prefetch = PrefetchBaixas.carregar(_connection(), [_item(1, '1001'), _item(3, '1002')])
+
+    assert prefetch.titulo('1001', 2)['id'] == 2
+    assert prefetch.titulo('1002', 1) is None  # NF com titulo ano 2000: fluxo de correcao ao vivo
+    assert prefetch.snapshot(1, 10)['move']['name'] == 'VND/10'
+
+    prefetch.marcar_alterado(10)
+    assert prefetch.titulo('1001', 2) is None
+    assert prefetch.snapshot(1, 10) is None
+
+
+def test_service_usa_prefetch_nas_leituras():
+    prefetch = PrefetchBaixas.carregar(_connection(), [_item(1, '1001')])
+    conn = MagicMock()
+    svc = BaixaTitulosService(connection=conn)
+    svc._prefetch = prefetch
+
+    assert svc._buscar_titulo('1001', 1)['id'] == 1
+    assert svc._buscar_taxa_desconto_cliente(500) == 0.02
+    assert svc._buscar_face_nfe(10) == 250.0
+    assert svc._tem_linha_2000(10) is False
+    assert svc._company_do_journal(7) == 3
+    conn.search_read.assert_not_called()
+
+    # Move alterado -> volta a ler ao vivo
+    prefetch.marcar_alterado(10)
+    conn.search_read.return_value = []
+    svc._buscar_titulo('1001', 1)
+    assert conn.search_read.called
+
+
+def test_agrupa_itens_por_nf_move_e_partner():
+    prefetch = PrefetchBaixas.carregar(_connection(), [])
+    prefetch.linhas_por_nf = {
+        '1001': [_linha(1, '1001', 1, 10, 500)],
+        '1002': [_linha(3, '1002', 1, 20, 600)],
+        '1003': [_linha(5, '1003', 1, 30, 500)],  # mesmo cliente da 1001
+        '1004': [_linha(6, '1004', 1, 40, 700)],
+    }
+    itens = [_item(1, '1001'), _item(2, '1002'), _item(3, '1003'), _item(4, '1001', 2), _item(5, '1004')]
+
+    grupos = agrupar_itens_conflitantes(itens, prefetch)
+    ids = sorted([sorted(i.id for i in g) for g in grupos])
+
+    assert ids == [[1, 3, 4], [2], [5]]
+    # Ordem de entrada preservada dentro do grupo (linha_excel)
+    grupo_1001 = next(g for g in grupos if g[0].id == 1)
+    assert [i.id for i in grupo_1001] == [1, 3, 4]
+
+
+def test_agrupa_sem_prefetch_por_nf():
+    itens = [_item(1, '1001'), _item(2, '1002'), _item(3, '1001', 2)]
+    grupos = agrupar_itens_conflitantes(itens)
+    assert sorted(len(g) for g in grupos) == [1, 2]
+
+
+# ============================================================
+# Posse do lote (execucao_id + heartbeat)
+# ============================================================
+
+@pytest.fixture
+def lote_processando(db):
+    """Lote PROCESSANDO de outra execucao com 1 item PROCESSANDO e 1 VALIDO."""
+    BaixaTituloLote.__table__.create(bind=db.session.get_bind(), checkfirst=True)
+    BaixaTituloItem.__table__.create(bind=db.session.get_bind(), checkfirst=True)
+    lote = BaixaTituloLote(
+        nome_arquivo='baixas.xlsx', status='PROCESSANDO',
+        execucao_id='job-vivo', heartbeat_em=agora_utc_naive(),
+    )
+    db.session.add(lote)
+    db.session.flush()
+    for linha, status in ((1, 'PROCESSANDO'), (2, 'VALIDO')):
+        db.session.add(BaixaTituloItem(
+            lote_id=lote.id, linha_excel=linha, nf_excel=f'10{linha}', parcela_excel=1,
+            valor_excel=10.0, journal_excel='GRAFENO', data_excel=date(2026, 10, 19),
+            status=status, ativo=True,
+        ))
+    db.session.commit()
+    return lote
+
+
+def _status_itens(db, lote_id):
+    db.session.expire_all()
+    return {
+        i.linha_excel: i.status
+        for i in BaixaTituloItem.query.filter_by(lote_id=lote_id)
+    }
+
+
+def test_segunda_execucao_recusada_com_heartbeat_vivo(db, lote_processando):
+    lote_id = lote_processando.id
+    assert lote_em_execucao_viva(lote_processando)
+
+    executor = ExecutorLoteBaixas(lote_id, execucao_id='job-duplo')
+    assert executor.reivindicar() is False
+    with pytest.raises(LoteEmProcessamento):
+        executor.executar()
+
+    # Itens da execucao viva intocados
+    assert _status_itens(db, lote_id) == {1: 'PROCESSANDO', 2: 'VALIDO'}
+    assert db.session.get(BaixaTituloLote, lote_id).execucao_id == 'job-vivo'
+
+
+def test_retomada_com_heartbeat_vencido(db, lote_processando):
+    lote_id = lote_processando.id
+    lote_processando.heartbeat_em = agora_utc_naive() - timedelta(seconds=HEARTBEAT_VENCIDO_S + 1)
+    db.session.commit()
+    assert not lote_em_execucao_viva(lote_processando)
+
+    executor = ExecutorLoteBaixas(lote_id, execucao_id='job-retomada')
+    assert executor.reivindicar('Operador') is True
+    lote = db.session.get(BaixaTituloLote, lote_id)
+    assert (lote.execucao_id, lote.processado_por) == ('job-retomada', 'Operador')
+
+    # Sem executar Odoo: so recupera os interrompidos e libera o lote
+    assert executor._recuperar_interrompidos() == 1
+    item = BaixaTituloItem.query.filter_by(lote_id=lote_id, linha_excel=1).one()
+    assert (item.status, item.mensagem) == ('ERRO', MENSAGEM_INTERROMPIDO)
+    assert _status_itens(db, lote_id)[2] == 'VALIDO'
+
+    executor.liberar()
+    db.session.expire_all()
+    lote = db.session.get(BaixaTituloLote, lote_id)
+    assert lote.execucao_id is None and not lote_em_execucao_viva(lote)
+
+
+def test_liberar_nao_solta_lote_de_outra_execucao(db, lote_processando):
+    ExecutorLoteBaixas(lote_processando.id, execucao_id='intruso').liberar()
+    db.session.expire_all()
+    assert db.session.get(BaixaTituloLote, lote_processando.id).execucao_id == 'job-vivo'
@@ -0,0 +1,291 @@
+"""Tests da fila paralela do pipeline de inventario (fila_paralela.py).
+
+Odoo falso via XML-RPC local com latencia por chamada
+(benchmarks/odoo_fake.py) + OdooConnection real, 1 por worker. Os workers
+commitam de verdade em sessoes proprias — por isso estes testes NAO usam a
+fixture `db` (transacao externa numa conexao so'); cada teste usa um ciclo
+proprio e apaga o que criou.
+
+Cenarios:
+1. Ganho cresce com workers e o estado final e' identico ao serial
+2. Teto por company e particao serializada sao respeitados
+3. Retomada: OK pulado, FALHA re-executada, EM_EXECUCAO orfao re-executado
+   (etapa idempotente) ou INTERROMPIDO (etapa nao idempotente)
+4. executar_etapa_e(max_workers>1): 1 conexao Odoo por worker + contadores
+   iguais ao loop sequencial
+"""
+import threading
+import time
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app import db as _db
+from app.odoo.estoque.orchestrators.fila_paralela import (
+    RESULTADO_INTERROMPIDO,
+    RESULTADO_SKIP_JA_OK,
+    ExecutorFilaParalela,
+    ItemFila,
+)
+from app.odoo.models import AjusteEstoqueInventario, FilaPipelineItem
+from app.odoo.utils.connection import OdooConnection
+from benchmarks.odoo_fake import FakeOdooServer
+
+LATENCIA_S = 0.08
+COMPANIES = (1, 4, 5)
+
+
+@pytest.fixture
+def ctx(app):
+    """App context + tabelas + ciclo descartavel."""
+    ciclo = f'TEST_FILA_{uuid.uuid4().hex[:8]}'
+    with app.app_context():
+        FilaPipelineItem.__table__.create(bind=_db.engine, checkfirst=True)
+        AjusteEstoqueInventario.__table__.create(bind=_db.engine, checkfirst=True)
+        try:
+            yield app, ciclo
+        finally:
+            _db.session.rollback()
+            FilaPipelineItem.query.filter(FilaPipelineItem.ciclo.like(f'{ciclo}%')).delete(
+                synchronize_session=False
+            )
+            AjusteEstoqueInventario.query.filter(
+                AjusteEstoqueInventario.ciclo.like(f'{ciclo}%')
+            ).delete(synchronize_session=False)
+            _db.session.commit()
+
+
+def _dados_invoices(n):
+    return {'account.move': [
+        {'id': 1000 + i, 'company_id': [COMPANIES[i % 3], 'C'], 'state': 'posted', 'x_recebimento': False}
+        for i in range(n)
+    ]}
+
+
+def _itens(n):
+    return [
+        ItemFila(
+            chave=f'invoice:{1000 + i}', company_id=COMPANIES[i % 3],
+            particao=f'invoice:{1000 + i}', payload={'invoice_id': 1000 + i},
+        )
+        for i in range(n)
+    ]
+
+
+def _processar_recebimento(odoo, item):
+    """Simula o atomo de recebimento: 1 leitura + 1 escrita no Odoo."""
+    inv = item.payload['invoice_id']
+    move = odoo.search_read('account.move', [('id', '=', inv)], ['state'])[0]
+    odoo.write('account.move', [inv], {'x_recebimento': f'REC-{inv}-{move["state"]}'})
+    return {'status': 'CRIADO', 'rec_id': inv}
+
+
+def _rodar(app, ciclo, fake, itens, processar=_processar_recebimento, **kwargs):
+    fila = ExecutorFilaParalela(
+        app, ciclo=ciclo, etapa='E', processar=processar,
+        conexao_factory=lambda: OdooConnection(fake.config()), **kwargs,
+    )
+    return fila.executar(itens)
+
+
+def _estado(ciclo):
+    _db.session.expire_all()
+    return {
+        r.chave: (r.status, r.resultado_json)
+        for r in FilaPipelineItem.query.filter_by(ciclo=ciclo, etapa='E')
+    }
+
+
+# ============================================================
+# 1. Ganho com workers + estado final identico
+# ============================================================
+
+def test_ganho_cresce_com_workers_e_estado_final_igual_ao_serial(ctx):
+    app, ciclo = ctx
+    n = 12
+    tempos, estados_odoo, estados_fila = {}, {}, {}
+
+    for workers in (1, 2, 4):
+        with FakeOdooServer(_dados_invoices(n), latencia_s=LATENCIA_S) as fake:
+            t0 = time.perf_counter()
+            res = _rodar(app, f'{ciclo}_{workers}', fake, _itens(n),
+                         max_workers=workers, max_por_company=2)
+            tempos[workers] = time.perf_counter() - t0
+            estados_odoo[workers] = fake.dados['account.move']
+        assert res['ok'] == n and res['falha'] == 0
+        estados_fila[workers] = _estado(f'{ciclo}_{workers}')
+
+    assert tempos[2] < tempos[1] * 0.75
+    assert tempos[4] < tempos[2] * 0.8
+    assert estados_odoo[1] == estados_odoo[2] == estados_odoo[4]
+    assert all(m['x_recebimento'] == f'REC-{m["id"]}-posted' for m in estados_odoo[1])
+    assert estados_fila[1] == estados_fila[2] == estados_fila[4]
+    assert {s for s, _ in estados_fila[4].values()} == {'OK'}
+
+
+# ============================================================
+# 2. Teto por company + particao serializada
+# ============================================================
+
+def test_teto_por_company_e_particao_serializada(ctx):
+    app, ciclo = ctx
+    lock = threading.Lock()
+    ativos_particao = set()
+    colisoes = []
+
+    def processar(odoo, item):
+        with lock:
+            if item.particao in ativos_particao:
+                colisoes.append(item.chave)
+            ativos_particao.add(item.particao)
+        try:
+            odoo.search_read('account.move', [('id', '=', item.payload['invoice_id'])], ['id'])
+        finally:
+            with lock:
+                ativos_particao.discard(item.particao)
+        return {'status': 'CRIADO'}
+
+    # 4 itens por invoice/particao para forcar disputa
+    itens = [
+        ItemFila(chave=f'invoice:{1000 + i}:{r}', company_id=COMPANIES[i % 3],
+                 particao=f'invoice:{1000 + i}', payload={'invoice_id': 1000 + i})
+        for i in range(6) for r in range(4)
+    ]
+    with FakeOdooServer(_dados_invoices(6), latencia_s=LATENCIA_S) as fake:
+        res = _rodar(app, ciclo, fake, itens, processar=processar,
+                     max_workers=6, max_por_company=1)
+
+    assert res['ok'] == len(itens)
+    assert colisoes == []
+    assert max(res['pico_por_company'].values()) == 1
+    assert res['pico_paralelo'] <= len(COMPANIES)
+
+
+# ============================================================
+# 3. Retomada
+# ============================================================
+
+def test_retomada_pula_ok_e_reexecuta_falha_e_orfao(ctx):
+    app, ciclo = ctx
+    n = 6
+    quebrar = {'invoice:1001', 'invoice:1004'}
+
+    def processar_com_queda(odoo, item):
+        if item.chave in quebrar:
+            raise ConnectionError('Odoo caiu')
+        return _processar_recebimento(odoo, item)
+
+    with FakeOdooServer(_dados_invoices(n), latencia_s=LATENCIA_S) as fake:
+        res = _rodar(app, ciclo, fake, _itens(n), processar=processar_com_queda, max_workers=3)
+        assert (res['ok'], res['falha']) == (4, 2)
+
+        # Processo morreu no meio de invoice:1002 (ja' OK -> forca orfao)
+        FilaPipelineItem.query.filter_by(ciclo=ciclo, etapa='E', chave='invoice:1002').update(
+            {'status': 'EM_EXECUCAO'}, synchronize_session=False,
+        )
+        _db.session.commit()
+        fake.chamadas.clear()
+
+        res = _rodar(app, ciclo, fake, _itens(n), max_workers=3, reexecutar_interrompidos=True)
+
+    assert res['skip_ja_ok'] == 3
+    assert res['ok'] == 3  # 2 FALHA + 1 orfao
+    assert fake.chamadas[('account.move', 'write')] == 3
+    estado = _estado(ciclo)
+    assert {s for s, _ in estado.values()} == {'OK'}
+    assert all(m['x_recebimento'] for m in fake.dados['account.move'])
+    tentativas = {r.chave: r.tentativas for r in FilaPipelineItem.query.filter_by(ciclo=ciclo)}
+    assert tentativas['invoice:1001'] == 2 and tentativas['invoice:1000'] == 1
+    assert res['resultados']['invoice:1000']['status'] == RESULTADO_SKIP_JA_OK
+
+
+def test_orfao_em_etapa_nao_idempotente_vira_interrompido(ctx):
+    app, ciclo = ctx
+    with FakeOdooServer(_dados_invoices(3)) as fake:
+        _rodar(app, ciclo, fake, _itens(3), max_workers=2)
+        FilaPipelineItem.query.filter_by(ciclo=ciclo, chave='invoice:1001').update(
+            {'status': 'EM_EXECUCAO', 'worker': 'E-w9'}, synchronize_session=False,
+        )
+        FilaPipelineItem.query.filter_by(ciclo=ciclo, chave='invoice:1002').update(
+            {'status': 'FALHA'}, synchronize_session=False,
+        )
+        _db.session.commit()
+        fake.chamadas.clear()
+
+        res = _rodar(app, ciclo, fake, _itens(3), max_workers=2, reexecutar_interrompidos=False)
+
+    assert res['interrompidos'] == 1
+    assert res['resultados']['invoice:1001']['status'] == RESULTADO_INTERROMPIDO
+    assert res['ok'] == 1  # so' a FALHA rodou de novo
+    assert fake.chamadas[('account.move', 'write')] == 1
+    assert _estado(ciclo)['invoice:1001'][0] == 'INTERROMPIDO'
+
+
+# ============================================================
+# 4. Integracao ETAPA E
+# ============================================================
+
+def _criar_ajustes_etapa_e(ciclo, n):
+    for i in range(n):
+        _db.session.add(AjusteEstoqueInventario(
+            ciclo=ciclo, cod_produto=f'99{i:03d}', acao_decidida='PERDA_LF_FB',
+            qtd_ajuste=10.0, qtd_inventario=10.0, qtd_odoo=0.0, tipo_produto=1,
+            criado_por='test', status='EXECUTADO', fase_pipeline='F5e_SEFAZ_OK',
+            company_id=COMPANIES[i % 3], invoice_id_odoo=1000 + i,
+            chave_nfe=f'352605184674410001635500100001324510{1000 + i:08d}',
+        ))
+    _db.session.commit()
+
+
+def test_etapa_e_fila_paralela_uma_conexao_por_worker(ctx):
+    from app.odoo.estoque.orchestrators.inventario_pipeline import FaturamentoPipelineExecutor
+
+    app, ciclo = ctx
+    n = 9
+    resultados = {}
+
+    for workers in (1, 3):
+        ciclo_w = f'{ciclo}_{workers}'
+        _criar_ajustes_etapa_e(ciclo_w, n)
+        with FakeOdooServer(_dados_invoices(n), latencia_s=LATENCIA_S) as fake:
+            conexoes = []
+
+            def svc_factory(*, odoo):
+                conexoes.append(odoo)
+                svc = MagicMock()
+
+                def criar(**kw):
+                    item = ItemFila(chave='', company_id=0, particao='',
+                                    payload={'invoice_id': kw['invoice_id']})
+                    r = _processar_recebimento(odoo, item)
+                    r['ajustes'] = len(kw['ajustes'])
+                    return r
+                svc.criar_recebimento_orchestrado.side_effect = criar
+                return svc
+
+            with patch(
+                'app.odoo.estoque.scripts.escrituracao.EscrituracaoLfService',
+                side_effect=svc_factory,
+            ), patch(
+                'app.odoo.estoque.orchestrators.fila_paralela.get_odoo_connection',
+                side_effect=lambda: OdooConnection(fake.config()),
+            ):
+                executor = FaturamentoPipelineExecutor(
+                    odoo=OdooConnection(fake.config()), picking_svc=MagicMock(),
+                )
+                res = executor.executar_etapa_e(
+                    ciclo=ciclo_w, dry_run=False, max_workers=workers, max_por_company=1,
+                )
+            resultados[workers] = (res, fake.dados['account.move'], conexoes)
+
+    serial, odoo_serial, _ = resultados[1]
+    paralelo, odoo_paralelo, conexoes = resultados[3]
+    assert serial['status'] == paralelo['status'] == 'EXECUTADO_ETAPA_E'
+    assert serial['contadores'] == paralelo['contadores']
+    assert serial['invoices_ok'] == paralelo['invoices_ok']
+    assert odoo_serial == odoo_paralelo
+    # 1 EscrituracaoLfService por item, mas so' 3 conexoes (1 por worker)
+    assert len(conexoes) == n
+    assert len({id(c) for c in conexoes}) == 3
+    assert paralelo['fila']['pico_paralelo'] == 3
@@ -0,0 +1,182 @@
+"""Tests para app/utils/odoo_audit_writer.py — writer assincrono do audit hook.
+
+Cobertura:
+- flush agrupa registros em lotes de N
+- thread de fundo drena sem flush explicito
+- falha do DB -> spill JSONL em disco
+- proximo flush OK reprocessa o spill (datetime preservado)
+- fila cheia -> spill direto, sem bloquear o caller
+- enfileirar_chamada_odoo respeita flag/whitelist e usa o writer
+"""
+import os
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.utils import odoo_audit_writer as writer_mod
+from app.utils.odoo_audit_helpers import enfileirar_chamada_odoo
+from app.utils.odoo_audit_writer import OdooAuditWriter
+
+
+class _DbStub:
+    """Substitui o INSERT real; `falhar=True` simula banco indisponivel."""
+
+    def __init__(self):
+        self.lotes = []
+        self.falhar = False
+
+    def __call__(self, registros):
+        if self.falhar:
+            raise ConnectionError('db down')
+        self.lotes.append(list(registros))
+
+    @property
+    def registros(self):
+        return [r for lote in self.lotes for r in lote]
+
+
+def _registro(i):
+    return {
+        'external_id': f'aud:test:{i}',
+        'status': 'EXECUTADO',
+        'executado_em': datetime(2026, 5, 28, 10, 0, i % 60),
+        'payload_json': {'args': [[i]]},
+    }
+
+
+@pytest.fixture
+def stub():
+    return _DbStub()
+
+
+@pytest.fixture
+def writer(stub, tmp_path):
+    w = OdooAuditWriter(
+        inserir=stub, max_fila=50, lote=10, intervalo_ms=20,
+        spill_dir=str(tmp_path / 'spill'),
+    )
+    yield w
+    w._parar.set()
+
+
+def test_flush_agrupa_em_lotes(writer, stub):
+    for i in range(25):
+        writer._fila.put_nowait(_registro(i))
+    assert writer.flush() == 25
+    assert [len(l) for l in stub.lotes] == [10, 10, 5]
+    assert writer.status()['pendentes'] == 0
+
+
+def test_thread_drena_sem_flush_explicito(writer, stub):
+    for i in range(3):
+        writer.enfileirar(_registro(i))
+    prazo = time.monotonic() + 2
+    while len(stub.registros) < 3 and time.monotonic() < prazo:
+        time.sleep(0.01)
+    assert len(stub.registros) == 3
+
+
+def test_falha_db_faz_spill_e_reprocessa(writer, stub):
+    stub.falhar = True
+    for i in range(12):
+        writer._fila.put_nowait(_registro(i))
+    assert writer.flush() == 0
+    assert len(writer.arquivos_spill()) == 1
+    assert writer.stats['spill_registros'] == 12
+
+    stub.falhar = False
+    writer._fila.put_nowait(_registro(99))
+    writer.flush()
+    assert writer.arquivos_spill() == []
+    ids = {r['external_id'] for r in stub.registros}
+    assert ids == {f'aud:test:{i}' for i in list(range(12)) + [99]}
+    # datetime sobrevive ao round-trip JSONL
+    assert all(isinstance(r['executado_em'], datetime) for r in stub.registros)
+
+
+def test_fila_cheia_faz_spill_direto(stub, tmp_path):
+    w = OdooAuditWriter(
+        inserir=stub, max_fila=2, lote=10, intervalo_ms=10_000,
+        spill_dir=str(tmp_path / 'spill'),
+    )
+    with patch.object(w, '_garantir_thread'):
+        for i in range(5):
+            w.enfileirar(_registro(i))
+    assert w.status()['pendentes'] == 2
+    assert w.stats['spill_registros'] == 3
+
+
+def test_enfileirar_chamada_respeita_whitelist_e_usa_writer(writer, stub):
+    with patch.object(writer_mod, 'get_audit_writer', return_value=writer), \
+            patch.dict(os.environ, {
+                'AGENT_ODOO_AUDIT_HOOK': 'true',
+                'AGENT_ODOO_AUDIT_ASYNC': 'true',
+                'AGENT_SESSION_ID': 'sid-writer-001',
+            }):
+        enfileirar_chamada_odoo(
+            model='stock.quant', method='read', args=[[1]], kwargs={},
+            resultado=[], tempo_ms=5,
+        )
+        enfileirar_chamada_odoo(
+            model='stock.quant', method='write',
+            args=[[321], {'inventory_quantity': 1.0}], kwargs={},
+            resultado=True, tempo_ms=7,
+        )
+    writer.flush()
+    assert len(stub.registros) == 1
+    reg = stub.registros[0]
+    assert reg['metodo_odoo'] == 'write'
+    assert reg['odoo_id'] == 321
+    assert reg['session_id'] == 'sid-writer-001'
+    assert reg['status'] == 'EXECUTADO'
+
+
+def test_enfileirar_chamada_flag_off_nao_enfileira(writer, stub):
+    with patch.object(writer_mod, 'get_audit_writer', return_value=writer), \
+            patch.dict(os.environ, {'AGENT_ODOO_AUDIT_HOOK': 'false'}):
+        enfileirar_chamada_odoo(
+            model='stock.quant', method='write', args=[[1], {}], kwargs={},
+            resultado=True, tempo_ms=1,
+        )
+    writer.flush()
+    assert stub.registros == []
+
+
+def test_job_rq_sem_flush_no_fim_grava_sincrono(writer, stub):
+    """Work-horse do RQ sai com os._exit: sem flush no fim do job, nao enfileira."""
+    with patch.object(writer_mod, 'get_audit_writer', return_value=writer), \
+            patch.object(writer_mod, '_em_job_rq', return_value=True), \
+            patch.object(writer_mod, '_flush_por_job', False), \
+            patch('app.utils.odoo_audit_helpers.registrar_chamada_odoo') as sincrono, \
+            patch.dict(os.environ, {'AGENT_ODOO_AUDIT_HOOK': 'true', 'AGENT_ODOO_AUDIT_ASYNC': 'true'}):
+        assert writer_mod.modo_async_ativo() is False
+        enfileirar_chamada_odoo(
+            model='stock.quant', method='write', args=[[1], {}], kwargs={},
+            resultado=True, tempo_ms=1,
+        )
+    assert sincrono.call_count == 1
+    assert writer.stats['enfileirados'] == 0
+
+
+def test_job_rq_com_flush_por_job_usa_writer_e_flush_pendentes_grava(writer, stub):
+    with patch.object(writer_mod, '_writer', writer), \
+            patch.object(writer_mod, '_em_job_rq', return_value=True), \
+            patch.object(writer_mod, '_flush_por_job', True), \
+            patch.dict(os.environ, {'AGENT_ODOO_AUDIT_HOOK': 'true', 'AGENT_ODOO_AUDIT_ASYNC': 'true'}):
+        writer._pid = os.getpid()
+        assert writer_mod.modo_async_ativo() is True
+        with patch.object(writer, '_garantir_thread'):
+            enfileirar_chamada_odoo(
+                model='stock.quant', method='write', args=[[1], {}], kwargs={},
+                resultado=True, tempo_ms=1,
+            )
+        assert stub.registros == []
+        assert writer_mod.flush_pendentes() == 1
+    assert len(stub.registros) == 1
+
+
+def test_kill_switch_async(writer, stub):
+    with patch.dict(os.environ, {'AGENT_ODOO_AUDIT_ASYNC': 'false'}):
+        assert writer_mod.modo_async_ativo() is False
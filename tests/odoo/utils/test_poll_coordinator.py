@@ -0,0 +1,195 @@
+"""
+Testes do coordenador de fire-and-poll (app/odoo/utils/poll_coordinator.py).
+
+Sem Odoo: conexao fake + executar_tick() com relogio explicito (sem thread).
+"""
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from app.odoo.utils.poll_coordinator import (
+    CoordenadorPollingOdoo,
+    EsperaOdoo,
+    avaliar_dominio,
+    combinar_dominios_or,
+    primeiro_m2o,
+)
+
+
+class FakeOdoo:
+    def __init__(self, registros):
+        self.registros = registros
+        self.chamadas = []
+
+    def search_read(self, model, domain, fields=None):
+        self.chamadas.append((model, domain, fields))
+        return [
+            {k: v for k, v in r.items() if not fields or k in fields or k == 'id'}
+            for r in self.registros.get(model, []) if avaliar_dominio(domain, r)
+        ]
+
+
+def _coordenador(fake):
+    return CoordenadorPollingOdoo(
+        connection_factory=lambda: fake, intervalo_min_s=1, intervalo_max_s=8,
+        fator=2, iniciar_thread=False,
+    )
+
+
+class TestDominio:
+    REG = {'id': 5, 'purchase_id': [9, 'PO/9'], 'ref': 'LF/OUT/1', 'state': 'posted',
+           'invoice_ids': [11, 12, 13], 'l10n_br_status': '04'}
+
+    @pytest.mark.parametrize('dominio,esperado', [
+        ([['purchase_id', '!=', False]], True),
+        ([['purchase_id', '=', 9]], True),
+        ([['purchase_id', 'ilike', 'po/']], True),
+        ([['state', '!=', 'cancel'], ['ref', '=', 'X']], False),
+        (['|', ['ref', '=', 'X'], ['ref', 'ilike', 'out/1']], True),
+        (['!', ['id', 'in', [5, 6]]], False),
+        ([['invoice_ids', 'in', [13]]], True),
+        ([['l10n_br_status', 'in', ['03', '04', '05']]], True),
+        ([['id', '>=', 6]], False),
+    ])
+    def test_avaliacao_em_memoria(self, dominio, esperado):
+        assert avaliar_dominio(dominio, self.REG) is esperado
+
+    def test_combinar_or_normaliza_and_implicito(self):
+        combinado = combinar_dominios_or([[['a', '=', 1], ['b', '=', 2]], [['c', '=', 3]]])
+        assert combinado == ['|', '&', ['a', '=', 1], ['b', '=', 2], ['c', '=', 3]]
+
+
+def test_esperas_do_mesmo_model_viram_um_search_read():
+    fake = FakeOdoo({'l10n_br_ciel_it_account.dfe': [
+        {'id': 1, 'purchase_id': False}, {'id': 2, 'purchase_id': False},
+    ]})
+    coord = _coordenador(fake)
+    futuros = {
+        dfe: coord.aguardar(EsperaOdoo(
+            'l10n_br_ciel_it_account.dfe', [['id', '=', dfe], ['purchase_id', '!=', False]],
+            fields=['purchase_id'], predicado=primeiro_m2o('purchase_id'),
+        ), timeout_s=100)
+        for dfe in (1, 2)
+    }
+
+    assert coord.executar_tick(agora=coord._pendentes[0].registrado_em + 1) == 1
+    assert coord.pendentes() == 2
+
+    fake.registros['l10n_br_ciel_it_account.dfe'][1]['purchase_id'] = [77, 'PO/77']
+    t = coord._pendentes[0].registrado_em
+    assert coord.executar_tick(agora=t + 3) == 1
+    assert futuros[2].result(timeout=0) == 77
+    assert not futuros[1].done()
+    assert len(fake.chamadas) == 2
+    assert fake.chamadas[-1][1][0] == '|'
+
+
+def test_intervalo_adaptativo_e_timeout():
+    fake = FakeOdoo({'account.move': []})
+    coord = _coordenador(fake)
+    resultados = []
+    futuro = coord.aguardar(
+        EsperaOdoo('account.move', [['ref', '=', 'X']]), timeout_s=20,
+        callback=lambda res, erro: resultados.append((res, erro)),
+    )
+    t0 = coord._pendentes[0].registrado_em
+
+    assert coord.executar_tick(agora=t0 + 1) == 1     # intervalo 1 -> 2
+    assert coord.executar_tick(agora=t0 + 2) == 0     # ainda nao venceu
+    assert coord.executar_tick(agora=t0 + 3) == 1     # 2 -> 4
+    assert coord._pendentes[0].intervalo == 4
+
+    coord.executar_tick(agora=t0 + 21)
+    with pytest.raises(TimeoutError):
+        futuro.result(timeout=0)
+    assert isinstance(resultados[0][1], TimeoutError)
+    assert coord.pendentes() == 0
+
+
+def test_erro_de_conexao_reagenda_e_reconecta():
+    fake = FakeOdoo({'account.move': [{'id': 3, 'ref': 'X'}]})
+    conexoes = []
+
+    def factory():
+        conexoes.append(1)
+        if len(conexoes) == 1:
+            raise ConnectionError('SSL')
+        return fake
+
+    coord = CoordenadorPollingOdoo(connection_factory=factory, intervalo_min_s=1,
+                                   iniciar_thread=False)
+    futuro = coord.aguardar(EsperaOdoo('account.move', [['ref', '=', 'X']]), timeout_s=50)
+    t0 = coord._pendentes[0].registrado_em
+
+    coord.executar_tick(agora=t0 + 1)
+    assert not futuro.done()
+    coord.executar_tick(agora=t0 + 10)
+    assert futuro.result(timeout=0) == 3
+    assert len(conexoes) == 2
+
+
+def test_thread_resolve_future():
+    fake = FakeOdoo({'account.move': [{'id': 8, 'ref': 'X'}]})
+    coord = CoordenadorPollingOdoo(connection_factory=lambda: fake, intervalo_min_s=0.01)
+    try:
+        futuro = coord.aguardar(EsperaOdoo('account.move', [['ref', '=', 'X']]), timeout_s=5)
+        try:
+            assert futuro.result(timeout=2) == 8
+        except FutureTimeoutError:
+            pytest.fail('poller nao resolveu a espera')
+    finally:
+        coord.parar()
+
+
+def test_aguardar_odoo_encerra_quando_coordenador_expira(monkeypatch):
+    """Timeout do coordenador e' final: cai no poll_fn em vez de girar no loop."""
+    import threading
+
+    from app.odoo.utils import poll_coordinator
+
+    coord = CoordenadorPollingOdoo(
+        connection_factory=lambda: FakeOdoo({'account.move': []}), intervalo_min_s=0.02,
+    )
+    monkeypatch.setattr(poll_coordinator, 'ENABLED', True)
+    monkeypatch.setattr(poll_coordinator, '_coordenador', coord)
+    esperas = []
+    retorno = []
+
+    def _executar():
+        retorno.append(poll_coordinator.aguardar_odoo(
+            EsperaOdoo('account.move', [['ref', '=', 'X']]), timeout_s=0.3, intervalo_s=0.05,
+            poll_fn=lambda: 'fallback', ao_aguardar=esperas.append,
+        ))
+
+    try:
+        thread = threading.Thread(target=_executar, daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+        assert not thread.is_alive(), 'aguardar_odoo nao retornou apos o timeout do coordenador'
+    finally:
+        coord.parar()
+
+    assert retorno == ['fallback']
+    assert len(esperas) < 20
+
+
+def test_aguardar_odoo_propaga_erro_do_predicado(monkeypatch):
+    from app.odoo.utils import poll_coordinator
+
+    def _predicado(registros):
+        raise ValueError('predicado quebrou')
+
+    coord = CoordenadorPollingOdoo(
+        connection_factory=lambda: FakeOdoo({'account.move': [{'id': 1, 'ref': 'X'}]}),
+        intervalo_min_s=0.02,
+    )
+    monkeypatch.setattr(poll_coordinator, 'ENABLED', True)
+    monkeypatch.setattr(poll_coordinator, '_coordenador', coord)
+    try:
+        with pytest.raises(ValueError):
+            poll_coordinator.aguardar_odoo(
+                EsperaOdoo('account.move', [['ref', '=', 'X']], predicado=_predicado),
+                timeout_s=2, intervalo_s=0.05,
+            )
+    finally:
+        coord.parar()
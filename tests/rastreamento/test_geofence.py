@@ -0,0 +1,231 @@
+"""Testes do motor de geofence (geofence_service) contra a regra atual de proximidade.
+
+Tracos de pings sinteticos e deterministicos (seed fixa), sem banco.
+"""
+import math
+import random
+
+from app.rastreamento.services.geofence_service import (
+    ENTRADA, PERMANENCIA, SAIDA, STATUS_CANDIDATOS, CercaEntrega, EstadosGeofence, MotorGeofence,
+)
+from app.rastreamento.services.gps_service import GPSService
+
+CERCAS = [
+    CercaEntrega(1, -23.5500, -46.6300),
+    CercaEntrega(2, -23.5520, -46.6310),  # ~240m da 1: raios se cruzam
+    CercaEntrega(3, -22.9000, -43.2000),  # outra cidade
+]
+METROS_POR_GRAU = 111195.0
+
+
+def _ponto(cerca, distancia, angulo=0.0):
+    dlat = distancia * math.cos(angulo) / METROS_POR_GRAU
+    dlon = distancia * math.sin(angulo) / (METROS_POR_GRAU * math.cos(math.radians(cerca.latitude)))
+    return cerca.latitude + dlat, cerca.longitude + dlon
+
+
+def _regra_atual(lat, lon, cercas):
+    """Loop de detectar_entrega_proxima antes do motor: haversine <= 200 por ping."""
+    dentro = set()
+    for c in cercas:
+        d = GPSService.calcular_distancia((lat, lon), (c.latitude, c.longitude), 'metros')
+        if d is not None and d <= c.raio_metros:
+            dentro.add(c.entrega_id)
+    return dentro
+
+
+def _traco(seed=7, n=600):
+    """Caminhao vagando em volta das cercas 1 e 2, com passagens pela borda."""
+    rnd = random.Random(seed)
+    pontos = []
+    for i in range(n):
+        cerca = CERCAS[i // 50 % 2]
+        distancia = rnd.choice([rnd.uniform(0, 400), rnd.uniform(195, 205), 200.0])
+        pontos.append((*_ponto(cerca, distancia, rnd.uniform(0, 2 * math.pi)), i * 30.0))
+    return pontos
+
+
+def test_sem_histerese_igual_a_regra_atual_ping_a_ping():
+    motor = MotorGeofence(histerese_metros=0, permanencia_s=None)
+    motor.sincronizar(10, CERCAS)
+
+    for lat, lon, ts in _traco():
+        dentro, _ = motor.processar(10, lat, lon, ts)
+        assert {eid for eid, _d in dentro} == _regra_atual(lat, lon, CERCAS)
+
+
+def test_com_histerese_entrada_coincide_com_a_regra_atual():
+    traco = _traco(seed=11)
+    motor = MotorGeofence(histerese_metros=50, permanencia_s=None)
+    motor.sincronizar(10, CERCAS)
+
+    primeira_legado, primeira_motor = {}, {}
+    for i, (lat, lon, ts) in enumerate(traco):
+        for eid in _regra_atual(lat, lon, CERCAS):
+            primeira_legado.setdefault(eid, i)
+        _, eventos = motor.processar(10, lat, lon, ts)
+        for ev in eventos:
+            if ev.tipo == ENTRADA:
+                primeira_motor.setdefault(ev.entrega_id, i)
+
+    # Momento em que a entrega vira PROXIMO e identico
+    assert primeira_motor == primeira_legado and primeira_motor
+
+
+def test_borda_nao_fica_piscando():
+    cerca = CERCAS[0]
+    motor = MotorGeofence(histerese_metros=50, permanencia_s=None)
+    motor.sincronizar(10, [cerca])
+
+    eventos = []
+    for i, distancia in enumerate([300, 195, 205, 198, 230, 199, 240]):
+        _, evs = motor.processar(10, *_ponto(cerca, distancia), i * 30.0)
+        eventos += [e.tipo for e in evs]
+    assert eventos == [ENTRADA]
+
+    dentro, evs = motor.processar(10, *_ponto(cerca, 260), 300.0)
+    assert dentro == [] and [e.tipo for e in evs] == [SAIDA]
+
+
+def test_saida_quando_some_da_grade():
+    motor = MotorGeofence(histerese_metros=50, permanencia_s=None)
+    motor.sincronizar(10, CERCAS[:1])
+    motor.processar(10, *_ponto(CERCAS[0], 10), 0.0)
+
+    dentro, evs = motor.processar(10, *_ponto(CERCAS[0], 5000), 30.0)
+    assert dentro == [] and [(e.tipo, e.entrega_id) for e in evs] == [(SAIDA, 1)]
+
+
+def test_permanencia_emitida_uma_vez():
+    motor = MotorGeofence(histerese_metros=50, permanencia_s=300)
+    motor.sincronizar(10, CERCAS[:1])
+
+    tipos = []
+    for i in range(20):
+        _, evs = motor.processar(10, *_ponto(CERCAS[0], 50), i * 60.0)
+        tipos += [(e.tipo, e.timestamp) for e in evs]
+    assert tipos == [(ENTRADA, 0.0), (PERMANENCIA, 300.0)]
+
+
+def test_lote_de_varios_rastreamentos_igual_a_processar_um_a_um():
+    traco_a, traco_b = _traco(seed=1, n=120), _traco(seed=2, n=120)
+    sequencial = MotorGeofence(histerese_metros=50, permanencia_s=120)
+    em_lote = MotorGeofence(histerese_metros=50, permanencia_s=120)
+    for motor in (sequencial, em_lote):
+        motor.sincronizar(1, CERCAS)
+        motor.sincronizar(2, CERCAS[:2])
+
+    pings = []
+    for a, b in zip(traco_a, traco_b):
+        pings += [(1, *a), (2, *b)]
+
+    esperado = [sequencial.processar(*p) for p in pings]
+    assert em_lote.processar_lote(pings) == esperado
+
+
+def test_rastreamento_sem_cercas_ou_desconhecido():
+    motor = MotorGeofence()
+    motor.sincronizar(10, [])
+
+    assert motor.processar(10, -23.55, -46.63, 0.0) == ([], [])
+    assert motor.processar(99, -23.55, -46.63, 0.0) == ([], [])
+
+
+def test_sincronizar_preserva_estado_das_cercas_mantidas():
+    motor = MotorGeofence(histerese_metros=50, permanencia_s=None)
+    motor.sincronizar(10, CERCAS[:1])
+    motor.processar(10, *_ponto(CERCAS[0], 190), 0.0)
+
+    motor.sincronizar(10, [CERCAS[0], CERCAS[2]])  # entrou uma nova entrega
+    dentro, evs = motor.processar(10, *_ponto(CERCAS[0], 220), 30.0)
+
+    assert [eid for eid, _d in dentro] == [1] and evs == []
+
+
+class _RedisFake:
+    def __init__(self):
+        self.dados = {}
+
+    def mget(self, chaves):
+        return [self.dados.get(c) for c in chaves]
+
+    def setex(self, chave, ttl, valor):
+        self.dados[chave] = valor
+
+    def delete(self, *chaves):
+        for c in chaves:
+            self.dados.pop(c, None)
+
+    def pipeline(self, transaction=False):
+        return _PipelineFake(self)
+
+
+class _PipelineFake:
+    def __init__(self, redis):
+        self.redis, self.comandos = redis, []
+
+    def setex(self, *args):
+        self.comandos.append(args)
+
+    def execute(self):
+        for args in self.comandos:
+            self.redis.setex(*args)
+
+
+def _worker(redis):
+    motor = MotorGeofence(
+        histerese_metros=50, permanencia_s=None, estados=EstadosGeofence(redis=lambda: redis),
+    )
+    motor.sincronizar(10, CERCAS[:1])
+    return motor
+
+
+def test_estado_compartilhado_entre_workers_via_redis():
+    redis = _RedisFake()
+    worker_a, worker_b = _worker(redis), _worker(redis)
+
+    _, evs = worker_a.processar(10, *_ponto(CERCAS[0], 190), 0.0)
+    assert [e.tipo for e in evs] == [ENTRADA]
+
+    # Borda (220m): dentro da histerese so porque B enxerga a ENTRADA de A
+    dentro, evs = worker_b.processar(10, *_ponto(CERCAS[0], 220), 30.0)
+    assert [eid for eid, _d in dentro] == [1] and evs == []
+
+    _, evs = worker_a.processar(10, *_ponto(CERCAS[0], 260), 60.0)
+    assert [e.tipo for e in evs] == [SAIDA]
+    assert list(redis.dados) == ['rastreamento:geofence:10']
+
+    worker_b.remover(10)
+    assert redis.dados == {}
+
+
+def test_redis_fora_do_ar_cai_para_memoria():
+    class _RedisQuebrado:
+        def mget(self, chaves):
+            raise ConnectionError('redis fora')
+
+        def pipeline(self, transaction=False):
+            raise ConnectionError('redis fora')
+
+    motor = MotorGeofence(
+        histerese_metros=50, permanencia_s=None,
+        estados=EstadosGeofence(redis=lambda: _RedisQuebrado()),
+    )
+    motor.sincronizar(10, CERCAS[:1])
+    motor.processar(10, *_ponto(CERCAS[0], 190), 0.0)
+
+    dentro, evs = motor.processar(10, *_ponto(CERCAS[0], 220), 30.0)
+    assert [eid for eid, _d in dentro] == [1] and evs == []
+
+
+def test_entrega_proximo_continua_candidata():
+    """PENDENTE -> PROXIMO na ENTRADA: se saisse das cercas, a histerese nunca valeria."""
+    assert {'PENDENTE', 'EM_ROTA', 'PROXIMO'} <= set(STATUS_CANDIDATOS)
+
+    motor = MotorGeofence(histerese_metros=50, permanencia_s=None)
+    motor.sincronizar(10, CERCAS[:1])
+    motor.processar(10, *_ponto(CERCAS[0], 150), 0.0)
+    motor.sincronizar(10, CERCAS[:1])  # proxima consulta: mesma entrega, agora PROXIMO
+
+    dentro, evs = motor.processar(10, *_ponto(CERCAS[0], 230), 30.0)
+    assert [eid for eid, _d in dentro] == [1] and evs == []
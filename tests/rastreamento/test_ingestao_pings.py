@@ -0,0 +1,107 @@
+"""Testes da ingestao em lote e da compactacao de trajetoria (ingestao_pings_service).
+
+Funcoes puras: sem banco, so listas de pontos sinteticos.
+"""
+from datetime import datetime
+
+from app.rastreamento.services.ingestao_pings_service import (
+    dividir_por_lacunas,
+    normalizar_pings,
+    simplificar_trajetoria,
+)
+
+AGORA = datetime(2026, 10, 19, 12, 0, 0)
+
+# ~0.0001 grau de latitude = ~11m
+PASSO = 0.0001
+
+
+def _reta(n, intervalo_s=30, lat0=-23.5, lon0=-46.6):
+    return [(lat0 + i * PASSO, lon0, 1_000_000 + i * intervalo_s) for i in range(n)]
+
+
+# ============================================================
+# simplificar_trajetoria
+# ============================================================
+
+def test_reta_curta_vira_so_as_pontas():
+    pontos = _reta(10)  # 270s, abaixo do max_intervalo
+    assert simplificar_trajetoria(pontos, tolerancia_metros=5, max_intervalo_s=300) == [0, 9]
+
+
+def test_reta_longa_no_tempo_mantem_pontos_intermediarios():
+    pontos = _reta(100)  # 2970s parado/reto
+    indices = simplificar_trajetoria(pontos, tolerancia_metros=5, max_intervalo_s=300)
+
+    assert indices[0] == 0 and indices[-1] == 99
+    assert len(indices) < 100
+    intervalos = [pontos[b][2] - pontos[a][2] for a, b in zip(indices, indices[1:])]
+    assert max(intervalos) <= 300
+
+
+def test_esquina_e_preservada():
+    ida = _reta(10)
+    ultimo_lat = ida[-1][0]
+    volta = [(ultimo_lat, -46.6 + i * PASSO, ida[-1][2] + i * 30) for i in range(1, 10)]
+    indices = simplificar_trajetoria(ida + volta, tolerancia_metros=5, max_intervalo_s=10_000)
+
+    assert indices == [0, 9, 18]
+
+
+def test_poucos_pontos_nao_simplifica():
+    assert simplificar_trajetoria([]) == []
+    assert simplificar_trajetoria(_reta(2)) == [0, 1]
+
+
+def test_dividir_por_lacunas():
+    pontos = _reta(3) + [(-23.5, -46.6, 1_000_000 + 60 + 4000)]
+    trechos = dividir_por_lacunas(pontos, gap_s=1800)
+
+    assert [len(t) for t in trechos] == [3, 1]
+    assert dividir_por_lacunas([], 1800) == []
+
+
+# ============================================================
+# normalizar_pings
+# ============================================================
+
+def _ping(lat=-23.5, lon=-46.6, **extra):
+    return {'latitude': lat, 'longitude': lon, **extra}
+
+
+def test_normalizar_ordena_por_timestamp_do_dispositivo():
+    brutos = [
+        _ping(timestamp='2026-10-19T11:58:00'),
+        _ping(),  # sem timestamp -> fim, horario do servidor
+        _ping(timestamp='2026-10-19T11:50:00'),
+    ]
+    validos, rejeitados = normalizar_pings(brutos, AGORA)
+
+    assert rejeitados == 0
+    assert [p['criado_em'] for p in validos] == [
+        datetime(2026, 10, 19, 11, 50), datetime(2026, 10, 19, 11, 58), AGORA,
+    ]
+    assert validos[-1]['timestamp_dispositivo'] is None
+
+
+def test_normalizar_rejeita_invalidos():
+    brutos = [
+        _ping(lat=200),
+        _ping(timestamp='ontem'),
+        'nao e dict',
+        _ping(lat=None),
+        _ping(),
+    ]
+    validos, rejeitados = normalizar_pings(brutos, AGORA)
+
+    assert len(validos) == 1 and rejeitados == 4
+
+
+def test_normalizar_timezone_e_futuro():
+    validos, _ = normalizar_pings([
+        _ping(timestamp='2026-10-19T08:30:00-03:00'),
+        _ping(timestamp='2026-10-19T13:00:00Z'),  # relogio adiantado
+    ], AGORA)
+
+    assert validos[0]['criado_em'] == datetime(2026, 10, 19, 11, 30)
+    assert validos[1]['criado_em'] == AGORA
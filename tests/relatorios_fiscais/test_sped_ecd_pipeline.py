@@ -0,0 +1,275 @@
+"""Testes do pipeline do SPED ECD (sped_ecd_pipeline + cache de saldos mensais).
+
+Sem Odoo/S3/Redis: conexao falsa que responde read_group por faixa de data,
+bucket multipart em memoria e dict no lugar do Redis.
+"""
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from app.relatorios_fiscais.services import sped_ecd_data
+from app.relatorios_fiscais.services.sped_ecd_pipeline import (
+    ExecutorOdoo,
+    SaidaMultipartS3,
+    prefetch,
+)
+
+
+# ============================================================
+# prefetch
+# ============================================================
+
+def test_prefetch_busca_a_frente_e_preserva_ordem():
+    produzidos = []
+
+    def fonte():
+        for i in range(10):
+            produzidos.append(i)
+            yield i
+
+    it = prefetch(fonte(), profundidade=3)
+    for _ in range(100):  # produtor enche a fila sem ninguem consumir
+        if len(produzidos) >= 3:
+            break
+        time.sleep(0.01)
+
+    assert 3 <= len(produzidos) <= 5  # limitado pela fila (+1 em maos +1 no put)
+    assert list(it) == list(range(10))
+
+
+def test_prefetch_repassa_excecao_da_fonte():
+    def fonte():
+        yield 1
+        raise ValueError('odoo caiu')
+
+    it = prefetch(fonte(), profundidade=5)
+    assert next(it) == 1
+    with pytest.raises(ValueError, match='odoo caiu'):
+        next(it)
+
+
+def test_prefetch_fechado_antes_de_consumir_para_o_produtor():
+    fechou = threading.Event()
+
+    def fonte():
+        try:
+            while True:
+                yield 1
+        finally:
+            fechou.set()
+
+    it = prefetch(fonte(), profundidade=2)
+    it.close()
+    assert fechou.wait(2)
+    assert list(it) == []
+
+
+def test_executor_sem_workers_e_sincrono():
+    conn = object()
+    with ExecutorOdoo(conn, workers=0) as ex:
+        futuro = ex.submit(lambda c, x: (c, x), 7)
+        assert futuro.done() and futuro.result() == (conn, 7)
+        assert not ex.paralelo
+
+        def gen(c, n):
+            yield from range(n)
+        assert list(ex.prefetch(gen, 3)) == [0, 1, 2]
+
+
+# ============================================================
+# Saldos mensais: paralelo + cache
+# ============================================================
+
+class _OdooFalso:
+    """read_group de account.move.line: conta 10 movimenta 100/mes, conta 20 so saldo."""
+
+    def __init__(self):
+        self.chamadas = 0
+        self.chamadas_watermark = 0
+        self.threads = set()
+        self._lock = threading.Lock()
+        # read_group por date:month do watermark: {'AAAA-MM': (count, write_date max)}
+        self.linhas_por_mes = {
+            f'2024-{m:02d}': (30, f'2024-{m:02d}-28 10:00:00') for m in range(1, 7)
+        }
+
+    def execute_kw(self, model, method, args, kwargs=None, timeout_override=None):
+        if (kwargs or {}).get('groupby') == ['date:month']:
+            self.chamadas_watermark += 1
+            if self.linhas_por_mes is None:
+                raise ConnectionError('Odoo fora')
+            return [
+                {'__count': n, 'write_date': wd, 'id': 1000 + n,
+                 '__range': {'date:month': {'from': f'{mes}-01', 'to': '...'}}}
+                for mes, (n, wd) in self.linhas_por_mes.items()
+            ]
+        with self._lock:
+            self.chamadas += 1
+            self.threads.add(threading.get_ident())
+        time.sleep(0.01)
+        datas = {op: valor for campo, op, valor in args[0] if campo == 'date'}
+        if '<' in datas:  # saldo acumulado ate o inicio do mes
+            meses = int(datas['<'][5:7]) - 1
+            return [
+                {'account_id': [10, 'x'], 'balance': 100.0 * meses},
+                {'account_id': [20, 'y'], 'balance': 50.0},
+            ]
+        return [{'account_id': [10, 'x'], 'debit': 100.0, 'credit': 0.0, 'balance': 100.0}]
+
+
+class _RedisFalso:
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, chave):
+        return self.dados.get(chave)
+
+    def setex(self, chave, ttl, valor):
+        self.dados[chave] = valor
+
+
+@pytest.fixture
+def redis_falso(monkeypatch):
+    redis = _RedisFalso()
+    monkeypatch.setattr(sped_ecd_data, '_saldos_cache_redis', lambda: redis)
+    return redis
+
+
+ID_TO_CODE = {10: '1.1.01', 20: '1.1.02'}
+
+
+def _saldos(conn, ini=date(2024, 1, 1), fim=date(2024, 6, 30), **kw):
+    return sped_ecd_data.calcular_saldos_periodicos_mensais(conn, ini, fim, ID_TO_CODE, **kw)
+
+
+def test_saldos_mensais_paralelo_igual_ao_serial(redis_falso):
+    serial = _saldos(_OdooFalso(), usar_cache=False)
+
+    conn = _OdooFalso()
+    with ExecutorOdoo(conn, workers=4) as ex:
+        paralelo = _saldos(conn, executor=ex, usar_cache=False)
+
+    assert paralelo == serial
+    assert conn.chamadas == 12 and len(conn.threads) > 1
+    assert serial['2024-03']['por_code']['1.1.01'] == {
+        'saldo_inicial': 200.0, 'debit': 100.0, 'credit': 0.0, 'saldo_final': 300.0,
+    }
+    assert serial['2024-03']['por_code']['1.1.02']['saldo_final'] == 50.0
+    assert redis_falso.dados == {}  # usar_cache=False nao grava
+
+
+def test_saldos_mensais_reaproveita_meses_fechados(redis_falso):
+    primeira = _saldos(_OdooFalso())
+    assert len(redis_falso.dados) == 6
+
+    conn = _OdooFalso()
+    assert _saldos(conn) == primeira
+    assert conn.chamadas == 0
+
+    # Outro escopo de companies nao compartilha cache
+    _saldos(conn, companies=[1])
+    assert conn.chamadas == 12
+
+
+def test_saldos_mensais_lancamento_retroativo_invalida_mes_e_seguintes(redis_falso):
+    _saldos(_OdooFalso())
+
+    conn = _OdooFalso()
+    conn.linhas_por_mes['2024-03'] = (31, '2024-10-19 09:00:00')  # estorno retroativo
+    _saldos(conn)
+
+    # jan/fev do cache; mar..jun (saldo inicial acumulado) relidos e regravados
+    assert conn.chamadas == 8
+    assert conn.chamadas_watermark == 1
+
+    conn = _OdooFalso()
+    conn.linhas_por_mes['2024-03'] = (31, '2024-10-19 09:00:00')
+    _saldos(conn)
+    assert conn.chamadas == 0
+
+
+def test_saldos_mensais_sem_watermark_nao_usa_cache(redis_falso):
+    _saldos(_OdooFalso())
+
+    conn = _OdooFalso()
+    conn.linhas_por_mes = None
+    _saldos(conn)
+
+    assert conn.chamadas == 12
+
+
+def test_saldos_mensais_mes_aberto_nao_e_cacheado(redis_falso):
+    conn = _OdooFalso()
+    _saldos(conn, ini=date(2099, 1, 1), fim=date(2099, 1, 31))
+    _saldos(conn, ini=date(2099, 1, 1), fim=date(2099, 1, 31))
+
+    assert redis_falso.dados == {}
+    assert conn.chamadas == 4
+    assert conn.chamadas_watermark == 0
+
+
+# ============================================================
+# SaidaMultipartS3
+# ============================================================
+
+class _S3Multipart:
+    def __init__(self, falhar_na_parte=None):
+        self.partes = {}
+        self.objetos = {}
+        self.abortados = []
+        self.falhar_na_parte = falhar_na_parte
+
+    def create_multipart_upload(self, Bucket, Key, **extra):
+        self.extra = extra
+        return {'UploadId': 'up1'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.falhar_na_parte:
+            raise RuntimeError('S3 fora')
+        self.partes[PartNumber] = Body
+        return {'ETag': f'"e{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        numeros = [p['PartNumber'] for p in MultipartUpload['Parts']]
+        assert numeros == sorted(self.partes)
+        self.objetos[Key] = b''.join(self.partes[n] for n in numeros)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.abortados.append(Key)
+
+
+def test_multipart_envia_durante_a_escrita_e_arquivo_local_fica_integro():
+    s3 = _S3Multipart()
+    saida = SaidaMultipartS3(s3, 'b', 'sped/x.txt', extra_args={'ContentType': 't'},
+                             parte_bytes=100)
+    linhas = [f'|I250|{i}|\r\n'.encode('latin-1') for i in range(200)]
+    for i, linha in enumerate(linhas):
+        saida.write(linha)
+        if i == 100:
+            time.sleep(0.05)
+            assert s3.partes  # partes ja sairam antes do fim da geracao
+
+    assert saida.concluir() == 'sped/x.txt'
+    saida.seek(0)
+    assert saida.read() == s3.objetos['sped/x.txt'] == b''.join(linhas)
+    assert all(len(p) >= 100 for n, p in s3.partes.items() if n != max(s3.partes))
+    assert s3.extra == {'ContentType': 't'}
+
+
+def test_multipart_falha_aborta_upload():
+    s3 = _S3Multipart(falhar_na_parte=2)
+    saida = SaidaMultipartS3(s3, 'b', 'sped/y.txt', parte_bytes=10)
+    with pytest.raises(RuntimeError, match='S3 fora'):
+        try:  # mesmo fluxo do worker: erro durante a geracao -> abortar()
+            for _ in range(50):
+                saida.write(b'x' * 10)
+                time.sleep(0.001)
+        except RuntimeError:
+            saida.abortar()
+            raise
+        saida.concluir()  # erro so apareceu no fim -> concluir aborta sozinho
+
+    assert s3.abortados == ['sped/y.txt']
+    assert 'sped/y.txt' not in s3.objetos
@@ -0,0 +1,120 @@
+"""Testes de eventos_particionados_service: cadeia de diffs, arquivo JSONL gzip e particoes.
+
+Sem banco: eventos montados como o trigger grava (INSERT/DELETE com
+snapshot, UPDATE so com as chaves alteradas).
+"""
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+from app.supply_chain.services.eventos_particionados_service import (
+    _casa_filtro,
+    calcular_diff,
+    escrever_jsonl_gz,
+    ler_jsonl_gz,
+    mes_da_particao,
+    nome_particao,
+    particoes_frias,
+    reconstruir_estado,
+    reconstruir_estados,
+)
+
+SNAPSHOTS = [
+    {'id': 7, 'num_pedido': 'VCD1', 'qtd_saldo': 10.0, 'status': 'ABERTO', 'expedicao': None, 'obs': 'x'},
+    {'id': 7, 'num_pedido': 'VCD1', 'qtd_saldo': 8.0, 'status': 'ABERTO', 'expedicao': None, 'obs': 'x'},
+    {'id': 7, 'num_pedido': 'VCD1', 'qtd_saldo': 8.0, 'status': 'COTADO', 'expedicao': '2026-10-20', 'obs': 'x'},
+    {'id': 7, 'num_pedido': 'VCD1', 'qtd_saldo': 0.0, 'status': 'FATURADO', 'expedicao': '2026-10-20', 'obs': None},
+]
+
+
+def _eventos_como_trigger(snapshots, deletar=True):
+    """INSERT do primeiro, UPDATE com diff entre consecutivos, DELETE do ultimo."""
+    eventos = [{'id': 1, 'tipo_evento': 'INSERT', 'dados_antes': None, 'dados_depois': snapshots[0]}]
+    for i, (antes, depois) in enumerate(zip(snapshots, snapshots[1:]), start=2):
+        eventos.append({
+            'id': i, 'tipo_evento': 'UPDATE',
+            'dados_antes': calcular_diff(depois, antes),
+            'dados_depois': calcular_diff(antes, depois),
+        })
+    if deletar:
+        eventos.append({'id': len(eventos) + 1, 'tipo_evento': 'DELETE',
+                        'dados_antes': snapshots[-1], 'dados_depois': None})
+    return eventos
+
+
+def test_diff_guarda_so_chaves_alteradas():
+    antes, depois = SNAPSHOTS[1], SNAPSHOTS[2]
+    assert calcular_diff(antes, depois) == {'status': 'COTADO', 'expedicao': '2026-10-20'}
+    assert calcular_diff(depois, antes) == {'status': 'ABERTO', 'expedicao': None}
+    assert calcular_diff(antes, antes) == {}
+    # Chave nova com valor None conta como alteracao
+    assert calcular_diff({}, {'obs': None}) == {'obs': None}
+
+
+def test_reconstroi_estado_completo_pela_cadeia_de_diffs():
+    eventos = _eventos_como_trigger(SNAPSHOTS)
+    estados = [estado for _evento, estado in reconstruir_estados(eventos)]
+
+    assert estados[:-1] == SNAPSHOTS
+    assert estados[-1] is None
+    assert reconstruir_estado(eventos[:-1]) == SNAPSHOTS[-1]
+    # UPDATE grava menos que o snapshot inteiro
+    assert all(len(e['dados_depois']) < len(SNAPSHOTS[0]) for e in eventos if e['tipo_evento'] == 'UPDATE')
+
+
+def test_cadeia_sem_insert_parte_das_chaves_conhecidas():
+    eventos = _eventos_como_trigger(SNAPSHOTS, deletar=False)[2:]  # comeca no 2o UPDATE
+    assert reconstruir_estado(eventos) == {
+        'qtd_saldo': 0.0, 'status': 'FATURADO', 'expedicao': '2026-10-20', 'obs': None,
+    }
+
+
+def test_estados_retornados_sao_copias():
+    eventos = _eventos_como_trigger(SNAPSHOTS, deletar=False)
+    primeiro = next(reconstruir_estados(eventos))[1]
+    primeiro['status'] = 'ALTERADO'
+    assert eventos[0]['dados_depois']['status'] == 'ABERTO'
+
+
+def test_jsonl_gz_ida_e_volta_em_chunks():
+    eventos = [{
+        'id': 100 + i, 'tipo_evento': 'UPDATE', 'entidade': 'separacao', 'entidade_id': 7,
+        'num_pedido': 'VCD1', 'quantidade_nova': Decimal('8.500'),
+        'dados_antes': {'status': 'ABERTO'}, 'dados_depois': {'status': 'COTADO'},
+        'campos_alterados': ['status'], 'registrado_em': datetime(2025, 1, 3, 10, i),
+    } for i in range(50)]
+    destino = io.BytesIO()
+
+    assert escrever_jsonl_gz(iter(eventos), destino) == (50, 100, 149)
+
+    dados = destino.getvalue()
+    lidos = list(ler_jsonl_gz(dados[i:i + 37] for i in range(0, len(dados), 37)))
+    assert len(lidos) == 50
+    assert lidos[0]['registrado_em'] == datetime(2025, 1, 3, 10, 0)
+    assert lidos[0]['quantidade_nova'] == 8.5
+    assert lidos[0]['dados_depois'] == {'status': 'COTADO'}
+    assert lidos[0]['usuario_id'] is None  # colunas ausentes viram null
+    assert reconstruir_estado(
+        [{'tipo_evento': 'INSERT', 'dados_depois': {'status': 'NOVO', 'id': 7}}] + lidos
+    ) == {'status': 'COTADO', 'id': 7}
+
+
+def test_filtro_dos_arquivados():
+    evento = {'registrado_em': datetime(2025, 1, 15), 'num_pedido': 'VCD1', 'entidade_id': 7}
+
+    assert _casa_filtro(evento, datetime(2025, 1, 1), datetime(2025, 2, 1), {'num_pedido': 'VCD1'})
+    assert not _casa_filtro(evento, None, datetime(2025, 1, 15), {})  # fim exclusivo
+    assert not _casa_filtro(evento, None, None, {'entidade_id': 8})
+
+
+def test_nomes_e_particoes_frias():
+    assert nome_particao(date(2026, 3, 1)) == 'evento_supply_chain_y2026m03'
+    assert mes_da_particao('evento_supply_chain_y2026m03') == date(2026, 3, 1)
+    assert mes_da_particao('evento_supply_chain_default') is None
+
+    nomes = [nome_particao(date(2025, m, 1)) for m in range(1, 13)] + [
+        nome_particao(date(2026, m, 1)) for m in range(1, 11)
+    ] + ['evento_supply_chain_default']
+    frias = particoes_frias(nomes, hoje=date(2026, 10, 19), meses_quentes=12)
+
+    assert frias == [nome_particao(date(2025, m, 1)) for m in range(1, 10)]
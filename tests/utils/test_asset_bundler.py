@@ -0,0 +1,113 @@
+"""Tests do build de bundles (app/utils/asset_bundler.py).
+
+Arvore static sintetica em tmp_path: inlining de @import com camada, url()
+absolutizado, @import remoto no topo, manifest + .gz e o helper asset_bundle.
+"""
+import gzip
+import os
+
+from flask import Flask
+
+from app.utils import asset_bundler
+from app.utils.asset_bundler import asset_bundle, build_assets, bundle_css, minify_css
+
+
+def _arvore(tmp_path):
+    static = tmp_path / 'static'
+    (static / 'css' / 'modules').mkdir(parents=True)
+    (static / 'js').mkdir()
+    (static / 'css' / 'main.css').write_text(
+        "@layer base, modules;\n"
+        "/* @import url('./modules/_comentado.css'); */\n"
+        "@import url('./modules/_base.css') layer(base);\n"
+        "@import url('https://fonts.example/css?family=X;Y');\n"
+        "@import url('./modules/_print.css') print;\n"
+    )
+    (static / 'css' / 'modules' / '_base.css').write_text(
+        ".logo { background: url('../../img/logo.png'); content: \"a  ;  b\"; }\n"
+    )
+    (static / 'css' / 'modules' / '_print.css').write_text(".nav { display: none; }\n")
+    (static / 'js' / 'a.js').write_text("var a = 1\n//# sourceMappingURL=a.js.map\n")
+    (static / 'js' / 'b.js').write_text("(function(){ window.b = 2 })()\n")
+    return static
+
+
+def test_css_inlina_imports_preservando_camada(tmp_path):
+    static = _arvore(tmp_path)
+
+    css = bundle_css(str(static), 'css/main.css')
+
+    assert css.startswith("@import url('https://fonts.example/css?family=X;Y');")
+    assert css.count('@import') == 1
+    assert '@layer base {' in css
+    assert "url('/static/img/logo.png')" in css
+    assert '@media print {' in css
+    assert '_comentado' not in css
+
+
+def test_minify_preserva_strings():
+    out = minify_css('/* x */ .a ,  .b {\n  color : red ;\n  content: "a  ;  b";\n}\n/*! licenca */')
+
+    assert out == '.a,.b{color : red;content: "a  ;  b"}/*! licenca */'
+
+
+def test_build_gera_manifest_comprimidos_e_limpa_antigos(tmp_path):
+    static = _arvore(tmp_path)
+    dist = static / 'dist'
+    dist.mkdir()
+    (dist / 'app.0000000000.js').write_text('velho')
+
+    manifest = build_assets(str(static), js_bundles={'app.js': ['js/a.js', 'js/b.js']})
+
+    js_path = static / manifest['app.js']
+    js = js_path.read_text()
+    assert manifest['main.css'].startswith('dist/main.')
+    assert js.index('var a = 1') < js.index('window.b = 2')
+    assert 'sourceMappingURL' not in js
+    assert gzip.decompress((static / (manifest['app.js'] + '.gz')).read_bytes()) == js.encode()
+    assert not (dist / 'app.0000000000.js').exists()
+    assert asset_bundler.load_manifest(str(static)) == manifest
+
+    # Conteudo igual -> mesmo nome (hash do conteudo)
+    assert build_assets(str(static), js_bundles={'app.js': ['js/a.js', 'js/b.js']}) == manifest
+
+
+def test_helper_usa_manifest_ou_fontes(tmp_path, monkeypatch):
+    static = _arvore(tmp_path)
+    monkeypatch.setattr(asset_bundler, 'JS_BUNDLES', {'app.js': ['js/a.js', 'js/b.js']})
+    app = Flask('teste', root_path=str(tmp_path))
+    app.add_url_rule('/assets/main.css', 'main_css_versioned', lambda: '')
+
+    with app.test_request_context():
+        assert asset_bundle('main.css') == ['/assets/main.css']
+        fontes = asset_bundle('app.js')
+        assert [u.split('?')[0] for u in fontes] == ['/static/js/a.js', '/static/js/b.js']
+
+        manifest = build_assets(str(static), js_bundles={'app.js': ['js/a.js', 'js/b.js']})
+        assert asset_bundle('app.js') == [f"/static/{manifest['app.js']}"]
+
+        monkeypatch.setenv('ASSET_BUNDLES_ENABLED', 'false')
+        assert len(asset_bundle('app.js')) == 2
+    assert os.path.isdir(static / 'dist')
+
+
+def test_url_dentro_de_string_ou_data_uri_nao_e_reescrito(tmp_path):
+    static = _arvore(tmp_path)
+    svg = (
+        "data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg'%3E"
+        "%3Cfilter id='grain'/%3E%3Crect filter='url(%23grain)'/%3E%3C/svg%3E"
+    )
+    (static / 'css' / 'modules' / '_efeitos.css').write_text(
+        f'.grain {{ background: url("{svg}"); }}\n'
+        ".a { content: \"url(x.png)\"; mask: url(#m); clip-path: url(%23c); }\n"
+        ".b { background: url(../img/bg.png), url( '../img/b2.png' ); }\n"
+    )
+    (static / 'css' / 'main.css').write_text("@import url('./modules/_efeitos.css') layer(fx);\n")
+
+    css = minify_css(bundle_css(str(static), 'css/main.css'))
+
+    assert f'url("{svg}")' in css
+    assert 'content: "url(x.png)"' in css
+    assert 'url(#m)' in css and 'url(%23c)' in css
+    assert "url('/static/css/img/bg.png')" in css
+    assert "url('/static/css/img/b2.png')" in css
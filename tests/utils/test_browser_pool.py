@@ -0,0 +1,285 @@
+"""Pool de navegador Playwright (app.utils.browser_pool).
+
+Duas camadas:
+  - Chromium real contra um servidor HTTP local com HTML estático (offline):
+    empréstimo/devolução, storage_state, isolamento, reciclagem, vazamento
+    e queda do navegador. Pulados quando o Chromium do Playwright não está
+    instalado (`playwright install chromium`).
+  - Regras do pool com navegador falso (relógio controlado): ociosidade e fork.
+"""
+import functools
+import http.server
+import json
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from app.utils.browser_pool import BrowserPool
+
+
+def _chromium_instalado():
+    try:
+        from playwright.sync_api import sync_playwright
+        with sync_playwright() as p:
+            return Path(p.chromium.executable_path).exists()
+    except Exception:
+        return False
+
+
+requer_chromium = pytest.mark.skipif(not _chromium_instalado(), reason="Chromium do Playwright não instalado")
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+@pytest.fixture(scope='module')
+def servidor(tmp_path_factory):
+    """Servidor HTTP local com uma página estática (sem rede externa)."""
+    raiz = tmp_path_factory.mktemp('portal_fixture')
+    (raiz / 'index.html').write_text(
+        '<html><body><h1 id="titulo">Portal fixture</h1></body></html>', encoding='utf-8'
+    )
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(raiz))
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+
+
+@pytest.fixture
+def pool_real():
+    relogio = Relogio()
+    pool = BrowserPool(max_usos=3, ocioso_s=60, max_emprestimo_s=120, relogio=relogio)
+    pool.relogio = relogio
+    yield pool
+    pool.fechar()
+
+
+def _estado_com_cookie(caminho, valor):
+    caminho.write_text(json.dumps({
+        'cookies': [{
+            'name': 'sessao', 'value': valor, 'domain': '127.0.0.1', 'path': '/',
+            'expires': -1, 'httpOnly': False, 'secure': False, 'sameSite': 'Lax',
+        }],
+        'origins': [],
+    }), encoding='utf-8')
+
+
+# ---------------------------------------------------------------------------
+# Chromium real
+# ---------------------------------------------------------------------------
+
+@requer_chromium
+def test_emprestimo_carrega_storage_state_e_devolve(pool_real, servidor, tmp_path):
+    estado = tmp_path / 'storage_state_portal.json'
+    _estado_com_cookie(estado, 'abc')
+
+    with pool_real.contexto('portal', storage_state=str(estado)) as context:
+        page = context.new_page()
+        page.goto(f'{servidor}/index.html')
+        assert page.inner_text('#titulo') == 'Portal fixture'
+        assert 'sessao=abc' in page.evaluate('document.cookie')
+        assert pool_real.estatisticas()['ativos'] == 1
+
+    stats = pool_real.estatisticas()
+    assert stats['ativos'] == 0
+    assert stats['devolucoes'] == 1
+    assert stats['navegador_vivo'] is True
+
+
+@requer_chromium
+def test_contextos_isolados_e_navegador_reaproveitado(pool_real, servidor):
+    a = pool_real.emprestar('portal')
+    b = pool_real.emprestar('portal')
+    page_a = a.context.new_page()
+    page_a.goto(f'{servidor}/index.html')
+    page_a.evaluate("document.cookie = 'so_em_a=1'")
+    page_b = b.context.new_page()
+    page_b.goto(f'{servidor}/index.html')
+
+    assert 'so_em_a' not in page_b.evaluate('document.cookie')
+    pool_real.devolver(a)
+    pool_real.devolver(b)
+    assert pool_real.metricas['lancamentos'] == 1
+
+
+@requer_chromium
+def test_salvar_estado_vale_para_proximo_emprestimo(pool_real, servidor, tmp_path):
+    estado = tmp_path / 'storage_state_portal.json'
+    _estado_com_cookie(estado, 'antigo')
+
+    with pool_real.contexto('portal', storage_state=str(estado), salvar_estado=True) as context:
+        page = context.new_page()
+        page.goto(f'{servidor}/index.html')
+        page.evaluate("document.cookie = 'sessao=novo; path=/'")
+
+    with pool_real.contexto('portal', storage_state=str(estado)) as context:
+        page = context.new_page()
+        page.goto(f'{servidor}/index.html')
+        assert 'sessao=novo' in page.evaluate('document.cookie')
+
+
+@requer_chromium
+def test_reciclagem_apos_max_usos(pool_real):
+    for _ in range(3):
+        with pool_real.contexto('portal'):
+            pass
+    assert pool_real.metricas['reciclagens'] == 1
+
+    with pool_real.contexto('portal'):
+        pass
+    assert pool_real.estatisticas()['geracao'] == 2
+
+
+@requer_chromium
+def test_vazamento_detectado_e_fechado(pool_real):
+    vazado = pool_real.emprestar('portal')
+    orfao = pool_real._browser.new_context()  # aberto fora do pool
+    assert pool_real.contextos_orfaos() == 1
+
+    pool_real.relogio.agora += 121
+    assert [e.id for e in pool_real.vazamentos()] == [vazado.id]
+    assert 'test_browser_pool.py' in vazado.origem
+
+    pool_real.manutencao()
+    assert vazado.devolvido is True
+    assert pool_real.metricas['vazamentos'] == 1
+    assert pool_real.estatisticas()['ativos'] == 0
+    orfao.close()
+
+
+@requer_chromium
+def test_recupera_de_queda_do_navegador(pool_real, servidor):
+    perdido = pool_real.emprestar('portal')
+    pool_real._browser.close()  # simula crash do Chromium
+
+    with pool_real.contexto('portal') as context:
+        page = context.new_page()
+        page.goto(f'{servidor}/index.html')
+        assert page.inner_text('#titulo') == 'Portal fixture'
+
+    assert perdido.devolvido is True
+    assert pool_real.metricas['recuperacoes'] == 1
+    assert pool_real.metricas['lancamentos'] == 2
+
+
+# ---------------------------------------------------------------------------
+# Regras do pool (navegador falso)
+# ---------------------------------------------------------------------------
+
+class _ContextoFalso:
+    def __init__(self):
+        self.fechado = False
+
+    def close(self):
+        self.fechado = True
+
+
+class _BrowserFalso:
+    def __init__(self):
+        self.conectado = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.conectado
+
+    def on(self, evento, callback):
+        pass
+
+    def new_context(self, **kwargs):
+        ctx = _ContextoFalso()
+        self.contexts.append(ctx)
+        return ctx
+
+    def close(self):
+        self.conectado = False
+
+
+class _PlaywrightFalso:
+    def __init__(self):
+        self.browsers = []
+        self.chromium = self
+
+    def launch(self, **kwargs):
+        self.browsers.append(_BrowserFalso())
+        return self.browsers[-1]
+
+    def stop(self):
+        pass
+
+
+def test_despejo_por_ociosidade():
+    relogio, pw = Relogio(), _PlaywrightFalso()
+    pool = BrowserPool(iniciar_playwright=lambda: pw, ocioso_s=60, relogio=relogio)
+    with pool.contexto('portal'):
+        pass
+
+    relogio.agora += 61
+    pool.manutencao()
+    assert pool.metricas['despejos_ociosidade'] == 1
+    assert pw.browsers[0].conectado is False
+
+    with pool.contexto('portal'):
+        pass
+    assert len(pw.browsers) == 2
+
+
+def test_ociosidade_nao_derruba_emprestimo_ativo():
+    relogio, pw = Relogio(), _PlaywrightFalso()
+    pool = BrowserPool(iniciar_playwright=lambda: pw, ocioso_s=60, max_emprestimo_s=3600, relogio=relogio)
+    ativo = pool.emprestar('portal')
+    relogio.agora += 120
+    pool.manutencao()
+
+    assert pool.metricas['despejos_ociosidade'] == 0
+    assert ativo.context.fechado is False
+
+
+def test_pool_herdado_no_fork_e_abandonado(monkeypatch):
+    pw = _PlaywrightFalso()
+    pool = BrowserPool(iniciar_playwright=lambda: pw)
+    pool.emprestar('portal')
+
+    monkeypatch.setattr(os, 'getpid', lambda: pool._pid + 1)
+    pool.emprestar('portal')
+
+    assert len(pw.browsers) == 2
+    assert pw.browsers[0].conectado is True  # objeto do processo pai: não é fechado no filho
+    assert pool.estatisticas()['ativos'] == 1
+
+
+def test_storage_state_relido_so_quando_arquivo_muda(tmp_path):
+    pool = BrowserPool(iniciar_playwright=_PlaywrightFalso)
+    estado = tmp_path / 'estado.json'
+    _estado_com_cookie(estado, 'v1')
+
+    primeiro = pool._resolver_estado(str(estado))
+    assert pool._resolver_estado(str(estado)) is primeiro
+
+    _estado_com_cookie(estado, 'v2')
+    os.utime(estado, (os.path.getmtime(estado) + 5,) * 2)
+    assert pool._resolver_estado(str(estado))['cookies'][0]['value'] == 'v2'
+    assert pool._resolver_estado(str(tmp_path / 'nao_existe.json')) is None
+
+
+def test_pool_so_em_processo_habilitado(monkeypatch):
+    """gunicorn/worker com fork: desligado; worker --sem-fork: ligado (salvo kill-switch)."""
+    from app.utils import browser_pool
+
+    monkeypatch.setattr(browser_pool, '_habilitado_no_processo', False)
+    monkeypatch.delenv('PORTAL_BROWSER_POOL', raising=False)
+    assert browser_pool.pool_habilitado() is False
+
+    browser_pool.habilitar_no_processo()
+    assert browser_pool.pool_habilitado() is True
+
+    monkeypatch.setenv('PORTAL_BROWSER_POOL', 'false')
+    assert browser_pool.pool_habilitado() is False
@@ -0,0 +1,186 @@
+"""Tests do cache de conteudo do FileStorage (app/utils/file_cache.py).
+
+S3 substituido por um bucket em memoria (mesma API boto3 usada pelo
+FileStorage) que conta as chamadas — mede o que trafega de verdade.
+"""
+import hashlib
+from io import BytesIO
+
+import pytest
+from botocore.exceptions import ClientError
+from flask import Flask
+
+from app.utils import file_cache
+from app.utils.file_storage import FileStorage, get_file_cache_stats
+
+
+class _Body:
+    def __init__(self, data):
+        self._buf = BytesIO(data)
+
+    def read(self, n=-1):
+        return self._buf.read(n)
+
+    def iter_chunks(self, chunk_size=1024):
+        return iter(lambda: self._buf.read(chunk_size), b'')
+
+
+class _FakeS3:
+    """Bucket em memoria: key -> (bytes, metadata)."""
+
+    def __init__(self):
+        self.objetos = {}
+        self.chamadas = []
+        self.bytes_enviados = 0
+        self.bytes_baixados = 0
+
+    def _obj(self, bucket, key):
+        try:
+            return self.objetos[(bucket, key)]
+        except KeyError:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+
+    @staticmethod
+    def _etag(data):
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def upload_fileobj(self, f, bucket, key, ExtraArgs=None, Config=None):
+        self.chamadas.append('upload')
+        data = f.read()
+        self.bytes_enviados += len(data)
+        self.objetos[(bucket, key)] = (data, dict((ExtraArgs or {}).get('Metadata') or {}))
+
+    def copy_object(self, Bucket, Key, CopySource, Metadata=None, **_kw):
+        self.chamadas.append('copy')
+        data, _meta = self._obj(CopySource['Bucket'], CopySource['Key'])
+        self.objetos[(Bucket, Key)] = (data, dict(Metadata or {}))
+
+    def head_object(self, Bucket, Key):
+        self.chamadas.append('head')
+        data, meta = self._obj(Bucket, Key)
+        return {'ETag': self._etag(data), 'Metadata': meta, 'ContentLength': len(data)}
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.chamadas.append('get')
+        data, meta = self._obj(Bucket, Key)
+        if Range:
+            inicio, _, fim = Range[len('bytes='):].partition('-')
+            data = data[int(inicio):int(fim) + 1 if fim else None]
+        self.bytes_baixados += len(data)
+        return {'Body': _Body(data), 'ETag': self._etag(data), 'Metadata': meta}
+
+    def delete_object(self, Bucket, Key):
+        self.chamadas.append('delete')
+        self.objetos.pop((Bucket, Key), None)
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setenv('FILE_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.delenv('FILE_CACHE_ENABLED', raising=False)
+    monkeypatch.setattr(file_cache, '_redis', lambda: None)
+    file_cache.reset_content_cache()
+
+    fs = FileStorage()
+    fs._initialized = True
+    fs._use_s3 = True
+    fs._s3_client = _FakeS3()
+    fs._bucket_name = 'bucket'
+    with Flask('teste').app_context():
+        yield fs
+    file_cache.reset_content_cache()
+
+
+def _pdf(conteudo, nome='doc.pdf'):
+    arquivo = BytesIO(conteudo)
+    arquivo.name = nome
+    return arquivo
+
+
+def test_download_repetido_nao_vai_ao_s3(storage):
+    s3 = storage.s3_client
+    s3.objetos[('bucket', 'legado/a.pdf')] = (b'%PDF legado', {})
+
+    assert storage.download_file('legado/a.pdf') == b'%PDF legado'
+    s3.chamadas.clear()
+    assert storage.download_file('legado/a.pdf') == b'%PDF legado'
+
+    assert 'get' not in s3.chamadas and s3.chamadas == []
+    assert s3.bytes_baixados == len(b'%PDF legado')
+    assert get_file_cache_stats()['hits'] == 1
+
+
+def test_upload_duplicado_vira_copia_e_download_sai_do_cache(storage):
+    s3 = storage.s3_client
+
+    a = storage.save_file(_pdf(b'x' * 5000), 'faturas', filename='a.pdf')
+    b = storage.save_file(_pdf(b'x' * 5000), 'faturas', filename='b.pdf')
+
+    assert (a, b) == ('faturas/a.pdf', 'faturas/b.pdf')
+    assert s3.chamadas.count('upload') == 1 and s3.chamadas.count('copy') == 1
+    assert s3.bytes_enviados == 5000
+    assert s3.objetos[('bucket', b)][0] == b'x' * 5000
+
+    s3.chamadas.clear()
+    assert storage.download_file(b) == b'x' * 5000
+    assert s3.chamadas == []  # write-through no upload
+
+    # delete de uma key nao afeta a outra (cada registro tem seu objeto)
+    assert storage.delete_file(a) is True
+    assert storage.download_file(b) == b'x' * 5000
+
+
+def test_objeto_sobrescrito_revalida_por_etag(storage, monkeypatch):
+    s3 = storage.s3_client
+    s3.objetos[('bucket', 'k.xml')] = (b'<v1/>', {})
+    storage.download_file('k.xml')
+
+    s3.objetos[('bucket', 'k.xml')] = (b'<v2/>', {})
+    assert storage.download_file('k.xml') == b'<v1/>'  # dentro da janela confiada
+
+    monkeypatch.setattr(file_cache.get_content_cache(), 'revalidate_seconds', -1)
+    assert storage.download_file('k.xml') == b'<v2/>'
+
+
+def test_stream_e_range(storage):
+    s3 = storage.s3_client
+    conteudo = bytes(range(256)) * 40
+    s3.objetos[('bucket', 'grande.bin')] = (conteudo, {})
+
+    assert storage.read_range('grande.bin', 10, 19) == conteudo[10:20]
+    assert s3.bytes_baixados == 10  # so o trecho trafegou
+
+    parcial = storage.iter_file('grande.bin', chunk_size=1000)
+    next(parcial)
+    parcial.close()  # consumo interrompido nao entra no cache
+    assert b''.join(storage.iter_file('grande.bin', chunk_size=1000)) == conteudo
+
+    s3.chamadas.clear()
+    assert storage.read_range('grande.bin', 5000, None) == conteudo[5000:]
+    assert 'get' not in s3.chamadas
+
+
+def test_lru_respeita_teto(storage, monkeypatch):
+    cache = file_cache.get_content_cache()
+    monkeypatch.setattr(cache, 'max_bytes', 2500)
+    s3 = storage.s3_client
+    for i in range(4):
+        s3.objetos[('bucket', f'f{i}')] = (bytes([i]) * 1000, {})
+        storage.download_file(f'f{i}')
+
+    assert cache.get_stats()['approx_bytes'] <= 2500
+    assert cache.stats['evicted'] >= 2
+    s3.chamadas.clear()
+    assert storage.download_file('f3') == bytes([3]) * 1000
+    assert 'get' not in s3.chamadas
+
+
+def test_cache_desligado_usa_caminho_original(storage, monkeypatch):
+    monkeypatch.setenv('FILE_CACHE_ENABLED', 'false')
+    s3 = storage.s3_client
+    s3.download_fileobj = lambda bucket, key, buf: buf.write(s3.objetos[(bucket, key)][0])
+    s3.objetos[('bucket', 'a')] = (b'abc', {})
+
+    assert storage.download_file('a') == b'abc'
+    assert storage.download_file('a') == b'abc'
+    assert get_file_cache_stats()['hits'] == 0
@@ -0,0 +1,126 @@
+"""Tests do cache de fragmentos Jinja (app/utils/fragment_cache.py).
+
+Flask minimo + extensao; Redis desligado (LRU local + versoes locais).
+"""
+import pytest
+from flask import Flask
+
+from app.utils import fragment_cache as fc
+
+TEMPLATE = (
+    "{% cache chave, deps %}"
+    "<td>{{ contar() }}</td><input value=\"{{ cache_hole('token') }}\">"
+    "{% endcache %}"
+)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(fc, '_redis', lambda: None)
+    monkeypatch.delenv('FRAGMENT_CACHE_ENABLED', raising=False)
+    fc.clear_local_fragments()
+    fc._versoes_locais.clear()
+
+    app = Flask('teste')
+    fc.init_fragment_cache(app)
+    estado = {'renders': 0, 'token': 't1'}
+
+    def contar():
+        estado['renders'] += 1
+        return estado['renders']
+
+    fc.register_hole('token', lambda: estado['token'])
+    app.jinja_env.globals['contar'] = contar
+    app.estado = estado
+    yield app
+    fc.clear_local_fragments()
+    fc._versoes_locais.clear()
+
+
+def _render(app, chave=('lista', 1), deps=('entregas_monitoradas',)):
+    # Um request por render (o memo de lookup e por request)
+    with app.test_request_context():
+        return app.jinja_env.from_string(TEMPLATE).render(chave=chave, deps=deps)
+
+
+def test_hit_nao_reexecuta_corpo_e_buraco_e_vivo(app):
+    primeiro = _render(app)
+    app.estado['token'] = 't2'
+    segundo = _render(app)
+
+    assert app.estado['renders'] == 1
+    assert primeiro == '<td>1</td><input value="t1">'
+    assert segundo == '<td>1</td><input value="t2">'
+
+
+def test_bump_da_dependencia_invalida(app):
+    _render(app)
+    fc.bump_versions('outra_tabela')
+    _render(app)
+    assert app.estado['renders'] == 1
+
+    fc.bump_versions('entregas_monitoradas')
+    assert _render(app) == '<td>2</td><input value="t1">'
+
+
+def test_chave_diferente_nao_compartilha(app):
+    _render(app, chave=('lista', 1))
+    _render(app, chave=('lista', 2))
+
+    assert app.estado['renders'] == 2
+
+
+def test_lookup_da_rota_e_o_mesmo_valor_do_bloco(app):
+    with app.test_request_context():
+        assert fc.lookup_fragment(('lista', 1), ['entregas_monitoradas']) is None
+    _render(app)
+
+    with app.test_request_context():
+        html = fc.lookup_fragment(('lista', 1), ['entregas_monitoradas'])
+        # Commit concorrente apos o lookup nao muda o que o bloco usa neste request
+        fc.bump_versions('entregas_monitoradas')
+        saida = app.jinja_env.from_string(TEMPLATE).render(
+            chave=('lista', 1), deps=['entregas_monitoradas'],
+        )
+
+    assert '<td>1</td>' in html
+    assert saida == '<td>1</td><input value="t1">'
+    assert app.estado['renders'] == 1
+
+
+def test_flag_desligada_renderiza_sempre(app, monkeypatch):
+    monkeypatch.setenv('FRAGMENT_CACHE_ENABLED', 'false')
+    _render(app)
+    _render(app)
+
+    assert app.estado['renders'] == 2
+
+
+def test_commit_publica_tabelas_do_flush_e_rollback_descarta(monkeypatch):
+    from sqlalchemy import Column, Integer, create_engine
+    from sqlalchemy.orm import Session, declarative_base
+
+    Base = declarative_base()
+
+    class Item(Base):
+        __tablename__ = 'itens_fragmento_teste'
+        id = Column(Integer, primary_key=True)
+
+    monkeypatch.setattr(fc, '_redis', lambda: None)
+    fc.init_fragment_cache(Flask('teste'))
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    antes = fc.get_versions(['itens_fragmento_teste'])['itens_fragmento_teste']
+
+    with Session(engine) as s:
+        s.add(Item(id=1))
+        s.flush()
+        s.rollback()
+    assert fc.get_versions(['itens_fragmento_teste'])['itens_fragmento_teste'] == antes
+
+    with Session(engine) as s:
+        s.add(Item(id=1))
+        s.commit()
+        s.query(Item).filter(Item.id == 1).delete()
+        s.commit()
+    assert fc.get_versions([Item])['itens_fragmento_teste'] == antes + 2
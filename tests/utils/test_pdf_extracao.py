@@ -0,0 +1,160 @@
+"""Tests para app/utils/pdf_extracao.py — extracao de PDF compartilhada.
+
+PDF minimo montado a mao (Helvetica, uma linha de texto por pagina) — sem
+depender de fixtures binarias nem de geradores de PDF.
+
+Contrato:
+- mesmo conteudo (bytes ou path) = mesmo DocumentoPDF
+- texto por pagina memoizado (pdfplumber nao reextrai); palavras/chars nao
+- handle do pdfplumber fechado e layout liberado apos cada leitura
+- LRU despeja o mais antigo contando os bytes retidos (PDF + texto)
+- parsers CarVia e classificador compartilham a extracao
+"""
+from unittest.mock import patch
+
+import pytest
+
+from app.utils import pdf_extracao
+from app.utils.pdf_extracao import CacheDocumentosPDF, documento_pdf
+
+
+def _pdf_minimo(paginas):
+    objetos = ['<< /Type /Catalog /Pages 2 0 R >>', None,
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for texto in paginas:
+        stream = f'BT /F1 12 Tf 72 720 Td ({texto}) Tj ET'
+        objetos.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        conteudo_id = len(objetos)
+        objetos.append(
+            '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {conteudo_id} 0 R >>'
+        )
+        kids.append(f'{len(objetos)} 0 R')
+    objetos[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    saida = b'%PDF-1.4\n'
+    offsets = []
+    for i, obj in enumerate(objetos, start=1):
+        offsets.append(len(saida))
+        saida += f'{i} 0 obj\n{obj}\nendobj\n'.encode('latin-1')
+    xref = len(saida)
+    saida += f'xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n'.encode()
+    for off in offsets:
+        saida += f'{off:010d} 00000 n \n'.encode()
+    saida += (
+        f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\n'
+        f'startxref\n{xref}\n%%EOF\n'
+    ).encode()
+    return saida
+
+
+@pytest.fixture(autouse=True)
+def cache_isolado(monkeypatch):
+    novo = CacheDocumentosPDF(max_docs=4, max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(pdf_extracao, '_cache', novo)
+    yield novo
+    novo.limpar()
+
+
+def test_mesmo_conteudo_mesmo_documento(tmp_path, cache_isolado):
+    pdf = _pdf_minimo(['FATURA 123'])
+    caminho = tmp_path / 'f.pdf'
+    caminho.write_bytes(pdf)
+
+    doc = documento_pdf(pdf_bytes=pdf)
+    assert documento_pdf(pdf_path=str(caminho)) is doc
+    assert cache_isolado.status()['hits'] == 1
+    assert documento_pdf() is None
+
+
+def test_texto_memoizado():
+    doc = documento_pdf(pdf_bytes=_pdf_minimo(['PAGINA UM', 'PAGINA DOIS']))
+    assert doc.textos_paginas() == ['PAGINA UM', 'PAGINA DOIS']
+    assert [w['text'] for w in doc.palavras(1)] == ['PAGINA', 'DOIS']
+    assert doc.dimensoes(0) == (612, 792)
+
+    with patch('pdfplumber.page.Page.extract_text') as extract, \
+            patch('pdfplumber.open') as abrir:
+        assert doc.texto_pagina(0) == 'PAGINA UM'
+        assert doc.textos_paginas() == ['PAGINA UM', 'PAGINA DOIS']
+        assert doc.num_paginas == 2
+        assert doc.textos_pypdf()[1] == 'PAGINA DOIS'
+    extract.assert_not_called()
+    abrir.assert_not_called()
+
+
+def test_handle_fechado_e_layout_liberado_apos_cada_leitura():
+    import pdfplumber
+
+    doc = documento_pdf(pdf_bytes=_pdf_minimo(['UM', 'DOIS', 'TRES']))
+    with patch('pdfplumber.page.Page.flush_cache', autospec=True) as flush, \
+            patch('pdfplumber.open', wraps=pdfplumber.open) as abrir:
+        doc.textos_paginas()
+        assert doc._pdf is None
+        assert abrir.call_count == 1
+        assert flush.call_count >= 3  # 1 por pagina lida (close() tambem libera)
+
+        doc.palavras(0)
+        doc.palavras(0)
+        assert doc._pdf is None
+        assert abrir.call_count == 3  # palavras nao ficam em cache
+
+        with doc.aberto():
+            for i in range(doc.num_paginas):
+                doc.caracteres(i)
+                doc.dimensoes(i)
+            assert doc._pdf is not None
+        assert doc._pdf is None
+        assert abrir.call_count == 4
+
+
+def test_lru_despeja_o_mais_antigo(cache_isolado):
+    docs = [documento_pdf(pdf_bytes=_pdf_minimo([f'DOC {i}'])) for i in range(4)]
+    docs[0].textos_paginas()
+
+    for i in (4, 5):
+        documento_pdf(pdf_bytes=_pdf_minimo([f'DOC {i}']))
+    status = cache_isolado.status()
+    assert status['documentos'] == 4
+    assert status['despejados'] == 2
+    assert documento_pdf(pdf_bytes=docs[0].pdf_bytes) is not docs[0]
+
+
+def test_lru_conta_texto_retido(cache_isolado):
+    pdf = _pdf_minimo(['X' * 400])
+    cache_isolado.max_bytes = len(pdf) * 2 + 200
+    docs = [documento_pdf(pdf_bytes=pdf), documento_pdf(pdf_bytes=_pdf_minimo(['Y' * 400]))]
+    assert cache_isolado.status()['despejados'] == 0
+
+    docs[0].textos_paginas()
+    assert docs[0].tamanho > len(pdf) + 400
+    assert cache_isolado.status()['bytes'] == docs[0].tamanho + docs[1].tamanho
+
+    documento_pdf(pdf_bytes=docs[1].pdf_bytes)  # hit: recalcula e despeja o antigo
+    status = cache_isolado.status()
+    assert status['despejados'] == 1 and status['documentos'] == 1
+
+
+def test_pdf_invalido_memoiza_falha():
+    doc = documento_pdf(pdf_bytes=b'nao e pdf')
+    with pytest.raises(Exception):
+        doc.textos_paginas()
+    with patch('pdfplumber.open') as abrir:
+        with pytest.raises(Exception):
+            doc.num_paginas
+    abrir.assert_not_called()
+
+
+def test_classificacao_e_parse_compartilham_extracao(cache_isolado):
+    from app.carvia.services.parsers.fatura_pdf_parser import FaturaPDFParser
+    from app.carvia.services.parsers.importacao_service import ImportacaoService
+
+    pdf = _pdf_minimo(['FATURA DE SERVICOS DE TRANSPORTE NUMERO 4521 VENCIMENTO 10/11/2026'])
+    assert ImportacaoService()._classificar_pdf(pdf) == 'PDF_FATURA'
+    parser = FaturaPDFParser(pdf)
+    assert 'NUMERO 4521' in parser.texto_completo
+
+    status = cache_isolado.status()
+    assert status['misses'] == 1
+    assert status['documentos'] == 1
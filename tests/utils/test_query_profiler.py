@@ -0,0 +1,149 @@
+"""Tests para app/utils/query_profiler.py — fingerprints e orcamento de queries.
+
+Engine SQLite em memoria: os listeners sao class-level (Engine), entao
+disparam para qualquer engine — nao depende do PostgreSQL dos testes.
+
+Contrato:
+- query_scope conta queries do bloco (aninhado conta nos dois escopos)
+- fora de request, a origem vem do escopo mais interno
+- fingerprint agrupa a mesma query com parametros diferentes
+- p95/total/count por fingerprint; call site aponta para o codigo chamador
+- flush rotaciona a janela (corrente -> anterior), no timer e nao na query
+- fixture query_budget falha quando o bloco excede o orcamento
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.utils import query_profiler
+from app.utils.query_profiler import (
+    FingerprintStore,
+    com_query_scope,
+    query_scope,
+)
+
+
+@pytest.fixture
+def engine():
+    eng = create_engine('sqlite://')
+    with eng.begin() as conn:
+        conn.execute(text('CREATE TABLE item (id INTEGER PRIMARY KEY, nome TEXT)'))
+        for i in range(5):
+            conn.execute(text('INSERT INTO item (id, nome) VALUES (:i, :n)'), {'i': i, 'n': f'i{i}'})
+    yield eng
+    eng.dispose()
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Store isolado com fingerprints ligados so durante o teste."""
+    novo = FingerprintStore(janela_s=3600, amostra_stack=1)
+    monkeypatch.setattr(query_profiler, 'fingerprint_store', novo)
+    monkeypatch.setattr(query_profiler, '_fingerprints_ativo', True)
+    monkeypatch.setattr(novo, '_publicar_redis', lambda resumo: None)
+    yield novo
+    novo.parar_timer()
+
+
+def _n_mais_1(conn, n):
+    for i in range(n):
+        conn.execute(text('SELECT nome FROM item WHERE id = :i'), {'i': i})
+
+
+def test_query_scope_conta_queries(engine):
+    with engine.connect() as conn:
+        with query_scope('job:externo') as externo:
+            conn.execute(text('SELECT 1'))
+            with query_scope('job:interno') as interno:
+                _n_mais_1(conn, 3)
+    assert interno.count == 3
+    assert externo.count == 4
+    assert interno.queries.most_common(1)[0][1] == 3
+
+
+def test_fingerprint_agrega_parametros_e_origem(engine, store):
+    with engine.connect() as conn, query_scope('rq:teste_job'):
+        _n_mais_1(conn, 5)
+
+    snap = store.snapshot()
+    fp = next(r for r in snap['atual'] if 'FROM item WHERE id' in r['fingerprint'])
+    assert fp['count'] == 5
+    assert fp['origens'] == {'rq:teste_job': 5}
+    assert fp['p95_ms'] <= fp['max_ms']
+    assert fp['total_ms'] >= 0
+    # call site = este arquivo, nao SQLAlchemy
+    assert any('test_query_profiler.py' in site for site in fp['call_sites'])
+
+
+def test_origem_cli_sem_escopo_nem_request(engine, store):
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 2'))
+    origens = store.snapshot()['atual'][0]['origens']
+    assert list(origens)[0].startswith('cli:')
+
+
+def test_flush_rotaciona_janela(engine, store):
+    with engine.connect() as conn:
+        _n_mais_1(conn, 2)
+    resumo = store.flush()
+    assert resumo
+    snap = store.snapshot()
+    assert snap['atual'] == []
+    assert snap['anterior'][0]['count'] == 2
+
+
+def test_rotacao_roda_no_timer_e_nao_na_query(engine, monkeypatch):
+    novo = FingerprintStore(janela_s=0.5, amostra_stack=1)
+    monkeypatch.setattr(query_profiler, 'fingerprint_store', novo)
+    monkeypatch.setattr(query_profiler, '_fingerprints_ativo', True)
+    rotacionou = threading.Event()
+    thread_do_flush = []
+
+    def publicar(resumo):
+        thread_do_flush.append(threading.current_thread())
+        rotacionou.set()
+
+    monkeypatch.setattr(novo, '_publicar_redis', publicar)
+    try:
+        time.sleep(0.6)  # janela ja vencida quando a query registra
+        with engine.connect() as conn:
+            _n_mais_1(conn, 1)
+        assert novo.snapshot()['atual'], 'query nao deve rotacionar a janela'
+        assert rotacionou.wait(2)
+        assert thread_do_flush[0] is not threading.current_thread()
+    finally:
+        novo.parar_timer()
+
+
+def test_desligado_nao_agrega(engine, monkeypatch):
+    novo = FingerprintStore()
+    monkeypatch.setattr(query_profiler, 'fingerprint_store', novo)
+    monkeypatch.setattr(query_profiler, '_fingerprints_ativo', False)
+    with engine.connect() as conn:
+        _n_mais_1(conn, 2)
+    assert novo.snapshot()['atual'] == []
+
+
+def test_decorator_com_query_scope(engine, store):
+    @com_query_scope('scheduler:step_teste')
+    def step():
+        with engine.connect() as conn:
+            _n_mais_1(conn, 2)
+
+    step()
+    fp = store.snapshot()['atual'][0]
+    assert fp['origens'] == {'scheduler:step_teste': 2}
+
+
+def test_query_budget_dentro_do_orcamento(engine, query_budget):
+    with engine.connect() as conn, query_budget(3) as escopo:
+        _n_mais_1(conn, 3)
+    assert escopo.count == 3
+
+
+def test_query_budget_falha_quando_excede(engine, query_budget):
+    with pytest.raises(pytest.fail.Exception, match='Orcamento de queries excedido: 4 > 2'):
+        with engine.connect() as conn, query_budget(2, 'listagem'):
+            _n_mais_1(conn, 4)
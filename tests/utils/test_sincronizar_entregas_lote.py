@@ -0,0 +1,206 @@
+"""
+Testes de app/utils/sincronizar_entregas_lote.py.
+
+calcular_estado_entrega: funcao pura que espelha sincronizar_entrega_por_nf(),
+sem banco. nfs_alteradas_desde: watermark de agendamento do EmbarqueItem (banco,
+flush do ORM e update() em massa).
+"""
+import uuid
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils.sincronizar_entregas_lote import (
+    EstadoEntrega,
+    FatoEmbarque,
+    _sincronizar_nf_a_nf,
+    calcular_estado_entrega,
+    nfs_alteradas_desde,
+)
+
+AGORA = datetime(2026, 10, 19, 12, 0)
+
+
+def _fat(**kw):
+    dados = dict(
+        nome_cliente='CLIENTE X', cnpj_cliente='11222333000144', municipio='CAMPINAS',
+        estado='SP', valor_total=1500.0, data_fatura=date(2026, 10, 14),
+        vendedor='JOAO', incoterm='CIF', ativo=True,
+    )
+    dados.update(kw)
+    return SimpleNamespace(**dados)
+
+
+def _embarque(**kw):
+    dados = dict(
+        data_agenda='20/10/2026', protocolo_agendamento=' PROT1 ', agendamento_confirmado=True,
+        uf_destino='SP', cidade_destino='Campinas', data_embarque=date(2026, 10, 15),
+        data_prevista_embarque=date(2026, 10, 16), transportadora_razao_social='TRANSP A',
+        transportadora_cnpj='99888777000166', tem_transportadora=True,
+    )
+    dados.update(kw)
+    return FatoEmbarque(**dados)
+
+
+def _calcular(fat=None, estado=None, embarque=None, lead_time=None, lote=None):
+    return calcular_estado_entrega(
+        fat or _fat(), estado or EstadoEntrega(), embarque, lead_time, lote, 'Sistema', AGORA,
+    )
+
+
+def test_sem_embarque_copia_faturamento_e_transportadora_traco():
+    campos, agendamentos = _calcular(lote='LOTE_1')
+
+    assert campos['cliente'] == 'CLIENTE X'
+    assert campos['uf'] == 'SP'
+    assert campos['transportadora'] == '-'
+    assert campos['data_entrega_prevista'] is None
+    assert campos['separacao_lote_id'] == 'LOTE_1'
+    assert 'data_embarque' not in campos
+    assert agendamentos == []
+
+
+def test_embarque_cria_agendamento_confirmado_com_protocolo():
+    campos, agendamentos = _calcular(embarque=_embarque())
+
+    assert campos['transportadora'] == 'TRANSP A'
+    assert campos['data_agenda'] == date(2026, 10, 20)
+    assert campos['data_entrega_prevista'] == date(2026, 10, 20)
+    assert len(agendamentos) == 1
+    ag = agendamentos[0]
+    assert ag['data_agendada'] == date(2026, 10, 20)
+    assert ag['protocolo_agendamento'] == 'PROT1'
+    assert ag['status'] == 'confirmado'
+    assert ag['confirmado_em'] == AGORA
+
+
+def test_agenda_existente_so_cria_agendamento_de_protocolo():
+    estado = EstadoEntrega(id=7, data_agenda=date(2026, 10, 22), ja_existe_data_agenda=True)
+    campos, agendamentos = _calcular(
+        estado=estado, embarque=_embarque(agendamento_confirmado=False),
+    )
+
+    assert campos['data_agenda'] == date(2026, 10, 22)
+    assert agendamentos == [{
+        'forma_agendamento': 'Embarque Automático', 'autor': 'Sistema', 'status': 'aguardando',
+        'criado_em': AGORA, 'data_agendada': None, 'protocolo_agendamento': 'PROT1',
+        'confirmado_por': None, 'confirmado_em': None,
+    }]
+
+    estado.ja_existe_protocolo = True
+    assert _calcular(estado=estado, embarque=_embarque())[1] == []
+
+
+def test_lead_time_em_dias_uteis_sem_agenda():
+    # 15/10/2026 = quinta; +3 dias uteis = terca 20/10
+    campos, _ = _calcular(embarque=_embarque(data_agenda=None), lead_time=3)
+
+    assert campos['lead_time'] == 3
+    assert campos['data_entrega_prevista'] == date(2026, 10, 20)
+
+    # Sem transportadora o lead time e ignorado
+    campos, _ = _calcular(
+        embarque=_embarque(data_agenda=None, tem_transportadora=False), lead_time=3,
+    )
+    assert campos['lead_time'] is None
+    assert campos['data_entrega_prevista'] is None
+
+
+def test_fob_marca_entregue_no_embarque():
+    campos, _ = _calcular(fat=_fat(incoterm='FOB'), embarque=_embarque(data_agenda=None))
+
+    assert campos['data_entrega_prevista'] == date(2026, 10, 16)
+    assert campos['data_hora_entrega_realizada'] == datetime(2026, 10, 15)
+    assert campos['entregue'] is True
+    assert campos['status_finalizacao'] == 'Entregue'
+
+
+def test_lote_existente_nao_e_sobrescrito():
+    campos, _ = _calcular(estado=EstadoEntrega(id=1, separacao_lote_id='LOTE_A'), lote='LOTE_B')
+    assert 'separacao_lote_id' not in campos
+
+
+def test_fallback_nf_a_nf_nao_conta_como_atualizada(monkeypatch):
+    def _sync(numero_nf):
+        if numero_nf == 'NF2':
+            raise ValueError('faturamento quebrado')
+
+    monkeypatch.setattr('app.utils.sincronizar_entregas.sincronizar_entrega_por_nf', _sync)
+    monkeypatch.setattr('app.utils.sincronizar_entregas_lote.db.session.rollback', lambda: None)
+    stats = {'atualizadas': 0, 'nf_a_nf': 0, 'erros': []}
+
+    _sincronizar_nf_a_nf(['NF1', 'NF2', 'NF3'], stats)
+
+    assert stats['nf_a_nf'] == 2
+    assert stats['atualizadas'] == 0
+    assert stats['erros'] == ['NF NF2: faturamento quebrado']
+
+
+def _criar_embarque_item(_db, numero_nf, criado_em, **kw):
+    from app.embarques.models import Embarque, EmbarqueItem
+    emb = Embarque(numero=int(uuid.uuid4().int % 9_000_000) + 1_000_000, status='ativo', criado_em=criado_em)
+    _db.session.add(emb)
+    _db.session.flush()
+    item = EmbarqueItem(
+        embarque_id=emb.id, separacao_lote_id='LOTE_WM', pedido='P1', cliente='X',
+        nota_fiscal=numero_nf, status='ativo', uf_destino='SP', cidade_destino='X', **kw,
+    )
+    _db.session.add(item)
+    _db.session.flush()
+    return item
+
+
+def test_agendamento_alterado_em_so_muda_com_campos_de_agendamento(db):
+    if db.engine.dialect.name != 'postgresql':
+        pytest.skip('tabelas de embarque so existem no PostgreSQL de testes')
+    item = _criar_embarque_item(db, f'W{uuid.uuid4().hex[:8]}', datetime(2026, 1, 5))
+    assert item.agendamento_alterado_em is None
+
+    item.peso = 10.0
+    db.session.flush()
+    assert item.agendamento_alterado_em is None
+
+    item.protocolo_agendamento = 'PROT9'
+    db.session.flush()
+    carimbo = item.agendamento_alterado_em
+    assert carimbo is not None
+
+    item.peso = 20.0
+    db.session.flush()
+    assert item.agendamento_alterado_em == carimbo
+
+
+def test_watermark_pega_agendamento_de_embarque_antigo(db):
+    if db.engine.dialect.name != 'postgresql':
+        pytest.skip('tabelas de embarque so existem no PostgreSQL de testes')
+    from app.utils.timezone import agora_utc_naive
+
+    nf_agenda = f'W{uuid.uuid4().hex[:8]}'
+    nf_parada = f'W{uuid.uuid4().hex[:8]}'
+    antigo = datetime(2026, 1, 5)
+    item = _criar_embarque_item(db, nf_agenda, antigo)
+    _criar_embarque_item(db, nf_parada, antigo)
+    desde = agora_utc_naive() - timedelta(seconds=1)
+
+    item.data_agenda = '20/10/2026'
+    db.session.flush()
+
+    nfs = nfs_alteradas_desde(desde)
+    assert nf_agenda in nfs
+    assert nf_parada not in nfs
+
+
+def test_update_em_massa_de_agendamento_carimba_watermark(db):
+    if db.engine.dialect.name != 'postgresql':
+        pytest.skip('tabelas de embarque so existem no PostgreSQL de testes')
+    from app.embarques.models import EmbarqueItem
+
+    item = _criar_embarque_item(db, f'W{uuid.uuid4().hex[:8]}', datetime(2026, 1, 5))
+    db.session.query(EmbarqueItem).filter_by(id=item.id).update(
+        {'peso': 5.0}, synchronize_session=False)
+    assert db.session.query(EmbarqueItem.agendamento_alterado_em).filter_by(id=item.id).scalar() is None
+
+    db.session.query(EmbarqueItem).filter_by(id=item.id).update(
+        {EmbarqueItem.protocolo_agendamento: 'PROT7'}, synchronize_session=False)
+    assert db.session.query(EmbarqueItem.agendamento_alterado_em).filter_by(id=item.id).scalar() is not None
@@ -0,0 +1,120 @@
+"""Tests do motor de export em streaming (app/utils/streaming_export.py).
+
+Sem banco de producao: linhas sinteticas (geradores) e SQLite em memoria
+para o iter_lotes.
+"""
+from datetime import date, datetime, timedelta, timezone
+from io import BytesIO
+
+from flask import Flask
+from openpyxl import load_workbook
+
+from app.utils.streaming_export import (
+    Aba, Coluna, escrever_xlsx, iter_csv, iter_lotes, resposta_export,
+)
+
+COLUNAS = [
+    Coluna('nf', 'NF'),
+    Coluna('data', 'Data', fmt='date'),
+    Coluna('valor', 'Valor', fmt='money'),
+    Coluna('obs', 'Obs'),
+]
+
+
+def _linhas(n, produzidas=None):
+    for i in range(n):
+        if produzidas is not None:
+            produzidas.append(i)
+        yield {
+            'nf': f'NF{i}',
+            'data': date(2026, 1, 1) + timedelta(days=i % 30),
+            'valor': i * 1.5,
+            'obs': '' if i % 2 else 'ok',
+        }
+
+
+def test_xlsx_cabecalho_duplo_tipos_nativos(tmp_path):
+    destino = tmp_path / 'x.xlsx'
+    aba = Aba('NFs', COLUNAS, _linhas(3), grupos=[('NF', 2), ('VALORES', 2)])
+
+    assert escrever_xlsx(str(destino), [aba]) == 3
+
+    ws = load_workbook(destino).active
+    assert ws['A1'].value == 'NF' and ws['C1'].value == 'VALORES'
+    assert 'A1:B1' in {str(r) for r in ws.merged_cells.ranges}
+    assert [c.value for c in ws[2]] == ['NF', 'Data', 'Valor', 'Obs']
+    assert isinstance(ws['B3'].value, datetime)
+    assert 'YY' in ws['B3'].number_format.upper()
+    assert ws['C4'].value == 1.5 and 'R$' in ws['C4'].number_format
+    assert ws['D4'].value is None  # '' nao vira celula
+    assert ws.freeze_panes == 'A3'
+
+
+def test_xlsx_consome_linhas_sob_demanda(tmp_path):
+    produzidas = []
+    no_progresso = []
+
+    escrever_xlsx(
+        str(tmp_path / 'x.xlsx'), [Aba('NFs', COLUNAS, _linhas(6000, produzidas))],
+        progresso=lambda aba, n: no_progresso.append((n, len(produzidas))),
+    )
+
+    # Quando a linha 2000 foi gravada, o gerador ainda nao tinha produzido o resto
+    n, produzidas_ate_ali = no_progresso[0]
+    assert n == 2000 and produzidas_ate_ali <= 2001
+    assert no_progresso[-1] == (6000, 6000)
+
+
+def test_csv_pt_br_em_chunks():
+    chunks = list(iter_csv(COLUNAS, _linhas(5000)))
+    texto = b''.join(chunks).decode('utf-8-sig')
+    linhas = texto.split('\r\n')
+
+    assert len(chunks) > 1
+    assert chunks[0].startswith(b'\xef\xbb\xbf') and not chunks[1].startswith(b'\xef\xbb\xbf')
+    assert linhas[0] == 'NF;Data;Valor;Obs'
+    assert linhas[2] == 'NF1;02/01/2026;1,50;'
+    assert len(linhas) == 5002  # cabecalho + 5000 + '' final
+
+
+def test_csv_datetime_sem_timezone():
+    aware = datetime(2026, 3, 1, 8, 30, tzinfo=timezone(timedelta(hours=-3)))
+    out = b''.join(iter_csv([Coluna('d', 'D', fmt='datetime')], [{'d': aware}]))
+    assert out.decode('utf-8-sig').split('\r\n')[1] == '01/03/2026 08:30'
+
+
+def test_iter_lotes_com_cursor():
+    from sqlalchemy import Column, Integer, create_engine
+    from sqlalchemy.orm import Session, declarative_base
+
+    Base = declarative_base()
+
+    class Item(Base):
+        __tablename__ = 'itens_export_teste'
+        id = Column(Integer, primary_key=True)
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add_all([Item(id=i) for i in range(1, 2501)])
+        s.commit()
+        lotes = list(iter_lotes(s.query(Item).order_by(Item.id), tamanho=1000))
+
+    assert [len(l) for l in lotes] == [1000, 1000, 500]
+    assert lotes[-1][-1].id == 2500
+
+
+def test_resposta_xlsx_e_csv():
+    app = Flask('teste')
+    with app.test_request_context():
+        r = resposta_export([Aba('NFs', COLUNAS, _linhas(10))], 'xlsx', 'carvia_nfs_x')
+        r.direct_passthrough = False
+        ws = load_workbook(BytesIO(r.get_data())).active
+        assert ws.max_row == 11
+        assert 'carvia_nfs_x.xlsx' in r.headers['Content-Disposition']
+        r.close()
+
+        r = resposta_export([Aba('NFs', COLUNAS, _linhas(10))], 'csv', 'carvia_nfs_x')
+        assert r.is_streamed
+        assert r.get_data().decode('utf-8-sig').startswith('NF;Data;Valor;Obs')
+        assert 'carvia_nfs_x.csv' in r.headers['Content-Disposition']
@@ -19,7 +19,7 @@ import re
 import logging
 import time
 from redis import Redis
-from rq import Worker, Queue
+from rq import SimpleWorker, Worker, Queue
 from rq.job import Job
 import click
 from app.utils.timezone import agora_utc_naive
@@ -81,7 +81,8 @@ def job_failure_handler(job, connection, type, value, traceback):
 @click.option('--verbose', is_flag=True, help='Modo verbose com mais logs')
 @click.option('--burst', is_flag=True, help='Executa jobs pendentes e para')
 @click.option('--queues', default='atacadao,artifacts,agent_validation,sped_ecd,high,agent_judge,default', help='Filas a processar (separadas por vírgula)')
-def run_worker(workers, verbose, burst, queues):
+@click.option('--sem-fork', is_flag=True, help='Executa jobs no próprio processo (mantém o navegador do pool entre jobs)')
+def run_worker(workers, verbose, burst, queues, sem_fork):
     """
     Executa o worker do Atacadão
     
@@ -90,6 +91,8 @@ def run_worker(workers, verbose, burst, queues):
         verbose: Ativa logs detalhados
         burst: Modo burst (executa e para)
         queues: Filas a processar
+        sem_fork: SimpleWorker (sem work-horse) — o pool de navegador
+            (app.utils.browser_pool) sobrevive entre jobs
     """
     if verbose:
         logging.getLogger().setLevel(logging.DEBUG)
@@ -112,7 +115,8 @@ def run_worker(workers, verbose, burst, queues):
         'queues': queues_obj,
         'log_level': 'DEBUG' if verbose else 'INFO',
         'log_format': '%(asctime)s - %(message)s',
-        'date_format': '%Y-%m-%d %H:%M:%S'
+        'date_format': '%Y-%m-%d %H:%M:%S',
+        'sem_fork': sem_fork,
     }
     
     # ✅ REMOVIDO Nov/2025: Scheduler Sendas - automação Playwright descontinuada
@@ -160,7 +164,13 @@ def run_single_worker(config, burst=False):
     import random
     worker_name = f'atacadao-worker-{os.getpid()}-{int(time.time())}-{random.randint(1000, 9999)}'
     
-    worker = Worker(
+    # Sem fork: o Chromium do pool continua vivo entre jobs (sem startup por job).
+    # Com fork o pool fica desligado — o work-horse morreria com o navegador.
+    if config.get('sem_fork'):
+        from app.utils.browser_pool import habilitar_no_processo
+        habilitar_no_processo()
+    worker_cls = SimpleWorker if config.get('sem_fork') else Worker
+    worker = worker_cls(
         name=worker_name,
         queues=config['queues'],
         connection=config['connection'],
@@ -102,12 +102,37 @@ def worker_shutdown():
 # O processamento agora é feito manualmente via exportação de planilha
 
 
+class ProfiledWorker(Worker):
+    """Worker RQ que marca as queries de cada job com a origem `rq:<func>`.
+
+    O job roda no work-horse (processo filho descartado ao fim do job com
+    os._exit, sem atexit): o agregado de fingerprints e publicado no Redis ao
+    sair do escopo e a fila do audit writer Odoo e gravada antes de sair.
+    Ver app/utils/query_profiler.py (ENABLE_QUERY_FINGERPRINTS) e
+    app/utils/odoo_audit_writer.py.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        from app.utils.odoo_audit_writer import habilitar_flush_por_job
+        habilitar_flush_por_job()
+
+    def perform_job(self, job, queue):
+        from app.utils.odoo_audit_writer import flush_pendentes
+        from app.utils.query_profiler import query_scope
+        try:
+            with query_scope(f"rq:{job.func_name}", flush_ao_sair=True):
+                return super().perform_job(job, queue)
+        finally:
+            flush_pendentes()
+
+
 def run_single_worker(config, burst=False):
     """Executa um worker individual"""
     import random
     worker_name = f'render-worker-{os.getpid()}-{int(time.time())}-{random.randint(1000, 9999)}'
 
-    worker = Worker(
+    worker = ProfiledWorker(
         name=worker_name,
         queues=config['queues'],
         connection=config['connection'],